@@ -27,12 +27,17 @@ from .openai_shared import (
     calculate_token_breakdown,
 )
 from backend.core.api.app.utils.secrets_manager import SecretsManager
+from backend.shared.python_utils.http_clients import get_http_client, register_http_upstream
 
 logger = logging.getLogger(__name__)
 
 # Default timeout for API calls (in seconds)
 DEFAULT_TIMEOUT = 180.0
 
+# Shared keep-alive client (see shared/python_utils/http_clients.py)
+HTTP_UPSTREAM = "google_maas"
+register_http_upstream(HTTP_UPSTREAM, timeout=DEFAULT_TIMEOUT, http2=True)
+
 # Cache for the access token (short-lived, refreshed as needed)
 _cached_access_token: Optional[str] = None
 _cached_token_expiry: float = 0.0
@@ -227,82 +232,82 @@ async def _send_google_maas_request(
     start_time = time.time()
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(api_url, json=payload, headers=headers, timeout=DEFAULT_TIMEOUT)
-            logger.info(f"{log_prefix} Received response: HTTP {response.status_code}")
-
-            if response.status_code >= 400:
-                error_text = response.text[:500]
-                error_msg = f"HTTP {response.status_code}: {error_text}"
-                logger.error(f"{log_prefix} API error: {error_msg}")
-                return UnifiedOpenAIResponse(task_id=task_id, model_id=model_id, success=False, error_message=error_msg)
-
-            response_data = response.json()
-            elapsed_time = time.time() - start_time
-            logger.info(f"{log_prefix} Request completed in {elapsed_time:.2f}s")
-
-            choices = response_data.get("choices", [])
-            if not choices:
-                return UnifiedOpenAIResponse(task_id=task_id, model_id=model_id, success=False, error_message="No choices in response")
-
-            first_choice = choices[0]
-            message = first_choice.get("message", {})
-            content = message.get("content")
-
-            # Extract usage
-            usage_data = response_data.get("usage", {})
-            messages_for_breakdown = payload.get("messages", [])
-            breakdown = calculate_token_breakdown(messages_for_breakdown, model_id, tools=payload.get("tools"))
-
-            usage = OpenAIUsageMetadata(
-                input_tokens=usage_data.get("prompt_tokens", 0),
-                output_tokens=usage_data.get("completion_tokens", 0),
-                total_tokens=usage_data.get("total_tokens", 0),
-                user_input_tokens=breakdown.get("user_input_tokens"),
-                system_prompt_tokens=breakdown.get("system_prompt_tokens"),
-            )
+        client = get_http_client(HTTP_UPSTREAM)
+        response = await client.post(api_url, json=payload, headers=headers, timeout=DEFAULT_TIMEOUT)
+        logger.info(f"{log_prefix} Received response: HTTP {response.status_code}")
+
+        if response.status_code >= 400:
+            error_text = response.text[:500]
+            error_msg = f"HTTP {response.status_code}: {error_text}"
+            logger.error(f"{log_prefix} API error: {error_msg}")
+            return UnifiedOpenAIResponse(task_id=task_id, model_id=model_id, success=False, error_message=error_msg)
+
+        response_data = response.json()
+        elapsed_time = time.time() - start_time
+        logger.info(f"{log_prefix} Request completed in {elapsed_time:.2f}s")
+
+        choices = response_data.get("choices", [])
+        if not choices:
+            return UnifiedOpenAIResponse(task_id=task_id, model_id=model_id, success=False, error_message="No choices in response")
+
+        first_choice = choices[0]
+        message = first_choice.get("message", {})
+        content = message.get("content")
+
+        # Extract usage
+        usage_data = response_data.get("usage", {})
+        messages_for_breakdown = payload.get("messages", [])
+        breakdown = calculate_token_breakdown(messages_for_breakdown, model_id, tools=payload.get("tools"))
+
+        usage = OpenAIUsageMetadata(
+            input_tokens=usage_data.get("prompt_tokens", 0),
+            output_tokens=usage_data.get("completion_tokens", 0),
+            total_tokens=usage_data.get("total_tokens", 0),
+            user_input_tokens=breakdown.get("user_input_tokens"),
+            system_prompt_tokens=breakdown.get("system_prompt_tokens"),
+        )
 
-            # Handle tool calls
-            tool_calls_made = None
-            if "tool_calls" in message:
-                tool_calls_made = []
-                for tc in message.get("tool_calls", []):
-                    if tc.get("type") == "function":
-                        func_data = tc.get("function", {})
-                        func_name = func_data.get("name", "")
-                        args_raw = func_data.get("arguments", "{}")
-                        parsed_args = {}
-                        parsing_error = None
-                        try:
-                            parsed_args = json.loads(args_raw)
-                        except json.JSONDecodeError as e:
-                            parsing_error = f"Failed to parse function arguments: {e}"
-                            logger.error(f"{log_prefix} {parsing_error}")
-                        tool_calls_made.append(
-                            ParsedOpenAIToolCall(
-                                tool_call_id=tc.get("id", ""),
-                                function_name=func_name,
-                                function_arguments_raw=args_raw,
-                                function_arguments_parsed=parsed_args,
-                                parsing_error=parsing_error,
-                            )
+        # Handle tool calls
+        tool_calls_made = None
+        if "tool_calls" in message:
+            tool_calls_made = []
+            for tc in message.get("tool_calls", []):
+                if tc.get("type") == "function":
+                    func_data = tc.get("function", {})
+                    func_name = func_data.get("name", "")
+                    args_raw = func_data.get("arguments", "{}")
+                    parsed_args = {}
+                    parsing_error = None
+                    try:
+                        parsed_args = json.loads(args_raw)
+                    except json.JSONDecodeError as e:
+                        parsing_error = f"Failed to parse function arguments: {e}"
+                        logger.error(f"{log_prefix} {parsing_error}")
+                    tool_calls_made.append(
+                        ParsedOpenAIToolCall(
+                            tool_call_id=tc.get("id", ""),
+                            function_name=func_name,
+                            function_arguments_raw=args_raw,
+                            function_arguments_parsed=parsed_args,
+                            parsing_error=parsing_error,
                         )
+                    )
 
-            raw_response = RawOpenAIChatCompletionResponse(
-                text=content,
-                tool_calls=message.get("tool_calls"),
-                usage_metadata=usage,
-            )
+        raw_response = RawOpenAIChatCompletionResponse(
+            text=content,
+            tool_calls=message.get("tool_calls"),
+            usage_metadata=usage,
+        )
 
-            return UnifiedOpenAIResponse(
-                task_id=task_id,
-                model_id=model_id,
-                success=True,
-                direct_message_content=content,
-                tool_calls_made=tool_calls_made,
-                raw_response=raw_response,
-                usage=usage,
-            )
+        return UnifiedOpenAIResponse(
+            task_id=task_id,
+            model_id=model_id,
+            success=True,
+            direct_message_content=content,
+            tool_calls_made=tool_calls_made,
+            raw_response=raw_response,
+            usage=usage,
+        )
 
     except httpx.HTTPStatusError as e:
         error_msg = f"HTTP error {e.response.status_code}: {e.response.text[:500]}"
@@ -343,152 +348,152 @@ async def _stream_google_maas_response(
     token_breakdown = calculate_token_breakdown(messages_for_breakdown, model_id, tools=payload.get("tools"))
 
     try:
-        async with httpx.AsyncClient() as client:
-            async with client.stream("POST", api_url, json=payload, headers=headers, timeout=DEFAULT_TIMEOUT) as response:
-                # Handle HTTP errors
-                if response.status_code >= 400:
-                    error_body = b""
-                    try:
-                        async for chunk in response.aiter_bytes():
-                            error_body += chunk
-                            if len(error_body) > 10000:
-                                break
-                    except Exception as e:
-                        logger.warning(f"{log_prefix} Error reading error response body: {e}")
-
-                    error_msg = f"HTTP {response.status_code}"
-                    try:
-                        error_text = error_body.decode("utf-8", errors="ignore").strip()
-                        logger.error(
-                            f"{log_prefix} Provider error response received "
-                            f"(response_body_length={len(error_text)})"
-                        )
-                        if error_text:
-                            try:
-                                error_detail = json.loads(error_text)
-                                # Handle both dict and list error formats from Google
-                                if isinstance(error_detail, dict):
-                                    error_obj = error_detail.get("error", {})
-                                    if isinstance(error_obj, dict):
-                                        error_msg = error_obj.get("message", error_msg)
-                                    else:
-                                        error_msg = f"HTTP {response.status_code}: {str(error_obj)[:500]}"
-                                elif isinstance(error_detail, list):
-                                    # Google sometimes returns error as a JSON array
-                                    error_msg = f"HTTP {response.status_code}: provider returned array error payload"
+        client = get_http_client(HTTP_UPSTREAM)
+        async with client.stream("POST", api_url, json=payload, headers=headers, timeout=DEFAULT_TIMEOUT) as response:
+            # Handle HTTP errors
+            if response.status_code >= 400:
+                error_body = b""
+                try:
+                    async for chunk in response.aiter_bytes():
+                        error_body += chunk
+                        if len(error_body) > 10000:
+                            break
+                except Exception as e:
+                    logger.warning(f"{log_prefix} Error reading error response body: {e}")
+
+                error_msg = f"HTTP {response.status_code}"
+                try:
+                    error_text = error_body.decode("utf-8", errors="ignore").strip()
+                    logger.error(
+                        f"{log_prefix} Provider error response received "
+                        f"(response_body_length={len(error_text)})"
+                    )
+                    if error_text:
+                        try:
+                            error_detail = json.loads(error_text)
+                            # Handle both dict and list error formats from Google
+                            if isinstance(error_detail, dict):
+                                error_obj = error_detail.get("error", {})
+                                if isinstance(error_obj, dict):
+                                    error_msg = error_obj.get("message", error_msg)
                                 else:
-                                    error_msg = f"HTTP {response.status_code}: provider returned unsupported error payload"
-                            except json.JSONDecodeError:
-                                error_msg = f"HTTP {response.status_code}: provider returned non-JSON error body"
-                    except UnicodeDecodeError:
-                        error_msg = f"HTTP {response.status_code}: {str(error_body[:500])}"
-
-                    logger.error(f"{log_prefix} API error: {error_msg}")
-                    raise IOError(f"Google MaaS API Error: {error_msg}")
-
-                # Process SSE stream
-                async for line in response.aiter_lines():
-                    if not line.strip():
-                        continue
-                    if line.startswith(":"):
-                        continue
+                                    error_msg = f"HTTP {response.status_code}: {str(error_obj)[:500]}"
+                            elif isinstance(error_detail, list):
+                                # Google sometimes returns error as a JSON array
+                                error_msg = f"HTTP {response.status_code}: provider returned array error payload"
+                            else:
+                                error_msg = f"HTTP {response.status_code}: provider returned unsupported error payload"
+                        except json.JSONDecodeError:
+                            error_msg = f"HTTP {response.status_code}: provider returned non-JSON error body"
+                except UnicodeDecodeError:
+                    error_msg = f"HTTP {response.status_code}: {str(error_body[:500])}"
 
-                    if line.startswith("data: "):
-                        line = line[6:]
-                    else:
-                        continue
+                logger.error(f"{log_prefix} API error: {error_msg}")
+                raise IOError(f"Google MaaS API Error: {error_msg}")
 
-                    if line.strip() == "[DONE]":
-                        break
+            # Process SSE stream
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                if line.startswith(":"):
+                    continue
 
-                    try:
-                        chunk = json.loads(line)
-                        choices = chunk.get("choices", [])
-                        if not choices:
-                            continue
-
-                        choice = choices[0]
-                        delta = choice.get("delta", {})
-
-                        # Handle text content
-                        if "content" in delta and delta["content"]:
-                            yield delta["content"]
-
-                        # Handle tool calls (streamed incrementally)
-                        if delta.get("tool_calls"):
-                            for tc_delta in delta["tool_calls"]:
-                                tc_id = tc_delta.get("id", "")
-                                tc_index = tc_delta.get("index", 0)
-                                buffer_key = tc_index
-
-                                if buffer_key not in tool_calls_buffer:
-                                    tool_calls_buffer[buffer_key] = {
-                                        "id": tc_id,
-                                        "type": "function",
-                                        "function": {"name": "", "arguments": ""},
-                                    }
-                                elif tc_id:
-                                    tool_calls_buffer[buffer_key]["id"] = tc_id
-
-                                if "function" in tc_delta and "name" in tc_delta["function"]:
-                                    tool_calls_buffer[buffer_key]["function"]["name"] = tc_delta["function"]["name"]
-                                if "function" in tc_delta and "arguments" in tc_delta["function"]:
-                                    tool_calls_buffer[buffer_key]["function"]["arguments"] += tc_delta["function"]["arguments"]
-
-                        # Yield tool calls on finish_reason
-                        finish_reason = choice.get("finish_reason")
-                        if finish_reason in ("tool_calls", "tool_call") and tool_calls_buffer:
-                            for _key, tc in tool_calls_buffer.items():
-                                func_name = tc["function"]["name"]
-                                args_raw = tc["function"]["arguments"]
-                                parsed_args = {}
-                                parsing_error = None
-                                try:
-                                    parsed_args = json.loads(args_raw)
-                                except json.JSONDecodeError as e:
-                                    parsing_error = f"Failed to parse function arguments: {e}"
-                                    logger.error(f"{log_prefix} {parsing_error}")
-                                yield ParsedOpenAIToolCall(
-                                    tool_call_id=tc["id"],
-                                    function_name=func_name,
-                                    function_arguments_raw=args_raw,
-                                    function_arguments_parsed=parsed_args,
-                                    parsing_error=parsing_error,
-                                )
-                            tool_calls_buffer.clear()
-
-                        # Detect truncation or content filtering
-                        if finish_reason == "length":
-                            logger.warning(f"{log_prefix} Response truncated: finish_reason='length' (max_tokens reached)")
-                            yield "\n\n---\n*This response was cut short because it reached the model's maximum output length. You can ask the AI to continue.*"
-                        elif finish_reason == "content_filter":
-                            logger.warning(f"{log_prefix} Response blocked: finish_reason='content_filter'")
-                            yield "\n\n---\n*This response was blocked by the model's content filter. Try rephrasing your request or using a different model.*"
-
-                        # Update usage if present
-                        if "usage" in chunk:
-                            usage = chunk["usage"]
-                            cumulative_usage["input_tokens"] = usage.get("prompt_tokens", cumulative_usage["input_tokens"])
-                            cumulative_usage["output_tokens"] = usage.get("completion_tokens", cumulative_usage["output_tokens"])
-                            cumulative_usage["total_tokens"] = usage.get("total_tokens", cumulative_usage["total_tokens"])
+                if line.startswith("data: "):
+                    line = line[6:]
+                else:
+                    continue
 
-                    except json.JSONDecodeError as e:
-                        logger.warning(
-                            f"{log_prefix} Failed to parse SSE chunk: {e} "
-                            f"(line_length={len(line)})"
-                        )
+                if line.strip() == "[DONE]":
+                    break
+
+                try:
+                    chunk = json.loads(line)
+                    choices = chunk.get("choices", [])
+                    if not choices:
                         continue
 
-                # Yield final usage
-                yield OpenAIUsageMetadata(
-                    input_tokens=cumulative_usage["input_tokens"],
-                    output_tokens=cumulative_usage["output_tokens"],
-                    total_tokens=cumulative_usage["total_tokens"],
-                    user_input_tokens=token_breakdown.get("user_input_tokens"),
-                    system_prompt_tokens=token_breakdown.get("system_prompt_tokens"),
-                )
+                    choice = choices[0]
+                    delta = choice.get("delta", {})
+
+                    # Handle text content
+                    if "content" in delta and delta["content"]:
+                        yield delta["content"]
+
+                    # Handle tool calls (streamed incrementally)
+                    if delta.get("tool_calls"):
+                        for tc_delta in delta["tool_calls"]:
+                            tc_id = tc_delta.get("id", "")
+                            tc_index = tc_delta.get("index", 0)
+                            buffer_key = tc_index
+
+                            if buffer_key not in tool_calls_buffer:
+                                tool_calls_buffer[buffer_key] = {
+                                    "id": tc_id,
+                                    "type": "function",
+                                    "function": {"name": "", "arguments": ""},
+                                }
+                            elif tc_id:
+                                tool_calls_buffer[buffer_key]["id"] = tc_id
+
+                            if "function" in tc_delta and "name" in tc_delta["function"]:
+                                tool_calls_buffer[buffer_key]["function"]["name"] = tc_delta["function"]["name"]
+                            if "function" in tc_delta and "arguments" in tc_delta["function"]:
+                                tool_calls_buffer[buffer_key]["function"]["arguments"] += tc_delta["function"]["arguments"]
+
+                    # Yield tool calls on finish_reason
+                    finish_reason = choice.get("finish_reason")
+                    if finish_reason in ("tool_calls", "tool_call") and tool_calls_buffer:
+                        for _key, tc in tool_calls_buffer.items():
+                            func_name = tc["function"]["name"]
+                            args_raw = tc["function"]["arguments"]
+                            parsed_args = {}
+                            parsing_error = None
+                            try:
+                                parsed_args = json.loads(args_raw)
+                            except json.JSONDecodeError as e:
+                                parsing_error = f"Failed to parse function arguments: {e}"
+                                logger.error(f"{log_prefix} {parsing_error}")
+                            yield ParsedOpenAIToolCall(
+                                tool_call_id=tc["id"],
+                                function_name=func_name,
+                                function_arguments_raw=args_raw,
+                                function_arguments_parsed=parsed_args,
+                                parsing_error=parsing_error,
+                            )
+                        tool_calls_buffer.clear()
+
+                    # Detect truncation or content filtering
+                    if finish_reason == "length":
+                        logger.warning(f"{log_prefix} Response truncated: finish_reason='length' (max_tokens reached)")
+                        yield "\n\n---\n*This response was cut short because it reached the model's maximum output length. You can ask the AI to continue.*"
+                    elif finish_reason == "content_filter":
+                        logger.warning(f"{log_prefix} Response blocked: finish_reason='content_filter'")
+                        yield "\n\n---\n*This response was blocked by the model's content filter. Try rephrasing your request or using a different model.*"
+
+                    # Update usage if present
+                    if "usage" in chunk:
+                        usage = chunk["usage"]
+                        cumulative_usage["input_tokens"] = usage.get("prompt_tokens", cumulative_usage["input_tokens"])
+                        cumulative_usage["output_tokens"] = usage.get("completion_tokens", cumulative_usage["output_tokens"])
+                        cumulative_usage["total_tokens"] = usage.get("total_tokens", cumulative_usage["total_tokens"])
+
+                except json.JSONDecodeError as e:
+                    logger.warning(
+                        f"{log_prefix} Failed to parse SSE chunk: {e} "
+                        f"(line_length={len(line)})"
+                    )
+                    continue
+
+            # Yield final usage
+            yield OpenAIUsageMetadata(
+                input_tokens=cumulative_usage["input_tokens"],
+                output_tokens=cumulative_usage["output_tokens"],
+                total_tokens=cumulative_usage["total_tokens"],
+                user_input_tokens=token_breakdown.get("user_input_tokens"),
+                system_prompt_tokens=token_breakdown.get("system_prompt_tokens"),
+            )
 
-                logger.info(f"{log_prefix} Stream completed successfully")
+            logger.info(f"{log_prefix} Stream completed successfully")
 
     except httpx.HTTPStatusError as e:
         error_msg = f"HTTP error {e.response.status_code}: {e.response.text[:500] if hasattr(e.response, 'text') else str(e)}"
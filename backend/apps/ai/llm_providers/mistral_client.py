@@ -9,11 +9,17 @@ from pydantic import BaseModel
 import tiktoken
 
 from backend.core.api.app.utils.secrets_manager import SecretsManager
+from backend.shared.python_utils.http_clients import get_http_client, register_http_upstream
 from .openai_shared import calculate_token_breakdown
 
 logger = logging.getLogger(__name__)
 
 MISTRAL_API_BASE_URL = "https://api.mistral.ai/v1"
+
+# Shared keep-alive client (see shared/python_utils/http_clients.py)
+HTTP_UPSTREAM = "mistral"
+register_http_upstream(HTTP_UPSTREAM, timeout=180.0, http2=True)
+
 MISTRAL_API_KEY: Optional[str] = None
 
 # --- Pydantic Models for Structured Mistral Response ---
@@ -325,20 +331,20 @@ async def invoke_mistral_chat_completions(
 
 
     if stream:
-        return _iterate_stream_response(httpx.AsyncClient(timeout=180.0))
+        return _iterate_stream_response(get_http_client(HTTP_UPSTREAM))
     else:
-        async with httpx.AsyncClient(timeout=180.0) as client:
-            try:
-                response = await client.post(endpoint, headers=headers, json=payload)
-                response.raise_for_status()
-                return await _process_non_stream_response(response.json())
-            except httpx.HTTPStatusError as e:
-                err_msg = f"HTTP error: {e.response.status_code} - {e.response.text}"
-                logger.error(f"{log_prefix} {err_msg}", exc_info=True)
-                return UnifiedMistralResponse(task_id=task_id, model_id=model_id, success=False, error_message=err_msg)
-            except Exception as e:
-                logger.error(f"{log_prefix} Unexpected error: {e}", exc_info=True)
-                return UnifiedMistralResponse(task_id=task_id, model_id=model_id, success=False, error_message=str(e))
+        client = get_http_client(HTTP_UPSTREAM)
+        try:
+            response = await client.post(endpoint, headers=headers, json=payload)
+            response.raise_for_status()
+            return await _process_non_stream_response(response.json())
+        except httpx.HTTPStatusError as e:
+            err_msg = f"HTTP error: {e.response.status_code} - {e.response.text}"
+            logger.error(f"{log_prefix} {err_msg}", exc_info=True)
+            return UnifiedMistralResponse(task_id=task_id, model_id=model_id, success=False, error_message=err_msg)
+        except Exception as e:
+            logger.error(f"{log_prefix} Unexpected error: {e}", exc_info=True)
+            return UnifiedMistralResponse(task_id=task_id, model_id=model_id, success=False, error_message=str(e))
 
 if __name__ == '__main__':
     async def main_test():
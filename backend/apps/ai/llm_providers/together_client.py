@@ -16,6 +16,8 @@ import httpx
 from typing import Dict, Any, List, Optional, Union, AsyncIterator
 import time
 
+from backend.shared.python_utils.http_clients import get_http_client, register_http_upstream
+
 from .openai_shared import (
     UnifiedOpenAIResponse,
     ParsedOpenAIToolCall,
@@ -33,6 +35,10 @@ TOGETHER_API_URL = "https://api.together.xyz/v1/chat/completions"
 # Default timeout for API calls (in seconds)
 DEFAULT_TIMEOUT = 180.0
 
+# Shared keep-alive client (see shared/python_utils/http_clients.py)
+HTTP_UPSTREAM = "together"
+register_http_upstream(HTTP_UPSTREAM, timeout=DEFAULT_TIMEOUT, http2=True)
+
 # Default headers
 DEFAULT_HEADERS = {
     "Content-Type": "application/json",
@@ -180,95 +186,95 @@ async def _send_together_request(
     start_time = time.time()
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                TOGETHER_API_URL,
-                json=payload,
-                headers=headers,
-                timeout=DEFAULT_TIMEOUT
-            )
+        client = get_http_client(HTTP_UPSTREAM)
+        response = await client.post(
+            TOGETHER_API_URL,
+            json=payload,
+            headers=headers,
+            timeout=DEFAULT_TIMEOUT
+        )
             
-            # Check for HTTP errors
-            response.raise_for_status()
-            response_data = response.json()
+        # Check for HTTP errors
+        response.raise_for_status()
+        response_data = response.json()
             
-            # Log response time
-            elapsed_time = time.time() - start_time
-            logger.info(f"{log_prefix} Request completed in {elapsed_time:.2f}s")
+        # Log response time
+        elapsed_time = time.time() - start_time
+        logger.info(f"{log_prefix} Request completed in {elapsed_time:.2f}s")
             
-            # Extract the response content
-            choices = response_data.get("choices", [])
-            if not choices:
-                return UnifiedOpenAIResponse(
-                    task_id=task_id,
-                    model_id=model_id,
-                    success=False,
-                    error_message="No choices returned in the response"
-                )
+        # Extract the response content
+        choices = response_data.get("choices", [])
+        if not choices:
+            return UnifiedOpenAIResponse(
+                task_id=task_id,
+                model_id=model_id,
+                success=False,
+                error_message="No choices returned in the response"
+            )
             
-            first_choice = choices[0]
-            message = first_choice.get("message", {})
-            content = message.get("content")
+        first_choice = choices[0]
+        message = first_choice.get("message", {})
+        content = message.get("content")
             
-            # Extract usage information
-            usage_data = response_data.get("usage", {})
+        # Extract usage information
+        usage_data = response_data.get("usage", {})
             
-            # Calculate token breakdown from input messages (estimate)
-            input_messages = payload.get("messages", [])
-            breakdown = calculate_token_breakdown(input_messages, model_id, tools=payload.get("tools"))
+        # Calculate token breakdown from input messages (estimate)
+        input_messages = payload.get("messages", [])
+        breakdown = calculate_token_breakdown(input_messages, model_id, tools=payload.get("tools"))
 
-            usage = OpenAIUsageMetadata(
-                input_tokens=usage_data.get("prompt_tokens", 0),
-                output_tokens=usage_data.get("completion_tokens", 0),
-                total_tokens=usage_data.get("total_tokens", 0),
-                user_input_tokens=breakdown.get("user_input_tokens"),
-                system_prompt_tokens=breakdown.get("system_prompt_tokens")
-            )
+        usage = OpenAIUsageMetadata(
+            input_tokens=usage_data.get("prompt_tokens", 0),
+            output_tokens=usage_data.get("completion_tokens", 0),
+            total_tokens=usage_data.get("total_tokens", 0),
+            user_input_tokens=breakdown.get("user_input_tokens"),
+            system_prompt_tokens=breakdown.get("system_prompt_tokens")
+        )
             
-            # Handle tool calls if present
-            tool_calls_made = None
-            if "tool_calls" in message:
-                tool_calls_made = []
-                for tc in message.get("tool_calls", []):
-                    if tc.get("type") == "function":
-                        function_data = tc.get("function", {})
-                        function_name = function_data.get("name") or ""
-                        arguments_raw = function_data.get("arguments") or "{}"
+        # Handle tool calls if present
+        tool_calls_made = None
+        if "tool_calls" in message:
+            tool_calls_made = []
+            for tc in message.get("tool_calls", []):
+                if tc.get("type") == "function":
+                    function_data = tc.get("function", {})
+                    function_name = function_data.get("name") or ""
+                    arguments_raw = function_data.get("arguments") or "{}"
                         
-                        # Parse the function arguments
-                        parsed_args: Dict[str, Any] = {}
-                        parsing_error = None
-                        try:
-                            parsed_args = json.loads(arguments_raw)
-                        except json.JSONDecodeError as e:
-                            parsing_error = f"Failed to parse function arguments: {str(e)}"
-                            logger.error(f"{log_prefix} {parsing_error}")
+                    # Parse the function arguments
+                    parsed_args: Dict[str, Any] = {}
+                    parsing_error = None
+                    try:
+                        parsed_args = json.loads(arguments_raw)
+                    except json.JSONDecodeError as e:
+                        parsing_error = f"Failed to parse function arguments: {str(e)}"
+                        logger.error(f"{log_prefix} {parsing_error}")
                         
-                        tool_calls_made.append(ParsedOpenAIToolCall(
-                            tool_call_id=tc.get("id", ""),
-                            function_name=function_name,
-                            function_arguments_raw=arguments_raw,
-                            function_arguments_parsed=parsed_args,
-                            parsing_error=parsing_error
-                        ))
+                    tool_calls_made.append(ParsedOpenAIToolCall(
+                        tool_call_id=tc.get("id", ""),
+                        function_name=function_name,
+                        function_arguments_raw=arguments_raw,
+                        function_arguments_parsed=parsed_args,
+                        parsing_error=parsing_error
+                    ))
             
-            # Create the raw response object
-            raw_response = RawOpenAIChatCompletionResponse(
-                text=content,
-                tool_calls=message.get("tool_calls"),
-                usage_metadata=usage
-            )
+        # Create the raw response object
+        raw_response = RawOpenAIChatCompletionResponse(
+            text=content,
+            tool_calls=message.get("tool_calls"),
+            usage_metadata=usage
+        )
             
-            # Return the unified response
-            return UnifiedOpenAIResponse(
-                task_id=task_id,
-                model_id=model_id,
-                success=True,
-                direct_message_content=content,
-                tool_calls_made=tool_calls_made,
-                raw_response=raw_response,
-                usage=usage
-            )
+        # Return the unified response
+        return UnifiedOpenAIResponse(
+            task_id=task_id,
+            model_id=model_id,
+            success=True,
+            direct_message_content=content,
+            tool_calls_made=tool_calls_made,
+            raw_response=raw_response,
+            usage=usage
+        )
             
     except httpx.HTTPStatusError as e:
         error_msg = f"HTTP error {e.response.status_code}: {e.response.text}"
@@ -335,191 +341,191 @@ async def _stream_together_response(
     tool_calls_buffer: Dict[Any, Dict[str, Any]] = {}
     
     try:
-        async with httpx.AsyncClient() as client:
-            async with client.stream(
-                "POST",
-                TOGETHER_API_URL,
-                json=payload,
-                headers=headers,
-                timeout=DEFAULT_TIMEOUT
-            ) as response:
-                # Check for HTTP errors before reading stream
-                if response.status_code >= 400:
-                    # Read error response body
-                    error_body = b""
-                    try:
-                        async for chunk in response.aiter_bytes():
-                            error_body += chunk
-                            if len(error_body) > 10000:  # Limit error body size
-                                break
-                    except Exception as e:
-                        logger.warning(f"{log_prefix} Error reading error response body: {e}")
+        client = get_http_client(HTTP_UPSTREAM)
+        async with client.stream(
+            "POST",
+            TOGETHER_API_URL,
+            json=payload,
+            headers=headers,
+            timeout=DEFAULT_TIMEOUT
+        ) as response:
+            # Check for HTTP errors before reading stream
+            if response.status_code >= 400:
+                # Read error response body
+                error_body = b""
+                try:
+                    async for chunk in response.aiter_bytes():
+                        error_body += chunk
+                        if len(error_body) > 10000:  # Limit error body size
+                            break
+                except Exception as e:
+                    logger.warning(f"{log_prefix} Error reading error response body: {e}")
                     
-                    # Try to parse error JSON
-                    error_msg = f"HTTP {response.status_code}"
-                    error_text = ""
-                    try:
-                        error_text = error_body.decode('utf-8', errors='ignore').strip()
-                        if error_text:
-                            try:
-                                error_detail = json.loads(error_text)
-                                error_msg = error_detail.get('error', {}).get('message', error_detail.get('message', error_msg))
-                            except json.JSONDecodeError:
-                                error_msg = f"HTTP {response.status_code}: provider returned non-JSON error body"
-                    except UnicodeDecodeError:
-                        error_msg = f"HTTP {response.status_code}: provider returned non-UTF8 error body"
+                # Try to parse error JSON
+                error_msg = f"HTTP {response.status_code}"
+                error_text = ""
+                try:
+                    error_text = error_body.decode('utf-8', errors='ignore').strip()
+                    if error_text:
+                        try:
+                            error_detail = json.loads(error_text)
+                            error_msg = error_detail.get('error', {}).get('message', error_detail.get('message', error_msg))
+                        except json.JSONDecodeError:
+                            error_msg = f"HTTP {response.status_code}: provider returned non-JSON error body"
+                except UnicodeDecodeError:
+                    error_msg = f"HTTP {response.status_code}: provider returned non-UTF8 error body"
                     
-                    # Log the full error details
-                    logger.error(f"{log_prefix} Together AI API error: {error_msg}")
-                    logger.error(
-                        f"{log_prefix} Error response metadata: "
-                        f"body_length={len(error_text) if error_text else len(error_body)}"
-                    )
-                    logger.debug(
-                        f"{log_prefix} Request payload summary on error: "
-                        f"model={payload.get('model')}, "
-                        f"messages_count={len(payload.get('messages', [])) if isinstance(payload.get('messages'), list) else 0}, "
-                        f"tools_count={len(payload.get('tools', [])) if isinstance(payload.get('tools'), list) else 0}, "
-                        f"stream={payload.get('stream')}"
-                    )
-                    raise ValueError(f"HTTP error {response.status_code}: {error_msg}")
+                # Log the full error details
+                logger.error(f"{log_prefix} Together AI API error: {error_msg}")
+                logger.error(
+                    f"{log_prefix} Error response metadata: "
+                    f"body_length={len(error_text) if error_text else len(error_body)}"
+                )
+                logger.debug(
+                    f"{log_prefix} Request payload summary on error: "
+                    f"model={payload.get('model')}, "
+                    f"messages_count={len(payload.get('messages', [])) if isinstance(payload.get('messages'), list) else 0}, "
+                    f"tools_count={len(payload.get('tools', [])) if isinstance(payload.get('tools'), list) else 0}, "
+                    f"stream={payload.get('stream')}"
+                )
+                raise ValueError(f"HTTP error {response.status_code}: {error_msg}")
                 
-                # Stream successful response
-                async for line in response.aiter_lines():
-                    # Skip empty lines
-                    if not line.strip():
-                        continue
+            # Stream successful response
+            async for line in response.aiter_lines():
+                # Skip empty lines
+                if not line.strip():
+                    continue
                     
-                    # Skip SSE comment lines (keep-alive heartbeats)
-                    if line.startswith(":"):
-                        continue
+                # Skip SSE comment lines (keep-alive heartbeats)
+                if line.startswith(":"):
+                    continue
                     
-                    # Handle SSE data lines
-                    if line.startswith("data: "):
-                        line = line[6:]  # Remove "data: " prefix
-                    else:
-                        # Skip lines that don't follow SSE format
-                        continue
+                # Handle SSE data lines
+                if line.startswith("data: "):
+                    line = line[6:]  # Remove "data: " prefix
+                else:
+                    # Skip lines that don't follow SSE format
+                    continue
                     
-                    # Check for stream termination
-                    if line.strip() == "[DONE]":
-                        break
+                # Check for stream termination
+                if line.strip() == "[DONE]":
+                    break
                     
-                    try:
-                        chunk = json.loads(line)
+                try:
+                    chunk = json.loads(line)
                         
-                        # Update usage if present - process BEFORE the choices check because
-                        # some providers (e.g. Together AI for Kimi K2.6) send usage data in
-                        # chunks with empty choices, or in the final chunk without choices.
-                        try:
-                            usage_chunk = chunk.get("usage")
-                            if usage_chunk is not None and isinstance(usage_chunk, dict):
-                                cumulative_usage["input_tokens"] = usage_chunk.get("prompt_tokens", cumulative_usage["input_tokens"])
-                                cumulative_usage["output_tokens"] = usage_chunk.get("completion_tokens", cumulative_usage["output_tokens"])
-                                cumulative_usage["total_tokens"] = usage_chunk.get("total_tokens", cumulative_usage["total_tokens"])
+                    # Update usage if present - process BEFORE the choices check because
+                    # some providers (e.g. Together AI for Kimi K2.6) send usage data in
+                    # chunks with empty choices, or in the final chunk without choices.
+                    try:
+                        usage_chunk = chunk.get("usage")
+                        if usage_chunk is not None and isinstance(usage_chunk, dict):
+                            cumulative_usage["input_tokens"] = usage_chunk.get("prompt_tokens", cumulative_usage["input_tokens"])
+                            cumulative_usage["output_tokens"] = usage_chunk.get("completion_tokens", cumulative_usage["output_tokens"])
+                            cumulative_usage["total_tokens"] = usage_chunk.get("total_tokens", cumulative_usage["total_tokens"])
                                 
-                                # Calculate token breakdown from input messages (estimate)
-                                input_messages = payload.get("messages", [])
-                                breakdown = calculate_token_breakdown(input_messages, model_id, tools=payload.get("tools"))
-                                cumulative_usage["user_input_tokens"] = breakdown.get("user_input_tokens")  # type: ignore[assignment]
-                                cumulative_usage["system_prompt_tokens"] = breakdown.get("system_prompt_tokens")  # type: ignore[assignment]
-                        except Exception as usage_err:
-                            # Never crash the stream over usage parsing - log and continue
-                            logger.warning(f"{log_prefix} Failed to parse usage data from chunk: {usage_err}. Raw usage value: {chunk.get('usage')!r}")
+                            # Calculate token breakdown from input messages (estimate)
+                            input_messages = payload.get("messages", [])
+                            breakdown = calculate_token_breakdown(input_messages, model_id, tools=payload.get("tools"))
+                            cumulative_usage["user_input_tokens"] = breakdown.get("user_input_tokens")  # type: ignore[assignment]
+                            cumulative_usage["system_prompt_tokens"] = breakdown.get("system_prompt_tokens")  # type: ignore[assignment]
+                    except Exception as usage_err:
+                        # Never crash the stream over usage parsing - log and continue
+                        logger.warning(f"{log_prefix} Failed to parse usage data from chunk: {usage_err}. Raw usage value: {chunk.get('usage')!r}")
                         
-                        # Extract content from the chunk
-                        choices = chunk.get("choices", [])
-                        if not choices:
-                            continue
+                    # Extract content from the chunk
+                    choices = chunk.get("choices", [])
+                    if not choices:
+                        continue
                         
-                        choice = choices[0]
-                        delta = choice.get("delta", {})
+                    choice = choices[0]
+                    delta = choice.get("delta", {})
                         
-                        # Handle content chunks
-                        if "content" in delta and delta["content"]:
-                            yield delta["content"]
+                    # Handle content chunks
+                    if "content" in delta and delta["content"]:
+                        yield delta["content"]
                         
-                        # Handle tool calls - accumulate them in the buffer
-                        if "tool_calls" in delta:
-                            for tc_delta in delta["tool_calls"]:
-                                tc_id = tc_delta.get("id", "")
-                                tc_index = tc_delta.get("index", 0)
+                    # Handle tool calls - accumulate them in the buffer
+                    if "tool_calls" in delta:
+                        for tc_delta in delta["tool_calls"]:
+                            tc_id = tc_delta.get("id", "")
+                            tc_index = tc_delta.get("index", 0)
                                 
-                                # Use index as key since id is only in first chunk
-                                buffer_key = tc_index
+                            # Use index as key since id is only in first chunk
+                            buffer_key = tc_index
                                 
-                                # Initialize or update the tool call in the buffer
-                                if buffer_key not in tool_calls_buffer:
-                                    tool_calls_buffer[buffer_key] = {
-                                        "id": tc_id,
-                                        "type": "function",
-                                        "function": {"name": "", "arguments": ""}
-                                    }
-                                elif tc_id:
-                                    # Update id if present (first chunk)
-                                    tool_calls_buffer[buffer_key]["id"] = tc_id
+                            # Initialize or update the tool call in the buffer
+                            if buffer_key not in tool_calls_buffer:
+                                tool_calls_buffer[buffer_key] = {
+                                    "id": tc_id,
+                                    "type": "function",
+                                    "function": {"name": "", "arguments": ""}
+                                }
+                            elif tc_id:
+                                # Update id if present (first chunk)
+                                tool_calls_buffer[buffer_key]["id"] = tc_id
                                 
-                                # Update function name if present (guard against None)
-                                if "function" in tc_delta and "name" in tc_delta["function"] and tc_delta["function"]["name"]:
-                                    tool_calls_buffer[buffer_key]["function"]["name"] = tc_delta["function"]["name"]
+                            # Update function name if present (guard against None)
+                            if "function" in tc_delta and "name" in tc_delta["function"] and tc_delta["function"]["name"]:
+                                tool_calls_buffer[buffer_key]["function"]["name"] = tc_delta["function"]["name"]
                                 
-                                # Update function arguments if present (accumulate across chunks, guard against None)
-                                if "function" in tc_delta and "arguments" in tc_delta["function"] and tc_delta["function"]["arguments"]:
-                                    tool_calls_buffer[buffer_key]["function"]["arguments"] += tc_delta["function"]["arguments"]
+                            # Update function arguments if present (accumulate across chunks, guard against None)
+                            if "function" in tc_delta and "arguments" in tc_delta["function"] and tc_delta["function"]["arguments"]:
+                                tool_calls_buffer[buffer_key]["function"]["arguments"] += tc_delta["function"]["arguments"]
                         
-                        # Check for finish_reason and yield accumulated tool calls
-                        finish_reason = choice.get("finish_reason")
-                        if finish_reason in ("tool_calls", "tool_call") and tool_calls_buffer:
-                            # Yield all accumulated tool calls when finish_reason indicates tool_calls
-                            for buffer_key, tc in tool_calls_buffer.items():
-                                function_name = tc["function"]["name"] or ""
-                                arguments_raw = tc["function"]["arguments"] or ""
+                    # Check for finish_reason and yield accumulated tool calls
+                    finish_reason = choice.get("finish_reason")
+                    if finish_reason in ("tool_calls", "tool_call") and tool_calls_buffer:
+                        # Yield all accumulated tool calls when finish_reason indicates tool_calls
+                        for buffer_key, tc in tool_calls_buffer.items():
+                            function_name = tc["function"]["name"] or ""
+                            arguments_raw = tc["function"]["arguments"] or ""
                                 
-                                # Parse the function arguments
-                                parsed_args: Dict[str, Any] = {}
-                                parsing_error = None
-                                try:
-                                    parsed_args = json.loads(arguments_raw)
-                                except json.JSONDecodeError as e:
-                                    parsing_error = f"Failed to parse function arguments: {str(e)}"
-                                    logger.error(f"{log_prefix} {parsing_error}")
+                            # Parse the function arguments
+                            parsed_args: Dict[str, Any] = {}
+                            parsing_error = None
+                            try:
+                                parsed_args = json.loads(arguments_raw)
+                            except json.JSONDecodeError as e:
+                                parsing_error = f"Failed to parse function arguments: {str(e)}"
+                                logger.error(f"{log_prefix} {parsing_error}")
                                 
-                                yield ParsedOpenAIToolCall(
-                                    tool_call_id=tc["id"],
-                                    function_name=function_name,
-                                    function_arguments_raw=arguments_raw,
-                                    function_arguments_parsed=parsed_args,
-                                    parsing_error=parsing_error
-                                )
+                            yield ParsedOpenAIToolCall(
+                                tool_call_id=tc["id"],
+                                function_name=function_name,
+                                function_arguments_raw=arguments_raw,
+                                function_arguments_parsed=parsed_args,
+                                parsing_error=parsing_error
+                            )
                             
-                            # Clear the buffer after yielding
-                            tool_calls_buffer.clear()
+                        # Clear the buffer after yielding
+                        tool_calls_buffer.clear()
 
-                        # Detect truncation or content filtering
-                        if finish_reason == "length":
-                            logger.warning(f"{log_prefix} Response truncated: finish_reason='length' (max_tokens reached)")
-                            yield "\n\n---\n*This response was cut short because it reached the model's maximum output length. You can ask the AI to continue.*"
-                        elif finish_reason == "content_filter":
-                            logger.warning(f"{log_prefix} Response blocked: finish_reason='content_filter'")
-                            yield "\n\n---\n*This response was blocked by the model's content filter. Try rephrasing your request or using a different model.*"
+                    # Detect truncation or content filtering
+                    if finish_reason == "length":
+                        logger.warning(f"{log_prefix} Response truncated: finish_reason='length' (max_tokens reached)")
+                        yield "\n\n---\n*This response was cut short because it reached the model's maximum output length. You can ask the AI to continue.*"
+                    elif finish_reason == "content_filter":
+                        logger.warning(f"{log_prefix} Response blocked: finish_reason='content_filter'")
+                        yield "\n\n---\n*This response was blocked by the model's content filter. Try rephrasing your request or using a different model.*"
 
-                    except json.JSONDecodeError as e:
-                        logger.warning(
-                            f"{log_prefix} Failed to parse SSE chunk as JSON: {str(e)} "
-                            f"(line_length={len(line)})"
-                        )
-                        continue
+                except json.JSONDecodeError as e:
+                    logger.warning(
+                        f"{log_prefix} Failed to parse SSE chunk as JSON: {str(e)} "
+                        f"(line_length={len(line)})"
+                    )
+                    continue
                 
-                # Yield final usage information
-                yield OpenAIUsageMetadata(
-                    input_tokens=cumulative_usage["input_tokens"],
-                    output_tokens=cumulative_usage["output_tokens"],
-                    total_tokens=cumulative_usage["total_tokens"],
-                    user_input_tokens=cumulative_usage.get("user_input_tokens"),  # type: ignore[arg-type]
-                    system_prompt_tokens=cumulative_usage.get("system_prompt_tokens")  # type: ignore[arg-type]
-                )
+            # Yield final usage information
+            yield OpenAIUsageMetadata(
+                input_tokens=cumulative_usage["input_tokens"],
+                output_tokens=cumulative_usage["output_tokens"],
+                total_tokens=cumulative_usage["total_tokens"],
+                user_input_tokens=cumulative_usage.get("user_input_tokens"),  # type: ignore[arg-type]
+                system_prompt_tokens=cumulative_usage.get("system_prompt_tokens")  # type: ignore[arg-type]
+            )
                 
-                logger.info(f"{log_prefix} Stream completed")
+            logger.info(f"{log_prefix} Stream completed")
                 
     except httpx.HTTPStatusError as e:
         error_msg = f"HTTP {e.response.status_code}"
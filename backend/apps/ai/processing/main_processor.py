@@ -50,6 +50,7 @@ from backend.apps.ai.llm_providers.openai_shared import ParsedOpenAIToolCall, Op
 from backend.apps.ai.llm_providers.types import UnifiedStreamChunk, StreamChunkType
 from backend.shared.python_schemas.app_metadata_schemas import AppYAML, AppSkillDefinition
 from backend.shared.providers.wikipedia.wikipedia_api import normalize_wikipedia_language
+from backend.shared.python_utils.http_clients import INTERNAL_API_UPSTREAM, get_http_client
 from backend.core.api.app.utils.secrets_manager import SecretsManager
 from backend.core.api.app.utils.config_manager import config_manager
 from backend.core.api.app.utils.text_sanitization import sanitize_text_payload_for_ascii_smuggling
@@ -89,6 +90,7 @@ from backend.apps.ai.processing.skill_executor import (
     generate_skill_task_id,
     DEFAULT_SKILL_TIMEOUT
 )
+from backend.apps.ai.processing.task_cancellation import is_ai_task_cancelled
 # Import billing utilities
 from backend.shared.python_utils.billing_utils import calculate_total_credits, MINIMUM_CREDITS_CHARGED
 
@@ -1010,20 +1012,20 @@ async def _make_internal_api_request(
     
     url = f"{INTERNAL_API_BASE_URL.rstrip('/')}/{endpoint.lstrip('/')}"
     
-    async with httpx.AsyncClient(timeout=INTERNAL_API_TIMEOUT) as client:
-        try:
-            response = await client.request(method, url, json=payload, params=params, headers=headers)
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPStatusError as e:
-            logger.error(f"Internal API HTTP error for {method} {endpoint}: {e.response.status_code} - {e.response.text}")
-            raise
-        except httpx.RequestError as e:
-            logger.error(f"Internal API request error for {method} {endpoint}: {e}")
-            raise
-        except Exception as e:
-            logger.error(f"Unexpected error in internal API request for {method} {endpoint}: {e}", exc_info=True)
-            raise
+    client = get_http_client(INTERNAL_API_UPSTREAM)
+    try:
+        response = await client.request(method, url, json=payload, params=params, headers=headers)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as e:
+        logger.error(f"Internal API HTTP error for {method} {endpoint}: {e.response.status_code} - {e.response.text}")
+        raise
+    except httpx.RequestError as e:
+        logger.error(f"Internal API request error for {method} {endpoint}: {e}")
+        raise
+    except Exception as e:
+        logger.error(f"Unexpected error in internal API request for {method} {endpoint}: {e}", exc_info=True)
+        raise
 
 
 async def _publish_skill_status(
@@ -1500,31 +1502,31 @@ async def _charge_skill_credits(
         if INTERNAL_API_SHARED_TOKEN:
             headers["X-Internal-Service-Token"] = INTERNAL_API_SHARED_TOKEN
         
-        async with httpx.AsyncClient() as client:
-            url = f"{INTERNAL_API_BASE_URL}/internal/billing/charge"
-            for i in range(units_processed):
-                # Add any remainder credits to the last request
-                request_credits = per_request_credits + (credits_remainder if i == units_processed - 1 else 0)
-                if request_credits <= 0:
-                    continue
+        client = get_http_client(INTERNAL_API_UPSTREAM)
+        url = f"{INTERNAL_API_BASE_URL}/internal/billing/charge"
+        for i in range(units_processed):
+            # Add any remainder credits to the last request
+            request_credits = per_request_credits + (credits_remainder if i == units_processed - 1 else 0)
+            if request_credits <= 0:
+                continue
                 
-                # Each individual request gets units_processed=1 to reflect one request
-                request_usage_details = {**usage_details, "units_processed": 1}
+            # Each individual request gets units_processed=1 to reflect one request
+            request_usage_details = {**usage_details, "units_processed": 1}
                 
-                charge_payload = {
-                    "user_id": request_data.user_id,
-                    "user_id_hash": request_data.user_id_hash,
-                    "credits": request_credits,
-                    "skill_id": skill_id,  # Required: ID of the skill that was executed
-                    "app_id": app_id,  # Required: ID of the app that contains the skill
-                    "usage_details": request_usage_details  # Contains chat_id, message_id, and other optional metadata
-                }
-                logger.info(f"{log_prefix} Charging {request_credits} credits for skill '{app_id}.{skill_id}' (request {i + 1}/{units_processed}).")
-                response = await client.post(url, json=charge_payload, headers=headers, timeout=10.0)
-                response.raise_for_status()
-                logger.debug(f"{log_prefix} Charged request {i + 1}/{units_processed} for '{app_id}.{skill_id}': {response.json()}")
+            charge_payload = {
+                "user_id": request_data.user_id,
+                "user_id_hash": request_data.user_id_hash,
+                "credits": request_credits,
+                "skill_id": skill_id,  # Required: ID of the skill that was executed
+                "app_id": app_id,  # Required: ID of the app that contains the skill
+                "usage_details": request_usage_details  # Contains chat_id, message_id, and other optional metadata
+            }
+            logger.info(f"{log_prefix} Charging {request_credits} credits for skill '{app_id}.{skill_id}' (request {i + 1}/{units_processed}).")
+            response = await client.post(url, json=charge_payload, headers=headers, timeout=10.0)
+            response.raise_for_status()
+            logger.debug(f"{log_prefix} Charged request {i + 1}/{units_processed} for '{app_id}.{skill_id}': {response.json()}")
             
-            logger.info(f"{log_prefix} Successfully charged {credits_charged} total credits for skill '{app_id}.{skill_id}' across {units_processed} request(s).")
+        logger.info(f"{log_prefix} Successfully charged {credits_charged} total credits for skill '{app_id}.{skill_id}' across {units_processed} request(s).")
             
     except httpx.HTTPStatusError as e:
         logger.error(f"{log_prefix} HTTP error charging credits for skill '{app_id}.{skill_id}': {e.response.status_code} - {e.response.text}", exc_info=True)
@@ -2976,6 +2978,12 @@ async def handle_main_processing(
     completed_skill_calls: Dict[str, Dict[str, Any]] = {}
     
     for iteration in range(MAX_TOOL_CALL_ITERATIONS):
+        # Stop before starting another LLM call if the whole task was cancelled by the user.
+        # The stream consumer notices the same in-process event and finalizes the partial response.
+        if is_ai_task_cancelled(task_id):
+            logger.info(f"{log_prefix} Task cancelled by user. Skipping LLM call iteration {iteration + 1}.")
+            break
+
         logger.info(f"{log_prefix} LLM call iteration {iteration + 1}/{MAX_TOOL_CALL_ITERATIONS}, total_skill_calls={total_skill_calls}")
         
         # === LAST ITERATION SAFETY CHECK ===
@@ -4858,6 +4866,10 @@ async def handle_main_processing(
                     # On timeout, the request is cancelled and retried with a fresh connection,
                     # which helps when external APIs are slow or proxy IPs need rotation
                     try:
+                        # Whole-task cancellation skips the remaining skills the same way as
+                        # cancelling an individual skill (cancelled embed status + cancelled result).
+                        if is_ai_task_cancelled(task_id):
+                            raise SkillCancelledException(skill_task_id, app_id, skill_id)
                         results = await execute_skill_with_multiple_requests(
                             app_id=app_id,
                             skill_id=skill_id,
@@ -6165,7 +6177,6 @@ async def handle_main_processing(
                     try:
                         client = await cache_service.client
                         if client:
-                            import json as json_lib
                             channel_key = f"websocket:user:{request_data.user_id_hash}"
                             
                             for embed_data in updated_embed_data_list:
@@ -6195,7 +6206,8 @@ async def handle_main_processing(
                                     "child_embed_ids": embed_data.get("child_embed_ids", [])
                                 }
 
-                                await client.publish(channel_key, json_lib.dumps(embed_update_payload))
+                                # publish_event targets only the API nodes holding this user's connections
+                                await cache_service.publish_event(channel_key, embed_update_payload)
                                 logger.debug(f"{log_prefix} Published embed_update event for embed {embed_id}")
                         else:
                             logger.warning(f"{log_prefix} Redis client not available, skipping embed_update events")
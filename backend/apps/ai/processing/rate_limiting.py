@@ -3,11 +3,39 @@
 # Rate limiting helpers for provider API rate limit enforcement.
 # Implements rate limiting using Dragonfly cache with plan-specific configurations
 # loaded from provider YAML files.
+#
+# Limits are token buckets kept in Dragonfly (one hash per bucket, refilled by
+# _TAKE_TOKENS_LUA from the elapsed time, so there is no window edge to burst
+# across). Each worker process leases a few tokens per round trip and spends them
+# locally, so at high rates only about one call in LEASE_FRACTION * rate pays the
+# network hop. Leased tokens not spent within LEASE_TTL_SECONDS are handed back
+# on the next lease. When the bucket is empty the script returns the exact time
+# until the next token, and the process answers further checks locally until then.
+#
+# Provider YAML (per plan):
+#   rate_limits:
+#     pro:
+#       requests_per_second: 50   # refill rate
+#       burst: 50                 # bucket capacity (default: requests_per_second, at least 1)
+#       models:                   # optional per-model buckets, replacing the provider bucket
+#         some-model-id:
+#           requests_per_second: 5
+#
+# Buckets are per provider (the API key's limit is shared by all skills) or per
+# provider + model when the model has its own entry. The script also counts
+# leases, granted tokens and throttled checks per bucket in RATE_LIMIT_STATS_KEY,
+# exposed via get_rate_limit_metrics() (admin debug endpoint /rate-limits).
+#
+# Callers limiting a service without a provider YAML (e.g. SightEngine page checks
+# in PDF processing) pass the limits directly to wait_for_bucket(); the bucket is
+# still shared by every worker using the same name.
 
 import logging
 import os
+import threading
 import time
 import asyncio
+from dataclasses import dataclass
 from typing import Dict, Any, Optional, Tuple
 
 from backend.core.api.app.utils.config_manager import ConfigManager
@@ -16,7 +44,55 @@ from backend.core.api.app.services.cache import CacheService
 logger = logging.getLogger(__name__)
 
 # Export exception for use by callers
-__all__ = ["check_rate_limit", "wait_for_rate_limit", "RateLimitScheduledException"]
+__all__ = [
+    "check_rate_limit",
+    "wait_for_rate_limit",
+    "get_rate_limit_metrics",
+    "RateLimitScheduledException",
+]
+
+RATE_LIMIT_BUCKET_KEY_PREFIX = "rate_limit:bucket:"
+RATE_LIMIT_STATS_KEY = "rate_limit:stats"
+
+# Tokens leased per round trip: this fraction of one second's refill, at least 1
+LEASE_FRACTION = 0.1
+LEASE_MAX_TOKENS = 20
+# Leased tokens older than this go back to the bucket instead of being spent
+LEASE_TTL_SECONDS = 0.5
+
+# KEYS: bucket hash, stats hash
+# ARGV: rate (tokens/s), burst, tokens requested, now (unix seconds),
+#       unused leased tokens returned, bucket name (stats field prefix)
+# Returns {tokens granted, ms until the next token (0 if granted)}
+_TAKE_TOKENS_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = burst
+    ts = now
+end
+if now > ts then
+    tokens = tokens + (now - ts) * rate
+    ts = now
+end
+tokens = math.min(burst, tokens + tonumber(ARGV[5]))
+local granted = math.min(requested, math.floor(tokens))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', string.format('%.6f', tokens), 'ts', string.format('%.6f', ts))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+redis.call('HINCRBY', KEYS[2], ARGV[6] .. '|leases', 1)
+if granted > 0 then
+    redis.call('HINCRBY', KEYS[2], ARGV[6] .. '|granted', granted)
+    return {granted, 0}
+end
+redis.call('HINCRBY', KEYS[2], ARGV[6] .. '|throttled', 1)
+return {0, math.ceil((1 - tokens) / rate * 1000)}
+"""
 
 
 def _get_provider_rate_limit(provider_id: str) -> Optional[Dict[str, Any]]:
@@ -89,6 +165,130 @@ def _get_provider_rate_limit(provider_id: str) -> Optional[Dict[str, Any]]:
         return None
 
 
+@dataclass(frozen=True)
+class _Bucket:
+    name: str
+    rate: float
+    burst: float
+
+    @property
+    def lease_size(self) -> int:
+        return max(1, min(LEASE_MAX_TOKENS, int(self.burst), int(self.rate * LEASE_FRACTION)))
+
+
+class _Lease:
+    """Tokens this process has taken from one bucket but not spent yet, plus local counters."""
+
+    def __init__(self) -> None:
+        self.tokens = 0
+        self.leased_at = 0.0
+        self.unused = 0  # expired tokens to hand back on the next lease
+        self.empty_until = 0.0  # bucket known to be empty until then (monotonic)
+        self.allowed = 0
+        self.throttled = 0
+        self.round_trips = 0
+
+    def take(self, now: float) -> bool:
+        if self.tokens and now - self.leased_at > LEASE_TTL_SECONDS:
+            self.unused += self.tokens
+            self.tokens = 0
+        if not self.tokens:
+            return False
+        self.tokens -= 1
+        return True
+
+
+# Per bucket name; shared by all event loops and threads of the process
+_leases: Dict[str, _Lease] = {}
+_leases_lock = threading.Lock()
+
+
+def _get_bucket(provider_id: str, model_id: Optional[str], rate_limit_config: Dict[str, Any]) -> Optional[_Bucket]:
+    """Token bucket for a request, or None when the provider (or model) is unlimited."""
+    name = provider_id
+    limits = rate_limit_config
+    model_limits = (rate_limit_config.get("models") or {}).get(model_id) if model_id else None
+    if isinstance(model_limits, dict):
+        name = f"{provider_id}:{model_id}"
+        limits = model_limits
+
+    rate = limits.get("requests_per_second")
+    if rate is None or rate <= 0:
+        return None
+    burst = float(limits.get("burst") or max(1.0, float(rate)))
+    if burst < 1:
+        # A bucket that never holds a whole token would throttle every request forever
+        logger.warning(f"Rate limit burst {burst:g} for '{name}' is below 1; using 1")
+        burst = 1.0
+    return _Bucket(name=name, rate=float(rate), burst=burst)
+
+
+def _lease_for(bucket_name: str) -> _Lease:
+    with _leases_lock:
+        lease = _leases.get(bucket_name)
+        if lease is None:
+            lease = _leases[bucket_name] = _Lease()
+        return lease
+
+
+async def _take_token(bucket: _Bucket, cache_service: Optional[CacheService]) -> Tuple[bool, Optional[float]]:
+    """Take one token from a bucket (leased or from Dragonfly); returns (is_allowed, retry_after_seconds)."""
+    # Spend a leased token, or answer locally while the bucket is known to be empty
+    lease = _lease_for(bucket.name)
+    with _leases_lock:
+        now = time.monotonic()
+        if lease.take(now):
+            lease.allowed += 1
+            return (True, None)
+        if now < lease.empty_until:
+            lease.throttled += 1
+            return (False, lease.empty_until - now)
+        returned, lease.unused = lease.unused, 0
+
+    # Initialize cache service if not provided
+    if cache_service is None:
+        cache_service = CacheService()
+
+    client = await cache_service.client
+    if not client:
+        logger.warning("Cache client not available for rate limit check, allowing request")
+        return (True, None)
+
+    try:
+        granted, wait_ms = await client.eval(
+            _TAKE_TOKENS_LUA,
+            2,
+            f"{RATE_LIMIT_BUCKET_KEY_PREFIX}{bucket.name}",
+            RATE_LIMIT_STATS_KEY,
+            bucket.rate,
+            bucket.burst,
+            bucket.lease_size,
+            f"{time.time():.6f}",
+            returned,
+            bucket.name,
+        )
+    except BaseException:
+        with _leases_lock:
+            lease.unused += returned
+        raise
+    granted, wait_ms = int(granted), int(wait_ms)
+
+    with _leases_lock:
+        now = time.monotonic()
+        lease.round_trips += 1
+        if granted:
+            # Spend one token now and keep the rest for the next checks
+            lease.tokens += granted - 1
+            lease.leased_at = now
+            lease.allowed += 1
+            return (True, None)
+        retry_after = max(wait_ms / 1000.0, 0.001)
+        lease.empty_until = now + retry_after
+        lease.throttled += 1
+
+    return (False, retry_after)
+
+
 async def check_rate_limit(
     provider_id: str,
     skill_id: str,
@@ -97,25 +297,26 @@ async def check_rate_limit(
 ) -> Tuple[bool, Optional[float]]:
     """
     Check if a provider API rate limit allows a request.
-    
-    Rate limits are tracked per provider, per skill, and per model (when applicable)
-    using Dragonfly cache-based counters that auto-expire after the rate limit reset time.
-    
-    Uses a sliding window approach with 1-second granularity:
-    - Tracks requests per second using cache keys with 1-second TTL
-    - Checks against rate limits from provider YAML configuration
+
+    Takes one token from the provider's (or model's) token bucket: from this
+    process's leased tokens when it has any, otherwise by leasing a small batch
+    from the bucket in Dragonfly (see the module header).
+
+    - Refill rate and burst come from the provider YAML configuration
     - Loads plan-specific rate limits based on environment variable (e.g., BRAVE_SEARCH_PLAN)
-    
+    - Fails open when no limit is configured or the cache is unavailable
+
     Args:
         provider_id: The provider ID (e.g., "brave", "openai")
-        skill_id: The skill ID (e.g., "search", "generate")
+        skill_id: The skill ID (e.g., "search", "generate"). Only used for logging:
+            a provider's limit is shared by all of its skills.
         model_id: Optional model ID for model-specific rate limits
         cache_service: Optional CacheService instance (creates new one if not provided)
-    
+
     Returns:
         Tuple of (is_allowed, retry_after_seconds)
         - is_allowed: True if request can proceed, False if rate limited
-        - retry_after_seconds: Seconds to wait before retry (None if allowed)
+        - retry_after_seconds: Seconds until the next token (None if allowed)
     """
     try:
         # Get rate limit configuration from provider YAML
@@ -124,67 +325,68 @@ async def check_rate_limit(
             # If no rate limit config found, allow the request
             logger.warning(f"No rate limit configuration found for provider '{provider_id}', allowing request")
             return (True, None)
-        
-        requests_per_second = rate_limit_config.get("requests_per_second")
-        if requests_per_second is None:
+
+        bucket = _get_bucket(provider_id, model_id, rate_limit_config)
+        if bucket is None:
             # Unlimited rate limit
             logger.debug(f"Provider '{provider_id}' has unlimited rate limit (requests_per_second is None)")
             return (True, None)
-        
-        # Initialize cache service if not provided
-        if cache_service is None:
-            cache_service = CacheService()
-        
-        # Create cache key for this provider/skill/model combination
-        # Key format: rate_limit:{provider_id}:{skill_id}:{model_id}:{timestamp}
-        # Timestamp is current second (Unix timestamp truncated to seconds)
-        current_second = int(time.time())
-        
-        if model_id:
-            cache_key = f"rate_limit:{provider_id}:{skill_id}:{model_id}:{current_second}"
-        else:
-            cache_key = f"rate_limit:{provider_id}:{skill_id}:{current_second}"
-        
-        # Get current count for this second
-        client = await cache_service.client
-        if not client:
-            logger.warning("Cache client not available for rate limit check, allowing request")
+
+        is_allowed, retry_after = await _take_token(bucket, cache_service)
+        if is_allowed:
             return (True, None)
-        
-        # Increment counter and get new value
-        # INCR creates the key with value 1 if it doesn't exist
-        current_count = await client.incr(cache_key)
-        
-        # Set TTL to 2 seconds (current second + 1 second buffer)
-        # This ensures the key exists for the full second window
-        await client.expire(cache_key, 2)
-        
-        # Check if we've exceeded the rate limit
-        if current_count > requests_per_second:
-            # Calculate retry time (wait until next second)
-            retry_after = 1.0 - (time.time() - current_second)
-            if retry_after < 0:
-                retry_after = 0.1  # Minimum 100ms wait
-            
-            logger.debug(
-                f"Rate limit exceeded for provider '{provider_id}', skill '{skill_id}': "
-                f"{current_count}/{requests_per_second} requests in current second. "
-                f"Retry after {retry_after:.2f}s"
-            )
-            return (False, retry_after)
-        
+
         logger.debug(
-            f"Rate limit check passed for provider '{provider_id}', skill '{skill_id}': "
-            f"{current_count}/{requests_per_second} requests in current second"
+            f"Rate limit exceeded for provider '{provider_id}', skill '{skill_id}' "
+            f"(bucket '{bucket.name}', {bucket.rate:g}/s, burst {bucket.burst:g}). "
+            f"Retry after {retry_after:.3f}s"
         )
-        return (True, None)
-        
+        return (False, retry_after)
+
     except Exception as e:
         logger.error(f"Error checking rate limit for provider '{provider_id}', skill '{skill_id}': {e}", exc_info=True)
         # On error, allow the request (fail open) but log the error
         return (True, None)
 
 
+def rate_limit_stats() -> Dict[str, Dict[str, int]]:
+    """This process's allowed/throttled checks, Dragonfly round trips and unspent leased tokens per bucket."""
+    with _leases_lock:
+        return {
+            bucket_name: {
+                "allowed": lease.allowed,
+                "throttled": lease.throttled,
+                "round_trips": lease.round_trips,
+                "leased_tokens": lease.tokens,
+            }
+            for bucket_name, lease in _leases.items()
+        }
+
+
+async def get_rate_limit_metrics(cache_service: Optional[CacheService] = None) -> Dict[str, Any]:
+    """
+    Throttling metrics per bucket: totals across all workers (counted by the Lua
+    script in Dragonfly) and this process's local counters.
+
+    Returns:
+        {"buckets": {bucket: {"leases", "granted", "throttled", "throttle_ratio"}},
+         "process": rate_limit_stats()}
+    """
+    if cache_service is None:
+        cache_service = CacheService()
+    buckets: Dict[str, Dict[str, Any]] = {}
+    client = await cache_service.client
+    if client:
+        raw = await client.hgetall(RATE_LIMIT_STATS_KEY) or {}
+        for field, value in raw.items():
+            field = field.decode("utf-8") if isinstance(field, bytes) else str(field)
+            bucket_name, _, counter = field.rpartition("|")
+            buckets.setdefault(bucket_name, {"leases": 0, "granted": 0, "throttled": 0})[counter] = int(value)
+    for counters in buckets.values():
+        counters["throttle_ratio"] = round(counters["throttled"] / counters["leases"], 4) if counters["leases"] else 0.0
+    return {"buckets": buckets, "process": rate_limit_stats()}
+
+
 async def wait_for_rate_limit(
     provider_id: str,
     skill_id: str,
@@ -317,6 +519,38 @@ async def wait_for_rate_limit(
         await asyncio.sleep(retry_after)
 
 
+async def wait_for_bucket(
+    bucket_name: str,
+    requests_per_second: float,
+    burst: Optional[float] = None,
+    cache_service: Optional[CacheService] = None,
+) -> None:
+    """
+    Wait for a token from a bucket whose limits are given by the caller.
+
+    Same Dragonfly token bucket and leases as check_rate_limit(), for services
+    that have no provider YAML. Fails open when the cache is unavailable.
+
+    Args:
+        bucket_name: Bucket name, shared by every process using it (e.g. "sightengine")
+        requests_per_second: Refill rate
+        burst: Bucket capacity (default: requests_per_second, at least 1)
+        cache_service: Optional CacheService instance (creates new one if not provided)
+    """
+    bucket = _get_bucket(bucket_name, None, {"requests_per_second": requests_per_second, "burst": burst})
+    if bucket is None:
+        return
+    while True:
+        try:
+            is_allowed, retry_after = await _take_token(bucket, cache_service)
+        except Exception as e:
+            logger.error(f"Error checking rate limit bucket '{bucket_name}': {e}", exc_info=True)
+            return
+        if is_allowed:
+            return
+        await asyncio.sleep(retry_after)
+
+
 class RateLimitScheduledException(Exception):
     """
     Exception raised when a rate-limited request is scheduled via Celery.
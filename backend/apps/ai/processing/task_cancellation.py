@@ -0,0 +1,253 @@
+# backend/apps/ai/processing/task_cancellation.py
+#
+# Push-based cancellation signal for running AI ask tasks.
+#
+# The streaming loop used to call `celery_app.AsyncResult(task_id).state` for
+# every chunk to detect a user-initiated stop. That is a synchronous round trip
+# to the Celery result backend executed on the event loop, once per token batch.
+#
+# Now the WebSocket cancel handler (cancel_ai_task_handler.py) additionally
+# writes a short-lived Redis marker and publishes on a per-task channel:
+#
+#   cancelled_ai_task:{task_id}   marker (TTL), survives a missed publish
+#   ai_task_cancel::{task_id}     pub/sub notification, delivered immediately
+#
+# The worker registers an `AITaskCancellation` token for the task. One pattern
+# subscription per event loop (shared by every token running on it, so a worker
+# loop with hundreds of concurrent ask tasks holds a single pub/sub connection)
+# sets the token's asyncio.Event when the notification arrives; a slow fallback
+# poll (marker + Celery state, off-loop) covers messages published before the
+# subscription was active and revocations issued outside the cancel handler.
+# Hot paths call `is_ai_task_cancelled(task_id)`, which is a dict lookup plus
+# `Event.is_set()` and never touches the network.
+
+import asyncio
+import logging
+import weakref
+from typing import Any, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Redis key prefix for the cancellation marker of an AI task
+CANCELLED_AI_TASK_KEY_PREFIX = "cancelled_ai_task:"
+# Pub/sub channel prefix used to push the cancellation to the worker
+AI_TASK_CANCEL_CHANNEL_PREFIX = "ai_task_cancel::"
+# TTL for cancellation markers (1 hour - ask tasks are hard-limited well below this)
+CANCELLED_AI_TASK_TTL = 3600
+# Fallback poll interval for the marker and the Celery task state (seconds)
+CANCELLATION_FALLBACK_POLL_INTERVAL = 2.0
+
+# task_id -> token for tasks running in this process
+_active_cancellations: Dict[str, "AITaskCancellation"] = {}
+# event loop -> the pub/sub listener shared by the tokens running on it
+_listeners: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _CancellationListener]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _cancel_key(task_id: str) -> str:
+    return f"{CANCELLED_AI_TASK_KEY_PREFIX}{task_id}"
+
+
+def _cancel_channel(task_id: str) -> str:
+    return f"{AI_TASK_CANCEL_CHANNEL_PREFIX}{task_id}"
+
+
+def celery_task_revoked(task_id: str) -> bool:
+    """
+    Legacy check against the Celery result backend. Blocking network call —
+    only used off the hot path (fallback poll, tasks without a token).
+    """
+    from celery.states import REVOKED as TASK_STATE_REVOKED
+    from backend.core.api.app.tasks import celery_config
+
+    return celery_config.app.AsyncResult(task_id).state == TASK_STATE_REVOKED
+
+
+async def signal_ai_task_cancellation(cache_service: Any, task_id: str) -> bool:
+    """
+    Mark an AI task as cancelled and notify the worker that runs it.
+
+    Args:
+        cache_service: The cache service for Redis operations
+        task_id: The Celery task ID of the ask task
+
+    Returns:
+        True if the marker was written, False otherwise
+    """
+    if not cache_service or not task_id:
+        logger.warning("Cannot signal AI task cancellation: missing cache_service or task_id")
+        return False
+
+    try:
+        client = await cache_service.client
+        if not client:
+            logger.error("[TaskCancellation] Redis client not available")
+            return False
+        # Marker first, so a watcher that subscribes after the publish still finds it.
+        await client.setex(_cancel_key(task_id), CANCELLED_AI_TASK_TTL, "cancelled")
+        await cache_service.publish_event(_cancel_channel(task_id), {"task_id": task_id})
+        logger.info(f"[TaskCancellation] Signalled cancellation for task_id {task_id}")
+        return True
+    except Exception as e:
+        logger.error(f"[TaskCancellation] Error signalling cancellation for task {task_id}: {e}", exc_info=True)
+        return False
+
+
+class _CancellationListener:
+    """
+    Subscription to `ai_task_cancel::*` for all tokens of one event loop. Started
+    by the first token that registers and stopped when the last one leaves.
+    """
+
+    def __init__(self, cache_service: Any):
+        self.tokens: Set["AITaskCancellation"] = set()
+        self.task = asyncio.create_task(self._listen(cache_service))
+
+    async def _listen(self, cache_service: Any) -> None:
+        async for message in cache_service.subscribe_to_channel(f"{AI_TASK_CANCEL_CHANNEL_PREFIX}*"):
+            data = message.get("data")
+            task_id = data.get("task_id") if isinstance(data, dict) else None
+            if task_id is None:
+                task_id = str(message.get("channel") or "")[len(AI_TASK_CANCEL_CHANNEL_PREFIX):]
+            token = _active_cancellations.get(task_id)
+            if token is not None and token in self.tokens:
+                token.cancel("pubsub")
+
+    @classmethod
+    def join(cls, token: "AITaskCancellation") -> None:
+        loop = asyncio.get_running_loop()
+        listener = _listeners.get(loop)
+        if listener is None or listener.task.done():
+            listener = _listeners[loop] = cls(token.cache_service)
+        listener.tokens.add(token)
+
+    @staticmethod
+    async def leave(token: "AITaskCancellation") -> None:
+        loop = asyncio.get_running_loop()
+        listener = _listeners.get(loop)
+        if listener is None or token not in listener.tokens:
+            return
+        listener.tokens.discard(token)
+        if not listener.tokens:
+            del _listeners[loop]
+            listener.task.cancel()
+            await asyncio.gather(listener.task, return_exceptions=True)
+
+
+class AITaskCancellation:
+    """
+    In-process cancellation token for one AI task.
+
+    `start()` registers the token and launches the watcher, `stop()` tears it
+    down. The token can also be used as an async context manager.
+    """
+
+    def __init__(
+        self,
+        task_id: str,
+        cache_service: Any = None,
+        poll_interval: float = CANCELLATION_FALLBACK_POLL_INTERVAL,
+        revoked_check: Optional[Callable[[str], bool]] = celery_task_revoked,
+    ):
+        self.task_id = task_id
+        self.cache_service = cache_service
+        self.poll_interval = poll_interval
+        self.revoked_check = revoked_check
+        self.event = asyncio.Event()
+        self.reason: Optional[str] = None
+        self._watchers: list[asyncio.Task] = []
+
+    def is_cancelled(self) -> bool:
+        return self.event.is_set()
+
+    def cancel(self, reason: str = "local") -> None:
+        if not self.event.is_set():
+            self.reason = reason
+            self.event.set()
+            logger.info(f"[TaskCancellation] Task {self.task_id} cancelled (via {reason})")
+
+    async def _marker_present(self) -> bool:
+        client = await self.cache_service.client
+        if not client:
+            return False
+        return bool(await client.get(_cancel_key(self.task_id)))
+
+    async def _poll(self) -> None:
+        while not self.event.is_set():
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if self.cache_service and await self._marker_present():
+                    self.cancel("marker")
+                elif self.revoked_check and await asyncio.to_thread(self.revoked_check, self.task_id):
+                    self.cancel("celery_state")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug(f"[TaskCancellation] Fallback poll failed for task {self.task_id}: {e}")
+
+    async def start(self) -> "AITaskCancellation":
+        _active_cancellations[self.task_id] = self
+        if self.cache_service:
+            try:
+                # The task may have been cancelled while it was still queued.
+                if await self._marker_present():
+                    self.cancel("marker")
+                    return self
+            except Exception as e:
+                logger.warning(f"[TaskCancellation] Initial marker check failed for task {self.task_id}: {e}")
+            _CancellationListener.join(self)
+        self._watchers.append(asyncio.create_task(self._poll()))
+        return self
+
+    async def stop(self) -> None:
+        if _active_cancellations.get(self.task_id) is self:
+            del _active_cancellations[self.task_id]
+        await _CancellationListener.leave(self)
+        watchers, self._watchers = self._watchers, []
+        for watcher in watchers:
+            watcher.cancel()
+        if watchers:
+            await asyncio.gather(*watchers, return_exceptions=True)
+
+    async def __aenter__(self) -> "AITaskCancellation":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.stop()
+
+
+async def watch_ai_task_cancellation(task_id: str, cache_service: Any) -> AITaskCancellation:
+    """Register and start the cancellation token for a task running in this process."""
+    existing = _active_cancellations.get(task_id)
+    if existing is not None:
+        return existing
+    return await AITaskCancellation(task_id, cache_service).start()
+
+
+async def release_ai_task_cancellation(task_id: str) -> None:
+    """Stop the watcher for a task and drop its token. No-op if none is registered."""
+    token = _active_cancellations.get(task_id)
+    if token is not None:
+        await token.stop()
+
+
+def get_ai_task_cancellation(task_id: str) -> Optional[AITaskCancellation]:
+    return _active_cancellations.get(task_id)
+
+
+def is_ai_task_cancelled(task_id: str) -> bool:
+    """
+    Zero-cost cancellation check for hot paths (per stream chunk, per skill call).
+
+    Falls back to the Celery result backend only when no token is registered for
+    the task in this process (e.g. code paths invoked outside the ask task).
+    """
+    token = _active_cancellations.get(task_id)
+    if token is not None:
+        return token.event.is_set()
+    try:
+        return celery_task_revoked(task_id)
+    except Exception as e:
+        logger.debug(f"[TaskCancellation] Celery state check failed for task {task_id}: {e}")
+        return False
@@ -18,13 +18,14 @@ import uuid
 from typing import Dict, Any, List, Optional
 from pydantic import ValidationError
 from celery.exceptions import Ignore, SoftTimeLimitExceeded
-from celery.states import REVOKED as TASK_STATE_REVOKED # Module-level import
 
 # Import Celery app instance
 from backend.core.api.app.tasks import celery_config
+from backend.core.api.app.tasks.worker_event_loop import get_worker_event_loop
 
 # Import services to be instantiated directly in the task
 from backend.core.api.app.services.cache import CacheService
+from backend.core.api.app.services.cache_pool import close_shared_cache_pools
 from backend.core.api.app.services.directus import DirectusService # Assuming this is the correct path
 from backend.core.api.app.services.skill_registry import build_skill_registry
 from backend.core.api.app.utils.encryption import EncryptionService
@@ -33,12 +34,18 @@ from backend.core.api.app.utils.log_sanitization import sanitize_request_data_fo
 
 from backend.apps.ai.skills.ask_skill import AskSkillRequest
 from backend.shared.python_schemas.app_metadata_schemas import AppYAML
+from backend.shared.python_utils.http_clients import close_http_clients
 from backend.apps.ai.skills.ask_skill import AskSkillDefaultConfig
 from backend.apps.ai.utils.instruction_loader import load_base_instructions
 from backend.apps.ai.utils.mate_utils import load_mates_config, MateConfig
 from backend.apps.ai.utils.model_selector import DEFAULT_FALLBACK_MODEL
 from backend.apps.ai.processing.preprocessor import handle_preprocessing, PreprocessingResult
 from backend.apps.ai.processing.plan_focus_routing import route_plan_focus
+from backend.apps.ai.processing.task_cancellation import (
+    is_ai_task_cancelled,
+    release_ai_task_cancellation,
+    watch_ai_task_cancellation,
+)
 from backend.apps.ai.processing.postprocessor import (
     handle_postprocessing,
     PostProcessingResult,
@@ -534,6 +541,11 @@ async def _async_process_ai_skill_ask_task(
         )
         logger.info(f"[Task ID: {task_id}] DirectusService initialized.")
 
+        # Push-based cancellation: the cancel handler publishes to this task's channel and the
+        # watcher sets an in-process event that the stream consumer checks per chunk.
+        # Released in the sync wrapper's finally block.
+        await watch_ai_task_cancellation(task_id, cache_service_instance)
+
         await _update_user_task_execution_state(
             request_data,
             directus_service_instance,
@@ -1780,7 +1792,7 @@ async def _async_process_ai_skill_ask_task(
         except Exception as e:
             # Check for revocation if an unexpected error occurs
             # Use .state == 'REVOKED' for checking revocation status
-            if celery_config.app.AsyncResult(task_id).state == TASK_STATE_REVOKED:
+            if is_ai_task_cancelled(task_id):
                 logger.warning(f"[Task ID: {task_id}] Task revoked during or after main processing stream execution.")
                 task_was_revoked = True # Set overall flag
             else:
@@ -2344,15 +2356,26 @@ def process_ai_skill_ask_task(self, request_data_dict: dict, skill_config_dict:
     # Focus mode continuation now creates its own assistant message (this task_id).
     # Client merges "focus activation" + "continuation" into one bubble for display.
 
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
+    # Thread-pool workers run the coroutines on the process's persistent event loop
+    # (many asks concurrently, sharing its HTTP clients and cache pool); prefork
+    # workers keep one loop per task. See core/api/app/tasks/worker_event_loop.py.
+    worker_loop = get_worker_event_loop()
+    if worker_loop is not None:
+        loop = None
+
+        def run_async(coro):
+            return worker_loop.run(coro, soft_time_limit=self.soft_time_limit, time_limit=self.time_limit)
+    else:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        run_async = loop.run_until_complete
+
     task_result_dict: Optional[Dict[str, Any]] = None
     try:
         # Update progress before calling async helper
         self.update_state(state='PROGRESS', meta={'step': 'preprocessing', 'status': 'started'})
 
-        task_result_dict = loop.run_until_complete(
+        task_result_dict = run_async(
             _async_process_ai_skill_ask_task(task_id, request_data, skill_config) # 'self' is not passed
         )
         
@@ -2413,11 +2436,11 @@ def process_ai_skill_ask_task(self, request_data_dict: dict, skill_config_dict:
     except SoftTimeLimitExceeded:
         logger.warning(f"[Task ID: {task_id}] Soft time limit exceeded in synchronous task wrapper.")
         # Check if the task was revoked (user-initiated cancellation) to use appropriate embed status
-        was_revoked = self.request.id and celery_config.app.AsyncResult(self.request.id).state == TASK_STATE_REVOKED
+        was_revoked = self.request.id and is_ai_task_cancelled(self.request.id)
         # CRITICAL: Clean up active_ai_task marker and processing embeds before failing
         # This ensures the typing indicator stops and embeds don't get stuck in "processing" state
         try:
-            loop.run_until_complete(_cleanup_on_task_failure(
+            run_async(_cleanup_on_task_failure(
                 task_id=task_id,
                 chat_id=request_data.chat_id,
                 message_id=request_data.message_id,
@@ -2430,7 +2453,7 @@ def process_ai_skill_ask_task(self, request_data_dict: dict, skill_config_dict:
         except Exception as cleanup_err:
             logger.error(f"[Task ID: {task_id}] Error cleaning up after soft time limit: {cleanup_err}")
         try:
-            loop.run_until_complete(_update_user_task_execution_state_with_new_directus(
+            run_async(_update_user_task_execution_state_with_new_directus(
                 request_data,
                 ai_execution_state="failed",
                 status="blocked",
@@ -2449,11 +2472,11 @@ def process_ai_skill_ask_task(self, request_data_dict: dict, skill_config_dict:
     except RuntimeError as e: 
         logger.error(f"[Task ID: {task_id}] Runtime error from async task execution: {e}", exc_info=True)
         # Check if the task was revoked (user-initiated cancellation) to use appropriate embed status
-        was_revoked = self.request.id and celery_config.app.AsyncResult(self.request.id).state == TASK_STATE_REVOKED
+        was_revoked = self.request.id and is_ai_task_cancelled(self.request.id)
         # CRITICAL: Clean up active_ai_task marker and processing embeds before failing
         # This ensures the typing indicator stops and embeds don't get stuck in "processing" state
         try:
-            loop.run_until_complete(_cleanup_on_task_failure(
+            run_async(_cleanup_on_task_failure(
                 task_id=task_id,
                 chat_id=request_data.chat_id,
                 message_id=request_data.message_id,
@@ -2466,7 +2489,7 @@ def process_ai_skill_ask_task(self, request_data_dict: dict, skill_config_dict:
         except Exception as cleanup_err:
             logger.error(f"[Task ID: {task_id}] Error cleaning up after RuntimeError: {cleanup_err}")
         try:
-            loop.run_until_complete(_update_user_task_execution_state_with_new_directus(
+            run_async(_update_user_task_execution_state_with_new_directus(
                 request_data,
                 ai_execution_state="failed",
                 status="blocked",
@@ -2484,11 +2507,11 @@ def process_ai_skill_ask_task(self, request_data_dict: dict, skill_config_dict:
     except Exception as e:
         logger.error(f"[Task ID: {task_id}] Unhandled exception in synchronous task wrapper: {e}", exc_info=True)
         # Check if the task was revoked (user-initiated cancellation) to use appropriate embed status
-        was_revoked = self.request.id and celery_config.app.AsyncResult(self.request.id).state == TASK_STATE_REVOKED
+        was_revoked = self.request.id and is_ai_task_cancelled(self.request.id)
         # CRITICAL: Clean up active_ai_task marker and processing embeds before failing
         # This ensures the typing indicator stops and embeds don't get stuck in "processing" state
         try:
-            loop.run_until_complete(_cleanup_on_task_failure(
+            run_async(_cleanup_on_task_failure(
                 task_id=task_id,
                 chat_id=request_data.chat_id,
                 message_id=request_data.message_id,
@@ -2501,7 +2524,7 @@ def process_ai_skill_ask_task(self, request_data_dict: dict, skill_config_dict:
         except Exception as cleanup_err:
             logger.error(f"[Task ID: {task_id}] Error cleaning up after exception: {cleanup_err}")
         try:
-            loop.run_until_complete(_update_user_task_execution_state_with_new_directus(
+            run_async(_update_user_task_execution_state_with_new_directus(
                 request_data,
                 ai_execution_state="failed",
                 status="blocked",
@@ -2517,6 +2540,18 @@ def process_ai_skill_ask_task(self, request_data_dict: dict, skill_config_dict:
             })
         raise Ignore()
     finally:
+        try:
+            run_async(release_ai_task_cancellation(task_id))
+        except Exception as release_err:
+            logger.warning(f"[Task ID: {task_id}] Error stopping cancellation watcher: {release_err}")
+        # Close this loop's shared HTTP clients and cache pool before the loop goes away.
+        # The persistent worker loop keeps them for the next task.
+        if loop is not None:
+            try:
+                loop.run_until_complete(close_http_clients())
+                loop.run_until_complete(close_shared_cache_pools())
+            except Exception as close_err:
+                logger.warning(f"[Task ID: {task_id}] Error closing shared connection pools: {close_err}")
         # Clean up live mock context vars (no-op if not activated)
         if os.getenv("MOCK_EXTERNAL_APIS") == "true":
             try:
@@ -2524,5 +2559,6 @@ def process_ai_skill_ask_task(self, request_data_dict: dict, skill_config_dict:
                 deactivate_mock_mode()
             except ImportError:
                 pass
-        loop.close()
-        logger.info(f"[Task ID: {task_id}] Async event loop closed.")
+        if loop is not None:
+            loop.close()
+            logger.info(f"[Task ID: {task_id}] Async event loop closed.")
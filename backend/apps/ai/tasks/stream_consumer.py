@@ -6,14 +6,13 @@ import hashlib
 import re
 import time
 import json
-import httpx
 import asyncio
 from typing import Dict, Any, List, Optional, AsyncIterator, Union
 
 from celery.exceptions import SoftTimeLimitExceeded
-from celery.states import REVOKED as TASK_STATE_REVOKED
 
 from backend.core.api.app.tasks import celery_config
+from backend.core.api.app.tasks.worker_event_loop import consume_soft_time_limit_cancellation
 from backend.core.api.app.services.cache import CacheService
 from backend.core.api.app.services.directus import DirectusService
 from backend.core.api.app.utils.encryption import EncryptionService
@@ -26,6 +25,8 @@ from backend.core.api.app.schemas.chat import AIHistoryMessage
 from backend.shared.python_schemas.app_metadata_schemas import AppYAML
 from backend.apps.ai.utils.mate_utils import MateConfig
 from backend.apps.ai.processing.main_processor import handle_main_processing, INTERNAL_API_BASE_URL, INTERNAL_API_SHARED_TOKEN
+from backend.shared.python_utils.http_clients import INTERNAL_API_UPSTREAM, get_http_client
+from backend.apps.ai.processing.task_cancellation import is_ai_task_cancelled
 from backend.apps.ai.sub_chat_orchestration import build_sequential_child_prompt, dispatch_sub_chat_task
 from backend.core.api.app.utils.override_parser import UserOverrides
 from backend.apps.ai.utils.llm_utils import log_main_llm_stream_aggregated_output, STANDARDIZED_USER_ERROR_MESSAGE
@@ -65,6 +66,7 @@ from backend.shared.python_utils.url_normalizer import (
     sanitize_text_urls_with_safeguard,
 )
 from backend.shared.python_utils.markdown_links import iter_markdown_links
+from backend.shared.python_utils.stream_delta import StreamDeltaEncoder
 from backend.shared.python_utils.learning_mode import (
     LEARNING_MODE_CODE_MAX_LINES,
     LEARNING_MODE_DOCUMENT_MAX_LINES,
@@ -1174,23 +1176,21 @@ async def _verify_and_strip_bad_quotes(
 
     # For each parent embed_id, load its child embeds and extract embed_ref
     from backend.core.api.app.services.embed_service import EmbedService
+    from backend.core.api.app.services.embed_content_cache import EmbedContentCache
     embed_service = EmbedService(
         cache_service=cache_service,
         directus_service=directus_service,
         encryption_service=encryption_service
     )
+    # Each embed is decrypted and decoded once here and reused for every quote below
+    content_cache = EmbedContentCache()
 
     for parent_id in all_embed_ids:
         try:
             # Load parent embed to get child_embed_ids
-            parent_toon = await embed_service._get_cached_embed_toon(
-                parent_id, user_vault_key_id, log_prefix
+            parent_decoded = await content_cache.get_decoded(
+                embed_service, parent_id, user_vault_key_id, log_prefix
             )
-            if not parent_toon:
-                continue
-
-            from toon_format import decode
-            parent_decoded = decode(parent_toon)
             if not isinstance(parent_decoded, dict):
                 continue
 
@@ -1210,12 +1210,9 @@ async def _verify_and_strip_bad_quotes(
             # Load each child embed to get its embed_ref
             for child_id in child_ids:
                 try:
-                    child_toon = await embed_service._get_cached_embed_toon(
-                        child_id, user_vault_key_id, log_prefix
+                    child_decoded = await content_cache.get_decoded(
+                        embed_service, child_id, user_vault_key_id, log_prefix
                     )
-                    if not child_toon:
-                        continue
-                    child_decoded = decode(child_toon)
                     if isinstance(child_decoded, dict):
                         child_ref = child_decoded.get("embed_ref")
                         if child_ref:
@@ -1264,7 +1261,8 @@ async def _verify_and_strip_bad_quotes(
                 embed_id=embed_id,
                 quoted_text=quoted_text,
                 user_vault_key_id=user_vault_key_id,
-                log_prefix=log_prefix
+                log_prefix=log_prefix,
+                content_cache=content_cache,
             )
             if is_valid:
                 logger.debug(
@@ -1712,7 +1710,7 @@ def _fix_backticked_inline_embed_references(aggregated_response: str, log_prefix
 def _create_redis_payload(
     task_id: str,
     request_data: AskSkillRequest,
-    content: str,
+    content: Optional[str],
     sequence: int,
     is_final: bool = False,
     interrupted_soft: bool = False,
@@ -1725,8 +1723,18 @@ def _create_redis_payload(
     total_credits: Optional[int] = None,
     category: Optional[str] = None,
     rejection_reason: Optional[str] = None,
+    delta_encoder: Optional[StreamDeltaEncoder] = None,
+    appended: Optional[str] = None,
 ) -> Dict[str, Any]:
-    """Create standardized Redis payload for streaming chunks."""
+    """
+    Create standardized Redis payload for streaming chunks.
+
+    When a `delta_encoder` is passed, pure appends are sent as delta frames
+    (only the new text plus offsets) instead of resending `full_content_so_far`.
+    Passing `appended` (the text added since the previous frame) lets the encoder
+    frame it without the full content; `content` may then be None.
+    See backend/shared/python_utils/stream_delta.py for the wire format.
+    """
     payload = {
         "type": "ai_message_chunk",
         "task_id": task_id,
@@ -1768,6 +1776,12 @@ def _create_redis_payload(
             "interrupted_by_soft_limit": interrupted_soft,
             "interrupted_by_revocation": interrupted_revoke
         })
+
+    if delta_encoder is not None:
+        if appended is not None:
+            delta_encoder.append(payload, appended)
+        else:
+            delta_encoder.encode(payload, content)
     
     return payload
 
@@ -1893,23 +1907,23 @@ async def _charge_credits(
         headers["X-Internal-Service-Token"] = INTERNAL_API_SHARED_TOKEN
     
     try:
-        async with httpx.AsyncClient() as client:
-            url = f"{INTERNAL_API_BASE_URL}/internal/billing/charge"
-            logger.info(
-                f"{log_prefix} Charging {credits} credits. "
-                f"Payload summary: keys={sorted(charge_payload.keys())}, "
-                f"usage_detail_keys={sorted(usage_details.keys()) if isinstance(usage_details, dict) else []}"
-            )
-            response = await client.post(url, json=charge_payload, headers=headers)
-            response.raise_for_status()
-            logger.info(f"{log_prefix} Successfully charged {credits} credits.")
-            logger.debug(f"{log_prefix} Charge response: {response.json()}")
+        client = get_http_client(INTERNAL_API_UPSTREAM)
+        url = f"{INTERNAL_API_BASE_URL}/internal/billing/charge"
+        logger.info(
+            f"{log_prefix} Charging {credits} credits. "
+            f"Payload summary: keys={sorted(charge_payload.keys())}, "
+            f"usage_detail_keys={sorted(usage_details.keys()) if isinstance(usage_details, dict) else []}"
+        )
+        response = await client.post(url, json=charge_payload, headers=headers)
+        response.raise_for_status()
+        logger.info(f"{log_prefix} Successfully charged {credits} credits.")
+        logger.debug(f"{log_prefix} Charge response: {response.json()}")
             
-            return {
-                "prompt_tokens": usage_details.get("input_tokens", 0),
-                "completion_tokens": usage_details.get("output_tokens", 0),
-                "total_credits": credits
-            }
+        return {
+            "prompt_tokens": usage_details.get("input_tokens", 0),
+            "completion_tokens": usage_details.get("output_tokens", 0),
+            "total_credits": credits
+        }
     except Exception as e:
         logger.error(f"{log_prefix} Error charging credits: {e}", exc_info=True)
         raise
@@ -2136,7 +2150,8 @@ async def _save_to_cache_and_publish(
         try:
             encrypted_content_for_cache, _ = await encryption_service.encrypt_with_user_key(
                 content_markdown, 
-                user_vault_key_id
+                user_vault_key_id,
+                envelope=True,
             )
             logger.debug(f"{log_prefix} Encrypted AI response content for cache using user vault key: {user_vault_key_id}")
         except Exception as e_encrypt:
@@ -2414,7 +2429,7 @@ async def _generate_fake_stream_for_harmful_content(
     model_name = None
     
     # Check for revocation
-    if celery_config.app.AsyncResult(task_id).state == TASK_STATE_REVOKED:
+    if is_ai_task_cancelled(task_id):
         logger.warning(f"{log_prefix} Task was revoked before starting fake stream.")
         return "", True, False, [], None
     
@@ -2519,7 +2534,7 @@ async def _generate_fake_stream_for_simple_message(
     model_name = None
     
     # Check for revocation
-    if celery_config.app.AsyncResult(task_id).state == TASK_STATE_REVOKED:
+    if is_ai_task_cancelled(task_id):
         logger.warning(f"{log_prefix} Task was revoked before starting fake stream.")
         return "", True, False, [], None
 
@@ -2964,6 +2979,114 @@ def _is_inside_open_interactive_question(text: str) -> bool:
     return in_question
 
 
+class _StreamedResponse:
+    """Incremental view over the response chunks collected while streaming.
+
+    The consumer used to join every chunk collected so far on each new chunk (to
+    publish it and to check the code fence context), which made a long response
+    quadratic. This tracks what was published, the running length and the open
+    interactive question state as chunks are appended, and only looks at a bounded
+    tail for the fence checks.
+    """
+
+    TAIL_MAX_CHARS = 1024
+    LINE_MARKER_MAX_CHARS = 256
+    # Line boundaries as recognised by str.splitlines()
+    _LINE_BREAKS = "\r\n\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+
+    def __init__(self, chunks: List[str]) -> None:
+        self._chunks = chunks
+        self._published = 0
+        self._scanned = 0
+        self._length = 0
+        # Current (unterminated) line, bounded: only its fence marker matters
+        self._line = ""
+        self._line_truncated = False
+        self._in_question = False
+        self._malformed_question = False
+
+    @property
+    def length(self) -> int:
+        self._catch_up()
+        return self._length
+
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def take_unpublished(self) -> str:
+        """Return the text appended since the previous call and mark it published."""
+        unpublished = "".join(self._chunks[self._published:])
+        self._published = len(self._chunks)
+        return unpublished
+
+    def tail(self) -> str:
+        """Return the last line of the response so far (at most TAIL_MAX_CHARS of it)."""
+        parts: List[str] = []
+        size = 0
+        for chunk in reversed(self._chunks):
+            newline_idx = chunk.rfind("\n")
+            if newline_idx >= 0:
+                parts.append(chunk[newline_idx:])
+                break
+            parts.append(chunk)
+            size += len(chunk)
+            if size >= self.TAIL_MAX_CHARS:
+                break
+        return "".join(reversed(parts))
+
+    def inside_open_interactive_question(self) -> bool:
+        """Same answer as _is_inside_open_interactive_question(self.text())."""
+        self._catch_up()
+        if self._malformed_question:
+            return True
+        in_question = self._in_question
+        marker = self._line_marker()
+        if marker:
+            if not in_question and marker == "```interactive_question":
+                return True
+            if in_question:
+                if marker == "```":
+                    return False
+                if marker.startswith("```"):
+                    return True
+        return in_question
+
+    def _catch_up(self) -> None:
+        while self._scanned < len(self._chunks):
+            chunk = self._chunks[self._scanned]
+            self._scanned += 1
+            self._length += len(chunk)
+            for line in chunk.splitlines(keepends=True):
+                content = line.rstrip(self._LINE_BREAKS)
+                self._extend_line(content)
+                if len(content) < len(line):
+                    self._end_line()
+
+    def _extend_line(self, content: str) -> None:
+        room = self.LINE_MARKER_MAX_CHARS - len(self._line)
+        if room > 0:
+            self._line += content[:room]
+        if content[max(room, 0):].strip():
+            self._line_truncated = True
+
+    def _line_marker(self) -> str:
+        marker = self._line.strip()
+        # A cut-off line can still start a fence but never equals a bare marker
+        return marker + "\x00" if self._line_truncated else marker
+
+    def _end_line(self) -> None:
+        marker = self._line_marker()
+        self._line = ""
+        self._line_truncated = False
+        if not self._in_question and marker == "```interactive_question":
+            self._in_question = True
+        elif self._in_question:
+            if marker == "```":
+                self._in_question = False
+            elif marker.startswith("```"):
+                self._malformed_question = True
+
+
 def _finalize_interactive_question_protocol(text: str) -> str:
     """Validate interactive question fences before durable message persistence.
 
@@ -3045,9 +3168,14 @@ def _should_process_chunk_as_code_block(
     chunk: str,
     aggregated_so_far: str,
     in_code_block: bool,
+    inside_open_interactive_question: Optional[bool] = None,
 ) -> bool:
     """Determine whether a streaming chunk should be treated as a code block opening.
 
+    `aggregated_so_far` only needs to cover the current line of the response when
+    `inside_open_interactive_question` is passed; otherwise it is derived from the
+    full text (see _StreamedResponse).
+
     Returns True only if:
     - We are not already inside a code block
     - The chunk starts with a code fence (```)
@@ -3060,7 +3188,9 @@ def _should_process_chunk_as_code_block(
     if in_code_block:
         return False
 
-    if _is_inside_open_interactive_question(aggregated_so_far):
+    if inside_open_interactive_question is None:
+        inside_open_interactive_question = _is_inside_open_interactive_question(aggregated_so_far)
+    if inside_open_interactive_question:
         return False
 
     if not chunk.strip().startswith("```"):
@@ -4022,7 +4152,12 @@ async def _consume_main_processing_stream(
     and optional debug metadata (system prompt, tools, message history) for debug caching.
     """
     final_response_chunks = []
+    # Only valid while streaming: final_response_chunks is rebound after the loop
+    streamed_response = _StreamedResponse(final_response_chunks)
     log_prefix = f"[Task ID: {task_id}, ChatID: {request_data.chat_id}] _consume_main_processing_stream:"
+    # Intermediate chunks go out as delta frames. External (REST API) requests read
+    # full_content_so_far straight from the Redis channel, so they keep full frames.
+    delta_encoder: Optional[StreamDeltaEncoder] = None if request_data.is_external else StreamDeltaEncoder()
     logger.info(f"{log_prefix} Starting to consume stream from main_processor.")
 
     standardized_error_message = STANDARDIZED_USER_ERROR_MESSAGE
@@ -4048,9 +4183,8 @@ async def _consume_main_processing_stream(
     # Their embed references will be stripped from the final message content before persistence
     failed_embed_ids: set[str] = set()
 
-    # Check for revocation before starting
-    # Use AsyncResult to check task status
-    if celery_config.app.AsyncResult(task_id).state == TASK_STATE_REVOKED:
+    # Check for revocation before starting (in-process event, see task_cancellation.py)
+    if is_ai_task_cancelled(task_id):
         logger.warning(f"{log_prefix} Task was revoked before starting main processing stream.")
         was_revoked_during_stream = True
         return "", was_revoked_during_stream, was_soft_limited_during_stream, [], None
@@ -4507,8 +4641,9 @@ async def _consume_main_processing_stream(
                 usage = chunk
                 continue
             
-            # Check for revocation BEFORE processing the chunk
-            if celery_config.app.AsyncResult(task_id).state == TASK_STATE_REVOKED:
+            # Check for revocation BEFORE processing the chunk.
+            # In-process event set by the cancellation watcher - no result-backend round trip per chunk.
+            if is_ai_task_cancelled(task_id):
                 logger.warning(f"{log_prefix} Task revoked during main processing stream. Including current chunk and finalizing partial response.")
                 was_revoked_during_stream = True
                 # Include the current chunk before breaking - don't discard it
@@ -4519,7 +4654,7 @@ async def _consume_main_processing_stream(
                     
                     # Publish the final chunk with revocation marker IMMEDIATELY
                     if cache_service:
-                        current_full_content = "".join(final_response_chunks)
+                        current_full_content = streamed_response.text()
                         payload = _create_redis_payload(
                             task_id, request_data, current_full_content, stream_chunk_count,
                             is_final=True, interrupted_revoke=True, model_name=stream_model_name
@@ -4594,9 +4729,10 @@ async def _consume_main_processing_stream(
                 # Uses extracted helper for testability (see _should_process_chunk_as_code_block).
                 # Checks: not already in code block, chunk starts with ```, not an embed reference,
                 # and not an inline fence preceded by prose text on the same line (fix for issue 6a948813).
-                aggregated_so_far = "".join(final_response_chunks)
+                aggregated_so_far = streamed_response.tail()
                 should_process_as_code_block = _should_process_chunk_as_code_block(
-                    chunk, aggregated_so_far, in_code_block
+                    chunk, aggregated_so_far, in_code_block,
+                    inside_open_interactive_question=streamed_response.inside_open_interactive_question(),
                 )
                 if not should_process_as_code_block and not in_code_block and chunk.strip().startswith("```"):
                     logger.info(
@@ -5776,11 +5912,14 @@ async def _consume_main_processing_stream(
                             final_response_chunks.append(chunk)
                             stream_chunk_count += 1
                             if cache_service:
-                                current_full_content = "".join(final_response_chunks)
                                 payload = _create_redis_payload(
-                                    task_id, request_data, current_full_content, stream_chunk_count,
+                                    task_id, request_data,
+                                    streamed_response.text() if delta_encoder is None else None,
+                                    stream_chunk_count,
                                     model_name=stream_model_name,
                                     category=preprocessing_result.category or "general_knowledge",
+                                    delta_encoder=delta_encoder,
+                                    appended=streamed_response.take_unpublished(),
                                 )
                                 log_message = f"Published chunk (seq: {stream_chunk_count}, type=interactive_fenced, chunk_len={len(chunk)}) to '{redis_channel_name}'"
                                 await _publish_to_redis(cache_service, redis_channel_name, payload, log_prefix, log_message)
@@ -7160,14 +7299,19 @@ async def _consume_main_processing_stream(
                 # CRITICAL: Publish chunk IMMEDIATELY without buffering
                 # This ensures paragraph-by-paragraph streaming and embed placeholders show up right away
                 if cache_service:
-                    current_full_content = "".join(final_response_chunks)
                     # Include category on every intermediate chunk so the frontend can assign the
                     # correct mate to the message immediately, regardless of whether ai_typing_started
                     # has been received yet (race condition fix for Bug #5dc543b0).
+                    # Delta frames only need the text appended since the last publish; external
+                    # requests get full frames (see delta_encoder above).
                     payload = _create_redis_payload(
-                        task_id, request_data, current_full_content, stream_chunk_count,
+                        task_id, request_data,
+                        streamed_response.text() if delta_encoder is None else None,
+                        stream_chunk_count,
                         model_name=stream_model_name,
                         category=preprocessing_result.category or "general_knowledge",
+                        delta_encoder=delta_encoder,
+                        appended=streamed_response.take_unpublished(),
                     )
                     
                     # CRITICAL: Always log chunk publishing for debugging (but less verbose)
@@ -7175,7 +7319,7 @@ async def _consume_main_processing_stream(
                     is_code_block = chunk.strip().startswith("```")
                     log_message = (
                         f"Published chunk (seq: {stream_chunk_count}, type={'code_block' if is_code_block else 'text'}, "
-                        f"chunk_len={len(chunk)}, total_length={len(current_full_content)}) to '{redis_channel_name}'"
+                        f"chunk_len={len(chunk)}, total_length={streamed_response.length}) to '{redis_channel_name}'"
                     )
                     
                     # CRITICAL: Use await to ensure publish completes before continuing
@@ -7209,14 +7353,27 @@ async def _consume_main_processing_stream(
             else:
                 # Non-string chunk (shouldn't happen, but handle gracefully)
                 logger.warning(f"{log_prefix} Received unexpected non-string chunk type: {type(chunk)}")
+
+        # main_processor stops its LLM/skill loop on cancellation without yielding anything,
+        # so the stream can end normally even though the task was cancelled.
+        if not was_revoked_during_stream and is_ai_task_cancelled(task_id):
+            logger.warning(f"{log_prefix} Task cancelled while main processing was between chunks. Finalizing partial response.")
+            was_revoked_during_stream = True
     except SoftTimeLimitExceeded:
         logger.warning(f"{log_prefix} Soft time limit exceeded during main processing stream. Processing partial response.")
         was_soft_limited_during_stream = True
+    except asyncio.CancelledError:
+        # Thread-pool workers enforce the soft limit by cancelling the task
+        # (worker_event_loop.py); finalize the same way as for SoftTimeLimitExceeded.
+        if not consume_soft_time_limit_cancellation():
+            raise
+        logger.warning(f"{log_prefix} Soft time limit exceeded during main processing stream (worker event loop). Processing partial response.")
+        was_soft_limited_during_stream = True
     except Exception as e:
         logger.error(f"{log_prefix} Exception during main processing stream consumption: {e}", exc_info=True)
         stream_exception = e
         # Check if revoked after an unexpected error
-        if celery_config.app.AsyncResult(task_id).state == TASK_STATE_REVOKED:
+        if is_ai_task_cancelled(task_id):
             was_revoked_during_stream = True
     
     # Finalize any open code/document block if stream was interrupted
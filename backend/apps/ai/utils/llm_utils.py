@@ -11,6 +11,7 @@ import os
 import importlib
 import inspect
 import asyncio
+import time
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -28,6 +29,11 @@ from backend.apps.ai.utils.timeout_utils import (
     get_first_chunk_timeout_seconds,
     get_inter_chunk_timeout_seconds,
 )
+from backend.apps.ai.utils.provider_routing import (
+    main_stream_health,
+    preprocessing_health,
+    race_first_chunk,
+)
 from backend.apps.ai.utils.preprocessing_history import (
     STANDARDIZED_USER_ERROR_MESSAGE,
     normalize_preprocessing_message_history,
@@ -1063,6 +1069,8 @@ async def call_preprocessing_llm(
     # Helper function to call a single provider
     async def _call_single_provider(provider_model_id: str, is_last_provider: bool = False) -> LLMPreprocessingCallResult:
         """Calls a single provider with the given model_id. Returns result with error if provider fails."""
+        # Live health is tracked per configured model id (before server resolution)
+        routing_key = provider_model_id
         provider_prefix = ""
         actual_model_id = provider_model_id
         
@@ -1103,6 +1111,14 @@ async def call_preprocessing_llm(
         # blocking user requests unconditionally causes worse outages than wasted
         # attempts. Main LLM path follows the same policy (see line ~1556).
         is_unhealthy = await _is_provider_unhealthy_preprocessing(provider_prefix)
+        if is_unhealthy and preprocessing_health.has_recent_success(provider_prefix):
+            # The cached status is a periodic synthetic probe; a real request that
+            # succeeded on this provider in the last couple of minutes overrides it.
+            logger.info(
+                f"[{task_id}] LLM Utils: Provider '{provider_prefix}' is marked unhealthy in cache, "
+                f"but served live traffic recently — attempting."
+            )
+            is_unhealthy = False
         if is_unhealthy and not is_last_provider:
             return LLMPreprocessingCallResult(error_message=f"Provider '{provider_prefix}' is marked as unhealthy in cache")
         if is_unhealthy and is_last_provider:
@@ -1128,6 +1144,7 @@ async def call_preprocessing_llm(
                 # Call the provider client dynamically - all have same signature
                 # Pass sanitized tool definition to ensure provider-agnostic behavior
                 # Wrap with timeout (5 seconds for preprocessing requests - should complete quickly)
+                started_at = time.monotonic()
                 try:
                     response = await asyncio.wait_for(
                         provider_client(
@@ -1141,9 +1158,23 @@ async def call_preprocessing_llm(
                         ),
                         timeout=PREPROCESSING_TIMEOUT_SECONDS  # Use 10 second timeout for preprocessing
                     )
-                    return handle_response(response, expected_tool_name)
+                    preprocessing_health.record_latency(routing_key, time.monotonic() - started_at)
+                    result = handle_response(response, expected_tool_name)
+                    # A wrong tool call is a model hallucination, not a provider health problem
+                    if not is_wrong_tool_error(result.error_message):
+                        preprocessing_health.record_outcome(
+                            routing_key,
+                            result.arguments is not None and not result.error_message,
+                            provider_prefix=provider_prefix,
+                        )
+                    return result
                 except asyncio.TimeoutError:
+                    preprocessing_health.record_outcome(routing_key, False)
                     return LLMPreprocessingCallResult(error_message=f"Request timeout after {PREPROCESSING_TIMEOUT_SECONDS}s")
+                except asyncio.CancelledError:
+                    # Lost a hedged race: the elapsed time is a lower bound on this provider's latency
+                    preprocessing_health.record_latency(routing_key, time.monotonic() - started_at)
+                    raise
             
             # No provider found
             err_msg_no_provider = (
@@ -1155,6 +1186,7 @@ async def call_preprocessing_llm(
         except Exception as e:
             # Catch any unexpected exceptions from provider calls
             logger.error(f"[{task_id}] LLM Utils: Exception calling provider {provider_model_id}: {e}", exc_info=True)
+            preprocessing_health.record_outcome(routing_key, False)
             return LLMPreprocessingCallResult(error_message=f"Exception calling provider {provider_model_id}: {str(e)}")
 
     # Determine if an error is retryable (should try fallback)
@@ -1232,11 +1264,74 @@ async def call_preprocessing_llm(
     providers_to_try = [model_id]
     if fallback_models:
         providers_to_try.extend(fallback_models)
+        # Providers failing on live traffic go last (see provider_routing.py)
+        providers_to_try = preprocessing_health.order_servers(providers_to_try)
 
     attempted_providers = []
     last_error = None
+    # Fallback providers already used as a hedge (they won or failed a hedged race)
+    consumed_by_hedge: set = set()
+
+    def _is_success(result: LLMPreprocessingCallResult) -> bool:
+        # result.arguments can be an empty dict {} which is falsy, so check None explicitly.
+        return result.arguments is not None and not result.error_message
+
+    async def _call_with_hedge(provider_idx: int, provider_model_id: str, is_last_provider: bool) -> LLMPreprocessingCallResult:
+        """
+        Calls a provider; if it is slower than its recent latency percentile, also calls the
+        next provider and returns whichever succeeds first (the other call is cancelled).
+        """
+        hedge_model_id = next(
+            (
+                candidate for candidate in providers_to_try[provider_idx + 1:]
+                if candidate not in consumed_by_hedge
+            ),
+            None,
+        )
+        hedge_delay = (
+            preprocessing_health.hedge_delay(provider_model_id, PREPROCESSING_TIMEOUT_SECONDS)
+            if hedge_model_id else None
+        )
+        if hedge_delay is None:
+            return await _call_single_provider(provider_model_id, is_last_provider=is_last_provider)
+
+        primary_task = asyncio.create_task(_call_single_provider(provider_model_id, is_last_provider=is_last_provider))
+        # Unfinished calls are cancelled on the way out, including when the caller is cancelled
+        pending = {primary_task}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+            if done:
+                return primary_task.result()
+
+            logger.info(
+                f"[{task_id}] LLM Utils: Provider {provider_model_id} has not answered after {hedge_delay:.2f}s. "
+                f"Hedging with {hedge_model_id}."
+            )
+            consumed_by_hedge.add(hedge_model_id)
+            attempted_providers.append(hedge_model_id)
+            hedge_task = asyncio.create_task(_call_single_provider(
+                hedge_model_id, is_last_provider=(hedge_model_id == providers_to_try[-1])
+            ))
+            pending = {primary_task, hedge_task}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if _is_success(task.result()):
+                        if task is hedge_task:
+                            logger.info(f"[{task_id}] LLM Utils: Hedge provider {hedge_model_id} answered first.")
+                        return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        # Neither succeeded: continue with the primary's error (the hedge is not retried)
+        return primary_task.result()
 
     for provider_idx, provider_model_id in enumerate(providers_to_try):
+        if provider_model_id in consumed_by_hedge:
+            logger.info(f"[{task_id}] LLM Utils: Skipping {provider_model_id}: already tried as a hedge.")
+            continue
         # Allow one same-provider retry for wrong-tool errors; infra errors go straight to fallback.
         WRONG_TOOL_SAME_PROVIDER_RETRIES = 1
         attempts_for_this_provider = WRONG_TOOL_SAME_PROVIDER_RETRIES + 1  # updated after first call
@@ -1251,11 +1346,13 @@ async def call_preprocessing_llm(
                 f"(attempt {len(attempted_providers)}/{len(providers_to_try) + WRONG_TOOL_SAME_PROVIDER_RETRIES})"
             )
 
-            result = await _call_single_provider(provider_model_id, is_last_provider=is_last_provider)
+            if attempt == 1:
+                result = await _call_with_hedge(provider_idx, provider_model_id, is_last_provider)
+            else:
+                result = await _call_single_provider(provider_model_id, is_last_provider=is_last_provider)
 
             # Success — return immediately.
-            # Note: result.arguments can be an empty dict {} which is falsy, so check None explicitly.
-            if result.arguments is not None and not result.error_message:
+            if _is_success(result):
                 logger.info(f"[{task_id}] LLM Utils: Preprocessing succeeded with provider: {provider_model_id}")
                 return result
 
@@ -1366,17 +1463,13 @@ async def call_main_llm_stream(
     # Check if model_id needs server resolution (e.g., alibaba provider)
     # If the provider has a default_server configured, resolve it and transform the model_id
     if "/" in model_id:
-        parts = model_id.split("/", 1)
-        
         # Resolve default_server for any provider that defines it in provider YAML.
         # This allows routing "provider/model" to a concrete server like "openrouter/*" or "google_ai_studio/*".
         default_server_id, transformed_model_id = resolve_default_server_from_provider_config(model_id)
         if default_server_id and transformed_model_id:
             logger.info(f"{log_prefix} Resolved default server '{default_server_id}' for model '{model_id}'. Using transformed model_id: '{transformed_model_id}'")
             model_id = transformed_model_id
-            if "/" in model_id:
-                parts = model_id.split("/", 1)
-            else:
+            if "/" not in model_id:
                 logger.warning(f"{log_prefix} Transformed model_id '{model_id}' does not contain a provider prefix.")
         else:
             logger.debug(f"{log_prefix} No default_server resolution for '{model_id}'. Using provider routing.")
@@ -1387,6 +1480,8 @@ async def call_main_llm_stream(
     servers_to_try = [model_id]
     if fallback_servers:
         servers_to_try.extend(fallback_servers)
+        # Servers failing on live traffic go last (see provider_routing.py)
+        servers_to_try = main_stream_health.order_servers(servers_to_try)
         logger.info(f"{log_prefix} Will try {len(servers_to_try)} server(s): primary='{servers_to_try[0]}', fallbacks={servers_to_try[1:]}")
 
     # Determine if an error is retryable (should try fallback)
@@ -1622,8 +1717,56 @@ async def call_main_llm_stream(
             logger.debug(f"{log_prefix} Could not check health status for '{provider_id}': {e}. Proceeding with attempt.")
         return False  # If cache miss or error, proceed (don't block on missing health data)
     
+    def _server_input_details(server_model_id: str, attempt_log_prefix: str) -> Dict[str, Any]:
+        """Provider client kwargs (without secrets_manager) for one server."""
+        server_provider_prefix = _provider_prefix_from_server_model_id(server_model_id)
+        server_actual_model_id = server_model_id.split("/", 1)[1] if server_provider_prefix else server_model_id
+        # Default input payload assumes provider-native clients that want only the model suffix
+        # For openrouter, we may need to pass the original model_id for provider override resolution
+        # Use sanitized_tools (with min/max removed) for all providers to ensure provider-agnostic behavior
+        server_llm_input_details = {
+            "task_id": task_id,
+            "model_id": server_actual_model_id,
+            "messages": _messages_for_server(server_model_id),
+            "temperature": temperature,
+            "tools": sanitized_tools,  # Use sanitized tools (min/max removed) for all providers
+            "tool_choice": tool_choice,
+            "stream": True
+        }
+
+        # For openrouter, if the original model has provider_overrides configured,
+        # we need to pass the original model_id (e.g., "alibaba/qwen3-235b-a22b-2507")
+        # instead of the transformed one (e.g., "openrouter/qwen/qwen3-235b-a22b-2507")
+        # so that OpenRouter can resolve provider overrides correctly.
+        # Only the primary server (the resolved default server) gets the original model_id;
+        # fallback servers use their own model_id directly.
+        if server_provider_prefix == "openrouter" and "/" in original_model_id and server_model_id == model_id:
+            provider_id, model_suffix = original_model_id.split("/", 1)
+            provider_config = config_manager.get_provider_config(provider_id)
+            if provider_config:
+                for model in provider_config.get("models", []):
+                    if isinstance(model, dict) and model.get("id") == model_suffix:
+                        # Check if this model has provider_overrides configured
+                        if model.get("provider_overrides"):
+                            server_llm_input_details["model_id"] = original_model_id
+                            logger.debug(f"{attempt_log_prefix} Using original model_id '{original_model_id}' for openrouter to enable provider override resolution")
+                        break
+        return server_llm_input_details
+
+    def _hedge_candidate(current_server_model_id: str) -> Optional[str]:
+        """Next server after the current one that has not been tried and has a client."""
+        remaining = servers_to_try[servers_to_try.index(current_server_model_id) + 1:]
+        for candidate in remaining:
+            if candidate in attempted_servers or candidate in consumed_by_hedge:
+                continue
+            if _get_provider_client(_provider_prefix_from_server_model_id(candidate)):
+                return candidate
+        return None
+
     # Try each server in order until one succeeds
     attempted_servers = []
+    # Hedge servers that already won or failed a hedged first-chunk race
+    consumed_by_hedge: set = set()
     last_error = None
     # Track whether any content has been yielded to the consumer.
     # If no content was yielded, we raise AllServersFailedError so the caller
@@ -1633,20 +1776,22 @@ async def call_main_llm_stream(
     _any_content_yielded = False
     
     for server_model_id in servers_to_try:
+        if server_model_id in consumed_by_hedge:
+            logger.info(f"{log_prefix} Skipping '{server_model_id}': already used as a hedge for a previous server.")
+            continue
         attempted_servers.append(server_model_id)
         attempt_log_prefix = f"{log_prefix} [Attempt {len(attempted_servers)}/{len(servers_to_try)}: {server_model_id}]"
         
-        # Parse the server model_id to get provider prefix and actual model_id
-        server_provider_prefix = ""
-        server_actual_model_id = server_model_id
-        
-        if "/" in server_model_id:
-            parts = server_model_id.split("/", 1)
-            server_provider_prefix = parts[0]
-            server_actual_model_id = parts[1]
+        # Parse the server model_id to get the provider prefix
+        server_provider_prefix = _provider_prefix_from_server_model_id(server_model_id)
         
-        # Check health status from cache before attempting
+        # Check health status from cache before attempting.
+        # The cached status comes from a synthetic probe every 5 minutes; a real request
+        # that succeeded on this provider in the last couple of minutes overrides it.
         is_unhealthy = await _is_provider_unhealthy(server_provider_prefix)
+        if is_unhealthy and main_stream_health.has_recent_success(server_provider_prefix):
+            logger.info(f"{attempt_log_prefix} Provider '{server_provider_prefix}' is marked unhealthy in cache, but served live traffic recently. Attempting.")
+            is_unhealthy = False
         if is_unhealthy:
             # Skip unhealthy providers unless all servers are unhealthy
             if len(attempted_servers) < len(servers_to_try):
@@ -1656,42 +1801,7 @@ async def call_main_llm_stream(
                 # Last server - try anyway (might have recovered)
                 logger.warning(f"{attempt_log_prefix} Provider '{server_provider_prefix}' is marked as unhealthy, but it's the last server. Attempting anyway.")
         
-        # Default input payload assumes provider-native clients that want only the model suffix
-        # For openrouter, we may need to pass the original model_id for provider override resolution
-        # Use sanitized_tools (with min/max removed) for all providers to ensure provider-agnostic behavior
-        server_llm_input_details = {
-            "task_id": task_id, 
-            "model_id": server_actual_model_id, 
-            "messages": _messages_for_server(server_model_id),
-            "temperature": temperature, 
-            "tools": sanitized_tools,  # Use sanitized tools (min/max removed) for all providers
-            "tool_choice": tool_choice, 
-            "stream": True
-        }
-        
-        # For openrouter, if the original model has provider_overrides configured, 
-        # we need to pass the original model_id (e.g., "alibaba/qwen3-235b-a22b-2507") 
-        # instead of the transformed one (e.g., "openrouter/qwen/qwen3-235b-a22b-2507")
-        # so that OpenRouter can resolve provider overrides correctly.
-        # Check if this is the primary server (not a fallback) and if provider_overrides exist
-        if server_provider_prefix == "openrouter" and "/" in original_model_id:
-            provider_id, model_suffix = original_model_id.split("/", 1)
-            provider_config = config_manager.get_provider_config(provider_id)
-            if provider_config:
-                for model in provider_config.get("models", []):
-                    if isinstance(model, dict) and model.get("id") == model_suffix:
-                        # Check if this model has provider_overrides configured
-                        if model.get("provider_overrides"):
-                            # Check if this is the primary server (first in servers_to_try)
-                            # For primary server, use original model_id for provider override resolution
-                            # For fallback servers, use the server's model_id directly
-                            if len(attempted_servers) == 1:  # Primary server
-                                server_llm_input_details["model_id"] = original_model_id
-                                logger.debug(f"{attempt_log_prefix} Using original model_id '{original_model_id}' for openrouter to enable provider override resolution")
-                            else:  # Fallback server
-                                server_llm_input_details["model_id"] = server_actual_model_id
-                                logger.debug(f"{attempt_log_prefix} Using fallback server model_id '{server_actual_model_id}' for openrouter")
-                            break
+        server_llm_input_details = _server_input_details(server_model_id, attempt_log_prefix)
 
         # Select provider client using dynamic registry - no hardcoded provider names!
         provider_client = _get_provider_client(server_provider_prefix)
@@ -1718,11 +1828,56 @@ async def call_main_llm_stream(
 
         try:
             logger.info(f"{attempt_log_prefix} Attempting to call provider client")
-            raw_chunk_stream = await provider_client(secrets_manager=secrets_manager, **server_llm_input_details)
+            first_chunk_timeout_seconds = get_first_chunk_timeout_seconds(is_reasoning=is_reasoning_model)
+            attempt_started_at = time.monotonic()
+            first_chunk_latency_recorded = False
+            # Primary error already counted by the race callback (when the race re-raises it)
+            recorded_race_error: Optional[BaseException] = None
+
+            # Hedge: if this server is slower than its recent TTFT percentile, start the
+            # next server as well and keep whichever produces a chunk first.
+            hedge_delay = main_stream_health.hedge_delay(server_model_id, first_chunk_timeout_seconds)
+            hedge_server_model_id = _hedge_candidate(server_model_id) if hedge_delay is not None else None
+            if hedge_server_model_id is not None:
+                race_servers = [server_model_id, hedge_server_model_id]
+                hedge_client = _get_provider_client(_provider_prefix_from_server_model_id(hedge_server_model_id))
+                hedge_input_details = _server_input_details(hedge_server_model_id, attempt_log_prefix)
+
+                def _record_race_result(index: int, elapsed: float, error: Optional[BaseException]) -> None:
+                    nonlocal recorded_race_error
+                    if error is None or isinstance(error, asyncio.CancelledError):
+                        main_stream_health.record_latency(race_servers[index], elapsed)
+                        return
+                    main_stream_health.record_outcome(race_servers[index], False)
+                    if index == 0:
+                        # Also counted when the hedge wins; the handlers below skip it if re-raised
+                        recorded_race_error = error
+                    else:
+                        consumed_by_hedge.add(race_servers[index])
+                        attempted_servers.append(race_servers[index])
+
+                hedge_outcome = await race_first_chunk(
+                    [
+                        lambda: provider_client(secrets_manager=secrets_manager, **server_llm_input_details),
+                        lambda: hedge_client(secrets_manager=secrets_manager, **hedge_input_details),
+                    ],
+                    hedge_delay,
+                    first_chunk_timeout_seconds,
+                    on_result=_record_race_result,
+                )
+                raw_chunk_stream = hedge_outcome.stream
+                first_chunk_latency_recorded = True
+                if hedge_outcome.winner_index == 1:
+                    consumed_by_hedge.add(hedge_server_model_id)
+                    attempted_servers.append(hedge_server_model_id)
+                    server_model_id = hedge_server_model_id
+                    attempt_log_prefix = f"{log_prefix} [Hedge for attempt {len(attempted_servers) - 1}: {server_model_id}]"
+                    logger.info(f"{attempt_log_prefix} Hedge request won the first-chunk race.")
+            else:
+                raw_chunk_stream = await provider_client(secrets_manager=secrets_manager, **server_llm_input_details)
             
             if hasattr(raw_chunk_stream, '__aiter__'):
                 # Success! Wrap stream with timeout for first chunk AND inter-chunk timeout
-                first_chunk_timeout_seconds = get_first_chunk_timeout_seconds(is_reasoning=is_reasoning_model)
                 inter_chunk_timeout_seconds = get_inter_chunk_timeout_seconds(is_reasoning=is_reasoning_model)
                 logger.info(
                     f"{attempt_log_prefix} Successfully connected to provider. "
@@ -1744,6 +1899,10 @@ async def call_main_llm_stream(
                     # chunks stay fully real-time. Usage metadata is buffered until
                     # we confirm the provider produced substantive output.
                     async for chunk in timeout_stream:
+                        if not first_chunk_latency_recorded:
+                            first_chunk_latency_recorded = True
+                            main_stream_health.record_latency(server_model_id, time.monotonic() - attempt_started_at)
+
                         if _is_usage_chunk(chunk):
                             buffered_usage_chunks.append(chunk)
                             continue
@@ -1761,6 +1920,7 @@ async def call_main_llm_stream(
                         )
                         logger.error(f"{attempt_log_prefix} {error_msg}")
                         last_error = error_msg
+                        main_stream_health.record_outcome(server_model_id, False)
                         if len(attempted_servers) < len(servers_to_try):
                             logger.warning(
                                 f"{attempt_log_prefix} Empty-stream failure detected. "
@@ -1772,6 +1932,7 @@ async def call_main_llm_stream(
 
                     for usage_chunk in buffered_usage_chunks:
                         yield usage_chunk
+                    main_stream_health.record_outcome(server_model_id, True)
                     # Successfully completed - return from function
                     return
                 except TimeoutError as timeout_err:
@@ -1779,6 +1940,7 @@ async def call_main_llm_stream(
                     error_msg = f"Stream timeout: {str(timeout_err)}"
                     logger.error(f"{attempt_log_prefix} {error_msg}")
                     last_error = error_msg
+                    main_stream_health.record_outcome(server_model_id, False)
                     if len(attempted_servers) < len(servers_to_try):
                         logger.warning(f"{attempt_log_prefix} Timeout error detected. Will try next server if available.")
                         continue
@@ -1793,6 +1955,7 @@ async def call_main_llm_stream(
                 error_msg = f"Expected a stream but did not receive one. Response type: {type(raw_chunk_stream)}"
                 logger.error(f"{attempt_log_prefix} {error_msg}")
                 last_error = error_msg
+                main_stream_health.record_outcome(server_model_id, False)
                 # If this is the last server to try, signal failure
                 if len(attempted_servers) >= len(servers_to_try):
                     logger.error(f"{attempt_log_prefix} Technical stream error (not shown to user): Expected a stream but received {type(raw_chunk_stream)}")
@@ -1806,6 +1969,8 @@ async def call_main_llm_stream(
             error_msg = str(e)
             logger.error(f"{attempt_log_prefix} Client or stream error: {e}", exc_info=True)
             last_error = error_msg
+            if e is not recorded_race_error:
+                main_stream_health.record_outcome(server_model_id, False)
             
             # Special case: Gemini "Thought signature is not valid" — stale signatures after a timeout.
             # Strip thought_signature fields from the message history and retry via shared helper.
@@ -1854,6 +2019,8 @@ async def call_main_llm_stream(
             error_msg = str(e)
             logger.error(f"{attempt_log_prefix} Unexpected error during main LLM stream: {e}", exc_info=True)
             last_error = error_msg
+            if e is not recorded_race_error:
+                main_stream_health.record_outcome(server_model_id, False)
             
             # Special case: Gemini "Thought signature is not valid" (same as ValueError block above)
             # Delegate to the shared helper which prefers OpenRouter first.
@@ -0,0 +1,320 @@
+# backend/apps/ai/utils/provider_routing.py
+# Latency-aware routing for LLM servers: passive health from real traffic and
+# hedged first-token requests.
+#
+# call_preprocessing_llm() and call_main_llm_stream() (llm_utils.py) used to try
+# servers strictly in configured order, so a stalling primary added its full
+# first-chunk timeout to the user's wait before the fallback even started. The
+# only health signal was the synthetic probe in health_check_tasks.py, which
+# runs every 5 minutes and is stale in between.
+#
+# ProviderHealthTracker records what real requests observe, per server model id
+# ("openrouter/qwen/qwen3-235b", ...), in this worker process:
+#   - time to first token (main stream) / time to response (preprocessing),
+#   - success/failure outcomes (errors, timeouts, empty streams).
+# From that it
+#   - orders servers by live health: servers whose recent error rate is at least
+#     DEGRADED_ERROR_RATE move behind the others (configured order is kept
+#     otherwise, since it also encodes cost and quality preferences);
+#   - lets a recent real success override a stale "unhealthy" probe result;
+#   - provides a hedge deadline: the HEDGE_TTFT_PERCENTILE of the server's
+#     recent latencies.
+#
+# race_first_chunk() implements the hedge for streams: if the primary has not
+# produced its first chunk by the deadline, the next server is started too; the
+# first to produce a chunk wins and the loser is cancelled and closed. Hedging
+# is opt-in (AI_HEDGED_REQUESTS_ENABLED) because a hedge can bill two providers
+# for one request, and only kicks in once a server has HEDGE_MIN_SAMPLES
+# latency samples.
+#
+# State is in-process: each Celery worker learns from its own traffic, which
+# needs no Redis round trip on the request path and converges within a few
+# requests.
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Samples kept per server, and how long they count
+HEALTH_WINDOW_SIZE = 100
+HEALTH_WINDOW_SECONDS = 10 * 60
+
+# A server with at least this error rate over at least DEGRADED_MIN_OUTCOMES
+# recent outcomes is tried after the healthy ones
+DEGRADED_ERROR_RATE = 0.5
+DEGRADED_MIN_OUTCOMES = 4
+
+# A real success this recent overrides a cached "unhealthy" probe result
+RECENT_SUCCESS_OVERRIDE_SECONDS = 120
+
+HEDGED_REQUESTS_ENABLED = os.getenv("AI_HEDGED_REQUESTS_ENABLED", "false").lower() in ("1", "true", "yes")
+HEDGE_TTFT_PERCENTILE = float(os.getenv("AI_HEDGE_TTFT_PERCENTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("AI_HEDGE_MIN_DELAY_SECONDS", "0.5"))
+
+
+@dataclass
+class _ServerStats:
+    latencies: Deque[Tuple[float, float]] = field(default_factory=lambda: deque(maxlen=HEALTH_WINDOW_SIZE))
+    outcomes: Deque[Tuple[float, bool]] = field(default_factory=lambda: deque(maxlen=HEALTH_WINDOW_SIZE))
+
+
+class ProviderHealthTracker:
+    """Passive per-server latency and error statistics from real requests."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._servers: Dict[str, _ServerStats] = {}
+        self._provider_last_success: Dict[str, float] = {}
+
+    def _stats(self, server_model_id: str) -> _ServerStats:
+        stats = self._servers.get(server_model_id)
+        if stats is None:
+            stats = self._servers[server_model_id] = _ServerStats()
+        return stats
+
+    def record_latency(self, server_model_id: str, latency_seconds: float) -> None:
+        """Time to first token (or to response). For a cancelled hedge loser: time waited so far."""
+        self._stats(server_model_id).latencies.append((time.monotonic(), latency_seconds))
+
+    def record_outcome(self, server_model_id: str, ok: bool, provider_prefix: Optional[str] = None) -> None:
+        """
+        Final outcome of one request to the server. provider_prefix (default: the
+        server model id's prefix) is the provider a success vouches for.
+        """
+        now = time.monotonic()
+        self._stats(server_model_id).outcomes.append((now, ok))
+        if ok:
+            self._provider_last_success[provider_prefix or server_model_id.split("/", 1)[0]] = now
+
+    def _recent(self, samples: Deque[Tuple[float, Any]]) -> List[Any]:
+        cutoff = time.monotonic() - HEALTH_WINDOW_SECONDS
+        return [value for recorded_at, value in samples if recorded_at >= cutoff]
+
+    def error_rate(self, server_model_id: str) -> Optional[float]:
+        """Recent error rate, or None with fewer than DEGRADED_MIN_OUTCOMES outcomes."""
+        stats = self._servers.get(server_model_id)
+        outcomes = self._recent(stats.outcomes) if stats else []
+        if len(outcomes) < DEGRADED_MIN_OUTCOMES:
+            return None
+        return outcomes.count(False) / len(outcomes)
+
+    def latency_percentile(self, server_model_id: str, percentile: float) -> Optional[float]:
+        """Recent latency percentile (0-1), or None with fewer than HEDGE_MIN_SAMPLES samples."""
+        stats = self._servers.get(server_model_id)
+        latencies = sorted(self._recent(stats.latencies)) if stats else []
+        if len(latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(percentile * len(latencies)))]
+
+    def has_recent_success(self, provider_prefix: str) -> bool:
+        last_success = self._provider_last_success.get(provider_prefix)
+        return last_success is not None and time.monotonic() - last_success <= RECENT_SUCCESS_OVERRIDE_SECONDS
+
+    def order_servers(self, server_model_ids: List[str]) -> List[str]:
+        """Configured order, with degraded servers moved to the back (least bad first)."""
+        degraded = {}
+        for server_model_id in server_model_ids:
+            rate = self.error_rate(server_model_id)
+            if rate is not None and rate >= DEGRADED_ERROR_RATE:
+                degraded[server_model_id] = rate
+        if not degraded:
+            return list(server_model_ids)
+        healthy = [server_model_id for server_model_id in server_model_ids if server_model_id not in degraded]
+        ordered = healthy + sorted(degraded, key=lambda server_model_id: degraded[server_model_id])
+        logger.info(f"[ProviderRouting:{self.name}] Demoted degraded servers {degraded}; order: {ordered}")
+        return ordered
+
+    def hedge_delay(self, server_model_id: str, timeout_seconds: float) -> Optional[float]:
+        """
+        Seconds to wait for server_model_id before hedging, or None to not hedge
+        (hedging disabled, too few samples, or the deadline would not beat the timeout).
+        """
+        if not HEDGED_REQUESTS_ENABLED:
+            return None
+        percentile_latency = self.latency_percentile(server_model_id, HEDGE_TTFT_PERCENTILE)
+        if percentile_latency is None:
+            return None
+        delay = max(HEDGE_MIN_DELAY_SECONDS, percentile_latency)
+        return delay if delay < timeout_seconds else None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Per-server error rate, p50/p95 latency and sample counts (for logs and debugging)."""
+        result = {}
+        for server_model_id, stats in self._servers.items():
+            latencies = sorted(self._recent(stats.latencies))
+            result[server_model_id] = {
+                "error_rate": self.error_rate(server_model_id),
+                "p50": latencies[len(latencies) // 2] if latencies else None,
+                "p95": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else None,
+                "samples": len(latencies),
+            }
+        return result
+
+
+# One tracker per call type: a preprocessing response time is not comparable
+# with a streaming time to first token on the same server
+preprocessing_health = ProviderHealthTracker("preprocessing")
+main_stream_health = ProviderHealthTracker("main_stream")
+
+
+_NO_CHUNK = object()
+
+
+@dataclass
+class HedgeOutcome:
+    """Result of race_first_chunk(): the winner's index and its stream, replaying the first chunk."""
+
+    winner_index: int
+    stream: Any
+    hedge_started: bool
+
+
+async def _replay_first_chunk(first_chunk: Any, stream: AsyncIterator[Any]) -> AsyncIterator[Any]:
+    yield first_chunk
+    async for chunk in stream:
+        yield chunk
+
+
+async def race_first_chunk(
+    open_streams: List[Callable[[], Awaitable[Any]]],
+    hedge_delay_seconds: float,
+    first_chunk_timeout_seconds: float,
+    on_result: Optional[Callable[[int, float, Optional[BaseException]], None]] = None,
+) -> HedgeOutcome:
+    """
+    Open the primary stream and, if it has not produced a chunk after
+    hedge_delay_seconds, the hedge stream too; the first to produce a chunk wins.
+
+    Args:
+        open_streams: [primary, hedge] callables returning the provider's stream.
+        hedge_delay_seconds: When to start the hedge.
+        first_chunk_timeout_seconds: Per-stream first-chunk timeout, from its own start.
+        on_result: Called once with (index, elapsed seconds, error) for every
+            stream that produced a chunk (error None), failed, or was cancelled as
+            the loser (asyncio.CancelledError), for health bookkeeping.
+
+    Returns:
+        HedgeOutcome whose stream yields the winner's first chunk and then the rest.
+        A stream that ends without a chunk, or a response that is not a stream, is
+        returned as is (for the caller's normal handling) unless the other request
+        produces a chunk.
+
+    Raises:
+        The primary's error if both fail (the hedge's if only the hedge ran and failed).
+    """
+    streams: Dict[int, Any] = {}
+    started: Dict[int, float] = {}
+
+    async def first_chunk(index: int) -> Any:
+        started[index] = time.monotonic()
+
+        async def open_and_read() -> Any:
+            stream = await open_streams[index]()
+            streams[index] = stream
+            if not hasattr(stream, "__anext__"):
+                return _NO_CHUNK
+            try:
+                return await stream.__anext__()
+            except StopAsyncIteration:
+                return _NO_CHUNK
+
+        try:
+            return await asyncio.wait_for(open_and_read(), timeout=first_chunk_timeout_seconds)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Stream did not produce first chunk within {first_chunk_timeout_seconds} seconds")
+
+    reported = set()
+
+    def report(index: int, error: Optional[BaseException]) -> None:
+        if index in reported:
+            return
+        reported.add(index)
+        if on_result is not None:
+            on_result(index, time.monotonic() - started[index], error)
+
+    async def close(index: int) -> None:
+        aclose = getattr(streams.get(index), "aclose", None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception as e:
+                logger.debug(f"[ProviderRouting] Closing cancelled stream {index} failed: {e}")
+
+    def outcome(index: int, chunk: Any, hedge_started: bool) -> HedgeOutcome:
+        if chunk is _NO_CHUNK:
+            return HedgeOutcome(index, streams.get(index), hedge_started)
+        return HedgeOutcome(index, _replay_first_chunk(chunk, streams[index]), hedge_started)
+
+    async def cancel_and_close() -> None:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        for index in tasks:
+            await close(index)
+
+    tasks = {0: asyncio.create_task(first_chunk(0))}
+    try:
+        done, _ = await asyncio.wait(set(tasks.values()), timeout=hedge_delay_seconds)
+    except BaseException:
+        # Cancelled while waiting for the hedge deadline: do not leak the primary
+        await cancel_and_close()
+        raise
+    if done:
+        # Primary finished (or failed) before the deadline: no hedge
+        try:
+            chunk = tasks[0].result()
+        except Exception as e:
+            report(0, e)
+            raise
+        report(0, None)
+        return outcome(0, chunk, hedge_started=False)
+
+    logger.info(f"[ProviderRouting] No first chunk after {hedge_delay_seconds:.2f}s; starting hedge request")
+    tasks[1] = asyncio.create_task(first_chunk(1))
+    errors: Dict[int, BaseException] = {}
+    no_chunk_index: Optional[int] = None
+    try:
+        pending = set(tasks.values())
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for index, task in tasks.items():
+                if task not in done:
+                    continue
+                if task.exception() is not None:
+                    errors[index] = task.exception()
+                    report(index, task.exception())
+                    continue
+                chunk = task.result()
+                report(index, None)
+                if chunk is _NO_CHUNK:
+                    no_chunk_index = index if no_chunk_index is None else no_chunk_index
+                    continue
+                # Winner: cancel the other request if it is still waiting, and close
+                # its stream either way (it may have produced a chunk at the same time)
+                for loser_index, loser in tasks.items():
+                    if loser_index == index:
+                        continue
+                    if not loser.done():
+                        loser.cancel()
+                        await asyncio.gather(loser, return_exceptions=True)
+                    if loser.cancelled():
+                        report(loser_index, asyncio.CancelledError())
+                    else:
+                        report(loser_index, loser.exception())
+                    await close(loser_index)
+                    logger.info(f"[ProviderRouting] Request {index} won the hedge; closed request {loser_index}")
+                return outcome(index, chunk, hedge_started=True)
+    except BaseException:
+        await cancel_and_close()
+        raise
+
+    if no_chunk_index is not None:
+        return outcome(no_chunk_index, _NO_CHUNK, hedge_started=True)
+    raise errors.get(0) or errors[1]
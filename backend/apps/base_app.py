@@ -26,6 +26,7 @@ from backend.shared.python_schemas.app_metadata_schemas import (
 from backend.core.api.app.services.translations import TranslationService
 from backend.core.api.app.utils.config_manager import config_manager
 from backend.apps.ai.processing.rate_limiting import RateLimitScheduledException
+from backend.shared.python_utils.http_clients import INTERNAL_API_UPSTREAM, get_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -749,17 +750,17 @@ class BaseApp:
         
         url = f"{INTERNAL_API_BASE_URL.rstrip('/')}/{endpoint.lstrip('/')}"
 
-        async with httpx.AsyncClient(timeout=INTERNAL_API_TIMEOUT) as client:
-            try:
-                response = await client.request(method, url, json=payload, params=params, headers=headers)
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                raise HTTPException(status_code=e.response.status_code, detail=f"Internal API error: {e.response.text}")
-            except httpx.RequestError as e:
-                raise HTTPException(status_code=503, detail=f"Service unavailable: {str(e)}")
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Unexpected internal error: {str(e)}")
+        client = get_http_client(INTERNAL_API_UPSTREAM)
+        try:
+            response = await client.request(method, url, json=payload, params=params, headers=headers)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            raise HTTPException(status_code=e.response.status_code, detail=f"Internal API error: {e.response.text}")
+        except httpx.RequestError as e:
+            raise HTTPException(status_code=503, detail=f"Service unavailable: {str(e)}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Unexpected internal error: {str(e)}")
 
     def _initialize_celery_producer(self) -> Celery:
         """
@@ -9,9 +9,11 @@ import asyncio # For potential async operations
 import time # For generating timestamps
 import logging
 import hashlib
+from functools import partial
 
 # Import shared utilities
 from backend.shared.python_utils.billing_utils import calculate_total_credits, MINIMUM_CREDITS_CHARGED
+from backend.apps.skill_result_cache import SkillCachePolicy, get_or_compute
 
 if TYPE_CHECKING:
     from apps.base_app import BaseApp # For type hinting self.app
@@ -114,6 +116,16 @@ class BaseSkill:
     _current_chat_id: Optional[str] = None  # Chat ID for current execution context
     _current_message_id: Optional[str] = None  # Message ID for current execution context
 
+    # Shared cross-user result cache (see backend/apps/skill_result_cache.py). A skill opts in
+    # by setting a TTL and listing every request field that may influence its results; all of
+    # them must be public. app.yml default_config can override both durations (0 disables).
+    # result_cache_defaults lists the values the skill uses for fields a request leaves out
+    # (or sends as None / ""), so equivalent requests share one entry.
+    result_cache_ttl_seconds: Optional[float] = None
+    result_cache_stale_seconds: float = 0
+    result_cache_params: Tuple[str, ...] = ()
+    result_cache_defaults: Dict[str, Any] = {}
+
     # TODO: Ensure Celery tasks spawned from skills are cancellable.
     # This might involve:
     # - Storing task IDs.
@@ -609,6 +621,20 @@ class BaseSkill:
         merged.sort(key=lambda group: request_order.get(group.get("id"), 999))
         return merged
 
+    def _result_cache_policy(self) -> Optional[SkillCachePolicy]:
+        """The skill's shared result cache policy, or None when it does not use the cache."""
+        defaults = self.skill_operational_defaults if isinstance(self.skill_operational_defaults, dict) else {}
+        ttl = defaults.get("result_cache_ttl_seconds", self.result_cache_ttl_seconds)
+        if not ttl or ttl <= 0 or not self.result_cache_params:
+            return None
+        return SkillCachePolicy(
+            name=f"{self.app_id}.{self.skill_id}",
+            ttl_seconds=float(ttl),
+            stale_seconds=float(defaults.get("result_cache_stale_seconds", self.result_cache_stale_seconds) or 0),
+            params=frozenset(self.result_cache_params),
+            defaults=dict(self.result_cache_defaults),
+        )
+
     async def _process_requests_in_parallel(
         self,
         requests: List[Dict[str, Any]],
@@ -620,7 +646,9 @@ class BaseSkill:
         Process multiple requests in parallel using asyncio.gather.
         
         This helper method standardizes the parallel processing pattern used across all skills.
-        It creates tasks for each request and executes them in parallel.
+        It creates tasks for each request and executes them in parallel. For skills that opt in
+        to the shared result cache, each request is answered from the cache when possible
+        (using the 'cache_service' kwarg if one is passed).
         
         Args:
             requests: List of request dictionaries to process
@@ -644,14 +672,27 @@ class BaseSkill:
         # Process all requests in parallel using asyncio.gather()
         # Each request is processed independently
         logger.info(f"Processing {len(requests)} requests in parallel")
-        tasks = [
-            process_single_request_func(
-                req=req,
-                request_id=req.get("id"),
-                **kwargs
-            )
-            for req in requests
-        ]
+        cache_policy = self._result_cache_policy()
+        if cache_policy is None:
+            tasks = [
+                process_single_request_func(
+                    req=req,
+                    request_id=req.get("id"),
+                    **kwargs
+                )
+                for req in requests
+            ]
+        else:
+            tasks = [
+                get_or_compute(
+                    policy=cache_policy,
+                    req=req,
+                    request_id=req.get("id"),
+                    compute=partial(process_single_request_func, req=req, request_id=req.get("id"), **kwargs),
+                    cache_service=kwargs.get("cache_service"),
+                )
+                for req in requests
+            ]
         
         # Wait for all requests to complete (parallel execution)
         results = await asyncio.gather(*tasks, return_exceptions=True)
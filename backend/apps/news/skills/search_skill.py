@@ -15,6 +15,7 @@ from celery import Celery  # For Celery type hinting
 from toon_format import encode, decode, DecodeOptions
 
 from backend.apps.base_skill import BaseSkill
+from backend.apps.skill_result_cache import is_background_refresh
 from backend.shared.providers.brave.brave_search import search_news
 from backend.shared.python_utils.domain_filter import load_tabloid_blocklist, filter_results_by_domain
 from backend.core.api.app.utils.secrets_manager import SecretsManager
@@ -184,6 +185,20 @@ class SearchSkill(BaseSkill):
     - Scalability: Excellent - FastAPI handles thousands of concurrent requests
     """
     
+    # Public Brave news results are identical for every user sending the same parameters, so they
+    # are shared across users; news goes stale faster than web results (see backend/apps/skill_result_cache.py)
+    result_cache_ttl_seconds = 300
+    result_cache_stale_seconds = 900
+    result_cache_params = (
+        "query", "q", "count", "country", "search_lang", "safesearch",
+        "freshness", "filter_tabloids",
+    )
+    # What _process_single_search_request uses for a field that is missing, None or ""
+    result_cache_defaults = {
+        "count": DEFAULT_RESULT_COUNT, "country": "us", "search_lang": "en", "safesearch": "moderate",
+        "freshness": "pw",
+    }
+
     def __init__(self,
                  app,  # BaseApp instance - required by BaseSkill
                  app_id: str,
@@ -386,7 +401,8 @@ class SearchSkill(BaseSkill):
                     # Try to get celery_producer from app if available
                     celery_producer = None
                     celery_task_context = None
-                    if hasattr(self.app, 'celery_producer') and self.app.celery_producer:
+                    # A background refresh of a shared cached result has no chat waiting for it
+                    if hasattr(self.app, 'celery_producer') and self.app.celery_producer and not is_background_refresh():
                         celery_producer = self.app.celery_producer
                         celery_task_context = {
                             "app_id": self.app_id,
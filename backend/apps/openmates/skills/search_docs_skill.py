@@ -1,15 +1,27 @@
 # backend/apps/openmates/skills/search_docs_skill.py
 #
 # Search Docs skill — full-text search across OpenMates documentation.
-# Fetches the docs search index from the public site and performs
-# keyword matching across titles and content.
+# Fetches the docs search index from the public site and ranks documents
+# with BM25 over an in-memory inverted index.
+#
+# The inverted index (_DocsSearchIndex) is built once per loaded docs corpus
+# (i.e. whenever the module-level entry cache is refreshed, every
+# SEARCH_INDEX_CACHE_TTL) instead of running str.count over every document on
+# every query. Titles and headings are indexed as weighted fields of the same
+# document (heading-aware boosts), and query words of MIN_PREFIX_LENGTH+ chars
+# also match indexed words they prefix (found by bisecting the sorted
+# vocabulary), which keeps most of the old substring behaviour. A query only
+# touches the postings of its terms.
 #
 # Architecture: docs/architecture/docs-web-app.md
 
+import asyncio
+import bisect
 import logging
+import math
 import os
 import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import httpx
 from pydantic import BaseModel, Field
@@ -27,10 +39,33 @@ MAX_RESULTS = 10
 # Cache TTL for the search index (seconds) — re-fetched every 10 minutes
 SEARCH_INDEX_CACHE_TTL = 600
 
+# Field weights: a word in the title counts as 3 content occurrences, in a heading as 2
+TITLE_FIELD_WEIGHT = 3.0
+HEADING_FIELD_WEIGHT = 2.0
+
+# BM25 parameters (standard Okapi defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Query words at least this long also match longer indexed words they prefix,
+# at PREFIX_MATCH_WEIGHT of an exact match (at most MAX_PREFIX_EXPANSIONS words)
+MIN_PREFIX_LENGTH = 3
+PREFIX_MATCH_WEIGHT = 0.5
+MAX_PREFIX_EXPANSIONS = 50
+
+# Score multipliers for multi-word queries found verbatim in a title / the content
+TITLE_PHRASE_BOOST = 2.0
+CONTENT_PHRASE_BOOST = 1.2
+
+_WORD_RE = re.compile(r"\w+")
+
 # Module-level cache for the search index
 _cached_search_index: Optional[List[Dict[str, Any]]] = None
 _cache_timestamp: float = 0
 
+# Inverted index over _cached_search_index, rebuilt when the entry list changes
+_ranked_index: Optional["_DocsSearchIndex"] = None
+
 
 class SearchDocsRequest(BaseModel):
     """Request model for the search_docs skill (REST API documentation)."""
@@ -67,8 +102,8 @@ class SearchDocsSkill(BaseSkill):
     """
     Full-text search across OpenMates documentation.
 
-    Searches document titles and content for the given query terms,
-    returning the most relevant matches with snippets.
+    Ranks documents by BM25 over their titles, headings and content for the
+    given query terms, returning the most relevant matches with snippets.
     """
 
     def __init__(
@@ -127,54 +162,21 @@ class SearchDocsSkill(BaseSkill):
                 )
 
             # Perform search
-            words = query.lower().split()
-            scored_results: List[tuple] = []
-
-            for entry in search_index:
-                title_lower = entry.get("title", "").lower()
-                content_lower = entry.get("content", "").lower()
-
-                # Calculate relevance score
-                score = 0.0
-                matched_words = 0
-
-                for word in words:
-                    title_count = title_lower.count(word)
-                    content_count = content_lower.count(word)
-
-                    if title_count > 0:
-                        score += 3.0 * title_count  # Title matches weighted 3x
-                        matched_words += 1
-                    if content_count > 0:
-                        score += 1.0 * min(content_count, 5)  # Cap content matches
-                        matched_words += 1
-
-                # Exact phrase match bonus
-                if query.lower() in title_lower:
-                    score += 10.0
-                if query.lower() in content_lower:
-                    score += 2.0
-
-                # Only include if at least one word matched
-                if matched_words > 0:
-                    # Normalize score to 0-1 range
-                    relevance = min(score / (len(words) * 10), 1.0)
-                    snippet = _extract_snippet(entry.get("content", ""), words)
-                    scored_results.append((relevance, entry, snippet))
-
-            # Sort by relevance (descending) and take top results
-            scored_results.sort(key=lambda x: x[0], reverse=True)
-            top_results = scored_results[:MAX_RESULTS]
+            ranked_index = _ranked_index
+            if ranked_index is None or ranked_index.entries is not search_index:
+                # (Re)build off the event loop after a corpus refresh
+                ranked_index = await asyncio.to_thread(_get_ranked_index, search_index)
+            top_results = ranked_index.search(query, MAX_RESULTS)
 
             results = [
                 SearchDocsResult(
                     title=entry.get("title", ""),
                     slug=entry.get("slug", ""),
                     url=f"{DOCS_BASE_URL}/docs/{entry.get('slug', '')}",
-                    snippet=snippet,
+                    snippet=_extract_snippet(entry.get("content", ""), matched_words),
                     relevance=round(relevance, 3),
                 )
-                for relevance, entry, snippet in top_results
+                for relevance, entry, matched_words in top_results
             ]
 
             return SearchDocsResponse(
@@ -258,6 +260,7 @@ class SearchDocsSkill(BaseSkill):
                                     {
                                         "title": title,
                                         "slug": slug,
+                                        "headings": _extract_headings(html),
                                         "content": content[:5000],  # Limit per-doc content
                                     }
                                 )
@@ -292,6 +295,126 @@ class SearchDocsSkill(BaseSkill):
         return _cached_search_index  # Return stale cache if available
 
 
+class _DocsSearchIndex:
+    """
+    In-memory inverted index over docs search entries, ranked with BM25.
+
+    Each posting holds a document's weighted term frequency across fields:
+    content occurrences + TITLE_FIELD_WEIGHT × title occurrences +
+    HEADING_FIELD_WEIGHT × heading occurrences. Length normalisation uses the
+    content length.
+    """
+
+    def __init__(self, entries: List[Dict[str, Any]]):
+        self.entries = entries
+        self._titles_lower: List[str] = []
+        self._contents_lower: List[str] = []
+        self._doc_lengths: List[int] = []
+        postings: Dict[str, Dict[int, float]] = {}
+
+        for doc_idx, entry in enumerate(entries):
+            title_lower = entry.get("title", "").lower()
+            content_lower = entry.get("content", "").lower()
+            self._titles_lower.append(title_lower)
+            self._contents_lower.append(content_lower)
+
+            content_words = _WORD_RE.findall(content_lower)
+            self._doc_lengths.append(len(content_words))
+            fields = (
+                (content_words, 1.0),
+                (_WORD_RE.findall(title_lower), TITLE_FIELD_WEIGHT),
+                (_WORD_RE.findall(" ".join(entry.get("headings") or []).lower()), HEADING_FIELD_WEIGHT),
+            )
+            for words, weight in fields:
+                for word in words:
+                    doc_postings = postings.setdefault(word, {})
+                    doc_postings[doc_idx] = doc_postings.get(doc_idx, 0.0) + weight
+
+        doc_count = len(entries)
+        self._avg_doc_length = (sum(self._doc_lengths) / doc_count if doc_count else 0.0) or 1.0
+        self._postings = postings
+        self._idf = {
+            word: math.log(1.0 + (doc_count - len(doc_postings) + 0.5) / (len(doc_postings) + 0.5))
+            for word, doc_postings in postings.items()
+        }
+        self._vocabulary = sorted(postings)
+
+    def _expand(self, query_word: str) -> List[Tuple[str, float]]:
+        """Indexed words matching a query word, with their match weight."""
+        matches = [(query_word, 1.0)] if query_word in self._postings else []
+        if len(query_word) >= MIN_PREFIX_LENGTH:
+            start = bisect.bisect_right(self._vocabulary, query_word)
+            for word in self._vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+                if not word.startswith(query_word):
+                    break
+                matches.append((word, PREFIX_MATCH_WEIGHT))
+        return matches
+
+    def search(self, query: str, limit: int) -> List[Tuple[float, Dict[str, Any], List[str]]]:
+        """
+        Rank documents for a query.
+
+        Returns:
+            Up to limit (relevance, entry, matched_words) tuples, best first.
+            Relevance is the BM25 score relative to the best result (0-1].
+        """
+        query_lower = query.lower().strip()
+        query_words = list(dict.fromkeys(_WORD_RE.findall(query_lower)))
+        scores: Dict[int, float] = {}
+        matched: Dict[int, List[str]] = {}
+
+        for query_word in query_words:
+            for word, match_weight in self._expand(query_word):
+                idf = self._idf[word] * match_weight
+                for doc_idx, term_freq in self._postings[word].items():
+                    length_norm = 1.0 - BM25_B + BM25_B * self._doc_lengths[doc_idx] / self._avg_doc_length
+                    scores[doc_idx] = scores.get(doc_idx, 0.0) + idf * (
+                        term_freq * (BM25_K1 + 1.0) / (term_freq + BM25_K1 * length_norm)
+                    )
+                    matched.setdefault(doc_idx, []).append(word)
+
+        if len(query_words) > 1:
+            for doc_idx in scores:
+                if query_lower in self._titles_lower[doc_idx]:
+                    scores[doc_idx] *= TITLE_PHRASE_BOOST
+                elif query_lower in self._contents_lower[doc_idx]:
+                    scores[doc_idx] *= CONTENT_PHRASE_BOOST
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        if not ranked:
+            return []
+        best_score = ranked[0][1] or 1.0
+        return [
+            (score / best_score, self.entries[doc_idx], matched[doc_idx])
+            for doc_idx, score in ranked
+        ]
+
+
+def _get_ranked_index(entries: List[Dict[str, Any]]) -> _DocsSearchIndex:
+    """Inverted index for the given entry list, built once per loaded corpus."""
+    global _ranked_index
+
+    if _ranked_index is None or _ranked_index.entries is not entries:
+        _ranked_index = _DocsSearchIndex(entries)
+        logger.info(
+            f"SearchDocsSkill: Built docs search index "
+            f"({len(entries)} docs, {len(_ranked_index._vocabulary)} terms)"
+        )
+    return _ranked_index
+
+
+def _extract_headings(html: str) -> List[str]:
+    """Plain text of the h1-h3 headings of a docs page."""
+    return [
+        heading
+        for heading in (
+            _extract_plain_text(match)
+            for match in re.findall(r"<h[1-3][^>]*>(.*?)</h[1-3]>", html, flags=re.DOTALL | re.IGNORECASE)
+        )
+        if heading
+    ]
+
+
 def _extract_plain_text(html: str) -> str:
     """Extract plain text from HTML, stripping all tags."""
     # Remove script and style
@@ -0,0 +1,195 @@
+# backend/apps/pdf/services/page_pipeline.py
+#
+# Bounded-concurrency page pipeline for PDF processing (process_task Step 4-6).
+#
+# Previously every page screenshot was rendered first, then sent to SightEngine
+# one at a time, then encrypted and uploaded to S3 one at a time — a 100-page
+# PDF was 200+ serial network round trips after rendering finished.
+#
+# run_page_pipeline() instead runs a fixed pool of workers. Each worker pulls the
+# next rendered page from the screenshot generator (rendering is serialised by a
+# lock: pymupdf documents are not thread-safe), checks it, stores it and pulls
+# the next one. So:
+#   - a page is checked and uploaded as soon as it is rendered, while later
+#     pages are still rendering;
+#   - at most `workers` pages are in memory at a time;
+#   - a page is only stored after ITS safety check passed (same guarantee as the
+#     old scan-everything-then-upload order, per page);
+#   - the first failure (rejected page, provider outage, S3 error) aborts the
+#     pipeline: no new pages are pulled and in-flight workers are cancelled
+#     before the error is re-raised. Pages stored up to then are the caller's to
+#     delete (process_task tracks every key it starts uploading for that).
+#
+# Provider rate limits are enforced by the caller's check function via
+# ProviderRateLimiter (max concurrent requests + max request starts per second),
+# independently of the worker count. The per-second limit can be delegated to a
+# limiter shared across processes (process_task uses a Dragonfly token bucket).
+#
+# Progress is reported through an optional callback, throttled to one call per
+# PROGRESS_MIN_INTERVAL_SECONDS plus a final call when every page is stored.
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Concurrent page workers (pages in flight through check + upload)
+PAGE_PIPELINE_WORKERS = int(os.getenv("PDF_PAGE_PIPELINE_WORKERS", "8"))
+
+# SightEngine limits for page screenshot checks
+SIGHTENGINE_MAX_CONCURRENCY = int(os.getenv("PDF_SIGHTENGINE_MAX_CONCURRENCY", "4"))
+SIGHTENGINE_MAX_REQUESTS_PER_SECOND = float(os.getenv("PDF_SIGHTENGINE_MAX_REQUESTS_PER_SECOND", "5"))
+# Token bucket shared by every PDF worker process for the per-second limit
+SIGHTENGINE_RATE_LIMIT_BUCKET = "sightengine"
+
+# Minimum seconds between two progress callbacks (the final one is always sent)
+PROGRESS_MIN_INTERVAL_SECONDS = 1.0
+
+
+class PageRejectedError(RuntimeError):
+    """A page screenshot failed the content safety check; aborts the whole PDF."""
+
+    def __init__(self, page_num: int, reason: Optional[str] = None) -> None:
+        super().__init__(
+            f"PDF contains content that violates community guidelines (detected on page {page_num})"
+        )
+        self.page_num = page_num
+        self.reason = reason
+
+
+class ProviderRateLimiter:
+    """
+    Async context manager limiting concurrent requests and request starts per second.
+
+    Starts are spaced at least 1 / max_per_second apart (no bursts), which keeps
+    a busy worker pool under a provider's per-second quota. With `acquire_start`,
+    each start awaits it instead, e.g. a token bucket shared by all processes
+    (max_per_second is then ignored).
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_per_second: float,
+        clock: Callable[[], float] = time.monotonic,
+        acquire_start: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> None:
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._interval = 1.0 / max_per_second if max_per_second > 0 else 0.0
+        self._clock = clock
+        self._acquire_start = acquire_start
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "ProviderRateLimiter":
+        await self._semaphore.acquire()
+        try:
+            if self._acquire_start is not None:
+                await self._acquire_start()
+            elif self._interval:
+                async with self._lock:
+                    now = self._clock()
+                    start = max(now, self._next_start)
+                    self._next_start = start + self._interval
+                if start > now:
+                    await asyncio.sleep(start - now)
+        except BaseException:
+            self._semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._semaphore.release()
+
+
+async def run_page_pipeline(
+    pages: Iterator[Tuple[int, bytes]],
+    page_count: int,
+    store_page: Callable[[int, bytes], Awaitable[str]],
+    check_page: Optional[Callable[[int, bytes], Awaitable[None]]] = None,
+    on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+    workers: Optional[int] = None,
+    log_prefix: str = "[pdf.pages]",
+) -> Dict[int, str]:
+    """
+    Check and store rendered pages concurrently as they are produced.
+
+    Args:
+        pages: Blocking generator of (page_num, png_bytes), e.g. iter_pdf_pages().
+            Advanced from worker threads, one page at a time, and closed at the end.
+        page_count: Expected number of pages (for progress reporting).
+        store_page: Encrypts and uploads one page, returns its storage key.
+        check_page: Safety check; raises (e.g. PageRejectedError) to abort.
+            None skips checking.
+        on_progress: Called with (pages_stored, page_count); failures are logged.
+        workers: Worker count, defaults to PAGE_PIPELINE_WORKERS.
+
+    Returns:
+        Dict mapping page number → storage key, in page order.
+
+    Raises:
+        The first exception raised by rendering, check_page or store_page.
+    """
+    render_lock = threading.Lock()
+    stored: Dict[int, str] = {}
+    progress = {"last_sent": 0.0}
+
+    def _next_page() -> Optional[Tuple[int, bytes]]:
+        with render_lock:
+            return next(pages, None)
+
+    def _close_pages() -> None:
+        # Waits for a render still running in an abandoned worker thread
+        with render_lock:
+            close = getattr(pages, "close", None)
+            if close:
+                close()
+
+    async def _report_progress() -> None:
+        if on_progress is None:
+            return
+        now = time.monotonic()
+        done = len(stored)
+        if done < page_count and now - progress["last_sent"] < PROGRESS_MIN_INTERVAL_SECONDS:
+            return
+        progress["last_sent"] = now
+        try:
+            await on_progress(done, page_count)
+        except Exception as e:
+            logger.warning(f"{log_prefix} Progress update failed (non-fatal): {e}")
+
+    async def _worker() -> None:
+        while True:
+            item = await asyncio.to_thread(_next_page)
+            if item is None:
+                return
+            page_num, png_bytes = item
+            if check_page is not None:
+                await check_page(page_num, png_bytes)
+            stored[page_num] = await store_page(page_num, png_bytes)
+            await _report_progress()
+
+    worker_count = max(1, min(workers or PAGE_PIPELINE_WORKERS, page_count or 1))
+    tasks: List[asyncio.Task] = [asyncio.create_task(_worker()) for _ in range(worker_count)]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+    except BaseException as e:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.warning(
+            f"{log_prefix} Page pipeline aborted after {len(stored)}/{page_count} pages: {e!r}"
+        )
+        raise
+    finally:
+        await asyncio.to_thread(_close_pages)
+
+    logger.info(f"{log_prefix} Page pipeline stored {len(stored)} pages with {worker_count} workers")
+    return dict(sorted(stored.items()))
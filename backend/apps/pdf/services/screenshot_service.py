@@ -10,9 +10,11 @@
 #   - 150 DPI is a good balance between quality (readable text/diagrams) and
 #     file size (vision AI calls shouldn't receive huge images).
 #   - Output format: PNG bytes for each page.
+#   - iter_pdf_pages() yields pages one at a time for the streaming page pipeline;
+#     render_pdf_pages() collects them into a dict.
 
 import logging
-from typing import Dict
+from typing import Dict, Iterator, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -20,18 +22,15 @@ logger = logging.getLogger(__name__)
 SCREENSHOT_DPI = 150
 
 
-def render_pdf_pages(pdf_bytes: bytes, log_prefix: str = "[Screenshot]") -> Dict[int, bytes]:
+def iter_pdf_pages(pdf_bytes: bytes, log_prefix: str = "[Screenshot]") -> Iterator[Tuple[int, bytes]]:
     """
-    Render all pages of a PDF to PNG images at SCREENSHOT_DPI.
+    Render the pages of a PDF one at a time, yielding (page_num, png_bytes).
 
-    This function is CPU-bound and should be called via asyncio.to_thread().
+    Lets the page pipeline (page_pipeline.run_page_pipeline) check and upload each
+    page while later pages are still rendering, with only the pages in flight in
+    memory. The document is closed when the generator is exhausted or closed.
 
-    Args:
-        pdf_bytes: Raw (decrypted) PDF bytes.
-        log_prefix: Logging prefix for traceability.
-
-    Returns:
-        Dict mapping 1-indexed page number → PNG bytes.
+    Blocking and CPU-bound: advance it from a worker thread, one caller at a time.
 
     Raises:
         ImportError: If pymupdf is not installed.
@@ -49,27 +48,47 @@ def render_pdf_pages(pdf_bytes: bytes, log_prefix: str = "[Screenshot]") -> Dict
     except Exception as e:
         raise RuntimeError(f"Failed to open PDF for rendering: {e}") from e
 
-    # Zoom factor to achieve the desired DPI (fitz default is 72 DPI)
-    zoom = SCREENSHOT_DPI / 72.0
-    matrix = fitz.Matrix(zoom, zoom)
-
-    pages: Dict[int, bytes] = {}
-    page_count = len(doc)
-    logger.info(f"{log_prefix} Rendering {page_count} pages at {SCREENSHOT_DPI} DPI")
-
-    for page_index in range(page_count):
-        page = doc[page_index]
-        page_num = page_index + 1  # 1-indexed
-
-        try:
-            pix = page.get_pixmap(matrix=matrix, alpha=False)
-            png_bytes = pix.tobytes("png")
-            pages[page_num] = png_bytes
-            logger.debug(f"{log_prefix} Page {page_num} rendered: {len(png_bytes)} bytes")
-        except Exception as e:
-            logger.error(f"{log_prefix} Failed to render page {page_num}: {e}", exc_info=True)
-            raise RuntimeError(f"Failed to render page {page_num}: {e}") from e
-
-    doc.close()
-    logger.info(f"{log_prefix} All {page_count} pages rendered successfully")
-    return pages
+    try:
+        # Zoom factor to achieve the desired DPI (fitz default is 72 DPI)
+        zoom = SCREENSHOT_DPI / 72.0
+        matrix = fitz.Matrix(zoom, zoom)
+
+        page_count = len(doc)
+        logger.info(f"{log_prefix} Rendering {page_count} pages at {SCREENSHOT_DPI} DPI")
+
+        for page_index in range(page_count):
+            page = doc[page_index]
+            page_num = page_index + 1  # 1-indexed
+
+            try:
+                pix = page.get_pixmap(matrix=matrix, alpha=False)
+                png_bytes = pix.tobytes("png")
+                logger.debug(f"{log_prefix} Page {page_num} rendered: {len(png_bytes)} bytes")
+            except Exception as e:
+                logger.error(f"{log_prefix} Failed to render page {page_num}: {e}", exc_info=True)
+                raise RuntimeError(f"Failed to render page {page_num}: {e}") from e
+            yield page_num, png_bytes
+
+        logger.info(f"{log_prefix} All {page_count} pages rendered successfully")
+    finally:
+        doc.close()
+
+
+def render_pdf_pages(pdf_bytes: bytes, log_prefix: str = "[Screenshot]") -> Dict[int, bytes]:
+    """
+    Render all pages of a PDF to PNG images at SCREENSHOT_DPI.
+
+    This function is CPU-bound and should be called via asyncio.to_thread().
+
+    Args:
+        pdf_bytes: Raw (decrypted) PDF bytes.
+        log_prefix: Logging prefix for traceability.
+
+    Returns:
+        Dict mapping 1-indexed page number → PNG bytes.
+
+    Raises:
+        ImportError: If pymupdf is not installed.
+        RuntimeError: If PDF cannot be opened or rendered.
+    """
+    return dict(iter_pdf_pages(pdf_bytes, log_prefix))
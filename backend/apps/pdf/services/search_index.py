@@ -0,0 +1,240 @@
+# backend/apps/pdf/services/search_index.py
+#
+# Per-document inverted index for pdf.search.
+#
+# pdf.search used to download and decrypt the whole OCR JSON blob on every call
+# and scan every page with str.find. process_task.py now builds this index once
+# at ingest (Step 8) and stores it next to the OCR blob, encrypted with the same
+# per-PDF output key (fresh nonce per object, prepended to the ciphertext):
+#
+#   manifest  (embed content field `search_index_s3_key`)
+#     {"version", "page_count", "page_lengths": {page: tokens}, "avg_page_length",
+#      "shard_keys": [...], "text_blocks": [{"first_page", "last_page", "key"}]}
+#   shards    term → postings, partitioned by crc32(term) % len(shard_keys)
+#     {term: [[page, offset, offset, ...], ...]}   (tf = number of offsets)
+#   text blocks  page → markdown for PAGES_PER_TEXT_BLOCK consecutive pages,
+#     used for result snippets
+#
+# A query therefore downloads the manifest, one shard per distinct query term
+# and the text blocks of the pages it returns — not the whole document. Each
+# object is JSON, zlib-compressed before encryption.
+#
+# Pages are ranked with Okapi BM25 over lowercased \w+ tokens. Offsets are the
+# start characters of each token in the page markdown as stored in the OCR blob.
+#
+# DecryptedIndexCache keeps recently used decoded parts in process memory so
+# repeated queries against the same PDF skip S3, Vault and AES-GCM. Entries are
+# keyed by S3 key and only read after the caller has decrypted the embed with
+# the user's Vault key, so a cached part is never served without that check.
+
+import json
+import math
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+SEARCH_INDEX_VERSION = 1
+
+# BM25 parameters (standard Okapi defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Roughly this many distinct terms per posting shard, capped at MAX_INDEX_SHARDS
+TERMS_PER_SHARD = 2000
+MAX_INDEX_SHARDS = 32
+
+# Consecutive pages stored together for snippet extraction
+PAGES_PER_TEXT_BLOCK = 16
+
+# Decrypted index parts kept in memory per worker process
+INDEX_CACHE_MAX_BYTES = 32 * 1024 * 1024
+INDEX_CACHE_TTL_SECONDS = 15 * 60
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[Tuple[str, int]]:
+    """Lowercased word tokens of text with their start offsets."""
+    return [(match.group().lower(), match.start()) for match in _TOKEN_RE.finditer(text)]
+
+
+def query_terms(query: str) -> List[str]:
+    """Distinct terms of a search query, in query order."""
+    return list(dict.fromkeys(term for term, _ in tokenize(query)))
+
+
+def token_end(text: str, offset: int) -> int:
+    """End offset of the token starting at offset (offsets come from tokenize)."""
+    match = _TOKEN_RE.match(text, offset)
+    return match.end() if match else offset
+
+
+def shard_for_term(term: str, shard_count: int) -> int:
+    return zlib.crc32(term.encode("utf-8")) % shard_count
+
+
+def encode_index_part(obj: Any) -> bytes:
+    return zlib.compress(json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_index_part(data: bytes) -> Any:
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+@dataclass
+class BuiltSearchIndex:
+    """
+    Index parts produced by build_search_index(). The manifest's `shard_keys`
+    and the text block `key`s are filled in by the caller once the S3 keys are known.
+    """
+
+    manifest: Dict[str, Any]
+    shards: List[Dict[str, List[List[int]]]]
+    text_blocks: List[Dict[str, str]]
+
+
+def build_search_index(pages: Dict[int, str]) -> BuiltSearchIndex:
+    """
+    Build the inverted index for a document.
+
+    Args:
+        pages: 1-indexed page number → page markdown.
+    """
+    postings: Dict[str, Dict[int, List[int]]] = {}
+    page_lengths: Dict[str, int] = {}
+
+    for page_num in sorted(pages):
+        tokens = tokenize(pages[page_num])
+        page_lengths[str(page_num)] = len(tokens)
+        for term, offset in tokens:
+            postings.setdefault(term, {}).setdefault(page_num, []).append(offset)
+
+    shard_count = max(1, min(MAX_INDEX_SHARDS, math.ceil(len(postings) / TERMS_PER_SHARD)))
+    shards: List[Dict[str, List[List[int]]]] = [{} for _ in range(shard_count)]
+    for term, by_page in postings.items():
+        shards[shard_for_term(term, shard_count)][term] = [
+            [page_num, *offsets] for page_num, offsets in by_page.items()
+        ]
+
+    page_nums = sorted(pages)
+    text_blocks: List[Dict[str, str]] = []
+    block_ranges: List[Dict[str, Any]] = []
+    for start in range(0, len(page_nums), PAGES_PER_TEXT_BLOCK):
+        block_pages = page_nums[start:start + PAGES_PER_TEXT_BLOCK]
+        text_blocks.append({str(page_num): pages[page_num] for page_num in block_pages})
+        block_ranges.append({"first_page": block_pages[0], "last_page": block_pages[-1], "key": None})
+
+    total_length = sum(page_lengths.values())
+    manifest = {
+        "version": SEARCH_INDEX_VERSION,
+        "page_count": len(pages),
+        "page_lengths": page_lengths,
+        "avg_page_length": total_length / len(pages) if pages else 0.0,
+        "shard_keys": [None] * shard_count,
+        "text_blocks": block_ranges,
+    }
+    return BuiltSearchIndex(manifest=manifest, shards=shards, text_blocks=text_blocks)
+
+
+def rank_pages(
+    manifest: Dict[str, Any], postings: Dict[str, List[List[int]]]
+) -> List[Tuple[int, float]]:
+    """
+    BM25-rank pages for a query.
+
+    Args:
+        manifest: Decoded index manifest (page count and lengths).
+        postings: Query term → its posting list from the shards (empty if absent).
+
+    Returns:
+        (page_num, score) for every page containing at least one term, best first
+        (ties in page order).
+    """
+    page_count = manifest["page_count"]
+    avg_length = manifest["avg_page_length"] or 1.0
+    page_lengths = manifest["page_lengths"]
+    scores: Dict[int, float] = {}
+
+    for term_postings in postings.values():
+        doc_freq = len(term_postings)
+        if not doc_freq:
+            continue
+        idf = math.log(1.0 + (page_count - doc_freq + 0.5) / (doc_freq + 0.5))
+        for posting in term_postings:
+            page_num, term_freq = posting[0], len(posting) - 1
+            length_norm = 1.0 - BM25_B + BM25_B * page_lengths.get(str(page_num), 0) / avg_length
+            scores[page_num] = scores.get(page_num, 0.0) + idf * (
+                term_freq * (BM25_K1 + 1.0) / (term_freq + BM25_K1 * length_norm)
+            )
+
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def text_block_key_for_page(manifest: Dict[str, Any], page_num: int) -> Optional[str]:
+    for block in manifest["text_blocks"]:
+        if block["first_page"] <= page_num <= block["last_page"]:
+            return block["key"]
+    return None
+
+
+class DecryptedIndexCache:
+    """
+    Small in-process LRU of decoded index parts, bounded by approximate
+    plaintext bytes and an idle TTL.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = INDEX_CACHE_MAX_BYTES,
+        ttl_seconds: float = INDEX_CACHE_TTL_SECONDS,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[2] > self.ttl_seconds:
+                if entry is not None:
+                    self._drop(key)
+                self.stats["misses"] += 1
+                return None
+            value, size, _ = entry
+            self._entries[key] = (value, size, time.monotonic())
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def put(self, key: str, value: Any, size: int) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, time.monotonic())
+            self._size += size
+            while self._size > self.max_bytes:
+                evicted_key = next(iter(self._entries))
+                self._drop(evicted_key)
+                self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _drop(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+
+# Shared by all pdf.search calls in this process
+decrypted_index_cache = DecryptedIndexCache()
@@ -10,19 +10,26 @@
 #     3. Decrypts the embed content using the user's Vault Transit key
 #     4. Extracts vault_wrapped_aes_key, ocr_data_s3_key, aes_nonce from the
 #        decrypted embed content (these fields are NEVER exposed to the LLM)
-#     5. Unwraps the AES key via Vault Transit
-#     6. Downloads and decrypts the OCR JSON blob from S3
-#     7. Performs case-insensitive substring search across all pages
-#     8. Returns matching text blocks with surrounding context and page numbers
+#     5. Unwraps the AES key via Vault Transit (only if something must be downloaded)
+#     6. Indexed PDFs (embed has search_index_s3_key, built by process_task.py):
+#        loads the index manifest and only the posting shards of the query terms,
+#        ranks pages with BM25 and loads the text blocks of the returned pages for
+#        snippets. Decoded index parts are kept in a small in-process LRU
+#        (services/search_index.py), so repeated queries skip S3/Vault/AES-GCM.
+#        Older PDFs without an index — and indexed queries with no token hit,
+#        e.g. a partial word — fall back to downloading the OCR JSON blob and
+#        running a case-insensitive substring search across all pages.
+#     7. Returns matching text blocks with surrounding context and page numbers
 #
-#   This is intentionally dumb but fast — the LLM can then call pdf.read
-#   on the relevant pages for deeper analysis.
+#   Fast and predictable — the LLM can then call pdf.read on the relevant pages
+#   for deeper analysis.
 
+import asyncio
 import base64
 import json
 import logging
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from urllib.parse import quote as url_quote
 
 import httpx
@@ -32,6 +39,15 @@ from pydantic import BaseModel, Field
 from toon_format import decode as toon_decode
 
 from backend.apps.base_skill import BaseSkill
+from backend.apps.pdf.services.search_index import (
+    decode_index_part,
+    decrypted_index_cache,
+    query_terms,
+    rank_pages,
+    shard_for_term,
+    text_block_key_for_page,
+    token_end,
+)
 from backend.core.api.app.utils.text_sanitization import sanitize_text_simple
 
 logger = logging.getLogger(__name__)
@@ -73,6 +89,9 @@ class SearchMatch(BaseModel):
     match_text: str = Field(..., description="The exact matched text snippet.")
     context: str = Field(..., description="Surrounding text context around the match.")
     char_offset: int = Field(..., description="Character offset of the match in the page markdown.")
+    score: Optional[float] = Field(
+        None, description="BM25 relevance of the page (indexed PDFs; results are ordered by it)."
+    )
 
 
 class SearchResponse(BaseModel):
@@ -99,8 +118,8 @@ class SearchSkill(BaseSkill):
     main_processor.py, then resolves all crypto and storage details server-side by looking
     up the embed from the Redis cache and decrypting its content via Vault Transit.
 
-    No LLM call is made — this is a pure substring search, which is fast and
-    predictable. The LLM can use the page numbers from results to call pdf.read
+    No LLM call is made — this is a BM25 keyword search over the PDF's inverted
+    index (substring scan for PDFs without one), which is fast and predictable. The LLM can use the page numbers from results to call pdf.read
     for detailed content.
     """
 
@@ -249,8 +268,32 @@ class SearchSkill(BaseSkill):
 
         return resp.content
 
+    def _make_match(
+        self, page_num: int, text: str, start: int, end: int, context_chars: int,
+        score: Optional[float] = None,
+    ) -> SearchMatch:
+        """Build a SearchMatch for text[start:end] with its surrounding context."""
+        ctx_start = max(0, start - context_chars)
+        ctx_end = min(len(text), end + context_chars)
+        ctx = text[ctx_start:ctx_end]
+
+        # Prefix/suffix ellipsis if truncated
+        if ctx_start > 0:
+            ctx = "…" + ctx
+        if ctx_end < len(text):
+            ctx = ctx + "…"
+
+        return SearchMatch(
+            page_num=page_num,
+            match_text=sanitize_pdf_search_text(text[start:end]),
+            context=sanitize_pdf_search_text(ctx),
+            char_offset=start,
+            score=score,
+        )
+
     def _search_page(
-        self, page_num: int, text: str, query_lower: str, context_chars: int
+        self, page_num: int, text: str, query_lower: str, context_chars: int,
+        score: Optional[float] = None,
     ) -> List[SearchMatch]:
         """
         Find all case-insensitive occurrences of query in text.
@@ -266,30 +309,125 @@ class SearchSkill(BaseSkill):
             idx = text_lower.find(query_lower, start)
             if idx == -1:
                 break
+            matches.append(self._make_match(page_num, text, idx, idx + query_len, context_chars, score))
+            start = idx + query_len  # advance past this match
 
-            # Extract context window
-            ctx_start = max(0, idx - context_chars)
-            ctx_end = min(len(text), idx + query_len + context_chars)
-            ctx = text[ctx_start:ctx_end]
-
-            # Prefix/suffix ellipsis if truncated
-            if ctx_start > 0:
-                ctx = "…" + ctx
-            if ctx_end < len(text):
-                ctx = ctx + "…"
-
-            matches.append(
-                SearchMatch(
-                    page_num=page_num,
-                    match_text=sanitize_pdf_search_text(text[idx: idx + query_len]),
-                    context=sanitize_pdf_search_text(ctx),
-                    char_offset=idx,
-                )
+        return matches
+
+    async def _load_index_part(
+        self, s3_key: str, get_aes_key: Callable[[], Awaitable[bytes]]
+    ) -> Any:
+        """Decoded index part from the in-process cache, or download + decrypt + cache it."""
+        cached = decrypted_index_cache.get(s3_key)
+        if cached is not None:
+            return cached
+        encrypted_with_nonce = await self._download_from_s3(s3_key)
+        aesgcm = AESGCM(await get_aes_key())
+        plaintext = aesgcm.decrypt(encrypted_with_nonce[:12], encrypted_with_nonce[12:], None)
+        part = decode_index_part(plaintext)
+        decrypted_index_cache.put(s3_key, part, len(plaintext))
+        return part
+
+    async def _search_index(
+        self,
+        index_s3_key: str,
+        query: str,
+        context_chars: int,
+        get_aes_key: Callable[[], Awaitable[bytes]],
+        log_prefix: str,
+    ) -> tuple:
+        """
+        BM25 search over the PDF's inverted index.
+
+        Pages are returned best first. Within a page, exact (case-insensitive)
+        occurrences of the whole query are reported; pages that only contain
+        some of the terms report each term occurrence from the postings.
+
+        Returns:
+            (matches, truncated) — matches capped at MAX_MATCHES.
+        """
+        manifest = await self._load_index_part(index_s3_key, get_aes_key)
+        terms = query_terms(query)
+        if not terms:
+            return [], False
+
+        shard_keys: List[str] = manifest["shard_keys"]
+        term_shards = {term: shard_for_term(term, len(shard_keys)) for term in terms}
+        needed_shards = sorted(set(term_shards.values()))
+        loaded = await asyncio.gather(
+            *(self._load_index_part(shard_keys[shard_idx], get_aes_key) for shard_idx in needed_shards)
+        )
+        shards = dict(zip(needed_shards, loaded))
+        postings = {term: shards[shard_idx].get(term, []) for term, shard_idx in term_shards.items()}
+
+        ranked = rank_pages(manifest, postings)
+        logger.info(f"{log_prefix} Index search: {len(terms)} terms, {len(ranked)} matching pages")
+
+        query_lower = query.lower().strip()
+        offsets_by_page: Dict[int, List[int]] = {}
+        for term_postings in postings.values():
+            for posting in term_postings:
+                offsets_by_page.setdefault(posting[0], []).extend(posting[1:])
+
+        matches: List[SearchMatch] = []
+        truncated = False
+        block_keys_done: set = set()
+        pages_text: Dict[str, str] = {}
+        for rank_idx, (page_num, score) in enumerate(ranked):
+            block_key = text_block_key_for_page(manifest, page_num)
+            if block_key and block_key not in block_keys_done:
+                # Fetch the blocks of this and the next few ranked pages together
+                upcoming = {
+                    key for key in (
+                        text_block_key_for_page(manifest, upcoming_page)
+                        for upcoming_page, _ in ranked[rank_idx:rank_idx + 8]
+                    )
+                    if key and key not in block_keys_done
+                }
+                for text_block in await asyncio.gather(
+                    *(self._load_index_part(key, get_aes_key) for key in upcoming)
+                ):
+                    pages_text.update(text_block)
+                block_keys_done |= upcoming
+
+            text = pages_text.get(str(page_num), "")
+            rounded_score = round(score, 4)
+            page_matches = self._search_page(page_num, text, query_lower, context_chars, rounded_score)
+            if not page_matches:
+                page_matches = [
+                    self._make_match(page_num, text, offset, token_end(text, offset), context_chars, rounded_score)
+                    for offset in sorted(set(offsets_by_page.get(page_num, [])))
+                ]
+            matches.extend(page_matches)
+
+            if len(matches) >= MAX_MATCHES:
+                truncated = True
+                break
+
+        return matches, truncated
+
+    def _search_ocr_pages(
+        self, all_pages_data: Dict[str, Any], query: str, context_chars: int, log_prefix: str
+    ) -> tuple:
+        """Substring search over every page of the OCR blob, in page order."""
+        query_lower = query.lower().strip()
+        all_matches: List[SearchMatch] = []
+        truncated = False
+
+        for page_key in sorted(all_pages_data.keys(), key=lambda k: int(k)):
+            page_num = int(page_key)
+            markdown = sanitize_pdf_search_text(
+                all_pages_data[page_key].get("markdown", ""),
+                log_prefix=f"{log_prefix} [page:{page_num}] ",
             )
+            page_matches = self._search_page(page_num, markdown, query_lower, context_chars)
+            all_matches.extend(page_matches)
 
-            start = idx + query_len  # advance past this match
+            if len(all_matches) >= MAX_MATCHES:
+                truncated = True
+                break
 
-        return matches
+        return all_matches, truncated
 
     async def execute(
         self,
@@ -307,9 +445,10 @@ class SearchSkill(BaseSkill):
         Steps:
         1. Resolve file_path → embed_id via file_path_index (injected by main_processor).
         2. Look up all crypto fields from the Redis embed cache.
-        3. Unwrap AES key via Vault.
-        4. Download + decrypt OCR JSON blob from S3.
-        5. Search all pages case-insensitively for query.
+        3. Unwrap AES key via Vault (only when an index part or the blob must be downloaded).
+        4. Indexed PDFs: BM25-rank pages from the needed posting shards.
+        5. No index or no token hit: download + decrypt the OCR blob and search
+           all pages case-insensitively for query.
         6. Return matches with context.
         """
         log_prefix = f"[pdf.search] [file_path:{file_path!r}]"
@@ -369,39 +508,48 @@ class SearchSkill(BaseSkill):
             # Note: aes_nonce is no longer validated here — the OCR blob S3 object
             # has its nonce prepended as the first 12 bytes of its ciphertext.
 
-            # --- Step 3: Unwrap AES key ---
-            aes_key_bytes = await self._unwrap_aes_key(vault_wrapped_aes_key, resolved_vault_key_id)
+            # --- Step 3: Unwrap AES key (lazily — cached index parts need no key) ---
+            aes_key_holder: Dict[str, bytes] = {}
+
+            async def get_aes_key() -> bytes:
+                if "key" not in aes_key_holder:
+                    aes_key_holder["key"] = await self._unwrap_aes_key(
+                        vault_wrapped_aes_key, resolved_vault_key_id
+                    )
+                return aes_key_holder["key"]
 
-            # --- Step 4: Download + decrypt OCR blob ---
+            # --- Step 4: Search the inverted index when the PDF has one ---
+            search_index_s3_key = embed_content.get("search_index_s3_key")
+            all_matches: List[SearchMatch] = []
+            truncated = False
+            if search_index_s3_key:
+                try:
+                    all_matches, truncated = await self._search_index(
+                        search_index_s3_key, query, ctx_chars, get_aes_key, log_prefix
+                    )
+                except Exception as e:
+                    # A missing or corrupt index part must not fail the search:
+                    # the OCR blob is the source of truth
+                    logger.warning(
+                        f"{log_prefix} Index search failed, falling back to OCR blob scan: {e}",
+                        exc_info=True,
+                    )
+                    all_matches, truncated = [], False
+
+            # --- Step 5: Otherwise download + decrypt the OCR blob and scan it ---
             # The nonce is prepended as the first 12 bytes of the ciphertext
             # (set during PDF processing in process_task.py step 8).
             # aes_nonce in the embed content is "" for new artefacts; ignore it.
-            logger.info(f"{log_prefix} Downloading OCR blob for search: '{query}'")
-            encrypted_with_nonce = await self._download_from_s3(ocr_data_s3_key)
-            nonce = encrypted_with_nonce[:12]
-            encrypted = encrypted_with_nonce[12:]
-            aesgcm = AESGCM(aes_key_bytes)
-            plaintext = aesgcm.decrypt(nonce, encrypted, None)
-            ocr_data = json.loads(plaintext.decode("utf-8"))
-            all_pages_data: Dict[str, Any] = ocr_data.get("pages", {})
-
-            query_lower = query.lower().strip()
-            all_matches: List[SearchMatch] = []
-            truncated = False
-
-            # --- Step 5: Search pages in order ---
-            for page_key in sorted(all_pages_data.keys(), key=lambda k: int(k)):
-                page_num = int(page_key)
-                markdown = sanitize_pdf_search_text(
-                    all_pages_data[page_key].get("markdown", ""),
-                    log_prefix=f"{log_prefix} [page:{page_num}] ",
-                )
-                page_matches = self._search_page(page_num, markdown, query_lower, ctx_chars)
-                all_matches.extend(page_matches)
-
-                if len(all_matches) >= MAX_MATCHES:
-                    truncated = True
-                    break
+            if not all_matches:
+                logger.info(f"{log_prefix} Downloading OCR blob for search: '{query}'")
+                encrypted_with_nonce = await self._download_from_s3(ocr_data_s3_key)
+                nonce = encrypted_with_nonce[:12]
+                encrypted = encrypted_with_nonce[12:]
+                aesgcm = AESGCM(await get_aes_key())
+                plaintext = aesgcm.decrypt(nonce, encrypted, None)
+                ocr_data = json.loads(plaintext.decode("utf-8"))
+                all_pages_data: Dict[str, Any] = ocr_data.get("pages", {})
+                all_matches, truncated = self._search_ocr_pages(all_pages_data, query, ctx_chars, log_prefix)
 
             total = len(all_matches)
             returned = all_matches[:MAX_MATCHES]
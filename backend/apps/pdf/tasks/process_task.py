@@ -8,13 +8,16 @@
 #
 #   1. Downloads and decrypts the PDF from S3.
 #   2. Runs Mistral OCR 3 (mistral-ocr-2512) to extract per-page markdown + images.
-#   3. Renders page screenshots at 150 DPI using pymupdf.
+#   3. Renders page screenshots at 150 DPI using pymupdf, safety-checks and
+#      encrypts + uploads each page as soon as it is rendered (bounded-concurrency
+#      page pipeline, one S3 object per page), publishing pdf_processing_progress
+#      events. Runs concurrently with steps 4-5.
 #   4. Detects TOC (Groq gpt-oss-20b, batches of 3, up to 12 pages).
 #   5. Detects legend (Groq gpt-oss-20b, last 5 pages).
 #   6. Encrypts and uploads:
-#      - Page screenshots (one S3 object per page).
 #      - Extracted OCR images (one S3 object each).
 #      - Full OCR JSON blob (all per-page markdown + metadata).
+#      - pdf.search inverted index (manifest + posting shards + text blocks).
 #   7. Builds per-page token counts (len(markdown) // 4).
 #   8. Constructs the embed TOON content structure (visible to LLM).
 #   9. Updates the embed via WebSocket (embed_update event).
@@ -34,6 +37,7 @@
 #     "toc": {"detected": true, "source_pages": [4, 5], "chapters": [...]},
 #     "legend": {"detected": true, "source_pages": [41, 42], "content": "..."},
 #     "ocr_data_s3_key": "chatfiles/...",
+#     "search_index_s3_key": "chatfiles/...",   # pdf.search index manifest (None if indexing failed)
 #     "screenshot_s3_keys": {"1": "chatfiles/...", "2": "chatfiles/...", ...},
 #     "extracted_image_s3_keys": ["chatfiles/...", ...]
 #   }
@@ -45,7 +49,7 @@ import logging
 import os
 import uuid
 from datetime import datetime, timezone
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import httpx
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
@@ -208,47 +212,10 @@ async def _async_process_pdf(task: BaseServiceTask, arguments: Dict[str, Any]) -
         logger.info(f"{log_prefix} OCR complete via {ocr_provider}: {len(ocr_pages)} pages")
 
         # -----------------------------------------------------------------------
-        # Step 4: Render page screenshots via pymupdf (in thread to avoid blocking)
-        # -----------------------------------------------------------------------
-        logger.info(f"{log_prefix} Step 4: Rendering page screenshots")
-        from backend.apps.pdf.services.screenshot_service import render_pdf_pages
-
-        screenshots: Dict[int, bytes] = await asyncio.to_thread(
-            render_pdf_pages, pdf_bytes, log_prefix
-        )
-        logger.info(f"{log_prefix} Rendered {len(screenshots)} page screenshots")
-
-        # -----------------------------------------------------------------------
-        # Step 5: Detect TOC and legend (parallel calls to Groq)
-        # -----------------------------------------------------------------------
-        # Legend detection is skipped for PDFs with fewer than 10 pages because
-        # short documents almost never contain a dedicated legend section, and the
-        # extra Groq call wastes credits on last-page analysis.
-        logger.info(f"{log_prefix} Step 5: Detecting TOC and legend")
-        from backend.apps.pdf.services.toc_detector import detect_toc, detect_legend
-
-        if page_count >= 10:
-            toc_result, legend_result = await asyncio.gather(
-                detect_toc(ocr_pages, task._secrets_manager, log_prefix),
-                detect_legend(ocr_pages, task._secrets_manager, log_prefix),
-            )
-        else:
-            logger.info(
-                f"{log_prefix} Skipping legend detection (page_count={page_count} < 10)"
-            )
-            toc_result = await detect_toc(ocr_pages, task._secrets_manager, log_prefix)
-            legend_result = {"detected": False, "source_pages": [], "content": "", "chapters": []}
-
-        logger.info(
-            f"{log_prefix} TOC detected={toc_result['detected']}, "
-            f"legend detected={legend_result['detected']}"
-        )
-
-        # -----------------------------------------------------------------------
-        # Step 5.5: SightEngine content safety scan on rendered page screenshots
+        # Step 4: Prepare the SightEngine content safety check for page screenshots
         #
         # We scan every page screenshot for harmful/illegal/AI-generated content
-        # before storing them in S3. This mirrors the scan done for user-uploaded
+        # before storing it in S3. This mirrors the scan done for user-uploaded
         # images in the upload service.
         #
         # Behaviour:
@@ -258,8 +225,21 @@ async def _async_process_pdf(task: BaseServiceTask, arguments: Dict[str, Any]) -
         #     (fail-closed policy, same as upload service post-fix).
         #   - If any page fails the content safety threshold → the entire PDF
         #     processing is aborted and the embed is marked as failed.
+        #   - Unexpected errors (import/init/client bugs) → scan skipped with a
+        #     warning, PDF processing continues.
         # -----------------------------------------------------------------------
-        logger.info(f"{log_prefix} Step 5.5: SightEngine safety scan of page screenshots")
+        logger.info(f"{log_prefix} Step 4: Preparing SightEngine safety scan of page screenshots")
+        from backend.apps.ai.processing.rate_limiting import wait_for_bucket
+        from backend.apps.pdf.services.page_pipeline import (
+            SIGHTENGINE_MAX_CONCURRENCY,
+            SIGHTENGINE_MAX_REQUESTS_PER_SECOND,
+            SIGHTENGINE_RATE_LIMIT_BUCKET,
+            PageRejectedError,
+            ProviderRateLimiter,
+            run_page_pipeline,
+        )
+
+        check_page = None
         try:
             from backend.upload.services.sightengine_service import SightEngineService
             _se = SightEngineService()
@@ -267,61 +247,92 @@ async def _async_process_pdf(task: BaseServiceTask, arguments: Dict[str, Any]) -
                 vault_url=os.getenv("VAULT_ADDR", "http://vault:8200"),
                 vault_token_path=os.getenv("VAULT_TOKEN_PATH", "/vault-data/api.token"),
             )
-
             if not _se.is_enabled:
                 logger.info(
-                    f"{log_prefix} Step 5.5: SightEngine SKIPPED "
+                    f"{log_prefix} Step 4: SightEngine SKIPPED "
                     "(credentials not configured — set SECRET__SIGHTENGINE__* to enable)"
                 )
             else:
-                rejected_page: int | None = None
-                for page_num, png_bytes in sorted(screenshots.items()):
-                    filename_hint = f"pdf_{embed_id[:8]}_p{page_num}.png"
-                    safety_result, _ = await _se.check_all(png_bytes, filename=filename_hint)
-                    if not safety_result.is_safe:
-                        if safety_result.reason == "safety_service_unavailable":
-                            logger.error(
-                                f"{log_prefix} Step 5.5: SightEngine service unavailable "
-                                f"while scanning page {page_num}. Aborting PDF processing."
-                            )
-                            raise RuntimeError(
-                                "Safety processing failed. Try again later. "
-                                "(SightEngine service unavailable during PDF scan)"
+                async def _sightengine_request_start() -> None:
+                    await wait_for_bucket(
+                        SIGHTENGINE_RATE_LIMIT_BUCKET,
+                        SIGHTENGINE_MAX_REQUESTS_PER_SECOND,
+                        cache_service=task._cache_service,
+                    )
+
+                # Shared by all page workers: caps concurrent SightEngine requests of
+                # this PDF, independently of the pipeline width. Request starts per
+                # second come from a Dragonfly token bucket shared by every worker
+                # process, so PDFs processed in parallel stay under the quota together.
+                se_limiter = ProviderRateLimiter(
+                    SIGHTENGINE_MAX_CONCURRENCY,
+                    SIGHTENGINE_MAX_REQUESTS_PER_SECOND,
+                    acquire_start=_sightengine_request_start,
+                )
+                se_state = {"skipped": False}
+
+                async def check_page(page_num: int, png_bytes: bytes) -> None:
+                    if se_state["skipped"]:
+                        return
+                    try:
+                        async with se_limiter:
+                            safety_result, _ = await _se.check_all(
+                                png_bytes, filename=f"pdf_{embed_id[:8]}_p{page_num}.png"
                             )
+                    except Exception as _se_err:
+                        # Non-fatal client error: stop scanning, do not block PDF processing
+                        se_state["skipped"] = True
                         logger.warning(
-                            f"{log_prefix} Step 5.5: Page {page_num} REJECTED — "
-                            f"reason: {safety_result.reason}"
+                            f"{log_prefix} SightEngine scan skipped due to unexpected error "
+                            f"on page {page_num}: {_se_err}"
                         )
-                        rejected_page = page_num
-                        break
-
-                if rejected_page is not None:
-                    raise RuntimeError(
-                        f"PDF contains content that violates community guidelines "
-                        f"(detected on page {rejected_page})"
+                        return
+                    if safety_result.is_safe:
+                        return
+                    if safety_result.reason == "safety_service_unavailable":
+                        logger.error(
+                            f"{log_prefix} SightEngine service unavailable "
+                            f"while scanning page {page_num}. Aborting PDF processing."
+                        )
+                        raise RuntimeError(
+                            "Safety processing failed. Try again later. "
+                            "(SightEngine service unavailable during PDF scan)"
+                        )
+                    logger.warning(
+                        f"{log_prefix} Page {page_num} REJECTED — reason: {safety_result.reason}"
                     )
-
-                logger.info(
-                    f"{log_prefix} Step 5.5: All {len(screenshots)} page screenshots "
-                    "passed SightEngine safety scan ✓"
-                )
-        except RuntimeError:
-            raise  # Re-raise safety/service errors so the task retries/fails cleanly
+                    raise PageRejectedError(page_num, safety_result.reason)
         except Exception as _se_err:
             # Non-fatal import or init error: log and continue (do not block PDF processing)
             logger.warning(
-                f"{log_prefix} Step 5.5: SightEngine scan skipped due to unexpected error: {_se_err}"
+                f"{log_prefix} Step 4: SightEngine scan skipped due to unexpected error: {_se_err}"
             )
 
         # -----------------------------------------------------------------------
-        # Step 6: Encrypt and upload page screenshots to S3
+        # Step 5 + 6, concurrently:
+        #   - Page pipeline: render screenshots via pymupdf, safety-check each page
+        #     and encrypt + upload it to S3 as soon as it is rendered, with bounded
+        #     concurrency (see services/page_pipeline.py). The first rejected page
+        #     aborts the pipeline. Progress is pushed to the client as pages land.
+        #   - TOC and legend detection (Groq), which only needs the OCR pages.
+        #
+        # Legend detection is skipped for PDFs with fewer than 10 pages because
+        # short documents almost never contain a dedicated legend section, and the
+        # extra Groq call wastes credits on last-page analysis.
         # -----------------------------------------------------------------------
-        logger.info(f"{log_prefix} Step 6: Uploading {len(screenshots)} page screenshots")
+        logger.info(
+            f"{log_prefix} Step 5: Rendering, scanning and uploading page screenshots "
+            f"while detecting TOC and legend"
+        )
+        from backend.apps.pdf.services.screenshot_service import iter_pdf_pages
+        from backend.apps.pdf.services.toc_detector import detect_toc, detect_legend
+
         timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
         unique_id = uuid.uuid4().hex[:8]
-        screenshot_s3_keys: Dict[str, str] = {}
+        # Every page key whose upload was started, so an aborted pipeline can be cleaned up
+        started_page_keys: List[str] = []
 
-        for page_num, png_bytes in sorted(screenshots.items()):
+        async def store_page(page_num: int, png_bytes: bytes) -> str:
             # Each artefact gets its own fresh 96-bit nonce to prevent AES-GCM
             # nonce reuse across multiple plaintexts with the same key.
             # The nonce is prepended to the ciphertext (first 12 bytes) so
@@ -332,16 +343,79 @@ async def _async_process_pdf(task: BaseServiceTask, arguments: Dict[str, Any]) -
             s3_screenshot_key = (
                 f"chatfiles/{user_id}/{timestamp}_{unique_id}_pdf_{embed_id[:8]}_p{page_num}.png.bin"
             )
+            started_page_keys.append(s3_screenshot_key)
             await task._s3_service.upload_file(
                 bucket_key=PDF_S3_BUCKET,
                 file_key=s3_screenshot_key,
                 content=encrypted,
                 content_type="application/octet-stream",
             )
-            screenshot_s3_keys[str(page_num)] = s3_screenshot_key
-            created_s3_keys.append(s3_screenshot_key)
+            return s3_screenshot_key
+
+        async def publish_page_progress(pages_processed: int, total_pages: int) -> None:
+            if not user_id_hash:
+                return
+            await task.publish_websocket_event(
+                user_id_hash,
+                "pdf_processing_progress",
+                {
+                    "user_id": user_id,
+                    "embed_id": embed_id,
+                    "chat_id": arguments.get("chat_id"),
+                    "stage": "pages",
+                    "pages_processed": pages_processed,
+                    "page_count": total_pages,
+                },
+            )
 
-        logger.info(f"{log_prefix} All screenshots uploaded")
+        async def detect_toc_and_legend() -> tuple:
+            if page_count >= 10:
+                return await asyncio.gather(
+                    detect_toc(ocr_pages, task._secrets_manager, log_prefix),
+                    detect_legend(ocr_pages, task._secrets_manager, log_prefix),
+                )
+            logger.info(
+                f"{log_prefix} Skipping legend detection (page_count={page_count} < 10)"
+            )
+            toc = await detect_toc(ocr_pages, task._secrets_manager, log_prefix)
+            return toc, {"detected": False, "source_pages": [], "content": "", "chapters": []}
+
+        pipeline_task = asyncio.create_task(
+            run_page_pipeline(
+                iter_pdf_pages(pdf_bytes, log_prefix),
+                page_count=len(ocr_pages) or page_count,
+                store_page=store_page,
+                check_page=check_page,
+                on_progress=publish_page_progress,
+                log_prefix=log_prefix,
+            )
+        )
+        toc_task = asyncio.create_task(detect_toc_and_legend())
+        try:
+            screenshot_keys_by_page, (toc_result, legend_result) = await asyncio.gather(
+                pipeline_task, toc_task
+            )
+        except BaseException:
+            for pending_task in (pipeline_task, toc_task):
+                pending_task.cancel()
+            await asyncio.gather(pipeline_task, toc_task, return_exceptions=True)
+            # Pages that passed their own check may already be stored; a retry uploads
+            # under new keys, so remove them now instead of orphaning them.
+            for s3_obj_key in started_page_keys:
+                try:
+                    await task._s3_service.delete_file(bucket_key=PDF_S3_BUCKET, file_key=s3_obj_key)
+                except Exception as delete_err:
+                    logger.warning(f"{log_prefix} Failed to delete S3 object {s3_obj_key}: {delete_err}")
+            raise
+
+        screenshot_s3_keys: Dict[str, str] = {
+            str(page_num): key for page_num, key in screenshot_keys_by_page.items()
+        }
+        created_s3_keys.extend(screenshot_s3_keys.values())
+        logger.info(
+            f"{log_prefix} All {len(screenshot_s3_keys)} screenshots scanned and uploaded; "
+            f"TOC detected={toc_result['detected']}, legend detected={legend_result['detected']}"
+        )
 
         # -----------------------------------------------------------------------
         # Step 7: Encrypt and upload extracted OCR images
@@ -426,6 +500,18 @@ async def _async_process_pdf(task: BaseServiceTask, arguments: Dict[str, Any]) -
             f"{log_prefix} OCR blob uploaded: {len(ocr_blob_bytes)} bytes → {ocr_s3_key}"
         )
 
+        # Search index for pdf.search (BM25 over sharded postings, see
+        # services/search_index.py). Non-fatal: without it pdf.search falls back
+        # to scanning the OCR blob.
+        search_index_s3_key = await _upload_search_index(
+            task=task,
+            pages={page["page_num"]: page.get("markdown", "") for page in ocr_pages},
+            output_aesgcm=output_aesgcm,
+            key_prefix=f"chatfiles/{user_id}/{timestamp}_{unique_id}_pdf_{embed_id[:8]}",
+            created_s3_keys=created_s3_keys,
+            log_prefix=log_prefix,
+        )
+
         # -----------------------------------------------------------------------
         # Step 9: Build embed TOON content and send to client via WebSocket
         # -----------------------------------------------------------------------
@@ -449,6 +535,7 @@ async def _async_process_pdf(task: BaseServiceTask, arguments: Dict[str, Any]) -
             },
             # S3 keys for skills to access artefacts
             "ocr_data_s3_key": ocr_s3_key,
+            "search_index_s3_key": search_index_s3_key,
             "screenshot_s3_keys": screenshot_s3_keys,
             "extracted_image_s3_keys": extracted_image_s3_keys,
             # Plaintext AES key for CLIENT-SIDE decryption of screenshots.
@@ -654,9 +741,7 @@ async def _try_copy_ocr_cache(
 
         # Add to chat embed index
         if chat_id:
-            chat_index_key = f"chat:{chat_id}:embed_ids"
-            await client.sadd(chat_index_key, target_embed_id)
-            await client.expire(chat_index_key, 259200)
+            await cache_service.add_embed_id_to_chat_index(chat_id, target_embed_id, ttl=259200)
 
         logger.info(f"{log_prefix} OCR cache copied: {source_key} → {target_key}")
 
@@ -688,6 +773,66 @@ async def _try_copy_ocr_cache(
         return False
 
 
+async def _upload_search_index(
+    task: BaseServiceTask,
+    pages: Dict[int, str],
+    output_aesgcm: Any,
+    key_prefix: str,
+    created_s3_keys: List[str],
+    log_prefix: str,
+) -> Optional[str]:
+    """
+    Build the pdf.search inverted index and upload its parts to S3.
+
+    Every part is encrypted with the PDF's output key and a fresh nonce
+    (prepended, same as the other artefacts). Keys are recorded in
+    created_s3_keys before uploading so a failed run cleans them up.
+
+    Returns the manifest's S3 key, or None if indexing failed.
+    """
+    from backend.apps.pdf.services.search_index import build_search_index, encode_index_part
+
+    async def upload_part(s3_part_key: str, obj: Any) -> None:
+        part_nonce = os.urandom(12)
+        encrypted = part_nonce + output_aesgcm.encrypt(part_nonce, encode_index_part(obj), None)
+        created_s3_keys.append(s3_part_key)
+        await task._s3_service.upload_file(
+            bucket_key=PDF_S3_BUCKET,
+            file_key=s3_part_key,
+            content=encrypted,
+            content_type="application/octet-stream",
+        )
+
+    try:
+        index = await asyncio.to_thread(build_search_index, pages)
+        manifest = index.manifest
+        manifest["shard_keys"] = [
+            f"{key_prefix}_index_s{shard_idx}.json.bin" for shard_idx in range(len(index.shards))
+        ]
+        for block_idx, block in enumerate(manifest["text_blocks"]):
+            block["key"] = f"{key_prefix}_index_t{block_idx}.json.bin"
+
+        await asyncio.gather(
+            *(upload_part(key, shard) for key, shard in zip(manifest["shard_keys"], index.shards)),
+            *(
+                upload_part(block["key"], text_block)
+                for block, text_block in zip(manifest["text_blocks"], index.text_blocks)
+            ),
+        )
+        # Manifest last: it is only referenced once every part it points to exists
+        manifest_key = f"{key_prefix}_index.json.bin"
+        await upload_part(manifest_key, manifest)
+    except Exception as e:
+        logger.warning(f"{log_prefix} Search index build/upload failed (non-fatal): {e}", exc_info=True)
+        return None
+
+    logger.info(
+        f"{log_prefix} Search index uploaded: {len(index.shards)} shards, "
+        f"{len(index.text_blocks)} text blocks → {manifest_key}"
+    )
+    return manifest_key
+
+
 async def _download_decrypt_pdf(
     s3_base_url: str,
     s3_key: str,
@@ -423,19 +423,20 @@ class SetReminderSkill(BaseSkill):
             # Generate reminder ID
             reminder_id = str(uuid.uuid4())
 
-            # Vault-encrypt user_id and chat IDs for DB storage (privacy)
+            # Vault-encrypt user_id and chat IDs for DB storage (privacy).
+            # Envelope mode: read back only via decrypt_with_user_key (reminder/tasks.py).
             encrypted_user_id, _ = await encryption_service.encrypt_with_user_key(
-                plaintext=user_id, key_id=user_vault_key_id
+                plaintext=user_id, key_id=user_vault_key_id, envelope=True
             )
             encrypted_target_chat_id = None
             if target_chat_id:
                 encrypted_target_chat_id, _ = await encryption_service.encrypt_with_user_key(
-                    plaintext=target_chat_id, key_id=user_vault_key_id
+                    plaintext=target_chat_id, key_id=user_vault_key_id, envelope=True
                 )
             encrypted_created_in_chat_id = None
             if chat_id:
                 encrypted_created_in_chat_id, _ = await encryption_service.encrypt_with_user_key(
-                    plaintext=chat_id, key_id=user_vault_key_id
+                    plaintext=chat_id, key_id=user_vault_key_id, envelope=True
                 )
 
             hashed_user_id = hashlib.sha256(user_id.encode()).hexdigest()
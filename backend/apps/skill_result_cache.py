@@ -0,0 +1,310 @@
+# backend/apps/skill_result_cache.py
+#
+# Shared (cross-user) cache for the results of public skills.
+#
+# Skills like web and news search return the same public data to every user who
+# sends the same parameters, yet called their upstream API (and the sanitization
+# LLM) on every invocation. A skill opts in by setting
+# BaseSkill.result_cache_ttl_seconds and listing its request fields in
+# BaseSkill.result_cache_params; BaseSkill._process_requests_in_parallel then
+# routes each request through get_or_compute():
+#
+# - Key: app/skill plus the SHA-256 of the normalized allow-listed fields
+#   (strings trimmed, whitespace collapsed and case-folded; None dropped).
+#   Fields the request leaves out (or sends as None / "") take the skill's
+#   BaseSkill.result_cache_defaults first, so a request spelling out a default
+#   shares its entry with one that omits it.
+#   A request carrying any other field (besides "id") bypasses the cache, so
+#   nothing that is not declared public can reach a key or a shared value.
+# - Only successful, non-empty results are stored, without their request id.
+# - An entry is fresh for the skill's TTL, then served stale for up to
+#   result_cache_stale_seconds while one worker refreshes it in the background.
+# - Single flight: on a miss, the worker that wins a SET NX lock calls the
+#   upstream API; the others (in any process) poll for its result and only call
+#   upstream themselves if it does not arrive before the lock expires.
+# - Hits, stale hits, coalesced waits and misses are counted per skill in a
+#   Dragonfly hash; get_skill_result_cache_metrics() reports the hit ratio.
+#
+# Any cache failure falls through to calling the skill directly.
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import math
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Mapping, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+SKILL_RESULT_KEY_PREFIX = "skill_result:"
+SKILL_RESULT_LOCK_PREFIX = "skill_result_lock:"
+SKILL_RESULT_STATS_KEY = "skill_result:stats"
+
+# How long a miss may take upstream before another worker stops waiting for it
+LOCK_TTL_SECONDS = 30.0
+WAIT_POLL_SECONDS = 0.05
+
+_COUNTERS = ("hit", "stale", "coalesced", "miss")
+
+# Delete the single-flight lock only if this worker still owns it
+_RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_in_background_refresh: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "skill_result_cache_background_refresh", default=False
+)
+# Strong references so refresh tasks are not garbage collected mid-flight
+_background_refreshes: Set["asyncio.Task[None]"] = set()
+_local_stats: Dict[str, Dict[str, int]] = {}
+
+
+@dataclass(frozen=True)
+class SkillCachePolicy:
+    name: str  # "<app_id>.<skill_id>"
+    ttl_seconds: float
+    stale_seconds: float
+    params: FrozenSet[str]
+    # Values the skill uses for a field that is missing, None or ""
+    defaults: Mapping[str, Any] = field(default_factory=dict)
+
+
+def is_background_refresh() -> bool:
+    """True while a skill runs to refresh a stale entry, i.e. no user is waiting for this call."""
+    return _in_background_refresh.get()
+
+
+def _normalize(value: Any) -> Any:
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else value
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    raise TypeError(f"uncacheable parameter type {type(value).__name__}")
+
+
+def cache_key_for(policy: SkillCachePolicy, req: Dict[str, Any]) -> Optional[str]:
+    """Shared cache key for a request, or None when it carries fields the skill has not declared public."""
+    public: Dict[str, Any] = {}
+    for name, value in req.items():
+        if name == "id":
+            continue
+        if name not in policy.params:
+            return None
+        if value is None or value == "":
+            continue
+        try:
+            public[name] = _normalize(value)
+        except TypeError:
+            return None
+    for name, value in policy.defaults.items():
+        if name not in public and value is not None:
+            public[name] = _normalize(value)
+    canonical = json.dumps(public, sort_keys=True, separators=(",", ":"))
+    return f"{SKILL_RESULT_KEY_PREFIX}{policy.name}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()}"
+
+
+def _cacheable_payload(result: Any) -> Optional[list]:
+    # Results are (request_id, items, error, ...); store everything but the request id
+    if not isinstance(result, tuple) or len(result) < 3:
+        return None
+    if result[2] or not result[1]:
+        return None
+    return list(result[1:])
+
+
+async def _count(client: Any, policy: SkillCachePolicy, counter: str) -> None:
+    stats = _local_stats.setdefault(policy.name, dict.fromkeys(_COUNTERS, 0))
+    stats[counter] += 1
+    try:
+        await client.hincrby(SKILL_RESULT_STATS_KEY, f"{policy.name}|{counter}", 1)
+    except Exception as e:
+        logger.debug(f"Could not count skill cache {counter} for '{policy.name}': {e}")
+
+
+async def _read(client: Any, key: str) -> Optional[Dict[str, Any]]:
+    raw = await client.get(key)
+    if not raw:
+        return None
+    try:
+        entry = json.loads(raw)
+        return entry if isinstance(entry, dict) and isinstance(entry.get("payload"), list) else None
+    except (json.JSONDecodeError, TypeError, ValueError):
+        return None
+
+
+async def _store(client: Any, policy: SkillCachePolicy, key: str, result: Any) -> None:
+    payload = _cacheable_payload(result)
+    if payload is None:
+        return
+    try:
+        value = json.dumps({"payload": payload, "fresh_until": time.time() + policy.ttl_seconds})
+    except (TypeError, ValueError) as e:
+        logger.debug(f"Result of '{policy.name}' is not JSON-serializable, not caching it: {e}")
+        return
+    try:
+        await client.set(key, value, ex=max(1, math.ceil(policy.ttl_seconds + policy.stale_seconds)))
+    except Exception as e:
+        logger.warning(f"Could not store shared result for '{policy.name}': {e}")
+
+
+async def _acquire(client: Any, key: str, token: str) -> bool:
+    return bool(await client.set(
+        f"{SKILL_RESULT_LOCK_PREFIX}{key}", token, nx=True, px=int(LOCK_TTL_SECONDS * 1000)
+    ))
+
+
+async def _release(client: Any, key: str, token: str) -> None:
+    try:
+        await client.eval(_RELEASE_LOCK_LUA, 1, f"{SKILL_RESULT_LOCK_PREFIX}{key}", token)
+    except Exception as e:
+        logger.debug(f"Could not release skill cache lock for '{key}': {e}")
+
+
+async def _wait_for_flight(client: Any, key: str) -> Optional[Dict[str, Any]]:
+    """Poll for the entry another worker is computing; None once its lock is gone or expired without one."""
+    deadline = time.monotonic() + LOCK_TTL_SECONDS
+    while time.monotonic() < deadline:
+        await asyncio.sleep(WAIT_POLL_SECONDS)
+        entry = await _read(client, key)
+        if entry is not None:
+            return entry
+        if not await client.exists(f"{SKILL_RESULT_LOCK_PREFIX}{key}"):
+            return None
+    return None
+
+
+async def _refresh(client: Any, policy: SkillCachePolicy, key: str, token: str,
+                   compute: Callable[[], Awaitable[Any]]) -> None:
+    _in_background_refresh.set(True)
+    try:
+        await _store(client, policy, key, await compute())
+    except Exception as e:
+        logger.warning(f"Background refresh of a stale '{policy.name}' result failed: {e}")
+    finally:
+        await _release(client, key, token)
+
+
+async def _refresh_in_background(client: Any, policy: SkillCachePolicy, key: str,
+                                 compute: Callable[[], Awaitable[Any]]) -> None:
+    token = uuid.uuid4().hex
+    if not await _acquire(client, key, token):
+        return  # another worker is already refreshing it
+    task = asyncio.create_task(_refresh(client, policy, key, token, compute))
+    _background_refreshes.add(task)
+    task.add_done_callback(_background_refreshes.discard)
+
+
+async def _get_client(cache_service: Any) -> Any:
+    if cache_service is None:
+        from backend.core.api.app.services.cache import CacheService
+        cache_service = CacheService()
+    return await cache_service.client
+
+
+async def get_or_compute(
+    policy: SkillCachePolicy,
+    req: Dict[str, Any],
+    request_id: Any,
+    compute: Callable[[], Awaitable[Any]],
+    cache_service: Optional[Any] = None,
+) -> Any:
+    """
+    Return a skill's (request_id, items, error, ...) result for one request,
+    from the shared cache when possible (see the module header).
+
+    Args:
+        policy: The skill's cache policy
+        req: The request dict; only its allow-listed fields form the key
+        request_id: The id to put in front of a cached result
+        compute: Calls the skill for this request (the upstream call)
+        cache_service: Optional CacheService (creates a new one if not provided)
+    """
+    key = cache_key_for(policy, req)
+    if key is None:
+        return await compute()
+
+    try:
+        client = await _get_client(cache_service)
+        entry = await _read(client, key) if client else None
+    except Exception as e:
+        logger.warning(f"Shared skill cache unavailable for '{policy.name}', calling the skill directly: {e}")
+        client = None
+    if not client:
+        return await compute()
+
+    try:
+        if entry is not None:
+            if time.time() < entry.get("fresh_until", 0):
+                await _count(client, policy, "hit")
+            else:
+                await _count(client, policy, "stale")
+                await _refresh_in_background(client, policy, key, compute)
+            return (request_id, *entry["payload"])
+
+        token = uuid.uuid4().hex
+        if not await _acquire(client, key, token):
+            entry = await _wait_for_flight(client, key)
+            if entry is not None:
+                await _count(client, policy, "coalesced")
+                return (request_id, *entry["payload"])
+            token = None
+    except Exception as e:
+        logger.warning(f"Shared skill cache lookup failed for '{policy.name}', calling the skill directly: {e}")
+        return await compute()
+
+    await _count(client, policy, "miss")
+    try:
+        result = await compute()
+        await _store(client, policy, key, result)
+        return result
+    finally:
+        if token is not None:
+            await _release(client, key, token)
+
+
+def _with_hit_ratio(counters: Dict[str, int]) -> Dict[str, Any]:
+    total = sum(counters.get(counter, 0) for counter in _COUNTERS)
+    served = total - counters.get("miss", 0)
+    return {**counters, "hit_ratio": round(served / total, 4) if total else 0.0}
+
+
+def skill_result_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """This process's hit/stale/coalesced/miss counts and hit ratio per skill."""
+    return {name: _with_hit_ratio(dict(counters)) for name, counters in _local_stats.items()}
+
+
+async def get_skill_result_cache_metrics(cache_service: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Shared cache metrics per skill: totals across all workers (from Dragonfly)
+    and this process's local counters. hit_ratio counts fresh hits, stale hits
+    and coalesced waits as served from the cache.
+
+    Returns:
+        {"skills": {skill: {"hit", "stale", "coalesced", "miss", "hit_ratio"}},
+         "process": skill_result_cache_stats()}
+    """
+    skills: Dict[str, Dict[str, int]] = {}
+    client = await _get_client(cache_service)
+    if client:
+        raw = await client.hgetall(SKILL_RESULT_STATS_KEY) or {}
+        for field, value in raw.items():
+            field = field.decode("utf-8") if isinstance(field, bytes) else str(field)
+            name, _, counter = field.rpartition("|")
+            skills.setdefault(name, dict.fromkeys(_COUNTERS, 0))[counter] = int(value)
+    return {
+        "skills": {name: _with_hit_ratio(counters) for name, counters in skills.items()},
+        "process": skill_result_cache_stats(),
+    }
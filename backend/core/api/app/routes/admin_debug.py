@@ -2952,6 +2952,50 @@ async def get_allowed_services(
     }
 
 
+@router.get("/rate-limits", include_in_schema=False)
+@limiter.limit("30/minute")
+async def get_provider_rate_limits(
+    request: Request,
+    admin_user: User = Depends(require_admin_api_key),
+    cache_service: CacheService = Depends(get_cache_service),
+) -> Dict[str, Any]:
+    """
+    Provider rate limit throttling (apps/ai/processing/rate_limiting.py).
+
+    Returns:
+      - buckets: token leases, granted tokens, throttled checks and throttle ratio
+        per provider/model bucket, summed over all workers
+      - process: this API process's local allowed/throttled counts per bucket
+    """
+    from backend.apps.ai.processing.rate_limiting import get_rate_limit_metrics
+
+    metrics = await get_rate_limit_metrics(cache_service)
+    metrics["generated_at"] = datetime.now(timezone.utc).isoformat()
+    return metrics
+
+
+@router.get("/skill-cache", include_in_schema=False)
+@limiter.limit("30/minute")
+async def get_skill_result_cache(
+    request: Request,
+    admin_user: User = Depends(require_admin_api_key),
+    cache_service: CacheService = Depends(get_cache_service),
+) -> Dict[str, Any]:
+    """
+    Shared cross-user skill result cache (apps/skill_result_cache.py).
+
+    Returns:
+      - skills: fresh hits, stale hits, coalesced waits, misses and hit ratio per
+        app.skill, summed over all API processes and Celery workers
+      - process: this API process's local counts per app.skill
+    """
+    from backend.apps.skill_result_cache import get_skill_result_cache_metrics
+
+    metrics = await get_skill_result_cache_metrics(cache_service)
+    metrics["generated_at"] = datetime.now(timezone.utc).isoformat()
+    return metrics
+
+
 # ============================================================================
 # NEWSLETTER INSPECTION
 # ============================================================================
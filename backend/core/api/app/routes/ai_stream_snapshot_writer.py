@@ -0,0 +1,295 @@
+# backend/core/api/app/routes/ai_stream_snapshot_writer.py
+#
+# Coalescing writer for in-flight AI stream snapshots
+# (active_ai_stream_snapshot:{chat_id}, read by active_chat_handler.py when a
+# device opens a chat mid-stream or a delta client asks for a resync).
+#
+# The stream listener used to SET the full payload for every non-final chunk.
+# It now hands each frame to this writer without awaiting. Per chat, the first
+# update is written immediately and later ones are coalesced: at most one write
+# per flush interval, always with the latest payload. Final chunks cancel any
+# pending write and delete the snapshot; interrupted frames flush immediately.
+#
+# When several API nodes receive the same stream (offline user, user connected
+# to more than one node) only the node holding the snapshot owner lease for the
+# message writes. Deletes are not tied to the lease: whichever node receives the
+# final chunk deletes the snapshot if it still belongs to that message. Frames
+# still pending on this node are served from memory, so coalescing never makes a
+# local resync older than the last forwarded chunk.
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Union
+
+from backend.core.api.app.routes.handlers.websocket_handlers.active_chat_handler import (
+    AI_STREAM_SNAPSHOT_TTL_SECONDS,
+    ai_stream_snapshot_cache_key,
+)
+
+logger = logging.getLogger(__name__)
+
+AI_STREAM_SNAPSHOT_FLUSH_INTERVAL_MS = int(os.getenv("AI_STREAM_SNAPSHOT_FLUSH_INTERVAL_MS", "250"))
+# Lease after which another node may take over snapshot writes for a message
+AI_STREAM_SNAPSHOT_OWNER_TTL_SECONDS = 15
+_MAX_TRACKED_OWNERSHIP = 4096
+# Owner lease value set when a message's stream has ended, so no node takes over
+_FINAL_OWNER_TOMBSTONE = "__final__"
+
+try:
+    from prometheus_client import Counter
+
+    _SNAPSHOT_UPDATES = Counter(
+        "ai_stream_snapshot_updates_total",
+        "AI stream snapshot updates handed to the coalescing writer",
+    )
+    _SNAPSHOT_WRITES = Counter(
+        "ai_stream_snapshot_writes_total",
+        "AI stream snapshot cache writes performed",
+        ["op"],  # 'set', 'delete'
+    )
+    _SNAPSHOT_WRITES_SAVED = Counter(
+        "ai_stream_snapshot_writes_saved_total",
+        "AI stream snapshot updates that did not cause a cache write",
+        ["reason"],  # 'coalesced', 'not_owner'
+    )
+except ImportError:  # pragma: no cover - prometheus_client is an API dependency
+    _SNAPSHOT_UPDATES = _SNAPSHOT_WRITES = _SNAPSHOT_WRITES_SAVED = None
+
+
+def _snapshot_owner_key(message_id: str) -> str:
+    return f"active_ai_stream_snapshot_owner:{message_id}"
+
+
+# A full-content payload, or a zero-argument callable building it on demand
+SnapshotPayload = Union[Dict[str, Any], Callable[[], Dict[str, Any]]]
+
+
+def _materialize(payload: Optional[SnapshotPayload]) -> Optional[Dict[str, Any]]:
+    return payload() if callable(payload) else payload
+
+
+@dataclass
+class _ChatSnapshotState:
+    latest: Optional[SnapshotPayload] = None
+    message_id: Optional[str] = None
+    dirty: bool = False
+    final: bool = False
+    wake: asyncio.Event = field(default_factory=asyncio.Event)
+    task: Optional[asyncio.Task] = None
+
+
+class AIStreamSnapshotWriter:
+    """Per-chat coalescing of snapshot writes; one flusher task per active chat."""
+
+    def __init__(self, flush_interval_ms: int = AI_STREAM_SNAPSHOT_FLUSH_INTERVAL_MS):
+        self.flush_interval = max(0, flush_interval_ms) / 1000.0
+        self.cache_service: Any = None
+        self.node_id: Optional[str] = None
+        self._states: Dict[str, _ChatSnapshotState] = {}
+        # message_id -> (owns, decision_expires_at)
+        self._ownership: "OrderedDict[str, tuple[bool, float]]" = OrderedDict()
+        self.stats = {
+            "updates": 0,
+            "writes": 0,
+            "deletes": 0,
+            "saved_coalesced": 0,
+            "saved_not_owner": 0,
+            "errors": 0,
+        }
+
+    def configure(self, cache_service: Any, node_id: Optional[str] = None) -> None:
+        self.cache_service = cache_service
+        self.node_id = node_id
+
+    @property
+    def writes_saved(self) -> int:
+        return self.stats["saved_coalesced"] + self.stats["saved_not_owner"]
+
+    def get_pending(self, chat_id: str) -> Optional[Dict[str, Any]]:
+        """Latest snapshot payload for a chat that has not been flushed yet."""
+        state = self._states.get(chat_id)
+        if state is None or state.latest is None:
+            return None
+        state.latest = _materialize(state.latest)
+        return state.latest
+
+    def submit(
+        self,
+        chat_id: str,
+        payload: SnapshotPayload,
+        frame: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Record the latest full-content payload of a chat's stream (non-blocking).
+
+        `payload` may be a callable that builds the payload; it is only called when
+        the snapshot is written or read, so coalesced frames are never joined.
+        `frame` is the raw stream frame used for the message id and interrupt flags
+        when `payload` is deferred.
+        """
+        meta = frame if frame is not None else (payload if isinstance(payload, dict) else {})
+        state = self._states.get(chat_id)
+        if state is None:
+            state = self._states[chat_id] = _ChatSnapshotState()
+        elif state.dirty:
+            # The previous update is replaced before it was written
+            self._count_saved("coalesced")
+        self.stats["updates"] += 1
+        if _SNAPSHOT_UPDATES is not None:
+            _SNAPSHOT_UPDATES.inc()
+        state.latest = payload
+        state.message_id = meta.get("message_id")
+        state.dirty = True
+        state.final = False
+        if meta.get("interrupted_by_revocation") or meta.get("interrupted_by_soft_limit"):
+            state.wake.set()
+        self._ensure_flusher(chat_id, state)
+
+    def submit_final(self, chat_id: str, message_id: Optional[str] = None) -> None:
+        """The stream ended: drop pending updates and delete the snapshot (non-blocking)."""
+        state = self._states.get(chat_id)
+        if state is None:
+            state = self._states[chat_id] = _ChatSnapshotState()
+        elif state.dirty:
+            self._count_saved("coalesced")
+        state.latest = None
+        state.message_id = message_id or state.message_id
+        state.final = True
+        state.dirty = False
+        state.wake.set()
+        self._ensure_flusher(chat_id, state)
+
+    async def flush(self) -> None:
+        """Wait for all pending writes (used on shutdown and in tests)."""
+        for state in list(self._states.values()):
+            state.wake.set()
+        tasks = [state.task for state in self._states.values() if state.task and not state.task.done()]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _count_saved(self, reason: str) -> None:
+        self.stats[f"saved_{reason}"] += 1
+        if _SNAPSHOT_WRITES_SAVED is not None:
+            _SNAPSHOT_WRITES_SAVED.labels(reason=reason).inc()
+
+    def _ensure_flusher(self, chat_id: str, state: _ChatSnapshotState) -> None:
+        if state.task is None or state.task.done():
+            state.task = asyncio.create_task(self._run(chat_id, state))
+
+    async def _run(self, chat_id: str, state: _ChatSnapshotState) -> None:
+        try:
+            while True:
+                if state.final:
+                    state.final = False
+                    await self._delete(chat_id, state.message_id)
+                    # A new stream in the same chat may have started meanwhile
+                    continue
+                if not state.dirty:
+                    return
+                payload = state.latest
+                state.dirty = False
+                await self._write(chat_id, _materialize(payload))
+                # Rate limit: wait out the interval unless a final/interrupt frame arrives
+                state.wake.clear()
+                try:
+                    await asyncio.wait_for(state.wake.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.debug(f"AI stream snapshot writer: flush failed for chat {chat_id}: {e}")
+        finally:
+            if self._states.get(chat_id) is state and not state.dirty:
+                del self._states[chat_id]
+
+    async def _owns_snapshot(self, message_id: Optional[str]) -> bool:
+        if not message_id or not self.node_id:
+            return True
+        now = time.monotonic()
+        decision = self._ownership.get(message_id)
+        if decision is not None and decision[1] > now:
+            return decision[0]
+
+        owns = True
+        try:
+            client = await self.cache_service.client
+            if client:
+                key = _snapshot_owner_key(message_id)
+                acquired = await client.set(key, self.node_id, nx=True, ex=AI_STREAM_SNAPSHOT_OWNER_TTL_SECONDS)
+                if not acquired:
+                    current = await client.get(key)
+                    if isinstance(current, bytes):
+                        current = current.decode("utf-8")
+                    owns = current == self.node_id
+                    if owns:
+                        await client.expire(key, AI_STREAM_SNAPSHOT_OWNER_TTL_SECONDS)
+        except Exception as e:
+            logger.debug(f"AI stream snapshot writer: owner check failed for message {message_id}: {e}")
+
+        # Owners re-check (renewing the lease) well before it expires; others re-check
+        # after it could have expired so they take over from a node that went away.
+        recheck = AI_STREAM_SNAPSHOT_OWNER_TTL_SECONDS / 3 if owns else AI_STREAM_SNAPSHOT_OWNER_TTL_SECONDS
+        self._ownership[message_id] = (owns, now + recheck)
+        self._ownership.move_to_end(message_id)
+        while len(self._ownership) > _MAX_TRACKED_OWNERSHIP:
+            self._ownership.popitem(last=False)
+        return owns
+
+    async def _write(self, chat_id: str, payload: Optional[Dict[str, Any]]) -> None:
+        if payload is None or self.cache_service is None:
+            return
+        message_id = payload.get("message_id")
+        if not await self._owns_snapshot(message_id):
+            self._count_saved("not_owner")
+            return
+        await self.cache_service.set(
+            ai_stream_snapshot_cache_key(chat_id),
+            payload,
+            ttl=AI_STREAM_SNAPSHOT_TTL_SECONDS,
+        )
+        self.stats["writes"] += 1
+        if _SNAPSHOT_WRITES is not None:
+            _SNAPSHOT_WRITES.labels(op="set").inc()
+
+    async def _delete(self, chat_id: str, message_id: Optional[str]) -> None:
+        # Any node that receives the final chunk deletes the snapshot: with node
+        # routing the owner often never sees it. The message id check keeps the
+        # snapshot of a newer stream in the same chat.
+        if self.cache_service is None:
+            return
+        key = ai_stream_snapshot_cache_key(chat_id)
+        if message_id and hasattr(self.cache_service, "get"):
+            current = await self.cache_service.get(key)
+            if isinstance(current, dict) and current.get("message_id") not in (None, message_id):
+                return
+        if hasattr(self.cache_service, "delete"):
+            await self.cache_service.delete(key)
+            self.stats["deletes"] += 1
+            if _SNAPSHOT_WRITES is not None:
+                _SNAPSHOT_WRITES.labels(op="delete").inc()
+        if message_id:
+            self._ownership.pop(message_id, None)
+            await self._release_owner_lease(message_id)
+
+    async def _release_owner_lease(self, message_id: str) -> None:
+        """Hand the owner lease to a tombstone so the owner stops writing once it re-checks."""
+        try:
+            client = await self.cache_service.client
+            if client:
+                await client.set(
+                    _snapshot_owner_key(message_id),
+                    _FINAL_OWNER_TOMBSTONE,
+                    ex=AI_STREAM_SNAPSHOT_OWNER_TTL_SECONDS,
+                )
+        except Exception as e:
+            logger.debug(f"AI stream snapshot writer: releasing owner lease failed for message {message_id}: {e}")
+
+
+# Process-wide writer used by the stream listener (configured when it starts)
+ai_stream_snapshot_writer = AIStreamSnapshotWriter()
@@ -1198,7 +1198,10 @@ async def get_api_key_budget_spend(
             },
             no_cache=True,
         )
-        return int(items[0].get("total_credits", 0)) if items else 0
+        pending = await directus_service.usage.get_pending_summary_credits(
+            user_id_hash, "api_key", api_key_hash, date=now.strftime("%Y-%m-%d")
+        )
+        return (int(items[0].get("total_credits", 0)) if items else 0) + pending
 
     if period == "monthly":
         items = await directus_service.get_items(
@@ -1212,7 +1215,10 @@ async def get_api_key_budget_spend(
             },
             no_cache=True,
         )
-        return int(items[0].get("total_credits", 0)) if items else 0
+        pending = await directus_service.usage.get_pending_summary_credits(
+            user_id_hash, "api_key", api_key_hash, year_month=now.strftime("%Y-%m")
+        )
+        return (int(items[0].get("total_credits", 0)) if items else 0) + pending
 
     filters = {
         "filter[user_id_hash][_eq]": user_id_hash,
@@ -5,6 +5,7 @@ from typing import Optional
 
 from backend.core.api.app.services.directus import DirectusService
 from backend.core.api.app.services.cache import CacheService
+from backend.core.api.app.services.credit_ledger import CreditLedger
 from backend.core.api.app.utils.encryption import EncryptionService
 from backend.core.api.app.routes.auth_routes.auth_dependencies import (
     get_directus_service, get_cache_service, get_encryption_service, get_current_user # Import the correct dependency
@@ -73,34 +74,43 @@ async def accept_gift(
     logger.info(f"User {user_id} accepting gift of {gift_amount} credits. Current balance: {current_credits}.")
 
     try:
-        # Calculate new balance
-        current_credits = current_credits + gift_amount
-
-        # Encrypt the new balance
-        encrypted_current_credits_tuple = await encryption_service.encrypt_with_user_key(str(current_credits), vault_key_id)
-        encrypted_current_credits = encrypted_current_credits_tuple[0]
-
-        # Update Directus: Set new balance, clear gift field, set last_opened
+        # Clear the gift first, so a failure while adding the credits can never let
+        # it be accepted twice
         directus_update_payload = {
-            "encrypted_credit_balance": encrypted_current_credits,
             "last_opened": "/chat/new",
             "encrypted_gifted_credits_for_signup": None # Clear the gift field
         }
-        update_directus_success = await directus_service.update_user(user_id, directus_update_payload)
-
-        if not update_directus_success:
+        if not await directus_service.update_user(user_id, directus_update_payload):
             logger.error(f"Failed to update Directus record for user {user_id} after accepting gift.")
             # Don't update cache if Directus failed
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update user record.")
 
-        logger.info(f"Successfully updated Directus for user {user_id}. New balance (encrypted): {encrypted_current_credits[:10]}..., Last opened: /chat/new, Gift cleared.")
-
-        # Update Cache: Set new balance, clear gift field, set last_opened
+        # Add the credits through the ledger so they cannot race with concurrent charges
+        ledger_result = await CreditLedger(cache_service).grant(
+            user_id, gift_amount, "signup_gift", "accept", directus_service, encryption_service
+        )
         cache_update_payload = {
-            "credits": current_credits,
             "last_opened": "/chat/new",
             "gifted_credits_for_signup": None # Clear the gift field from cache
         }
+        if ledger_result.applied:
+            current_credits = ledger_result.balance
+        else:
+            # Calculate new balance
+            current_credits = current_credits + gift_amount
+
+            # Encrypt the new balance
+            encrypted_current_credits_tuple = await encryption_service.encrypt_with_user_key(str(current_credits), vault_key_id)
+            encrypted_current_credits = encrypted_current_credits_tuple[0]
+
+            if not await directus_service.update_user(user_id, {"encrypted_credit_balance": encrypted_current_credits}):
+                logger.error(f"Failed to update Directus credit balance for user {user_id} after accepting gift.")
+                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to update user record.")
+            cache_update_payload["credits"] = current_credits
+
+        logger.info(f"Successfully updated Directus for user {user_id}. Last opened: /chat/new, Gift cleared.")
+
+        # Update Cache: clear gift field, set last_opened (and the balance unless the ledger set it)
         update_cache_success = await cache_service.update_user(user_id, cache_update_payload)
 
         if not update_cache_success:
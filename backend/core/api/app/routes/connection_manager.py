@@ -4,6 +4,8 @@ from fastapi import WebSocket
 from starlette.websockets import WebSocketState
 from typing import Dict, Tuple, Optional
 
+from backend.shared.python_utils.stream_delta import STREAM_WIRE_MODE_FULL, normalize_stream_wire_mode
+
 logger = logging.getLogger(__name__)
 
 
@@ -83,8 +85,17 @@ class ConnectionManager:
         # Structure: {(user_id, device_fingerprint_hash): bool} tracks whether
         # a client is foregrounded and able to consume plaintext AI completions.
         self.connection_foreground_state: Dict[Tuple[str, str], bool] = {}
+        # Structure: {(user_id, device_fingerprint_hash): "full" | "delta"} AI stream wire mode
+        # negotiated by the client via `set_stream_wire_mode`. Missing = legacy full frames.
+        self.connection_stream_wire_mode: Dict[Tuple[str, str], str] = {}
         # Structure: {(user_id, device_fingerprint_hash): asyncio.Task} for disconnect grace period tasks
         self.grace_period_tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+        # Optional WebSocketNodeRegistry (ws_node_registry.py). When attached, users are
+        # registered for this node on first connect and removed when their last connection ends.
+        self.node_registry = None
+
+    def attach_node_registry(self, node_registry) -> None:
+        self.node_registry = node_registry
 
     async def connect(self, websocket: WebSocket, user_id: str, device_fingerprint_hash: str):
         await websocket.accept()
@@ -105,7 +116,8 @@ class ConnectionManager:
                 del self.reverse_lookup[old_ws_id]
                 logger.debug(f"Cleaned up reverse_lookup for old ws_id {old_ws_id} during connect.")
         
-        if user_id not in self.active_connections:
+        is_first_connection_on_node = user_id not in self.active_connections
+        if is_first_connection_on_node:
             self.active_connections[user_id] = {}
         
         self.active_connections[user_id][device_fingerprint_hash] = websocket
@@ -119,6 +131,12 @@ class ConnectionManager:
             logger.debug(f"WebSocket re-established: User {user_id}, Device {device_fingerprint_hash}. Active chat: {self.active_chat_per_connection[connection_key]}.")
         self.connection_foreground_state[connection_key] = True
 
+        if is_first_connection_on_node and self.node_registry is not None:
+            try:
+                await self.node_registry.register_user(user_id)
+            except Exception as e:
+                logger.warning(f"Failed to register user {user_id} with the WS node registry: {e}")
+
     def disconnect(self, websocket: WebSocket, reason: str = "Unknown"):
         ws_id = id(websocket)
         if ws_id not in self.reverse_lookup:
@@ -193,12 +211,18 @@ class ConnectionManager:
                 if not user_connections:
                     del self.active_connections[user_id]
                     logger.debug(f"Finalized: Removed user {user_id} from active_connections as no devices are left after grace period.")
+                    if self.node_registry is not None:
+                        try:
+                            await self.node_registry.unregister_user(user_id)
+                        except Exception as e:
+                            logger.warning(f"Failed to unregister user {user_id} from the WS node registry: {e}")
                 
                 # Clean up active chat tracking only if we actually removed the connection
                 if connection_key in self.active_chat_per_connection:
                     del self.active_chat_per_connection[connection_key]
                     logger.debug(f"Finalized: Cleared active chat tracking for {user_id}/{device_fingerprint_hash} (ws_id: {ws_id_to_finalize}) after grace period.")
                 self.connection_foreground_state.pop(connection_key, None)
+                self.connection_stream_wire_mode.pop(connection_key, None)
             else:
                 # This case should ideally be caught by the check at the beginning of this method.
                 logger.warning(f"Finalize disconnect for {user_id}/{device_fingerprint_hash}: ws_id {ws_id_to_finalize} was expected, but found ws_id {id(user_connections[device_fingerprint_hash])}. Session might have been rapidly replaced. Reverse lookup for {ws_id_to_finalize} cleaned if it was still pointing here.")
@@ -431,6 +455,19 @@ class ConnectionManager:
                 f"User {user_id}, Device {device_fingerprint_hash}: Attempted to set foreground state, but connection not found."
             )
 
+    def set_stream_wire_mode(self, user_id: str, device_fingerprint_hash: str, mode: Optional[str]) -> str:
+        """Record the AI stream wire mode a connection negotiated. Returns the effective mode."""
+        effective_mode = normalize_stream_wire_mode(mode)
+        self.connection_stream_wire_mode[(user_id, device_fingerprint_hash)] = effective_mode
+        logger.debug(
+            f"User {user_id}, Device {device_fingerprint_hash}: Stream wire mode set to '{effective_mode}'."
+        )
+        return effective_mode
+
+    def get_stream_wire_mode(self, user_id: str, device_fingerprint_hash: str) -> str:
+        """Gets the AI stream wire mode for a connection (defaults to full frames)."""
+        return self.connection_stream_wire_mode.get((user_id, device_fingerprint_hash), STREAM_WIRE_MODE_FULL)
+
     def set_active_chat(self, user_id: str, device_fingerprint_hash: str, chat_id: Optional[str]):
         """Sets the currently active chat for a specific user device connection."""
         connection_key = (user_id, device_fingerprint_hash)
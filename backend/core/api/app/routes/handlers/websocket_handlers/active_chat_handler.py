@@ -48,24 +48,39 @@ async def _send_inflight_ai_stream_snapshot(
     user_id: str,
     device_fingerprint_hash: str,
     active_chat_id: Optional[str],
-) -> None:
+    message_id: Optional[str] = None,
+) -> bool:
+    """
+    Send the latest full-content snapshot of an in-flight AI stream to a device.
+
+    Snapshots are always full frames (full_content_so_far), so they double as the
+    resync point for clients using the delta wire mode. When `message_id` is given,
+    only a snapshot of that message is sent. Returns True if a snapshot was sent.
+    """
     if not active_chat_id or not hasattr(cache_service, "get"):
-        return
+        return False
+
+    # Frames not yet flushed by this node's coalescing writer are newer than the cache
+    from backend.core.api.app.routes.ai_stream_snapshot_writer import ai_stream_snapshot_writer
 
     try:
-        snapshot = await cache_service.get(ai_stream_snapshot_cache_key(active_chat_id))
+        snapshot = ai_stream_snapshot_writer.get_pending(active_chat_id)
+        if snapshot is None:
+            snapshot = await cache_service.get(ai_stream_snapshot_cache_key(active_chat_id))
     except Exception as err:
         logger.warning(
             f"User {user_id}: Failed to read active AI stream snapshot for chat {active_chat_id}: {err}"
         )
-        return
+        return False
 
     if not isinstance(snapshot, dict):
-        return
+        return False
     if snapshot.get("user_id_uuid") != user_id:
-        return
+        return False
     if snapshot.get("external_request") or snapshot.get("is_final_chunk"):
-        return
+        return False
+    if message_id and snapshot.get("message_id") != message_id:
+        return False
 
     await manager.send_personal_message(
         {"type": "ai_message_update", "payload": snapshot},
@@ -76,6 +91,45 @@ async def _send_inflight_ai_stream_snapshot(
         f"User {user_id}, Device {device_fingerprint_hash}: Replayed active AI stream snapshot "
         f"for chat {active_chat_id}, message {str(snapshot.get('message_id', ''))[:8]}"
     )
+    return True
+
+
+async def handle_request_ai_stream_resync(
+    manager: "ConnectionManager",
+    cache_service: "CacheService",
+    user_id: str,
+    device_fingerprint_hash: str,
+    payload: dict,
+) -> None:
+    """
+    Resend the current stream snapshot to a delta-mode client that detected a gap
+    (missing sequence, offset jump or checksum mismatch) in ai_message_chunk frames.
+
+    If no snapshot exists (stream already finished or not yet written) the client
+    simply keeps waiting for the next keyframe or the final chunk, which is always
+    a full frame.
+    """
+    chat_id = payload.get("chat_id")
+    message_id = payload.get("message_id")
+    if not chat_id or chat_id != manager.get_active_chat(user_id, device_fingerprint_hash):
+        logger.debug(
+            f"User {user_id}, Device {device_fingerprint_hash}: Ignoring stream resync for non-active chat {chat_id}"
+        )
+        return
+
+    sent = await _send_inflight_ai_stream_snapshot(
+        manager,
+        cache_service,
+        user_id,
+        device_fingerprint_hash,
+        chat_id,
+        message_id=message_id,
+    )
+    if not sent:
+        logger.debug(
+            f"User {user_id}, Device {device_fingerprint_hash}: No stream snapshot available for resync "
+            f"of chat {chat_id}, message {str(message_id or '')[:8]}"
+        )
 
 
 async def _persist_active_chat_selection(
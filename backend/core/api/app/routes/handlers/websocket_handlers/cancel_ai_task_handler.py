@@ -8,6 +8,7 @@ from fastapi import WebSocket
 from backend.core.api.app.routes.connection_manager import ConnectionManager
 from backend.core.api.app.tasks.celery_config import app as celery_app # Celery app instance
 from backend.core.api.app.services.cache import CacheService
+from backend.apps.ai.processing.task_cancellation import signal_ai_task_cancellation
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +26,9 @@ async def handle_cancel_ai_task(
     
     This handler:
     1. Sends a revocation signal to Celery to stop the task
-    2. Clears the active_ai_task marker in cache so the typing indicator stops immediately
+    2. Pushes the cancellation to the worker (Redis marker + pub/sub, see task_cancellation.py)
+       so the streaming loop stops without polling the Celery result backend
+    3. Clears the active_ai_task marker in cache so the typing indicator stops immediately
     
     Payload is expected to contain:
     {
@@ -66,13 +69,18 @@ async def handle_cancel_ai_task(
             celery_app.control.revoke(task_id_to_cancel, terminate=True, signal='SIGUSR1') # Using SIGUSR1 as tasks.py checks is_revoked
             logger.info(f"{log_prefix} Revocation signal sent for task_id: {task_id_to_cancel}")
 
+            if not cache_service:
+                cache_service = CacheService()
+
+            # The worker checks an in-process event fed by this signal on every stream chunk
+            if not await signal_ai_task_cancellation(cache_service, task_id_to_cancel):
+                logger.warning(f"{log_prefix} Failed to push cancellation for task_id: {task_id_to_cancel}")
+
             # CRITICAL: Clear the active_ai_task marker immediately so the typing indicator stops
             # The task's exception handler will also try to clear this, but we do it here proactively
             # to ensure the UI updates immediately without waiting for the task to process the signal
             if chat_id:
                 try:
-                    if not cache_service:
-                        cache_service = CacheService()
                     cleared = await cache_service.clear_active_ai_task(chat_id)
                     if cleared:
                         logger.info(f"{log_prefix} Cleared active_ai_task marker for chat {chat_id}")
@@ -45,6 +45,34 @@ async def get_latest_chat_compression_checkpoint(
     return None
 
 
+async def get_latest_chat_compression_checkpoints(
+    directus_service: DirectusService,
+    chat_ids: List[str],
+    hashed_user_id: str,
+) -> Dict[str, Dict[str, Any]]:
+    """Latest checkpoint per chat for many chats in one `_in` query (chats without one are omitted)."""
+    if not chat_ids:
+        return {}
+    rows = await directus_service.get_items(
+        CHECKPOINT_COLLECTION,
+        params={
+            "filter": {
+                "chat_id": {"_in": list(chat_ids)},
+                "hashed_user_id": {"_eq": hashed_user_id},
+            },
+            "sort": "-created_at",
+            "limit": -1,
+        },
+        admin_required=True,
+    )
+    latest: Dict[str, Dict[str, Any]] = {}
+    for row in rows if isinstance(rows, list) else []:
+        chat_id = row.get("chat_id")
+        if chat_id and chat_id not in latest:
+            latest[chat_id] = row
+    return latest
+
+
 async def handle_store_chat_compression_checkpoint(
     cache_service: CacheService,
     directus_service: DirectusService,
@@ -16,6 +16,7 @@ from datetime import datetime, timezone
 from fastapi import WebSocket
 
 from backend.core.api.app.services.cache import CacheService
+from backend.core.api.app.services.embed_content_cache import EmbedContentCache
 from backend.core.api.app.services.directus.directus import DirectusService # Keep if directus_service is used by Celery tasks or future direct calls
 from backend.core.api.app.utils.encryption import EncryptionService
 from backend.core.api.app.routes.connection_manager import ConnectionManager
@@ -567,10 +568,12 @@ async def handle_message_received( # Renamed from handle_new_message, logic move
         
         encrypt_start = time.time()
         try:
-            # Encrypt with user-specific server key (encryption_key_user_server from Vault)
+            # Encrypt with user-specific server key (encryption_key_user_server from Vault).
+            # Envelope mode keeps Vault off the per-message path (cached per-user data key).
             encrypted_content_for_cache, _ = await encryption_service.encrypt_with_user_key(
                 content_to_encrypt_str, 
-                user_vault_key_id
+                user_vault_key_id,
+                envelope=True,
             )
             encrypt_time = time.time() - encrypt_start
             logger.info(f"[PERF] Message encryption took {encrypt_time:.3f}s for message {message_id}, user_id={user_id}")
@@ -999,6 +1002,9 @@ async def handle_message_received( # Renamed from handle_new_message, logic move
         #     forwarded to the AI task via AskSkillRequest.embed_file_path_index.
         _seen_embed_refs: Dict[str, int] = {}
         _embed_file_path_index: Dict[str, str] = {}
+        # Decrypted embeds for this handler only, so embeds referenced by several
+        # history messages are fetched and decrypted once.
+        _embed_content_cache = EmbedContentCache()
 
         # When the current user message is saved to cache before history is loaded (the
         # normal fast-path), it appears in the history loop AND would be resolved again
@@ -1064,6 +1070,7 @@ async def handle_message_received( # Renamed from handle_new_message, logic move
                             user_vault_key_id=user_vault_key_id,
                             log_prefix=f"[Chat {chat_id}]",
                             seen_embed_refs=_seen_embed_refs,
+                            content_cache=_embed_content_cache,
                         )
                         _embed_file_path_index.update(_msg_fp_index)
                     except Exception as e_resolve:
@@ -1201,6 +1208,7 @@ async def handle_message_received( # Renamed from handle_new_message, logic move
                                     user_vault_key_id=user_vault_key_id,
                                     log_prefix=f"[Chat {chat_id}]",
                                     seen_embed_refs=_seen_embed_refs,
+                                    content_cache=_embed_content_cache,
                                 )
                                 _embed_file_path_index.update(_msg_fp_index)
 
@@ -1410,7 +1418,8 @@ async def handle_message_received( # Renamed from handle_new_message, logic move
                         content=content_plain,
                         user_vault_key_id=user_vault_key_id,
                         log_prefix=f"[Chat {chat_id}]",
-                        seen_embed_refs=_seen_embed_refs
+                        seen_embed_refs=_seen_embed_refs,
+                        content_cache=_embed_content_cache,
                     )
                     _embed_file_path_index.update(_current_file_path_index)
                     if resolved_current_content != content_plain:
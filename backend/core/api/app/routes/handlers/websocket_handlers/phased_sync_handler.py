@@ -1,7 +1,8 @@
 # backend/core/api/app/routes/handlers/websocket_handlers/phased_sync_handler.py
+import asyncio
 import logging
 import time
-from typing import Dict, Any, List, Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
 from datetime import datetime, timezone
 
 from fastapi import WebSocket
@@ -12,6 +13,7 @@ from backend.core.api.app.utils.encryption import EncryptionService
 from backend.core.api.app.routes.connection_manager import ConnectionManager
 from backend.core.api.app.routes.handlers.websocket_handlers.chat_compression_checkpoint_handler import (
     get_latest_chat_compression_checkpoint,
+    get_latest_chat_compression_checkpoints,
 )
 
 logger = logging.getLogger(__name__)
@@ -19,6 +21,11 @@ logger = logging.getLogger(__name__)
 STARTUP_FULL_PARENT_CHAT_LIMIT = 10
 STARTUP_METADATA_PARENT_CHAT_LIMIT = 100
 STARTUP_SUB_CHAT_METADATA_LIMIT = 50
+# Phase 3 batches fetched concurrently (each batch is a handful of bulk queries)
+PHASE3_BATCH_CONCURRENCY = 3
+
+T = TypeVar("T")
+R = TypeVar("R")
 
 PHASE1_REQUIRED_ENCRYPTED_FIELDS = (
     "encrypted_chat_key",
@@ -1050,6 +1057,105 @@ async def _handle_phase2_sync(
         logger.error(f"Error in Phase 2 sync for user {user_id}: {e}", exc_info=True)
 
 
+async def _map_bounded(
+    worker: Callable[[T], Awaitable[R]],
+    items: List[T],
+    limit: int,
+) -> AsyncIterator[R]:
+    """Run `worker` over `items` with at most `limit` calls in flight; yield results in input order."""
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(item: T) -> R:
+        async with semaphore:
+            return await worker(item)
+
+    tasks = [asyncio.create_task(run(item)) for item in items]
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _fetch_phase3_batch(
+    cache_service: CacheService,
+    directus_service: DirectusService,
+    user_id: str,
+    user_id_hash: str,
+    batch_chat_ids: List[str],
+    batch_versions: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Fetch messages, checkpoints, embeds, embed keys and Code Run outputs for one
+    Phase 3 batch with bulk queries: one pipelined cache read per data type, one
+    Directus `_in` query for all cache misses, and independent reads run concurrently.
+    """
+    import hashlib
+    hashed_ids = {chat_id: hashlib.sha256(chat_id.encode()).hexdigest() for chat_id in batch_chat_ids}
+
+    cached_messages, cached_embeds = await asyncio.gather(
+        cache_service.get_sync_messages_histories(user_id, batch_chat_ids),
+        cache_service.get_sync_embeds_for_chats(batch_chat_ids),
+    )
+    message_misses = [chat_id for chat_id in batch_chat_ids if not cached_messages.get(chat_id)]
+    embed_misses = [hashed_ids[chat_id] for chat_id in batch_chat_ids if not cached_embeds.get(chat_id)]
+
+    async def no_result() -> None:
+        return None
+
+    directus_messages, checkpoints, directus_embeds, embed_keys, code_run_outputs = await asyncio.gather(
+        directus_service.chat.get_messages_for_chats(message_misses, decrypt_content=False) if message_misses else no_result(),
+        get_latest_chat_compression_checkpoints(directus_service, batch_chat_ids, user_id_hash),
+        directus_service.embed.get_embeds_by_hashed_chat_ids(embed_misses) if embed_misses else no_result(),
+        directus_service.embed.get_embed_keys_by_hashed_chat_ids_batch(list(hashed_ids.values())),
+        _fetch_code_run_outputs_for_chats(directus_service, batch_chat_ids, user_id),
+        return_exceptions=True,
+    )
+    for label, result in (
+        ("messages", directus_messages),
+        ("compression checkpoints", checkpoints),
+        ("embeds", directus_embeds),
+        ("embed_keys", embed_keys),
+    ):
+        if isinstance(result, Exception):
+            logger.warning(f"Phase 3: Failed to bulk fetch {label} for {len(batch_chat_ids)} chats: {result}")
+    if isinstance(directus_messages, Exception) or not directus_messages:
+        directus_messages = {}
+    if isinstance(checkpoints, Exception) or not checkpoints:
+        checkpoints = {}
+    if isinstance(code_run_outputs, Exception):
+        code_run_outputs = []
+
+    directus_embeds_by_hash: Dict[str, List[Dict[str, Any]]] = {}
+    if isinstance(directus_embeds, list):
+        for embed in directus_embeds:
+            directus_embeds_by_hash.setdefault(embed.get("hashed_chat_id"), []).append(embed)
+
+    chats: List[Dict[str, Any]] = []
+    embeds_by_chat: List[List[Dict[str, Any]]] = []
+    for chat_id in batch_chat_ids:
+        messages_data = cached_messages.get(chat_id) or directus_messages.get(chat_id) or []
+        server_ver = batch_versions.get(chat_id)
+        server_messages_v = server_ver.messages_v if server_ver else len(messages_data)
+        checkpoint = checkpoints.get(chat_id)
+        chats.append({
+            "chat_id": chat_id,
+            "messages": messages_data,
+            "compression_checkpoints": [checkpoint] if checkpoint else [],
+            "server_message_count": len(messages_data),
+            "messages_v": max(server_messages_v, len(messages_data))
+        })
+        embeds_by_chat.append(cached_embeds.get(chat_id) or directus_embeds_by_hash.get(hashed_ids[chat_id], []))
+
+    return {
+        "chats": chats,
+        "embeds_by_chat": embeds_by_chat,
+        "embed_keys": embed_keys if isinstance(embed_keys, list) else [],
+        "code_run_outputs": code_run_outputs or [],
+    }
+
+
 async def _handle_phase3_sync(
     manager: ConnectionManager,
     cache_service: CacheService,
@@ -1117,98 +1223,51 @@ async def _handle_phase3_sync(
 
         logger.info(f"Phase 3: {len(chats_needing_messages)} chats need message sync (delta-checked)")
 
-        # Send messages + embeds in chunked batches of 10
+        # Send messages + embeds in chunked batches of 10. Batches are fetched with
+        # bounded concurrency (bulk queries per batch) and sent in order.
         import hashlib
         user_id_hash = hashlib.sha256(user_id.encode()).hexdigest()
         BATCH_SIZE = 10
         total_messages_sent = 0
         total_embeds_sent = 0
         batch_num = 0
+        batches = [
+            chats_needing_messages[i:i + BATCH_SIZE]
+            for i in range(0, len(chats_needing_messages), BATCH_SIZE)
+        ]
 
-        for i in range(0, len(chats_needing_messages), BATCH_SIZE):
-            batch_chat_ids = chats_needing_messages[i:i + BATCH_SIZE]
-            batch_num += 1
-            batch_data: List[Dict[str, Any]] = []
-
-            for chat_id in batch_chat_ids:
-                messages_data: List[str] = []
-
-                # Try sync cache first
-                try:
-                    cached = await cache_service.get_sync_messages_history(user_id, chat_id)
-                    if cached:
-                        messages_data = cached
-                except Exception:
-                    pass
-
-                # Fallback to Directus
-                if not messages_data:
-                    try:
-                        messages_data = await directus_service.chat.get_all_messages_for_chat(
-                            chat_id=chat_id, decrypt_content=False
-                        ) or []
-                    except Exception as e:
-                        logger.warning(f"Phase 3: Failed to fetch messages for {chat_id}: {e}")
-
-                server_ver = batch_versions.get(chat_id)
-                server_messages_v = server_ver.messages_v if server_ver else len(messages_data)
-                checkpoint = await get_latest_chat_compression_checkpoint(
-                    directus_service,
-                    chat_id,
-                    user_id_hash,
-                )
+        async def fetch_batch(batch_chat_ids: List[str]) -> Dict[str, Any]:
+            return await _fetch_phase3_batch(
+                cache_service, directus_service, user_id, user_id_hash, batch_chat_ids, batch_versions
+            )
 
-                batch_data.append({
-                    "chat_id": chat_id,
-                    "messages": messages_data,
-                    "compression_checkpoints": [checkpoint] if checkpoint else [],
-                    "server_message_count": len(messages_data),
-                    "messages_v": max(server_messages_v, len(messages_data))
-                })
-                total_messages_sent += len(messages_data)
+        async for fetched in _map_bounded(fetch_batch, batches, PHASE3_BATCH_CONCURRENCY):
+            batch_num += 1
+            batch_data = fetched["chats"]
+            total_messages_sent += sum(len(chat["messages"]) for chat in batch_data)
 
-            # Fetch embeds + embed_keys for this batch so they're available offline
+            # Embeds not yet sent in this sync or already on the device
             batch_embeds: List[Dict[str, Any]] = []
-            batch_embed_keys: List[Dict[str, Any]] = []
-            batch_code_run_outputs: List[Dict[str, Any]] = []
             batch_seen_embed_ids: set = set()
-            batch_seen_key_ids: set = set()
-            batch_hashed_ids: List[str] = []
-
-            for chat_id in batch_chat_ids:
-                hashed_id = hashlib.sha256(chat_id.encode()).hexdigest()
-                batch_hashed_ids.append(hashed_id)
-
-                try:
-                    raw_embeds = await cache_service.get_sync_embeds_for_chat(chat_id)
-                    if not raw_embeds:
-                        raw_embeds = await directus_service.embed.get_embeds_by_hashed_chat_id(hashed_id)
-                    if raw_embeds:
-                        for embed in raw_embeds:
-                            embed_id = embed.get("embed_id")
-                            embed_status = embed.get("status")
-                            if (embed_id and embed_id not in batch_seen_embed_ids
-                                    and embed_id not in sent_embed_ids
-                                    and embed_id not in (client_embed_ids or set())
-                                    and embed_status not in ("error", "cancelled")):
-                                batch_embeds.append(embed)
-                                batch_seen_embed_ids.add(embed_id)
-                                sent_embed_ids.add(embed_id)
-                except Exception as e:
-                    logger.warning(f"Phase 3: Error fetching embeds for {chat_id}: {e}")
+            for raw_embeds in fetched["embeds_by_chat"]:
+                for embed in raw_embeds:
+                    embed_id = embed.get("embed_id")
+                    embed_status = embed.get("status")
+                    if (embed_id and embed_id not in batch_seen_embed_ids
+                            and embed_id not in sent_embed_ids
+                            and embed_id not in (client_embed_ids or set())
+                            and embed_status not in ("error", "cancelled")):
+                        batch_embeds.append(embed)
+                        batch_seen_embed_ids.add(embed_id)
+                        sent_embed_ids.add(embed_id)
 
-            # Batch fetch embed_keys for this batch's chats
-            if batch_hashed_ids:
-                try:
-                    keys = await directus_service.embed.get_embed_keys_by_hashed_chat_ids_batch(batch_hashed_ids)
-                    if keys:
-                        for key_entry in keys:
-                            key_id = key_entry.get("id")
-                            if key_id and key_id not in batch_seen_key_ids:
-                                batch_embed_keys.append(key_entry)
-                                batch_seen_key_ids.add(key_id)
-                except Exception as e:
-                    logger.warning(f"Phase 3: Error batch fetching embed_keys: {e}")
+            batch_embed_keys: List[Dict[str, Any]] = []
+            batch_seen_key_ids: set = set()
+            for key_entry in fetched["embed_keys"]:
+                key_id = key_entry.get("id")
+                if key_id and key_id not in batch_seen_key_ids:
+                    batch_embed_keys.append(key_entry)
+                    batch_seen_key_ids.add(key_id)
 
             total_embeds_sent += len(batch_embeds)
 
@@ -1216,18 +1275,14 @@ async def _handle_phase3_sync(
             payload_data: Dict[str, Any] = {
                 "chats": batch_data,
                 "batch_number": batch_num,
-                "is_last_batch": (i + BATCH_SIZE >= len(chats_needing_messages))
+                "is_last_batch": batch_num == len(batches)
             }
             # Only include embeds/keys if present (saves bandwidth for chats without embeds)
             if batch_embeds:
                 payload_data["embeds"] = batch_embeds
             if batch_embed_keys:
                 payload_data["embed_keys"] = batch_embed_keys
-            batch_code_run_outputs = await _fetch_code_run_outputs_for_chats(
-                directus_service,
-                batch_chat_ids,
-                user_id,
-            )
+            batch_code_run_outputs = fetched["code_run_outputs"]
             if batch_code_run_outputs:
                 payload_data["code_run_outputs"] = batch_code_run_outputs
 
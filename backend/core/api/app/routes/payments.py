@@ -33,6 +33,7 @@ from backend.core.api.app.services.s3.config import get_bucket_name
 from backend.core.api.app.services.limiter import limiter
 from backend.core.api.app.services.payment_tier_service import PaymentTierService
 from backend.core.api.app.services.referral_service import ReferralService
+from backend.core.api.app.services.credit_ledger import CreditLedger
 from backend.core.api.app.utils.server_mode import validate_request_domain
 from fastapi.responses import StreamingResponse
 import hashlib
@@ -111,6 +112,28 @@ def _paid_signup_completion_update_payload(**extra_fields: Any) -> Dict[str, Any
         "signup_completed": True,
     }
 
+async def _add_credits_via_ledger(
+    user_id: str,
+    credits: int,
+    source: str,
+    cache_service: CacheService,
+    directus_service: DirectusService,
+    encryption_service: EncryptionService,
+) -> Optional[int]:
+    """
+    Add paid credits (or take refunded ones back, for a negative amount) through
+    the credit ledger so they are applied atomically with concurrent charges; the
+    ledger patches the cached balance and persists it. Refunds never take the
+    balance below zero. Returns the new balance, or None when the ledger cannot
+    patch the profile and the caller must take its direct Directus update path.
+    """
+    ledger = CreditLedger(cache_service)
+    if credits >= 0:
+        result = await ledger.grant(user_id, credits, "payments", source, directus_service, encryption_service)
+        return result.balance if result.applied else None
+    result = await ledger.revoke(user_id, -credits, "payments", source, directus_service, encryption_service)
+    return result.balance if result.status in ("ok", "insufficient") else None
+
 class CreateOrderRequest(BaseModel):
     currency: str
     credits_amount: int
@@ -702,15 +725,20 @@ async def verify_apple_transaction(
                 logger.error(f"Credits field missing from cache for user {user_id}")
                 raise HTTPException(status_code=500, detail="Could not read current balance")
 
-            new_total = current_credits + credits_to_add
-            new_encrypted, _ = await encryption_service.encrypt_with_user_key(str(new_total), vault_key_id)
-            update_success = await directus_service.update_user(
-                user_id, {"encrypted_credit_balance": new_encrypted}
+            new_total = await _add_credits_via_ledger(
+                user_id, credits_to_add, "apple_iap", cache_service, directus_service, encryption_service
             )
+            credits_in_ledger = new_total is not None
+            if not credits_in_ledger:
+                new_total = current_credits + credits_to_add
+                new_encrypted, _ = await encryption_service.encrypt_with_user_key(str(new_total), vault_key_id)
+                update_success = await directus_service.update_user(
+                    user_id, {"encrypted_credit_balance": new_encrypted}
+                )
 
-            if not update_success:
-                logger.error(f"Failed to update credits in Directus for user {user_id}")
-                raise HTTPException(status_code=500, detail="Failed to update credit balance")
+                if not update_success:
+                    logger.error(f"Failed to update credits in Directus for user {user_id}")
+                    raise HTTPException(status_code=500, detail="Failed to update credit balance")
         except Exception:
             if reserved_transaction:
                 await directus_service.apple_iap_transactions.delete_processed_transaction(tx_data.transaction_id)
@@ -721,9 +749,10 @@ async def verify_apple_transaction(
             tx_data.transaction_id, user_id, credits_to_add, cache_service
         )
 
-        # Update cache
-        user_cache_data["credits"] = new_total
-        await cache_service.set_user(user_cache_data, user_id=user_id)
+        # Update cache (the ledger already patched the cached balance)
+        if not credits_in_ledger:
+            user_cache_data["credits"] = new_total
+            await cache_service.set_user(user_cache_data, user_id=user_id)
 
         # Step 5: Broadcast credit update via WebSocket
         try:
@@ -1938,6 +1967,7 @@ async def payment_webhook(
 
             directus_update_success = False
             new_total_credits_calculated = 0
+            credits_in_ledger = False
             gift_card_code = None
 
             try:
@@ -1981,13 +2011,24 @@ async def payment_webhook(
                     if current_credits is None:
                         raise Exception("Credits field missing from cache")
 
-                    new_total_credits_calculated = current_credits + credits_purchased
-                    new_encrypted_credits, _ = await encryption_service.encrypt_with_user_key(str(new_total_credits_calculated), vault_key_id)
-
-                    update_payload = _paid_signup_completion_update_payload(
-                        encrypted_credit_balance=new_encrypted_credits
+                    ledger_total = await _add_credits_via_ledger(
+                        user_id, credits_purchased, "purchase", cache_service, directus_service, encryption_service
                     )
-                    directus_update_success = await directus_service.update_user(user_id, update_payload)
+                    if ledger_total is not None:
+                        # Credits are applied and persisted by the ledger; only mark the signup complete
+                        credits_in_ledger = True
+                        new_total_credits_calculated = ledger_total
+                        directus_update_success = True
+                        if not await directus_service.update_user(user_id, _paid_signup_completion_update_payload()):
+                            logger.error(f"Failed to mark signup completed in Directus for user {user_id}")
+                    else:
+                        new_total_credits_calculated = current_credits + credits_purchased
+                        new_encrypted_credits, _ = await encryption_service.encrypt_with_user_key(str(new_total_credits_calculated), vault_key_id)
+
+                        update_payload = _paid_signup_completion_update_payload(
+                            encrypted_credit_balance=new_encrypted_credits
+                        )
+                        directus_update_success = await directus_service.update_user(user_id, update_payload)
                 
                 # Update tier system: monthly spending counter and tier progression
                 # This applies to BOTH regular purchases AND gift card purchases
@@ -2410,8 +2451,8 @@ async def payment_webhook(
                 
                 final_order_status = "unknown"
                 if directus_update_success:
-                    if not is_gift_card:
-                        # Only update credits in cache for regular purchases
+                    if not is_gift_card and not credits_in_ledger:
+                        # Only update credits in cache for regular purchases (the ledger already did)
                         final_cache_data["credits"] = new_total_credits_calculated
                     final_cache_data["last_opened"] = PAID_SIGNUP_COMPLETION_LAST_OPENED
                     final_cache_data["signup_completed"] = True
@@ -2640,24 +2681,31 @@ async def payment_webhook(
                 logger.error(f"Vault key ID missing for user {user_id}")
                 return {"status": "vault_key_missing"}
             
-            new_encrypted_credits, _ = await encryption_service.encrypt_with_user_key(
-                str(new_total_credits),
-                vault_key_id
-            )
-            
-            # Update Directus
-            update_success = await directus_service.update_user(
-                user_id,
-                {"encrypted_credit_balance": new_encrypted_credits}
+            ledger_total = await _add_credits_via_ledger(
+                user_id, total_credits_to_add, "subscription_renewal", cache_service, directus_service, encryption_service
             )
+            if ledger_total is not None:
+                new_total_credits = ledger_total
+                update_success = True
+            else:
+                new_encrypted_credits, _ = await encryption_service.encrypt_with_user_key(
+                    str(new_total_credits),
+                    vault_key_id
+                )
+                
+                # Update Directus
+                update_success = await directus_service.update_user(
+                    user_id,
+                    {"encrypted_credit_balance": new_encrypted_credits}
+                )
+                if update_success:
+                    # Update cache
+                    user_cache_data["credits"] = new_total_credits
+                    await cache_service.set_user(user_cache_data, user_id=user_id)
             
             if update_success:
                 logger.info(f"Successfully added {total_credits_to_add} credits to user {user_id} (subscription renewal)")
                 
-                # Update cache
-                user_cache_data["credits"] = new_total_credits
-                await cache_service.set_user(user_cache_data, user_id=user_id)
-                
                 # Broadcast credit update
                 try:
                     await cache_service.publish_event(
@@ -3071,20 +3119,25 @@ async def payment_webhook(
                 )
 
                 # Deduct credits from user account
-                refund_user_cache = await cache_service.get_user_by_id(refund_user_id) or {}
-                current_credits = refund_user_cache.get("credits", 0)
-                new_credits = max(0, current_credits - credits_to_deduct)
-
-                encrypted_new_balance, _ = await encryption_service.encrypt_with_user_key(
-                    str(new_credits), refund_vault_key_id
+                new_credits = await _add_credits_via_ledger(
+                    refund_user_id, -credits_to_deduct, "dashboard_refund",
+                    cache_service, directus_service, encryption_service,
                 )
-                await directus_service.update_user(refund_user_id, {
-                    "encrypted_credit_balance": encrypted_new_balance
-                })
+                if new_credits is None:
+                    refund_user_cache = await cache_service.get_user_by_id(refund_user_id) or {}
+                    current_credits = refund_user_cache.get("credits", 0)
+                    new_credits = max(0, current_credits - credits_to_deduct)
+
+                    encrypted_new_balance, _ = await encryption_service.encrypt_with_user_key(
+                        str(new_credits), refund_vault_key_id
+                    )
+                    await directus_service.update_user(refund_user_id, {
+                        "encrypted_credit_balance": encrypted_new_balance
+                    })
 
-                # Update cache
-                refund_user_cache["credits"] = new_credits
-                await cache_service.update_user(refund_user_id, refund_user_cache)
+                    # Update cache
+                    refund_user_cache["credits"] = new_credits
+                    await cache_service.update_user(refund_user_id, refund_user_cache)
 
                 # Broadcast credit update via WebSocket
                 try:
@@ -3266,25 +3319,30 @@ async def payment_webhook(
                                     credits_to_restore = int(credits_to_restore_str) if credits_to_restore_str else 0
 
                                     if credits_to_restore > 0:
-                                        refund_fail_user_cache = await cache_service.get_user_by_id(refund_fail_user_id) or {}
-                                        current_credits = refund_fail_user_cache.get("credits", 0)
-                                        restored_credits = current_credits + credits_to_restore
-
-                                        # Update in Directus
-                                        encrypted_restored, _ = await encryption_service.encrypt_with_user_key(
-                                            str(restored_credits), refund_fail_vault_key_id
+                                        restored_credits = await _add_credits_via_ledger(
+                                            refund_fail_user_id, credits_to_restore, "refund_failed",
+                                            cache_service, directus_service, encryption_service,
                                         )
-                                        await directus_service.update_user(refund_fail_user_id, {
-                                            "encrypted_credits": encrypted_restored
-                                        })
+                                        if restored_credits is None:
+                                            refund_fail_user_cache = await cache_service.get_user_by_id(refund_fail_user_id) or {}
+                                            current_credits = refund_fail_user_cache.get("credits", 0)
+                                            restored_credits = current_credits + credits_to_restore
+
+                                            # Update in Directus
+                                            encrypted_restored, _ = await encryption_service.encrypt_with_user_key(
+                                                str(restored_credits), refund_fail_vault_key_id
+                                            )
+                                            await directus_service.update_user(refund_fail_user_id, {
+                                                "encrypted_credits": encrypted_restored
+                                            })
 
-                                        # Update in cache
-                                        refund_fail_user_cache["credits"] = restored_credits
-                                        await cache_service.update_user(refund_fail_user_id, refund_fail_user_cache)
+                                            # Update in cache
+                                            refund_fail_user_cache["credits"] = restored_credits
+                                            await cache_service.update_user(refund_fail_user_id, refund_fail_user_cache)
 
                                         logger.info(
                                             f"refund.failed: restored {credits_to_restore} credits for user {refund_fail_user_id} "
-                                            f"(was {current_credits}, now {restored_credits})"
+                                            f"(now {restored_credits})"
                                         )
 
                                         # Broadcast credit update via WebSocket
@@ -4308,27 +4366,36 @@ async def redeem_gift_card(
             logger.error(f"Vault key ID missing for user {user_id}")
             raise HTTPException(status_code=500, detail="User encryption key not found")
         
-        encrypted_new_credits_tuple = await encryption_service.encrypt_with_user_key(
-            plaintext=str(new_total_credits),
-            key_id=vault_key_id
-        )
-        encrypted_new_credits = encrypted_new_credits_tuple[0]
-        
-        # 7. Update Directus with new credit balance
-        update_success = await directus_service.update_user(
-            user_id,
-            _paid_signup_completion_update_payload(encrypted_credit_balance=encrypted_new_credits)
+        ledger_total = await _add_credits_via_ledger(
+            user_id, credits_value, "gift_card_redemption", cache_service, directus_service, encryption_service
         )
-        
-        if not update_success:
-            logger.error(f"Failed to update user {user_id} credits in Directus after gift card redemption")
-            raise HTTPException(status_code=500, detail="Failed to update credits in database")
-        
-        # 8. Update cache with new credit balance
-        user_cache_data["credits"] = new_total_credits
-        user_cache_data["last_opened"] = PAID_SIGNUP_COMPLETION_LAST_OPENED
-        user_cache_data["signup_completed"] = True
-        await cache_service.set_user(user_cache_data, user_id=user_id)
+        if ledger_total is not None:
+            # 7./8. The ledger applied and persisted the balance; mark the signup complete
+            new_total_credits = ledger_total
+            if not await directus_service.update_user(user_id, _paid_signup_completion_update_payload()):
+                logger.error(f"Failed to mark signup completed in Directus for user {user_id} after gift card redemption")
+        else:
+            encrypted_new_credits_tuple = await encryption_service.encrypt_with_user_key(
+                plaintext=str(new_total_credits),
+                key_id=vault_key_id
+            )
+            encrypted_new_credits = encrypted_new_credits_tuple[0]
+            
+            # 7. Update Directus with new credit balance
+            update_success = await directus_service.update_user(
+                user_id,
+                _paid_signup_completion_update_payload(encrypted_credit_balance=encrypted_new_credits)
+            )
+            
+            if not update_success:
+                logger.error(f"Failed to update user {user_id} credits in Directus after gift card redemption")
+                raise HTTPException(status_code=500, detail="Failed to update credits in database")
+            
+            # 8. Update cache with new credit balance
+            user_cache_data["credits"] = new_total_credits
+            user_cache_data["last_opened"] = PAID_SIGNUP_COMPLETION_LAST_OPENED
+            user_cache_data["signup_completed"] = True
+            await cache_service.set_user(user_cache_data, user_id=user_id)
         
         # Update Global Stats for Gift Card
         try:
@@ -5753,26 +5820,33 @@ async def request_refund(
             # Encrypt new credit balance for Directus
             vault_key_id = user_cache_data.get("vault_key_id")
             if vault_key_id:
-                encrypted_new_credits_tuple = await encryption_service.encrypt_with_user_key(
-                    plaintext=str(new_total_credits),
-                    key_id=vault_key_id
-                )
-                encrypted_new_credits = encrypted_new_credits_tuple[0]
-                
-                # Update Directus with new credit balance
-                update_credits_success = await directus_service.update_user(
-                    user_id,
-                    {"encrypted_credit_balance": encrypted_new_credits}
+                ledger_total = await _add_credits_via_ledger(
+                    user_id, -unused_credits, "refund", cache_service, directus_service, encryption_service
                 )
+                if ledger_total is not None:
+                    new_total_credits = ledger_total
+                    update_credits_success = True
+                else:
+                    encrypted_new_credits_tuple = await encryption_service.encrypt_with_user_key(
+                        plaintext=str(new_total_credits),
+                        key_id=vault_key_id
+                    )
+                    encrypted_new_credits = encrypted_new_credits_tuple[0]
+                    
+                    # Update Directus with new credit balance
+                    update_credits_success = await directus_service.update_user(
+                        user_id,
+                        {"encrypted_credit_balance": encrypted_new_credits}
+                    )
+                    if update_credits_success:
+                        # Update cache with new credit balance
+                        user_cache_data["credits"] = new_total_credits
+                        await cache_service.set_user(user_cache_data, user_id=user_id)
                 
                 if not update_credits_success:
                     logger.error(f"Failed to update user {user_id} credits in Directus after refund")
                     # Don't fail - refund was already processed, just log the error
                 else:
-                    # Update cache with new credit balance
-                    user_cache_data["credits"] = new_total_credits
-                    await cache_service.set_user(user_cache_data, user_id=user_id)
-                    
                     # Broadcast credit update via WebSocket
                     try:
                         await manager.broadcast_to_user(
@@ -6428,19 +6502,31 @@ async def _handle_revolut_business_webhook(
     await cache_service.set_user(user_cache_data, user_id=user_id)
 
     directus_update_success = False
+    credits_in_ledger = False
     new_total_credits = 0
     completed_at = datetime.now(timezone.utc).isoformat()
 
     try:
         # Update user credits
-        new_total_credits = current_credits + credits_amount
-        new_encrypted_credits, _ = await encryption_service.encrypt_with_user_key(
-            str(new_total_credits), vault_key_id
-        )
-        update_payload = _paid_signup_completion_update_payload(
-            encrypted_credit_balance=new_encrypted_credits
+        ledger_total = await _add_credits_via_ledger(
+            user_id, credits_amount, "bank_transfer", cache_service, directus_service, encryption_service
         )
-        directus_update_success = await directus_service.update_user(user_id, update_payload)
+        if ledger_total is not None:
+            # Credits are applied and persisted by the ledger; only mark the signup complete
+            credits_in_ledger = True
+            new_total_credits = ledger_total
+            directus_update_success = True
+            if not await directus_service.update_user(user_id, _paid_signup_completion_update_payload()):
+                logger.error(f"Failed to mark signup completed in Directus for bank transfer {order_id}")
+        else:
+            new_total_credits = current_credits + credits_amount
+            new_encrypted_credits, _ = await encryption_service.encrypt_with_user_key(
+                str(new_total_credits), vault_key_id
+            )
+            update_payload = _paid_signup_completion_update_payload(
+                encrypted_credit_balance=new_encrypted_credits
+            )
+            directus_update_success = await directus_service.update_user(user_id, update_payload)
 
         if not directus_update_success:
             logger.error(f"Failed to update credits in Directus for bank transfer {order_id}")
@@ -6634,7 +6720,8 @@ async def _handle_revolut_business_webhook(
         if final_cache_data.get("pending_order_id") == order_id:
             final_cache_data.pop("pending_order_id", None)
         if directus_update_success:
-            final_cache_data["credits"] = new_total_credits
+            if not credits_in_ledger:
+                final_cache_data["credits"] = new_total_credits
             final_cache_data["last_opened"] = PAID_SIGNUP_COMPLETION_LAST_OPENED
             final_cache_data["signup_completed"] = True
         await cache_service.set_user(final_cache_data, user_id=user_id)
@@ -4,22 +4,30 @@ import json
 import asyncio # Added asyncio
 import time
 import uuid
-from typing import Optional
+from collections import OrderedDict
+from typing import Optional, Tuple
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, status, FastAPI
 # Import necessary services and utilities
 from backend.core.api.app.services.cache import CacheService
 from backend.core.api.app.services.directus import DirectusService
 from backend.core.api.app.services.notification_event_service import NotificationEventService
 from backend.core.api.app.utils.encryption import EncryptionService
+from backend.shared.python_utils.stream_delta import (
+    STREAM_WIRE_MODE_DELTA,
+    StreamDeltaDecoder,
+    is_delta_frame,
+    to_full_payload,
+)
 # Import ConnectionManager from the new module
 from .connection_manager import ConnectionManager
+from .ws_node_registry import WebSocketNodeRegistry, is_ws_node_routing_enabled
 from .auth_ws import get_current_user_ws
 from .handlers.websocket_handlers.title_update_handler import handle_update_title
 from .handlers.websocket_handlers.draft_update_handler import handle_update_draft
 from .handlers.websocket_handlers.message_received_handler import handle_message_received
+from .ai_stream_snapshot_writer import ai_stream_snapshot_writer
 from .handlers.websocket_handlers.active_chat_handler import (
-    AI_STREAM_SNAPSHOT_TTL_SECONDS,
-    ai_stream_snapshot_cache_key,
+    handle_request_ai_stream_resync,
     handle_set_active_chat,
 )
 from .handlers.websocket_handlers.delete_chat_handler import handle_delete_chat
@@ -386,6 +394,33 @@ async def _send_offline_email_notification(
     except Exception as e:
         logger.error(f"{log_prefix} Failed to queue email task: {e}", exc_info=True)
 
+# --- WebSocket node routing ---
+# Started by main.py before the listeners. Registers which users this node holds so
+# publishers of per-user channels target ws_node::{node_id}::{channel} instead of
+# every node (see ws_node_registry.py / cache_ws_routing_mixin.py).
+def start_ws_node_registry(app: FastAPI) -> Optional[WebSocketNodeRegistry]:
+    if not is_ws_node_routing_enabled():
+        logger.info("WS node routing disabled (WS_NODE_ROUTING_ENABLED=false). Using shared channels only.")
+        return None
+    if not hasattr(app.state, 'cache_service'):
+        logger.error("Cache service not found on app.state. WS node routing not started.")
+        return None
+    registry = WebSocketNodeRegistry(app.state.cache_service, manager)
+    manager.attach_node_registry(registry)
+    app.state.ws_node_registry = registry
+    app.state.ws_node_heartbeat_task = asyncio.create_task(registry.run_heartbeat())
+    logger.info(f"WS node routing enabled for node {registry.node_id}")
+    return registry
+
+
+def _routed_channel_patterns(app: FastAPI, channel_pattern: str) -> Tuple[str, ...]:
+    """The shared pattern plus this node's targeted copy of it (if routing is enabled)."""
+    registry: Optional[WebSocketNodeRegistry] = getattr(app.state, 'ws_node_registry', None)
+    if registry is None:
+        return (channel_pattern,)
+    return (channel_pattern, registry.channel_pattern(channel_pattern))
+
+
 # --- Redis Pub/Sub Listener for Cache Events ---
 # This function will be imported and started by main.py
 async def listen_for_cache_events(app: FastAPI):
@@ -611,6 +646,75 @@ async def listen_for_cache_events(app: FastAPI):
             await asyncio.sleep(1) # Prevent tight loop on continuous errors
 
 
+# =============================================================================
+# AI STREAM DELTA DECODING
+# Workers publish intermediate ai_message_chunk frames as deltas (see
+# backend/shared/python_utils/stream_delta.py). The listener rebuilds the full
+# content per message so it can keep writing full snapshots and serve clients
+# that did not negotiate the delta wire mode.
+# =============================================================================
+
+AI_STREAM_DECODERS_MAX = 4096
+_ai_stream_decoders: "OrderedDict[str, StreamDeltaDecoder]" = OrderedDict()
+
+STANDARDIZED_AI_ERROR_TEXT = "The AI service encountered an error while processing your request. Please try again in a moment."
+
+
+def _apply_ai_stream_frame(redis_payload: dict) -> Optional[StreamDeltaDecoder]:
+    """
+    Feed a frame into the per-message decoder. Returns the decoder when the full
+    content is known after this frame, None when the listener is out of sync and
+    has to wait for the next keyframe.
+    """
+    message_id = redis_payload.get("message_id")
+    is_final = redis_payload.get("is_final_chunk", False)
+
+    decoder = _ai_stream_decoders.get(message_id)
+    if decoder is None:
+        decoder = StreamDeltaDecoder()
+        if not is_final:
+            _ai_stream_decoders[message_id] = decoder
+            while len(_ai_stream_decoders) > AI_STREAM_DECODERS_MAX:
+                _ai_stream_decoders.popitem(last=False)
+    else:
+        _ai_stream_decoders.move_to_end(message_id)
+
+    in_sync = decoder.apply(redis_payload)
+    if is_final:
+        _ai_stream_decoders.pop(message_id, None)
+    return decoder if in_sync else None
+
+
+def _is_ai_error_content(full_content: Optional[str]) -> bool:
+    if not full_content or not isinstance(full_content, str):
+        return False
+    return "[ERROR" in full_content or full_content.strip() == STANDARDIZED_AI_ERROR_TEXT
+
+
+def _ai_stream_decoder_tail(message_id: Optional[str]) -> str:
+    decoder = _ai_stream_decoders.get(message_id)
+    return decoder.tail if decoder is not None and decoder.in_sync else ""
+
+
+def _frame_has_ai_error(redis_payload: dict, decoder: Optional[StreamDeltaDecoder], previous_tail: str) -> bool:
+    """
+    Error check for one frame. Full frames are checked whole; delta frames only
+    scan the new text plus the previous tail, so a marker split across frames is
+    still found without joining the whole content.
+    """
+    if decoder is None:
+        return False
+    if not is_delta_frame(redis_payload):
+        return _is_ai_error_content(redis_payload.get("full_content_so_far"))
+    delta = redis_payload.get("content_delta") or ""
+    if "[ERROR" in previous_tail[-len("[ERROR"):] + delta:
+        return True
+    # The standardized error text is only ever the whole (short) content
+    if decoder.length <= 2 * len(STANDARDIZED_AI_ERROR_TEXT):
+        return _is_ai_error_content(decoder.content)
+    return False
+
+
 async def listen_for_ai_chat_streams(app: FastAPI):
     """Listens to Redis Pub/Sub for AI chat stream events and forwards them to relevant users."""
     if not hasattr(app.state, 'cache_service'):
@@ -622,7 +726,11 @@ async def listen_for_ai_chat_streams(app: FastAPI):
 
     await cache_service.client # Ensure connection
 
-    async for message in cache_service.subscribe_to_channel("chat_stream::*"): # Subscribes to chat_stream::{chat_id}
+    # Snapshot writes are coalesced per chat and owned by one node per message
+    registry: Optional[WebSocketNodeRegistry] = getattr(app.state, 'ws_node_registry', None)
+    ai_stream_snapshot_writer.configure(cache_service, node_id=registry.node_id if registry else None)
+
+    async for message in cache_service.subscribe_to_channel(*_routed_channel_patterns(app, "chat_stream::*")): # Subscribes to chat_stream::{chat_id}
         logger.debug(
             "AI Stream Listener: Received pubsub message on chat_stream::* "
             f"(summary: {_safe_payload_summary(message)})"
@@ -714,26 +822,54 @@ async def listen_for_ai_chat_streams(app: FastAPI):
                         logger.debug(f"AI Stream Listener: External request detected for chat {chat_id_from_payload}. Skipping WebSocket broadcast.")
                         continue
 
-                    snapshot_key = ai_stream_snapshot_cache_key(chat_id_from_payload)
+                    previous_tail = _ai_stream_decoder_tail(redis_payload.get("message_id"))
+                    decoder = _apply_ai_stream_frame(redis_payload)
+                    if decoder is None:
+                        logger.debug(
+                            f"AI Stream Listener: Delta stream for message {redis_payload.get('message_id')} "
+                            f"out of sync at seq {redis_payload.get('sequence')}; waiting for next keyframe."
+                        )
+
+                    # Full-content view of this frame for snapshots and legacy clients.
+                    # Full frames are used as-is. Delta frames are only joined when a
+                    # full client needs them or the snapshot writer flushes, so
+                    # forwarding a long delta stream never rebuilds the text per frame.
+                    deferred_content = decoder.deferred_content() if decoder is not None else None
+                    full_content: Optional[str] = None
+                    full_payload: Optional[dict] = None
+                    if deferred_content is not None and not is_delta_frame(redis_payload):
+                        full_content = deferred_content()
+                        full_payload = redis_payload
+
+                    def _get_full_payload() -> Optional[dict]:
+                        nonlocal full_content, full_payload
+                        if full_payload is None and deferred_content is not None:
+                            full_content = deferred_content()
+                            full_payload = to_full_payload(redis_payload, full_content)
+                        return full_payload
+
+                    # Check for errors in the stream content (both old "[ERROR:" format and new
+                    # standardized format) and convert them to the generic translation key.
+                    error_payload: Optional[dict] = None
+                    if _frame_has_ai_error(redis_payload, decoder, previous_tail):
+                        logger.warning(
+                            "AI Stream Listener: Detected error marker in stream "
+                            f"for chat {chat_id_from_payload}. Replacing with generic key."
+                        )
+                        error_payload = to_full_payload(redis_payload, "chat.an_error_occured")
+
+                    # Hand the snapshot to the coalescing writer instead of awaiting a SET
+                    # per chunk (at most one write per chat per flush interval).
                     if redis_payload.get("is_final_chunk", False):
-                        try:
-                            if hasattr(cache_service, "delete"):
-                                await cache_service.delete(snapshot_key)
-                        except Exception as snapshot_error:
-                            logger.debug(
-                                f"AI Stream Listener: Failed to delete stream snapshot for chat {chat_id_from_payload}: {snapshot_error}"
-                            )
-                    else:
-                        try:
-                            await cache_service.set(
-                                snapshot_key,
-                                redis_payload,
-                                ttl=AI_STREAM_SNAPSHOT_TTL_SECONDS,
-                            )
-                        except Exception as snapshot_error:
-                            logger.debug(
-                                f"AI Stream Listener: Failed to cache stream snapshot for chat {chat_id_from_payload}: {snapshot_error}"
-                            )
+                        ai_stream_snapshot_writer.submit_final(chat_id_from_payload, redis_payload.get("message_id"))
+                    elif full_payload is not None:
+                        ai_stream_snapshot_writer.submit(chat_id_from_payload, full_payload)
+                    elif deferred_content is not None:
+                        ai_stream_snapshot_writer.submit(
+                            chat_id_from_payload,
+                            lambda frame=redis_payload, build=deferred_content: to_full_payload(frame, build()),
+                            frame=redis_payload,
+                        )
 
                     logger.debug(f"AI Stream Listener: Received '{event_type}' for user_id_uuid {user_id_uuid} (hash: {user_id_hash_for_logging}), chat_id {chat_id_from_payload} from Redis channel '{redis_channel_name}'. Processing for selective forwarding.")
                     logger.debug(
@@ -755,26 +891,21 @@ async def listen_for_ai_chat_streams(app: FastAPI):
                         active_chat_on_device = manager.get_active_chat(user_id_uuid, device_hash)
                         
                         if chat_id_from_payload == active_chat_on_device:
-                            # Check for errors in the stream content (both old "[ERROR:" format and new standardized format)
-                            full_content = redis_payload.get("full_content_so_far", "")
-                            standardized_error = "The AI service encountered an error while processing your request. Please try again in a moment."
-                            if full_content and isinstance(full_content, str):
-                                if "[ERROR" in full_content:
-                                    logger.warning(
-                                        "AI Stream Listener: Detected error marker in stream "
-                                        f"for chat {chat_id_from_payload}. Replacing with generic key."
-                                    )
-                                    # Overwrite with a generic key for the frontend
-                                    redis_payload["full_content_so_far"] = "chat.an_error_occured"
-                                elif full_content.strip() == standardized_error:
-                                    # New standardized error format - already user-friendly, but convert to translation key for consistency
-                                    logger.warning(f"AI Stream Listener: Detected standardized error in stream for chat {chat_id_from_payload}")
-                                    redis_payload["full_content_so_far"] = "chat.an_error_occured"
+                            # Delta clients get frames as published (they resync from the snapshot
+                            # on gaps); full clients get the rebuilt full-content frame.
+                            if error_payload is not None:
+                                outgoing_payload = error_payload
+                            elif manager.get_stream_wire_mode(user_id_uuid, device_hash) == STREAM_WIRE_MODE_DELTA:
+                                outgoing_payload = redis_payload
+                            else:
+                                outgoing_payload = _get_full_payload()
+                            if outgoing_payload is None:
+                                continue
 
                             # CRITICAL: Send immediately - websocket.send_json() is fast (just queues message)
                             # This ensures chunks are forwarded as soon as they arrive from Redis
                             await manager.send_personal_message(
-                                message={"type": "ai_message_update", "payload": redis_payload},
+                                message={"type": "ai_message_update", "payload": outgoing_payload},
                                 user_id=user_id_uuid, # Use UUID
                                 device_fingerprint_hash=device_hash
                             )
@@ -788,22 +919,10 @@ async def listen_for_ai_chat_streams(app: FastAPI):
                                 # For inactive devices, send the completed AI response as a background update
                                 # This allows AI processing to continue in the background
                                 # Client will store the completed message and show it when the chat is opened
-                                
-                                # Check for errors in the stream content (same as active chat)
-                                full_content = redis_payload.get("full_content_so_far", "")
-                                standardized_error = "The AI service encountered an error while processing your request. Please try again in a moment."
-                                if full_content and isinstance(full_content, str):
-                                    if "[ERROR" in full_content:
-                                        logger.warning(
-                                            "AI Stream Listener: Detected error marker in background stream "
-                                            f"for chat {chat_id_from_payload}. Replacing with generic key."
-                                        )
-                                        # Overwrite with a generic key for the frontend
-                                        full_content = "chat.an_error_occured"
-                                    elif full_content.strip() == standardized_error:
-                                        # New standardized error format - already user-friendly, but convert to translation key for consistency
-                                        logger.warning(f"AI Stream Listener: Detected standardized error in background stream for chat {chat_id_from_payload}")
-                                        full_content = "chat.an_error_occured"
+                                # (final chunks are always full frames; errors use the generic key as above)
+                                background_content = (
+                                    "chat.an_error_occured" if error_payload is not None else (full_content or "")
+                                )
                                 
                                 # Send background completion event with full response
                                 background_completion_payload = {
@@ -811,7 +930,7 @@ async def listen_for_ai_chat_streams(app: FastAPI):
                                     "message_id": redis_payload.get("message_id"), # AI's message ID
                                     "user_message_id": redis_payload.get("user_message_id"),
                                     "task_id": redis_payload.get("task_id"),
-                                    "full_content": full_content,
+                                    "full_content": background_content,
                                     "model_name": redis_payload.get("model_name"),
                                     "category": redis_payload.get("category"),
                                     "interrupted_by_soft_limit": redis_payload.get("interrupted_by_soft_limit", False),
@@ -856,7 +975,7 @@ async def listen_for_ai_chat_streams(app: FastAPI):
                                     manager=manager,
                                     user_id=user_id_uuid,
                                     chat_id=chat_id_from_payload,
-                                    response_preview=redis_payload.get("full_content_so_far", ""),
+                                    response_preview=full_content or "",
                                     task_id=redis_payload.get("task_id"),
                                     max_attempts=3,
                                     delay_seconds=5,
@@ -908,7 +1027,7 @@ async def listen_for_ai_thinking_streams(app: FastAPI):
 
     await cache_service.client  # Ensure connection
 
-    async for message in cache_service.subscribe_to_channel("chat_stream_thinking::*"):
+    async for message in cache_service.subscribe_to_channel(*_routed_channel_patterns(app, "chat_stream_thinking::*")):
         logger.debug(
             "AI Thinking Stream Listener: Received pubsub message on chat_stream_thinking::* "
             f"(summary: {_safe_payload_summary(message)})"
@@ -1442,7 +1561,7 @@ async def listen_for_embed_data_events(app: FastAPI):
 
     await cache_service.client  # Ensure connection
 
-    async for message in cache_service.subscribe_to_channel("websocket:user:*"):
+    async for message in cache_service.subscribe_to_channel(*_routed_channel_patterns(app, "websocket:user:*")):
         logger.debug(
             "Embed Data Listener: Received pubsub message on websocket:user:* "
             f"(summary: {_safe_payload_summary(message)})"
@@ -2367,6 +2486,30 @@ async def websocket_endpoint(
                     user_id,
                     device_fingerprint_hash,
                 )
+            elif message_type == "set_stream_wire_mode":
+                # Per-connection negotiation of the ai_message_chunk wire format.
+                # Clients that never send this keep receiving full_content_so_far frames.
+                stream_wire_mode = manager.set_stream_wire_mode(
+                    user_id, device_fingerprint_hash, payload.get("mode")
+                )
+                await manager.send_personal_message(
+                    {
+                        "type": "stream_wire_mode_set",
+                        "payload": {"mode": stream_wire_mode},
+                    },
+                    user_id,
+                    device_fingerprint_hash,
+                )
+            elif message_type == "request_ai_stream_resync":
+                # A delta client missed a frame (gap or checksum mismatch) and asks
+                # for the latest full snapshot of the in-flight stream.
+                await handle_request_ai_stream_resync(
+                    manager=manager,
+                    cache_service=cache_service,
+                    user_id=user_id,
+                    device_fingerprint_hash=device_fingerprint_hash,
+                    payload=payload,
+                )
             elif message_type == "cancel_ai_task":
                 await handle_cancel_ai_task(
                     websocket=websocket,
@@ -0,0 +1,93 @@
+# backend/core/api/app/routes/ws_node_registry.py
+#
+# Registers which users this API node holds WebSocket connections for, so
+# publishers can target per-node channels instead of every node receiving every
+# chat stream chunk (see services/cache_ws_routing_mixin.py for the publish side).
+#
+# A node is one API process (one ConnectionManager). Registrations are leases
+# that expire after WS_NODE_LEASE_TTL unless renewed by the heartbeat, so a
+# crashed node stops receiving routed events within that window and its users'
+# events fall back to the shared channels once they reconnect elsewhere.
+# Disable with WS_NODE_ROUTING_ENABLED=false (publishers then always find no
+# node and use the shared channels).
+
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import uuid
+from typing import TYPE_CHECKING, Optional
+
+from backend.core.api.app.services import cache_config
+from backend.core.api.app.services.cache_ws_routing_mixin import ws_node_channel
+
+if TYPE_CHECKING:
+    from backend.core.api.app.routes.connection_manager import ConnectionManager
+    from backend.core.api.app.services.cache import CacheService
+
+logger = logging.getLogger(__name__)
+
+
+def is_ws_node_routing_enabled() -> bool:
+    return os.getenv("WS_NODE_ROUTING_ENABLED", "true").lower() not in ("0", "false", "no")
+
+
+def generate_ws_node_id() -> str:
+    """Unique id for this API process. `::` is reserved as the channel separator."""
+    configured = os.getenv("WS_NODE_ID")
+    if configured:
+        return configured.replace("::", "-")
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def user_id_hash_for(user_id: str) -> str:
+    # Same hash the WebSocket endpoint and AI tasks use as user_id_hash
+    return hashlib.sha256(user_id.encode()).hexdigest()
+
+
+class WebSocketNodeRegistry:
+    """Connection registry for one API node, backed by ws_user_nodes:* hashes."""
+
+    def __init__(
+        self,
+        cache_service: "CacheService",
+        manager: "ConnectionManager",
+        node_id: Optional[str] = None,
+        heartbeat_interval: float = cache_config.WS_NODE_HEARTBEAT_INTERVAL,
+    ):
+        self.cache_service = cache_service
+        self.manager = manager
+        self.node_id = node_id or generate_ws_node_id()
+        self.heartbeat_interval = heartbeat_interval
+
+    def channel_pattern(self, channel_pattern: str) -> str:
+        """Pattern for this node's copy of a routed channel (e.g. chat_stream::*)."""
+        return ws_node_channel(self.node_id, channel_pattern)
+
+    async def register_user(self, user_id: str) -> None:
+        await self.cache_service.register_ws_user_nodes(self.node_id, [user_id_hash_for(user_id)])
+
+    async def unregister_user(self, user_id: str) -> None:
+        await self.cache_service.unregister_ws_user_node(self.node_id, user_id_hash_for(user_id))
+
+    async def heartbeat_once(self) -> int:
+        """Renew the lease for every user currently connected to this node."""
+        user_ids = list(self.manager.active_connections.keys())
+        if user_ids:
+            await self.cache_service.register_ws_user_nodes(
+                self.node_id, (user_id_hash_for(user_id) for user_id in user_ids)
+            )
+        return len(user_ids)
+
+    async def run_heartbeat(self) -> None:
+        logger.info(f"WS node registry: heartbeat started for node {self.node_id}")
+        while True:
+            try:
+                count = await self.heartbeat_once()
+                logger.debug(f"WS node registry: renewed {count} user lease(s) for node {self.node_id}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"WS node registry: heartbeat failed for node {self.node_id}: {e}")
+            await asyncio.sleep(self.heartbeat_interval)
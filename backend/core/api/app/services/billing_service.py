@@ -5,6 +5,7 @@ import asyncio
 from typing import Dict, Any, Optional
 
 from backend.core.api.app.services.cache import CacheService
+from backend.core.api.app.services.credit_ledger import OVERDRAFT_LIMIT, CreditLedger
 from backend.core.api.app.services.directus import DirectusService
 from backend.core.api.app.utils.encryption import EncryptionService
 from backend.core.api.app.services.server_stats_service import ServerStatsService
@@ -25,6 +26,9 @@ class BillingService:
         self.encryption_service = encryption_service
         self.server_stats_service = server_stats_service
         self.websocket_manager = websocket_manager
+        # Atomic balance updates in the cache; Directus is updated write-behind by the
+        # billing.flush_credit_ledger beat task (see credit_ledger.py).
+        self.credit_ledger = CreditLedger(cache_service)
         # Strong references to in-flight auto top-up tasks.
         # asyncio discards unreferenced tasks before completion — keeping a set
         # prevents GC mid-payment and ensures exception callbacks fire.
@@ -139,14 +143,30 @@ class BillingService:
             from backend.core.api.app.utils.server_mode import is_payment_enabled
             payment_enabled = is_payment_enabled()
 
-            # Maximum allowed overdraft (negative credit balance). Skills are always charged to
-            # ensure users are billed even when a multi-step request (web searches, image
-            # generations) consumes slightly more than the remaining balance. When the user
-            # purchases credits again, the overdraft is subtracted from the purchased amount.
-            # See docs/architecture/billing.md for the full overdraft policy.
-            OVERDRAFT_LIMIT = -500
-            
+            # Overdraft policy (OVERDRAFT_LIMIT): skills are always charged so users are billed
+            # even when a multi-step request (web searches, image generations) consumes slightly
+            # more than the remaining balance. See docs/architecture/billing.md.
+            # The ledger applies the charge atomically in the cache and enforces the limit
+            # server-side; the read-modify-write below is only the fallback for profiles the
+            # ledger script cannot patch.
+            ledger_result = None
             if payment_enabled:
+                ledger_result = await self.credit_ledger.debit(
+                    user_id, credits_to_deduct, app_id.strip(), skill_id.strip()
+                )
+                if ledger_result.status == "insufficient":
+                    current_credits = ledger_result.balance
+            ledger_applied = bool(ledger_result and ledger_result.applied)
+
+            if ledger_applied:
+                new_credits = ledger_result.balance
+                credits_to_deduct = ledger_result.amount
+                if new_credits < 0:
+                    logger.warning(
+                        f"User {user_id} balance going into overdraft: {new_credits}. "
+                        "Skill charge allowed (overdraft policy)."
+                    )
+            elif payment_enabled:
                 # Payment enabled — allow up to OVERDRAFT_LIMIT before refusing the charge.
                 # This prevents multi-skill requests (which start concurrently) from failing
                 # mid-flight just because the user is a few credits short.
@@ -186,16 +206,20 @@ class BillingService:
                 await self.server_stats_service.increment_stat("credits_used", credits_to_deduct)
                 await self.server_stats_service.update_liability(-credits_to_deduct)
 
-            # 3. Update user in cache
-            await self.cache_service.set_user(user, user_id=user_id)
+            # 3. Update user in cache (already done atomically by the ledger)
+            if not ledger_applied:
+                await self.cache_service.set_user(user, user_id=user_id)
 
             # 3.5. Check if low balance auto top-up should trigger (only if payment enabled)
             if payment_enabled:
                 await self._check_and_trigger_low_balance_topup(user_id, user, new_credits)
 
             # 4. Update Directus with the encrypted string representation of the integer (only if payment enabled)
-            # In self-hosted mode, we still track usage but don't update credit balance in Directus
-            if payment_enabled:
+            # In self-hosted mode, we still track usage but don't update credit balance in Directus.
+            # Ledger charges are persisted write-behind, coalesced per user.
+            if ledger_applied:
+                logger.debug(f"Credit balance of user {user_id} queued for write-behind persistence.")
+            elif payment_enabled:
                 vault_key_id = user.get("vault_key_id")
                 if not vault_key_id:
                     # vault_key_id is still unavailable after the re-fetch above.
@@ -451,7 +475,11 @@ class BillingService:
                 current_credits = 0
 
             if payment_enabled:
-                new_credits = current_credits + credits_to_refund
+                ledger_result = await self.credit_ledger.credit(
+                    user_id, credits_to_refund, app_id.strip(), skill_id.strip()
+                )
+                ledger_applied = ledger_result.applied
+                new_credits = ledger_result.balance if ledger_applied else current_credits + credits_to_refund
             else:
                 # Self-hosted mode: credit balance is not tracked, skip actual update.
                 logger.info(
@@ -466,12 +494,15 @@ class BillingService:
                 await self.server_stats_service.increment_stat("credits_used", -credits_to_refund)
                 await self.server_stats_service.update_liability(credits_to_refund)
 
-            # 3. Update cache
-            await self.cache_service.set_user(user, user_id=user_id)
+            # 3. Update cache (already done atomically by the ledger)
+            if not ledger_applied:
+                await self.cache_service.set_user(user, user_id=user_id)
 
-            # 4. Persist to Directus with retry
+            # 4. Persist to Directus with retry (ledger refunds are persisted write-behind)
             _refund_vault_key_id = user.get("vault_key_id")
-            if not _refund_vault_key_id:
+            if ledger_applied:
+                logger.debug(f"[Refund] Credit balance of user {user_id} queued for write-behind persistence.")
+            elif not _refund_vault_key_id:
                 logger.error(
                     f"[Refund] vault_key_id unavailable for user_id={user_id}. "
                     "Cache balance updated but Directus update skipped (will self-heal on login)."
@@ -14,6 +14,8 @@ from .cache_reminder_mixin import ReminderCacheMixin
 from .cache_inspiration_mixin import InspirationCacheMixin
 from .cache_short_url_mixin import ShortUrlCacheMixin
 from .cache_bank_transfer_mixin import BankTransferCacheMixin
+from .cache_ws_routing_mixin import WebSocketRoutingCacheMixin
+from .config_snapshot import AI_CONFIG_GENERATION_CACHE_KEY, config_snapshots
 
 # Import schemas used by mixins (if any are directly type hinted in method signatures)
 # For example, if ChatCacheMixin methods directly hint at CachedChatVersions, etc.
@@ -36,6 +38,8 @@ CONTENT_SANITIZATION_MODEL_CACHE_KEY = "ai:content_sanitization_model_v1"
 PROMPT_INJECTION_DETECTION_CONFIG_CACHE_KEY = "ai:prompt_injection_detection_config_v1"
 
 class CacheService(
+    # Listed before the base: overrides publish_event to target the nodes holding the user
+    WebSocketRoutingCacheMixin,
     CacheServiceBase,
     UserCacheMixin,
     ChatCacheMixin,
@@ -57,6 +61,25 @@ class CacheService(
         super().__init__()
         logger.info("CacheService fully initialized with all mixins.")
 
+    async def _ai_config_generation(self) -> Optional[int]:
+        """Generation of the preloaded AI config blobs (see config_snapshot.py), None if unknown."""
+        try:
+            client = await self.client
+            return await config_snapshots.current_generation(client) if client else None
+        except Exception as e:
+            logger.warning(f"Could not read AI config generation, bypassing snapshots: {e}")
+            return None
+
+    async def _bump_ai_config_generation(self) -> None:
+        """Tell every worker process that a preloaded AI config blob changed."""
+        config_snapshots.invalidate()
+        try:
+            client = await self.client
+            if client:
+                await client.incr(AI_CONFIG_GENERATION_CACHE_KEY)
+        except Exception as e:
+            logger.warning(f"Failed to bump AI config generation: {e}")
+
     async def set_discovered_apps_metadata(self, metadata: Dict[str, AppYAML]):
         """
         Serializes and stores the discovered applications metadata in the cache WITHOUT expiration.
@@ -83,6 +106,7 @@ class CacheService(
             client = await self.client
             if client:
                 await client.set(DISCOVERED_APPS_METADATA_CACHE_KEY, metadata_json)
+                await self._bump_ai_config_generation()
                 logger.info(f"Successfully cached discovered_apps_metadata to Redis with key '{DISCOVERED_APPS_METADATA_CACHE_KEY}' (no expiration).")
             else:
                 logger.error("Failed to cache discovered_apps_metadata: Redis client not available.")
@@ -98,6 +122,10 @@ class CacheService(
             Optional[Dict[str, AppYAML]]: A dictionary of app IDs to their AppYAML metadata,
                                           or None if not found or an error occurs.
         """
+        generation = await self._ai_config_generation()
+        snapshot = config_snapshots.get(DISCOVERED_APPS_METADATA_CACHE_KEY, generation)
+        if snapshot is not None:
+            return dict(snapshot)
         try:
             logger.debug(f"Attempting to retrieve discovered_apps_metadata from cache with key '{DISCOVERED_APPS_METADATA_CACHE_KEY}'")
             metadata_json = await self.get(DISCOVERED_APPS_METADATA_CACHE_KEY)
@@ -151,6 +179,7 @@ class CacheService(
                     f"Consider clearing the cache key '{DISCOVERED_APPS_METADATA_CACHE_KEY}' to force re-discovery."
                 )
             
+            config_snapshots.put(DISCOVERED_APPS_METADATA_CACHE_KEY, generation, dict(discovered_apps_metadata))
             return discovered_apps_metadata if discovered_apps_metadata else None
         except json.JSONDecodeError as jde:
             logger.error(f"Failed to parse discovered_apps_metadata from cache (JSONDecodeError) for key '{DISCOVERED_APPS_METADATA_CACHE_KEY}': {jde}", exc_info=True)
@@ -172,6 +201,7 @@ class CacheService(
         try:
             instructions_json = json.dumps(base_instructions)
             await self.set(BASE_INSTRUCTIONS_CACHE_KEY, instructions_json, ttl=ttl)
+            await self._bump_ai_config_generation()
             logger.info(f"Successfully cached base_instructions to Redis with key '{BASE_INSTRUCTIONS_CACHE_KEY}' (TTL: {ttl}s).")
         except Exception as e:
             logger.error(f"Failed to set base_instructions in cache: {e}", exc_info=True)
@@ -184,6 +214,10 @@ class CacheService(
         Returns:
             Optional[Dict]: The base instructions dictionary, or None if not found or an error occurs.
         """
+        generation = await self._ai_config_generation()
+        snapshot = config_snapshots.get(BASE_INSTRUCTIONS_CACHE_KEY, generation)
+        if snapshot is not None:
+            return dict(snapshot)
         try:
             logger.debug(f"Attempting to retrieve base_instructions from cache with key '{BASE_INSTRUCTIONS_CACHE_KEY}'")
             instructions_json = await self.get(BASE_INSTRUCTIONS_CACHE_KEY)
@@ -198,11 +232,13 @@ class CacheService(
 
             # Check if the data is already a dictionary
             if isinstance(instructions_json, dict):
-                return instructions_json
+                instructions = instructions_json
             else:
                 instructions = json.loads(instructions_json)
                 logger.info("Successfully retrieved base_instructions from cache.")
-                return instructions
+            if isinstance(instructions, dict):
+                config_snapshots.put(BASE_INSTRUCTIONS_CACHE_KEY, generation, dict(instructions))
+            return instructions
         except json.JSONDecodeError as jde:
             logger.error(f"Failed to parse base_instructions from cache (JSONDecodeError) for key '{BASE_INSTRUCTIONS_CACHE_KEY}': {jde}", exc_info=True)
             return None
@@ -226,6 +262,7 @@ class CacheService(
             serializable_configs = [mate.model_dump(mode='json') for mate in mates_configs]
             configs_json = json.dumps(serializable_configs)
             await self.set(MATES_CONFIGS_CACHE_KEY, configs_json, ttl=ttl)
+            await self._bump_ai_config_generation()
             logger.info(f"Successfully cached {len(mates_configs)} mates_configs to Redis with key '{MATES_CONFIGS_CACHE_KEY}' (TTL: {ttl}s).")
         except Exception as e:
             logger.error(f"Failed to set mates_configs in cache: {e}", exc_info=True)
@@ -238,6 +275,10 @@ class CacheService(
         Returns:
             Optional[List[MateConfig]]: List of MateConfig objects, or None if not found or an error occurs.
         """
+        generation = await self._ai_config_generation()
+        snapshot = config_snapshots.get(MATES_CONFIGS_CACHE_KEY, generation)
+        if snapshot is not None:
+            return list(snapshot)
         try:
             logger.debug(f"Attempting to retrieve mates_configs from cache with key '{MATES_CONFIGS_CACHE_KEY}'")
             configs_json = await self.get(MATES_CONFIGS_CACHE_KEY)
@@ -286,6 +327,7 @@ class CacheService(
                     f"Consider clearing the cache key '{MATES_CONFIGS_CACHE_KEY}' to force re-loading from disk."
                 )
             
+            config_snapshots.put(MATES_CONFIGS_CACHE_KEY, generation, list(mates_configs))
             return mates_configs if mates_configs else None
         except json.JSONDecodeError as jde:
             logger.error(f"Failed to parse mates_configs from cache (JSONDecodeError) for key '{MATES_CONFIGS_CACHE_KEY}': {jde}", exc_info=True)
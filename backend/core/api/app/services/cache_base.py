@@ -5,10 +5,12 @@ import asyncio # Add asyncio for CancelledError
 import time
 import redis.asyncio as redis
 from redis import exceptions as redis_exceptions # Import exceptions from the main redis library
-from typing import Any, Optional, List
+from typing import Any, Dict, Iterable, Optional, List, Sequence
 
 # Import constants from the new config file
 from . import cache_config
+from .cache_pool import get_shared_cache_client
+from .cache_ws_routing_mixin import strip_ws_node_prefix
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +32,8 @@ class CacheServiceBase:
 
     _CONNECTION_RETRY_COOLDOWN_SECONDS = 30.0
     _PUBSUB_RECONNECT_DELAY_SECONDS = 1.0
+    # Max keys per MGET/DEL or commands per pipeline round trip in the bulk helpers
+    _BULK_CHUNK_SIZE = 500
     _next_connection_retry_at = 0.0
     _last_connection_warning_at = 0.0
 
@@ -38,6 +42,7 @@ class CacheServiceBase:
         self.redis_url = os.getenv("DRAGONFLY_URL", "cache:6379")
         self.DRAGONFLY_PASSWORD = os.getenv("DRAGONFLY_PASSWORD", "openmates_cache")
         self._client = None
+        self._client_loop = None  # Loop of the shared pool the client belongs to
         self._connection_error = False
 
         # Extract host and port from DRAGONFLY_URL
@@ -83,34 +88,23 @@ class CacheServiceBase:
 
     @property
     async def client(self) -> Optional[redis.Redis]:
-        """Get async Redis client, creating it if needed"""
+        """Get the async Redis client of this event loop's shared connection pool"""
+        if self._client is not None and self._client_loop is not None:
+            if self._client_loop is not asyncio.get_running_loop():
+                # Instance outlived the loop its client was bound to (e.g. a previous Celery task)
+                self._client = None
+                self._client_loop = None
         if self._client is None:
             now = time.monotonic()
             if now < type(self)._next_connection_retry_at:
                 return None
 
             try:
-                self._client = redis.Redis(
-                    host=self.host,
-                    port=self.port,
-                    password=self.DRAGONFLY_PASSWORD,
-                    socket_timeout=5,
-                    socket_connect_timeout=5,
-                    retry_on_timeout=True,
-                    health_check_interval=30,
-                    decode_responses=False
-                )
-                pong = await self._client.ping()
+                self._client = await get_shared_cache_client(self.host, self.port, self.DRAGONFLY_PASSWORD)
+                self._client_loop = asyncio.get_running_loop()
                 self._connection_error = False
                 type(self)._next_connection_retry_at = 0.0
                 type(self)._last_connection_warning_at = 0.0
-                logger.debug(f"Successfully connected to async cache at {self.host}:{self.port} (PING={pong})")
-                try:
-                    info = await self._client.info()
-                    logger.debug(f"Cache server: {info.get('redis_version', 'unknown')}, "
-                               f"clients: {info.get('connected_clients', 'unknown')}")
-                except Exception:
-                    logger.warning("Could not get Redis info")
             except Exception as e:
                 type(self)._next_connection_retry_at = now + self._CONNECTION_RETRY_COOLDOWN_SECONDS
                 if now - type(self)._last_connection_warning_at >= self._CONNECTION_RETRY_COOLDOWN_SECONDS:
@@ -191,28 +185,27 @@ class CacheServiceBase:
 
     async def close(self) -> None:
         """
-        Close the Redis client connection.
-        
-        CRITICAL: Call this method before the event loop closes (e.g., at the end of 
-        asyncio.run() in Celery tasks). The async Redis client maintains connections
-        that are bound to a specific event loop. If not properly closed, subsequent
-        tasks using asyncio.run() will fail with "Event loop is closed" errors because
-        the cached client references a closed event loop.
-        
-        This method:
-        1. Gracefully closes the Redis connection pool
-        2. Resets the client reference so a new client can be created for the next event loop
+        Release this instance's Redis client.
+
+        Clients obtained through `client` belong to the event loop's shared pool
+        (cache_pool.py), which stays open for the other CacheService instances;
+        this only drops the reference. To close the pool itself before the loop
+        ends (e.g. at the end of asyncio.run() in Celery tasks) call
+        cache_pool.close_shared_cache_pools().
+
+        A client assigned directly to `_client` (not from the shared pool) is
+        closed here as before.
         """
         if self._client is not None:
             try:
-                await self._client.aclose()
-                logger.debug("Redis client connection closed successfully")
+                if self._client_loop is None:
+                    await self._client.aclose()
+                    logger.debug("Redis client connection closed successfully")
             except Exception as e:
                 logger.warning(f"Error closing Redis client: {e}")
             finally:
-                # Reset client reference so next task creates a fresh client
-                # bound to its own event loop
                 self._client = None
+                self._client_loop = None
                 self._connection_error = False
 
     async def delete(self, key: str) -> bool:
@@ -249,6 +242,84 @@ class CacheServiceBase:
             logger.error(f"Cache get_keys_by_pattern error for pattern {pattern}: {str(e)}")
             return []
 
+    # ========== Bulk helpers ==========
+    # Used by the mixins instead of one awaited command per item. Unlike get/set/delete
+    # these do not swallow errors, so callers keep their own fallback handling.
+
+    @staticmethod
+    def _chunks(items: Sequence[Any], size: int) -> Iterable[Sequence[Any]]:
+        for start in range(0, len(items), size):
+            yield items[start:start + size]
+
+    async def execute_bulk_commands(
+        self,
+        commands: Sequence[tuple],
+        transaction: bool = False,
+        chunk_size: Optional[int] = None,
+    ) -> List[Any]:
+        """
+        Run raw client commands (method_name, *args) in pipelines of up to chunk_size
+        commands and return their results in order. With transaction=True every chunk
+        runs as MULTI/EXEC. Returns [] if the client is not connected.
+        """
+        client = await self.client
+        if not client or not commands:
+            return []
+
+        results: List[Any] = []
+        for chunk in self._chunks(commands, chunk_size or self._BULK_CHUNK_SIZE):
+            async with client.pipeline(transaction=transaction) as pipe:
+                for method_name, *args in chunk:
+                    getattr(pipe, method_name)(*args)
+                results.extend(await pipe.execute())
+        return results
+
+    async def mget_raw(self, keys: Sequence[str]) -> List[Any]:
+        """MGET in chunks; returns the raw values (None for misses) in key order."""
+        if not keys:
+            return []
+        client = await self.client
+        if not client:
+            return [None] * len(keys)
+
+        values: List[Any] = []
+        for chunk in self._chunks(keys, self._BULK_CHUNK_SIZE):
+            values.extend(await client.mget(list(chunk)))
+        return values
+
+    async def mget_json(self, keys: Sequence[str]) -> List[Any]:
+        """
+        MGET in chunks and decode every value as JSON in one pass. Misses and
+        malformed values come back as None (the latter with a warning).
+        """
+        decoded: List[Any] = []
+        for key, value in zip(keys, await self.mget_raw(keys)):
+            if value is None:
+                decoded.append(None)
+                continue
+            try:
+                decoded.append(json.loads(value))
+            except (json.JSONDecodeError, TypeError, ValueError, UnicodeDecodeError) as e:
+                logger.warning(f"Cache MGET: malformed JSON for key '{key}': {e}")
+                decoded.append(None)
+        return decoded
+
+    async def delete_many(self, keys: Sequence[str]) -> int:
+        """Multi-key DEL in chunks; returns the number of keys that existed."""
+        client = await self.client
+        if not client or not keys:
+            return 0
+
+        deleted = 0
+        for chunk in self._chunks(keys, self._BULK_CHUNK_SIZE):
+            deleted += await client.delete(*chunk)
+        return deleted
+
+    async def expire_many(self, keys: Sequence[str], ttl: int) -> Dict[str, bool]:
+        """EXPIRE every key in pipelines; returns key -> whether the key existed."""
+        results = await self.execute_bulk_commands([("expire", key, ttl) for key in keys])
+        return {key: bool(result) for key, result in zip(keys, results)}
+
     async def clear(self, prefix: str = "") -> bool:
         """Clear all cached values with optional prefix"""
         try:
@@ -297,8 +368,13 @@ class CacheServiceBase:
             logger.error(f"Cache PUBLISH error for channel '{channel}': {str(e)}")
             return False
 
-    async def subscribe_to_channel(self, channel_pattern: str):
-        """Subscribe to a Redis channel pattern and yield messages."""
+    async def subscribe_to_channel(self, channel_pattern: str, *additional_patterns: str):
+        """
+        Subscribe to one or more Redis channel patterns on a single connection and
+        yield messages. Node-targeted channels (ws_node::{node_id}::{channel}) are
+        yielded under their original channel name.
+        """
+        patterns = (channel_pattern, *additional_patterns)
         while True:
             client = await self.client
             if not client:
@@ -309,8 +385,8 @@ class CacheServiceBase:
             pubsub = None
             try:
                 pubsub = client.pubsub()
-                await pubsub.psubscribe(channel_pattern)
-                logger.debug(f"Subscribed to Redis channel pattern: {channel_pattern}")
+                await pubsub.psubscribe(*patterns)
+                logger.debug(f"Subscribed to Redis channel pattern(s): {patterns}")
 
                 while True:
                     # CRITICAL: Use shorter timeout (0.1s) for faster message processing
@@ -326,6 +402,8 @@ class CacheServiceBase:
                         channel = message.get("channel")
                         if isinstance(channel, bytes):
                             channel = channel.decode('utf-8')
+                        if channel and channel.startswith(cache_config.WS_NODE_CHANNEL_PREFIX):
+                            channel = strip_ws_node_prefix(channel)
 
                         data = message.get("data")
                         if isinstance(data, bytes):
@@ -366,7 +444,7 @@ class CacheServiceBase:
                 logger.debug(f"Unsubscribing from Redis channel pattern: {channel_pattern}")
                 if pubsub:
                     try:
-                        await pubsub.punsubscribe(channel_pattern)
+                        await pubsub.punsubscribe(*patterns)
                         await pubsub.close() # Ensure the pubsub connection is closed
                     except Exception as e_close:
                         logger.error(f"Error during pubsub close/unsubscribe for '{channel_pattern}': {e_close}")
@@ -5,6 +5,87 @@ from backend.core.api.app.schemas.chat import CachedChatVersions, CachedChatList
 
 logger = logging.getLogger(__name__)
 
+# Embed reference counts (embed:{embed_id}:refs): the number of chat embed indexes
+# (chat:{chat_id}:embed_ids) that contain the embed. Kept in step with the indexes
+# by the scripts below so AI cache eviction and chat deletion can drop an embed
+# once no other chat refers to it, without reading any other chat's index. Index
+# keys that expire leave the count too high, which only delays eviction until the
+# embed's own TTL. Embeds without a count (indexed before counts existed, or whose
+# count expired) are never dropped by a release; they also expire with their TTL.
+
+# KEYS: chat embed index, embed refcount
+# ARGV: embed_id, ttl
+_INDEX_CHAT_EMBED_LUA = """
+local added = redis.call('SADD', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+if added == 1 then
+    redis.call('INCR', KEYS[2])
+end
+if redis.call('TTL', KEYS[2]) < tonumber(ARGV[2]) then
+    redis.call('EXPIRE', KEYS[2], ARGV[2])
+end
+return added
+"""
+
+# KEYS: chat embed index, embed refcount
+# ARGV: embed_id
+_UNINDEX_CHAT_EMBED_LUA = """
+local removed = redis.call('SREM', KEYS[1], ARGV[1])
+if removed == 1 and redis.call('EXISTS', KEYS[2]) == 1 and redis.call('DECR', KEYS[2]) <= 0 then
+    redis.call('DEL', KEYS[2])
+end
+return removed
+"""
+
+# Every script declares the keys it touches: Dragonfly only locks declared keys,
+# while undeclared-key scripts run under a global lock. Releasing a chat's embed
+# index therefore takes two scripts: detaching it returns the embed ids, then their
+# keys are declared to release the references.
+
+# Read and delete a chat's embed index in one step, so the references it held are
+# released exactly once (by _RELEASE_EMBED_REFS_LUA).
+# KEYS: chat embed index
+# Returns: the embed ids that were indexed
+_DETACH_CHAT_EMBED_INDEX_LUA = """
+local embed_ids = redis.call('SMEMBERS', KEYS[1])
+redis.call('DEL', KEYS[1])
+return embed_ids
+"""
+
+# Release one reference per embed and delete the embeds no chat refers to anymore.
+# KEYS: embed refcount, embed cache entry (one pair per embed)
+# Returns: number of embed cache entries deleted
+_RELEASE_EMBED_REFS_LUA = """
+local deleted = 0
+for i = 1, #KEYS, 2 do
+    if redis.call('EXISTS', KEYS[i]) == 1 and redis.call('DECR', KEYS[i]) <= 0 then
+        deleted = deleted + redis.call('DEL', KEYS[i + 1])
+        redis.call('DEL', KEYS[i])
+    end
+end
+return deleted
+"""
+
+# Embeds released per _RELEASE_EMBED_REFS_LUA call (two keys each)
+_EMBED_RELEASE_BATCH_SIZE = 256
+
+# Touch a chat in the user's AI cache LRU and remove the chats beyond the limit
+# from it. The caller drops the evicted chats' AI messages and embed indexes.
+# KEYS: AI cache LRU sorted set
+# ARGV: chat_id, timestamp, ttl, max chats
+# Returns: evicted chat ids
+_TRACK_AI_CACHE_ACTIVITY_LUA = """
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+local excess = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[4])
+if excess <= 0 then
+    return {}
+end
+local evicted = redis.call('ZRANGE', KEYS[1], 0, excess - 1)
+redis.call('ZREM', KEYS[1], unpack(evicted))
+return evicted
+"""
+
 class ChatCacheMixin:
     """Mixin for new chat sync architecture caching methods"""
 
@@ -1061,6 +1142,29 @@ class ChatCacheMixin:
             logger.error(f"Error getting sync messages from {key}: {e}")
             return []
     
+    async def get_sync_messages_histories(self, user_id: str, chat_ids: List[str]) -> Dict[str, List[str]]:
+        """
+        Gets the sync cache messages of several chats in a single pipeline round-trip.
+        Returns a dict mapping chat_id -> messages (empty list on a miss).
+        """
+        if not chat_ids:
+            return {}
+        client = await self.client
+        if not client:
+            return {chat_id: [] for chat_id in chat_ids}
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for chat_id in chat_ids:
+                    pipe.lrange(self._get_sync_messages_key(user_id, chat_id), 0, -1)
+                responses = await pipe.execute()
+            return {
+                chat_id: [msg.decode('utf-8') for msg in (messages_bytes or [])]
+                for chat_id, messages_bytes in zip(chat_ids, responses)
+            }
+        except Exception as e:
+            logger.error(f"Error getting sync messages for {len(chat_ids)} chats of user {user_id[:8]}...: {e}")
+            return {chat_id: [] for chat_id in chat_ids}
+
     async def delete_sync_messages_history(self, user_id: str, chat_id: str) -> bool:
         """Deletes the sync message history for a specific chat."""
         client = await self.client
@@ -1236,7 +1340,8 @@ class ChatCacheMixin:
         """
         Updates the AI cache LRU sorted set to track which chats have AI cache.
         Score is current timestamp (for LRU ordering).
-        Also enforces TOP_N_MESSAGES_COUNT limit by evicting oldest chats and their embeds.
+        Also enforces TOP_N_MESSAGES_COUNT limit by evicting oldest chats and the
+        embeds no other chat refers to (see _TRACK_AI_CACHE_ACTIVITY_LUA).
         """
         client = await self.client
         if not client:
@@ -1245,92 +1350,24 @@ class ChatCacheMixin:
         lru_key = self._get_ai_cache_lru_key(user_id)
         try:
             import time
-            current_timestamp = time.time()
-
-            # Add/update this chat in the LRU set with current timestamp as score
-            await client.zadd(lru_key, {chat_id: current_timestamp})
-            await client.expire(lru_key, self.CHAT_MESSAGES_TTL)  # Same TTL as AI cache
-
-            # Check if we need to evict old chats (enforce TOP_N_MESSAGES_COUNT limit)
-            total_chats = await client.zcard(lru_key)
-            if total_chats > self.TOP_N_MESSAGES_COUNT:
-                # Get chats to evict (oldest ones beyond the limit)
-                # ZRANGE with scores sorted ascending (oldest first)
-                chats_to_evict = await client.zrange(
-                    lru_key,
-                    0,
-                    total_chats - self.TOP_N_MESSAGES_COUNT - 1
-                )
-
-                # Get the remaining top N chat IDs (for embed cross-reference checking)
-                remaining_chat_ids_bytes = await client.zrange(
-                    lru_key,
-                    total_chats - self.TOP_N_MESSAGES_COUNT,
-                    -1
-                )
-                remaining_chat_ids = {
-                    cid.decode('utf-8') if isinstance(cid, bytes) else cid
-                    for cid in remaining_chat_ids_bytes
-                }
-
-                for evict_chat_id_bytes in chats_to_evict:
-                    evict_chat_id = evict_chat_id_bytes.decode('utf-8') if isinstance(evict_chat_id_bytes, bytes) else evict_chat_id_bytes
-
-                    # Delete the AI cache for this chat
-                    ai_cache_key = self._get_ai_messages_key(user_id, evict_chat_id)
-                    await client.delete(ai_cache_key)
-
-                    # Evict embeds that are only used by this chat
-                    await self._evict_chat_embeds(client, evict_chat_id, remaining_chat_ids)
-
-                    # Remove from LRU tracking
-                    await client.zrem(lru_key, evict_chat_id)
-                    logger.info(f"[AI_CACHE_LRU] Evicted AI cache for chat {evict_chat_id} (user {user_id[:8]}...) - exceeded TOP_N_MESSAGES_COUNT ({self.TOP_N_MESSAGES_COUNT})")
+            evicted = await client.eval(
+                _TRACK_AI_CACHE_ACTIVITY_LUA,
+                1,
+                lru_key,
+                chat_id,
+                time.time(),
+                self.CHAT_MESSAGES_TTL,  # Same TTL as AI cache
+                self.TOP_N_MESSAGES_COUNT,
+            )
+            for evict_chat_id in evicted:
+                evict_chat_id = evict_chat_id.decode('utf-8') if isinstance(evict_chat_id, bytes) else evict_chat_id
+                await client.delete(self._get_ai_messages_key(user_id, evict_chat_id))
+                evicted_embeds = await self._release_chat_embed_index(client, evict_chat_id)
+                logger.info(f"[AI_CACHE_LRU] Evicted AI cache for chat {evict_chat_id} (user {user_id[:8]}...) and {evicted_embeds} embed(s) - exceeded TOP_N_MESSAGES_COUNT ({self.TOP_N_MESSAGES_COUNT})")
 
         except Exception as e:
             logger.error(f"Error tracking AI cache activity for user {user_id[:8]}..., chat {chat_id}: {e}")
 
-    async def _evict_chat_embeds(self, client, evict_chat_id: str, remaining_chat_ids: set) -> None:
-        """
-        Evicts embeds that are only used by the evicted chat.
-        Embeds used in any of the remaining chats are preserved.
-        """
-        try:
-            # Get embed IDs for the evicted chat
-            evict_embed_index_key = f"chat:{evict_chat_id}:embed_ids"
-            embed_ids_bytes = await client.smembers(evict_embed_index_key)
-
-            if not embed_ids_bytes:
-                return
-
-            # Collect embed indices for remaining chats to check cross-references
-            remaining_embed_ids: set = set()
-            for remaining_chat_id in remaining_chat_ids:
-                remaining_index_key = f"chat:{remaining_chat_id}:embed_ids"
-                remaining_embeds = await client.smembers(remaining_index_key)
-                for embed_id_bytes in remaining_embeds:
-                    embed_id = embed_id_bytes.decode('utf-8') if isinstance(embed_id_bytes, bytes) else embed_id_bytes
-                    remaining_embed_ids.add(embed_id)
-
-            # Evict embeds not used in remaining chats
-            evicted_count = 0
-            for embed_id_bytes in embed_ids_bytes:
-                embed_id = embed_id_bytes.decode('utf-8') if isinstance(embed_id_bytes, bytes) else embed_id_bytes
-                if embed_id not in remaining_embed_ids:
-                    # Embed is only used by evicted chat - delete it
-                    embed_cache_key = f"embed:{embed_id}"
-                    await client.delete(embed_cache_key)
-                    evicted_count += 1
-
-            # Delete the embed index for the evicted chat
-            await client.delete(evict_embed_index_key)
-
-            if evicted_count > 0:
-                logger.info(f"[AI_CACHE_LRU] Evicted {evicted_count} embed(s) for chat {evict_chat_id}")
-
-        except Exception as e:
-            logger.error(f"Error evicting embeds for chat {evict_chat_id}: {e}")
-
     async def delete_ai_messages_history(self, user_id: str, chat_id: str) -> bool:
         """Deletes the AI message history for a chat and removes it from LRU tracking."""
         client = await self.client
@@ -1650,6 +1687,21 @@ class ChatCacheMixin:
     def _get_chat_embed_ids_key(self, chat_id: str) -> str:
         """Returns the cache key for tracking embed IDs in a chat (for eviction)."""
         return f"chat:{chat_id}:embed_ids"
+
+    def _get_embed_refs_key(self, embed_id: str) -> str:
+        """Returns the cache key counting the chat embed indexes that contain an embed."""
+        return f"embed:{embed_id}:refs"
+
+    async def _index_chat_embed(self, client, chat_id: str, embed_id: str, ttl: int) -> None:
+        """Adds an embed to a chat's embed index and counts the reference."""
+        await client.eval(
+            _INDEX_CHAT_EMBED_LUA,
+            2,
+            self._get_chat_embed_ids_key(chat_id),
+            self._get_embed_refs_key(embed_id),
+            embed_id,
+            ttl,
+        )
     
     async def get_embed_from_cache(self, embed_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -1711,9 +1763,7 @@ class ChatCacheMixin:
             await client.set(key, embed_json, ex=ttl)
             
             # Add to chat index for eviction tracking
-            chat_embed_index_key = self._get_chat_embed_ids_key(chat_id)
-            await client.sadd(chat_embed_index_key, embed_id)
-            await client.expire(chat_embed_index_key, ttl)
+            await self._index_chat_embed(client, chat_id, embed_id, ttl)
             
             logger.debug(f"Cached embed {embed_id} at {key} with TTL {ttl}s")
             return True
@@ -1761,10 +1811,8 @@ class ChatCacheMixin:
         if not client:
             return False
         
-        key = self._get_chat_embed_ids_key(chat_id)
         try:
-            await client.sadd(key, embed_id)
-            await client.expire(key, ttl)
+            await self._index_chat_embed(client, chat_id, embed_id, ttl)
             logger.debug(f"Added embed {embed_id} to chat index {chat_id}")
             return True
         except Exception as e:
@@ -1773,12 +1821,16 @@ class ChatCacheMixin:
     
     async def delete_chat_embed_cache(self, chat_id: str) -> int:
         """
-        Delete all cached embeds for a chat and the embed index.
+        Delete the chat's embed index and release its embed references.
+        
+        This should be called when a chat is deleted to clean up the embed caches
+        associated with that chat. It:
+        1. Deletes the chat's embed index (chat:{chat_id}:embed_ids)
+        2. Decrements the reference count of every embed in the index and deletes
+           the embeds (embed:{embed_id}) no other chat refers to
         
-        This should be called when a chat is deleted to clean up all embed caches
-        associated with that chat. It removes:
-        1. All individual embed cache entries (embed:{embed_id})
-        2. The chat's embed index (chat:{chat_id}:embed_ids)
+        Embeds still referenced by another chat, or without a reference count,
+        stay cached until their TTL.
         
         Args:
             chat_id: The chat ID whose embeds should be cleared
@@ -1791,40 +1843,26 @@ class ChatCacheMixin:
             logger.warning(f"Redis client not available, cannot delete embed cache for chat {chat_id}")
             return 0
         
-        chat_embed_index_key = self._get_chat_embed_ids_key(chat_id)
-        deleted_count = 0
-        
         try:
-            # Get all embed IDs from the chat's index
-            embed_ids_bytes = await client.smembers(chat_embed_index_key)
-            
-            if embed_ids_bytes:
-                # Delete each embed's cache entry
-                for embed_id_bytes in embed_ids_bytes:
-                    embed_id = embed_id_bytes.decode('utf-8') if isinstance(embed_id_bytes, bytes) else embed_id_bytes
-                    embed_key = self._get_embed_cache_key(embed_id)
-                    try:
-                        result = await client.delete(embed_key)
-                        if result:
-                            deleted_count += 1
-                            logger.debug(f"Deleted embed cache: {embed_key}")
-                    except Exception as embed_delete_error:
-                        logger.warning(f"Failed to delete embed cache {embed_key}: {embed_delete_error}")
-                
-                logger.info(f"Deleted {deleted_count} embed cache entries for chat {chat_id}")
-            else:
-                logger.debug(f"No embed IDs found in index for chat {chat_id}")
-            
-            # Always attempt to delete the index key itself
-            await client.delete(chat_embed_index_key)
-            logger.debug(f"Deleted chat embed index key: {chat_embed_index_key}")
-            
+            deleted_count = await self._release_chat_embed_index(client, chat_id)
+            logger.info(f"Deleted {deleted_count} embed cache entries and the embed index for chat {chat_id}")
             return deleted_count
-            
         except Exception as e:
             logger.error(f"Error deleting embed cache for chat {chat_id}: {e}", exc_info=True)
-            return deleted_count
+            return 0
     
+    async def _release_chat_embed_index(self, client, chat_id: str) -> int:
+        """Delete a chat's embed index and release its embed references; returns embeds deleted."""
+        embed_ids = await client.eval(_DETACH_CHAT_EMBED_INDEX_LUA, 1, self._get_chat_embed_ids_key(chat_id))
+        deleted = 0
+        for start in range(0, len(embed_ids), _EMBED_RELEASE_BATCH_SIZE):
+            keys = []
+            for embed_id in embed_ids[start:start + _EMBED_RELEASE_BATCH_SIZE]:
+                embed_id = embed_id.decode('utf-8') if isinstance(embed_id, bytes) else embed_id
+                keys += [self._get_embed_refs_key(embed_id), self._get_embed_cache_key(embed_id)]
+            deleted += int(await client.eval(_RELEASE_EMBED_REFS_LUA, len(keys), *keys) or 0)
+        return deleted
+
     async def remove_embed_from_chat_cache(self, chat_id: str, embed_id: str) -> bool:
         """
         Remove a single embed from cache: deletes the embed:{embed_id} key
@@ -1851,9 +1889,11 @@ class ChatCacheMixin:
                 removed = True
                 logger.debug(f"Deleted embed cache key: {embed_key}")
             
-            # Remove from the chat's embed index set
+            # Remove from the chat's embed index set (and drop its reference)
             chat_embed_index_key = self._get_chat_embed_ids_key(chat_id)
-            await client.srem(chat_embed_index_key, embed_id)
+            await client.eval(
+                _UNINDEX_CHAT_EMBED_LUA, 2, chat_embed_index_key, self._get_embed_refs_key(embed_id), embed_id
+            )
             logger.debug(f"Removed embed {embed_id} from chat embed index: {chat_embed_index_key}")
             
             return removed
@@ -1879,27 +1919,15 @@ class ChatCacheMixin:
             return []
         
         try:
-            import json
-            
             # Get embed IDs from chat index
             embed_ids = await self.get_chat_embed_ids(chat_id)
             if not embed_ids:
                 logger.debug(f"No embeds indexed for chat {chat_id}")
                 return []
             
-            # Fetch each embed from sync cache
-            embeds = []
-            for embed_id in embed_ids:
-                sync_key = f"embed:{embed_id}:sync"
-                embed_json = await client.get(sync_key)
-                if embed_json:
-                    try:
-                        embed_data = json.loads(embed_json.decode('utf-8') if isinstance(embed_json, bytes) else embed_json)
-                        embeds.append(embed_data)
-                    except json.JSONDecodeError as e:
-                        logger.warning(f"Failed to parse embed {embed_id} from sync cache: {e}")
-                else:
-                    logger.debug(f"Embed {embed_id} not found in sync cache (may have expired)")
+            # Fetch all embeds from sync cache in one MGET (missing ones may have expired)
+            values = await self.mget_json([f"embed:{embed_id}:sync" for embed_id in embed_ids])
+            embeds = [embed_data for embed_data in values if embed_data is not None]
             
             logger.info(f"Retrieved {len(embeds)} embeds from sync cache for chat {chat_id}")
             return embeds
@@ -1907,6 +1935,43 @@ class ChatCacheMixin:
             logger.error(f"Error getting sync embeds for chat {chat_id}: {e}", exc_info=True)
             return []
     
+    async def get_sync_embeds_for_chats(self, chat_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Bulk variant of get_sync_embeds_for_chat: one pipeline for the chats' embed
+        indexes and one MGET for the embeds. Returns chat_id -> embeds (empty on a miss).
+        """
+        if not chat_ids:
+            return {}
+        client = await self.client
+        if not client:
+            return {chat_id: [] for chat_id in chat_ids}
+
+        try:
+            index_responses = await self.execute_bulk_commands(
+                [("smembers", self._get_chat_embed_ids_key(chat_id)) for chat_id in chat_ids]
+            )
+
+            embed_ids_by_chat = {
+                chat_id: [embed_id.decode('utf-8') for embed_id in (embed_ids_bytes or [])]
+                for chat_id, embed_ids_bytes in zip(chat_ids, index_responses)
+            }
+            all_embed_ids = [embed_id for embed_ids in embed_ids_by_chat.values() for embed_id in embed_ids]
+            if not all_embed_ids:
+                return {chat_id: [] for chat_id in chat_ids}
+
+            values = await self.mget_json([f"embed:{embed_id}:sync" for embed_id in all_embed_ids])
+            embeds_by_id: Dict[str, Dict[str, Any]] = {
+                embed_id: embed_data for embed_id, embed_data in zip(all_embed_ids, values) if embed_data is not None
+            }
+
+            return {
+                chat_id: [embeds_by_id[embed_id] for embed_id in embed_ids if embed_id in embeds_by_id]
+                for chat_id, embed_ids in embed_ids_by_chat.items()
+            }
+        except Exception as e:
+            logger.error(f"Error getting sync embeds for {len(chat_ids)} chats: {e}", exc_info=True)
+            return {chat_id: [] for chat_id in chat_ids}
+
     # ========== App Memories Cache Methods ==========
     
     def _get_app_settings_memories_cache_key(self, user_id: str, chat_id: str, app_id: str, item_key: str) -> str:
@@ -2080,25 +2145,14 @@ class ChatCacheMixin:
                 logger.debug(f"No app settings/memories to delete for chat {chat_id}")
                 return 0
             
-            # Delete all entries
-            deleted_count = 0
-            for key_str in keys:
-                try:
-                    # Parse "app_id:item_key" format
-                    parts = key_str.split(":", 1)
-                    if len(parts) != 2:
-                        continue
-                    
-                    app_id, item_key = parts
-                    cache_key = self._get_app_settings_memories_cache_key(user_id, chat_id, app_id, item_key)
-                    result = await client.delete(cache_key)
-                    if result:
-                        deleted_count += 1
-                except Exception as e:
-                    logger.error(f"Error deleting app settings/memories {key_str} for chat {chat_id}: {e}", exc_info=True)
-                    continue
+            # Delete all entries (keys are in "app_id:item_key" format), then the index
+            cache_keys = [
+                self._get_app_settings_memories_cache_key(user_id, chat_id, *key_str.split(":", 1))
+                for key_str in keys
+                if ":" in key_str
+            ]
+            deleted_count = await self.delete_many(cache_keys)
             
-            # Delete the index
             index_key = self._get_chat_app_settings_memories_index_key(chat_id)
             await client.delete(index_key)
             
@@ -1,3 +1,5 @@
+import os
+
 # Default TTL values (in seconds)
 DEFAULT_TTL = 3600  # 1 hour
 USER_TTL = 86400    # 24 hours
@@ -50,3 +52,19 @@ SHORT_URL_DEFAULT_TTL = 300        # 5 minutes default
 SHORT_URL_MIN_TTL = 60             # 1 minute minimum
 SHORT_URL_MAX_TTL = 3600           # 1 hour maximum
 MAX_SHORT_URL_RESOLVES = 10        # Max resolves per token lifetime
+
+# --- WebSocket Node Routing (see cache_ws_routing_mixin.py) ---
+WS_USER_NODES_KEY_PREFIX = "ws_user_nodes:"   # ws_user_nodes:{user_id_hash} → hash {node_id: lease_expires_at}
+WS_NODE_CHANNEL_PREFIX = "ws_node::"           # ws_node::{node_id}::{original_channel}
+WS_NODE_LEASE_TTL = 30                         # Seconds a node's registration stays valid without a heartbeat
+WS_NODE_HEARTBEAT_INTERVAL = 10                # Seconds between registry heartbeats on each API node
+WS_USER_NODES_LOOKUP_TTL = 1.0                 # Seconds publishers cache a user's node set in-process
+# Channels whose events are only ever delivered to a user's own WebSocket connections
+WS_ROUTED_CHANNEL_PREFIXES = ("chat_stream::", "chat_stream_thinking::", "websocket:user:")
+
+# --- Shared Connection Pool (see cache_pool.py) ---
+# All CacheService instances in a process share one blocking pool per event loop.
+# Pub/sub subscriptions use a separate unbounded pool and do not count against it.
+CACHE_POOL_MAX_CONNECTIONS = int(os.getenv("CACHE_POOL_MAX_CONNECTIONS", "50"))    # Per event loop
+CACHE_POOL_TIMEOUT = float(os.getenv("CACHE_POOL_TIMEOUT", "5"))                     # Seconds to wait for a free connection
+CACHE_POOL_HEALTH_CHECK_INTERVAL = int(os.getenv("CACHE_POOL_HEALTH_CHECK_INTERVAL", "30"))  # Seconds idle before a connection is re-checked
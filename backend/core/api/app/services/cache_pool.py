@@ -0,0 +1,223 @@
+# backend/core/api/app/services/cache_pool.py
+#
+# Process-wide Dragonfly connection pools shared by every CacheService instance.
+#
+# Skills and Celery tasks construct CacheService() per execution; each instance
+# used to open its own redis.asyncio.Redis (new TCP connection, PING and INFO on
+# first use). Instances now borrow one client per (event loop, server) from this
+# registry. The pool is a BlockingConnectionPool with a configurable size, so
+# bursts wait for a free connection instead of opening unbounded sockets.
+# Pub/sub connections are held for as long as a subscription lives (SSE
+# clients, REST ask streams, WebSocket listeners), so client.pubsub() draws
+# from a separate unbounded pool: open subscriptions can never starve commands.
+#
+# Pools are per event loop because redis.asyncio connections are bound to the
+# loop that opened them (Celery runs each task in its own asyncio.run loop).
+# Closing a CacheService only drops its reference; pools are closed explicitly
+# with close_shared_cache_pools() before a loop ends, and pools of loops that
+# closed without it are discarded the next time a pool is created.
+
+import asyncio
+import logging
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import redis.asyncio as redis
+
+from . import cache_config
+
+logger = logging.getLogger(__name__)
+
+_PoolKey = Tuple[str, int, Optional[str]]
+
+
+class MeteredBlockingConnectionPool(redis.BlockingConnectionPool):
+    """BlockingConnectionPool that records how often and how long callers wait for a connection."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.acquisitions = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    async def get_connection(self, command_name, *keys, **options):
+        self.acquisitions += 1
+        if self.can_get_connection():
+            return await super().get_connection(command_name, *keys, **options)
+        self.waits += 1
+        if _POOL_WAITS is not None:
+            _POOL_WAITS.inc()
+        started = time.monotonic()
+        try:
+            return await super().get_connection(command_name, *keys, **options)
+        finally:
+            waited = time.monotonic() - started
+            self.wait_seconds += waited
+            if _POOL_WAIT_SECONDS is not None:
+                _POOL_WAIT_SECONDS.observe(waited)
+
+    @property
+    def in_use(self) -> int:
+        return len(self._in_use_connections)
+
+    @property
+    def saturation(self) -> float:
+        return self.in_use / self.max_connections if self.max_connections else 0.0
+
+
+class SharedPoolRedis(redis.Redis):
+    """Redis client whose pub/sub objects use their own pool instead of the command pool."""
+
+    def __init__(self, *, connection_pool: redis.ConnectionPool, pubsub_pool: redis.ConnectionPool):
+        super().__init__(connection_pool=connection_pool)
+        self.pubsub_pool = pubsub_pool
+
+    def pubsub(self, **kwargs: Any) -> redis.client.PubSub:
+        return redis.client.PubSub(self.pubsub_pool, **kwargs)
+
+
+@dataclass
+class _SharedPool:
+    pool: MeteredBlockingConnectionPool
+    pubsub_pool: redis.ConnectionPool
+    client: SharedPoolRedis
+    verified: bool = False
+
+
+# event loop -> {(host, port, password): shared pool}
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[_PoolKey, _SharedPool]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _all_pools() -> list:
+    try:
+        return [entry.pool for pools in list(_pools.values()) for entry in list(pools.values())]
+    except RuntimeError:  # registry changed during a scrape from another thread
+        return []
+
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram
+
+    _POOL_WAITS = Counter(
+        "cache_pool_waits_total",
+        "Cache commands that had to wait for a free pooled Dragonfly connection",
+    )
+    _POOL_WAIT_SECONDS = Histogram(
+        "cache_pool_wait_seconds",
+        "Time spent waiting for a free pooled Dragonfly connection",
+        buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+    )
+    _POOL_IN_USE = Gauge(
+        "cache_pool_connections_in_use",
+        "Pooled Dragonfly connections currently checked out (all event loops)",
+    )
+    _POOL_IN_USE.set_function(lambda: sum(pool.in_use for pool in _all_pools()))
+    _POOL_SATURATION = Gauge(
+        "cache_pool_saturation_ratio",
+        "Highest in-use / max_connections ratio across the process's Dragonfly pools",
+    )
+    _POOL_SATURATION.set_function(lambda: max((pool.saturation for pool in _all_pools()), default=0.0))
+except ImportError:  # pragma: no cover - prometheus_client is an API dependency
+    _POOL_WAITS = _POOL_WAIT_SECONDS = None
+
+
+def _discard_closed_loops() -> None:
+    # The pools of a finished loop hold transports that reference it, so the weak
+    # key alone never lets them go; dropping the entry breaks the cycle.
+    for loop in [loop for loop in list(_pools.keys()) if loop.is_closed()]:
+        _pools.pop(loop, None)
+
+
+async def get_shared_cache_client(host: str, port: int, password: Optional[str]) -> redis.Redis:
+    """
+    Return the client backed by the current event loop's shared pool for a server,
+    creating the pool on first use. Only a new pool is PINGed; if that fails the
+    pool is dropped and the error propagates so the caller can back off.
+    """
+    loop = asyncio.get_running_loop()
+    pools = _pools.get(loop)
+    if pools is None:
+        _discard_closed_loops()
+        pools = _pools[loop] = {}
+    key = (host, port, password)
+    entry = pools.get(key)
+    if entry is None:
+        connection_kwargs: Dict[str, Any] = dict(
+            host=host,
+            port=port,
+            password=password,
+            socket_timeout=5,
+            socket_connect_timeout=5,
+            retry_on_timeout=True,
+            health_check_interval=cache_config.CACHE_POOL_HEALTH_CHECK_INTERVAL,
+            decode_responses=False,
+        )
+        pool = MeteredBlockingConnectionPool(
+            max_connections=cache_config.CACHE_POOL_MAX_CONNECTIONS,
+            timeout=cache_config.CACHE_POOL_TIMEOUT,
+            **connection_kwargs,
+        )
+        pubsub_pool = redis.ConnectionPool(**connection_kwargs)
+        entry = pools[key] = _SharedPool(
+            pool=pool,
+            pubsub_pool=pubsub_pool,
+            client=SharedPoolRedis(connection_pool=pool, pubsub_pool=pubsub_pool),
+        )
+    if not entry.verified:
+        try:
+            pong = await entry.client.ping()
+        except Exception:
+            if pools.get(key) is entry:
+                del pools[key]
+                await entry.pool.disconnect()
+                await entry.pubsub_pool.disconnect()
+            raise
+        entry.verified = True
+        logger.debug(
+            f"Shared cache pool ready for {host}:{port} "
+            f"(max_connections={entry.pool.max_connections}, PING={pong})"
+        )
+    return entry.client
+
+
+def shared_cache_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-server pool usage for the current event loop (diagnostics and tests)."""
+    try:
+        pools = _pools.get(asyncio.get_running_loop(), {})
+    except RuntimeError:
+        return {}
+    return {
+        f"{host}:{port}": {
+            "in_use": entry.pool.in_use,
+            "idle": len(entry.pool._available_connections),
+            "max_connections": entry.pool.max_connections,
+            "saturation": entry.pool.saturation,
+            "acquisitions": entry.pool.acquisitions,
+            "waits": entry.pool.waits,
+            "wait_seconds": entry.pool.wait_seconds,
+            "pubsub_in_use": len(entry.pubsub_pool._in_use_connections),
+        }
+        for (host, port, _password), entry in pools.items()
+    }
+
+
+async def close_shared_cache_pools() -> None:
+    """
+    Close the current event loop's pools. Call before the loop ends (API shutdown,
+    end of a Celery task's asyncio.run); later CacheService calls open a new pool.
+    """
+    try:
+        pools = _pools.pop(asyncio.get_running_loop(), None)
+    except RuntimeError:
+        return
+    for entry in (pools or {}).values():
+        try:
+            await entry.client.aclose()
+            await entry.pool.disconnect()
+            await entry.pubsub_pool.disconnect()
+        except Exception as e:
+            logger.warning(f"Error closing shared cache pool: {e}")
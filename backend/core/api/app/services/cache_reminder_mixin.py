@@ -127,30 +127,30 @@ class ReminderCacheMixin:
                 logger.error("Cannot load reminders batch: cache client not available")
                 return 0
 
-            loaded = 0
-            batch_size = 100
-            for i in range(0, len(reminders), batch_size):
-                batch = reminders[i:i + batch_size]
-                async with client.pipeline(transaction=True) as pipe:
-                    for reminder_data in batch:
-                        reminder_id = reminder_data.get("reminder_id") or reminder_data.get("id")
-                        trigger_at = reminder_data.get("trigger_at")
+            commands = []
+            schedule = {}
+            for reminder_data in reminders:
+                reminder_id = reminder_data.get("reminder_id") or reminder_data.get("id")
+                trigger_at = reminder_data.get("trigger_at")
 
-                        if not reminder_id or not trigger_at:
-                            continue
-
-                        cache_data = dict(reminder_data)
-                        if "reminder_id" not in cache_data and "id" in cache_data:
-                            cache_data["reminder_id"] = cache_data["id"]
+                if not reminder_id or not trigger_at:
+                    continue
 
-                        reminder_key = f"{REMINDER_KEY_PREFIX}{reminder_id}"
-                        reminder_json = json.dumps(cache_data)
+                cache_data = dict(reminder_data)
+                if "reminder_id" not in cache_data and "id" in cache_data:
+                    cache_data["reminder_id"] = cache_data["id"]
 
-                        pipe.setex(reminder_key, REMINDER_CACHE_TTL, reminder_json)
-                        pipe.zadd(REMINDER_SCHEDULE_KEY, {reminder_id: trigger_at})
-                        loaded += 1
+                reminder_key = f"{REMINDER_KEY_PREFIX}{reminder_id}"
+                commands.append(("setex", reminder_key, REMINDER_CACHE_TTL, json.dumps(cache_data)))
+                schedule[reminder_id] = trigger_at
 
-                    await pipe.execute()
+            # Entries first, then one ZADD per chunk so the fire task never sees an
+            # indexed reminder without its JSON entry
+            schedule_items = list(schedule.items())
+            for i in range(0, len(schedule_items), self._BULK_CHUNK_SIZE):
+                commands.append(("zadd", REMINDER_SCHEDULE_KEY, dict(schedule_items[i:i + self._BULK_CHUNK_SIZE])))
+            await self.execute_bulk_commands(commands)
+            loaded = len(schedule)
 
             logger.info(f"Loaded {loaded} reminders into hot cache (batch)")
             return loaded
@@ -716,23 +716,15 @@ class ReminderCacheMixin:
             if not pending_ids:
                 return 0
 
-            refreshed = 0
-            for embed_id in pending_ids:
-                try:
-                    cache_key = f"embed:{embed_id}"
-                    existing = await client.get(cache_key)
-                    if existing:
-                        await client.expire(cache_key, EMBED_CACHE_EXTENDED_TTL)
-                        refreshed += 1
-                    else:
-                        logger.debug(
-                            f"[PENDING_EMBED] Cache key {cache_key} not found "
-                            f"(already expired?) for user {user_id[:8]}..."
-                        )
-                except Exception as e:
-                    logger.warning(
-                        f"[PENDING_EMBED] Error refreshing TTL for embed {embed_id}: {e}"
-                    )
+            # EXPIRE reports whether the key still exists, so no GET per embed is needed
+            existing = await self.expire_many([f"embed:{embed_id}" for embed_id in pending_ids], EMBED_CACHE_EXTENDED_TTL)
+            refreshed = sum(existing.values())
+            missing = len(existing) - refreshed
+            if missing:
+                logger.debug(
+                    f"[PENDING_EMBED] {missing} pending embed cache key(s) not found "
+                    f"(already expired?) for user {user_id[:8]}..."
+                )
 
             if refreshed > 0:
                 logger.debug(
@@ -2,6 +2,8 @@ import logging
 import hashlib
 from typing import Optional, Dict
 
+from backend.core.api.app.services.credit_ledger import CreditLedger
+
 logger = logging.getLogger(__name__)
 
 class UserCacheMixin:
@@ -173,6 +175,13 @@ class UserCacheMixin:
                         incoming_last_opened,
                     )
 
+            # Guard: profiles re-loaded from Directus (login, cache misses, stale
+            # vault_key_id) carry the balance of the last ledger flush. Keep the newer
+            # ledger balance if it has not been persisted yet, otherwise it is lost
+            # together with the charges since (see credit_ledger.py).
+            if "credits" in user_data:
+                await CreditLedger(self).apply_unflushed_balance(user_id, user_data)
+
             user_set_success = await self.set(user_cache_key, user_data, ttl=user_ttl)
             logger.debug(f"Cache SET result for user key '{user_cache_key}': {user_set_success}")
 
@@ -291,23 +300,8 @@ class UserCacheMixin:
                     # Delete app settings/memories cache for the chat (per-chat)
                     await self.delete_chat_app_settings_memories(user_id, chat_id)
 
-                    # Remove embed caches linked to this chat
-                    chat_embed_index_key = f"chat:{chat_id}:embed_ids"
-                    embed_ids = await self.get_keys_by_pattern(chat_embed_index_key)
-                    # get_keys_by_pattern returns list of keys; if present, fetch members
-                    if embed_ids:
-                        # embed_ids here are actually keys; fetch members from the set
-                        client = await self.client
-                        if client:
-                            members = await client.smembers(chat_embed_index_key)
-                            if members:
-                                for embed_id in members:
-                                    embed_key = f"embed:{embed_id.decode('utf-8') if isinstance(embed_id, bytes) else embed_id}"
-                                    await self.delete(embed_key)
-                            await client.delete(chat_embed_index_key)
-                    else:
-                        # If no key, continue silently
-                        pass
+                    # Remove embed caches linked to this chat (and their reference counts)
+                    await self.delete_chat_embed_cache(chat_id)
 
                 except Exception as chat_cleanup_error:
                     logger.error(f"Error cleaning chat cache for user {user_id}, chat {chat_id}: {chat_cleanup_error}", exc_info=True)
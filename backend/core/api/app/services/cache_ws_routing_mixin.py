@@ -0,0 +1,170 @@
+# backend/core/api/app/services/cache_ws_routing_mixin.py
+#
+# Node-aware routing for per-user WebSocket pub/sub events.
+#
+# Every API node used to PSUBSCRIBE `chat_stream::*`, `chat_stream_thinking::*`
+# and `websocket:user:*`, so each node received and JSON-decoded every chunk of
+# every user even though it only holds a fraction of the connections.
+#
+# API nodes now register which users they hold in a per-user hash
+#   ws_user_nodes:{user_id_hash} → {node_id: lease_expires_at}
+# refreshed by a heartbeat (routes/ws_node_registry.py). `publish_event` for a
+# routed channel looks up the live nodes of the payload's user and publishes to
+#   ws_node::{node_id}::{channel}
+# which only that node subscribes to. If the user is not connected anywhere (or
+# the lookup fails) the event goes to the original shared channel, which every
+# node still subscribes to — so offline handling (push/email, snapshots) and
+# publishers that bypass `publish_event` keep their previous behaviour.
+# Events of external (REST / OpenAI-compatible) requests always use the shared
+# channel: ask_skill's HTTP stream subscribes to it directly, not to a node.
+
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from . import cache_config
+
+logger = logging.getLogger(__name__)
+
+# Bound on the publisher-side lookup cache; cleared wholesale when exceeded.
+_MAX_CACHED_USER_NODE_LOOKUPS = 10000
+
+
+def ws_node_channel(node_id: str, channel: str) -> str:
+    """Channel name that carries `channel`'s events for a single API node."""
+    return f"{cache_config.WS_NODE_CHANNEL_PREFIX}{node_id}::{channel}"
+
+
+def strip_ws_node_prefix(channel: str) -> str:
+    """Map `ws_node::{node_id}::{channel}` back to `{channel}` (no-op for other channels)."""
+    if channel.startswith(cache_config.WS_NODE_CHANNEL_PREFIX):
+        _, _, original = channel[len(cache_config.WS_NODE_CHANNEL_PREFIX):].partition("::")
+        return original or channel
+    return channel
+
+
+def _routing_user_hash(channel: str, event_data: Any) -> Optional[str]:
+    """user_id_hash that owns the event on a routed channel, or None if not routable."""
+    if not channel.startswith(cache_config.WS_ROUTED_CHANNEL_PREFIXES):
+        return None
+    if isinstance(event_data, dict) and event_data.get("external_request"):
+        return None
+    if channel.startswith("websocket:user:"):
+        # Channel format: websocket:user:{user_id_hash}
+        return channel.split(":", 2)[2] or None
+    if isinstance(event_data, dict):
+        user_id_hash = event_data.get("user_id_hash")
+        if isinstance(user_id_hash, str) and user_id_hash:
+            return user_id_hash
+    return None
+
+
+class WebSocketRoutingCacheMixin:
+    """Mixin for the WebSocket connection registry and node-targeted publishing."""
+
+    # {user_id_hash: (expires_at_monotonic, node_ids)}, created lazily per instance
+    _ws_user_nodes_cache: Optional[Dict[str, Tuple[float, Tuple[str, ...]]]] = None
+
+    def _ws_user_nodes_key(self, user_id_hash: str) -> str:
+        return f"{cache_config.WS_USER_NODES_KEY_PREFIX}{user_id_hash}"
+
+    async def register_ws_user_nodes(self, node_id: str, user_id_hashes: Iterable[str]) -> bool:
+        """
+        Register (or renew the lease of) `node_id` for each user in one pipeline.
+        Called on connect for a single user and by the heartbeat for all users.
+        """
+        user_id_hashes = list(user_id_hashes)
+        if not user_id_hashes:
+            return True
+        try:
+            client = await self.client
+            if not client:
+                return False
+            lease_expires_at = int(time.time()) + cache_config.WS_NODE_LEASE_TTL
+            async with client.pipeline(transaction=False) as pipe:
+                for user_id_hash in user_id_hashes:
+                    key = self._ws_user_nodes_key(user_id_hash)
+                    pipe.hset(key, node_id, lease_expires_at)
+                    # The hash outlives a single lease so other nodes' entries survive
+                    pipe.expire(key, cache_config.WS_NODE_LEASE_TTL * 2)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.warning(f"WS routing: failed to register node {node_id} for {len(user_id_hashes)} user(s): {e}")
+            return False
+
+    async def unregister_ws_user_node(self, node_id: str, user_id_hash: str) -> bool:
+        """Remove `node_id` from a user's node set (last connection on that node closed)."""
+        try:
+            client = await self.client
+            if not client:
+                return False
+            await client.hdel(self._ws_user_nodes_key(user_id_hash), node_id)
+            return True
+        except Exception as e:
+            logger.warning(f"WS routing: failed to unregister node {node_id}: {e}")
+            return False
+
+    async def get_ws_user_nodes(self, user_id_hash: str) -> Optional[Tuple[str, ...]]:
+        """
+        Live nodes holding connections of a user. Cached in-process for
+        WS_USER_NODES_LOOKUP_TTL so a streamed response costs one lookup per
+        second instead of one per chunk. Returns None if the registry is unreachable.
+        """
+        cache = getattr(self, "_ws_user_nodes_cache", None)
+        if cache is None:
+            cache = self._ws_user_nodes_cache = {}
+        now = time.monotonic()
+        cached = cache.get(user_id_hash)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+        try:
+            client = await self.client
+            if not client:
+                return None
+            entries = await client.hgetall(self._ws_user_nodes_key(user_id_hash))
+        except Exception as e:
+            logger.debug(f"WS routing: node lookup failed, using shared channel: {e}")
+            return None
+
+        wall_now = time.time()
+        nodes: List[str] = []
+        for node_id, lease_expires_at in (entries or {}).items():
+            try:
+                if float(lease_expires_at) >= wall_now:
+                    nodes.append(node_id.decode("utf-8") if isinstance(node_id, bytes) else node_id)
+            except (TypeError, ValueError):
+                continue
+        result = tuple(sorted(nodes))
+
+        if len(cache) >= _MAX_CACHED_USER_NODE_LOOKUPS:
+            cache.clear()
+        cache[user_id_hash] = (now + cache_config.WS_USER_NODES_LOOKUP_TTL, result)
+        return result
+
+    def invalidate_ws_user_nodes(self, user_id_hash: Optional[str] = None) -> None:
+        cache = getattr(self, "_ws_user_nodes_cache", None)
+        if not cache:
+            return
+        if user_id_hash is None:
+            cache.clear()
+        else:
+            cache.pop(user_id_hash, None)
+
+    async def resolve_publish_channels(self, channel: str, event_data: Any) -> List[str]:
+        """Channels an event should be published to (node channels, or the shared one)."""
+        user_id_hash = _routing_user_hash(channel, event_data)
+        if not user_id_hash:
+            return [channel]
+        nodes = await self.get_ws_user_nodes(user_id_hash)
+        if not nodes:
+            return [channel]
+        return [ws_node_channel(node_id, channel) for node_id in nodes]
+
+    async def publish_event(self, channel: str, event_data: dict) -> bool:
+        """Publish an event, targeting only the nodes that hold the user for routed channels."""
+        published = False
+        for target_channel in await self.resolve_publish_channels(channel, event_data):
+            published = await super().publish_event(target_channel, event_data) or published
+        return published
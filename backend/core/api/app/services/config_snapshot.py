@@ -0,0 +1,71 @@
+# backend/core/api/app/services/config_snapshot.py
+#
+# Process-local snapshots of the AI configuration blobs the API preloads into
+# Dragonfly (discovered apps metadata, base instructions, mates configs).
+#
+# Every ask task used to GET each blob, JSON-decode it and re-validate every app
+# and mate into pydantic models — several hundred KB of work on the critical
+# path for data that only changes when the API (re)discovers apps. The setters
+# in CacheService now INCR a generation counter after writing a blob; readers
+# keep the validated objects per process and only fetch and validate again when
+# the generation differs from the one their snapshot was built under. The
+# counter itself is read at most once per CONFIG_GENERATION_CHECK_INTERVAL, so
+# the three lookups of one task cost a single small GET.
+
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+AI_CONFIG_GENERATION_CACHE_KEY = "ai:config_generation"
+# How long a process trusts the last generation it read (seconds)
+CONFIG_GENERATION_CHECK_INTERVAL = 1.0
+
+
+class ConfigSnapshotCache:
+    """Validated configuration objects per cache key, each tagged with the generation it was read under."""
+
+    def __init__(self, check_interval: float = CONFIG_GENERATION_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._snapshots: Dict[str, Tuple[int, Any]] = {}
+        self._generation: Optional[int] = None
+        self._checked_at = float("-inf")
+
+    async def current_generation(self, client: Any) -> Optional[int]:
+        """
+        The generation published by the API, or None if no setter has run since the
+        cache was (re)started — snapshots are bypassed in that case.
+        """
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._generation
+        raw = await client.get(AI_CONFIG_GENERATION_CACHE_KEY)
+        generation = int(raw) if raw is not None else None
+        if generation != self._generation and self._snapshots:
+            logger.info(f"AI config generation changed ({self._generation} -> {generation}); snapshots will be rebuilt")
+        self._generation, self._checked_at = generation, now
+        return generation
+
+    def get(self, key: str, generation: Optional[int]) -> Any:
+        entry = self._snapshots.get(key)
+        if generation is not None and entry is not None and entry[0] == generation:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, generation: Optional[int], value: Any) -> None:
+        if generation is not None and value:
+            self._snapshots[key] = (generation, value)
+
+    def invalidate(self) -> None:
+        """Drop all snapshots and re-read the generation on the next lookup (after a local write)."""
+        self._snapshots.clear()
+        self._generation = None
+        self._checked_at = float("-inf")
+
+
+config_snapshots = ConfigSnapshotCache()
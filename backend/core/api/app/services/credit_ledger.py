@@ -0,0 +1,413 @@
+# backend/core/api/app/services/credit_ledger.py
+#
+# Atomic credit ledger on top of the cached user profile.
+#
+# BillingService used to read the cached profile, subtract in Python and write the
+# whole profile back, then encrypt the new balance and update Directus inline
+# (with up to three 5s retries). Concurrent skill and LLM charges for one user
+# raced on that read-modify-write, and every charge paid Vault + Directus latency.
+#
+# Debits and credits now run as one Lua script in Dragonfly that:
+#   - enforces OVERDRAFT_LIMIT server-side (refuses at/below it, clamps to it)
+#   - patches only the top-level "credits" field of the cached profile (KEEPTTL)
+#   - appends an event to the billing:ledger stream (user, op, amount, balance)
+#   - records the user's newest event and balance, and marks the user dirty
+#
+# flush_dirty_balances() (Celery beat, every few seconds) coalesces all charges
+# of a user since the last flush into a single encrypted Directus write, and
+# records the last persisted ledger event per user. reconcile_ledger() walks the
+# stream after a crash and re-marks users whose events were never persisted.
+#
+# The script refuses profiles it cannot patch safely (no integer "credits" field,
+# or the field name occurring more than once); callers then fall back to the
+# previous read-modify-write path.
+#
+# Until a balance is flushed, the ledger is newer than Directus. CacheService.set_user()
+# therefore applies apply_unflushed_balance() to every profile it caches (a profile
+# re-loaded from Directus would otherwise bring back the old balance), and every
+# writer that adds or takes back credits outside skills (purchases, refunds,
+# referrals, free grants) goes through grant()/revoke(), so no read-modify-write
+# on "credits" races with ledger charges.
+
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from backend.shared.python_utils.billing_utils import OVERDRAFT_LIMIT_CREDITS
+
+logger = logging.getLogger(__name__)
+
+LEDGER_STREAM_KEY = "billing:ledger"
+LEDGER_DIRTY_USERS_KEY = "billing:ledger:dirty"
+# user_id -> "<event id> <balance>" of the user's newest ledger event
+LEDGER_LATEST_KEY = "billing:ledger:latest"
+# user_id -> id of the newest ledger event whose balance reached Directus
+LEDGER_PERSISTED_KEY = "billing:ledger:persisted"
+# Stream id up to which reconcile_ledger() has checked the ledger
+LEDGER_RECONCILED_KEY = "billing:ledger:reconciled"
+# Approximate number of events kept in the stream
+LEDGER_STREAM_MAXLEN = 200_000
+# Users flushed per flush_dirty_balances() run
+LEDGER_FLUSH_BATCH_SIZE = 200
+# Events younger than this are left to the regular flush by reconcile_ledger() (seconds)
+LEDGER_RECONCILE_GRACE_SECONDS = 300
+# Time one reconcile_ledger() run may spend paging the stream; the rest is left to
+# the next run (seconds, the task runs every 10 minutes)
+LEDGER_RECONCILE_TIME_BUDGET_SECONDS = 60
+
+# Maximum allowed overdraft (negative credit balance). Skills are always charged so
+# multi-step requests that start concurrently are billed even when they consume
+# slightly more than the remaining balance; purchases later offset the overdraft.
+# See docs/architecture/billing.md for the full overdraft policy.
+OVERDRAFT_LIMIT = OVERDRAFT_LIMIT_CREDITS
+
+LEDGER_OP_DEBIT = "debit"
+LEDGER_OP_CREDIT = "credit"
+
+# KEYS: profile, stream, dirty set, latest-event hash
+# ARGV: op, amount, overdraft limit, user_id, app_id, skill_id, timestamp, stream maxlen
+_APPLY_LEDGER_OP_LUA = """
+local raw = redis.call('GET', KEYS[1])
+if not raw then
+    return {'missing', 0, 0, ''}
+end
+local ok, profile = pcall(cjson.decode, raw)
+if not ok or type(profile) ~= 'table' then
+    return {'unsupported', 0, 0, ''}
+end
+local balance = profile['credits']
+if type(balance) ~= 'number' or balance ~= math.floor(balance) then
+    return {'unsupported', 0, 0, ''}
+end
+local amount = tonumber(ARGV[2])
+local new_balance
+if ARGV[1] == 'debit' then
+    local limit = tonumber(ARGV[3])
+    if balance <= limit then
+        return {'insufficient', balance, 0, ''}
+    end
+    new_balance = balance - amount
+    if new_balance < limit then
+        new_balance = limit
+    end
+else
+    new_balance = balance + amount
+end
+local matches = 0
+local patched = string.gsub(raw, '("credits"%s*:%s*)%-?%d+', function(prefix)
+    matches = matches + 1
+    return prefix .. string.format('%d', new_balance)
+end)
+if matches ~= 1 then
+    return {'unsupported', balance, 0, ''}
+end
+redis.call('SET', KEYS[1], patched, 'KEEPTTL')
+local applied = math.abs(new_balance - balance)
+local event_id = redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[8], '*',
+    'user_id', ARGV[4], 'op', ARGV[1], 'amount', string.format('%d', applied),
+    'balance', string.format('%d', new_balance), 'app_id', ARGV[5], 'skill_id', ARGV[6], 'ts', ARGV[7])
+redis.call('SADD', KEYS[3], ARGV[4])
+redis.call('HSET', KEYS[4], ARGV[4], event_id .. ' ' .. string.format('%d', new_balance))
+return {'ok', new_balance, applied, event_id}
+"""
+
+
+@dataclass(frozen=True)
+class LedgerResult:
+    """Outcome of a ledger operation: 'ok', 'insufficient', 'missing' (profile not cached) or 'unsupported'."""
+
+    status: str
+    balance: int = 0
+    amount: int = 0
+    event_id: Optional[str] = None
+
+    @property
+    def applied(self) -> bool:
+        return self.status == "ok"
+
+
+def _text(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+def _stream_id_key(stream_id: str) -> tuple:
+    millis, _, sequence = stream_id.partition("-")
+    return int(millis), int(sequence or 0)
+
+
+class CreditLedger:
+    """Atomic debits/credits on cached balances plus write-behind persistence to Directus."""
+
+    def __init__(self, cache_service: Any):
+        self.cache_service = cache_service
+
+    async def _apply(
+        self, op: str, user_id: str, amount: int, app_id: str, skill_id: str, overdraft_limit: int
+    ) -> LedgerResult:
+        client = await self.cache_service.client
+        if not client:
+            return LedgerResult("unsupported")
+        status, balance, applied, event_id = await client.eval(
+            _APPLY_LEDGER_OP_LUA,
+            4,
+            f"{self.cache_service.USER_KEY_PREFIX}{user_id}",
+            LEDGER_STREAM_KEY,
+            LEDGER_DIRTY_USERS_KEY,
+            LEDGER_LATEST_KEY,
+            op,
+            amount,
+            overdraft_limit,
+            user_id,
+            app_id,
+            skill_id,
+            int(time.time()),
+            LEDGER_STREAM_MAXLEN,
+        )
+        return LedgerResult(_text(status), int(balance), int(applied), _text(event_id) or None)
+
+    async def debit(
+        self, user_id: str, amount: int, app_id: str, skill_id: str, overdraft_limit: int = OVERDRAFT_LIMIT
+    ) -> LedgerResult:
+        """Charge credits; refused at or below the overdraft limit and clamped to it."""
+        return await self._apply(LEDGER_OP_DEBIT, user_id, amount, app_id, skill_id, overdraft_limit)
+
+    async def credit(self, user_id: str, amount: int, app_id: str, skill_id: str) -> LedgerResult:
+        """Add credits (refunds; purchases and other grants go through grant())."""
+        return await self._apply(LEDGER_OP_CREDIT, user_id, amount, app_id, skill_id, OVERDRAFT_LIMIT)
+
+    async def unflushed_balance(self, user_id: str) -> Optional[int]:
+        """Balance of the user's newest ledger event if it has not reached Directus yet."""
+        client = await self.cache_service.client
+        if not client:
+            return None
+        latest = await client.hget(LEDGER_LATEST_KEY, user_id)
+        if not latest:
+            return None
+        latest_id, _, latest_balance = _text(latest).partition(" ")
+        persisted = await client.hget(LEDGER_PERSISTED_KEY, user_id)
+        if persisted and _stream_id_key(_text(persisted)) >= _stream_id_key(latest_id):
+            return None
+        return int(latest_balance)
+
+    async def apply_unflushed_balance(self, user_id: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Replace the balance of a profile loaded from Directus with the newest ledger
+        balance when that has not been flushed yet. Call before caching the profile,
+        otherwise the older Directus balance overwrites the ledger's and the next
+        flush persists it, losing the charges in between.
+        """
+        balance = await self.unflushed_balance(user_id)
+        if balance is not None and profile.get("credits") != balance:
+            logger.info(f"[CreditLedger] Using unflushed ledger balance for re-cached profile of user {user_id}")
+            profile["credits"] = balance
+        return profile
+
+    async def load_profile(self, user_id: str, directus_service: Any) -> Optional[Dict[str, Any]]:
+        """
+        The cached profile, or the Directus profile (with the unflushed ledger balance
+        applied) cached for the ledger script. None if the user does not exist.
+        """
+        profile = await self.cache_service.get_user_by_id(user_id)
+        if profile:
+            return profile
+        success, profile, message = await directus_service.get_user_profile(user_id)
+        if not success or not profile:
+            logger.error(f"[CreditLedger] User profile not found in Directus for user {user_id}: {message}")
+            return None
+        profile.setdefault("user_id", user_id)
+        profile.setdefault("id", user_id)
+        # set_user() applies the unflushed ledger balance
+        await self.cache_service.set_user(profile, user_id=user_id)
+        return profile
+
+    async def grant(
+        self,
+        user_id: str,
+        amount: int,
+        app_id: str,
+        skill_id: str,
+        directus_service: Any,
+        encryption_service: Any,
+    ) -> LedgerResult:
+        """
+        Add credits from outside a skill (purchases, referral rewards, free grants)
+        and persist the new balance right away. The profile is loaded into the
+        cache first if needed. A failed Directus write is left to the flusher: the
+        balance is already in the ledger, so callers must not retry the grant.
+        Returns the ledger result; callers fall back to their previous update path
+        when it was not applied ('unsupported' profiles).
+        """
+        return await self._apply_and_persist(
+            LEDGER_OP_CREDIT, user_id, amount, app_id, skill_id, OVERDRAFT_LIMIT, directus_service, encryption_service
+        )
+
+    async def revoke(
+        self,
+        user_id: str,
+        amount: int,
+        app_id: str,
+        skill_id: str,
+        directus_service: Any,
+        encryption_service: Any,
+    ) -> LedgerResult:
+        """
+        Take back purchased credits (payment refunds) like grant(). The balance is
+        clamped at zero instead of the overdraft limit; 'insufficient' means it
+        already was at or below zero and nothing was taken.
+        """
+        return await self._apply_and_persist(
+            LEDGER_OP_DEBIT, user_id, amount, app_id, skill_id, 0, directus_service, encryption_service
+        )
+
+    async def _apply_and_persist(
+        self,
+        op: str,
+        user_id: str,
+        amount: int,
+        app_id: str,
+        skill_id: str,
+        overdraft_limit: int,
+        directus_service: Any,
+        encryption_service: Any,
+    ) -> LedgerResult:
+        if not await self.load_profile(user_id, directus_service):
+            return LedgerResult("missing")
+        result = await self._apply(op, user_id, amount, app_id, skill_id, overdraft_limit)
+        if result.applied:
+            try:
+                await self.persist_balance(user_id, directus_service, encryption_service)
+            except Exception as e:
+                logger.error(
+                    f"[CreditLedger] {op} of {amount} credits for user {user_id} applied in cache; "
+                    f"persisting it failed and is left to the next flush: {e}"
+                )
+        return result
+
+    async def persist_balance(self, user_id: str, directus_service: Any, encryption_service: Any) -> bool:
+        """
+        Write one user's current balance to Directus now (outside the periodic
+        flush). Returns False if the balance cannot be persisted yet; raises and
+        re-marks the user dirty if the write fails.
+        """
+        client = await self.cache_service.client
+        if not client:
+            return False
+        await client.srem(LEDGER_DIRTY_USERS_KEY, user_id)
+        try:
+            return await self._persist_user(client, user_id, directus_service, encryption_service)
+        except Exception:
+            await client.sadd(LEDGER_DIRTY_USERS_KEY, user_id)
+            raise
+
+    async def _persist_user(self, client: Any, user_id: str, directus_service: Any, encryption_service: Any) -> bool:
+        # Read the newest event first: later charges re-mark the user for the next run
+        latest = await client.hget(LEDGER_LATEST_KEY, user_id)
+        latest_id, _, latest_balance = _text(latest).partition(" ") if latest else ("", "", "")
+        user = await self.cache_service.get_user_by_id(user_id)
+        vault_key_id = user.get("vault_key_id") if isinstance(user, dict) else None
+        if latest_balance:
+            # The newest ledger event is authoritative, also when the profile was
+            # evicted or re-cached from Directus since
+            balance = int(latest_balance)
+        else:
+            balance = user.get("credits") if isinstance(user, dict) else None
+            if not isinstance(balance, int):
+                logger.error(f"[CreditLedger] No cached balance or ledger event for dirty user {user_id}")
+                return False
+        if not vault_key_id:
+            vault_key_id = await self.cache_service.get_user_vault_key_id(user_id)
+        if not vault_key_id:
+            logger.error(
+                f"[CreditLedger] vault_key_id unavailable for user {user_id}; balance stays in cache "
+                "and will sync to Directus on next login."
+            )
+            return False
+        encrypted_balance, _ = await encryption_service.encrypt_with_user_key(
+            plaintext=str(balance), key_id=vault_key_id
+        )
+        if not await directus_service.update_user(user_id, {"encrypted_credit_balance": encrypted_balance}):
+            raise RuntimeError("Directus update_user returned False")
+        if latest_id:
+            await client.hset(LEDGER_PERSISTED_KEY, user_id, latest_id)
+        return True
+
+    async def flush_dirty_balances(
+        self, directus_service: Any, encryption_service: Any, batch_size: int = LEDGER_FLUSH_BATCH_SIZE
+    ) -> int:
+        """
+        Persist the current balance of every dirty user with one encrypted Directus
+        write per user, however many charges happened since the last flush.
+        Returns the number of users persisted.
+        """
+        client = await self.cache_service.client
+        if not client:
+            return 0
+        user_ids = [_text(u) for u in (await client.spop(LEDGER_DIRTY_USERS_KEY, batch_size) or [])]
+        persisted = 0
+        for user_id in user_ids:
+            try:
+                if await self._persist_user(client, user_id, directus_service, encryption_service):
+                    persisted += 1
+            except Exception as e:
+                logger.warning(f"[CreditLedger] Flush failed for user {user_id}, retrying next run: {e}")
+                await client.sadd(LEDGER_DIRTY_USERS_KEY, user_id)
+        if user_ids:
+            logger.info(f"[CreditLedger] Persisted balances of {persisted}/{len(user_ids)} dirty user(s)")
+        return persisted
+
+    async def reconcile_ledger(
+        self,
+        batch_size: int = 5000,
+        grace_seconds: float = LEDGER_RECONCILE_GRACE_SECONDS,
+        time_budget_seconds: float = LEDGER_RECONCILE_TIME_BUDGET_SECONDS,
+    ) -> List[str]:
+        """
+        Crash recovery: walk ledger events older than the grace period since the
+        last checkpoint and re-mark users whose events were never persisted (e.g. a
+        flusher died between SPOP and the Directus write). Returns the re-queued user ids.
+
+        Reads the stream in pages of `batch_size` events and advances the checkpoint
+        after each page, until the grace cutoff is reached or the time budget is
+        used up (the next run continues from the checkpoint).
+        """
+        client = await self.cache_service.client
+        if not client:
+            return []
+        checkpoint = await client.get(LEDGER_RECONCILED_KEY)
+        start = f"({_text(checkpoint)}" if checkpoint else "-"
+        end = str(int((time.time() - grace_seconds) * 1000))
+        deadline = time.monotonic() + time_budget_seconds
+        requeued: Dict[str, None] = {}
+        while True:
+            entries = await client.xrange(LEDGER_STREAM_KEY, min=start, max=end, count=batch_size)
+            if not entries:
+                break
+            requeued.update(dict.fromkeys(await self._requeue_unpersisted(client, entries)))
+            checkpoint = _text(entries[-1][0])
+            await client.set(LEDGER_RECONCILED_KEY, checkpoint)
+            if len(entries) < batch_size:
+                break
+            if time.monotonic() >= deadline:
+                logger.info(f"[CreditLedger] Reconcile time budget used up at {checkpoint}, continuing next run")
+                break
+            start = f"({checkpoint}"
+        return list(requeued)
+
+    async def _requeue_unpersisted(self, client: Any, entries: List[Any]) -> List[str]:
+        """Re-mark the users of a page of ledger events whose newest event there was never persisted."""
+        newest: Dict[str, str] = {}
+        for stream_id, fields in entries:
+            user_id = _text(fields.get(b"user_id", fields.get("user_id", "")))
+            if user_id:
+                newest[user_id] = _text(stream_id)
+        persisted = await client.hmget(LEDGER_PERSISTED_KEY, list(newest)) if newest else []
+        requeued = [
+            user_id
+            for (user_id, event_id), persisted_id in zip(newest.items(), persisted)
+            if not persisted_id or _stream_id_key(_text(persisted_id)) < _stream_id_key(event_id)
+        ]
+        if requeued:
+            await client.sadd(LEDGER_DIRTY_USERS_KEY, *requeued)
+            logger.warning(f"[CreditLedger] Reconcile re-queued {len(requeued)} user(s) with unpersisted balances")
+        return requeued
@@ -119,6 +119,48 @@ async def create_item(self, collection: str, payload: dict, admin_required: bool
         return False, {"error": str(e)}
 
 
+async def create_items(self, collection: str, payloads: list, admin_required: bool = False):
+    """
+    Creates several items in a Directus collection with a single request
+    (POST /items/:collection with an array body).
+
+    Args:
+        self: The DirectusService instance.
+        collection: The name of the collection to create the items in.
+        payloads: A list of item data dictionaries.
+        admin_required: Whether to use admin authentication for this request.
+
+    Returns:
+        A tuple (bool, list | dict): (True, created_items) on success,
+                                      (False, error_details) on failure.
+    """
+    if not payloads:
+        return True, []
+    url = f"{self.base_url}/items/{collection}"
+    logger.info(f"Attempting to create {len(payloads)} items in collection '{collection}'")
+
+    try:
+        headers = {}
+        if admin_required:
+            token = await self.login_admin()
+            headers["Authorization"] = f"Bearer {token}"
+
+        response = await self._make_api_request("POST", url, headers=headers, json=payloads)
+
+        if 200 <= response.status_code < 300:
+            created_items = response.json().get("data") or []
+            logger.info(f"Successfully created {len(created_items)} items in '{collection}'")
+            return True, created_items
+        else:
+            error_details = {"status_code": response.status_code, "text": response.text}
+            logger.error(f"Failed to create items in '{collection}'. Status: {response.status_code}, Response: {response.text}")
+            return False, error_details
+
+    except Exception as e:
+        logger.error(f"Exception during batch item creation in '{collection}': {str(e)}", exc_info=True)
+        return False, {"error": str(e)}
+
+
 async def delete_item(self, collection: str, item_id: str, admin_required: bool = False):
     """
     Delete a single item from a Directus collection by ID.
@@ -5,12 +5,16 @@ import hashlib
 import base64
 import binascii
 
+from backend.core.api.app.utils.encryption import ENVELOPE_CIPHERTEXT_PREFIX
+
 # Forward declaration for type hinting DirectusService
 if False: # TYPE_CHECKING
     from .directus import DirectusService
 
 logger = logging.getLogger(__name__)
 _VAULT_CIPHERTEXT_PREFIX = "vault:v1:"
+# Server-side ciphertext: Vault transit values and envelope values (Vault-wrapped data key)
+_SERVER_CIPHERTEXT_PREFIXES = (_VAULT_CIPHERTEXT_PREFIX, ENVELOPE_CIPHERTEXT_PREFIX)
 _MIN_CLIENT_ENCRYPTED_PAYLOAD_BYTES = 29
 
 
@@ -26,7 +30,7 @@ def _validate_no_vault_ciphertext_for_chat_fields(record_label: str, payload: Di
     """Reject server-side Vault ciphertext on Directus chat/message encrypted fields."""
     for field in _encrypted_chat_field_names(payload):
         value = payload.get(field)
-        if isinstance(value, str) and value.startswith(_VAULT_CIPHERTEXT_PREFIX):
+        if isinstance(value, str) and value.startswith(_SERVER_CIPHERTEXT_PREFIXES):
             raise ValueError(
                 f"{record_label} field {field} must be client-side encrypted; "
                 "Vault ciphertext is not allowed in Directus chats/messages."
@@ -39,7 +43,7 @@ def _validate_client_encrypted_message_content(message_id: str, encrypted_conten
             f"Message {message_id} is missing client-encrypted base64 content."
         )
 
-    if encrypted_content.startswith(_VAULT_CIPHERTEXT_PREFIX):
+    if encrypted_content.startswith(_SERVER_CIPHERTEXT_PREFIXES):
         raise ValueError(
             f"Message {message_id} encrypted_content must be client-side encrypted; "
             "Vault ciphertext is not allowed in Directus messages."
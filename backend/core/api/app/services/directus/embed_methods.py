@@ -13,6 +13,8 @@ import logging
 from typing import List, Dict, Any, Optional, TYPE_CHECKING
 import hashlib
 
+from backend.core.api.app.utils.encryption import ENVELOPE_CIPHERTEXT_PREFIX
+
 if TYPE_CHECKING:
     from backend.core.api.app.services.directus.directus import DirectusService
 
@@ -27,12 +29,14 @@ _EMBED_DIRECTUS_ID_CACHE_TTL: int = 7 * 86400  # 7 days in seconds
 # Prevents unbounded memory usage when fetching embeds for many chats.
 _BULK_FETCH_PAGE_SIZE: int = 500
 _VAULT_CIPHERTEXT_PREFIX = "vault:v1:"
+# Server-side ciphertext: Vault transit values and envelope values (Vault-wrapped data key)
+_SERVER_CIPHERTEXT_PREFIXES = (_VAULT_CIPHERTEXT_PREFIX, ENVELOPE_CIPHERTEXT_PREFIX)
 
 
 def _validate_client_encrypted_embed_content(embed_id: str, payload: Dict[str, Any]) -> None:
     """Block server-side Vault ciphertext from being persisted as chat embed content."""
     encrypted_content = payload.get("encrypted_content")
-    if isinstance(encrypted_content, str) and encrypted_content.startswith(_VAULT_CIPHERTEXT_PREFIX):
+    if isinstance(encrypted_content, str) and encrypted_content.startswith(_SERVER_CIPHERTEXT_PREFIXES):
         raise ValueError(
             f"Embed {embed_id} encrypted_content must be client-side encrypted; "
             "Vault ciphertext is only allowed in inference/runtime cache."
@@ -7,9 +7,16 @@ import logging
 import asyncio
 import json
 import re
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime
 
+from backend.core.api.app.services.usage_summary_aggregator import (
+    DAILY,
+    MONTHLY,
+    SUMMARY_IDENTIFIER_KEYS,
+    SummaryDelta,
+    UsageSummaryAggregator,
+)
 from backend.core.api.app.utils.encryption import EncryptionService
 
 logger = logging.getLogger(__name__)
@@ -20,6 +27,28 @@ def _api_device_summary_identifier(device_hash: str) -> str:
         return device_hash
     return f"cli:{device_hash}"
 
+
+def _summary_targets(
+    chat_id: Optional[str],
+    app_id: str,
+    api_key_hash: Optional[str],
+    device_hash: Optional[str],
+) -> List[Tuple[str, str]]:
+    """(summary_type, identifier) of every summary row a usage entry counts towards."""
+    targets = []
+    # API requests with chat_id should only show up under API usage, not chat usage
+    if chat_id and not api_key_hash:
+        targets.append(("chat", chat_id))
+    targets.append(("app", app_id))
+    if api_key_hash:
+        targets.append(("api_key", api_key_hash))
+    # Session-auth device tracking: when neither API key nor chat is present but a
+    # device_hash exists (CLI or native Apple app-skill calls), use a synthetic
+    # identifier so the usage appears in the API/devices tab.
+    if device_hash and not api_key_hash and not chat_id:
+        targets.append(("api_key", _api_device_summary_identifier(device_hash)))
+    return targets
+
 class UsageMethods:
     def __init__(self, sdk, encryption_service: EncryptionService):
         self.sdk = sdk
@@ -121,14 +150,6 @@ class UsageMethods:
             # Encryption key is the user vault key for usage entries
             encryption_key_id = user_vault_key_id
 
-            # Encrypt model_used if provided (sensitive field)
-            encrypted_model_used = None
-            if model_used:
-                encrypted_model_used_tuple = await self.encryption_service.encrypt_with_user_key(
-                    key_id=encryption_key_id, plaintext=model_used
-                )
-                encrypted_model_used = encrypted_model_used_tuple[0] if encrypted_model_used_tuple else None
-
             # CRITICAL: Only save tokens for AI Ask skill (app_id='ai', skill_id='ask')
             # Other skills don't use LLM tokens directly, so storing tokens is incorrect
             should_save_tokens = (app_id == "ai" and skill_id == "ask")
@@ -142,98 +163,63 @@ class UsageMethods:
                     actual_input_tokens = None
                     actual_output_tokens = None
 
-            # Encrypt credit and token fields (only tokens if AI Ask skill)
-            encrypted_credits_costs_total_tuple = await self.encryption_service.encrypt_with_user_key(
-                key_id=encryption_key_id, plaintext=str(credits_charged)
-            )
-            
-            # Encrypt detailed credit costs if provided
-            encrypted_credits_costs_system_prompt = None
+            # Collect every sensitive field first and encrypt them in one Vault
+            # batch request instead of one round trip per field.
+            # Credit fields are always encrypted; tokens only for the AI Ask skill.
+            # Server provider and region are encrypted for ALL skills (not gated to AI Ask)
+            # so non-AI skills (web search, images, maps, etc.) can also display
+            # provider and region info in the usage detail view.
+            plaintext_fields: Dict[str, str] = {"credits_costs_total": str(credits_charged)}
+            if model_used:
+                plaintext_fields["model_used"] = model_used
             if cost_system_prompt_credits is not None:
-                res = await self.encryption_service.encrypt_with_user_key(
-                    key_id=encryption_key_id, plaintext=str(cost_system_prompt_credits)
-                )
-                encrypted_credits_costs_system_prompt = res[0] if res else None
-
-            encrypted_credits_costs_history = None
+                plaintext_fields["credits_costs_system_prompt"] = str(cost_system_prompt_credits)
             if cost_history_credits is not None:
-                res = await self.encryption_service.encrypt_with_user_key(
-                    key_id=encryption_key_id, plaintext=str(cost_history_credits)
-                )
-                encrypted_credits_costs_history = res[0] if res else None
-
-            encrypted_credits_costs_response = None
+                plaintext_fields["credits_costs_history"] = str(cost_history_credits)
             if cost_response_credits is not None:
-                res = await self.encryption_service.encrypt_with_user_key(
-                    key_id=encryption_key_id, plaintext=str(cost_response_credits)
-                )
-                encrypted_credits_costs_response = res[0] if res else None
-
-            encrypted_input_tokens = None
-            encrypted_output_tokens = None
-            encrypted_user_input_tokens = None
-            encrypted_system_prompt_tokens = None
-
-            # Encrypt server provider and region for ALL skills (not gated to AI Ask)
-            # This allows non-AI skills (web search, images, maps, etc.) to also display
-            # provider and region info in the usage detail view.
-            encrypted_server_provider = None
-            encrypted_server_region = None
+                plaintext_fields["credits_costs_response"] = str(cost_response_credits)
             if server_provider:
-                res = await self.encryption_service.encrypt_with_user_key(
-                    key_id=encryption_key_id, plaintext=server_provider
-                )
-                encrypted_server_provider = res[0] if res else None
-            
+                plaintext_fields["server_provider"] = server_provider
             if server_region:
-                res = await self.encryption_service.encrypt_with_user_key(
-                    key_id=encryption_key_id, plaintext=server_region
-                )
-                encrypted_server_region = res[0] if res else None
-
-            encrypted_code_run_filenames = None
+                plaintext_fields["server_region"] = server_region
             if code_run_filenames:
                 cleaned_filenames = [name for name in code_run_filenames if isinstance(name, str) and name.strip()]
                 if cleaned_filenames:
-                    res = await self.encryption_service.encrypt_with_user_key(
-                        key_id=encryption_key_id,
-                        plaintext=json.dumps(cleaned_filenames, separators=(",", ":")),
-                    )
-                    encrypted_code_run_filenames = res[0] if res else None
-
-            encrypted_code_run_duration_seconds = None
+                    plaintext_fields["code_run_filenames"] = json.dumps(cleaned_filenames, separators=(",", ":"))
             if code_run_duration_seconds is not None:
-                res = await self.encryption_service.encrypt_with_user_key(
-                    key_id=encryption_key_id, plaintext=str(round(float(code_run_duration_seconds), 3))
-                )
-                encrypted_code_run_duration_seconds = res[0] if res else None
-
+                plaintext_fields["code_run_duration_seconds"] = str(round(float(code_run_duration_seconds), 3))
             if should_save_tokens:
                 if actual_input_tokens is not None:
-                    encrypted_input_tokens_tuple = await self.encryption_service.encrypt_with_user_key(
-                        key_id=encryption_key_id, plaintext=str(actual_input_tokens)
-                    )
-                    encrypted_input_tokens = encrypted_input_tokens_tuple[0] if encrypted_input_tokens_tuple else None
-                
+                    plaintext_fields["input_tokens"] = str(actual_input_tokens)
                 if actual_output_tokens is not None:
-                    encrypted_output_tokens_tuple = await self.encryption_service.encrypt_with_user_key(
-                        key_id=encryption_key_id, plaintext=str(actual_output_tokens)
-                    )
-                    encrypted_output_tokens = encrypted_output_tokens_tuple[0] if encrypted_output_tokens_tuple else None
-
+                    plaintext_fields["output_tokens"] = str(actual_output_tokens)
                 if user_input_tokens is not None:
-                    res = await self.encryption_service.encrypt_with_user_key(
-                        key_id=encryption_key_id, plaintext=str(user_input_tokens)
-                    )
-                    encrypted_user_input_tokens = res[0] if res else None
-
+                    plaintext_fields["user_input_tokens"] = str(user_input_tokens)
                 if system_prompt_tokens is not None:
-                    res = await self.encryption_service.encrypt_with_user_key(
-                        key_id=encryption_key_id, plaintext=str(system_prompt_tokens)
-                    )
-                    encrypted_system_prompt_tokens = res[0] if res else None
+                    plaintext_fields["system_prompt_tokens"] = str(system_prompt_tokens)
+
+            # Envelope mode: usage fields are only read back via decrypt_with_user_key
+            encrypted_results = await self.encryption_service.encrypt_many_with_user_key(
+                list(plaintext_fields.values()), key_id=encryption_key_id, envelope=True
+            )
+            encrypted_fields = {
+                field: (result[0] if result else None)
+                for field, result in zip(plaintext_fields.keys(), encrypted_results)
+            }
 
-            encrypted_credits_costs_total = encrypted_credits_costs_total_tuple[0] if encrypted_credits_costs_total_tuple else None
+            encrypted_model_used = encrypted_fields.get("model_used")
+            encrypted_credits_costs_system_prompt = encrypted_fields.get("credits_costs_system_prompt")
+            encrypted_credits_costs_history = encrypted_fields.get("credits_costs_history")
+            encrypted_credits_costs_response = encrypted_fields.get("credits_costs_response")
+            encrypted_server_provider = encrypted_fields.get("server_provider")
+            encrypted_server_region = encrypted_fields.get("server_region")
+            encrypted_code_run_filenames = encrypted_fields.get("code_run_filenames")
+            encrypted_code_run_duration_seconds = encrypted_fields.get("code_run_duration_seconds")
+            encrypted_input_tokens = encrypted_fields.get("input_tokens")
+            encrypted_output_tokens = encrypted_fields.get("output_tokens")
+            encrypted_user_input_tokens = encrypted_fields.get("user_input_tokens")
+            encrypted_system_prompt_tokens = encrypted_fields.get("system_prompt_tokens")
+            encrypted_credits_costs_total = encrypted_fields.get("credits_costs_total")
 
             if not encrypted_credits_costs_total:
                 logger.error(f"{log_prefix} Failed to encrypt total credits. Aborting usage entry creation.")
@@ -302,37 +288,46 @@ class UsageMethods:
                 entry_id = response_data["id"]
                 logger.info(f"{log_prefix} Successfully created usage entry with ID: {entry_id}")
                 
-                # Update monthly summaries incrementally (fire-and-forget, non-blocking)
-                # This ensures summaries are always up-to-date for fast queries
-                try:
-                    await self._update_monthly_summaries(
-                        user_id_hash=user_id_hash,
-                        timestamp=timestamp,
-                        credits_charged=credits_charged,
-                        chat_id=normalized_chat_id,
-                        app_id=app_id,
-                        api_key_hash=api_key_hash,
-                        device_hash=device_hash
-                    )
-                except Exception as e_summary:
-                    # Log error but don't fail usage entry creation
-                    logger.error(f"{log_prefix} Error updating monthly summaries: {e_summary}", exc_info=True)
-                
-                # Update daily summaries incrementally (fire-and-forget, non-blocking)
-                # Daily summaries power the Overview tab in usage settings
-                try:
-                    await self._update_daily_summaries(
-                        user_id_hash=user_id_hash,
-                        timestamp=timestamp,
-                        credits_charged=credits_charged,
-                        chat_id=normalized_chat_id,
-                        app_id=app_id,
-                        api_key_hash=api_key_hash,
-                        device_hash=device_hash
-                    )
-                except Exception as e_daily:
-                    # Log error but don't fail usage entry creation
-                    logger.error(f"{log_prefix} Error updating daily summaries: {e_daily}", exc_info=True)
+                # Summary deltas are accumulated in the cache and flushed to Directus
+                # by usage.flush_summary_deltas; without a cache connection the
+                # summary rows are updated inline as before.
+                if not await self._record_summary_deltas(
+                    user_id_hash=user_id_hash,
+                    timestamp=timestamp,
+                    credits_charged=credits_charged,
+                    chat_id=normalized_chat_id,
+                    app_id=app_id,
+                    api_key_hash=api_key_hash,
+                    device_hash=device_hash
+                ):
+                    try:
+                        await self._update_monthly_summaries(
+                            user_id_hash=user_id_hash,
+                            timestamp=timestamp,
+                            credits_charged=credits_charged,
+                            chat_id=normalized_chat_id,
+                            app_id=app_id,
+                            api_key_hash=api_key_hash,
+                            device_hash=device_hash
+                        )
+                    except Exception as e_summary:
+                        # Log error but don't fail usage entry creation
+                        logger.error(f"{log_prefix} Error updating monthly summaries: {e_summary}", exc_info=True)
+
+                    # Daily summaries power the Overview tab in usage settings
+                    try:
+                        await self._update_daily_summaries(
+                            user_id_hash=user_id_hash,
+                            timestamp=timestamp,
+                            credits_charged=credits_charged,
+                            chat_id=normalized_chat_id,
+                            app_id=app_id,
+                            api_key_hash=api_key_hash,
+                            device_hash=device_hash
+                        )
+                    except Exception as e_daily:
+                        # Log error but don't fail usage entry creation
+                        logger.error(f"{log_prefix} Error updating daily summaries: {e_daily}", exc_info=True)
                 
                 return entry_id
             else:
@@ -343,6 +338,116 @@ class UsageMethods:
             logger.error(f"{log_prefix} Error creating usage entry: {e}", exc_info=True)
             return None
     
+    def _summary_aggregator(self) -> Optional[UsageSummaryAggregator]:
+        cache_service = getattr(self.sdk, "cache", None)
+        return UsageSummaryAggregator(cache_service) if cache_service is not None else None
+
+    async def _record_summary_deltas(
+        self,
+        user_id_hash: str,
+        timestamp: int,
+        credits_charged: int,
+        chat_id: Optional[str],
+        app_id: str,
+        api_key_hash: Optional[str],
+        device_hash: Optional[str] = None
+    ) -> bool:
+        """
+        Count a usage entry towards its monthly and daily summaries in the cache.
+        Returns False if the deltas could not be recorded; the caller then updates
+        the summary rows in Directus directly.
+        """
+        aggregator = self._summary_aggregator()
+        if aggregator is None:
+            return False
+        try:
+            return await aggregator.record(
+                user_id_hash,
+                timestamp,
+                credits_charged,
+                _summary_targets(chat_id, app_id, api_key_hash, device_hash),
+            )
+        except Exception as e:
+            logger.warning(f"DirectusService (usage summaries): Could not record summary deltas, updating inline: {e}")
+            return False
+
+    async def _pending_summary_deltas(
+        self,
+        user_id_hash: str,
+        granularity: str,
+        summary_types: Tuple[str, ...]
+    ) -> List[SummaryDelta]:
+        """Summary deltas of the user that have not been flushed to Directus yet."""
+        aggregator = self._summary_aggregator()
+        if aggregator is None:
+            return []
+        try:
+            deltas = await aggregator.pending_deltas(user_id_hash)
+        except Exception as e:
+            logger.warning(f"DirectusService (usage summaries): Could not read pending summary deltas: {e}")
+            return []
+        return [d for d in deltas if d.granularity == granularity and d.summary_type in summary_types]
+
+    async def _merge_pending_summaries(
+        self,
+        summaries: List[Dict[str, Any]],
+        user_id_hash: str,
+        granularity: str,
+        summary_type: str,
+        periods: List[str]
+    ) -> List[Dict[str, Any]]:
+        """
+        Add pending deltas to the persisted summary rows of one type. Rows that only
+        exist in the cache so far are appended without an id.
+        """
+        deltas = await self._pending_summary_deltas(user_id_hash, granularity, (summary_type,))
+        if not deltas:
+            return summaries
+        identifier_key = SUMMARY_IDENTIFIER_KEYS[summary_type]
+        period_field = "year_month" if granularity == MONTHLY else "date"
+        merged = [dict(row) for row in summaries]
+        rows = {(row.get(identifier_key), row.get(period_field)): row for row in merged}
+        now = int(datetime.now().timestamp())
+        for delta in deltas:
+            if delta.period not in periods:
+                continue
+            row = rows.get((delta.identifier, delta.period))
+            if row is None:
+                row = {
+                    "id": None,
+                    "user_id_hash": user_id_hash,
+                    identifier_key: delta.identifier,
+                    period_field: delta.period,
+                    "total_credits": 0,
+                    "entry_count": 0,
+                    "created_at": now,
+                }
+                if granularity == MONTHLY:
+                    row.update({"is_archived": False, "archive_s3_key": None})
+                rows[(delta.identifier, delta.period)] = row
+                merged.append(row)
+            row["total_credits"] = (row.get("total_credits") or 0) + delta.credits
+            row["entry_count"] = (row.get("entry_count") or 0) + delta.entries
+            row["updated_at"] = now
+        merged.sort(key=lambda row: row.get(period_field) or "", reverse=True)
+        return merged
+
+    async def get_pending_summary_credits(
+        self,
+        user_id_hash: str,
+        summary_type: str,
+        identifier: str,
+        year_month: Optional[str] = None,
+        date: Optional[str] = None
+    ) -> int:
+        """
+        Credits counted towards a monthly (year_month) or daily (date) summary row
+        that have not been flushed to Directus yet.
+        """
+        granularity, period = (MONTHLY, year_month) if year_month else (DAILY, date)
+        deltas = await self._pending_summary_deltas(user_id_hash, granularity, (summary_type,))
+        return sum(d.credits for d in deltas if d.identifier == identifier and d.period == period)
+
     async def _update_monthly_summaries(
         self,
         user_id_hash: str,
@@ -354,7 +459,8 @@ class UsageMethods:
         device_hash: Optional[str] = None
     ):
         """
-        Update monthly summaries incrementally when a usage entry is created.
+        Update monthly summaries in Directus directly when a usage entry is created.
+        Fallback for _record_summary_deltas when the cache is unavailable.
         This method updates or creates summary records for chats, apps, and API keys.
         
         Args:
@@ -373,58 +479,16 @@ class UsageMethods:
             dt = datetime.fromtimestamp(timestamp)
             year_month = dt.strftime("%Y-%m")
             
-            # Update chat summary if chat_id is provided and it's not an API request
-            # API requests with chat_id should only show up under API usage, not chat usage
-            if chat_id and not api_key_hash:
-                await self._update_summary(
-                    collection="usage_monthly_chat_summaries",
-                    user_id_hash=user_id_hash,
-                    identifier_key="chat_id",
-                    identifier_value=chat_id,
-                    year_month=year_month,
-                    credits_charged=credits_charged,
-                    log_prefix=log_prefix,
-                    summary_type="chat"
-                )
-            
-            # Update app summary (always, since app_id is required)
-            await self._update_summary(
-                collection="usage_monthly_app_summaries",
-                user_id_hash=user_id_hash,
-                identifier_key="app_id",
-                identifier_value=app_id,
-                year_month=year_month,
-                credits_charged=credits_charged,
-                log_prefix=log_prefix,
-                summary_type="app"
-            )
-            
-            # Update API key summary if api_key_hash is provided
-            if api_key_hash:
+            for summary_type, identifier in _summary_targets(chat_id, app_id, api_key_hash, device_hash):
                 await self._update_summary(
-                    collection="usage_monthly_api_key_summaries",
+                    collection=f"usage_monthly_{summary_type}_summaries",
                     user_id_hash=user_id_hash,
-                    identifier_key="api_key_hash",
-                    identifier_value=api_key_hash,
+                    identifier_key=SUMMARY_IDENTIFIER_KEYS[summary_type],
+                    identifier_value=identifier,
                     year_month=year_month,
                     credits_charged=credits_charged,
                     log_prefix=log_prefix,
-                    summary_type="api_key"
-                )
-
-            # Session-auth device tracking: when neither API key nor chat is present
-            # but a device_hash exists (CLI or native Apple app-skill calls), create
-            # a synthetic API/devices summary identifier.
-            if device_hash and not api_key_hash and not chat_id:
-                await self._update_summary(
-                    collection="usage_monthly_api_key_summaries",
-                    user_id_hash=user_id_hash,
-                    identifier_key="api_key_hash",
-                    identifier_value=_api_device_summary_identifier(device_hash),
-                    year_month=year_month,
-                    credits_charged=credits_charged,
-                    log_prefix=log_prefix,
-                    summary_type="api_key"
+                    summary_type=summary_type
                 )
             
         except Exception as e:
@@ -539,8 +603,8 @@ class UsageMethods:
         device_hash: Optional[str] = None
     ):
         """
-        Update daily summaries incrementally when a usage entry is created.
-        Mirrors the monthly summary pattern but groups by date (YYYY-MM-DD).
+        Update daily summaries in Directus directly when a usage entry is created
+        (fallback for _record_summary_deltas). Mirrors the monthly summary pattern but groups by date (YYYY-MM-DD).
         Daily summaries power the Overview tab in the usage settings page.
         
         Args:
@@ -559,49 +623,12 @@ class UsageMethods:
             dt = datetime.fromtimestamp(timestamp)
             date_str = dt.strftime("%Y-%m-%d")
             
-            # Update chat daily summary if chat_id is provided and it's not an API request
-            if chat_id and not api_key_hash:
-                await self._update_daily_summary(
-                    collection="usage_daily_chat_summaries",
-                    user_id_hash=user_id_hash,
-                    identifier_key="chat_id",
-                    identifier_value=chat_id,
-                    date_str=date_str,
-                    credits_charged=credits_charged,
-                    log_prefix=log_prefix
-                )
-            
-            # Update app daily summary (always, since app_id is required)
-            await self._update_daily_summary(
-                collection="usage_daily_app_summaries",
-                user_id_hash=user_id_hash,
-                identifier_key="app_id",
-                identifier_value=app_id,
-                date_str=date_str,
-                credits_charged=credits_charged,
-                log_prefix=log_prefix
-            )
-            
-            # Update API key daily summary if api_key_hash is provided
-            if api_key_hash:
+            for summary_type, identifier in _summary_targets(chat_id, app_id, api_key_hash, device_hash):
                 await self._update_daily_summary(
-                    collection="usage_daily_api_key_summaries",
+                    collection=f"usage_daily_{summary_type}_summaries",
                     user_id_hash=user_id_hash,
-                    identifier_key="api_key_hash",
-                    identifier_value=api_key_hash,
-                    date_str=date_str,
-                    credits_charged=credits_charged,
-                    log_prefix=log_prefix
-                )
-
-            # Update device daily summary for session-auth direct calls (no api_key, no chat).
-            # Uses a synthetic identifier so CLI/Apple usage appears in the API/devices tab.
-            if device_hash and not api_key_hash and not chat_id:
-                await self._update_daily_summary(
-                    collection="usage_daily_api_key_summaries",
-                    user_id_hash=user_id_hash,
-                    identifier_key="api_key_hash",
-                    identifier_value=_api_device_summary_identifier(device_hash),
+                    identifier_key=SUMMARY_IDENTIFIER_KEYS[summary_type],
+                    identifier_value=identifier,
                     date_str=date_str,
                     credits_charged=credits_charged,
                     log_prefix=log_prefix
@@ -759,6 +786,13 @@ class UsageMethods:
                 self.sdk.get_items("usage_daily_chat_summaries", params=chat_params, no_cache=True),
                 self.sdk.get_items("usage_daily_api_key_summaries", params=api_key_params, no_cache=True),
             )
+            # Include usage recorded since the last summary flush
+            chat_summaries = await self._merge_pending_summaries(
+                chat_summaries or [], user_id_hash, DAILY, "chat", dates
+            )
+            api_key_summaries = await self._merge_pending_summaries(
+                api_key_summaries or [], user_id_hash, DAILY, "api_key", dates
+            )
             
             # Combine all items grouped by date
             # Structure: {date: {items: [...], total_credits: N}}
@@ -1218,11 +1252,15 @@ class UsageMethods:
             }
             
             summaries = await self.sdk.get_items(collection_name, params=params, no_cache=True)
+            # Include usage recorded since the last summary flush
+            summaries = await self._merge_pending_summaries(
+                summaries or [], user_id_hash, MONTHLY, summary_type, year_months
+            )
             
             # Cache the last 3 months for future requests
             if months <= 3 and summaries:
                 # Cache for 5 minutes to balance freshness and performance
-                # Update cache when summaries are updated in _update_summary
+                # Recording new usage (and flushing it) invalidates this key
                 await self.sdk.cache.set(cache_key, summaries, ttl=300)
                 logger.debug(f"{log_prefix} Cached {len(summaries)} {summary_type} summaries")
             
@@ -1280,10 +1318,11 @@ class UsageMethods:
             summaries = await self.sdk.get_items(collection_name, params=params, no_cache=True)
             
             if not summaries:
-                logger.warning(f"{log_prefix} No summary found for {summary_type} '{identifier}', month '{year_month}'")
-                return []
+                # The summary row may not be flushed yet (usage.flush_summary_deltas);
+                # entries are then still in the usage collection.
+                logger.info(f"{log_prefix} No persisted summary for {summary_type} '{identifier}', month '{year_month}'")
             
-            summary = summaries[0]
+            summary = summaries[0] if summaries else {}
             is_archived = summary.get("is_archived", False)
             
             if is_archived:
@@ -1437,6 +1476,8 @@ class UsageMethods:
             )
             
             total = sum(s.get("total_credits", 0) for s in summaries)
+            pending = await self._pending_summary_deltas(user_id_hash, MONTHLY, ("chat",))
+            total += sum(d.credits for d in pending if d.identifier == chat_id)
             logger.debug(f"{log_prefix} Chat '{chat_id}' total credits: {total} (from {len(summaries)} month(s))")
             return total
             
@@ -0,0 +1,141 @@
+# backend/core/api/app/services/embed_content_cache.py
+#
+# Request-scoped cache of decrypted embed content.
+#
+# Quote verification (stream_consumer._verify_and_strip_bad_quotes) and history
+# resolution (EmbedService.resolve_embed_references_in_content) read the same
+# embeds many times per request: every read was a Redis GET, a Vault decrypt and
+# a TOON decode, and every quote renormalised the embed's full searchable text.
+# One EmbedContentCache per request keeps the decrypted TOON, the decoded
+# content and a quote index per embed, so each embed is decrypted once and
+# every further quote is a set lookup plus one substring search.
+#
+# Entries hold plaintext, so the cache must never outlive the request that
+# created it (do not store it on long-lived objects). It is bounded by an
+# approximate byte budget and evicts least recently used embeds beyond it.
+
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Optional
+
+from toon_format import decode
+
+if TYPE_CHECKING:
+    from backend.core.api.app.services.embed_service import EmbedService
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBED_CONTENT_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+_NOT_DECODED = object()
+
+
+class QuoteIndex:
+    """
+    Normalised searchable text of one embed plus the set of its space-separated
+    tokens. Every token of a quote except the first and last (which may be cut
+    mid-word) must be a whole token of the text, so most non-matching quotes are
+    rejected without scanning the text.
+    """
+
+    __slots__ = ("text", "tokens")
+
+    def __init__(self, normalized_text: str):
+        self.text = normalized_text
+        self.tokens = frozenset(normalized_text.split(" "))
+
+    def contains(self, normalized_quote: str) -> bool:
+        inner_tokens = normalized_quote.split(" ")[1:-1]
+        if inner_tokens and not self.tokens.issuperset(inner_tokens):
+            return False
+        return normalized_quote in self.text
+
+    @property
+    def approx_size(self) -> int:
+        # Tokens share most characters with the text; count them once more as overhead
+        return 2 * len(self.text)
+
+
+@dataclass
+class _Entry:
+    toon: Optional[str]
+    decoded: Any = _NOT_DECODED
+    quote_index: Optional[QuoteIndex] = None
+    size: int = 0
+
+
+class EmbedContentCache:
+    """Per-request cache of decrypted embed TOON, decoded content and quote indexes."""
+
+    def __init__(self, max_bytes: int = DEFAULT_EMBED_CONTENT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple[str, str], _Entry]" = OrderedDict()
+        self._size = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    async def _entry(
+        self, embed_service: "EmbedService", embed_id: str, user_vault_key_id: str, log_prefix: str
+    ) -> _Entry:
+        cache_key = (embed_id, user_vault_key_id)
+        entry = self._entries.get(cache_key)
+        if entry is not None:
+            self._entries.move_to_end(cache_key)
+            self.stats["hits"] += 1
+            return entry
+
+        self.stats["misses"] += 1
+        # Misses are cached too: an embed missing from Redis stays missing for the request
+        toon = await embed_service._get_cached_embed_toon(embed_id, user_vault_key_id, log_prefix)
+        entry = _Entry(toon=toon)
+        self._store(cache_key, entry, len(toon) if toon else 0)
+        return entry
+
+    def _store(self, cache_key: tuple, entry: _Entry, added_size: int) -> None:
+        entry.size += added_size
+        self._size += added_size
+        self._entries[cache_key] = entry
+        self._entries.move_to_end(cache_key)
+        # Keep the newest entry even when it alone exceeds the budget
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= evicted.size
+            self.stats["evictions"] += 1
+
+    async def get_toon(
+        self, embed_service: "EmbedService", embed_id: str, user_vault_key_id: str, log_prefix: str = ""
+    ) -> Optional[str]:
+        """Decrypted TOON string of the embed, or None if it is not in the cache."""
+        return (await self._entry(embed_service, embed_id, user_vault_key_id, log_prefix)).toon
+
+    async def get_decoded(
+        self, embed_service: "EmbedService", embed_id: str, user_vault_key_id: str, log_prefix: str = ""
+    ) -> Any:
+        """Decoded TOON content of the embed, or None if missing or undecodable."""
+        entry = await self._entry(embed_service, embed_id, user_vault_key_id, log_prefix)
+        if entry.decoded is _NOT_DECODED:
+            try:
+                entry.decoded = decode(entry.toon) if entry.toon else None
+            except Exception as e:
+                logger.warning(f"{log_prefix} Failed to decode TOON for {embed_id}: {e}")
+                entry.decoded = None
+            # Decoded content is roughly as large as its TOON source
+            if entry.decoded is not None:
+                self._store((embed_id, user_vault_key_id), entry, len(entry.toon))
+        return entry.decoded
+
+    async def get_quote_index(
+        self, embed_service: "EmbedService", embed_id: str, user_vault_key_id: str, log_prefix: str = ""
+    ) -> Optional[QuoteIndex]:
+        """Quote index over the embed's normalised searchable text, built once per embed."""
+        decoded = await self.get_decoded(embed_service, embed_id, user_vault_key_id, log_prefix)
+        if decoded is None:
+            return None
+        # No await since get_decoded, so the entry is still the most recent one
+        cache_key = (embed_id, user_vault_key_id)
+        entry = self._entries[cache_key]
+        if entry.quote_index is None:
+            searchable_text = embed_service._extract_searchable_text(decoded)
+            entry.quote_index = QuoteIndex(embed_service._normalize_for_quote_comparison(searchable_text))
+            self._store(cache_key, entry, entry.quote_index.approx_size)
+        return entry.quote_index
@@ -15,6 +15,7 @@ from datetime import datetime
 from toon_format import encode, decode
 from backend.core.api.app.services.cache import CacheService
 from backend.core.api.app.services.directus import DirectusService
+from backend.core.api.app.services.embed_content_cache import EmbedContentCache
 from backend.core.api.app.utils.encryption import EncryptionService
 from backend.shared.python_schemas.embed_status import (
     EmbedStatus,
@@ -3510,7 +3511,8 @@ class EmbedService:
                 #
                 # Stripped (all crypto/storage — resolved server-side):
                 #   aes_key, aes_nonce, vault_wrapped_aes_key — AES encryption fields
-                #   ocr_data_s3_key, screenshot_s3_keys, extracted_image_s3_keys — S3 object keys
+                #   ocr_data_s3_key, search_index_s3_key, screenshot_s3_keys,
+                #   extracted_image_s3_keys — S3 object keys
                 #   s3_base_url — S3 bucket URL
                 #   embed_id (UUID) — never shown to LLM; use embed_ref (filename) instead
                 _PDF_STRIP_FIELDS = frozenset({
@@ -3518,6 +3520,7 @@ class EmbedService:
                     "aes_nonce",
                     "vault_wrapped_aes_key",
                     "ocr_data_s3_key",
+                    "search_index_s3_key",
                     "screenshot_s3_keys",
                     "extracted_image_s3_keys",
                     "s3_base_url",
@@ -4053,6 +4056,9 @@ class EmbedService:
         # in the history so duplicate filenames across messages get consistent suffixes.
         # Pass None (default) to use a fresh counter per-call.
         seen_embed_refs: Optional[Dict[str, int]] = None,
+        # Request-scoped decrypted-embed cache shared across the history, so an embed
+        # referenced by several messages is decrypted once. None fetches every time.
+        content_cache: Optional[EmbedContentCache] = None,
     ) -> Tuple[str, Dict[str, str]]:
         """
         Resolve embed references in message content by replacing JSON code blocks
@@ -4081,6 +4087,7 @@ class EmbedService:
             log_prefix: Logging prefix for this operation.
             seen_embed_refs: Mutable deduplication counter shared across multiple
                 messages so filenames are unique even across the full history.
+            content_cache: Optional request-scoped EmbedContentCache.
 
         Returns:
             Tuple of (resolved_content, file_path_index):
@@ -4148,7 +4155,10 @@ class EmbedService:
             resolved_parts.append(content[last_end:match.start()])
 
             # Load embed from cache (returns TOON string, not decoded)
-            toon_content = await self._get_cached_embed_toon(embed_id, user_vault_key_id, log_prefix)
+            if content_cache is not None:
+                toon_content = await content_cache.get_toon(self, embed_id, user_vault_key_id, log_prefix)
+            else:
+                toon_content = await self._get_cached_embed_toon(embed_id, user_vault_key_id, log_prefix)
 
             if not toon_content:
                 # CRITICAL: If embed not found in cache, try to use URL as fallback
@@ -5030,9 +5040,9 @@ class EmbedService:
             # Publish to Redis for WebSocket delivery
             client = await self.cache_service.client
             if client:
-                import json as json_lib
                 channel_key = f"websocket:user:{user_id_hash}"
-                await client.publish(channel_key, json_lib.dumps(payload))
+                # publish_event targets only the API nodes holding this user's connections
+                await self.cache_service.publish_event(channel_key, payload)
                 logger.info(
                     f"{log_prefix} [EMBED_EVENT] Published send_embed_data event for embed {embed_id} "
                     f"(status={status}, type={embed_type}, chat_id={chat_id}, message_id={message_id})"
@@ -5645,10 +5655,8 @@ class EmbedService:
             if client:
                 await client.set(cache_key, embed_json, ex=259200)  # 72 hours
 
-                # Add to chat index for eviction tracking
-                chat_embed_index_key = f"chat:{chat_id}:embed_ids"
-                await client.sadd(chat_embed_index_key, embed_id)
-                await client.expire(chat_embed_index_key, 259200)  # 72 hours
+                # Add to chat index for eviction tracking (refcounted for AI cache eviction)
+                await self.cache_service.add_embed_id_to_chat_index(chat_id, embed_id, ttl=259200)  # 72 hours
                 
                 logger.debug(f"Cached embed {embed_id} at {cache_key}")
             else:
@@ -5759,6 +5767,7 @@ class EmbedService:
         quoted_text: str,
         user_vault_key_id: str,
         log_prefix: str = "",
+        content_cache: Optional[EmbedContentCache] = None,
     ) -> bool:
         """
         Check whether `quoted_text` appears (case-insensitive substring) in the
@@ -5773,6 +5782,8 @@ class EmbedService:
             quoted_text: The exact text the LLM claims comes from this embed.
             user_vault_key_id: Vault key for decrypting the embed cache.
             log_prefix: Logging prefix.
+            content_cache: Request-scoped cache; when given, the embed is decrypted
+                and indexed once for all quotes of the request.
 
         Returns:
             True if `quoted_text` was found in the embed content, False otherwise.
@@ -5780,6 +5791,17 @@ class EmbedService:
         if not quoted_text or not embed_id:
             return False
 
+        if content_cache is not None:
+            quote_index = await content_cache.get_quote_index(self, embed_id, user_vault_key_id, log_prefix)
+            if quote_index is None:
+                logger.warning(
+                    f"{log_prefix} [QUOTE_VERIFY] Embed {embed_id} not in cache or undecodable — "
+                    f"cannot verify quote, treating as unverifiable"
+                )
+                return False
+            normalized_quote = self._normalize_for_quote_comparison(quoted_text)
+            return bool(normalized_quote) and quote_index.contains(normalized_quote)
+
         toon_str = await self._get_cached_embed_toon(embed_id, user_vault_key_id, log_prefix)
         if not toon_str:
             logger.warning(
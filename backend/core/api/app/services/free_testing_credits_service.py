@@ -18,6 +18,8 @@ from datetime import datetime, timezone
 from typing import Any, Callable, Optional
 from uuid import uuid4
 
+from backend.core.api.app.services.credit_ledger import CreditLedger
+
 logger = logging.getLogger(__name__)
 
 FREE_TESTING_BUDGET_COLLECTION = "free_testing_credits_budget"
@@ -66,6 +68,7 @@ class FreeTestingCreditsService:
         self.directus = directus_service
         self.cache = cache_service
         self.encryption = encryption_service
+        self.ledger = CreditLedger(cache_service)
         self.websocket_manager = websocket_manager
         self.celery_app = celery_app
         self.admin_email_getter = admin_email_getter or _default_admin_email
@@ -173,17 +176,24 @@ class FreeTestingCreditsService:
             logger.error("Cannot grant free testing credits: user %s missing vault_key_id", user_id[:8])
             return FreeTestingGrantResult(granted=False, reason="missing_vault_key")
 
-        current_credits = _safe_int(user_cache.get("credits"))
         grant_credits = status.per_user_grant_credits
-        new_total = current_credits + grant_credits
-        encrypted_credits, _ = await self.encryption.encrypt_with_user_key(str(new_total), vault_key_id)
+        # Through the ledger so the grant cannot race with concurrent charges
+        ledger_result = await self.ledger.grant(
+            user_id, grant_credits, "free_testing", "signup_grant", self.directus, self.encryption
+        )
+        if ledger_result.applied:
+            new_total = ledger_result.balance
+        else:
+            current_credits = _safe_int(user_cache.get("credits"))
+            new_total = current_credits + grant_credits
+            encrypted_credits, _ = await self.encryption.encrypt_with_user_key(str(new_total), vault_key_id)
 
-        if not await self.directus.update_user(user_id, {"encrypted_credit_balance": encrypted_credits}):
-            logger.error("Failed to update Directus credit balance for free testing grant: %s", user_id[:8])
-            return FreeTestingGrantResult(granted=False, reason="credit_update_failed")
+            if not await self.directus.update_user(user_id, {"encrypted_credit_balance": encrypted_credits}):
+                logger.error("Failed to update Directus credit balance for free testing grant: %s", user_id[:8])
+                return FreeTestingGrantResult(granted=False, reason="credit_update_failed")
 
-        user_cache["credits"] = new_total
-        await self.cache.set_user(user_cache, user_id=user_id)
+            user_cache["credits"] = new_total
+            await self.cache.set_user(user_cache, user_id=user_id)
 
         created_at = _now_iso()
         success, _grant = await self.directus.create_item(
@@ -18,6 +18,7 @@ from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, Optional
 
 from backend.core.api.app.services.cache import CacheService
+from backend.core.api.app.services.credit_ledger import CreditLedger
 from backend.core.api.app.services.directus import DirectusService
 from backend.core.api.app.utils.encryption import EncryptionService
 
@@ -85,6 +86,7 @@ class ReferralService:
         self.directus = directus_service
         self.cache = cache_service
         self.encryption = encryption_service
+        self.ledger = CreditLedger(cache_service)
 
     async def get_active_campaign(self) -> Optional[Dict[str, Any]]:
         """Return the first active campaign with remaining budget."""
@@ -396,18 +398,15 @@ class ReferralService:
                 await self._reject_attribution(attribution, REFERRAL_STATUS_REJECTED, "referrer_credit_unavailable")
                 return ReferralRewardResult(False, reason="referrer_credit_unavailable")
 
-            referrer_current = await self._decrypt_credits(
-                referrer_fields.get("encrypted_credit_balance"),
-                referrer_fields.get("vault_key_id"),
+            referred_new_total = await self._grant_credits(
+                referred_user_id, referred_bonus, "referred", referred_vault_key_id,
+                current_credits=referred_current_credits,
             )
-            referred_new_total = referred_current_credits + referred_bonus
-            referrer_new_total = referrer_current + referrer_bonus
-
-            referred_encrypted, _ = await self.encryption.encrypt_with_user_key(str(referred_new_total), referred_vault_key_id)
-            referrer_encrypted, _ = await self.encryption.encrypt_with_user_key(str(referrer_new_total), referrer_fields.get("vault_key_id"))
-            referred_ok = await self.directus.update_user(referred_user_id, {"encrypted_credit_balance": referred_encrypted})
-            referrer_ok = await self.directus.update_user(referrer_user_id, {"encrypted_credit_balance": referrer_encrypted})
-            if not referred_ok or not referrer_ok:
+            referrer_new_total = await self._grant_credits(
+                referrer_user_id, referrer_bonus, "referrer", referrer_fields.get("vault_key_id"),
+                encrypted_balance=referrer_fields.get("encrypted_credit_balance"),
+            )
+            if referred_new_total is None or referrer_new_total is None:
                 await self._reject_attribution(attribution, REFERRAL_STATUS_REJECTED, "credit_update_failed")
                 return ReferralRewardResult(False, reason="credit_update_failed")
 
@@ -443,8 +442,6 @@ class ReferralService:
             await self._record_reward(attribution, campaign, referred_hash, "referred", referred_bonus, order_id)
             await self._record_reward(attribution, campaign, attribution.get("referrer_user_id_hash"), "referrer", referrer_bonus, order_id)
 
-            await self.cache.update_user(referred_user_id, {"credits": referred_new_total})
-            await self.cache.update_user(referrer_user_id, {"credits": referrer_new_total})
             return ReferralRewardResult(
                 True,
                 referred_bonus=referred_bonus,
@@ -515,6 +512,32 @@ class ReferralService:
         )
         return bool(rows)
 
+    async def _grant_credits(
+        self,
+        user_id: str,
+        bonus: int,
+        role: str,
+        vault_key_id: str,
+        current_credits: Optional[int] = None,
+        encrypted_balance: Optional[str] = None,
+    ) -> Optional[int]:
+        """
+        Add reward credits through the credit ledger so they cannot race with
+        charges. Profiles the ledger cannot patch fall back to a direct Directus
+        and cache update. Returns the new balance, or None if the update failed.
+        """
+        result = await self.ledger.grant(user_id, bonus, "referrals", role, self.directus, self.encryption)
+        if result.applied:
+            return result.balance
+        if current_credits is None:
+            current_credits = await self._decrypt_credits(encrypted_balance, vault_key_id)
+        new_total = current_credits + bonus
+        encrypted, _ = await self.encryption.encrypt_with_user_key(str(new_total), vault_key_id)
+        if not await self.directus.update_user(user_id, {"encrypted_credit_balance": encrypted}):
+            return None
+        await self.cache.update_user(user_id, {"credits": new_total})
+        return new_total
+
     async def _decrypt_credits(self, encrypted_value: Optional[str], vault_key_id: str) -> int:
         if not encrypted_value:
             return 0
@@ -0,0 +1,405 @@
+# backend/core/api/app/services/usage_summary_aggregator.py
+#
+# In-cache aggregation of the usage summary tables (usage_monthly_*_summaries,
+# usage_daily_*_summaries).
+#
+# UsageMethods.create_usage_entry used to look up and then update or create one
+# summary row per chat / app / API key / device and per month and day — up to
+# eight Directus round trips per billed event, each a read-modify-write racing
+# with concurrent charges of the same user.
+#
+# Summary deltas are now accumulated with HINCRBY in one Dragonfly hash per user
+# (same hot cache -> periodic flush pattern as ServerStatsService), in a single
+# MULTI round trip that also marks the user dirty and drops the cached summary
+# views. flush() (Celery beat, every few seconds) takes a user's deltas, reads the
+# affected summary rows in bulk, adds the deltas and writes them back — one update
+# per existing row, one batch create for new rows. Readers merge pending deltas
+# into the persisted rows (pending_deltas()), so totals and API key budgets stay
+# exact between flushes.
+#
+# Hand-off: the flusher claims the user (SET NX with a TTL and a per-run token)
+# and renames the pending hash to an in-flight hash; new charges keep going to a
+# fresh pending hash. A row's fields are deleted from the in-flight hash right
+# after the row was written (so readers do not count them twice while the rest of
+# the flush runs), and only then, so a failed or crashed flush is retried once the
+# claim expires.
+# A slow flush renews its claims before each Directus write and stops writing a
+# user's rows as soon as it no longer holds the claim, so a second flusher never
+# re-applies deltas the first one is still writing. A crash between the Directus
+# write and the delete still re-applies the delta.
+
+import logging
+import secrets
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PENDING_KEY_PREFIX = "usage:summary_pending:"  # + user_id_hash
+SUMMARY_INFLIGHT_KEY_PREFIX = "usage:summary_inflight:"  # + user_id_hash
+SUMMARY_CLAIM_KEY_PREFIX = "usage:summary_claim:"  # + user_id_hash
+SUMMARY_DIRTY_USERS_KEY = "usage:summary_dirty"
+# How long a flusher may hold a user before another one retries its deltas (seconds)
+SUMMARY_CLAIM_TTL_SECONDS = 120
+# A claim is renewed before a Directus write once it is this old (seconds)
+SUMMARY_CLAIM_RENEW_SECONDS = 30
+# Users flushed per flush() run
+SUMMARY_FLUSH_BATCH_SIZE = 200
+# Summary rows per bulk lookup (keeps the Directus filter query string short)
+SUMMARY_QUERY_CHUNK_SIZE = 100
+
+MONTHLY = "m"
+DAILY = "d"
+
+SUMMARY_IDENTIFIER_KEYS = {"chat": "chat_id", "app": "app_id", "api_key": "api_key_hash"}
+
+# Cached read views that include summary values (see UsageMethods)
+_MONTHLY_SUMMARY_CACHE_MONTHS = (1, 2, 3)
+_DAILY_OVERVIEW_CACHE_DAYS = (7, 14, 30)
+
+# KEYS: pending, in-flight, claim, dirty set
+# ARGV: claim ttl, user_id_hash, claim token
+_CLAIM_DELTAS_LUA = """
+if not redis.call('SET', KEYS[3], ARGV[3], 'NX', 'EX', ARGV[1]) then
+    redis.call('SADD', KEYS[4], ARGV[2])
+    return false
+end
+if redis.call('EXISTS', KEYS[2]) == 0 and redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('RENAME', KEYS[1], KEYS[2])
+end
+return redis.call('HGETALL', KEYS[2])
+"""
+
+# KEYS: claim
+# ARGV: claim token, claim ttl
+_RENEW_CLAIM_LUA = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+return redis.call('EXPIRE', KEYS[1], ARGV[2])
+"""
+
+# KEYS: in-flight, claim
+# ARGV: claim token, persisted in-flight fields...
+_DROP_PERSISTED_LUA = """
+if redis.call('GET', KEYS[2]) ~= ARGV[1] then
+    return 0
+end
+return redis.call('HDEL', KEYS[1], unpack(ARGV, 2))
+"""
+
+# KEYS: pending, in-flight, claim, dirty set
+# ARGV: user_id_hash, claim token
+_RELEASE_DELTAS_LUA = """
+if redis.call('GET', KEYS[3]) ~= ARGV[2] then
+    return 0
+end
+redis.call('DEL', KEYS[3])
+if redis.call('EXISTS', KEYS[1]) == 1 or redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('SADD', KEYS[4], ARGV[1])
+end
+return 1
+"""
+
+
+@dataclass(frozen=True)
+class SummaryDelta:
+    """Pending change of one summary row (granularity MONTHLY or DAILY)."""
+
+    granularity: str
+    summary_type: str
+    period: str
+    identifier: str
+    credits: int = 0
+    entries: int = 0
+
+    @property
+    def collection(self) -> str:
+        kind = "monthly" if self.granularity == MONTHLY else "daily"
+        return f"usage_{kind}_{self.summary_type}_summaries"
+
+    @property
+    def period_field(self) -> str:
+        return "year_month" if self.granularity == MONTHLY else "date"
+
+    @property
+    def identifier_key(self) -> str:
+        return SUMMARY_IDENTIFIER_KEYS[self.summary_type]
+
+
+def _text(value: Any) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+
+def _field(metric: str, granularity: str, summary_type: str, period: str, identifier: str) -> str:
+    # The identifier goes last: it may contain ':' (device identifiers) but never '|'
+    return f"{metric}|{granularity}|{summary_type}|{period}|{identifier}"
+
+
+def _parse_deltas(fields: Dict[str, int]) -> Dict[Tuple[str, str, str, str], Dict[str, int]]:
+    """Group 'metric|row' hash fields by summary row."""
+    rows: Dict[Tuple[str, str, str, str], Dict[str, int]] = {}
+    for field, value in fields.items():
+        parts = field.split("|", 4)
+        if len(parts) != 5 or parts[0] not in ("credits", "entries") or parts[2] not in SUMMARY_IDENTIFIER_KEYS:
+            logger.warning(f"[UsageSummaries] Ignoring malformed summary delta field '{field}'")
+            continue
+        rows.setdefault(tuple(parts[1:]), {})[parts[0]] = int(value)
+    return rows
+
+
+def _to_deltas(rows: Dict[Tuple[str, str, str, str], Dict[str, int]]) -> List[SummaryDelta]:
+    return [
+        SummaryDelta(*row, credits=values.get("credits", 0), entries=values.get("entries", 0))
+        for row, values in rows.items()
+    ]
+
+
+def summary_cache_keys(user_id_hash: str, summary_types: Iterable[str]) -> List[str]:
+    """Cache keys of the read views that include the given summary types."""
+    keys = [
+        f"usage_summaries:{user_id_hash}:{summary_type}:{months}"
+        for summary_type in sorted(set(summary_types))
+        for months in _MONTHLY_SUMMARY_CACHE_MONTHS
+    ]
+    keys.extend(f"usage_daily_overview:{user_id_hash}:{days}" for days in _DAILY_OVERVIEW_CACHE_DAYS)
+    return keys
+
+
+class _Claims:
+    """Claims held by one flush() run, renewed while their rows are written."""
+
+    def __init__(self, client: Any):
+        self.client = client
+        self.tokens: Dict[str, str] = {}
+        self._renewed_at: Dict[str, float] = {}
+
+    def add(self, user_id_hash: str, token: str) -> None:
+        self.tokens[user_id_hash] = token
+        self._renewed_at[user_id_hash] = time.monotonic()
+
+    async def held(self, user_id_hash: str) -> bool:
+        """Whether the claim is still ours; renews it if it is getting old."""
+        token = self.tokens.get(user_id_hash)
+        if token is None:
+            return False
+        if time.monotonic() - self._renewed_at[user_id_hash] < SUMMARY_CLAIM_RENEW_SECONDS:
+            return True
+        if await self.client.eval(
+            _RENEW_CLAIM_LUA, 1, f"{SUMMARY_CLAIM_KEY_PREFIX}{user_id_hash}", token, SUMMARY_CLAIM_TTL_SECONDS
+        ):
+            self._renewed_at[user_id_hash] = time.monotonic()
+            return True
+        logger.warning(f"[UsageSummaries] Lost the flush claim of {user_id_hash}; leaving its deltas to the new owner")
+        del self.tokens[user_id_hash]
+        return False
+
+    async def drop_persisted(self, user_id_hash: str, deltas: List[SummaryDelta]) -> None:
+        """Delete the in-flight fields of rows just written (while the claim is still ours)."""
+        token = self.tokens.get(user_id_hash)
+        if token is None or not deltas:
+            return
+        fields = [
+            _field(metric, delta.granularity, delta.summary_type, delta.period, delta.identifier)
+            for delta in deltas
+            for metric in ("credits", "entries")
+        ]
+        await self.client.eval(
+            _DROP_PERSISTED_LUA, 2, f"{SUMMARY_INFLIGHT_KEY_PREFIX}{user_id_hash}",
+            f"{SUMMARY_CLAIM_KEY_PREFIX}{user_id_hash}", token, *fields,
+        )
+
+
+class UsageSummaryAggregator:
+    """Summary deltas accumulated in the cache and flushed to Directus in bulk."""
+
+    def __init__(self, cache_service: Any):
+        self.cache_service = cache_service
+
+    async def record(
+        self, user_id_hash: str, timestamp: int, credits_charged: int, targets: List[Tuple[str, str]]
+    ) -> bool:
+        """
+        Add one usage entry to the monthly and daily summaries of each
+        (summary_type, identifier) target. Returns False if the cache is unavailable,
+        in which case the caller updates the summaries in Directus directly.
+        """
+        client = await self.cache_service.client
+        if not client:
+            return False
+        dt = datetime.fromtimestamp(timestamp)
+        periods = ((MONTHLY, dt.strftime("%Y-%m")), (DAILY, dt.strftime("%Y-%m-%d")))
+        key = f"{SUMMARY_PENDING_KEY_PREFIX}{user_id_hash}"
+        pipe = client.pipeline(transaction=True)
+        for summary_type, identifier in targets:
+            for granularity, period in periods:
+                pipe.hincrby(key, _field("credits", granularity, summary_type, period, identifier), credits_charged)
+                pipe.hincrby(key, _field("entries", granularity, summary_type, period, identifier), 1)
+        pipe.sadd(SUMMARY_DIRTY_USERS_KEY, user_id_hash)
+        pipe.delete(*summary_cache_keys(user_id_hash, (summary_type for summary_type, _ in targets)))
+        await pipe.execute()
+        return True
+
+    async def pending_deltas(self, user_id_hash: str) -> List[SummaryDelta]:
+        """Deltas of the user not yet persisted (pending plus in-flight)."""
+        client = await self.cache_service.client
+        if not client:
+            return []
+        pipe = client.pipeline(transaction=False)
+        pipe.hgetall(f"{SUMMARY_PENDING_KEY_PREFIX}{user_id_hash}")
+        pipe.hgetall(f"{SUMMARY_INFLIGHT_KEY_PREFIX}{user_id_hash}")
+        merged: Dict[str, int] = {}
+        for fields in await pipe.execute():
+            for field, value in (fields or {}).items():
+                merged[_text(field)] = merged.get(_text(field), 0) + int(value)
+        return _to_deltas(_parse_deltas(merged))
+
+    async def flush(self, directus_service: Any, batch_size: int = SUMMARY_FLUSH_BATCH_SIZE) -> int:
+        """
+        Persist the deltas of up to batch_size dirty users. Returns the number of
+        summary rows written.
+        """
+        client = await self.cache_service.client
+        if not client:
+            return 0
+        user_ids = [_text(u) for u in (await client.spop(SUMMARY_DIRTY_USERS_KEY, batch_size) or [])]
+        claims = _Claims(client)
+        claimed: Dict[str, Dict[Tuple[str, str, str, str], Dict[str, int]]] = {}
+        for user_id_hash in user_ids:
+            token = secrets.token_hex(8)
+            raw = await client.eval(
+                _CLAIM_DELTAS_LUA,
+                4,
+                f"{SUMMARY_PENDING_KEY_PREFIX}{user_id_hash}",
+                f"{SUMMARY_INFLIGHT_KEY_PREFIX}{user_id_hash}",
+                f"{SUMMARY_CLAIM_KEY_PREFIX}{user_id_hash}",
+                SUMMARY_DIRTY_USERS_KEY,
+                SUMMARY_CLAIM_TTL_SECONDS,
+                user_id_hash,
+                token,
+            )
+            if raw is None:
+                continue
+            # Claimed (an empty in-flight hash still gets its claim released below)
+            claims.add(user_id_hash, token)
+            values = iter(raw)
+            claimed[user_id_hash] = _parse_deltas({_text(field): int(value) for field, value in zip(values, values)})
+
+        persisted: Dict[str, Set[str]] = {user_id_hash: set() for user_id_hash in claimed}
+        by_collection: Dict[str, List[Tuple[str, SummaryDelta]]] = {}
+        for user_id_hash, rows in claimed.items():
+            for delta in _to_deltas(rows):
+                by_collection.setdefault(delta.collection, []).append((user_id_hash, delta))
+
+        written = 0
+        for collection, deltas in by_collection.items():
+            for start in range(0, len(deltas), SUMMARY_QUERY_CHUNK_SIZE):
+                chunk = deltas[start:start + SUMMARY_QUERY_CHUNK_SIZE]
+                try:
+                    for user_id_hash, delta in await self._upsert_chunk(directus_service, collection, chunk, claims):
+                        persisted[user_id_hash].add(delta.summary_type)
+                        written += 1
+                except Exception as e:
+                    logger.warning(f"[UsageSummaries] Flush of {len(chunk)} {collection} row(s) failed, retrying next run: {e}")
+
+        for user_id_hash in claimed:
+            if user_id_hash not in claims.tokens:
+                # Claim lost mid-flush: written rows are the new owner's to settle
+                continue
+            await client.eval(
+                _RELEASE_DELTAS_LUA,
+                4,
+                f"{SUMMARY_PENDING_KEY_PREFIX}{user_id_hash}",
+                f"{SUMMARY_INFLIGHT_KEY_PREFIX}{user_id_hash}",
+                f"{SUMMARY_CLAIM_KEY_PREFIX}{user_id_hash}",
+                SUMMARY_DIRTY_USERS_KEY,
+                user_id_hash,
+                claims.tokens[user_id_hash],
+            )
+            if persisted[user_id_hash]:
+                await client.delete(*summary_cache_keys(user_id_hash, persisted[user_id_hash]))
+        if claimed:
+            logger.info(f"[UsageSummaries] Flushed {written} summary row(s) for {len(claimed)} user(s)")
+        return written
+
+    async def _upsert_chunk(
+        self, directus_service: Any, collection: str, chunk: List[Tuple[str, SummaryDelta]], claims: _Claims
+    ) -> List[Tuple[str, SummaryDelta]]:
+        """
+        Add the deltas of one collection to their rows; returns the (user, delta)
+        pairs written. Deltas of users whose claim was lost are skipped, written
+        ones are dropped from the in-flight hash right away.
+        """
+        sample = chunk[0][1]
+        identifier_key, period_field = sample.identifier_key, sample.period_field
+        existing_rows = await directus_service.get_items(
+            collection,
+            params={
+                "filter": {
+                    "user_id_hash": {"_in": sorted({user_id_hash for user_id_hash, _ in chunk})},
+                    identifier_key: {"_in": sorted({delta.identifier for _, delta in chunk})},
+                    period_field: {"_in": sorted({delta.period for _, delta in chunk})},
+                },
+                "fields": f"id,user_id_hash,{identifier_key},{period_field},total_credits,entry_count",
+                "limit": -1,
+            },
+            no_cache=True,
+        )
+        existing = {
+            (row.get("user_id_hash"), row.get(identifier_key), row.get(period_field)): row
+            for row in (existing_rows or [])
+        }
+        now = int(time.time())
+        written: List[Tuple[str, SummaryDelta]] = []
+        new_rows: List[Tuple[str, SummaryDelta]] = []
+        for user_id_hash, delta in chunk:
+            row: Optional[Dict[str, Any]] = existing.get((user_id_hash, delta.identifier, delta.period))
+            if row is None:
+                new_rows.append((user_id_hash, delta))
+                continue
+            if not await claims.held(user_id_hash):
+                continue
+            updated = await directus_service.update_item(
+                collection,
+                row["id"],
+                {
+                    "total_credits": (row.get("total_credits") or 0) + delta.credits,
+                    "entry_count": (row.get("entry_count") or 0) + delta.entries,
+                    "updated_at": now,
+                },
+            )
+            if updated:
+                await claims.drop_persisted(user_id_hash, [delta])
+                written.append((user_id_hash, delta))
+            else:
+                logger.warning(f"[UsageSummaries] Update of {collection} row {row['id']} failed, retrying next run")
+
+        new_rows = [(user_id_hash, delta) for user_id_hash, delta in new_rows if await claims.held(user_id_hash)]
+        if new_rows:
+            payloads = []
+            for user_id_hash, delta in new_rows:
+                payload = {
+                    "user_id_hash": user_id_hash,
+                    identifier_key: delta.identifier,
+                    period_field: delta.period,
+                    "total_credits": delta.credits,
+                    "entry_count": delta.entries,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+                if delta.granularity == MONTHLY:
+                    payload.update({"is_archived": False, "archive_s3_key": None})
+                payloads.append(payload)
+            success, result = await directus_service.create_items(collection, payloads)
+            if success:
+                created: Dict[str, List[SummaryDelta]] = {}
+                for user_id_hash, delta in new_rows:
+                    created.setdefault(user_id_hash, []).append(delta)
+                for user_id_hash, deltas in created.items():
+                    await claims.drop_persisted(user_id_hash, deltas)
+                written.extend(new_rows)
+            else:
+                logger.warning(f"[UsageSummaries] Batch create of {len(payloads)} {collection} row(s) failed: {result}")
+        return written
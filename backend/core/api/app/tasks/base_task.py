@@ -8,6 +8,8 @@ from celery.exceptions import Ignore
 
 # Import necessary services and utilities
 from backend.core.api.app.services.cache import CacheService # Added for CacheService
+from backend.core.api.app.services.cache_pool import close_shared_cache_pools
+from backend.shared.python_utils.http_clients import close_http_clients
 from backend.core.api.app.services.directus import DirectusService
 from backend.core.api.app.utils.encryption import EncryptionService
 from backend.core.api.app.services.s3.service import S3UploadService
@@ -278,7 +280,6 @@ class BaseServiceTask(DedupedTask):
             
         client = await self._cache_service.client
         if client:
-            import json as json_lib
             channel_key = f"websocket:user:{user_id_hash}"
             event_payload = {
                 "event": event,
@@ -286,7 +287,8 @@ class BaseServiceTask(DedupedTask):
                 "event_for_client": event,
                 "payload": payload
             }
-            await client.publish(channel_key, json_lib.dumps(event_payload))
+            # publish_event targets only the API nodes holding this user's connections
+            await self._cache_service.publish_event(channel_key, event_payload)
             logger.info(f"Published WebSocket event '{event}' to user '{user_id_hash[:8]}...'")
             return True
         else:
@@ -432,6 +434,19 @@ class BaseServiceTask(DedupedTask):
                 self._cache_service = None
             except Exception as e:
                 logger.warning(f"Error closing CacheService in task {self.request.id}: {e}")
+
+        # CacheService instances only borrow the loop's shared Dragonfly pool; close the
+        # pool itself (including clients of CacheServices created elsewhere in the task)
+        try:
+            await close_shared_cache_pools()
+        except Exception as e:
+            logger.warning(f"Error closing shared cache pool in task {self.request.id}: {e}")
+
+        # Same for the shared outbound HTTP clients (LLM providers, internal API)
+        try:
+            await close_http_clients()
+        except Exception as e:
+            logger.warning(f"Error closing shared HTTP clients in task {self.request.id}: {e}")
         
         # Also reset encryption service since it may hold a reference to the cache service
         if self._encryption_service is not None:
@@ -155,6 +155,8 @@ TASK_CONFIG = [
     {'name': 'leaderboard', 'module': 'backend.core.api.app.tasks.leaderboard_tasks'},  # Leaderboard aggregation tasks
     {'name': 'reminder',    'module': 'backend.apps.reminder.tasks'},  # Reminder app tasks
     {'name': 'persistence', 'module': 'backend.core.api.app.tasks.storage_billing_tasks'},  # Storage billing tasks (routed to persistence queue)
+    {'name': 'persistence', 'module': 'backend.core.api.app.tasks.credit_ledger_tasks'},  # Credit ledger write-behind flush + reconcile (routed to persistence queue)
+    {'name': 'persistence', 'module': 'backend.core.api.app.tasks.usage_summary_tasks'},  # Usage summary delta flush (routed to persistence queue)
     {'name': 'persistence', 'module': 'backend.core.api.app.tasks.auto_delete_tasks'},  # Auto-delete tasks (routed to persistence queue)
     {'name': 'app_pdf',     'module': 'backend.apps.pdf.tasks'},  # PDF OCR + screenshot + TOC processing tasks
     {'name': 'app_docs',    'module': 'backend.apps.docs.tasks'},  # DOCX artifact + preview generation tasks
@@ -965,6 +967,42 @@ def init_worker_process(*args, **kwargs):
 
     logger.info("Worker process initialized with JSON logging and sensitive data filtering")
 
+
+@signals.worker_init.connect
+def init_thread_pool_worker(sender=None, **kwargs):
+    """
+    Thread-pool workers (--pool=threads, used by app-ai-worker for concurrent
+    streaming) have no child processes, so worker_process_init never fires.
+    Run the same per-process setup here and switch the process to the
+    persistent event loop that all task threads share.
+
+    Time limits are enforced by WorkerEventLoop.run() instead of signals. The
+    hard limit cancels the coroutine and fails the task, but cannot kill a
+    coroutine that ignores cancellation: it keeps its concurrency slot, visible
+    as worker_event_loop_tasks_in_flight staying at the cap. Restart the worker
+    if that happens; prefork workers do not have this limitation.
+    """
+    from celery import concurrency
+    from backend.core.api.app.tasks.worker_event_loop import enable_worker_event_loop
+
+    pool_cls = concurrency.get_implementation(getattr(sender, "pool_cls", None) or "prefork")
+    if not pool_cls.__module__.endswith(".thread"):
+        return
+    init_worker_process()
+    worker_loop = enable_worker_event_loop(sender.concurrency)
+    logger.info(
+        f"Thread-pool worker: {sender.concurrency} task threads sharing one event loop "
+        f"(max_concurrency={worker_loop.max_concurrency})"
+    )
+
+
+@signals.worker_shutdown.connect
+def shutdown_thread_pool_worker(**kwargs):
+    """Close the persistent event loop's shared clients when a thread-pool worker stops."""
+    from backend.core.api.app.tasks.worker_event_loop import shutdown_worker_event_loop
+
+    shutdown_worker_event_loop()
+
 # Dynamically generate task routes from TASK_CONFIG
 # Note: Task names can be explicitly set (e.g., "apps.ai.tasks.skill_ask") which may not match module path patterns
 # So we need both pattern-based routing and explicit task name routing
@@ -1079,6 +1117,13 @@ _EXPLICIT_TASK_ROUTES = {
     # Storage billing tasks
     "app.tasks.storage_billing_tasks.charge_storage_fees": "persistence",
 
+    # Credit ledger tasks
+    "billing.flush_credit_ledger": "persistence",
+    "billing.reconcile_credit_ledger": "persistence",
+
+    # Usage summary aggregation
+    "usage.flush_summary_deltas": "persistence",
+
     # Auto-delete tasks
     "app.tasks.auto_delete_tasks.auto_delete_old_chats": "persistence",
     "app.tasks.auto_delete_tasks.auto_delete_old_issues": "persistence",
@@ -1237,6 +1282,21 @@ app.conf.beat_schedule = {
         'schedule': crontab(hour=2, minute=0, day_of_month=1),  # 1st of month at 2 AM UTC
         'options': {'queue': 'persistence'},  # Route to persistence queue
     },
+    'flush-credit-ledger': {
+        'task': 'billing.flush_credit_ledger',
+        'schedule': timedelta(seconds=10),  # Coalesced Directus writes of charged balances
+        'options': {'queue': 'persistence'},
+    },
+    'reconcile-credit-ledger': {
+        'task': 'billing.reconcile_credit_ledger',
+        'schedule': timedelta(seconds=600),  # Every 10 minutes
+        'options': {'queue': 'persistence'},
+    },
+    'flush-usage-summary-deltas': {
+        'task': 'usage.flush_summary_deltas',
+        'schedule': timedelta(seconds=10),  # Bulk upsert of cached usage summary deltas
+        'options': {'queue': 'persistence'},
+    },
     'flush-server-stats': {
         'task': 'server_stats.flush_to_directus',
         'schedule': timedelta(seconds=600),  # Every 10 minutes
@@ -0,0 +1,56 @@
+"""
+Celery tasks for the credit ledger (core/api/app/services/credit_ledger.py):
+write-behind persistence of cached credit balances to Directus and crash
+recovery for balances whose flush was lost.
+"""
+
+import asyncio
+import logging
+
+from backend.core.api.app.services.credit_ledger import CreditLedger
+from backend.core.api.app.tasks.base_task import BaseServiceTask
+from backend.core.api.app.tasks.celery_config import app
+
+logger = logging.getLogger(__name__)
+
+
+@app.task(name="billing.flush_credit_ledger", base=BaseServiceTask, bind=True)
+def flush_credit_ledger(self):
+    """
+    Periodic task that writes the balances of users charged since the last run to
+    Directus, one encrypted update per user. Runs every 10 seconds.
+    """
+    return asyncio.run(run_flush_credit_ledger(self))
+
+
+async def run_flush_credit_ledger(task: BaseServiceTask) -> int:
+    try:
+        await task.initialize_services()
+        ledger = CreditLedger(task.cache_service)
+        return await ledger.flush_dirty_balances(task.directus_service, task.encryption_service)
+    except Exception as e:
+        logger.error(f"CreditLedgerFlushTask: Flush failed: {e}", exc_info=True)
+        return 0
+    finally:
+        await task.cleanup_services()
+
+
+@app.task(name="billing.reconcile_credit_ledger", base=BaseServiceTask, bind=True)
+def reconcile_credit_ledger(self):
+    """
+    Periodic task that re-queues users whose ledger events never reached Directus
+    (e.g. a worker died mid-flush). Runs every 10 minutes.
+    """
+    return asyncio.run(run_reconcile_credit_ledger(self))
+
+
+async def run_reconcile_credit_ledger(task: BaseServiceTask) -> int:
+    try:
+        await task.initialize_services()
+        requeued = await CreditLedger(task.cache_service).reconcile_ledger()
+        return len(requeued)
+    except Exception as e:
+        logger.error(f"CreditLedgerReconcileTask: Reconcile failed: {e}", exc_info=True)
+        return 0
+    finally:
+        await task.cleanup_services()
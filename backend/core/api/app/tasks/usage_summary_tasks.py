@@ -0,0 +1,34 @@
+"""
+Celery task for the usage summary aggregator
+(core/api/app/services/usage_summary_aggregator.py): bulk upsert of the summary
+deltas accumulated in the cache into the usage_monthly_* / usage_daily_* tables.
+"""
+
+import asyncio
+import logging
+
+from backend.core.api.app.services.usage_summary_aggregator import UsageSummaryAggregator
+from backend.core.api.app.tasks.base_task import BaseServiceTask
+from backend.core.api.app.tasks.celery_config import app
+
+logger = logging.getLogger(__name__)
+
+
+@app.task(name="usage.flush_summary_deltas", base=BaseServiceTask, bind=True)
+def flush_summary_deltas(self):
+    """
+    Periodic task that adds the usage recorded since the last run to the summary
+    rows in Directus. Runs every 10 seconds.
+    """
+    return asyncio.run(run_flush_summary_deltas(self))
+
+
+async def run_flush_summary_deltas(task: BaseServiceTask) -> int:
+    try:
+        await task.initialize_services()
+        return await UsageSummaryAggregator(task.cache_service).flush(task.directus_service)
+    except Exception as e:
+        logger.error(f"UsageSummaryFlushTask: Flush failed: {e}", exc_info=True)
+        return 0
+    finally:
+        await task.cleanup_services()
@@ -0,0 +1,274 @@
+# backend/core/api/app/tasks/worker_event_loop.py
+#
+# Persistent per-process event loop for I/O-bound Celery tasks (AI ask tasks).
+#
+# Under the prefork pool every ask task runs in its own new_event_loop(), so a
+# container streams at most --concurrency responses at a time and each task
+# re-opens its HTTP clients and cache pool. When the worker runs Celery's thread
+# pool (--pool=threads), one event loop per process is started in a daemon
+# thread instead. Task threads hand their coroutines to it with run() and block
+# until they finish, so hundreds of streams share one loop, its HTTP clients and
+# its Dragonfly pool.
+#
+# Ack-late semantics are unchanged: the Celery task function still returns only
+# after its coroutine completed, so the message is acknowledged after the work
+# is done and redelivered if the process dies (task_reject_on_worker_lost).
+#
+# An asyncio.Semaphore caps the coroutines running at once; the cap defaults to
+# the worker's --concurrency and can be set with AI_ASK_ASYNC_MAX_CONCURRENCY.
+#
+# Celery enforces time limits with signals, which the thread pool cannot do, so
+# run() applies them itself:
+# - Soft limit: the task is cancelled. Code that finalizes on Celery's
+#   SoftTimeLimitExceeded (the stream consumer saves the partial answer) calls
+#   consume_soft_time_limit_cancellation() in its `except CancelledError` branch,
+#   which un-cancels the task so the finalization can still await. If nothing
+#   consumes it, SoftTimeLimitExceeded is raised from run().
+# - Hard limit: the task is cancelled again (not consumable) and run() raises
+#   TimeLimitExceeded. A coroutine that swallows cancellation cannot be killed
+#   from another thread: run() stops waiting after HARD_LIMIT_GRACE_SECONDS and
+#   raises anyway, but the coroutine keeps its concurrency slot until it ends.
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+import weakref
+from typing import Any, Awaitable, Dict, Optional, TypeVar
+
+from celery.exceptions import SoftTimeLimitExceeded, TimeLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Extra time run() waits past the hard limit for the cancelled coroutine to unwind
+HARD_LIMIT_GRACE_SECONDS = 5.0
+
+# Tasks cancelled by their soft time limit whose cancellation was not consumed yet
+_soft_limited_tasks: "weakref.WeakSet[asyncio.Task]" = weakref.WeakSet()
+
+
+def consume_soft_time_limit_cancellation() -> bool:
+    """
+    Call from an `except asyncio.CancelledError` handler. Returns True if the
+    cancellation was the soft time limit of WorkerEventLoop.run(); the task is
+    then un-cancelled so the handler can await its finalization, as it would
+    after Celery's SoftTimeLimitExceeded. Returns False for any other
+    cancellation, which the handler must re-raise.
+    """
+    task = asyncio.current_task()
+    if task is None or task not in _soft_limited_tasks:
+        return False
+    _soft_limited_tasks.discard(task)
+    task.uncancel()
+    return True
+
+
+class WorkerEventLoop:
+    """One long-lived event loop in a daemon thread, shared by a worker process's task threads."""
+
+    def __init__(self, max_concurrency: int, name: str = "worker-event-loop"):
+        self.max_concurrency = max(1, max_concurrency)
+        self.name = name
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self.start()
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        """Start the loop thread on first use; returns the running loop."""
+        with self._lock:
+            if self._loop is not None and self._loop.is_running():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def _run_forever() -> None:
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            thread = threading.Thread(target=_run_forever, name=self.name, daemon=True)
+            thread.start()
+            ready.wait()
+            self._loop, self._thread = loop, thread
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            logger.info(f"Started persistent worker event loop (max_concurrency={self.max_concurrency})")
+            return loop
+
+    async def _run_admitted(
+        self,
+        coro: Awaitable[T],
+        soft_time_limit: Optional[float],
+        time_limit: Optional[float],
+        admitted: Optional[threading.Event] = None,
+    ) -> T:
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        except BaseException:
+            coro.close()
+            raise
+        finally:
+            self.waiting -= 1
+        if admitted is not None:
+            admitted.set()
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        hit = {"soft": False, "hard": False}
+
+        def _soft_limit() -> None:
+            hit["soft"] = True
+            _soft_limited_tasks.add(task)
+            task.cancel()
+
+        def _hard_limit() -> None:
+            hit["hard"] = True
+            _soft_limited_tasks.discard(task)
+            task.cancel()
+
+        timers = []
+        if soft_time_limit:
+            timers.append(loop.call_later(soft_time_limit, _soft_limit))
+        if time_limit:
+            timers.append(loop.call_later(time_limit, _hard_limit))
+        try:
+            return await coro
+        except asyncio.CancelledError:
+            if hit["hard"]:
+                raise TimeLimitExceeded(f"Time limit ({time_limit}s) exceeded") from None
+            if hit["soft"] and task in _soft_limited_tasks:
+                raise SoftTimeLimitExceeded(f"Soft time limit ({soft_time_limit}s) exceeded") from None
+            raise
+        finally:
+            for timer in timers:
+                timer.cancel()
+            _soft_limited_tasks.discard(task)
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def run(
+        self,
+        coro: Awaitable[T],
+        soft_time_limit: Optional[float] = None,
+        time_limit: Optional[float] = None,
+    ) -> T:
+        """
+        Run a coroutine on the shared loop from a task thread and return its result.
+        The caller's contextvars are copied into the coroutine. Must not be called
+        from the loop thread itself.
+        """
+        loop = self.start()
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("WorkerEventLoop.run() called from the worker loop thread")
+        admitted = threading.Event()
+        future = asyncio.run_coroutine_threadsafe(
+            self._run_admitted(coro, soft_time_limit, time_limit, admitted), loop
+        )
+        if not time_limit:
+            return future.result()
+        # Waiting for a concurrency slot does not count towards the limits
+        while not admitted.wait(1.0):
+            if future.done():
+                return future.result()
+        try:
+            return future.result(timeout=time_limit + HARD_LIMIT_GRACE_SECONDS)
+        except concurrent.futures.TimeoutError:
+            logger.error(
+                f"Coroutine did not stop within {HARD_LIMIT_GRACE_SECONDS}s of its {time_limit}s time limit; "
+                "it keeps running and holds its concurrency slot until it finishes"
+            )
+            raise TimeLimitExceeded(f"Time limit ({time_limit}s) exceeded") from None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "peak_in_flight": self.peak_in_flight,
+            "completed": self.completed,
+        }
+
+    def stop(self, shutdown: Optional[Awaitable[Any]] = None, timeout: float = 10.0) -> None:
+        """Run an optional shutdown coroutine on the loop, then stop and close it."""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None or not loop.is_running():
+            if shutdown is not None:
+                shutdown.close()
+            return
+        if shutdown is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(shutdown, loop).result(timeout)
+            except Exception as e:
+                logger.warning(f"Error during worker event loop shutdown: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not loop.is_running():
+            loop.close()
+
+
+_worker_loop: Optional[WorkerEventLoop] = None
+
+
+def enable_worker_event_loop(worker_concurrency: int) -> WorkerEventLoop:
+    """Switch this process to the persistent loop (called at startup of a thread-pool worker)."""
+    global _worker_loop
+    if _worker_loop is None:
+        max_concurrency = int(os.getenv("AI_ASK_ASYNC_MAX_CONCURRENCY", "0") or 0) or worker_concurrency
+        _worker_loop = WorkerEventLoop(max_concurrency)
+    return _worker_loop
+
+
+def get_worker_event_loop() -> Optional[WorkerEventLoop]:
+    """The process's persistent loop, or None when tasks run their own loops (prefork)."""
+    return _worker_loop
+
+
+async def _close_loop_resources() -> None:
+    from backend.core.api.app.services.cache_pool import close_shared_cache_pools
+    from backend.shared.python_utils.http_clients import close_http_clients
+
+    await close_http_clients()
+    await close_shared_cache_pools()
+
+
+def shutdown_worker_event_loop() -> None:
+    """Close the loop's shared clients and stop it (worker shutdown)."""
+    global _worker_loop
+    worker_loop, _worker_loop = _worker_loop, None
+    if worker_loop is not None:
+        worker_loop.stop(_close_loop_resources())
+
+
+try:
+    from prometheus_client import Gauge
+
+    _IN_FLIGHT = Gauge(
+        "worker_event_loop_tasks_in_flight",
+        "Coroutines running on the persistent worker event loop",
+    )
+    _IN_FLIGHT.set_function(lambda: _worker_loop.in_flight if _worker_loop else 0)
+    _WAITING = Gauge(
+        "worker_event_loop_tasks_waiting",
+        "Coroutines waiting for a concurrency slot on the persistent worker event loop",
+    )
+    _WAITING.set_function(lambda: _worker_loop.waiting if _worker_loop else 0)
+except ImportError:  # pragma: no cover - prometheus_client is an API dependency
+    pass
@@ -6,7 +6,11 @@ import logging
 import uuid
 import time
 import hmac
-from typing import Tuple, Optional, Dict, Any
+import weakref
+from collections import OrderedDict
+from typing import Tuple, Optional, Dict, Any, List
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +45,179 @@ USER_DATA_ENCRYPTION_KEY = "user_data"
 # Note: All chat and draft encryption now happens client-side
 # Server-side encryption methods removed for zero-knowledge architecture
 
+# Vault HTTP connection pool. One keep-alive client is shared by all
+# EncryptionService instances of a process, per event loop (Celery tasks run
+# each task in a fresh loop, and an httpx client must not cross loops).
+VAULT_HTTP_MAX_CONNECTIONS = int(os.getenv("VAULT_HTTP_MAX_CONNECTIONS", "20"))
+VAULT_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("VAULT_HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+# Concurrent single encrypt/decrypt calls for the same key issued within this
+# window are sent as one transit `batch_input` request. 0 disables micro-batching.
+VAULT_MICRO_BATCH_WINDOW_MS = float(os.getenv("VAULT_MICRO_BATCH_WINDOW_MS", "2"))
+# Upper bound on items per transit batch request
+VAULT_BATCH_MAX_ITEMS = 250
+
+# Envelope encryption for hot server-side fields (encrypt_with_user_key(envelope=True)).
+# Vault wraps a per-user AES-256 data key once (transit datakey endpoint, same derived
+# user key and context as encrypt_with_user_key); fields are then encrypted locally
+# with AES-GCM as
+#   omenv:v1:{vault-wrapped data key}:{base64(nonce || ciphertext || tag)}
+# The wrapped key travels with the value, so any process can decrypt it after one
+# Vault unwrap, and `vault:v1:` values keep decrypting through transit.
+# Off unless ENCRYPTION_ENVELOPE_MODE is set: enable it only once every API and
+# worker node runs a version that can read `omenv:` values.
+ENVELOPE_CIPHERTEXT_PREFIX = "omenv:v1:"
+ENVELOPE_KEY_VERSION = "v1"
+ENVELOPE_ENCRYPTION_ENABLED = os.getenv("ENCRYPTION_ENVELOPE_MODE", "false").lower() in ("1", "true", "yes")
+# How long an unwrapped data key stays in memory, and how many are kept per process
+DATA_KEY_CACHE_TTL_SECONDS = int(os.getenv("ENCRYPTION_DATA_KEY_TTL_SECONDS", "3600"))
+DATA_KEY_CACHE_MAX_ENTRIES = int(os.getenv("ENCRYPTION_DATA_KEY_CACHE_SIZE", "10000"))
+_ENVELOPE_NONCE_BYTES = 12
+
+_vault_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _get_vault_http_client() -> httpx.AsyncClient:
+    """Pooled Vault client for the running event loop (created on first use)."""
+    loop = asyncio.get_running_loop()
+    client = _vault_http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(
+                max_connections=VAULT_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=VAULT_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=30.0,
+            ),
+        )
+        _vault_http_clients[loop] = client
+    return client
+
+
+def is_envelope_ciphertext(value: Any) -> bool:
+    return isinstance(value, str) and value.startswith(ENVELOPE_CIPHERTEXT_PREFIX)
+
+
+class _DataKeyCache:
+    """
+    Bounded, TTL'd LRU of unwrapped data keys, keyed by (vault key id, wrapped key).
+
+    Key bytes live in bytearrays that are overwritten with zeros when an entry
+    expires or is evicted. This is best effort: the short-lived copies handed to
+    the AES-GCM cipher cannot be scrubbed from Python.
+    """
+
+    def __init__(self, max_entries: int = DATA_KEY_CACHE_MAX_ENTRIES, ttl: float = DATA_KEY_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._keys: "OrderedDict[Tuple[str, str], Tuple[bytearray, float]]" = OrderedDict()
+        # vault key id -> wrapped data key used for new encryptions
+        self._current: Dict[str, str] = {}
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key_id: str, wrapped_key: str) -> Optional[bytes]:
+        entry = self._keys.get((key_id, wrapped_key))
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                self._evict((key_id, wrapped_key))
+            self.stats["misses"] += 1
+            return None
+        self._keys.move_to_end((key_id, wrapped_key))
+        self.stats["hits"] += 1
+        return bytes(entry[0])
+
+    def current(self, key_id: str) -> Optional[Tuple[str, bytes]]:
+        wrapped_key = self._current.get(key_id)
+        if wrapped_key is None:
+            return None
+        data_key = self.get(key_id, wrapped_key)
+        return (wrapped_key, data_key) if data_key is not None else None
+
+    def put(self, key_id: str, wrapped_key: str, data_key: bytes, current: bool = False) -> None:
+        entry_key = (key_id, wrapped_key)
+        if entry_key in self._keys:
+            self._evict(entry_key)
+        self._keys[entry_key] = (bytearray(data_key), time.monotonic() + self.ttl)
+        if current:
+            self._current[key_id] = wrapped_key
+        while len(self._keys) > self.max_entries:
+            self._evict(next(iter(self._keys)))
+
+    def clear(self) -> None:
+        for entry_key in list(self._keys):
+            self._evict(entry_key)
+
+    def _evict(self, entry_key: Tuple[str, str]) -> None:
+        entry = self._keys.pop(entry_key, None)
+        if entry is None:
+            return
+        entry[0][:] = bytes(len(entry[0]))
+        self.stats["evictions"] += 1
+        key_id, wrapped_key = entry_key
+        if self._current.get(key_id) == wrapped_key:
+            del self._current[key_id]
+
+
+# Shared by all EncryptionService instances of a process
+_data_key_cache = _DataKeyCache()
+
+
+class _VaultMicroBatcher:
+    """
+    Coalesces concurrent single transit encrypt/decrypt calls into batch requests.
+
+    Calls are grouped per (event loop, operation, key). The first call of a group
+    schedules a flush after the window; every call arriving before it joins the
+    same `batch_input` request. Derived-key contexts are per item, so calls for
+    the same key with different contexts still share a request.
+    """
+
+    def __init__(self, service: "EncryptionService", window_ms: float):
+        self.service = service
+        self.window = max(0.0, window_ms) / 1000.0
+        self._pending: Dict[Tuple[int, str, str], List[Tuple[Dict[str, Any], asyncio.Future]]] = {}
+        self._tasks: set = set()
+        self.stats = {"calls": 0, "requests": 0}
+
+    async def submit(self, operation: str, key_name: str, item: Dict[str, Any]) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        group = (id(loop), operation, key_name)
+        future = loop.create_future()
+        self.stats["calls"] += 1
+
+        batch = self._pending.get(group)
+        if batch is None:
+            batch = self._pending[group] = []
+            self._spawn(self._flush_after_window(group, batch))
+        batch.append((item, future))
+        if len(batch) >= VAULT_BATCH_MAX_ITEMS:
+            del self._pending[group]
+            self._spawn(self._send(operation, key_name, batch))
+        return await future
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush_after_window(self, group: Tuple[int, str, str], batch: list) -> None:
+        await asyncio.sleep(self.window)
+        if self._pending.get(group) is batch:
+            del self._pending[group]
+            await self._send(group[1], group[2], batch)
+
+    async def _send(self, operation: str, key_name: str, batch: list) -> None:
+        self.stats["requests"] += 1
+        try:
+            results = await self.service._transit_batch(operation, key_name, [item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
 class EncryptionService:
     """
     Service for encrypting/decrypting sensitive user data using HashiCorp Vault
@@ -50,6 +227,13 @@ class EncryptionService:
         self.vault_url = os.environ.get("VAULT_URL")
         self.transit_mount = "transit"  # The Vault transit engine mount path
         self.cache = cache_service
+        self._micro_batcher = (
+            _VaultMicroBatcher(self, VAULT_MICRO_BATCH_WINDOW_MS) if VAULT_MICRO_BATCH_WINDOW_MS > 0 else None
+        )
+        self.envelope_enabled = ENVELOPE_ENCRYPTION_ENABLED
+        self.data_key_cache = _data_key_cache
+        # In-flight data key generation/unwrap per key, so concurrent calls share one Vault request
+        self._data_key_requests: Dict[tuple, asyncio.Future] = {}
 
         # Add caching properties
         self._token_valid_until = 0  # Token validation expiry timestamp
@@ -147,8 +331,7 @@ class EncryptionService:
             url = f"{self.vault_url}/v1/auth/token/lookup-self"
             headers = {"X-Vault-Token": self.vault_token}
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(url, headers=headers)
+            response = await _get_vault_http_client().get(url, headers=headers)
             if response.status_code == 200:
                 token_info = response.json().get("data", {})
                 current_token_display = f"{self.vault_token[:4]}...{self.vault_token[-4:]}" if self.vault_token and len(self.vault_token) >= 8 else "****"
@@ -173,8 +356,7 @@ class EncryptionService:
                 # Try again with the new token
                 new_token_display = f"{self.vault_token[:4]}...{self.vault_token[-4:]}" if self.vault_token and len(self.vault_token) >= 8 else "****"
                 headers = {"X-Vault-Token": self.vault_token}
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    response = await client.get(url, headers=headers)
+                response = await _get_vault_http_client().get(url, headers=headers)
                 if response.status_code == 200:
                     token_info = response.json().get("data", {})
                     logger.debug(f"_validate_token: Token from file {new_token_display} is now valid. Policies: {token_info.get('policies', [])}")
@@ -251,12 +433,12 @@ class EncryptionService:
             response = None  # Initialize so except block can safely check it
             
             try:
-                # Make the request using a context manager
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    if method.lower() == "get":
-                        response = await client.get(url, headers=headers)
-                    else:  # POST
-                        response = await client.post(url, headers=headers, json=data)
+                # Reuse the pooled keep-alive client instead of a new connection per call
+                client = _get_vault_http_client()
+                if method.lower() == "get":
+                    response = await client.get(url, headers=headers)
+                else:  # POST
+                    response = await client.post(url, headers=headers, json=data)
                 
                 # Check for common error statuses
                 if response.status_code in (401, 403):
@@ -936,15 +1118,22 @@ class EncryptionService:
             logger.error(f"Error deleting Vault transit key {key_id}: {error_str}", exc_info=True)
             return False
 
-    async def encrypt_with_user_key(self, plaintext: str, key_id: str) -> Tuple[str, str]:
+    async def encrypt_with_user_key(self, plaintext: str, key_id: str, envelope: bool = False) -> Tuple[str, str]:
         """
         Encrypt plaintext using user's specific Vault key
         Returns (ciphertext, key_version)
         
         The key_version is now used as a single version field for all encrypted data
+
+        With envelope=True (and envelope mode enabled) the value is encrypted locally
+        under the user's cached data key. Only use it for fields that are read back
+        through decrypt_with_user_key, not by code calling Vault transit directly.
         """
         if not plaintext or not key_id:
             return "", ""
+
+        if envelope and self.envelope_enabled:
+            return await self._envelope_encrypt(plaintext, key_id), ENVELOPE_KEY_VERSION
             
         # Use a consistent context for this key - the key_id itself works well
         context = base64.b64encode(key_id.encode()).decode("utf-8")
@@ -960,12 +1149,177 @@ class EncryptionService:
         """
         if not ciphertext or not key_id:
             return None
+
+        if is_envelope_ciphertext(ciphertext):
+            try:
+                return await self._envelope_decrypt(ciphertext, key_id)
+            except Exception as e:
+                logger.error(f"Envelope decryption error: {str(e)}")
+                return None
             
         # Use the same context as encryption - must be consistent!
         context = base64.b64encode(key_id.encode()).decode("utf-8")
         
         # Use the user's specific key for decryption with context
         return await self.decrypt(ciphertext, key_name=key_id, context=context)
+
+    async def encrypt_many_with_user_key(
+        self, plaintexts: List[str], key_id: str, envelope: bool = False
+    ) -> List[Tuple[str, str]]:
+        """
+        Encrypt several values with the user's Vault key in one transit batch request
+        (or locally under the user's data key with envelope=True, see encrypt_with_user_key).
+        Returns (ciphertext, key_version) per input, ("", "") for empty inputs.
+        """
+        if not key_id:
+            return [("", "")] * len(plaintexts)
+        if envelope and self.envelope_enabled:
+            return [
+                (await self._envelope_encrypt(plaintext, key_id), ENVELOPE_KEY_VERSION) if plaintext else ("", "")
+                for plaintext in plaintexts
+            ]
+        context = base64.b64encode(key_id.encode()).decode("utf-8")
+        return await self.encrypt_many(plaintexts, key_name=key_id, context=context)
+
+    async def decrypt_many_with_user_key(self, ciphertexts: List[str], key_id: str) -> List[Optional[str]]:
+        """
+        Decrypt several values with the user's Vault key in one transit batch request.
+        Returns the plaintext per input, None where decryption failed.
+        """
+        if not key_id:
+            return [None] * len(ciphertexts)
+        context = base64.b64encode(key_id.encode()).decode("utf-8")
+        envelope_indices = [i for i, ciphertext in enumerate(ciphertexts) if is_envelope_ciphertext(ciphertext)]
+        if not envelope_indices:
+            return await self.decrypt_many(ciphertexts, key_name=key_id, context=context)
+
+        # Transit values go to Vault in one batch; envelope values decrypt locally
+        results = await self.decrypt_many(
+            [None if is_envelope_ciphertext(ciphertext) else ciphertext for ciphertext in ciphertexts],
+            key_name=key_id,
+            context=context,
+        )
+        for i in envelope_indices:
+            try:
+                results[i] = await self._envelope_decrypt(ciphertexts[i], key_id)
+            except Exception as e:
+                logger.error(f"Envelope decryption error for item {i}: {str(e)}")
+        return results
+
+    async def reencrypt_with_user_key(
+        self, ciphertexts: List[str], key_id: str, envelope: bool = True
+    ) -> List[Optional[str]]:
+        """
+        Migrate values between Vault transit (`vault:`) and envelope (`omenv:`) format.
+        Values already in the target format are returned unchanged; values that fail
+        to decrypt come back as None so callers keep the original.
+        Used by scripts/migrate_envelope_encryption.py (and its --rollback mode).
+        """
+        results: List[Optional[str]] = list(ciphertexts)
+        pending = [
+            i for i, ciphertext in enumerate(ciphertexts)
+            if ciphertext and is_envelope_ciphertext(ciphertext) != envelope
+        ]
+        if not pending:
+            return results
+
+        plaintexts = await self.decrypt_many_with_user_key([ciphertexts[i] for i in pending], key_id)
+        if envelope:
+            # Envelope output is independent of the service-wide switch: migration is explicit
+            reencrypted = [
+                await self._envelope_encrypt(plaintext, key_id) if plaintext is not None else None
+                for plaintext in plaintexts
+            ]
+        else:
+            encrypted = await self.encrypt_many_with_user_key(
+                [plaintext or "" for plaintext in plaintexts], key_id
+            )
+            reencrypted = [
+                ciphertext if plaintext is not None else None
+                for plaintext, (ciphertext, _) in zip(plaintexts, encrypted)
+            ]
+        for i, value in zip(pending, reencrypted):
+            results[i] = value
+        return results
+
+    async def _envelope_encrypt(self, plaintext: str, key_id: str) -> str:
+        wrapped_key, data_key = await self._current_data_key(key_id)
+        nonce = os.urandom(_ENVELOPE_NONCE_BYTES)
+        # The vault key id is authenticated data, binding the value to its user
+        sealed = AESGCM(data_key).encrypt(nonce, plaintext.encode("utf-8"), key_id.encode("utf-8"))
+        payload = base64.b64encode(nonce + sealed).decode("utf-8")
+        return f"{ENVELOPE_CIPHERTEXT_PREFIX}{wrapped_key}:{payload}"
+
+    async def _envelope_decrypt(self, ciphertext: str, key_id: str) -> str:
+        wrapped_key, _, payload = ciphertext[len(ENVELOPE_CIPHERTEXT_PREFIX):].rpartition(":")
+        if not wrapped_key.startswith("vault:") or not payload:
+            raise ValueError("Malformed envelope ciphertext")
+        data_key = await self._unwrap_data_key(wrapped_key, key_id)
+        raw = base64.b64decode(payload)
+        plaintext = AESGCM(data_key).decrypt(
+            raw[:_ENVELOPE_NONCE_BYTES], raw[_ENVELOPE_NONCE_BYTES:], key_id.encode("utf-8")
+        )
+        return plaintext.decode("utf-8")
+
+    async def _current_data_key(self, key_id: str) -> Tuple[str, bytes]:
+        """Data key for new envelope values of a user; Vault generates one when none is cached."""
+        current = self.data_key_cache.current(key_id)
+        if current is not None:
+            return current
+
+        async def generate() -> Tuple[str, bytes]:
+            context = base64.b64encode(key_id.encode()).decode("utf-8")
+            result = await self._vault_request(
+                "post", f"{self.transit_mount}/datakey/plaintext/{key_id}", {"context": context, "bits": 256}
+            )
+            data = result.get("data") or {}
+            if not data.get("ciphertext") or not data.get("plaintext"):
+                raise Exception(f"Vault did not return a data key for {key_id}")
+            data_key = base64.b64decode(data["plaintext"])
+            self.data_key_cache.put(key_id, data["ciphertext"], data_key, current=True)
+            return data["ciphertext"], data_key
+
+        return await self._single_flight(("generate", key_id), generate)
+
+    async def _unwrap_data_key(self, wrapped_key: str, key_id: str) -> bytes:
+        data_key = self.data_key_cache.get(key_id, wrapped_key)
+        if data_key is not None:
+            return data_key
+
+        async def unwrap() -> bytes:
+            context = base64.b64encode(key_id.encode()).decode("utf-8")
+            # Plain transit decrypt, so concurrent unwraps for a user share a micro-batch
+            result = await self._transit_single("decrypt", key_id, {"ciphertext": wrapped_key, "context": context})
+            if result.get("error") or not result.get("plaintext"):
+                raise Exception(f"Vault could not unwrap data key: {result.get('error')}")
+            unwrapped = base64.b64decode(result["plaintext"])
+            self.data_key_cache.put(key_id, wrapped_key, unwrapped)
+            return unwrapped
+
+        return await self._single_flight(("unwrap", key_id, wrapped_key), unwrap)
+
+    async def _single_flight(self, request_key: Tuple[str, ...], factory):
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), *request_key)
+        in_flight = self._data_key_requests.get(flight_key)
+        if in_flight is not None:
+            return await asyncio.shield(in_flight)
+        future = loop.create_future()
+        self._data_key_requests[flight_key] = future
+        try:
+            value = await factory()
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an unobserved failure is not reported as "never retrieved"
+            future.exception()
+            raise
+        finally:
+            self._data_key_requests.pop(flight_key, None)
     
     async def encrypt_newsletter_email(self, email: str) -> str:
         """
@@ -1158,8 +1512,6 @@ class EncryptionService:
         # Base64 encode the plaintext
         encoded = base64.b64encode(plaintext.encode()).decode("utf-8")
         
-        # Send to Vault for encryption
-        path = f"{self.transit_mount}/encrypt/{key_name}"
         payload = {"plaintext": encoded}
         
         # Add context for derived keys
@@ -1167,8 +1519,11 @@ class EncryptionService:
             payload["context"] = context
 
         try:
-            result = await self._vault_request("post", path, payload)
-            ciphertext = result["data"]["ciphertext"]
+            # Concurrent calls for the same key share one Vault request (see _VaultMicroBatcher)
+            result = await self._transit_single("encrypt", key_name, payload)
+            if result.get("error"):
+                raise Exception(f"Vault encryption failed: {result['error']}")
+            ciphertext = result["ciphertext"]
             # Extract key version from ciphertext (format is vault:v1:...)
             key_version = ciphertext.split(":")[1] if ":" in ciphertext else "v1"
             
@@ -1193,8 +1548,6 @@ class EncryptionService:
             logger.warning("decrypt: Ciphertext is not a Vault transit value (missing `vault:` prefix).")
             return None
             
-        # Send to Vault for decryption
-        path = f"{self.transit_mount}/decrypt/{key_name}"
         payload = {"ciphertext": ciphertext}
         
         # Add context for derived keys
@@ -1202,13 +1555,125 @@ class EncryptionService:
             payload["context"] = context
         
         try:
-            result = await self._vault_request("post", path, payload)
-            decoded = base64.b64decode(result["data"]["plaintext"]).decode("utf-8")
+            result = await self._transit_single("decrypt", key_name, payload)
+            if result.get("error"):
+                raise Exception(f"Vault decryption failed: {result['error']}")
+            decoded = base64.b64decode(result["plaintext"]).decode("utf-8")
             return decoded
         except Exception as e:
             logger.error(f"Decryption error: {str(e)}")
             return None
 
+    async def encrypt_many(
+        self, plaintexts: List[str], key_name: str = USER_DATA_ENCRYPTION_KEY, context: str = None
+    ) -> List[Tuple[str, str]]:
+        """
+        Encrypt several plaintexts with one transit `batch_input` request.
+        Returns (ciphertext, key_version) per input, ("", "") for empty inputs.
+        Raises if Vault rejects the request or any item.
+        """
+        results: List[Tuple[str, str]] = [("", "")] * len(plaintexts)
+        indices = [i for i, plaintext in enumerate(plaintexts) if plaintext]
+        if not indices:
+            return results
+
+        items = []
+        for i in indices:
+            item = {"plaintext": base64.b64encode(plaintexts[i].encode()).decode("utf-8")}
+            if context:
+                item["context"] = context
+            items.append(item)
+
+        try:
+            batch_results = await self._transit_batch("encrypt", key_name, items)
+            for i, result in zip(indices, batch_results):
+                if result.get("error") or not result.get("ciphertext"):
+                    raise Exception(f"Vault batch encryption failed for item {i}: {result.get('error')}")
+                ciphertext = result["ciphertext"]
+                results[i] = (ciphertext, ciphertext.split(":")[1] if ":" in ciphertext else "v1")
+            return results
+        except Exception as e:
+            logger.error(f"Batch encryption error: {str(e)}")
+            raise
+
+    async def decrypt_many(
+        self, ciphertexts: List[str], key_name: str = USER_DATA_ENCRYPTION_KEY, context: str = None
+    ) -> List[Optional[str]]:
+        """
+        Decrypt several ciphertexts with one transit `batch_input` request.
+        Returns the plaintext per input; None for empty, non-Vault or undecryptable values.
+        """
+        results: List[Optional[str]] = [None] * len(ciphertexts)
+        indices = [
+            i for i, ciphertext in enumerate(ciphertexts)
+            if isinstance(ciphertext, str) and ciphertext.startswith("vault:")
+        ]
+        if not indices:
+            return results
+
+        items = []
+        for i in indices:
+            item = {"ciphertext": ciphertexts[i]}
+            if context:
+                item["context"] = context
+            items.append(item)
+
+        try:
+            batch_results = await self._transit_batch("decrypt", key_name, items)
+        except Exception as e:
+            logger.error(f"Batch decryption error: {str(e)}")
+            return results
+
+        for i, result in zip(indices, batch_results):
+            if result.get("error") or "plaintext" not in result:
+                logger.error(f"Batch decryption error for item {i}: {result.get('error')}")
+                continue
+            try:
+                results[i] = base64.b64decode(result["plaintext"]).decode("utf-8")
+            except Exception as e:
+                logger.error(f"Batch decryption error for item {i}: {str(e)}")
+        return results
+
+    async def _transit_single(self, operation: str, key_name: str, item: Dict[str, Any]) -> Dict[str, Any]:
+        """One transit encrypt/decrypt item, micro-batched with concurrent calls when enabled."""
+        if self._micro_batcher is not None:
+            return await self._micro_batcher.submit(operation, key_name, item)
+        return (await self._transit_batch(operation, key_name, [item]))[0]
+
+    async def _transit_batch(self, operation: str, key_name: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Run transit encrypt/decrypt for a list of items and return Vault's per-item
+        result dicts (ciphertext/plaintext or error), in input order. A single item
+        is sent as a plain request; more items use `batch_input`, chunked to
+        VAULT_BATCH_MAX_ITEMS per request.
+
+        Batches ask Vault for a 200 on partial failure, so one bad item only fails
+        itself (by default Vault answers 400 for the whole request). A response
+        without per-item results (e.g. 404 for a missing key) becomes an error
+        result for every item of that chunk.
+        """
+        path = f"{self.transit_mount}/{operation}/{key_name}"
+        if len(items) == 1:
+            result = await self._vault_request("post", path, items[0])
+            return [result.get("data") or {"error": f"Vault {operation} for {key_name} returned no data"}]
+
+        results: List[Dict[str, Any]] = []
+        for start in range(0, len(items), VAULT_BATCH_MAX_ITEMS):
+            chunk = items[start:start + VAULT_BATCH_MAX_ITEMS]
+            result = await self._vault_request(
+                "post", path, {"batch_input": chunk, "partial_failure_response_code": 200}
+            )
+            batch_results = (result.get("data") or {}).get("batch_results") or []
+            if len(batch_results) != len(chunk):
+                error = (
+                    f"Vault {operation} batch for {key_name} returned {len(batch_results)} results "
+                    f"for {len(chunk)} items"
+                )
+                logger.error(error)
+                batch_results = [{"error": error} for _ in chunk]
+            results.extend(batch_results)
+        return results
+
     # Note: Server-side chat encryption methods removed - chat encryption now happens client-side
     # The following methods are deprecated and should not be used:
     # - create_chat_key()
@@ -1270,14 +1735,16 @@ class EncryptionService:
 
     async def close(self):
         """
-        Placeholder close method to be called during application shutdown.
-        Currently, httpx.AsyncClient is created per request, so no specific
-        client instance needs to be closed here.
+        Close the pooled Vault client of the running event loop. Called during
+        application shutdown; the next Vault call would open a new pool.
         """
         logger.debug("EncryptionService close called.")
-        # If in the future, a persistent AsyncClient is added to this service,
-        # it should be closed here. e.g., if hasattr(self, 'client') and self.client: await self.client.aclose()
-        pass
+        try:
+            client = _vault_http_clients.pop(asyncio.get_running_loop(), None)
+        except RuntimeError:
+            client = None
+        if client is not None and not client.is_closed:
+            await client.aclose()
 
     # Note: All chat and draft encryption methods removed - encryption now happens client-side
     # The following methods are deprecated and should not be used:
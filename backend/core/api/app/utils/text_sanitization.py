@@ -63,8 +63,12 @@ The LLM-based detection handles semantic attacks; this module handles character-
 See: docs/architecture/prompt_injection_protection.md
 """
 
+import hashlib
+import re
+import threading
 import unicodedata
 import logging
+from collections import OrderedDict
 from typing import Tuple, List, Optional, Dict, Any, Set
 
 logger = logging.getLogger(__name__)
@@ -160,6 +164,35 @@ ALL_INVISIBLE_CHARS = (
 )
 
 
+def _codepoint_class(codepoints: Set[int], ranges: List[Tuple[int, int]]) -> str:
+    parts = [f"\\U{code:08x}" for code in sorted(codepoints)]
+    parts.extend(f"\\U{start:08x}-\\U{end:08x}" for start, end in ranges)
+    return "[" + "".join(parts) + "]"
+
+
+# Every code point removed by sanitize_text_for_ascii_smuggling, as one character
+# class: texts are counted and stripped by a C-level scan instead of a Python loop.
+_SMUGGLING_CHARS_RE = re.compile(
+    _codepoint_class(
+        ALL_INVISIBLE_CHARS,
+        [UNICODE_TAGS_RANGE, VARIANT_SELECTORS_STANDARD, VARIANT_SELECTORS_SUPPLEMENT],
+    )
+)
+_UNICODE_TAGS_RE = re.compile(_codepoint_class(set(), [UNICODE_TAGS_RANGE]))
+# Pure ASCII text can only contain control characters; checking its bytes is
+# several times faster than the regex scan.
+_ASCII_CONTROL_BYTES = bytes(sorted(ASCII_CONTROL_CHARS))
+
+# Memoization of sanitize_text_for_ascii_smuggling for long non-ASCII texts: the
+# chat history is re-sanitized on every turn although only the newest messages
+# changed, and hashing a text is several times cheaper than scanning it. Entries
+# are keyed by a digest of the text and only hold the output when it differs from
+# the input, so the cache does not keep the (possibly large) inputs alive.
+SANITIZE_CACHE_MAX_ENTRIES = 4096
+# Shorter texts are cheaper to scan than to hash
+SANITIZE_CACHE_MIN_LENGTH = 512
+
+
 # ==============================================================================
 # HELPER FUNCTIONS
 # ==============================================================================
@@ -193,16 +226,60 @@ def _decode_unicode_tags(text: str) -> Optional[str]:
     
     Returns the decoded hidden text if found, None otherwise.
     """
-    decoded = []
-    for char in text:
-        code = ord(char)
-        if UNICODE_TAGS_RANGE[0] <= code <= UNICODE_TAGS_RANGE[1]:
-            # Extract the ASCII character encoded in the tag
-            ascii_code = code - 0xE0000
-            if 0 <= ascii_code < 128:
-                decoded.append(chr(ascii_code))
-    
-    return ''.join(decoded) if decoded else None
+    # Every tag code point U+E0000-U+E007F maps to an ASCII character
+    decoded = ''.join(chr(ord(char) - 0xE0000) for char in _UNICODE_TAGS_RE.findall(text))
+    return decoded or None
+
+
+def _empty_sanitization_stats() -> Dict[str, Any]:
+    return {
+        "removed_count": 0,
+        "unicode_tags_count": 0,
+        "variant_selectors_count": 0,
+        "zero_width_count": 0,
+        "bidi_control_count": 0,
+        "other_invisible_count": 0,
+        "hidden_ascii_detected": False,
+        "hidden_ascii_content": None
+    }
+
+
+class _SanitizationCache:
+    """Bounded LRU of (sanitized text or None if unchanged, stats) keyed by a digest of the input text."""
+
+    def __init__(self, max_entries: int = SANITIZE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Tuple[Optional[str], Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def get(self, key: bytes) -> Optional[Tuple[Optional[str], Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def put(self, key: bytes, sanitized_text: Optional[str], stats: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (sanitized_text, stats)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_sanitization_cache = _SanitizationCache()
 
 
 # ==============================================================================
@@ -230,6 +307,11 @@ def sanitize_text_for_ascii_smuggling(
     7. Remove ASCII control characters (except common whitespace)
     8. Normalize Unicode to NFC form
     
+    Clean ASCII text returns immediately, other texts are scanned once with a
+    precompiled character class, and results for long non-ASCII texts are
+    memoized by content digest (unchanged history messages are not rescanned;
+    the detection warning is logged the first time only).
+    
     Args:
         text: The input text to sanitize
         log_prefix: Optional prefix for log messages (e.g., task_id, request_id)
@@ -249,28 +331,35 @@ def sanitize_text_for_ascii_smuggling(
           - hidden_ascii_content: The decoded hidden ASCII content (if any)
     """
     if not isinstance(text, str):
-        return str(text) if text else "", {
-            "removed_count": 0,
-            "unicode_tags_count": 0,
-            "variant_selectors_count": 0,
-            "zero_width_count": 0,
-            "bidi_control_count": 0,
-            "other_invisible_count": 0,
-            "hidden_ascii_detected": False,
-            "hidden_ascii_content": None
-        }
+        return str(text) if text else "", _empty_sanitization_stats()
     
     if not text:
-        return "", {
-            "removed_count": 0,
-            "unicode_tags_count": 0,
-            "variant_selectors_count": 0,
-            "zero_width_count": 0,
-            "bidi_control_count": 0,
-            "other_invisible_count": 0,
-            "hidden_ascii_detected": False,
-            "hidden_ascii_content": None
-        }
+        return "", _empty_sanitization_stats()
+
+    # Fast path for pure ASCII text without control characters (always NFC)
+    if text.isascii():
+        data = text.encode('ascii')
+        if len(data.translate(None, _ASCII_CONTROL_BYTES)) == len(data):
+            return text, _empty_sanitization_stats()
+
+    cache_key = _SanitizationCache.key(text) if len(text) >= SANITIZE_CACHE_MIN_LENGTH else None
+    if cache_key is not None:
+        cached = _sanitization_cache.get(cache_key)
+        if cached is not None:
+            stats = dict(cached[1])
+            if not include_stats:
+                stats["hidden_ascii_content"] = None
+            return (text if cached[0] is None else cached[0]), stats
+
+    # Fast path: nothing to remove, only NFC normalization (which returns the
+    # input itself when it is already normalized)
+    if _SMUGGLING_CHARS_RE.search(text) is None:
+        sanitized_text = unicodedata.normalize('NFC', text)
+        if cache_key is not None:
+            _sanitization_cache.put(
+                cache_key, None if sanitized_text == text else sanitized_text, _empty_sanitization_stats()
+            )
+        return sanitized_text, _empty_sanitization_stats()
     
     # Initialize counters
     unicode_tags_count = 0
@@ -291,43 +380,30 @@ def sanitize_text_for_ascii_smuggling(
             f"(length: {len(hidden_ascii)} chars)"
         )
     
-    # Step 2-7: Remove all invisible characters
-    result = []
-    for char in text:
-        code = ord(char)
+    # Step 2-7: Count and remove all invisible characters
+    for match in _SMUGGLING_CHARS_RE.finditer(text):
+        code = ord(match.group())
         
         # Check Unicode Tags block
         if UNICODE_TAGS_RANGE[0] <= code <= UNICODE_TAGS_RANGE[1]:
             unicode_tags_count += 1
-            continue
-        
         # Check Variant Selectors
-        if ((VARIANT_SELECTORS_STANDARD[0] <= code <= VARIANT_SELECTORS_STANDARD[1]) or
-            (VARIANT_SELECTORS_SUPPLEMENT[0] <= code <= VARIANT_SELECTORS_SUPPLEMENT[1])):
+        elif ((VARIANT_SELECTORS_STANDARD[0] <= code <= VARIANT_SELECTORS_STANDARD[1]) or
+              (VARIANT_SELECTORS_SUPPLEMENT[0] <= code <= VARIANT_SELECTORS_SUPPLEMENT[1])):
             variant_selectors_count += 1
-            continue
-        
         # Check Zero-Width characters
-        if code in ZERO_WIDTH_CHARS:
+        elif code in ZERO_WIDTH_CHARS:
             zero_width_count += 1
-            continue
-        
         # Check BiDi control characters
-        if code in BIDI_CONTROL_CHARS:
+        elif code in BIDI_CONTROL_CHARS:
             bidi_control_count += 1
-            continue
-        
-        # Check other invisible characters (includes ASCII control chars)
-        if code in OTHER_INVISIBLE_CHARS or code in ASCII_CONTROL_CHARS or code in ANNOTATION_CHARS:
+        # Other invisible characters (includes ASCII control chars and annotations)
+        else:
             other_invisible_count += 1
-            continue
-        
-        # Character is safe, keep it
-        result.append(char)
     
     # Step 8: Normalize Unicode to NFC form
     # This ensures consistent representation of characters
-    sanitized_text = unicodedata.normalize('NFC', ''.join(result))
+    sanitized_text = unicodedata.normalize('NFC', _SMUGGLING_CHARS_RE.sub('', text))
     
     # Calculate total removed
     total_removed = (
@@ -357,8 +433,13 @@ def sanitize_text_for_ascii_smuggling(
         "bidi_control_count": bidi_control_count,
         "other_invisible_count": other_invisible_count,
         "hidden_ascii_detected": hidden_ascii is not None,
-        "hidden_ascii_content": hidden_ascii if include_stats else None
+        "hidden_ascii_content": hidden_ascii
     }
+    if cache_key is not None:
+        _sanitization_cache.put(cache_key, None if sanitized_text == text else sanitized_text, stats)
+        stats = dict(stats)
+    if not include_stats:
+        stats["hidden_ascii_content"] = None
     
     return sanitized_text, stats
 
@@ -81,6 +81,8 @@ from backend.core.api.app.routers import webhooks as webhooks_router  # noqa: E4
 from backend.core.api.app.routers import internal_tunnel  # noqa: E402 # Ephemeral tunnel management for CI
 from backend.core.api.app.services.directus import DirectusService  # noqa: E402
 from backend.core.api.app.services.cache import CacheService  # noqa: E402
+from backend.core.api.app.services.cache_pool import close_shared_cache_pools  # noqa: E402
+from backend.shared.python_utils.http_clients import close_http_clients  # noqa: E402
 from backend.core.api.app.services.metrics import MetricsService  # noqa: E402
 from backend.core.api.app.services.compliance import ComplianceService  # noqa: E402
 from backend.core.api.app.utils.setup_compliance_logging import setup_compliance_logging  # noqa: E402
@@ -123,7 +125,9 @@ from backend.core.api.app.routes.websockets import (  # noqa: E402
     listen_for_user_updates,
     listen_for_embed_data_events,
     listen_for_preprocessing_streams,  # Real-time preprocessing step events for animated overview
+    start_ws_node_registry,  # Per-node routing of chat stream / embed events
 )
+from backend.core.api.app.routes.ai_stream_snapshot_writer import ai_stream_snapshot_writer  # noqa: E402
 
 # Load environment variables
 # load_dotenv() # Moved to the top before logging setup
@@ -932,6 +936,9 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Failed to initialize: {str(e)}", exc_info=True)
 
+    # Register this node's WebSocket users before the listeners subscribe to their node channels
+    start_ws_node_registry(app)
+
     # Start Redis Pub/Sub listener task
     logger.info("Starting Redis Pub/Sub listener for cache events as a background task...")
     app.state.redis_pubsub_listener_task = asyncio.create_task(listen_for_cache_events(app))
@@ -1098,6 +1105,19 @@ async def lifespan(app: FastAPI):
             await app.state.embed_data_listener_task
         except asyncio.CancelledError:
             logger.info("Redis Pub/Sub listener task for embed data events cancelled")
+
+    if hasattr(app.state, 'ws_node_heartbeat_task'):
+        app.state.ws_node_heartbeat_task.cancel()
+        try:
+            await app.state.ws_node_heartbeat_task
+        except asyncio.CancelledError:
+            logger.info("WS node registry heartbeat task cancelled")
+
+    # Write or delete any AI stream snapshots still pending in the coalescing writer
+    try:
+        await asyncio.wait_for(ai_stream_snapshot_writer.flush(), timeout=2.0)
+    except Exception as e:
+        logger.warning(f"Failed to flush pending AI stream snapshots: {e}")
             
     if hasattr(app.state, 'compliance_backup_task'):
         app.state.compliance_backup_task.cancel()
@@ -1122,6 +1142,12 @@ async def lifespan(app: FastAPI):
     if hasattr(app.state, 'directus_service'):
         await app.state.directus_service.close()
 
+    # Close the shared Dragonfly connection pool used by all CacheService instances
+    await close_shared_cache_pools()
+
+    # Close shared outbound HTTP clients (LLM providers, internal API calls)
+    await close_http_clients()
+
 # Create FastAPI application with lifespan
 def create_app() -> FastAPI:
     app = FastAPI(
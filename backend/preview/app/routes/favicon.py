@@ -84,7 +84,7 @@ async def get_favicon(
     
     # Check cache first (unless refresh requested)
     if not refresh:
-        cached = cache_service.get_favicon(url)
+        cached = await cache_service.get_favicon(url)
         if cached:
             favicon_bytes, content_type = cached
             etag = _generate_etag(favicon_bytes)
@@ -139,7 +139,7 @@ async def get_favicon(
         )
         
         # Cache the processed result
-        cache_service.set_favicon(url, processed_bytes, output_content_type)
+        await cache_service.set_favicon(url, processed_bytes, output_content_type)
         
         # Generate ETag for the new content
         etag = _generate_etag(processed_bytes)
@@ -37,7 +37,7 @@ async def detailed_health_check() -> dict:
     - Configuration summary
     - Uptime information
     """
-    cache_stats = cache_service.get_stats()
+    cache_stats = await cache_service.get_stats()
     
     return {
         "status": "ok",
@@ -62,7 +62,7 @@ async def cache_status() -> dict:
     
     Returns detailed cache information for monitoring dashboards.
     """
-    stats = cache_service.get_stats()
+    stats = await cache_service.get_stats()
     
     # Calculate usage percentages
     for cache_name, cache_stats in stats.items():
@@ -159,9 +159,9 @@ async def get_image(
     
     # Check cache first (unless refresh requested)
     if not refresh:
-        # IMPORTANT: Use _image_cache directly with our custom cache_key
+        # IMPORTANT: Use the by-key lookup with our custom cache_key
         # Don't use cache_service.get_image() as it would double-hash the key
-        cached = cache_service._image_cache.get(cache_key)
+        cached = await cache_service.get_image_by_key(cache_key)
         if cached:
             image_bytes, content_type = cached
             etag = _generate_etag(image_bytes)
@@ -222,10 +222,11 @@ async def get_image(
         
         # Cache the processed result using our custom key
         # We'll store it in the image cache with the custom key
-        cache_service._image_cache.set(
-            cache_key, 
-            (processed_bytes, output_content_type),
-            expire=settings.image_cache_ttl_seconds
+        await cache_service.set_image_by_key(
+            cache_key,
+            processed_bytes,
+            output_content_type,
+            ttl=settings.image_cache_ttl_seconds
         )
         
         # Generate ETag for the new content
@@ -7,41 +7,80 @@ Key features:
 - Separate caches for images, favicons, and metadata
 - Automatic LRU eviction when size limits are reached
 - TTL-based expiration
-- Thread-safe operations
+- Thread-safe operations, run off the event loop by the async CacheService API
+
+Each cache is split into SQLite shards (own connection and lock) so concurrent
+requests rarely contend. Shards keep running size totals, so the size check
+after a write is a sum over the shards instead of a table scan. LRU touches
+from cache hits are buffered and written in batches. Values above
+BLOB_FILE_THRESHOLD_BYTES are stored as files next to the shard database and
+large files are read through mmap.
 """
 
+import asyncio
 import logging
 import hashlib
 import json
+import mmap
 import os
 import sqlite3
 import threading
 import time
+import uuid
+import zlib
 from typing import Optional
 
 from ..config import settings
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_SHARD_COUNT = 8
+# Values larger than this are stored as files instead of SQLite BLOBs
+BLOB_FILE_THRESHOLD_BYTES = 64 * 1024
+# Blob files at least this large are read through mmap
+MMAP_READ_THRESHOLD_BYTES = 1024 * 1024
+# Buffered LRU touches are written when this many are pending or this much time has passed
+TOUCH_FLUSH_MAX_PENDING = 256
+TOUCH_FLUSH_INTERVAL_SECONDS = 5.0
+# Expired entries are swept at most this often per shard (reads drop expired entries directly)
+EXPIRED_SWEEP_INTERVAL_SECONDS = 60.0
 
-class _SqliteCache:
-    """Persistent TTL cache with LRU eviction and no pickle deserialization."""
 
-    def __init__(self, directory: str, size_limit: int):
-        os.makedirs(directory, exist_ok=True)
-        self._size_limit = size_limit
-        self._lock = threading.RLock()
-        self._conn = sqlite3.connect(
-            os.path.join(directory, "cache.sqlite3"),
+def _read_blob_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_READ_THRESHOLD_BYTES:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return mapped[:]
+        return f.read()
+
+
+def _unlink_quietly(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class _CacheShard:
+    """One SQLite database with its blob directory. Callers hold `lock` around every method."""
+
+    def __init__(self, directory: str, index: int):
+        self.blob_dir = os.path.join(directory, f"blobs-{index:02d}")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(
+            os.path.join(directory, f"shard-{index:02d}.sqlite3"),
             check_same_thread=False,
         )
-        self._conn.execute("PRAGMA journal_mode=WAL")
-        self._conn.execute("PRAGMA synchronous=NORMAL")
-        self._conn.execute(
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
             """
             CREATE TABLE IF NOT EXISTS cache_entries (
                 key TEXT PRIMARY KEY,
-                value BLOB NOT NULL,
+                value BLOB,
+                in_file INTEGER NOT NULL DEFAULT 0,
                 content_type TEXT,
                 expires_at REAL NOT NULL,
                 updated_at REAL NOT NULL,
@@ -49,28 +88,165 @@ class _SqliteCache:
             )
             """
         )
-        self._conn.execute(
+        self.conn.execute(
             "CREATE INDEX IF NOT EXISTS idx_cache_entries_updated_at ON cache_entries(updated_at)"
         )
-        self._conn.commit()
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cache_entries_expires_at ON cache_entries(expires_at)"
+        )
+        self.conn.commit()
+        # The only full-table aggregate: running total from here on
+        row = self.conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM cache_entries").fetchone()
+        self.size_bytes = int(row[0])
+        self.pending_touches: dict[str, float] = {}
+        self.last_touch_flush = time.monotonic()
+        self.last_expired_sweep = 0.0
+
+    def blob_path(self, key: str) -> str:
+        return os.path.join(self.blob_dir, key)
+
+    def lookup(self, key: str, now: float) -> Optional[tuple[Optional[bytes], Optional[str], str]]:
+        """Returns (inline value, blob file path, content type), or None on a miss."""
+        row = self.conn.execute(
+            "SELECT value, in_file, content_type, expires_at, size_bytes FROM cache_entries WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, in_file, content_type, expires_at, size_bytes = row
+        if expires_at <= now:
+            self.delete(key, bool(in_file), size_bytes)
+            self.conn.commit()
+            return None
+
+        self.pending_touches[key] = now
+        if (
+            len(self.pending_touches) >= TOUCH_FLUSH_MAX_PENDING
+            or time.monotonic() - self.last_touch_flush >= TOUCH_FLUSH_INTERVAL_SECONDS
+        ):
+            self.flush_touches()
+        content_type = content_type or "application/octet-stream"
+        if in_file:
+            return None, self.blob_path(key), content_type
+        return bytes(value), None, content_type
+
+    def put(self, key: str, data: bytes, staged_file: Optional[str], content_type: str, expires_at: float, now: float) -> None:
+        previous = self.conn.execute(
+            "SELECT in_file, size_bytes FROM cache_entries WHERE key = ?", (key,)
+        ).fetchone()
+        if staged_file is not None:
+            os.replace(staged_file, self.blob_path(key))
+        elif previous is not None and previous[0]:
+            _unlink_quietly(self.blob_path(key))
+        self.conn.execute(
+            """
+            INSERT OR REPLACE INTO cache_entries
+                (key, value, in_file, content_type, expires_at, updated_at, size_bytes)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (key, None if staged_file else data, int(staged_file is not None), content_type, expires_at, now, len(data)),
+        )
+        self.conn.commit()
+        self.pending_touches.pop(key, None)
+        self.size_bytes += len(data) - (previous[1] if previous else 0)
+
+    def delete(self, key: str, in_file: bool, size_bytes: int) -> None:
+        self.conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+        if in_file:
+            _unlink_quietly(self.blob_path(key))
+        self.pending_touches.pop(key, None)
+        self.size_bytes -= size_bytes
+
+    def sweep_expired(self, now: float) -> None:
+        expired = self.conn.execute(
+            "SELECT key, in_file, size_bytes FROM cache_entries WHERE expires_at <= ?", (now,)
+        ).fetchall()
+        for key, in_file, size_bytes in expired:
+            self.delete(key, bool(in_file), size_bytes)
+        self.conn.commit()
+        self.last_expired_sweep = time.monotonic()
+
+    def flush_touches(self) -> None:
+        if self.pending_touches:
+            self.conn.executemany(
+                "UPDATE cache_entries SET updated_at = ? WHERE key = ?",
+                [(touched_at, key) for key, touched_at in self.pending_touches.items()],
+            )
+            self.conn.commit()
+            self.pending_touches.clear()
+        self.last_touch_flush = time.monotonic()
+
+    def oldest(self) -> Optional[tuple[str, float]]:
+        self.flush_touches()
+        row = self.conn.execute(
+            "SELECT key, updated_at FROM cache_entries ORDER BY updated_at ASC LIMIT 1"
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def remove(self, key: str) -> None:
+        row = self.conn.execute(
+            "SELECT in_file, size_bytes FROM cache_entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None:
+            self.delete(key, bool(row[0]), row[1])
+            self.conn.commit()
+
+    def count(self) -> int:
+        return int(self.conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0])
+
+    def clear(self) -> None:
+        self.conn.execute("DELETE FROM cache_entries")
+        self.conn.commit()
+        for name in os.listdir(self.blob_dir):
+            _unlink_quietly(os.path.join(self.blob_dir, name))
+        self.pending_touches.clear()
+        self.size_bytes = 0
+
+    def close(self) -> None:
+        self.flush_touches()
+        self.conn.close()
+
+
+class _SqliteCache:
+    """Persistent TTL cache with LRU eviction and no pickle deserialization."""
+
+    def __init__(self, directory: str, size_limit: int, shard_count: int = DEFAULT_SHARD_COUNT):
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._size_limit = size_limit
+        # Serializes evictions; shard locks are only held for single statements
+        self._evict_lock = threading.Lock()
+        self._remove_legacy_database(directory)
+        self._shards = [_CacheShard(directory, index) for index in range(shard_count)]
+
+    @staticmethod
+    def _remove_legacy_database(directory: str) -> None:
+        # Single-file database of the unsharded cache; its entries are not migrated
+        for suffix in ("", "-wal", "-shm"):
+            legacy_path = os.path.join(directory, f"cache.sqlite3{suffix}")
+            if os.path.exists(legacy_path):
+                logger.info(f"[CacheService] Removing legacy cache database {legacy_path}")
+                _unlink_quietly(legacy_path)
+
+    def _shard(self, key: str) -> _CacheShard:
+        return self._shards[zlib.crc32(key.encode("utf-8")) % len(self._shards)]
 
     def get_binary(self, key: str) -> Optional[tuple[bytes, str]]:
-        with self._lock:
-            row = self._conn.execute(
-                "SELECT value, content_type, expires_at FROM cache_entries WHERE key = ?",
-                (key,),
-            ).fetchone()
-            if row is None:
-                return None
+        shard = self._shard(key)
+        with shard.lock:
+            found = shard.lookup(key, time.time())
+        if found is None:
+            return None
 
-            value, content_type, expires_at = row
-            if expires_at <= time.time():
-                self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
-                self._conn.commit()
+        value, blob_path, content_type = found
+        if blob_path is not None:
+            try:
+                value = _read_blob_file(blob_path)
+            except FileNotFoundError:
+                # Evicted or replaced between the lookup and the read
                 return None
-
-            self._touch(key)
-            return bytes(value), content_type or "application/octet-stream"
+        return value, content_type
 
     def set_binary(self, key: str, data: bytes, content_type: str, ttl: int) -> None:
         self._set(key, data, content_type, ttl)
@@ -91,69 +267,72 @@ class _SqliteCache:
         )
 
     def volume(self) -> int:
-        with self._lock:
-            self._delete_expired()
-            row = self._conn.execute(
-                "SELECT COALESCE(SUM(size_bytes), 0) FROM cache_entries"
-            ).fetchone()
-            return int(row[0] if row else 0)
+        self._sweep_expired(force=True)
+        return self._total_size()
 
     def count(self) -> int:
-        with self._lock:
-            self._delete_expired()
-            row = self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()
-            return int(row[0] if row else 0)
+        self._sweep_expired(force=True)
+        total = 0
+        for shard in self._shards:
+            with shard.lock:
+                total += shard.count()
+        return total
 
     def clear(self) -> None:
-        with self._lock:
-            self._conn.execute("DELETE FROM cache_entries")
-            self._conn.commit()
+        for shard in self._shards:
+            with shard.lock:
+                shard.clear()
 
     def close(self) -> None:
-        with self._lock:
-            self._conn.close()
+        for shard in self._shards:
+            with shard.lock:
+                shard.close()
+
+    def _total_size(self) -> int:
+        return sum(shard.size_bytes for shard in self._shards)
 
     def _set(self, key: str, data: bytes, content_type: str, ttl: int) -> None:
         now = time.time()
-        with self._lock:
-            self._conn.execute(
-                """
-                INSERT OR REPLACE INTO cache_entries
-                    (key, value, content_type, expires_at, updated_at, size_bytes)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (key, data, content_type, now + ttl, now, len(data)),
-            )
+        shard = self._shard(key)
+        staged_file = None
+        if len(data) > BLOB_FILE_THRESHOLD_BYTES:
+            # Written outside the shard lock, then moved into place atomically
+            staged_file = os.path.join(shard.blob_dir, f".{key}.{uuid.uuid4().hex}.tmp")
+            with open(staged_file, "wb") as f:
+                f.write(data)
+        try:
+            with shard.lock:
+                shard.put(key, data, staged_file, content_type, now + ttl, now)
+        except Exception:
+            if staged_file is not None:
+                _unlink_quietly(staged_file)
+            raise
+        self._sweep_expired()
+        if self._total_size() > self._size_limit:
             self._evict_if_needed()
-            self._conn.commit()
 
-    def _touch(self, key: str) -> None:
-        self._conn.execute(
-            "UPDATE cache_entries SET updated_at = ? WHERE key = ?",
-            (time.time(), key),
-        )
-        self._conn.commit()
-
-    def _delete_expired(self) -> None:
-        self._conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
-        self._conn.commit()
+    def _sweep_expired(self, force: bool = False) -> None:
+        now = time.time()
+        for shard in self._shards:
+            if force or time.monotonic() - shard.last_expired_sweep >= EXPIRED_SWEEP_INTERVAL_SECONDS:
+                with shard.lock:
+                    shard.sweep_expired(now)
 
     def _evict_if_needed(self) -> None:
-        self._delete_expired()
-        while True:
-            row = self._conn.execute(
-                "SELECT COALESCE(SUM(size_bytes), 0) FROM cache_entries"
-            ).fetchone()
-            total_size = int(row[0] if row else 0)
-            if total_size <= self._size_limit:
-                return
-
-            oldest = self._conn.execute(
-                "SELECT key FROM cache_entries ORDER BY updated_at ASC LIMIT 1"
-            ).fetchone()
-            if oldest is None:
-                return
-            self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (oldest[0],))
+        with self._evict_lock:
+            while self._total_size() > self._size_limit:
+                candidates = []
+                for shard in self._shards:
+                    with shard.lock:
+                        oldest = shard.oldest()
+                    if oldest is not None:
+                        candidates.append((oldest[1], oldest[0], shard))
+                if not candidates:
+                    return
+                # The entry may have been touched since; approximate LRU is fine for a cache
+                _updated_at, key, shard = min(candidates, key=lambda candidate: candidate[0])
+                with shard.lock:
+                    shard.remove(key)
 
 
 class CacheService:
@@ -210,7 +389,7 @@ class CacheService:
     # Image Cache Operations
     # ===========================================
     
-    def get_image(self, url: str) -> Optional[tuple[bytes, str]]:
+    async def get_image(self, url: str) -> Optional[tuple[bytes, str]]:
         """
         Get cached image data.
         
@@ -220,19 +399,28 @@ class CacheService:
         Returns:
             Tuple of (image_bytes, content_type) or None if not cached
         """
-        key = self._generate_key(url)
+        cached = await self.get_image_by_key(self._generate_key(url))
+        if cached:
+            logger.debug(f"[CacheService] Image cache HIT for {url[:50]}...")
+            return cached
+        logger.debug(f"[CacheService] Image cache MISS for {url[:50]}...")
+        return None
+
+    async def get_image_by_key(self, cache_key: str) -> Optional[tuple[bytes, str]]:
+        """
+        Get cached image data by a precomputed cache key (e.g. the image route's
+        key that includes the processing parameters).
+        
+        Returns:
+            Tuple of (image_bytes, content_type) or None if not cached
+        """
         try:
-            cached = self._image_cache.get_binary(key)
-            if cached:
-                logger.debug(f"[CacheService] Image cache HIT for {url[:50]}...")
-                return cached
-            logger.debug(f"[CacheService] Image cache MISS for {url[:50]}...")
-            return None
+            return await asyncio.to_thread(self._image_cache.get_binary, cache_key)
         except Exception as e:
             logger.error(f"[CacheService] Error reading image cache: {e}")
             return None
     
-    def set_image(
+    async def set_image(
         self,
         url: str,
         data: bytes,
@@ -251,15 +439,28 @@ class CacheService:
         Returns:
             True if cached successfully, False otherwise
         """
-        key = self._generate_key(url)
+        cached = await self.set_image_by_key(self._generate_key(url), data, content_type, ttl)
+        if cached:
+            logger.debug(f"[CacheService] Cached image ({len(data)} bytes) for {url[:50]}...")
+        return cached
+
+    async def set_image_by_key(
+        self,
+        cache_key: str,
+        data: bytes,
+        content_type: str,
+        ttl: Optional[int] = None
+    ) -> bool:
+        """
+        Cache image data under a precomputed cache key.
+        
+        Returns:
+            True if cached successfully, False otherwise
+        """
         ttl = ttl or settings.image_cache_ttl_seconds
         
         try:
-            self._image_cache.set_binary(key, data, content_type, ttl)
-            logger.debug(
-                f"[CacheService] Cached image ({len(data)} bytes) for {url[:50]}... "
-                f"TTL: {ttl}s"
-            )
+            await asyncio.to_thread(self._image_cache.set_binary, cache_key, data, content_type, ttl)
             return True
         except Exception as e:
             logger.error(f"[CacheService] Error caching image: {e}")
@@ -269,7 +470,7 @@ class CacheService:
     # Favicon Cache Operations
     # ===========================================
     
-    def get_favicon(self, url: str) -> Optional[tuple[bytes, str]]:
+    async def get_favicon(self, url: str) -> Optional[tuple[bytes, str]]:
         """
         Get cached favicon data.
         
@@ -281,7 +482,7 @@ class CacheService:
         """
         key = self._generate_key(url)
         try:
-            cached = self._favicon_cache.get_binary(key)
+            cached = await asyncio.to_thread(self._favicon_cache.get_binary, key)
             if cached:
                 logger.debug(f"[CacheService] Favicon cache HIT for {url[:50]}...")
                 return cached
@@ -291,7 +492,7 @@ class CacheService:
             logger.error(f"[CacheService] Error reading favicon cache: {e}")
             return None
     
-    def set_favicon(
+    async def set_favicon(
         self,
         url: str,
         data: bytes,
@@ -314,7 +515,7 @@ class CacheService:
         ttl = ttl or settings.favicon_cache_ttl_seconds
         
         try:
-            self._favicon_cache.set_binary(key, data, content_type, ttl)
+            await asyncio.to_thread(self._favicon_cache.set_binary, key, data, content_type, ttl)
             logger.debug(
                 f"[CacheService] Cached favicon ({len(data)} bytes) for {url[:50]}... "
                 f"TTL: {ttl}s"
@@ -328,7 +529,7 @@ class CacheService:
     # Metadata Cache Operations
     # ===========================================
     
-    def get_metadata(self, url: str) -> Optional[dict]:
+    async def get_metadata(self, url: str) -> Optional[dict]:
         """
         Get cached metadata.
         
@@ -340,7 +541,7 @@ class CacheService:
         """
         key = self._generate_key(url)
         try:
-            cached = self._metadata_cache.get_json(key)
+            cached = await asyncio.to_thread(self._metadata_cache.get_json, key)
             if cached:
                 logger.debug(f"[CacheService] Metadata cache HIT for {url[:50]}...")
                 return cached
@@ -350,7 +551,7 @@ class CacheService:
             logger.error(f"[CacheService] Error reading metadata cache: {e}")
             return None
     
-    def set_metadata(
+    async def set_metadata(
         self,
         url: str,
         metadata: dict,
@@ -371,7 +572,7 @@ class CacheService:
         ttl = ttl or settings.metadata_cache_ttl_seconds
         
         try:
-            self._metadata_cache.set_json(key, metadata, ttl)
+            await asyncio.to_thread(self._metadata_cache.set_json, key, metadata, ttl)
             logger.debug(
                 f"[CacheService] Cached metadata for {url[:50]}... TTL: {ttl}s"
             )
@@ -384,13 +585,16 @@ class CacheService:
     # Cache Statistics
     # ===========================================
     
-    def get_stats(self) -> dict:
+    async def get_stats(self) -> dict:
         """
         Get cache statistics for monitoring.
         
         Returns:
             Dictionary with cache statistics
         """
+        return await asyncio.to_thread(self._collect_stats)
+
+    def _collect_stats(self) -> dict:
         return {
             "images": {
                 "size_bytes": self._image_cache.volume(),
@@ -409,12 +613,11 @@ class CacheService:
             }
         }
     
-    def clear_all(self) -> None:
+    async def clear_all(self) -> None:
         """Clear all caches. Use with caution!"""
         logger.warning("[CacheService] Clearing all caches!")
-        self._image_cache.clear()
-        self._favicon_cache.clear()
-        self._metadata_cache.clear()
+        for cache in (self._image_cache, self._favicon_cache, self._metadata_cache):
+            await asyncio.to_thread(cache.clear)
     
     def close(self) -> None:
         """Close all cache connections."""
@@ -74,7 +74,7 @@ class MetadataService:
         # Check cache first
         # Cached metadata is already sanitized (sanitization happens before caching)
         if use_cache:
-            cached = cache_service.get_metadata(normalized_url)
+            cached = await cache_service.get_metadata(normalized_url)
             if cached:
                 logger.info(f"{log_prefix}CACHE_HIT")
                 return cached
@@ -108,7 +108,7 @@ class MetadataService:
         )
         
         # Cache the sanitized result
-        cache_service.set_metadata(normalized_url, metadata)
+        await cache_service.set_metadata(normalized_url, metadata)
         
         logger.info(
             f"{log_prefix}Extracted, sanitized, and cached: "
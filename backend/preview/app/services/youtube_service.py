@@ -266,7 +266,7 @@ class YouTubeService:
         # Cached metadata is already sanitized (sanitization happens before caching)
         if use_cache:
             # Reuse metadata cache with youtube: prefix
-            cached = cache_service.get_metadata(cache_key)
+            cached = await cache_service.get_metadata(cache_key)
             if cached:
                 logger.info(f"{log_prefix}CACHE_HIT")
                 return cached
@@ -362,7 +362,7 @@ class YouTubeService:
             )
             
             # Cache the sanitized result
-            cache_service.set_metadata(
+            await cache_service.set_metadata(
                 cache_key,
                 metadata,
                 ttl=settings.youtube_cache_ttl_seconds
@@ -476,7 +476,7 @@ class YouTubeService:
         # Check cache first
         # Cached metadata is already sanitized (sanitization happens before caching)
         if use_cache:
-            cached = cache_service.get_metadata(cache_key)
+            cached = await cache_service.get_metadata(cache_key)
             if cached:
                 logger.info(f"{log_prefix}CACHE_HIT")
                 return cached
@@ -546,7 +546,7 @@ class YouTubeService:
             )
             
             # Cache the sanitized result (same TTL as video metadata)
-            cache_service.set_metadata(
+            await cache_service.set_metadata(
                 cache_key,
                 channel_metadata,
                 ttl=settings.youtube_cache_ttl_seconds
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Migrate server-side encrypted hot fields between Vault transit and envelope format.
+
+Fields written with encrypt_with_user_key(envelope=True) are stored as
+`omenv:v1:...` once ENCRYPTION_ENVELOPE_MODE is enabled; older rows keep their
+`vault:v1:...` values, which still decrypt. This script rewrites existing rows
+so reads no longer need Vault, or (--rollback) converts envelope values back to
+transit before envelope mode is switched off again.
+
+Collections and fields:
+  usage      encrypted_* credit, token, model and provider fields   (user_id_hash)
+  reminders  encrypted_user_id, encrypted_*_chat_id                 (hashed_user_id)
+
+Architecture: backend/core/api/app/utils/encryption.py (envelope mode)
+Tests: N/A — migration, re-runnable (values already in the target format are skipped)
+
+Usage:
+    docker exec api python /app/backend/scripts/migrate_envelope_encryption.py --user-id <uuid>
+    docker exec api python /app/backend/scripts/migrate_envelope_encryption.py --all --write --confirm
+    docker exec api python /app/backend/scripts/migrate_envelope_encryption.py --all --rollback --write --confirm
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Any
+
+from backend.core.api.app.services.cache import CacheService
+from backend.core.api.app.services.directus.directus import DirectusService
+from backend.core.api.app.utils.encryption import EncryptionService, is_envelope_ciphertext
+
+
+logging.basicConfig(level=logging.ERROR, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+# collection -> (user hash field, encrypted fields)
+MIGRATED_FIELDS: dict[str, tuple[str, tuple[str, ...]]] = {
+    "usage": (
+        "user_id_hash",
+        (
+            "encrypted_credits_costs_total",
+            "encrypted_model_used",
+            "encrypted_credits_costs_system_prompt",
+            "encrypted_credits_costs_history",
+            "encrypted_credits_costs_response",
+            "encrypted_server_provider",
+            "encrypted_server_region",
+            "encrypted_code_run_filenames",
+            "encrypted_code_run_duration_seconds",
+            "encrypted_input_tokens",
+            "encrypted_output_tokens",
+            "encrypted_user_input_tokens",
+            "encrypted_system_prompt_tokens",
+        ),
+    ),
+    "reminders": (
+        "hashed_user_id",
+        ("encrypted_user_id", "encrypted_target_chat_id", "encrypted_created_in_chat_id"),
+    ),
+}
+PAGE_SIZE = 200
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Migrate hot encrypted fields to/from envelope encryption.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--user-id", help="Migrate a single user")
+    target.add_argument("--all", action="store_true", help="Migrate every user with a Vault key")
+    parser.add_argument("--collection", choices=sorted(MIGRATED_FIELDS), action="append", help="Limit to collection(s)")
+    parser.add_argument("--rollback", action="store_true", help="Convert envelope values back to Vault transit")
+    parser.add_argument("--write", action="store_true", help="Actually update Directus rows. Default is dry-run.")
+    parser.add_argument("--confirm", action="store_true", help="Required with --write")
+    return parser.parse_args()
+
+
+async def _users(directus: DirectusService, user_id: str | None) -> list[dict[str, Any]]:
+    params: dict[str, Any] = {"fields": "id,vault_key_id", "filter": {"vault_key_id": {"_nnull": True}}}
+    if user_id:
+        params["filter"]["id"] = {"_eq": user_id}
+        return await directus.get_items("directus_users", params=params, admin_required=True) or []
+
+    users: list[dict[str, Any]] = []
+    offset = 0
+    while True:
+        page = await directus.get_items(
+            "directus_users",
+            params={**params, "limit": PAGE_SIZE, "offset": offset, "sort": ["id"]},
+            admin_required=True,
+        ) or []
+        users.extend(page)
+        if len(page) < PAGE_SIZE:
+            return users
+        offset += PAGE_SIZE
+
+
+async def _migrate_user(
+    directus: DirectusService,
+    encryption: EncryptionService,
+    *,
+    user: dict[str, Any],
+    collections: list[str],
+    envelope: bool,
+    write: bool,
+    stats: dict[str, int],
+) -> None:
+    user_id_hash = hashlib.sha256(user["id"].encode()).hexdigest()
+    vault_key_id = user["vault_key_id"]
+
+    for collection in collections:
+        hash_field, fields = MIGRATED_FIELDS[collection]
+        offset = 0
+        while True:
+            rows = await directus.get_items(
+                collection,
+                params={
+                    "fields": ",".join(("id", *fields)),
+                    "filter": {hash_field: {"_eq": user_id_hash}},
+                    "limit": PAGE_SIZE,
+                    "offset": offset,
+                    "sort": ["id"],
+                },
+                admin_required=True,
+            ) or []
+            for row in rows:
+                stale = [
+                    field for field in fields
+                    if row.get(field) and is_envelope_ciphertext(row[field]) != envelope
+                ]
+                if not stale:
+                    continue
+                stats["rows_to_migrate"] += 1
+                if not write:
+                    continue
+                reencrypted = await encryption.reencrypt_with_user_key(
+                    [row[field] for field in stale], vault_key_id, envelope=envelope
+                )
+                update = {field: value for field, value in zip(stale, reencrypted) if value}
+                stats["fields_failed"] += len(stale) - len(update)
+                if update and await directus.update_item(collection, row["id"], update, admin_required=True):
+                    stats["rows_migrated"] += 1
+            if len(rows) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+
+
+async def _run(args: argparse.Namespace) -> dict[str, Any]:
+    if args.write and not args.confirm:
+        raise SystemExit("--write requires --confirm")
+
+    cache = CacheService()
+    encryption = EncryptionService(cache)
+    await encryption.initialize()
+    directus = DirectusService(cache_service=cache, encryption_service=encryption)
+
+    stats: dict[str, Any] = {
+        "dry_run": not args.write,
+        "target_format": "vault" if args.rollback else "envelope",
+        "users": 0,
+        "rows_to_migrate": 0,
+        "rows_migrated": 0,
+        "fields_failed": 0,
+    }
+    try:
+        users = await _users(directus, args.user_id)
+        for user in users:
+            stats["users"] += 1
+            await _migrate_user(
+                directus,
+                encryption,
+                user=user,
+                collections=args.collection or sorted(MIGRATED_FIELDS),
+                envelope=not args.rollback,
+                write=args.write,
+                stats=stats,
+            )
+    finally:
+        await directus.close()
+        await encryption.close()
+    return stats
+
+
+def main() -> None:
+    stats = asyncio.run(_run(_parse_args()))
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,7 @@ import math
 import os
 from typing import Dict, Any, Optional
 
-import httpx
+from backend.shared.python_utils.http_clients import INTERNAL_API_UPSTREAM, get_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -51,13 +51,13 @@ async def ensure_credit_headroom(
         headers["X-Internal-Service-Token"] = INTERNAL_API_SHARED_TOKEN
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"{INTERNAL_API_BASE_URL}/internal/billing/balance",
-                params={"user_id": user_id},
-                headers=headers,
-            )
-            response.raise_for_status()
+        client = get_http_client(INTERNAL_API_UPSTREAM)
+        response = await client.get(
+            f"{INTERNAL_API_BASE_URL}/internal/billing/balance",
+            params={"user_id": user_id},
+            headers=headers,
+        )
+        response.raise_for_status()
         balance = response.json()
     except Exception as exc:
         logger.warning("%s Could not precheck %s credits; proceeding: %s", log_prefix, operation_name, exc)
@@ -0,0 +1,201 @@
+# backend/shared/python_utils/http_clients.py
+# Shared, long-lived httpx.AsyncClient instances keyed by upstream.
+#
+# Most outbound calls used to open `async with httpx.AsyncClient()` per request,
+# paying DNS + TCP (+ TLS) for every LLM call, billing charge or internal API
+# request. get_http_client(upstream) hands out one pooled keep-alive client per
+# upstream and event loop instead. Clients are loop-bound because httpx
+# connections belong to the loop that opened them (Celery runs each task in its
+# own asyncio.run loop); clients of loops that have since closed are dropped the
+# next time a client is created.
+#
+# Each upstream has its own pool limits, keep-alive expiry, default timeout and
+# optional HTTP/2. Modules declare their upstream once with register_http_upstream();
+# requests may still pass a per-call `timeout=`. Never close a shared client —
+# call close_http_clients() before the event loop ends instead.
+
+import asyncio
+import logging
+import os
+import weakref
+from dataclasses import dataclass, replace
+from typing import Any, Dict
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+
+    _HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - h2 is in the API image; HTTP/2 is optional
+    _HTTP2_AVAILABLE = False
+
+INTERNAL_API_UPSTREAM = "internal_api"
+
+
+@dataclass(frozen=True)
+class HttpUpstreamConfig:
+    """Connection settings of one upstream's shared client."""
+
+    timeout: float = 30.0
+    connect_timeout: float = 5.0
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = False
+
+
+_upstreams: Dict[str, HttpUpstreamConfig] = {
+    # Internal API (api:8000) — plain HTTP inside the cluster; many small calls
+    INTERNAL_API_UPSTREAM: HttpUpstreamConfig(
+        timeout=10.0,
+        max_connections=int(os.getenv("INTERNAL_API_HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=50,
+        keepalive_expiry=60.0,
+    ),
+}
+_DEFAULT_UPSTREAM = HttpUpstreamConfig()
+
+# event loop -> {upstream: client}
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+# upstream -> requests sent through the shared clients (all loops)
+_request_counts: Dict[str, int] = {}
+
+
+def register_http_upstream(name: str, **settings: Any) -> HttpUpstreamConfig:
+    """
+    Declare (or update) the connection settings of an upstream. Takes effect for
+    clients created afterwards, i.e. call it at import time of the owning module.
+    """
+    config = replace(_upstreams.get(name, _DEFAULT_UPSTREAM), **settings)
+    _upstreams[name] = config
+    return config
+
+
+def _discard_closed_loops() -> None:
+    # A finished loop's clients hold transports that reference it, so the weak key
+    # alone never lets them go; dropping the entry breaks the cycle.
+    for loop in [loop for loop in list(_clients.keys()) if loop.is_closed()]:
+        _clients.pop(loop, None)
+
+
+def _build_client(upstream: str) -> httpx.AsyncClient:
+    config = _upstreams.get(upstream, _DEFAULT_UPSTREAM)
+
+    async def _count_request(_request: httpx.Request) -> None:
+        _request_counts[upstream] = _request_counts.get(upstream, 0) + 1
+
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(config.timeout, connect=config.connect_timeout),
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry,
+        ),
+        http2=config.http2 and _HTTP2_AVAILABLE,
+        event_hooks={"request": [_count_request]},
+    )
+
+
+def get_http_client(upstream: str) -> httpx.AsyncClient:
+    """Return the current event loop's shared client for an upstream, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    clients = _clients.get(loop)
+    if clients is None:
+        _discard_closed_loops()
+        clients = _clients[loop] = {}
+    client = clients.get(upstream)
+    if client is None or client.is_closed:
+        client = clients[upstream] = _build_client(upstream)
+        logger.debug(f"Created shared HTTP client for upstream '{upstream}'")
+    return client
+
+
+def _pool_stats(client: httpx.AsyncClient) -> Dict[str, int]:
+    pool = getattr(client._transport, "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return {
+        "connections": len(connections),
+        "idle": idle,
+        "active": len(connections) - idle,
+        "queued_requests": len(getattr(pool, "_requests", [])),
+    }
+
+
+def http_client_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-upstream pool usage summed over all live event loops, plus request totals."""
+    try:
+        clients = [(upstream, client) for per_loop in list(_clients.values()) for upstream, client in per_loop.items()]
+    except RuntimeError:  # registry changed during a scrape from another thread
+        clients = []
+    stats: Dict[str, Dict[str, Any]] = {}
+    for upstream in {upstream for upstream, _ in clients} | set(_request_counts):
+        stats[upstream] = {
+            "clients": 0,
+            "connections": 0,
+            "idle": 0,
+            "active": 0,
+            "queued_requests": 0,
+            "requests": _request_counts.get(upstream, 0),
+            "max_connections": _upstreams.get(upstream, _DEFAULT_UPSTREAM).max_connections,
+        }
+    for upstream, client in clients:
+        if client.is_closed:
+            continue
+        stats[upstream]["clients"] += 1
+        for key, value in _pool_stats(client).items():
+            stats[upstream][key] += value
+    return stats
+
+
+async def close_http_clients() -> None:
+    """Close the current event loop's shared clients (API shutdown, end of a Celery task)."""
+    try:
+        clients = _clients.pop(asyncio.get_running_loop(), None)
+    except RuntimeError:
+        return
+    for upstream, client in (clients or {}).items():
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing shared HTTP client for upstream '{upstream}': {e}")
+
+
+try:
+    from prometheus_client import REGISTRY
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+    class _HttpClientPoolCollector:
+        def collect(self):
+            connections = GaugeMetricFamily(
+                "http_client_pool_connections",
+                "Connections held by shared outbound HTTP clients",
+                labels=["upstream", "state"],
+            )
+            queued = GaugeMetricFamily(
+                "http_client_pool_queued_requests",
+                "Requests waiting for or using a pooled outbound connection",
+                labels=["upstream"],
+            )
+            requests = CounterMetricFamily(
+                "http_client_requests",
+                "Requests sent through shared outbound HTTP clients",
+                labels=["upstream"],
+            )
+            for upstream, entry in http_client_stats().items():
+                connections.add_metric([upstream, "active"], entry["active"])
+                connections.add_metric([upstream, "idle"], entry["idle"])
+                queued.add_metric([upstream], entry["queued_requests"])
+                requests.add_metric([upstream], entry["requests"])
+            yield connections
+            yield queued
+            yield requests
+
+    REGISTRY.register(_HttpClientPoolCollector())
+except ImportError:  # pragma: no cover - prometheus_client is an API dependency
+    pass
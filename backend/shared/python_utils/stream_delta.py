@@ -0,0 +1,316 @@
+# backend/shared/python_utils/stream_delta.py
+#
+# Delta wire encoding for `ai_message_chunk` stream payloads.
+#
+# Historically every chunk carried `full_content_so_far`, so a long answer pushed
+# O(n^2) bytes through Dragonfly pub/sub, JSON encode/decode and every WebSocket.
+# In delta mode the publisher only sends the appended text plus offsets:
+#
+#   content_delta     text appended since the previous frame
+#   content_offset    UTF-16 length of the content before the delta
+#   content_length    UTF-16 length of the content after the delta
+#   content_checksum  CRC32 (hex) of the UTF-8 full content; sent periodically
+#
+# Offsets are counted in UTF-16 code units so the browser can compare them with
+# `string.length` directly. Frames that are not pure appends (post-stream
+# corrections, final chunks) and "keyframes" emitted whenever the content has
+# doubled in size since the previous keyframe still carry `full_content_so_far`.
+# Keyframes let a consumer that missed a frame resynchronise without a round trip
+# while keeping the total bytes on the wire linear in the response length.
+# Keyframes are also forced after MAX_KEYFRAME_INTERVAL_SECONDS, so an API node
+# that starts receiving a stream midway (user reconnected to another node, node
+# routing changed) is never stuck waiting minutes for the next doubling.
+#
+# The publisher side lives in apps/ai/tasks/stream_consumer.py, the decoder is
+# used by the WebSocket stream listener (routes/websockets.py) to rebuild the
+# full content for snapshots and legacy "full" clients, and mirrored in the web
+# app (frontend/packages/ui/src/services/aiStreamDeltaDecoder.ts).
+
+import logging
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STREAM_WIRE_MODE_FULL = "full"
+STREAM_WIRE_MODE_DELTA = "delta"
+SUPPORTED_STREAM_WIRE_MODES = (STREAM_WIRE_MODE_FULL, STREAM_WIRE_MODE_DELTA)
+
+# Marker placed on delta frames so consumers never mistake them for full frames.
+STREAM_ENCODING_DELTA = "delta"
+
+# Send a checksum every N delta frames (and on every keyframe).
+CHECKSUM_INTERVAL_FRAMES = 16
+
+# A keyframe is only forced once the content is at least this large and has
+# doubled since the last keyframe (geometric spacing keeps total bytes <= 2n).
+MIN_KEYFRAME_LENGTH = 4096
+
+# Upper bound on the time between keyframes, independent of the content size.
+MAX_KEYFRAME_INTERVAL_SECONDS = 5.0
+
+# Characters of the content end the decoder keeps at hand, so consumers can scan
+# new text for markers spanning a delta boundary without joining the content.
+DECODER_TAIL_CHARS = 64
+
+DELTA_FIELDS = (
+    "stream_encoding",
+    "content_delta",
+    "content_offset",
+    "content_length",
+    "content_checksum",
+)
+
+
+def utf16_length(text: str) -> int:
+    """Length of `text` in UTF-16 code units (what JavaScript's `.length` reports)."""
+    # Characters outside the BMP are two code units in UTF-16. Counting them is
+    # cheaper than encoding when the text is ASCII/BMP-only (the common case).
+    if text.isascii():
+        return len(text)
+    return len(text) + sum(1 for ch in text if ord(ch) > 0xFFFF)
+
+
+def content_checksum(crc: int) -> str:
+    """Format a running CRC32 value as the 8-char hex string used on the wire."""
+    return f"{crc & 0xFFFFFFFF:08x}"
+
+
+def is_delta_frame(payload: Dict[str, Any]) -> bool:
+    return payload.get("stream_encoding") == STREAM_ENCODING_DELTA
+
+
+def normalize_stream_wire_mode(mode: Any) -> str:
+    """Map a client-requested mode to a supported one (unknown values fall back to full)."""
+    if isinstance(mode, str) and mode.lower() in SUPPORTED_STREAM_WIRE_MODES:
+        return mode.lower()
+    return STREAM_WIRE_MODE_FULL
+
+
+class StreamDeltaEncoder:
+    """
+    Publisher-side encoder. One instance per streamed AI message.
+
+    `encode()` is called with the payload produced by `_create_redis_payload` and
+    the full content it was built from, and rewrites the payload in place into a
+    delta frame whenever the new content is a pure append of what was published
+    last. Anything else is sent as a (full) keyframe and resets the state.
+
+    Publishers that know what they appended call `append()` with just the new
+    text instead: the full content is then only joined for keyframes, so
+    framing a chunk does not cost O(length of the response).
+    """
+
+    def __init__(
+        self,
+        checksum_interval: int = CHECKSUM_INTERVAL_FRAMES,
+        min_keyframe_length: int = MIN_KEYFRAME_LENGTH,
+        max_keyframe_interval: float = MAX_KEYFRAME_INTERVAL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.checksum_interval = max(1, checksum_interval)
+        self.min_keyframe_length = min_keyframe_length
+        self.max_keyframe_interval = max_keyframe_interval
+        self._clock = clock
+        self._keyframe_at = 0.0
+        # Published content as parts, joined only when a keyframe or encode() needs it
+        self._parts: Optional[List[str]] = None
+        self._length = 0
+        self._crc = 0
+        self._keyframe_length = 0
+        self._frames_since_checksum = 0
+        # Counters for logging/benchmarks
+        self.full_bytes_sent = 0
+        self.delta_bytes_sent = 0
+
+    def _published(self) -> Optional[str]:
+        if self._parts is None:
+            return None
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0]
+
+    def _keyframe(self, payload: Dict[str, Any], content: str) -> Dict[str, Any]:
+        self._parts = [content]
+        self._length = utf16_length(content)
+        self._crc = zlib.crc32(content.encode("utf-8"))
+        self._keyframe_length = self._length
+        self._keyframe_at = self._clock()
+        self._frames_since_checksum = 0
+        payload["full_content_so_far"] = content
+        payload["content_length"] = self._length
+        payload["content_checksum"] = content_checksum(self._crc)
+        self.full_bytes_sent += len(content)
+        return payload
+
+    def _keyframe_due(self, new_length: int) -> bool:
+        if new_length >= self.min_keyframe_length and new_length >= 2 * self._keyframe_length:
+            return True
+        return self._clock() - self._keyframe_at >= self.max_keyframe_interval
+
+    def _delta_frame(self, payload: Dict[str, Any], delta: str, new_length: int) -> Dict[str, Any]:
+        offset = self._length
+        self._crc = zlib.crc32(delta.encode("utf-8"), self._crc)
+        self._parts.append(delta)
+        self._length = new_length
+        self._frames_since_checksum += 1
+
+        payload.pop("full_content_so_far", None)
+        payload["stream_encoding"] = STREAM_ENCODING_DELTA
+        payload["content_delta"] = delta
+        payload["content_offset"] = offset
+        payload["content_length"] = new_length
+        if self._frames_since_checksum >= self.checksum_interval:
+            payload["content_checksum"] = content_checksum(self._crc)
+            self._frames_since_checksum = 0
+        self.delta_bytes_sent += len(delta)
+        return payload
+
+    def encode(self, payload: Dict[str, Any], content: str) -> Dict[str, Any]:
+        previous = self._published()
+        if (
+            previous is None
+            or payload.get("is_final_chunk")
+            or len(content) < len(previous)
+            or not content.startswith(previous)
+        ):
+            return self._keyframe(payload, content)
+
+        delta = content[len(previous):]
+        new_length = self._length + utf16_length(delta)
+        if self._keyframe_due(new_length):
+            return self._keyframe(payload, content)
+        return self._delta_frame(payload, delta, new_length)
+
+    def append(self, payload: Dict[str, Any], delta: str) -> Dict[str, Any]:
+        """Frame `delta`, the text appended since the previous frame (see the class docstring)."""
+        if self._parts is None or payload.get("is_final_chunk"):
+            return self._keyframe(payload, (self._published() or "") + delta)
+        new_length = self._length + utf16_length(delta)
+        if self._keyframe_due(new_length):
+            return self._keyframe(payload, self._published() + delta)
+        return self._delta_frame(payload, delta, new_length)
+
+
+class StreamDeltaDecoder:
+    """
+    Consumer-side decoder. One instance per streamed AI message.
+
+    `apply()` returns True when the frame was applied and the decoder is in sync,
+    False when it is out of sync (missed frame, length or checksum mismatch). It
+    stays out of sync until the next full frame (keyframe, final chunk or
+    snapshot) arrives. The full text is only joined when `content` is read, so
+    consumers that just forward delta frames never pay for it. Reading `content`
+    after every frame is O(n) per frame; per-frame consumers should use `tail`
+    and `deferred_content()` instead.
+    """
+
+    def __init__(self) -> None:
+        self._parts: List[str] = []
+        self._length = 0
+        self._tail = ""
+        # Running CRC32 of the content. Computed lazily after a full frame because
+        # legacy publishers send full frames only and never need it.
+        self._crc: Optional[int] = None
+        self.in_sync = False
+        self.last_sequence: Optional[int] = None
+
+    def _reset(self, content: str) -> None:
+        self._parts = [content]
+        self._length = utf16_length(content)
+        self._tail = content[-DECODER_TAIL_CHARS:]
+        self._crc = None
+        self.in_sync = True
+
+    @property
+    def length(self) -> int:
+        return self._length
+
+    @property
+    def content(self) -> Optional[str]:
+        if not self.in_sync:
+            return None
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+    @property
+    def tail(self) -> str:
+        """The last DECODER_TAIL_CHARS characters of the content (no join)."""
+        return self._tail
+
+    def deferred_content(self) -> Optional[Callable[[], str]]:
+        """
+        Return a callable that yields the content as of now, joined on first call.
+
+        Later frames only append to the part list or replace it, so the captured
+        prefix stays valid. Returns None while out of sync.
+        """
+        if not self.in_sync:
+            return None
+        parts, count = self._parts, len(self._parts)
+        joined: List[str] = []
+
+        def materialize() -> str:
+            if not joined:
+                joined.append("".join(parts[:count]))
+            return joined[0]
+
+        return materialize
+
+    def apply(self, payload: Dict[str, Any]) -> bool:
+        self.last_sequence = payload.get("sequence", self.last_sequence)
+
+        if not is_delta_frame(payload):
+            full_content = payload.get("full_content_so_far")
+            if not isinstance(full_content, str):
+                self.in_sync = False
+                return False
+            self._reset(full_content)
+            return True
+
+        if not self.in_sync:
+            return False
+
+        delta = payload.get("content_delta") or ""
+        offset = payload.get("content_offset")
+        new_length = payload.get("content_length")
+        if not isinstance(offset, int) or offset > self._length:
+            logger.debug(f"Stream delta gap: expected offset {self._length}, got {offset}")
+            self.in_sync = False
+            return False
+        if offset < self._length:
+            if isinstance(new_length, int) and new_length <= self._length:
+                # Duplicate of a frame we already applied (e.g. snapshot replay race).
+                return True
+            # Partially overlapping frames never come from a single publisher.
+            self.in_sync = False
+            return False
+
+        if self._crc is not None:
+            self._crc = zlib.crc32(delta.encode("utf-8"), self._crc)
+        self._parts.append(delta)
+        self._length += utf16_length(delta)
+        self._tail = (self._tail + delta)[-DECODER_TAIL_CHARS:]
+
+        if isinstance(new_length, int) and new_length != self._length:
+            logger.debug(f"Stream delta length mismatch: expected {new_length}, have {self._length}")
+            self.in_sync = False
+            return False
+        expected_checksum = payload.get("content_checksum")
+        if expected_checksum:
+            if self._crc is None:
+                self._crc = zlib.crc32((self.content or "").encode("utf-8"))
+            if expected_checksum != content_checksum(self._crc):
+                logger.debug("Stream delta checksum mismatch, waiting for resync")
+                self.in_sync = False
+                return False
+        return True
+
+
+def to_full_payload(payload: Dict[str, Any], full_content: str) -> Dict[str, Any]:
+    """Return a copy of a (delta) frame rewritten as a legacy full-content frame."""
+    full_payload = {k: v for k, v in payload.items() if k not in DELTA_FIELDS}
+    full_payload["full_content_so_far"] = full_content
+    return full_payload
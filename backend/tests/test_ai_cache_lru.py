@@ -0,0 +1,233 @@
+# backend/tests/test_ai_cache_lru.py
+#
+# Tests for the scripted AI cache LRU maintenance in ChatCacheMixin
+# (core/api/app/services/cache_chat_mixin.py): touching a chat is one EVAL,
+# evicted chats drop their AI messages, embed index and the embeds no other chat
+# refers to, without reading other chats' indexes. The fake client runs Python
+# ports of the Lua scripts and records the commands it receives; the last test
+# runs the real scripts on fakeredis.
+
+import asyncio
+
+import fakeredis
+
+from backend.core.api.app.services import cache_chat_mixin
+from backend.core.api.app.services.cache_base import CacheServiceBase
+from backend.core.api.app.services.cache_chat_mixin import ChatCacheMixin
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.store = {}
+        self.lists = {}
+        self.sets = {}
+        self.zsets = {}
+        self.calls = []
+
+    def _call(self, name, *args):
+        self.calls.append((name, args))
+
+    async def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+
+    async def ltrim(self, key, start, end):
+        self.lists[key] = self.lists.get(key, [])[start:end + 1]
+
+    async def expire(self, key, ttl):
+        pass
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value
+
+    async def smembers(self, key):
+        self._call("smembers", key)
+        return {member.encode() for member in self.sets.get(key, set())}
+
+    async def delete(self, *keys):
+        for key in keys:
+            for container in (self.store, self.lists, self.sets, self.zsets):
+                container.pop(key, None)
+        return len(keys)
+
+    def _release(self, embed_id):
+        """Release one reference; True once the embed is unreferenced (and deleted)."""
+        refs_key = f"embed:{embed_id}:refs"
+        if refs_key not in self.store:
+            return False
+        self.store[refs_key] = int(self.store[refs_key]) - 1
+        if self.store[refs_key] > 0:
+            return False
+        self.store.pop(refs_key)
+        self.store.pop(f"embed:{embed_id}", None)
+        return True
+
+    async def eval(self, script, numkeys, *args):
+        self._call("eval", script)
+        keys, argv = args[:numkeys], args[numkeys:]
+        if script is cache_chat_mixin._INDEX_CHAT_EMBED_LUA:
+            index_key, refs_key = keys
+            members = self.sets.setdefault(index_key, set())
+            if argv[0] in members:
+                return 0
+            members.add(argv[0])
+            self.store[refs_key] = int(self.store.get(refs_key, 0)) + 1
+            return 1
+        if script is cache_chat_mixin._UNINDEX_CHAT_EMBED_LUA:
+            index_key, refs_key = keys
+            if argv[0] not in self.sets.get(index_key, set()):
+                return 0
+            self.sets[index_key].discard(argv[0])
+            if refs_key in self.store:
+                self.store[refs_key] = int(self.store[refs_key]) - 1
+                if self.store[refs_key] <= 0:
+                    self.store.pop(refs_key)
+            return 1
+        if script is cache_chat_mixin._DETACH_CHAT_EMBED_INDEX_LUA:
+            return [member.encode() for member in self.sets.pop(keys[0], set())]
+        if script is cache_chat_mixin._RELEASE_EMBED_REFS_LUA:
+            deleted = 0
+            for refs_key, embed_key in zip(keys[::2], keys[1::2]):
+                assert refs_key == f"{embed_key}:refs"
+                embed_cached = embed_key in self.store
+                if self._release(embed_key.split(":", 1)[1]) and embed_cached:
+                    deleted += 1
+            return deleted
+
+        assert script is cache_chat_mixin._TRACK_AI_CACHE_ACTIVITY_LUA
+        (lru_key,) = keys
+        chat_id, now, _ttl, max_chats = argv
+        lru = self.zsets.setdefault(lru_key, {})
+        lru[chat_id] = now
+        evicted = sorted(lru, key=lru.get)[:max(len(lru) - max_chats, 0)]
+        for old_chat_id in evicted:
+            del lru[old_chat_id]
+        return [old_chat_id.encode() for old_chat_id in evicted]
+
+
+class _FakeCache(CacheServiceBase, ChatCacheMixin):
+    CHAT_MESSAGES_TTL = 259200
+    TOP_N_MESSAGES_COUNT = 2
+
+    def __init__(self):
+        self.redis = _FakeRedis()
+
+    @property
+    async def client(self):
+        return self.redis
+
+
+def test_eviction_drops_only_unreferenced_embeds_in_one_call():
+    cache = _FakeCache()
+    redis = cache.redis
+
+    async def scenario():
+        await cache.set_embed_in_cache("shared", {"embed_id": "shared"}, "chat-1")
+        await cache.add_embed_id_to_chat_index("chat-2", "shared")
+        await cache.set_embed_in_cache("own", {"embed_id": "own"}, "chat-1")
+        # Indexing the same embed twice must not count a second reference
+        await cache.add_embed_id_to_chat_index("chat-1", "own")
+        for chat_id in ("chat-1", "chat-2", "chat-3"):
+            await cache.add_ai_message_to_history("user-1", chat_id, f"message in {chat_id}")
+
+    redis.calls.clear()
+    asyncio.run(scenario())
+
+    assert "user:user-1:chat:chat-1:messages:ai" not in redis.lists
+    assert "user:user-1:chat:chat-2:messages:ai" in redis.lists
+    assert "embed:own" not in redis.store and "embed:own:refs" not in redis.store
+    assert "embed:shared" in redis.store and redis.store["embed:shared:refs"] == 1
+    assert "chat:chat-1:embed_ids" not in redis.sets
+    assert set(redis.zsets["user:user-1:ai_cache_lru"]) == {"chat-2", "chat-3"}
+    # Eviction never reads other chats' embed indexes from the client side
+    assert not [call for call in redis.calls if call[0] == "smembers"]
+    tracking = [call for call in redis.calls if call[1] == (cache_chat_mixin._TRACK_AI_CACHE_ACTIVITY_LUA,)]
+    assert len(tracking) == 3
+
+
+def test_removing_and_deleting_chat_embeds_releases_references():
+    cache = _FakeCache()
+    redis = cache.redis
+
+    async def scenario():
+        for chat_id in ("chat-1", "chat-2"):
+            await cache.add_embed_id_to_chat_index(chat_id, "shared")
+        await cache.remove_embed_from_chat_cache("chat-1", "other")
+        refs_after_noop = redis.store["embed:shared:refs"]
+        await cache.remove_embed_from_chat_cache("chat-1", "shared")
+        refs_after_remove = redis.store["embed:shared:refs"]
+        await cache.delete_chat_embed_cache("chat-2")
+        return refs_after_noop, refs_after_remove
+
+    assert asyncio.run(scenario()) == (2, 1)
+    assert "embed:shared:refs" not in redis.store
+    assert "chat:chat-2:embed_ids" not in redis.sets
+
+
+def test_chat_delete_keeps_embeds_shared_with_other_chats():
+    cache = _FakeCache()
+    redis = cache.redis
+
+    async def scenario():
+        await cache.set_embed_in_cache("shared", {"embed_id": "shared"}, "chat-1")
+        await cache.add_embed_id_to_chat_index("chat-2", "shared")
+        await cache.set_embed_in_cache("own", {"embed_id": "own"}, "chat-1")
+        return await cache.delete_chat_embed_cache("chat-1")
+
+    assert asyncio.run(scenario()) == 1
+    assert "embed:own" not in redis.store and "embed:own:refs" not in redis.store
+    assert "embed:shared" in redis.store and redis.store["embed:shared:refs"] == 1
+    assert "chat:chat-1:embed_ids" not in redis.sets
+
+
+def test_embeds_without_reference_count_are_left_to_their_ttl():
+    cache = _FakeCache()
+    redis = cache.redis
+    # Indexed before reference counts existed: no embed:{id}:refs key
+    for chat_id in ("chat-1", "chat-2"):
+        redis.sets[f"chat:{chat_id}:embed_ids"] = {"legacy"}
+    redis.store["embed:legacy"] = b"{}"
+
+    async def scenario():
+        for chat_id in ("chat-1", "chat-2", "chat-3"):
+            await cache.add_ai_message_to_history("user-1", chat_id, f"message in {chat_id}")
+        return await cache.delete_chat_embed_cache("chat-2")
+
+    assert asyncio.run(scenario()) == 0
+    assert "embed:legacy" in redis.store
+    assert not any(key.endswith(":refs") for key in redis.store)
+
+
+def test_scripts_only_touch_declared_keys():
+    # Undeclared-key scripts take a global lock on Dragonfly
+    scripts = [
+        cache_chat_mixin._INDEX_CHAT_EMBED_LUA,
+        cache_chat_mixin._UNINDEX_CHAT_EMBED_LUA,
+        cache_chat_mixin._DETACH_CHAT_EMBED_INDEX_LUA,
+        cache_chat_mixin._RELEASE_EMBED_REFS_LUA,
+        cache_chat_mixin._TRACK_AI_CACHE_ACTIVITY_LUA,
+    ]
+    assert not [script for script in scripts if "allow-undeclared-keys" in script]
+
+    class _RealScriptCache(_FakeCache):
+        def __init__(self):
+            self.redis = fakeredis.FakeAsyncRedis()
+
+    cache = _RealScriptCache()
+
+    async def scenario():
+        await cache.set_embed_in_cache("shared", {"embed_id": "shared"}, "chat-1")
+        await cache.add_embed_id_to_chat_index("chat-2", "shared")
+        await cache.set_embed_in_cache("own", {"embed_id": "own"}, "chat-1")
+        for chat_id in ("chat-1", "chat-2", "chat-2", "chat-3"):
+            await cache.add_ai_message_to_history("user-1", chat_id, f"message in {chat_id}")
+        client = cache.redis
+        return (
+            await client.exists("user:user-1:chat:chat-1:messages:ai", "embed:own", "embed:own:refs"),
+            await client.exists("chat:chat-1:embed_ids"),
+            await client.get("embed:shared:refs"),
+            await client.zrange("user:user-1:ai_cache_lru", 0, -1),
+            await cache.delete_chat_embed_cache("chat-2"),
+            await client.exists("embed:shared", "embed:shared:refs", "chat:chat-2:embed_ids"),
+        )
+
+    assert asyncio.run(scenario()) == (0, 0, b"1", [b"chat-2", b"chat-3"], 1, 0)
@@ -0,0 +1,184 @@
+# backend/tests/test_ai_stream_snapshot_writer.py
+#
+# Tests for the coalescing AI stream snapshot writer
+# (core/api/app/routes/ai_stream_snapshot_writer.py). A burst of chunks must
+# cost at most one snapshot write per flush interval, final chunks must delete
+# the snapshot, and only the node owning a message may write its snapshot.
+
+import asyncio
+
+from backend.core.api.app.routes.ai_stream_snapshot_writer import AIStreamSnapshotWriter
+from backend.core.api.app.routes.handlers.websocket_handlers.active_chat_handler import (
+    ai_stream_snapshot_cache_key,
+)
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return False
+        self.values[key] = value
+        return True
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def expire(self, key, ttl):
+        return key in self.values
+
+
+class _FakeCacheService:
+    def __init__(self, redis=None):
+        self._client = redis or _FakeRedis()
+        self.snapshots = {}
+        self.set_calls = []
+        self.delete_calls = []
+
+    @property
+    async def client(self):
+        return self._client
+
+    async def set(self, key, value, ttl=None):
+        self.set_calls.append((key, value))
+        self.snapshots[key] = value
+
+    async def get(self, key):
+        return self.snapshots.get(key)
+
+    async def delete(self, key):
+        self.delete_calls.append(key)
+        self.snapshots.pop(key, None)
+
+
+def _frame(seq, message_id="m-1", **extra):
+    return {"type": "ai_message_chunk", "chat_id": "chat-1", "message_id": message_id, "sequence": seq, **extra}
+
+
+def test_burst_of_chunks_is_coalesced_to_latest_payload():
+    async def scenario():
+        cache = _FakeCacheService()
+        writer = AIStreamSnapshotWriter(flush_interval_ms=50)
+        writer.configure(cache, node_id="node-a")
+        writer.submit("chat-1", _frame(1))
+        await asyncio.sleep(0)
+        for seq in range(2, 101):
+            writer.submit("chat-1", _frame(seq))
+        await writer.flush()
+        return cache, writer
+
+    cache, writer = asyncio.run(scenario())
+    # Leading-edge write of the first frame, then one write with the latest frame
+    assert [value["sequence"] for _, value in cache.set_calls] == [1, 100]
+    assert writer.stats["updates"] == 100
+    assert writer.writes_saved == 98
+    assert writer.get_pending("chat-1") is None
+
+
+def test_final_chunk_drops_pending_write_and_deletes_snapshot():
+    async def scenario():
+        cache = _FakeCacheService()
+        writer = AIStreamSnapshotWriter(flush_interval_ms=1000)
+        writer.configure(cache, node_id="node-a")
+        writer.submit("chat-1", _frame(1))
+        await asyncio.sleep(0)
+        writer.submit("chat-1", _frame(2))
+        assert writer.get_pending("chat-1")["sequence"] == 2
+        writer.submit_final("chat-1", "m-1")
+        assert writer.get_pending("chat-1") is None
+        await asyncio.wait_for(writer.flush(), timeout=0.5)
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert [value["sequence"] for _, value in cache.set_calls] == [1]
+    assert cache.delete_calls == [ai_stream_snapshot_cache_key("chat-1")]
+    assert cache.snapshots == {}
+
+
+def test_deferred_payloads_are_only_built_when_written():
+    built = []
+
+    def deferred(seq):
+        def build():
+            built.append(seq)
+            return _frame(seq)
+        return build
+
+    async def scenario():
+        cache = _FakeCacheService()
+        writer = AIStreamSnapshotWriter(flush_interval_ms=50)
+        writer.configure(cache, node_id="node-a")
+        writer.submit("chat-1", deferred(1), frame=_frame(1))
+        await asyncio.sleep(0)
+        for seq in range(2, 51):
+            writer.submit("chat-1", deferred(seq), frame=_frame(seq))
+        await writer.flush()
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert built == [1, 50]
+    assert [value["sequence"] for _, value in cache.set_calls] == [1, 50]
+
+
+def test_interrupted_frame_is_written_without_waiting_for_interval():
+    async def scenario():
+        cache = _FakeCacheService()
+        writer = AIStreamSnapshotWriter(flush_interval_ms=10_000)
+        writer.configure(cache)
+        writer.submit("chat-1", _frame(1))
+        await asyncio.sleep(0)
+        writer.submit("chat-1", _frame(2, interrupted_by_revocation=True))
+        await asyncio.sleep(0.05)
+        writer.submit("chat-1", _frame(3, interrupted_by_soft_limit=True))
+        await asyncio.sleep(0.05)
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert [value["sequence"] for _, value in cache.set_calls] == [1, 2, 3]
+
+
+def test_only_owner_node_writes_snapshot_but_any_node_deletes_it():
+    async def scenario():
+        redis = _FakeRedis()
+        shared_snapshots = {}
+        cache_a, cache_b = _FakeCacheService(redis), _FakeCacheService(redis)
+        cache_a.snapshots = cache_b.snapshots = shared_snapshots
+        writer_a = AIStreamSnapshotWriter(flush_interval_ms=0)
+        writer_b = AIStreamSnapshotWriter(flush_interval_ms=0)
+        writer_a.configure(cache_a, node_id="node-a")
+        writer_b.configure(cache_b, node_id="node-b")
+
+        writer_a.submit("chat-1", _frame(1))
+        await writer_a.flush()
+        writer_b.submit("chat-1", _frame(1))
+        await writer_b.flush()
+        # With node routing the final chunk may only reach a node that never owned the snapshot
+        writer_b.submit_final("chat-1", "m-1")
+        await writer_b.flush()
+        return cache_a, cache_b, writer_b, redis
+
+    cache_a, cache_b, writer_b, redis = asyncio.run(scenario())
+    assert len(cache_a.set_calls) == 1
+    assert cache_b.set_calls == []
+    assert cache_b.delete_calls == [ai_stream_snapshot_cache_key("chat-1")]
+    assert cache_b.snapshots == {}
+    assert writer_b.stats["saved_not_owner"] == 1
+    # The owner lease is replaced so the previous owner stops writing
+    assert redis.values["active_ai_stream_snapshot_owner:m-1"] == "__final__"
+
+
+def test_final_chunk_keeps_snapshot_of_a_newer_message():
+    async def scenario():
+        cache = _FakeCacheService()
+        cache.snapshots[ai_stream_snapshot_cache_key("chat-1")] = _frame(1, message_id="m-2")
+        writer = AIStreamSnapshotWriter(flush_interval_ms=0)
+        writer.configure(cache, node_id="node-a")
+        writer.submit_final("chat-1", "m-1")
+        await writer.flush()
+        return cache
+
+    cache = asyncio.run(scenario())
+    assert cache.delete_calls == []
+    assert ai_stream_snapshot_cache_key("chat-1") in cache.snapshots
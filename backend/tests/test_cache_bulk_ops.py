@@ -0,0 +1,147 @@
+# backend/tests/test_cache_bulk_ops.py
+#
+# Tests for the bulk helpers on CacheServiceBase (MGET / multi-key DEL /
+# pipelined commands with chunking) and the mixin methods that use them instead
+# of one awaited command per item. The fake client counts round trips.
+
+import asyncio
+import json
+
+from backend.core.api.app.services.cache_base import CacheServiceBase
+from backend.core.api.app.services.cache_chat_mixin import ChatCacheMixin
+from backend.core.api.app.services.cache_reminder_mixin import (
+    REMINDER_KEY_PREFIX,
+    REMINDER_SCHEDULE_KEY,
+    ReminderCacheMixin,
+)
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.ops.append((name, args))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        return [getattr(self.redis, f"_{name}")(*args) for name, args in self.ops]
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.store = {}
+        self.sets = {}
+        self.zsets = {}
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    def _setex(self, key, ttl, value):
+        self.store[key] = value.encode() if isinstance(value, str) else value
+
+    def _expire(self, key, ttl):
+        return key in self.store
+
+    def _zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    def _smembers(self, key):
+        return {member.encode() for member in self.sets.get(key, set())}
+
+    async def smembers(self, key):
+        self.round_trips += 1
+        return self._smembers(key)
+
+    async def get(self, key):
+        self.round_trips += 1
+        return self.store.get(key)
+
+    async def mget(self, keys):
+        self.round_trips += 1
+        return [self.store.get(key) for key in keys]
+
+    async def delete(self, *keys):
+        self.round_trips += 1
+        existing = [key for key in keys if self.store.pop(key, None) is not None or self.sets.pop(key, None) is not None]
+        return len(existing)
+
+
+class _FakeCache(CacheServiceBase, ChatCacheMixin, ReminderCacheMixin):
+    _BULK_CHUNK_SIZE = 20
+
+    def __init__(self):
+        self.redis = _FakeRedis()
+
+    @property
+    async def client(self):
+        return self.redis
+
+
+def test_sync_embeds_for_a_large_chat_use_one_mget_per_chunk():
+    cache = _FakeCache()
+    redis = cache.redis
+    embed_ids = [f"embed-{i}" for i in range(60)]
+    redis.sets["chat:chat-1:embed_ids"] = set(embed_ids)
+    for embed_id in embed_ids[:-1]:
+        redis.store[f"embed:{embed_id}:sync"] = json.dumps({"embed_id": embed_id}).encode()
+    redis.store["embed:embed-0:sync"] = b"{not json"
+
+    embeds = asyncio.run(cache.get_sync_embeds_for_chat("chat-1"))
+
+    assert sorted(embed["embed_id"] for embed in embeds) == sorted(embed_ids[1:-1])
+    # One SMEMBERS plus 60 keys in MGETs of 20
+    assert redis.round_trips == 1 + 3
+
+
+def test_chat_deletes_use_multi_key_deletes():
+    cache = _FakeCache()
+    redis = cache.redis
+    redis.sets["chat:chat-1:app_settings_memories_keys"] = {f"travel:item-{i}" for i in range(30)} | {"malformed"}
+    settings_keys = [
+        cache._get_app_settings_memories_cache_key("user-1", "chat-1", "travel", f"item-{i}") for i in range(30)
+    ]
+    redis.store.update(dict.fromkeys(settings_keys, b"{}"))
+
+    deleted_settings = asyncio.run(cache.delete_chat_app_settings_memories("user-1", "chat-1"))
+    assert deleted_settings == 30
+    assert not redis.store and not redis.sets
+    # SMEMBERS, 30 keys in DELs of 20, then the index
+    assert redis.round_trips == 1 + 2 + 1
+
+
+def test_reminder_batch_and_pending_embed_refresh_are_pipelined():
+    cache = _FakeCache()
+    redis = cache.redis
+    reminders = [{"id": f"reminder-{i}", "trigger_at": 1000 + i} for i in range(30)]
+    reminders.append({"id": "no-trigger"})
+    redis.store.update({f"embed:embed-{i}": b"{}" for i in range(25)})
+    redis.zsets["pending_embed_encryption:user-1"] = {f"embed-{i}": i for i in range(30)}
+    cache.get_pending_embed_ids = lambda user_id: _async(list(redis.zsets[f"pending_embed_encryption:{user_id}"]))
+
+    async def scenario():
+        loaded = await cache.load_reminders_batch_into_cache(reminders)
+        reminder_round_trips = redis.round_trips
+        refreshed = await cache.refresh_pending_embed_cache_ttls("user-1")
+        return loaded, reminder_round_trips, refreshed, redis.round_trips - reminder_round_trips
+
+    loaded, reminder_round_trips, refreshed, refresh_round_trips = asyncio.run(scenario())
+    assert loaded == 30
+    assert json.loads(redis.store[f"{REMINDER_KEY_PREFIX}reminder-7"])["reminder_id"] == "reminder-7"
+    assert redis.zsets[REMINDER_SCHEDULE_KEY]["reminder-29"] == 1029
+    # 30 SETEX plus 2 ZADD chunks in pipelines of 20
+    assert reminder_round_trips == 2
+    assert refreshed == 25 and refresh_round_trips == 2
+
+
+async def _async(value):
+    return value
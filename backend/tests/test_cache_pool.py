@@ -0,0 +1,231 @@
+# backend/tests/test_cache_pool.py
+#
+# Tests for the process-wide Dragonfly connection pool registry
+# (core/api/app/services/cache_pool.py) behind CacheServiceBase.client.
+# A minimal in-process RESP server stands in for Dragonfly so the real
+# redis.asyncio client and BlockingConnectionPool are exercised.
+
+import asyncio
+import time
+
+import pytest
+
+try:
+    import redis.asyncio as redis
+
+    from backend.core.api.app.services import cache_pool
+    from backend.core.api.app.services.cache_base import CacheServiceBase
+except ImportError as _exc:
+    pytestmark = pytest.mark.skip(reason=f"Backend cache dependencies not installed: {_exc}")
+
+
+class _MiniRespServer:
+    """Answers PING/INFO/GET/AUTH/CLIENT over RESP2 and records connections and commands."""
+
+    def __init__(self):
+        self.connections = 0
+        self.commands = []
+        self._server = None
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                header = await reader.readline()
+                if not header:
+                    return
+                args = []
+                for _ in range(int(header[1:])):
+                    size = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(size + 2))[:-2].decode())
+                command = args[0].upper()
+                self.commands.append(command)
+                if command == "PING":
+                    writer.write(b"+PONG\r\n")
+                elif command == "GET":
+                    writer.write(b"$-1\r\n")
+                elif command == "INFO":
+                    writer.write(b"$21\r\nredis_version:7.2.0\r\n\r\n")
+                else:
+                    writer.write(b"+OK\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return
+        finally:
+            writer.close()
+
+
+@pytest.fixture
+def cache_env(monkeypatch):
+    monkeypatch.setattr(CacheServiceBase, "_next_connection_retry_at", 0.0)
+
+    def point_at(server):
+        monkeypatch.setenv("DRAGONFLY_URL", f"127.0.0.1:{server.port}")
+
+    return point_at
+
+
+def test_instances_in_one_loop_share_one_pool_without_info(cache_env):
+    async def scenario():
+        async with _MiniRespServer() as server:
+            cache_env(server)
+            services = [CacheServiceBase() for _ in range(10)]
+            clients = [await service.client for service in services]
+            await asyncio.gather(*(service.get("missing") for service in services))
+            stats = cache_pool.shared_cache_pool_stats()
+            await cache_pool.close_shared_cache_pools()
+            return server, clients, stats
+
+    server, clients, stats = asyncio.run(scenario())
+    assert all(client is clients[0] for client in clients)
+    assert server.commands.count("PING") == 1
+    assert "INFO" not in server.commands
+    assert server.connections <= 10
+    [pool_stats] = stats.values()
+    assert pool_stats["in_use"] == 0 and pool_stats["acquisitions"] >= 11
+
+
+def test_each_event_loop_gets_its_own_pool(cache_env):
+    async def use_cache(server):
+        service = CacheServiceBase()
+        client = await service.client
+        await service.get("missing")
+        await service.close()
+        # close() only drops the instance's reference; the loop's pool stays usable
+        assert await CacheServiceBase().client is client
+        return client, service
+
+    async def scenario():
+        async with _MiniRespServer() as server:
+            cache_env(server)
+            first_client, service = await asyncio.to_thread(asyncio.run, use_cache(server))
+            second_client, _ = await asyncio.to_thread(asyncio.run, use_cache(server))
+            # An instance kept across loops re-binds to the current loop's pool
+            current = await service.client
+            await cache_pool.close_shared_cache_pools()
+            return first_client, second_client, current
+
+    first_client, second_client, current = asyncio.run(scenario())
+    assert first_client is not second_client
+    assert current is not first_client and current is not second_client
+    assert all(not loop.is_closed() for loop in cache_pool._pools.keys())
+
+
+def test_pool_waits_are_counted_when_saturated(cache_env, monkeypatch):
+    monkeypatch.setattr(cache_pool.cache_config, "CACHE_POOL_MAX_CONNECTIONS", 2)
+
+    async def scenario():
+        async with _MiniRespServer() as server:
+            cache_env(server)
+            client = await CacheServiceBase().client
+            pool = client.connection_pool
+            held = [await pool.get_connection("GET"), await pool.get_connection("GET")]
+            saturated = cache_pool.shared_cache_pool_stats()
+            waiter = asyncio.create_task(pool.get_connection("GET"))
+            await asyncio.sleep(0.02)
+            await pool.release(held.pop())
+            held.append(await waiter)
+            for connection in held:
+                await pool.release(connection)
+            waited = cache_pool.shared_cache_pool_stats()
+            await cache_pool.close_shared_cache_pools()
+            return saturated, waited
+
+    saturated, waited = asyncio.run(scenario())
+    [saturated] = saturated.values()
+    [waited] = waited.values()
+    assert saturated["in_use"] == 2 and saturated["saturation"] == 1.0
+    assert waited["waits"] == 1 and waited["wait_seconds"] > 0
+    assert waited["in_use"] == 0
+
+
+def test_open_subscriptions_do_not_take_command_connections(cache_env, monkeypatch):
+    monkeypatch.setattr(cache_pool.cache_config, "CACHE_POOL_MAX_CONNECTIONS", 2)
+    monkeypatch.setattr(cache_pool.cache_config, "CACHE_POOL_TIMEOUT", 0.2)
+
+    async def scenario():
+        async with _MiniRespServer() as server:
+            cache_env(server)
+            service = CacheServiceBase()
+            client = await service.client
+            # More long-lived subscriptions (SSE clients, ask streams) than pooled connections
+            subscriptions = [client.pubsub() for _ in range(5)]
+            for index, pubsub in enumerate(subscriptions):
+                await pubsub.psubscribe(f"chat_stream::{index}")
+            value = await asyncio.wait_for(service.get("missing"), timeout=1)
+            stats = cache_pool.shared_cache_pool_stats()
+            for pubsub in subscriptions:
+                await pubsub.aclose()
+            await cache_pool.close_shared_cache_pools()
+            return value, stats
+
+    value, stats = asyncio.run(scenario())
+    [pool_stats] = stats.values()
+    assert value is None
+    assert pool_stats["pubsub_in_use"] == 5
+    assert pool_stats["waits"] == 0 and pool_stats["in_use"] == 0
+
+
+def test_failed_first_ping_does_not_keep_the_pool(monkeypatch):
+    monkeypatch.setattr(CacheServiceBase, "_next_connection_retry_at", 0.0)
+    monkeypatch.setattr(CacheServiceBase, "_last_connection_warning_at", -1000.0)
+    monkeypatch.setenv("DRAGONFLY_URL", "127.0.0.1:1")
+
+    async def scenario():
+        service = CacheServiceBase()
+        client = await service.client
+        return client, dict(cache_pool._pools.get(asyncio.get_running_loop(), {}))
+
+    client, pools = asyncio.run(scenario())
+    assert client is None and pools == {}
+    assert CacheServiceBase._next_connection_retry_at > time.monotonic()
+
+
+@pytest.mark.benchmark
+def test_benchmark_skill_cache_access_with_and_without_pool(cache_env):
+    """Skill-style usage: a fresh CacheService per invocation doing one lookup."""
+    invocations = 200
+
+    async def unpooled(port):
+        # Previous behaviour: one client per instance, PING + INFO on first use
+        client = redis.Redis(host="127.0.0.1", port=port, password="openmates_cache")
+        await client.ping()
+        await client.info()
+        await client.get("skill:result")
+        await client.aclose()
+
+    async def pooled():
+        await CacheServiceBase().get("skill:result")
+
+    async def scenario():
+        async with _MiniRespServer() as server:
+            cache_env(server)
+            started = time.perf_counter()
+            for _ in range(invocations):
+                await unpooled(server.port)
+            unpooled_seconds = time.perf_counter() - started
+            unpooled_connections = server.connections
+
+            started = time.perf_counter()
+            for _ in range(invocations):
+                await pooled()
+            pooled_seconds = time.perf_counter() - started
+            await cache_pool.close_shared_cache_pools()
+            return unpooled_seconds, pooled_seconds, unpooled_connections, server.connections - unpooled_connections
+
+    unpooled_seconds, pooled_seconds, unpooled_connections, pooled_connections = asyncio.run(scenario())
+    print(
+        f"\n{invocations} skill invocations: without pool {unpooled_seconds * 1000:.1f} ms "
+        f"({unpooled_connections} connections), with pool {pooled_seconds * 1000:.1f} ms "
+        f"({pooled_connections} connection(s))"
+    )
+    assert pooled_connections == 1
+    assert pooled_seconds < unpooled_seconds
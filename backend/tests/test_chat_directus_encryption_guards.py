@@ -102,6 +102,26 @@ async def test_create_message_rejects_vault_encrypted_content_before_directus_wr
     directus.create_item.assert_not_awaited()
 
 
+@pytest.mark.asyncio
+async def test_writes_reject_envelope_encrypted_fields_before_directus_write() -> None:
+    ChatMethods = _load_chat_methods_class()
+    directus = SimpleNamespace(create_item=AsyncMock(), update_item=AsyncMock())
+    methods = ChatMethods(directus)
+
+    with pytest.raises(ValueError, match="must be client-side encrypted"):
+        await methods.update_chat_fields_in_directus("chat-1", {"encrypted_title": "omenv:v1:wrapped:ciphertext"})
+    with pytest.raises(ValueError, match="must be client-side encrypted"):
+        await methods.create_message_in_directus({
+            "message_id": "msg-1",
+            "chat_id": "chat-1",
+            "role": "user",
+            "encrypted_content": "omenv:v1:wrapped:ciphertext",
+        })
+
+    directus.create_item.assert_not_awaited()
+    directus.update_item.assert_not_awaited()
+
+
 @pytest.mark.asyncio
 async def test_create_message_accepts_client_encrypted_content() -> None:
     ChatMethods = _load_chat_methods_class()
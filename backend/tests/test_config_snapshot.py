@@ -0,0 +1,127 @@
+# backend/tests/test_config_snapshot.py
+#
+# Tests for the process-local AI config snapshots
+# (core/api/app/services/config_snapshot.py): CacheService validates the
+# preloaded apps metadata, base instructions and mates configs once per
+# generation and serves later lookups from memory until a setter bumps it.
+
+import asyncio
+import json
+
+import pytest
+
+from backend.core.api.app.services import cache as cache_module
+from backend.core.api.app.services.cache import (
+    DISCOVERED_APPS_METADATA_CACHE_KEY,
+    CacheService,
+)
+from backend.core.api.app.services.config_snapshot import (
+    AI_CONFIG_GENERATION_CACHE_KEY,
+    ConfigSnapshotCache,
+)
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.store = {}
+        self.gets = []
+
+    async def get(self, key):
+        self.gets.append(key)
+        return self.store.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.store[key] = value.encode() if isinstance(value, str) else value
+        return True
+
+    async def setex(self, key, ttl, value):
+        return await self.set(key, value)
+
+    async def incr(self, key):
+        self.store[key] = str(int(self.store.get(key, b"0")) + 1).encode()
+        return int(self.store[key])
+
+
+def _app(app_id):
+    return {
+        "id": app_id,
+        "name_translation_key": f"apps.{app_id}.name",
+        "description_translation_key": f"apps.{app_id}.description",
+    }
+
+
+def _mate(mate_id):
+    return {
+        "id": mate_id,
+        "name": mate_id.title(),
+        "category": "general",
+        "description": "test mate",
+        "default_system_prompt": "You help.",
+        "learning_mode_system_prompt": "You teach.",
+    }
+
+
+@pytest.fixture
+def service(monkeypatch):
+    snapshots = ConfigSnapshotCache(check_interval=0)
+    monkeypatch.setattr(cache_module, "config_snapshots", snapshots)
+    service = CacheService()
+    service._client = _FakeRedis()
+    service._client.store[DISCOVERED_APPS_METADATA_CACHE_KEY] = json.dumps({"web": _app("web")}).encode()
+    service._client.store["ai:mates_configs_v1"] = json.dumps([_mate("sophia")]).encode()
+    service._client.store["ai:base_instructions_v1"] = json.dumps({"base_prompt": "hi"}).encode()
+    service._client.store[AI_CONFIG_GENERATION_CACHE_KEY] = b"1"
+    return service, snapshots
+
+
+def test_lookups_are_served_from_the_snapshot_within_a_generation(service):
+    service, snapshots = service
+
+    async def scenario():
+        first = await service.get_discovered_apps_metadata()
+        repeated = [await service.get_discovered_apps_metadata() for _ in range(5)]
+        mates = [await service.get_mates_configs() for _ in range(2)]
+        instructions = [await service.get_base_instructions() for _ in range(2)]
+        return first, repeated, mates, instructions
+
+    first, repeated, mates, instructions = asyncio.run(scenario())
+    blob_reads = [key for key in service._client.gets if key != AI_CONFIG_GENERATION_CACHE_KEY]
+    assert len(blob_reads) == 3
+    assert all(result["web"] is first["web"] and result is not first for result in repeated)
+    assert [mate.id for mate in mates[1]] == ["sophia"]
+    assert instructions[1] == {"base_prompt": "hi"}
+    assert snapshots.hits == 7
+
+
+def test_setter_bump_makes_other_processes_revalidate(service):
+    service, snapshots = service
+    api_process = CacheService()
+    api_process._client = service._client
+
+    async def scenario():
+        before = await service.get_discovered_apps_metadata()
+        await api_process.set_discovered_apps_metadata(
+            {"web": cache_module.AppYAML(**_app("web")), "news": cache_module.AppYAML(**_app("news"))}
+        )
+        # Simulate a worker process whose snapshot was built before the bump
+        snapshots.put(DISCOVERED_APPS_METADATA_CACHE_KEY, 1, before)
+        after = await service.get_discovered_apps_metadata()
+        return before, after
+
+    before, after = asyncio.run(scenario())
+    assert service._client.store[AI_CONFIG_GENERATION_CACHE_KEY] == b"2"
+    assert sorted(before) == ["web"]
+    assert sorted(after) == ["news", "web"]
+
+
+def test_snapshots_are_bypassed_without_a_generation(service):
+    service, snapshots = service
+    del service._client.store[AI_CONFIG_GENERATION_CACHE_KEY]
+
+    async def scenario():
+        for _ in range(3):
+            await service.get_discovered_apps_metadata()
+
+    asyncio.run(scenario())
+    assert service._client.gets.count(DISCOVERED_APPS_METADATA_CACHE_KEY) == 3
+    assert snapshots.hits == 0
@@ -0,0 +1,366 @@
+# backend/tests/test_credit_ledger.py
+#
+# Tests for the atomic credit ledger (core/api/app/services/credit_ledger.py)
+# and its use in BillingService. The fake client runs a Python port of the
+# ledger Lua script; like EVAL it has no await inside, so it is atomic with
+# respect to concurrent charges on the event loop.
+
+import asyncio
+import json
+import re
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from backend.core.api.app.services import credit_ledger
+from backend.core.api.app.services.billing_service import BillingService
+from backend.core.api.app.services.cache_user_mixin import UserCacheMixin
+from backend.core.api.app.services.credit_ledger import (
+    LEDGER_DIRTY_USERS_KEY,
+    LEDGER_LATEST_KEY,
+    LEDGER_PERSISTED_KEY,
+    LEDGER_RECONCILED_KEY,
+    OVERDRAFT_LIMIT,
+    CreditLedger,
+)
+from backend.core.api.app.utils import server_mode
+
+USER_KEY_PREFIX = "user_profile:"
+
+
+class _FakeLedgerRedis:
+    """Strings, sets, hashes and one stream, plus the ledger script."""
+
+    def __init__(self):
+        self.store = {}
+        self.sets = {}
+        self.hashes = {}
+        self.stream = []
+        self._last_id = (0, 0)
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def set(self, key, value, **kwargs):
+        self.store[key] = value if isinstance(value, bytes) else str(value).encode()
+
+    async def spop(self, key, count):
+        members = self.sets.get(key, set())
+        popped = [members.pop() for _ in range(min(count, len(members)))]
+        return [member.encode() for member in popped]
+
+    async def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+
+    async def srem(self, key, *members):
+        self.sets.setdefault(key, set()).difference_update(members)
+
+    async def hget(self, key, field):
+        value = self.hashes.get(key, {}).get(field)
+        return value.encode() if value is not None else None
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    async def hmget(self, key, fields):
+        return [await self.hget(key, field) for field in fields]
+
+    async def xrange(self, key, min="-", max="+", count=None):
+        def position(bound):
+            millis, _, sequence = bound.lstrip("(").partition("-")
+            return int(millis), int(sequence or 0)
+
+        selected = []
+        for stream_id, fields in self.stream:
+            pos = position(stream_id)
+            if min != "-" and (pos <= position(min) if min.startswith("(") else pos < position(min)):
+                continue
+            if max != "+" and pos[0] > int(max):
+                continue
+            selected.append((stream_id.encode(), fields))
+        return selected[:count]
+
+    def _xadd(self, fields):
+        millis = int(time.time() * 1000)
+        self._last_id = (millis, self._last_id[1] + 1) if millis <= self._last_id[0] else (millis, 0)
+        stream_id = f"{self._last_id[0]}-{self._last_id[1]}"
+        self.stream.append((stream_id, {k.encode(): str(v).encode() for k, v in fields.items()}))
+        return stream_id
+
+    async def eval(self, script, numkeys, *args):
+        assert script is credit_ledger._APPLY_LEDGER_OP_LUA
+        (profile_key, _stream, dirty_key, latest_key), argv = args[:numkeys], args[numkeys:]
+        op, amount, limit, user_id, app_id, skill_id, ts, _maxlen = argv
+        raw = self.store.get(profile_key)
+        if raw is None:
+            return [b"missing", 0, 0, b""]
+        balance = json.loads(raw).get("credits")
+        if not isinstance(balance, int):
+            return [b"unsupported", 0, 0, b""]
+        if op == "debit":
+            if balance <= limit:
+                return [b"insufficient", balance, 0, b""]
+            new_balance = max(balance - amount, limit)
+        else:
+            new_balance = balance + amount
+        patched, matches = re.subn(rb'("credits"\s*:\s*)-?\d+', rb"\g<1>" + str(new_balance).encode(), raw)
+        if matches != 1:
+            return [b"unsupported", balance, 0, b""]
+        self.store[profile_key] = patched
+        applied = abs(new_balance - balance)
+        event_id = self._xadd(
+            {"user_id": user_id, "op": op, "amount": applied, "balance": new_balance,
+             "app_id": app_id, "skill_id": skill_id, "ts": ts}
+        )
+        self.sets.setdefault(dirty_key, set()).add(user_id)
+        self.hashes.setdefault(latest_key, {})[user_id] = f"{event_id} {new_balance}"
+        return [b"ok", new_balance, applied, event_id.encode()]
+
+
+class _FakeCacheService:
+    USER_KEY_PREFIX = USER_KEY_PREFIX
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.set_user_calls = 0
+
+    @property
+    async def client(self):
+        return self.redis
+
+    async def get_user_by_id(self, user_id):
+        raw = self.redis.store.get(f"{USER_KEY_PREFIX}{user_id}")
+        return json.loads(raw) if raw else None
+
+    async def get_user_vault_key_id(self, user_id):
+        return None
+
+    async def set_user(self, user, user_id=None):
+        self.set_user_calls += 1
+        self.redis.store[f"{USER_KEY_PREFIX}{user_id}"] = json.dumps(user).encode()
+
+    async def increment_stat(self, *args):
+        pass
+
+    async def update_liability(self, *args):
+        pass
+
+
+class _ProfileCache(UserCacheMixin, _FakeCacheService):
+    """The real CacheService.set_user() on top of the fake ledger store."""
+
+    USER_TTL = SESSION_TTL = 3600
+
+    async def get(self, key):
+        raw = self.redis.store.get(key)
+        return json.loads(raw) if raw else None
+
+    async def set(self, key, value, ttl=None):
+        self.redis.store[key] = json.dumps(value).encode()
+        return True
+
+
+class _FakeDirectus:
+    def __init__(self, fail=False, profile=None):
+        self.updates = []
+        self.fail = fail
+        self.profile = profile
+        self.usage = SimpleNamespace(create_usage_entry=self._create_usage_entry)
+        self.usage_entries = 0
+
+    async def update_user(self, user_id, data):
+        if self.fail:
+            return False
+        self.updates.append((user_id, data["encrypted_credit_balance"]))
+        return True
+
+    async def _create_usage_entry(self, **kwargs):
+        self.usage_entries += 1
+
+    async def get_user_profile(self, user_id):
+        return (True, dict(self.profile), "ok") if self.profile else (False, None, "not found")
+
+
+class _FakeEncryption:
+    async def encrypt_with_user_key(self, plaintext, key_id):
+        return f"enc:{key_id}:{plaintext}", "v1"
+
+
+def _cache_with_user(credits, **profile):
+    redis = _FakeLedgerRedis()
+    user = {"id": "user-1", "vault_key_id": "key-1", "credits": credits, "settings": {"theme": "dark"}, **profile}
+    redis.store[f"{USER_KEY_PREFIX}user-1"] = json.dumps(user).encode()
+    return _FakeCacheService(redis)
+
+
+@pytest.fixture
+def billing(monkeypatch):
+    monkeypatch.setattr(server_mode, "is_payment_enabled", lambda: True)
+
+    def build(cache, directus):
+        service = BillingService(cache, directus, _FakeEncryption())
+        service.websocket_manager = SimpleNamespace(broadcast_to_user=_noop)
+        return service
+
+    return build
+
+
+async def _noop(**kwargs):
+    pass
+
+
+def test_concurrent_charges_are_atomic_and_persisted_once(billing):
+    cache, directus = _cache_with_user(1000), _FakeDirectus()
+    service = billing(cache, directus)
+
+    async def scenario():
+        await asyncio.gather(
+            *(
+                service.charge_user_credits("user-1", 7, "hash", "web", "search", {"is_incognito": True})
+                for _ in range(100)
+            )
+        )
+        flushed = await service.credit_ledger.flush_dirty_balances(directus, _FakeEncryption())
+        return flushed, await cache.get_user_by_id("user-1")
+
+    flushed, user = asyncio.run(scenario())
+    assert user["credits"] == 300
+    assert user["settings"] == {"theme": "dark"}
+    assert cache.set_user_calls == 0
+    assert len(cache.redis.stream) == 100 and directus.usage_entries == 100
+    assert flushed == 1 and directus.updates == [("user-1", "enc:key-1:300")]
+
+
+def test_overdraft_limit_is_enforced_by_the_ledger(billing):
+    cache, directus = _cache_with_user(10), _FakeDirectus()
+    service = billing(cache, directus)
+
+    async def scenario():
+        first = await service.credit_ledger.debit("user-1", 900, "ai", "ask")
+        second = await service.credit_ledger.debit("user-1", 1, "ai", "ask")
+        refund = await service.credit_ledger.credit("user-1", 20, "ai", "ask")
+        return first, second, refund
+
+    first, second, refund = asyncio.run(scenario())
+    assert (first.status, first.balance, first.amount) == ("ok", OVERDRAFT_LIMIT, 10 - OVERDRAFT_LIMIT)
+    assert (second.status, second.balance) == ("insufficient", OVERDRAFT_LIMIT)
+    assert (refund.status, refund.balance) == ("ok", OVERDRAFT_LIMIT + 20)
+
+
+def test_unpatchable_profile_falls_back_to_read_modify_write(billing):
+    cache, directus = _cache_with_user(100, referral={"credits": 5}), _FakeDirectus()
+    service = billing(cache, directus)
+
+    async def scenario():
+        await service.charge_user_credits("user-1", 30, "hash", "web", "search", {"is_incognito": True})
+        return await cache.get_user_by_id("user-1")
+
+    user = asyncio.run(scenario())
+    assert user["credits"] == 70 and user["referral"] == {"credits": 5}
+    assert cache.set_user_calls == 1 and cache.redis.stream == []
+    assert directus.updates == [("user-1", "enc:key-1:70")]
+
+
+def test_failed_flush_is_retried_and_lost_flush_is_reconciled():
+    cache = _cache_with_user(100)
+
+    async def scenario():
+        ledger = CreditLedger(cache)
+        await ledger.debit("user-1", 10, "ai", "ask")
+        failed = await ledger.flush_dirty_balances(_FakeDirectus(fail=True), _FakeEncryption())
+        still_dirty = set(cache.redis.sets[LEDGER_DIRTY_USERS_KEY])
+
+        # A flusher that popped the user and died before writing to Directus
+        await cache.redis.spop(LEDGER_DIRTY_USERS_KEY, 10)
+        requeued = await ledger.reconcile_ledger(grace_seconds=0)
+        directus = _FakeDirectus()
+        flushed = await ledger.flush_dirty_balances(directus, _FakeEncryption())
+        await ledger.debit("user-1", 1, "ai", "ask")
+        await ledger.flush_dirty_balances(directus, _FakeEncryption())
+        return failed, still_dirty, requeued, flushed, directus, await ledger.reconcile_ledger(grace_seconds=0)
+
+    failed, still_dirty, requeued, flushed, directus, requeued_after_flush = asyncio.run(scenario())
+    assert failed == 0 and still_dirty == {"user-1"}
+    assert requeued == ["user-1"] and flushed == 1
+    assert directus.updates == [("user-1", "enc:key-1:90"), ("user-1", "enc:key-1:89")]
+    assert requeued_after_flush == []
+    assert cache.redis.hashes[LEDGER_PERSISTED_KEY]["user-1"] == cache.redis.stream[-1][0]
+
+
+def test_reconcile_pages_through_the_backlog_and_checkpoints_each_page():
+    redis = _FakeLedgerRedis()
+    for index in range(5):
+        redis._xadd({"user_id": f"user-{index}", "op": "debit", "amount": 1})
+    ledger = CreditLedger(_FakeCacheService(redis))
+
+    async def scenario():
+        # No time budget: one page per run, each run continues at the checkpoint
+        first = await ledger.reconcile_ledger(batch_size=2, grace_seconds=0, time_budget_seconds=0)
+        checkpoint = redis.store[LEDGER_RECONCILED_KEY]
+        rest = await ledger.reconcile_ledger(batch_size=2, grace_seconds=0)
+        return first, checkpoint, rest
+
+    first, checkpoint, rest = asyncio.run(scenario())
+    assert first == ["user-0", "user-1"]
+    assert checkpoint == redis.stream[1][0].encode()
+    assert rest == ["user-2", "user-3", "user-4"]
+    assert redis.store[LEDGER_RECONCILED_KEY] == redis.stream[-1][0].encode()
+    assert redis.sets[LEDGER_DIRTY_USERS_KEY] == {f"user-{index}" for index in range(5)}
+
+
+def test_profile_recached_from_directus_keeps_unflushed_ledger_balance():
+    redis = _FakeLedgerRedis()
+    cache = _ProfileCache(redis)
+    directus_profile = {"id": "user-1", "vault_key_id": "key-1", "credits": 100}
+
+    async def scenario():
+        ledger = CreditLedger(cache)
+        await cache.set_user(dict(directus_profile), user_id="user-1")
+        await ledger.debit("user-1", 30, "ai", "ask")
+        # Evicted (or stale vault_key_id) and re-loaded from Directus before the flush
+        await cache.set_user(dict(directus_profile), user_id="user-1")
+        reloaded = (await cache.get_user_by_id("user-1"))["credits"]
+        await ledger.debit("user-1", 5, "ai", "ask")
+        directus = _FakeDirectus()
+        await ledger.flush_dirty_balances(directus, _FakeEncryption())
+        # Once flushed, Directus is current again and profiles are cached as loaded
+        await cache.set_user({**directus_profile, "credits": 65}, user_id="user-1")
+        return reloaded, directus, await cache.get_user_by_id("user-1")
+
+    reloaded, directus, user = asyncio.run(scenario())
+    assert reloaded == 70
+    assert directus.updates == [("user-1", "enc:key-1:65")]
+    assert user["credits"] == 65
+
+
+def test_grant_loads_missing_profile_and_persists_right_away():
+    redis = _FakeLedgerRedis()
+    cache = _ProfileCache(redis)
+    # Directus still has 50; the ledger's unflushed balance after a charge is 40
+    redis.hashes[LEDGER_LATEST_KEY] = {"user-1": "1-0 40"}
+    directus = _FakeDirectus(profile={"id": "user-1", "vault_key_id": "key-1", "credits": 50})
+
+    async def scenario():
+        ledger = CreditLedger(cache)
+        granted = await ledger.grant("user-1", 100, "payments", "purchase", directus, _FakeEncryption())
+        revoked = await ledger.revoke("user-1", 500, "payments", "refund", directus, _FakeEncryption())
+        again = await ledger.revoke("user-1", 1, "payments", "refund", directus, _FakeEncryption())
+        return granted, revoked, again
+
+    granted, revoked, again = asyncio.run(scenario())
+    assert (granted.status, granted.balance) == ("ok", 140)
+    assert (revoked.status, revoked.balance) == ("ok", 0)
+    assert (again.status, again.balance) == ("insufficient", 0)
+    assert directus.updates == [("user-1", "enc:key-1:140"), ("user-1", "enc:key-1:0")]
+    assert redis.sets[LEDGER_DIRTY_USERS_KEY] == set()
+    assert redis.hashes[LEDGER_PERSISTED_KEY]["user-1"] == redis.stream[-1][0]
+
+
+def test_grant_on_missing_user_changes_nothing():
+    cache = _ProfileCache(_FakeLedgerRedis())
+    directus = _FakeDirectus()
+
+    result = asyncio.run(CreditLedger(cache).grant("user-1", 10, "payments", "purchase", directus, _FakeEncryption()))
+    assert result.status == "missing" and not result.applied
+    assert directus.updates == [] and cache.redis.stream == []
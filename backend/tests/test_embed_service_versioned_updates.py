@@ -84,6 +84,14 @@ class FakeCacheService:
     async def client(self):
         return self._client
 
+    async def publish_event(self, channel: str, event_data: dict):
+        await self._client.publish(channel, json.dumps(event_data))
+        return True
+
+    async def add_embed_id_to_chat_index(self, chat_id: str, embed_id: str, ttl: int = 3600):
+        await self._client.sadd(f"chat:{chat_id}:embed_ids", embed_id)
+        return True
+
 
 class FakeEncryptionService:
     async def encrypt_with_user_key(self, content: str, vault_key_id: str):
@@ -112,7 +112,7 @@ class TestEncryptionService:
                 "data": {"policies": ["default", "encryption-policy"]}
             }
             with patch('httpx.AsyncClient') as mock_client:
-                mock_client.return_value.__aenter__.return_value.get = AsyncMock(
+                mock_client.return_value.get = AsyncMock(
                     return_value=mock_response_obj
                 )
                 result = await encryption_service._validate_token()
@@ -125,7 +125,7 @@ class TestEncryptionService:
             mock_response_obj.status_code = 403
             mock_response_obj.text = "Forbidden"
             with patch('httpx.AsyncClient') as mock_client:
-                mock_client.return_value.__aenter__.return_value.get = AsyncMock(
+                mock_client.return_value.get = AsyncMock(
                     return_value=mock_response_obj
                 )
                 # Prevent file-token refresh from succeeding
@@ -141,7 +141,7 @@ class TestEncryptionService:
             mock_response_obj.json.return_value = {"data": {"policies": ["default"]}}
             with patch('httpx.AsyncClient') as mock_client:
                 mock_get = AsyncMock(return_value=mock_response_obj)
-                mock_client.return_value.__aenter__.return_value.get = mock_get
+                mock_client.return_value.get = mock_get
 
                 # First call validates against Vault
                 result1 = await encryption_service._validate_token()
@@ -165,7 +165,7 @@ class TestEncryptionService:
                 mock_response_obj.status_code = 200
                 mock_response_obj.json.return_value = mock_vault_response
                 
-                mock_client.return_value.__aenter__.return_value.get.return_value = mock_response_obj
+                mock_client.return_value.get = AsyncMock(return_value=mock_response_obj)
                 
                 with patch.object(encryption_service, '_validate_token', return_value=True):
                     result = await encryption_service._vault_request("get", "test/path")
@@ -179,7 +179,7 @@ class TestEncryptionService:
                 mock_response_obj.status_code = 403
                 mock_response_obj.text = "Permission denied"
                 
-                mock_client.return_value.__aenter__.return_value.get.return_value = mock_response_obj
+                mock_client.return_value.get = AsyncMock(return_value=mock_response_obj)
                 
                 with patch.object(encryption_service, '_validate_token', return_value=True):
                     with pytest.raises(Exception, match="Permission denied"):
@@ -192,7 +192,7 @@ class TestEncryptionService:
                 mock_response_obj = MagicMock()
                 mock_response_obj.status_code = 404
                 
-                mock_client.return_value.__aenter__.return_value.get.return_value = mock_response_obj
+                mock_client.return_value.get = AsyncMock(return_value=mock_response_obj)
                 
                 with patch.object(encryption_service, '_validate_token', return_value=True):
                     result = await encryption_service._vault_request("get", "test/path")
@@ -205,7 +205,7 @@ class TestEncryptionService:
                 mock_response_obj = MagicMock()
                 mock_response_obj.status_code = 401
                 
-                mock_client.return_value.__aenter__.return_value.get.return_value = mock_response_obj
+                mock_client.return_value.get = AsyncMock(return_value=mock_response_obj)
                 
                 with patch.object(encryption_service, '_validate_token', return_value=True):
                     with pytest.raises(Exception, match="Vault token is expired or invalid"):
@@ -0,0 +1,138 @@
+# backend/tests/test_envelope_encryption.py
+#
+# Tests for envelope mode in EncryptionService (core/api/app/utils/encryption.py):
+# hot fields are encrypted locally with AES-GCM under a per-user data key that
+# Vault wraps once, `vault:v1:` values keep decrypting through transit, and
+# reencrypt_with_user_key migrates values in both directions.
+
+import asyncio
+import base64
+import os
+
+from backend.core.api.app.utils.encryption import (
+    EncryptionService,
+    _DataKeyCache,
+    is_envelope_ciphertext,
+)
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode()
+
+
+class _FakeVault:
+    """Transit encrypt/decrypt/datakey for derived user keys, recording every request."""
+
+    def __init__(self):
+        self.requests = []
+
+    def _one(self, operation, key_id, item):
+        if operation == "encrypt":
+            return {"ciphertext": f"vault:v1:{key_id}:{item['plaintext']}"}
+        _, _, owner, plaintext = item["ciphertext"].split(":", 3)
+        if owner != key_id:
+            return {"error": "cipher: message authentication failed"}
+        return {"plaintext": plaintext}
+
+    async def __call__(self, method, path, data=None):
+        _, operation, *rest = path.split("/")
+        self.requests.append(operation)
+        if operation == "datakey":
+            key_id = rest[-1]
+            plaintext = _b64(os.urandom(32))
+            return {"data": {"plaintext": plaintext, "ciphertext": f"vault:v1:{key_id}:{plaintext}"}}
+        key_id = rest[0]
+        if "batch_input" in data:
+            return {"data": {"batch_results": [self._one(operation, key_id, item) for item in data["batch_input"]]}}
+        return {"data": self._one(operation, key_id, data)}
+
+
+def _service(vault, enabled=True, cache=None):
+    service = EncryptionService()
+    service._vault_request = vault
+    service.envelope_enabled = enabled
+    service.data_key_cache = cache or _DataKeyCache()
+    return service
+
+
+def test_envelope_fields_need_one_vault_call_per_user():
+    async def scenario():
+        vault = _FakeVault()
+        service = _service(vault)
+        ciphertexts = [(await service.encrypt_with_user_key(str(i), "user_a", envelope=True))[0] for i in range(50)]
+        plaintexts = await service.decrypt_many_with_user_key(ciphertexts, "user_a")
+        return vault, ciphertexts, plaintexts
+
+    vault, ciphertexts, plaintexts = asyncio.run(scenario())
+    assert all(ciphertext.startswith("omenv:v1:vault:v1:") for ciphertext in ciphertexts)
+    assert plaintexts == [str(i) for i in range(50)]
+    assert vault.requests == ["datakey"]
+
+
+def test_other_process_unwraps_data_key_once():
+    async def scenario():
+        vault = _FakeVault()
+        writer = _service(vault)
+        ciphertexts = [(await writer.encrypt_with_user_key(f"value-{i}", "user_a", envelope=True))[0] for i in range(10)]
+
+        reader = _service(vault)
+        vault.requests.clear()
+        results = await asyncio.gather(*(reader.decrypt_with_user_key(c, "user_a") for c in ciphertexts))
+        return vault, results
+
+    vault, results = asyncio.run(scenario())
+    assert results == [f"value-{i}" for i in range(10)]
+    assert vault.requests == ["decrypt"]
+
+
+def test_legacy_transit_values_and_disabled_mode():
+    async def scenario():
+        vault = _FakeVault()
+        service = _service(vault, enabled=False)
+        ciphertext, key_version = await service.encrypt_with_user_key("legacy", "user_a", envelope=True)
+        return ciphertext, key_version, await service.decrypt_with_user_key(ciphertext, "user_a")
+
+    ciphertext, key_version, plaintext = asyncio.run(scenario())
+    assert ciphertext.startswith("vault:v1:") and key_version == "v1"
+    assert plaintext == "legacy"
+
+
+def test_envelope_value_is_bound_to_its_user():
+    async def scenario():
+        vault = _FakeVault()
+        service = _service(vault)
+        ciphertext, _ = await service.encrypt_with_user_key("secret", "user_a", envelope=True)
+        return await service.decrypt_with_user_key(ciphertext, "user_b")
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_data_key_cache_zeroizes_on_eviction_and_expiry():
+    cache = _DataKeyCache(max_entries=1, ttl=60)
+    cache.put("user_a", "vault:v1:a", b"\x01" * 32, current=True)
+    first = cache._keys[("user_a", "vault:v1:a")][0]
+    cache.put("user_b", "vault:v1:b", b"\x02" * 32, current=True)
+    assert first == bytearray(32)
+    assert cache.current("user_a") is None
+
+    second = cache._keys[("user_b", "vault:v1:b")][0]
+    cache._keys[("user_b", "vault:v1:b")] = (second, 0.0)
+    assert cache.get("user_b", "vault:v1:b") is None
+    assert second == bytearray(32)
+
+
+def test_reencrypt_migrates_and_rolls_back():
+    async def scenario():
+        vault = _FakeVault()
+        service = _service(vault, enabled=False)
+        legacy = [(await service.encrypt_with_user_key(v, "user_a"))[0] for v in ("1", "2")]
+        migrated = await service.reencrypt_with_user_key([*legacy, "", "vault:v1:user_b:bad"], "user_a")
+        rolled_back = await service.reencrypt_with_user_key(migrated[:2], "user_a", envelope=False)
+        return migrated, rolled_back, await service.decrypt_many_with_user_key(rolled_back, "user_a")
+
+    migrated, rolled_back, plaintexts = asyncio.run(scenario())
+    assert [is_envelope_ciphertext(value) for value in migrated[:2]] == [True, True]
+    assert migrated[2:] == ["", None]
+    assert all(value.startswith("vault:v1:") for value in rolled_back)
+    assert plaintexts == ["1", "2"]
+
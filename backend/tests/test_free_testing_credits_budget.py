@@ -86,6 +86,12 @@ class FakeCache:
         self.liability_updates: list[int] = []
         self.published: list[tuple[str, dict[str, Any]]] = []
 
+    @property
+    async def client(self) -> None:
+        # No Dragonfly: the credit ledger reports profiles as unsupported and the
+        # service takes its direct Directus update path.
+        return None
+
     async def get_user_by_id(self, user_id: str) -> dict[str, Any] | None:
         return self.users.get(user_id)
 
@@ -0,0 +1,108 @@
+# backend/tests/test_http_clients.py
+#
+# Tests for the shared outbound HTTP client registry
+# (shared/python_utils/http_clients.py): one keep-alive client per upstream and
+# event loop, per-upstream settings, pool statistics and shutdown.
+
+import asyncio
+
+import httpx
+
+from backend.shared.python_utils import http_clients
+from backend.shared.python_utils.http_clients import (
+    close_http_clients,
+    get_http_client,
+    http_client_stats,
+    register_http_upstream,
+)
+
+
+class _KeepAliveServer:
+    """Tiny HTTP/1.1 server that answers every request with 200 and keeps the connection open."""
+
+    def __init__(self):
+        self.connections = 0
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{self._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while await reader.readuntil(b"\r\n\r\n"):
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nContent-Type: text/plain\r\n\r\nok")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def test_client_is_shared_per_upstream_and_loop():
+    async def clients():
+        first = get_http_client("test_upstream_a")
+        again = get_http_client("test_upstream_a")
+        other = get_http_client("test_upstream_b")
+        await close_http_clients()
+        return first, again, other
+
+    first, again, other = asyncio.run(clients())
+    second_loop_first, _, _ = asyncio.run(clients())
+    assert first is again
+    assert first is not other
+    assert second_loop_first is not first
+    assert first.is_closed and other.is_closed
+
+
+def test_registered_upstream_settings_are_applied():
+    register_http_upstream("test_upstream_tuned", timeout=42.0, max_connections=7, keepalive_expiry=12.0)
+
+    async def scenario():
+        client = get_http_client("test_upstream_tuned")
+        pool = client._transport._pool
+        settings = (client.timeout.read, pool._max_connections, pool._keepalive_expiry)
+        await close_http_clients()
+        return settings
+
+    assert asyncio.run(scenario()) == (42.0, 7, 12.0)
+    assert http_clients._upstreams["test_upstream_tuned"].max_keepalive_connections == 20
+
+
+def test_requests_reuse_one_connection_and_are_counted():
+    async def scenario():
+        async with _KeepAliveServer() as server:
+            client = get_http_client("test_upstream_keepalive")
+            for _ in range(10):
+                response = await client.get(f"{server.url}/ping")
+                assert response.text == "ok"
+            stats = http_client_stats()["test_upstream_keepalive"]
+            await close_http_clients()
+            return server.connections, stats
+
+    connections, stats = asyncio.run(scenario())
+    assert connections == 1
+    assert stats["requests"] >= 10
+    assert stats["connections"] == 1 and stats["idle"] == 1 and stats["active"] == 0
+
+
+def test_clients_of_closed_loops_are_discarded():
+    async def leave_client_open():
+        return get_http_client("test_upstream_stale")
+
+    loop = asyncio.new_event_loop()
+    stale = loop.run_until_complete(leave_client_open())
+    loop.close()
+
+    async def scenario():
+        get_http_client("test_upstream_fresh")
+        known = list(http_clients._clients.keys())
+        await close_http_clients()
+        return known
+
+    assert isinstance(stale, httpx.AsyncClient)
+    assert loop not in asyncio.run(scenario())
@@ -353,6 +353,55 @@ def test_code_fence_inside_open_interactive_question_is_not_treated_as_code_bloc
     assert _is_inside_open_interactive_question(aggregated) is True
 
 
+def _streamed_prefixes(text: str, chunk_size: int):
+    chunks: list = []
+    streamed = stream_consumer._StreamedResponse(chunks)
+    for start in range(0, len(text), chunk_size):
+        chunks.append(text[start:start + chunk_size])
+        yield "".join(chunks), streamed
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 64])
+@pytest.mark.parametrize(
+    "text",
+    [
+        VALID_QUESTION + "After the question.\n```python\nprint(1)\n```\n",
+        "Intro\n```interactive_question\n{\n```python\nx = 1\n```\nmore text",
+        "Intro\r\n  ```interactive_question  \r\n{}\r\n```\r\ntail",
+        "x" * 600 + "\n```interactive_question" + " " * 400 + "\n{}\n```" + "y" * 300,
+    ],
+)
+def test_streamed_response_tracks_open_question_and_tail_incrementally(text: str, chunk_size: int) -> None:
+    fence_chunk = "```python\nprint('hi')\n"
+    for prefix, streamed in _streamed_prefixes(text, chunk_size):
+        inside_question = streamed.inside_open_interactive_question()
+        assert inside_question == _is_inside_open_interactive_question(prefix)
+
+        tail = streamed.tail()
+        last_line = prefix.rsplit("\n", 1)[-1]
+        tail_line = tail.rsplit("\n", 1)[-1]
+        assert last_line.endswith(tail_line)
+        assert tail_line == last_line or len(tail_line) >= streamed.TAIL_MAX_CHARS
+        assert stream_consumer._should_process_chunk_as_code_block(
+            fence_chunk, tail, False, inside_open_interactive_question=inside_question
+        ) == stream_consumer._should_process_chunk_as_code_block(fence_chunk, prefix, False)
+
+        assert streamed.length == len(prefix)
+
+
+def test_streamed_response_publishes_only_the_text_appended_since_the_last_take() -> None:
+    chunks: list = []
+    streamed = stream_consumer._StreamedResponse(chunks)
+    chunks.extend(["Hello", " world"])
+    assert streamed.take_unpublished() == "Hello world"
+    # e.g. an application reference appended without a publish of its own
+    chunks.append("\n[app]")
+    chunks.append(" done")
+    assert streamed.take_unpublished() == "\n[app] done"
+    assert streamed.take_unpublished() == ""
+    assert streamed.text() == "Hello world\n[app] done"
+
+
 def test_embed_reference_after_invalid_interactive_question_is_removed() -> None:
     malformed_with_embed = """Please answer.
 
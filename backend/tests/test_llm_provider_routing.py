@@ -0,0 +1,390 @@
+# backend/tests/test_llm_provider_routing.py
+#
+# Tests for latency-aware LLM routing (apps/ai/utils/provider_routing.py):
+# passive health ordering, hedge deadlines, the first-chunk race that cancels
+# and closes the losing stream, and the integration in llm_utils for both the
+# main stream and preprocessing.
+
+import asyncio
+
+import pytest
+
+try:
+    from backend.apps.ai.llm_providers.openai_shared import ParsedOpenAIToolCall, UnifiedOpenAIResponse
+    from backend.apps.ai.utils import llm_utils, provider_routing
+    from backend.apps.ai.utils.provider_routing import ProviderHealthTracker, race_first_chunk
+except ImportError:
+    pytestmark = pytest.mark.skip(reason="Backend AI dependencies not installed (google-genai, tiktoken, etc.)")
+    llm_utils = provider_routing = None  # type: ignore[assignment]
+    ParsedOpenAIToolCall = UnifiedOpenAIResponse = None  # type: ignore[assignment, misc]
+    ProviderHealthTracker = race_first_chunk = None  # type: ignore[assignment, misc]
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    monkeypatch.setattr(provider_routing, "HEDGED_REQUESTS_ENABLED", True)
+    monkeypatch.setattr(provider_routing, "HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(provider_routing, "HEDGE_MIN_DELAY_SECONDS", 0.01)
+
+
+def _record_latencies(tracker, server_model_id, seconds, count=5):
+    for _ in range(count):
+        tracker.record_latency(server_model_id, seconds)
+
+
+class _Stream:
+    """Async chunk stream that waits before its first chunk and records aclose()."""
+
+    def __init__(self, chunks, first_chunk_delay=0.0):
+        self.chunks = list(chunks)
+        self.first_chunk_delay = first_chunk_delay
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.first_chunk_delay:
+            await asyncio.sleep(self.first_chunk_delay)
+            self.first_chunk_delay = 0.0
+        if not self.chunks:
+            raise StopAsyncIteration
+        return self.chunks.pop(0)
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_degraded_servers_move_back_and_recent_success_is_tracked_per_provider():
+    tracker = ProviderHealthTracker("test")
+    for ok in (False, False, False, True):
+        tracker.record_outcome("a/model", ok)
+    for _ in range(4):
+        tracker.record_outcome("b/model", True)
+
+    assert tracker.error_rate("a/model") == 0.75
+    assert tracker.order_servers(["a/model", "b/model", "c/model"]) == ["b/model", "c/model", "a/model"]
+    # Too few outcomes to judge: configured order is kept
+    tracker.record_outcome("c/model", False)
+    assert tracker.order_servers(["c/model", "b/model"]) == ["c/model", "b/model"]
+
+    assert tracker.has_recent_success("a") and not tracker.has_recent_success("c")
+    tracker.record_outcome("groq/model", True, provider_prefix="openai")
+    assert tracker.has_recent_success("openai")
+
+
+def test_hedge_delay_needs_opt_in_samples_and_a_deadline_below_the_timeout(monkeypatch, hedging):
+    tracker = ProviderHealthTracker("test")
+    _record_latencies(tracker, "a/model", 0.2, count=4)
+    assert tracker.hedge_delay("a/model", 10) is None
+
+    tracker.record_latency("a/model", 0.8)
+    assert tracker.hedge_delay("a/model", 10) == 0.8
+    assert tracker.hedge_delay("a/model", 0.5) is None
+
+    monkeypatch.setattr(provider_routing, "HEDGED_REQUESTS_ENABLED", False)
+    assert tracker.hedge_delay("a/model", 10) is None
+
+
+def test_race_first_chunk_keeps_the_fast_hedge_and_closes_the_stalled_primary():
+    primary = _Stream(["slow"], first_chunk_delay=5)
+    hedge = _Stream(["fast", "rest"])
+    results = []
+
+    async def open_primary():
+        return primary
+
+    async def open_hedge():
+        return hedge
+
+    async def scenario():
+        outcome = await race_first_chunk(
+            [open_primary, open_hedge], 0.02, 10,
+            on_result=lambda index, elapsed, error: results.append((index, type(error).__name__)),
+        )
+        return outcome, [chunk async for chunk in outcome.stream]
+
+    outcome, chunks = asyncio.run(scenario())
+
+    assert outcome.winner_index == 1 and outcome.hedge_started
+    assert chunks == ["fast", "rest"]
+    assert primary.closed and not hedge.closed
+    assert results == [(1, "NoneType"), (0, "CancelledError")]
+
+
+def test_race_first_chunk_closes_and_reports_a_loser_that_produced_a_chunk_at_the_same_time():
+    gate = asyncio.Event()
+
+    class _GatedStream(_Stream):
+        async def __anext__(self):
+            await gate.wait()
+            return await super().__anext__()
+
+    primary = _GatedStream(["primary"])
+    hedge = _GatedStream(["hedge"])
+    results = []
+
+    async def open_primary():
+        return primary
+
+    async def open_hedge():
+        return hedge
+
+    async def scenario():
+        race = asyncio.create_task(race_first_chunk(
+            [open_primary, open_hedge], 0.01, 10,
+            on_result=lambda index, elapsed, error: results.append((index, type(error).__name__)),
+        ))
+        await asyncio.sleep(0.05)
+        # Both first chunks arrive in the same event loop iteration
+        gate.set()
+        outcome = await race
+        return outcome, [chunk async for chunk in outcome.stream]
+
+    outcome, chunks = asyncio.run(scenario())
+
+    assert outcome.winner_index == 0 and chunks == ["primary"]
+    assert hedge.closed and not primary.closed
+    assert sorted(results) == [(0, "NoneType"), (1, "NoneType")]
+
+
+def test_race_first_chunk_does_not_hedge_a_prompt_primary_and_raises_when_both_fail():
+    opened = []
+
+    async def open_fast():
+        opened.append("fast")
+        return _Stream(["ok"])
+
+    async def open_never():
+        opened.append("never")
+        return _Stream([])
+
+    outcome = asyncio.run(race_first_chunk([open_fast, open_never], 1, 10))
+    assert outcome.winner_index == 0 and not outcome.hedge_started and opened == ["fast"]
+
+    async def open_failing_slowly():
+        await asyncio.sleep(0.05)
+        raise ConnectionError("primary 503")
+
+    async def open_failing():
+        raise ConnectionError("hedge 502")
+
+    with pytest.raises(ConnectionError, match="primary 503"):
+        asyncio.run(race_first_chunk([open_failing_slowly, open_failing], 0.01, 10))
+
+
+def test_race_first_chunk_closes_the_primary_when_cancelled_before_the_hedge_deadline():
+    primary = _Stream(["slow"], first_chunk_delay=5)
+
+    async def open_primary():
+        return primary
+
+    async def scenario():
+        race = race_first_chunk([open_primary, open_primary], 1, 10)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(race, timeout=0.05)
+
+    asyncio.run(scenario())
+
+    assert primary.closed
+
+
+def _patch_main_stream(monkeypatch, providers):
+    monkeypatch.setattr(llm_utils, "_get_provider_client", lambda prefix: providers.get(prefix))
+    monkeypatch.setattr(
+        llm_utils, "resolve_default_server_from_provider_config",
+        lambda model_id: ("primary", "primary/model-a") if model_id == "google/model-a" else (None, None),
+    )
+    monkeypatch.setattr(
+        llm_utils, "resolve_fallback_servers_from_provider_config",
+        lambda model_id: ["fallback/model-a"] if model_id == "google/model-a" else [],
+    )
+    monkeypatch.setattr(llm_utils, "_transform_message_history_for_llm", lambda message_history: message_history)
+    monkeypatch.setattr(llm_utils, "_is_reasoning_model", lambda _model_id: False)
+    tracker = ProviderHealthTracker("test-main")
+    monkeypatch.setattr(llm_utils, "main_stream_health", tracker)
+    return tracker
+
+
+def _consume_main_stream():
+    async def consume():
+        stream = llm_utils.call_main_llm_stream(
+            task_id="task-1", model_id="google/model-a", system_prompt="system",
+            message_history=[{"role": "user", "content": "hello"}], temperature=0.2,
+        )
+        return [chunk async for chunk in stream]
+
+    return asyncio.run(consume())
+
+
+def test_main_stream_hedges_a_stalled_primary_and_records_health(monkeypatch, hedging):
+    primary_stream = _Stream(["primary answer"], first_chunk_delay=5)
+    calls = []
+
+    async def primary_provider(**kwargs):
+        calls.append(("primary", kwargs["model_id"]))
+        return primary_stream
+
+    async def fallback_provider(**kwargs):
+        calls.append(("fallback", kwargs["model_id"]))
+        return _Stream(["Hedged ", "answer"])
+
+    tracker = _patch_main_stream(monkeypatch, {"primary": primary_provider, "fallback": fallback_provider})
+    _record_latencies(tracker, "primary/model-a", 0.02)
+
+    chunks = _consume_main_stream()
+
+    assert chunks == ["Hedged ", "answer"]
+    assert calls == [("primary", "model-a"), ("fallback", "model-a")]
+    assert primary_stream.closed
+    assert tracker.snapshot()["fallback/model-a"]["samples"] == 1
+    assert tracker.has_recent_success("fallback") and not tracker.has_recent_success("primary")
+
+
+class _FailingStream(_Stream):
+    """Stream whose first chunk fails after a delay."""
+
+    async def __anext__(self):
+        await asyncio.sleep(self.first_chunk_delay)
+        raise ConnectionError("503 service unavailable")
+
+
+def _record_outcomes(monkeypatch, tracker):
+    outcomes = []
+    record_outcome = tracker.record_outcome
+
+    def recording(server_model_id, ok, provider_prefix=None):
+        outcomes.append((server_model_id, ok))
+        record_outcome(server_model_id, ok, provider_prefix)
+
+    monkeypatch.setattr(tracker, "record_outcome", recording)
+    return outcomes
+
+
+def test_main_stream_records_a_primary_failure_once_whichever_request_wins(monkeypatch, hedging):
+    async def primary_provider(**kwargs):
+        return _FailingStream([], first_chunk_delay=0.05)
+
+    async def fallback_provider(**kwargs):
+        return _Stream(["Hedged answer"], first_chunk_delay=0.2)
+
+    tracker = _patch_main_stream(monkeypatch, {"primary": primary_provider, "fallback": fallback_provider})
+    _record_latencies(tracker, "primary/model-a", 0.02)
+    outcomes = _record_outcomes(monkeypatch, tracker)
+
+    # The primary fails after the hedge started; the hedge still wins
+    assert _consume_main_stream() == ["Hedged answer"]
+    assert outcomes == [("primary/model-a", False), ("fallback/model-a", True)]
+
+    # Both fail: the re-raised primary error is not counted a second time
+    async def failing_fallback_provider(**kwargs):
+        return _FailingStream([], first_chunk_delay=0.1)
+
+    _patch_main_stream(monkeypatch, {"primary": primary_provider, "fallback": failing_fallback_provider})
+    monkeypatch.setattr(llm_utils, "main_stream_health", tracker)
+    outcomes.clear()
+    with pytest.raises(llm_utils.AllServersFailedError):
+        _consume_main_stream()
+    assert sorted(outcomes) == [("fallback/model-a", False), ("primary/model-a", False)]
+
+
+def test_main_stream_tries_servers_in_order_without_hedging(monkeypatch):
+    calls = []
+
+    async def primary_provider(**kwargs):
+        calls.append("primary")
+        raise ConnectionError("503 service unavailable")
+
+    async def fallback_provider(**kwargs):
+        calls.append("fallback")
+        return _Stream(["answer"])
+
+    tracker = _patch_main_stream(monkeypatch, {"primary": primary_provider, "fallback": fallback_provider})
+    _record_latencies(tracker, "primary/model-a", 0.02)
+
+    assert _consume_main_stream() == ["answer"]
+    assert calls == ["primary", "fallback"]
+
+    # Once the primary is degraded on live traffic, the fallback is tried first
+    for _ in range(3):
+        tracker.record_outcome("primary/model-a", False)
+    calls.clear()
+    assert _consume_main_stream() == ["answer"]
+    assert calls == ["fallback"]
+
+
+def test_preprocessing_hedge_returns_the_first_successful_provider(monkeypatch, hedging):
+    calls = []
+    cancelled = []
+
+    def make_provider(name, delay):
+        async def provider(**kwargs):
+            calls.append(name)
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(name)
+                raise
+            return UnifiedOpenAIResponse(
+                task_id=kwargs["task_id"], model_id=kwargs["model_id"], success=True,
+                tool_calls_made=[ParsedOpenAIToolCall(
+                    tool_call_id="call-1", function_name="analyze_request_properties",
+                    function_arguments_raw="{}", function_arguments_parsed={"answered_by": name},
+                )],
+            )
+        return provider
+
+    providers = {"slow": make_provider("slow", 5), "quick": make_provider("quick", 0)}
+    monkeypatch.setattr(llm_utils, "_get_provider_client", lambda prefix: providers.get(prefix))
+    monkeypatch.setattr(llm_utils, "resolve_default_server_from_provider_config", lambda model_id: (None, None))
+    monkeypatch.setattr(llm_utils, "_transform_message_history_for_llm", lambda message_history: message_history)
+    tracker = ProviderHealthTracker("test-preprocessing")
+    monkeypatch.setattr(llm_utils, "preprocessing_health", tracker)
+    _record_latencies(tracker, "slow/model", 0.02)
+
+    result = asyncio.run(llm_utils.call_preprocessing_llm(
+        task_id="task-1", model_id="slow/model",
+        message_history=[{"role": "user", "content": "hello"}],
+        tool_definition={"type": "function", "function": {
+            "name": "analyze_request_properties", "description": "Analyze", "parameters": {"type": "object"},
+        }},
+        fallback_models=["quick/model"],
+    ))
+
+    assert result.arguments == {"answered_by": "quick"}
+    assert calls == ["slow", "quick"] and cancelled == ["slow"]
+    assert tracker.has_recent_success("quick")
+
+
+def test_preprocessing_cancels_the_primary_when_cancelled_before_hedging(monkeypatch, hedging):
+    cancelled = []
+
+    async def slow_provider(**kwargs):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(kwargs["model_id"])
+            raise
+
+    monkeypatch.setattr(llm_utils, "_get_provider_client", lambda prefix: slow_provider)
+    monkeypatch.setattr(llm_utils, "resolve_default_server_from_provider_config", lambda model_id: (None, None))
+    monkeypatch.setattr(llm_utils, "_transform_message_history_for_llm", lambda message_history: message_history)
+    tracker = ProviderHealthTracker("test-preprocessing")
+    monkeypatch.setattr(llm_utils, "preprocessing_health", tracker)
+    _record_latencies(tracker, "slow/model", 1.0)
+
+    async def scenario():
+        call = llm_utils.call_preprocessing_llm(
+            task_id="task-1", model_id="slow/model",
+            message_history=[{"role": "user", "content": "hello"}],
+            tool_definition={"type": "function", "function": {
+                "name": "analyze_request_properties", "description": "Analyze", "parameters": {"type": "object"},
+            }},
+            fallback_models=["quick/model"],
+        )
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(call, timeout=0.05)
+        # Checked before asyncio.run() cancels leftover tasks on shutdown
+        return list(cancelled)
+
+    assert asyncio.run(scenario()) == ["model"]
@@ -0,0 +1,194 @@
+# backend/tests/test_pdf_page_pipeline.py
+#
+# Tests for the bounded-concurrency PDF page pipeline
+# (apps/pdf/services/page_pipeline.py): pages are checked and stored as they are
+# rendered with at most `workers` in flight, a rejected page stops the pipeline
+# without pulling further pages, provider requests are spaced by the rate
+# limiter, and progress is throttled with a final report. Also covers the
+# page-by-page screenshot generator in screenshot_service.
+
+import asyncio
+
+import fitz
+import pytest
+
+from backend.apps.pdf.services import page_pipeline
+from backend.apps.pdf.services.page_pipeline import (
+    PageRejectedError,
+    ProviderRateLimiter,
+    run_page_pipeline,
+)
+from backend.apps.pdf.services.screenshot_service import iter_pdf_pages, render_pdf_pages
+
+
+class _PageSource:
+    """Page generator that records how many pages were pulled and whether it was closed."""
+
+    def __init__(self, page_count):
+        self.page_count = page_count
+        self.pulled = 0
+        self.closed = False
+
+    def __iter__(self):
+        try:
+            for page_num in range(1, self.page_count + 1):
+                self.pulled += 1
+                yield page_num, f"png-{page_num}".encode()
+        finally:
+            self.closed = True
+
+
+def _pages(page_count):
+    source = _PageSource(page_count)
+    return source, iter(source)
+
+
+def test_pipeline_stores_every_page_with_bounded_concurrency():
+    source, pages = _pages(20)
+    in_flight = {"now": 0, "max": 0}
+    checked = []
+
+    async def check_page(page_num, png_bytes):
+        checked.append(page_num)
+
+    async def store_page(page_num, png_bytes):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        # Later pages finish first, so the result must be re-ordered
+        await asyncio.sleep(0.02 / page_num)
+        in_flight["now"] -= 1
+        return f"key-{page_num}-{png_bytes.decode()}"
+
+    stored = asyncio.run(run_page_pipeline(pages, 20, store_page, check_page=check_page, workers=4))
+
+    assert list(stored) == list(range(1, 21))
+    assert stored[7] == "key-7-png-7"
+    assert sorted(checked) == list(range(1, 21))
+    assert 1 < in_flight["max"] <= 4
+    assert source.closed
+
+
+def test_rejected_page_aborts_without_storing_it_or_pulling_more_pages():
+    source, pages = _pages(50)
+    stored_pages = []
+    cancelled = []
+
+    async def check_page(page_num, png_bytes):
+        if page_num == 3:
+            raise PageRejectedError(page_num, "nudity")
+
+    async def store_page(page_num, png_bytes):
+        try:
+            await asyncio.sleep(0 if page_num < 3 else 5)
+        except asyncio.CancelledError:
+            cancelled.append(page_num)
+            raise
+        stored_pages.append(page_num)
+        return f"key-{page_num}"
+
+    with pytest.raises(PageRejectedError, match="detected on page 3") as exc_info:
+        asyncio.run(run_page_pipeline(pages, 50, store_page, check_page=check_page, workers=2))
+
+    assert exc_info.value.reason == "nudity"
+    assert 3 not in stored_pages and 3 not in cancelled
+    # Only pages handed to the two workers before the rejection were pulled
+    assert source.pulled <= 5
+    assert source.closed
+
+
+def test_rate_limiter_caps_concurrency_and_spaces_request_starts(monkeypatch):
+    # Frozen clock: every start slot is reserved relative to the same instant, so
+    # the limiter's waits are exactly the slot offsets, independent of scheduling
+    limiter = ProviderRateLimiter(max_concurrency=2, max_per_second=50, clock=lambda: 100.0)
+    real_sleep = asyncio.sleep
+    waits = []
+    active = {"now": 0, "max": 0}
+
+    async def recording_sleep(delay):
+        waits.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(page_pipeline.asyncio, "sleep", recording_sleep)
+
+    async def request():
+        async with limiter:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+            await real_sleep(0.01)
+            active["now"] -= 1
+
+    async def scenario():
+        await asyncio.gather(*(request() for _ in range(6)))
+
+    asyncio.run(scenario())
+
+    assert active["max"] == 2
+    # The first request starts at once, the others wait for slots 20 ms apart
+    assert sorted(waits) == pytest.approx([0.02, 0.04, 0.06, 0.08, 0.10])
+
+
+def test_rate_limiter_takes_request_starts_from_a_shared_limiter(monkeypatch):
+    starts = []
+
+    async def acquire_start():
+        starts.append(1)
+
+    async def failing_sleep(delay):
+        raise AssertionError(f"local spacing used ({delay}s)")
+
+    monkeypatch.setattr(page_pipeline.asyncio, "sleep", failing_sleep)
+    limiter = ProviderRateLimiter(
+        max_concurrency=2, max_per_second=50, clock=lambda: 100.0, acquire_start=acquire_start
+    )
+
+    async def scenario():
+        for _ in range(3):
+            async with limiter:
+                pass
+
+    asyncio.run(scenario())
+
+    assert len(starts) == 3
+
+
+def test_progress_is_throttled_and_always_reports_completion(monkeypatch):
+    monkeypatch.setattr(page_pipeline, "PROGRESS_MIN_INTERVAL_SECONDS", 60.0)
+    _, pages = _pages(12)
+    reports = []
+
+    async def store_page(page_num, png_bytes):
+        return f"key-{page_num}"
+
+    async def on_progress(pages_processed, page_count):
+        reports.append((pages_processed, page_count))
+        if len(reports) == 1:
+            raise ConnectionError("websocket gone")
+
+    stored = asyncio.run(run_page_pipeline(pages, 12, store_page, on_progress=on_progress, workers=3))
+
+    assert len(stored) == 12
+    # First page reports immediately, the rest are throttled except the final one
+    assert reports == [(1, 12), (12, 12)]
+
+
+def _make_pdf(page_count):
+    doc = fitz.open()
+    for page_num in range(page_count):
+        page = doc.new_page(width=200, height=200)
+        page.insert_text((20, 40), f"Page {page_num + 1}")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def test_iter_pdf_pages_yields_pngs_one_page_at_a_time():
+    pdf_bytes = _make_pdf(3)
+
+    pages = iter_pdf_pages(pdf_bytes)
+    page_num, png_bytes = next(pages)
+    assert page_num == 1 and png_bytes.startswith(b"\x89PNG")
+    pages.close()
+
+    rendered = render_pdf_pages(pdf_bytes)
+    assert list(rendered) == [1, 2, 3]
+    assert all(png.startswith(b"\x89PNG") for png in rendered.values())
@@ -0,0 +1,188 @@
+# backend/tests/test_pdf_search_index.py
+#
+# Tests for the pdf.search inverted index (apps/pdf/services/search_index.py):
+# BM25 ranking and postings, the decrypted-index LRU, and the end-to-end path
+# from process_task's encrypted index upload to SearchSkill loading only the
+# shards and text blocks a query needs (with the OCR blob scan as fallback).
+
+import asyncio
+import json
+import os
+import types
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from backend.apps.pdf.services import search_index
+from backend.apps.pdf.services.search_index import (
+    DecryptedIndexCache,
+    build_search_index,
+    decode_index_part,
+    encode_index_part,
+    query_terms,
+    rank_pages,
+    shard_for_term,
+)
+from backend.apps.pdf.skills.search_skill import SearchSkill
+from backend.apps.pdf.tasks import process_task
+
+
+def _pages(page_count):
+    pages = {page_num: f"Filler text for page {page_num}. Nothing to see here." for page_num in range(1, page_count + 1)}
+    pages[7] = "Revenue grew. Revenue, revenue and more REVENUE in the annual report."
+    pages[12] = "The annual report mentions revenue once among many other words " + "padding " * 40
+    pages[30] = "Net income was positive; the annual net income rose."
+    return pages
+
+
+def test_bm25_ranks_dense_short_pages_first_and_postings_hold_offsets():
+    index = build_search_index(_pages(40))
+    manifest = index.manifest
+
+    def postings_for(query):
+        return {
+            term: index.shards[shard_for_term(term, len(index.shards))].get(term, [])
+            for term in query_terms(query)
+        }
+
+    ranked = rank_pages(manifest, postings_for("Revenue"))
+    assert [page_num for page_num, _ in ranked] == [7, 12]
+
+    revenue_postings = postings_for("revenue")["revenue"]
+    page_7 = next(posting for posting in revenue_postings if posting[0] == 7)
+    assert page_7[1:] == [0, 14, 23, 40]
+
+    # Pages matching both terms beat pages matching one
+    ranked = rank_pages(manifest, postings_for("annual income"))
+    assert ranked[0][0] == 30 and {page_num for page_num, _ in ranked} == {7, 12, 30}
+    assert rank_pages(manifest, postings_for("absent")) == []
+
+    assert manifest["page_count"] == 40 and len(index.text_blocks) == 3
+    assert manifest["text_blocks"][2] == {"first_page": 33, "last_page": 40, "key": None}
+    assert decode_index_part(encode_index_part(index.shards[0])) == index.shards[0]
+
+
+def test_decrypted_index_cache_is_a_byte_bounded_lru_with_ttl(monkeypatch):
+    cache = DecryptedIndexCache(max_bytes=100, ttl_seconds=60)
+    cache.put("a", {"part": "a"}, 40)
+    cache.put("b", {"part": "b"}, 40)
+    assert cache.get("a") == {"part": "a"}
+    cache.put("c", {"part": "c"}, 40)
+
+    assert cache.get("b") is None and cache.get("a") and cache.get("c")
+    assert cache.stats["evictions"] == 1
+    cache.put("huge", {}, 1000)
+    assert cache.get("huge") is None
+
+    now = search_index.time.monotonic()
+    monkeypatch.setattr(search_index.time, "monotonic", lambda: now + 120)
+    assert cache.get("a") is None
+
+
+class _FakeS3:
+    def __init__(self):
+        self.objects = {}
+        self.downloads = []
+
+    async def upload_file(self, bucket_key, file_key, content, content_type):
+        self.objects[file_key] = content
+
+
+class _IndexedSearchSkill(SearchSkill):
+    def __init__(self, s3, embed_content, aes_key):
+        super().__init__(app=None, app_id="pdf", skill_id="search", skill_name="Search", skill_description="")
+        self.s3 = s3
+        self.embed_content = embed_content
+        self.aes_key = aes_key
+        self.unwraps = 0
+
+    async def _lookup_embed_content(self, embed_id, user_vault_key_id):
+        return self.embed_content
+
+    async def _unwrap_aes_key(self, vault_wrapped_aes_key, vault_key_id):
+        self.unwraps += 1
+        return self.aes_key
+
+    async def _download_from_s3(self, s3_key):
+        self.s3.downloads.append(s3_key)
+        return self.s3.objects[s3_key]
+
+
+def _indexed_pdf(monkeypatch, pages):
+    monkeypatch.setattr(search_index, "TERMS_PER_SHARD", 5)
+    search_index.decrypted_index_cache.clear()
+    aes_key = AESGCM.generate_key(bit_length=256)
+    aesgcm = AESGCM(aes_key)
+    s3 = _FakeS3()
+    task = types.SimpleNamespace(_s3_service=s3)
+    created_keys = []
+
+    index_key = asyncio.run(process_task._upload_search_index(
+        task=task, pages=pages, output_aesgcm=aesgcm, key_prefix="chatfiles/u/pdf",
+        created_s3_keys=created_keys, log_prefix="[test]",
+    ))
+
+    ocr_blob = json.dumps({"pages": {str(page_num): {"markdown": md} for page_num, md in pages.items()}}).encode()
+    nonce = os.urandom(12)
+    s3.objects["chatfiles/u/pdf_ocr.json.bin"] = nonce + aesgcm.encrypt(nonce, ocr_blob, None)
+    embed_content = {
+        "vault_wrapped_aes_key": "vault:v1:wrapped",
+        "ocr_data_s3_key": "chatfiles/u/pdf_ocr.json.bin",
+        "search_index_s3_key": index_key,
+    }
+    return s3, created_keys, index_key, _IndexedSearchSkill(s3, embed_content, aes_key)
+
+
+def _search(skill, query):
+    return asyncio.run(skill.execute(
+        file_path="report.pdf", query=query, context_chars=10,
+        file_path_index={"report.pdf": "embed-1234"}, user_vault_key_id="vk",
+    ))
+
+
+def test_search_skill_loads_only_needed_index_parts_and_serves_repeats_from_cache(monkeypatch):
+    s3, created_keys, index_key, skill = _indexed_pdf(monkeypatch, _pages(40))
+    shard_keys = [key for key in created_keys if "_index_s" in key]
+    assert index_key == created_keys[-1] and len(shard_keys) > 3
+
+    result = _search(skill, "revenue")
+
+    assert result["success"] and result["matches"][0]["page_num"] == 7
+    assert [match["char_offset"] for match in result["matches"][:4]] == [0, 14, 23, 40]
+    assert result["matches"][0]["match_text"] == "Revenue" and result["matches"][0]["score"] > 0
+    assert result["matches"][-1]["page_num"] == 12
+    # Manifest, one shard, one text block (pages 1-16) — never the OCR blob
+    assert s3.downloads == [index_key, shard_keys[shard_for_term("revenue", len(shard_keys))],
+                            "chatfiles/u/pdf_index_t0.json.bin"]
+
+    s3.downloads.clear()
+    repeat = _search(skill, "Revenue")
+    assert repeat["matches"] == result["matches"]
+    assert s3.downloads == [] and skill.unwraps == 1
+
+
+def test_search_skill_reports_term_hits_and_falls_back_to_substring_scan(monkeypatch):
+    s3, _, _, skill = _indexed_pdf(monkeypatch, _pages(40))
+
+    # Both terms on page 30, but never as the exact phrase
+    terms = _search(skill, "income annual")
+    assert terms["matches"][0]["page_num"] == 30
+    assert [match["match_text"] for match in terms["matches"] if match["page_num"] == 30] == [
+        "income", "annual", "income",
+    ]
+
+    # Partial word: no token hit, so the OCR blob is scanned like before
+    partial = _search(skill, "evenu")
+    assert partial["success"] and partial["matches"][0]["page_num"] == 7
+    assert "chatfiles/u/pdf_ocr.json.bin" in s3.downloads
+
+
+def test_search_skill_falls_back_to_ocr_blob_when_the_index_is_unreadable(monkeypatch):
+    s3, created_keys, _, skill = _indexed_pdf(monkeypatch, _pages(40))
+    for key in created_keys:
+        if "_index_s" in key:
+            s3.objects[key] = b"corrupt"
+
+    result = _search(skill, "revenue")
+
+    assert result["success"] and result["matches"][0]["page_num"] == 7
+    assert s3.downloads[-1] == "chatfiles/u/pdf_ocr.json.bin"
@@ -289,3 +289,98 @@ async def test_phase1_full_content_ids_are_limited_to_recent_parent_chats(doc_as
     assert "preview-0" in sent_metadata_ids
     assert "sub-0" not in content_ids
     assert "last-sub" not in content_ids
+
+
+@pytest.mark.anyio
+async def test_phase3_fetches_each_batch_with_bulk_queries(monkeypatch) -> None:
+    import asyncio
+
+    chat_ids = [f"chat-{idx}" for idx in range(25)]
+    cached_ids = set(chat_ids[:5])
+    calls = {"messages": [], "checkpoints": 0, "embeds": [], "cache_reads": 0}
+    in_flight = {"now": 0, "max": 0}
+
+    class FakeCache:
+        async def get_chat_ids_versions(self, user_id, start=0, end=99, with_scores=False):
+            return chat_ids
+
+        async def get_batch_chat_versions(self, user_id, ids):
+            return {}
+
+        async def get_sync_messages_histories(self, user_id, ids):
+            calls["cache_reads"] += 1
+            return {chat_id: ([f"cached:{chat_id}"] if chat_id in cached_ids else []) for chat_id in ids}
+
+        async def get_sync_embeds_for_chats(self, ids):
+            return {chat_id: [] for chat_id in ids}
+
+        async def clear_all_sync_messages_for_user(self, user_id):
+            return 0
+
+    class FakeDirectusChat:
+        async def get_messages_for_chats(self, ids, decrypt_content=False):
+            calls["messages"].append(list(ids))
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            await asyncio.sleep(0.01)
+            in_flight["now"] -= 1
+            return {chat_id: [f"db:{chat_id}"] for chat_id in ids}
+
+    class FakeDirectusEmbed:
+        async def get_embeds_by_hashed_chat_ids(self, hashed_ids):
+            calls["embeds"].append(len(hashed_ids))
+            return []
+
+        async def get_embed_keys_by_hashed_chat_ids_batch(self, hashed_ids):
+            return []
+
+    class FakeDirectus:
+        chat = FakeDirectusChat()
+        embed = FakeDirectusEmbed()
+
+        async def get_items(self, collection, params, admin_required=True):
+            if collection == "chat_compression_checkpoints":
+                calls["checkpoints"] += 1
+                return [
+                    {"id": "new", "chat_id": "chat-7"},
+                    {"id": "old", "chat_id": "chat-7"},
+                ]
+            return []
+
+    async def no_app_settings(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(phased_sync_handler, "_handle_app_settings_memories_sync", no_app_settings)
+    manager = SimpleNamespace(sent=[])
+
+    async def send_personal_message(message, user_id, device_fingerprint_hash):
+        manager.sent.append(message)
+
+    manager.send_personal_message = send_personal_message
+
+    await phased_sync_handler._handle_phase3_sync(
+        manager=manager,
+        cache_service=FakeCache(),
+        directus_service=FakeDirectus(),
+        user_id="user-1",
+        device_fingerprint_hash="device-1",
+        client_chat_versions={},
+        client_chat_ids=[],
+        sent_embed_ids=set(),
+    )
+
+    batches = [m["payload"] for m in manager.sent if m["type"] == "background_message_sync"]
+    assert [b["batch_number"] for b in batches] == [1, 2, 3]
+    assert [b["is_last_batch"] for b in batches] == [False, False, True]
+    sent_chats = [chat for batch in batches for chat in batch["chats"]]
+    assert [chat["chat_id"] for chat in sent_chats] == chat_ids
+    assert sent_chats[0]["messages"] == ["cached:chat-0"]
+    assert sent_chats[5]["messages"] == ["db:chat-5"]
+    assert sent_chats[7]["compression_checkpoints"] == [{"id": "new", "chat_id": "chat-7"}]
+
+    # One cache pipeline, one message query and one checkpoint query per batch
+    assert calls["cache_reads"] == 3
+    assert calls["messages"] == [chat_ids[5:10], chat_ids[10:20], chat_ids[20:25]]
+    assert calls["checkpoints"] == 3
+    assert calls["embeds"] == [10, 10, 5]
+    assert 1 < in_flight["max"] <= phased_sync_handler.PHASE3_BATCH_CONCURRENCY
@@ -5,16 +5,25 @@
 # with pickle and has an unresolved unsafe-deserialization advisory.
 #
 # These tests cover the security-relevant replacement behavior: binary and JSON
-# roundtrips, TTL expiry, and size-based least-recently-used eviction.
+# roundtrips, TTL expiry, and size-based least-recently-used eviction, plus the
+# sharded layout (file-backed blobs, running size totals, batched LRU touches)
+# and a hit/miss throughput benchmark against the previous single-database cache.
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import importlib
+import os
 from pathlib import Path
+import sqlite3
 import sys
+import threading
 import time
 import types
 
+import pytest
+
 
 def _load_cache_module(monkeypatch, tmp_path):
     class _Settings:
@@ -88,3 +97,148 @@ def test_sqlite_cache_evicts_least_recently_used_entry(monkeypatch, tmp_path):
     assert cache.volume() <= 8
 
     cache.close()
+
+
+def test_sqlite_cache_stores_large_values_as_files_and_tracks_size(monkeypatch, tmp_path):
+    cache_module = _load_cache_module(monkeypatch, tmp_path)
+    monkeypatch.setattr(cache_module, "BLOB_FILE_THRESHOLD_BYTES", 16)
+    monkeypatch.setattr(cache_module, "MMAP_READ_THRESHOLD_BYTES", 32)
+    directory = str(tmp_path / "cache")
+    cache = cache_module._SqliteCache(directory, size_limit=10_000, shard_count=4)
+
+    cache.set_binary("small", b"tiny", "text/plain", ttl=60)
+    cache.set_binary("medium", b"m" * 20, "image/png", ttl=60)
+    cache.set_binary("large", b"l" * 64, "image/png", ttl=60)
+    blob_files = [name for shard in cache._shards for name in os.listdir(shard.blob_dir)]
+
+    assert sorted(blob_files) == ["large", "medium"]
+    assert cache.get_binary("large") == (b"l" * 64, "image/png")
+    assert cache.get_binary("medium") == (b"m" * 20, "image/png")
+
+    # Shrinking a file-backed value moves it inline and removes its file
+    cache.set_binary("large", b"inline", "text/plain", ttl=60)
+    assert cache.get_binary("large") == (b"inline", "text/plain")
+    assert sorted(name for shard in cache._shards for name in os.listdir(shard.blob_dir)) == ["medium"]
+    assert cache.volume() == len(b"tiny") + 20 + len(b"inline")
+    cache.close()
+
+    # Running totals are rebuilt from the shards on reopen
+    reopened = cache_module._SqliteCache(directory, size_limit=10_000, shard_count=4)
+    assert reopened.volume() == len(b"tiny") + 20 + len(b"inline")
+    assert reopened.count() == 3
+    reopened.close()
+
+
+def test_sqlite_cache_batches_lru_touches(monkeypatch, tmp_path):
+    cache_module = _load_cache_module(monkeypatch, tmp_path)
+    cache = cache_module._SqliteCache(str(tmp_path / "cache"), size_limit=10, shard_count=2)
+
+    cache.set_binary("a", b"12345", "text/plain", ttl=60)
+    time.sleep(0.01)
+    cache.set_binary("b", b"67890", "text/plain", ttl=60)
+    time.sleep(0.01)
+    statements = []
+    for shard in cache._shards:
+        shard.conn.set_trace_callback(statements.append)
+    assert cache.get_binary("a") == (b"12345", "text/plain")
+
+    # The hit only buffers the touch ...
+    assert not any(statement.startswith("UPDATE") for statement in statements)
+    # ... which is written before eviction picks the least recently used entry
+    cache.set_binary("c", b"abcde", "text/plain", ttl=60)
+    assert cache.get_binary("b") is None
+    assert cache.get_binary("a") == (b"12345", "text/plain")
+    assert cache.volume() <= 10
+    cache.close()
+
+
+def test_cache_service_image_variants_by_key_run_off_the_event_loop(monkeypatch, tmp_path):
+    cache_module = _load_cache_module(monkeypatch, tmp_path)
+    service = cache_module.CacheService()
+    threads = []
+    original_get_binary = service._image_cache.get_binary
+
+    def recording_get_binary(key):
+        threads.append(threading.current_thread())
+        return original_get_binary(key)
+
+    monkeypatch.setattr(service._image_cache, "get_binary", recording_get_binary)
+
+    async def scenario():
+        assert await service.set_image_by_key("variant-key", b"png-bytes", "image/png")
+        return await service.get_image_by_key("variant-key"), await service.get_image_by_key("missing")
+
+    assert asyncio.run(scenario()) == ((b"png-bytes", "image/png"), None)
+    assert threads and all(thread is not threading.main_thread() for thread in threads)
+    service.close()
+
+
+class _LegacySqliteCache:
+    """The previous single-database cache: SUM scan per write, UPDATE + COMMIT per hit."""
+
+    def __init__(self, directory, size_limit):
+        os.makedirs(directory, exist_ok=True)
+        self._size_limit = size_limit
+        self._conn = sqlite3.connect(os.path.join(directory, "legacy.sqlite3"))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE cache_entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, content_type TEXT,"
+            " expires_at REAL NOT NULL, updated_at REAL NOT NULL, size_bytes INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX idx_updated_at ON cache_entries(updated_at)")
+
+    def get_binary(self, key):
+        row = self._conn.execute(
+            "SELECT value, content_type, expires_at FROM cache_entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn.execute("UPDATE cache_entries SET updated_at = ? WHERE key = ?", (time.time(), key))
+        self._conn.commit()
+        return bytes(row[0]), row[1]
+
+    def set_binary(self, key, data, content_type, ttl):
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?, ?)",
+            (key, data, content_type, now + ttl, now, len(data)),
+        )
+        self._conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+        while self._conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM cache_entries").fetchone()[0] > self._size_limit:
+            oldest = self._conn.execute("SELECT key FROM cache_entries ORDER BY updated_at LIMIT 1").fetchone()
+            self._conn.execute("DELETE FROM cache_entries WHERE key = ?", (oldest[0],))
+        self._conn.commit()
+
+
+@pytest.mark.benchmark
+def test_benchmark_image_cache_hit_and_miss_throughput(monkeypatch, tmp_path):
+    cache_module = _load_cache_module(monkeypatch, tmp_path)
+    one_gb = 1024 * 1024 * 1024
+    image = bytes(range(256)) * 160  # 40 KB, typical processed preview image
+    keys = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(600)]
+
+    def run(cache, label):
+        started = time.perf_counter()
+        for key in keys:
+            cache.set_binary(key, image, "image/webp", ttl=600)
+        writes = len(keys) / (time.perf_counter() - started)
+        started = time.perf_counter()
+        for key in keys * 2:
+            assert cache.get_binary(key) is not None
+        hits = 2 * len(keys) / (time.perf_counter() - started)
+        started = time.perf_counter()
+        for key in keys:
+            assert cache.get_binary(key + "-missing") is None
+        misses = len(keys) / (time.perf_counter() - started)
+        print(f"\n{label}: {writes:,.0f} writes/s, {hits:,.0f} hits/s, {misses:,.0f} misses/s")
+        return writes, hits
+
+    sharded = cache_module._SqliteCache(str(tmp_path / "sharded"), size_limit=one_gb)
+    legacy = _LegacySqliteCache(str(tmp_path / "legacy"), size_limit=one_gb)
+    sharded_writes, sharded_hits = run(sharded, "sharded, 1 GB limit")
+    legacy_writes, legacy_hits = run(legacy, "legacy, 1 GB limit")
+    sharded.close()
+
+    assert sharded_hits > legacy_hits
+    assert sharded_writes > legacy_writes
@@ -547,3 +547,82 @@ class TestVerifyAndStripBadQuotes:
         ))
 
         assert verified == response
+
+    def test_each_embed_is_decrypted_once_for_many_quotes(self, monkeypatch):
+        from toon_format import encode
+
+        parent_embed_id = "parent-embed"
+        child_ids = [f"child-{i}" for i in range(3)]
+        descriptions = [f"Source {i} says the harvest of year {2000 + i} was the largest on record." for i in range(3)]
+        encoded_by_id = {parent_embed_id: encode({"embed_ids": "|".join(child_ids)})}
+        for i, child_id in enumerate(child_ids):
+            encoded_by_id[child_id] = encode({"embed_ref": f"source-{i}", "description": descriptions[i]})
+        decrypt_calls = []
+
+        async def fake_get_cached_embed_toon(self, embed_id, user_vault_key_id, log_prefix=""):
+            decrypt_calls.append(embed_id)
+            return encoded_by_id.get(embed_id)
+
+        monkeypatch.setattr(EmbedService, "_get_cached_embed_toon", fake_get_cached_embed_toon)
+
+        quotes = []
+        for i in range(3):
+            quotes.append(f"> [{descriptions[i][:40]}](embed:source-{i})")
+            quotes.append(f"> [the harvest of year {2000 + i}](embed:source-{i})")
+            quotes.append(f"> [the harvest of year 1999 was](embed:source-{i})")
+        response = "Answer.\n\n" + "\n\n".join(quotes)
+
+        cache_service, directus_service, encryption_service = _quote_verification_services()
+        verified = _run(_verify_and_strip_bad_quotes(
+            aggregated_response=response,
+            tool_calls_info=[{"embed_id": parent_embed_id}],
+            cache_service=cache_service,
+            directus_service=directus_service,
+            encryption_service=encryption_service,
+            user_vault_key_id="key-1",
+            known_valid_refs=set(),
+        ))
+
+        assert sorted(decrypt_calls) == sorted([parent_embed_id] + child_ids)
+        assert "1999" not in verified
+        assert verified.count("> [") == 6
+
+
+# ---------------------------------------------------------------------------
+# 6. REQUEST-SCOPED EMBED CONTENT CACHE
+# ---------------------------------------------------------------------------
+
+
+class TestEmbedContentCache:
+
+    def test_quote_index_matches_plain_substring_search(self):
+        from backend.core.api.app.services.embed_content_cache import QuoteIndex
+
+        text = EmbedService._normalize_for_quote_comparison(
+            "The “quick” brown fox — jumps over the lazy dog.\nNew line  here."
+        )
+        index = QuoteIndex(text)
+        candidates = [text[start:end] for start in range(0, len(text), 3) for end in range(start + 1, len(text) + 1, 4)]
+        candidates += ["brown cat jumps", "fox - jumps over", "lazy dog.\nnew", "the quick brown"]
+        for quote in candidates:
+            assert index.contains(quote) == (quote in text), quote
+
+    def test_cache_is_bounded_and_caches_misses(self):
+        from backend.core.api.app.services.embed_content_cache import EmbedContentCache
+
+        svc = _make_embed_service({"description": "x" * 400})
+        # One embed (TOON + decoded content + quote index) takes ~1.6 KB
+        cache = EmbedContentCache(max_bytes=2000)
+
+        async def scenario():
+            for embed_id in ("a", "b", "c", "a"):
+                assert await cache.get_quote_index(svc, embed_id, "key-1") is not None
+            svc._get_cached_embed_toon.return_value = None
+            assert await cache.get_toon(svc, "missing", "key-1") is None
+            assert await cache.get_toon(svc, "missing", "key-1") is None
+
+        _run(scenario())
+        assert cache._size <= cache.max_bytes
+        assert cache.stats["evictions"] >= 1
+        # "a" was evicted before its second read, "missing" is fetched only once
+        assert svc._get_cached_embed_toon.await_count == 5
@@ -1,23 +1,30 @@
 # backend/tests/test_rate_limiting.py
 #
 # Unit tests for the rate limiting module that enforces provider API rate limits
-# using Dragonfly cache-based sliding window counters.
+# using Dragonfly token buckets leased in batches by each worker process.
 #
 # Tests cover: provider config loading, rate limit checking (allowed/exceeded/no-config),
-# the wait-for-rate-limit loop, and the RateLimitScheduledException.
+# token refill, lease batching and hand-back, per-model buckets, throttling metrics,
+# the wait-for-rate-limit loop, caller-configured buckets, and the RateLimitScheduledException.
+# The token bucket Lua script runs for real on fakeredis (Lua via lupa).
 #
 # Architecture: docs/architecture/app_skills.md (rate limiting section)
 # Run: python -m pytest backend/tests/test_rate_limiting.py -v
 
 import asyncio
+from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock
 
+import fakeredis
 import pytest
 
 try:
+    from backend.apps.ai.processing import rate_limiting
     from backend.apps.ai.processing.rate_limiting import (
         _get_provider_rate_limit,
         check_rate_limit,
+        get_rate_limit_metrics,
+        wait_for_bucket,
         wait_for_rate_limit,
         RateLimitScheduledException,
     )
@@ -34,32 +41,66 @@ async def _make_awaitable(value):
     return value
 
 
-@pytest.fixture
-def mock_cache_service():
-    """Mock CacheService with async client property."""
-    mock_client = AsyncMock()
-    mock_client.incr = AsyncMock(return_value=1)
-    mock_client.expire = AsyncMock()
+class _FakeBucketRedis(fakeredis.FakeAsyncRedis):
+    """fakeredis running the real token bucket script; counts EVAL round trips."""
+
+    def __init__(self):
+        super().__init__()
+        self.evals = 0
+
+    async def eval(self, script, numkeys, *args):
+        assert script is rate_limiting._TAKE_TOKENS_LUA
+        self.evals += 1
+        return await super().eval(script, numkeys, *args)
+
+
+class _FakeCacheService:
+    def __init__(self, redis):
+        self.redis = redis
+
+    @property
+    async def client(self):
+        return self.redis
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
 
-    cache = MagicMock()
-    # Production code does: client = await cache_service.client
-    # Make .client a coroutine that resolves to mock_client when awaited
-    type(cache).client = property(lambda self: _make_awaitable(mock_client))
-    cache._mock_client = mock_client
-    return cache
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture(autouse=True)
+def _fresh_leases(monkeypatch):
+    monkeypatch.setattr(rate_limiting, "_leases", {})
 
 
 @pytest.fixture
-def mock_cache_exceeded():
-    """Mock CacheService where rate limit is exceeded (count > limit)."""
-    mock_client = AsyncMock()
-    mock_client.incr = AsyncMock(return_value=999)  # way over any limit
-    mock_client.expire = AsyncMock()
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(
+        rate_limiting, "time",
+        SimpleNamespace(time=lambda: 1_700_000_000 + clock.now, monotonic=lambda: clock.now),
+    )
+    return clock
 
-    cache = MagicMock()
-    type(cache).client = property(lambda self: _make_awaitable(mock_client))
-    cache._mock_client = mock_client
-    return cache
+
+@pytest.fixture
+def bucket_cache():
+    return _FakeCacheService(_FakeBucketRedis())
+
+
+def _limits(monkeypatch, limits):
+    monkeypatch.setattr(
+        "backend.apps.ai.processing.rate_limiting._get_provider_rate_limit",
+        lambda provider_id: limits,
+    )
+
+
+async def _allowed_count(checks, **kwargs):
+    results = [await check_rate_limit(**kwargs) for _ in range(checks)]
+    return sum(1 for is_allowed, _ in results if is_allowed)
 
 
 # ===========================================================================
@@ -203,60 +244,119 @@ class TestCheckRateLimit:
         assert retry_after is None
 
     @pytest.mark.asyncio
-    async def test_allowed_when_unlimited(self, monkeypatch, mock_cache_service):
+    async def test_allowed_when_unlimited(self, monkeypatch, bucket_cache):
         """Should allow request when requests_per_second is None (unlimited)."""
         monkeypatch.setattr(
             "backend.apps.ai.processing.rate_limiting._get_provider_rate_limit",
             lambda provider_id: {"requests_per_second": None},
         )
         is_allowed, retry_after = await check_rate_limit(
-            "test", "search", cache_service=mock_cache_service
+            "test", "search", cache_service=bucket_cache
         )
         assert is_allowed is True
         assert retry_after is None
+        assert bucket_cache.redis.evals == 0
 
     @pytest.mark.asyncio
-    async def test_allowed_under_limit(self, monkeypatch, mock_cache_service):
-        """Should allow request when count is under the limit."""
-        monkeypatch.setattr(
-            "backend.apps.ai.processing.rate_limiting._get_provider_rate_limit",
-            lambda provider_id: {"requests_per_second": 10},
-        )
-        # mock_cache_service returns incr=1, which is under limit of 10
+    async def test_allowed_under_limit(self, monkeypatch, bucket_cache, clock):
+        """Should allow request while the bucket has tokens."""
+        _limits(monkeypatch, {"requests_per_second": 10})
         is_allowed, retry_after = await check_rate_limit(
-            "test", "search", cache_service=mock_cache_service
+            "test", "search", cache_service=bucket_cache
         )
         assert is_allowed is True
         assert retry_after is None
 
     @pytest.mark.asyncio
-    async def test_blocked_over_limit(self, monkeypatch, mock_cache_exceeded):
-        """Should block request when count exceeds the limit."""
-        monkeypatch.setattr(
-            "backend.apps.ai.processing.rate_limiting._get_provider_rate_limit",
-            lambda provider_id: {"requests_per_second": 5},
-        )
+    async def test_blocked_over_limit(self, monkeypatch, bucket_cache, clock):
+        """Should allow a full burst, then block until the next token refills."""
+        _limits(monkeypatch, {"requests_per_second": 5})
+        allowed = await _allowed_count(6, provider_id="test", skill_id="search", cache_service=bucket_cache)
+        assert allowed == 5
+
         is_allowed, retry_after = await check_rate_limit(
-            "test", "search", cache_service=mock_cache_exceeded
+            "test", "search", cache_service=bucket_cache
         )
         assert is_allowed is False
-        assert retry_after is not None
-        assert retry_after > 0
+        assert retry_after == pytest.approx(0.2)
+
+        clock.advance(0.2)
+        assert (await check_rate_limit("test", "search", cache_service=bucket_cache))[0] is True
 
     @pytest.mark.asyncio
-    async def test_cache_key_includes_model_id(self, monkeypatch, mock_cache_service):
-        """Cache key should include model_id when provided."""
-        monkeypatch.setattr(
-            "backend.apps.ai.processing.rate_limiting._get_provider_rate_limit",
-            lambda provider_id: {"requests_per_second": 10},
-        )
-        await check_rate_limit(
-            "test", "search", model_id="gpt-4", cache_service=mock_cache_service
-        )
-        # Verify incr was called (the key includes model_id)
-        mock_cache_service._mock_client.incr.assert_called_once()
-        call_args = mock_cache_service._mock_client.incr.call_args[0][0]
-        assert "gpt-4" in call_args
+    async def test_refill_is_continuous_without_window_edge_bursts(self, monkeypatch, bucket_cache, clock):
+        """A fixed window allowed 2x the limit across a second boundary; the bucket does not."""
+        _limits(monkeypatch, {"requests_per_second": 10, "burst": 10})
+        kwargs = {"provider_id": "test", "skill_id": "search", "cache_service": bucket_cache}
+        clock.now = 1000.9
+        assert await _allowed_count(15, **kwargs) == 10
+        clock.advance(0.25)
+        assert await _allowed_count(15, **kwargs) == 2
+
+    @pytest.mark.asyncio
+    async def test_tokens_are_leased_in_batches_and_shared_across_processes(self, monkeypatch, bucket_cache, clock):
+        """High-rate buckets cost one round trip per lease, and processes share one bucket."""
+        _limits(monkeypatch, {"requests_per_second": 100, "burst": 30})
+        kwargs = {"provider_id": "test", "skill_id": "search", "cache_service": bucket_cache}
+
+        assert await _allowed_count(20, **kwargs) == 20
+        assert bucket_cache.redis.evals == 2  # lease size 10
+
+        # Another worker process draws from the same bucket
+        monkeypatch.setattr(rate_limiting, "_leases", {})
+        assert await _allowed_count(20, **kwargs) == 10
+        # Throttled checks are answered locally until the next token is due
+        evals = bucket_cache.redis.evals
+        assert await _allowed_count(5, **kwargs) == 0
+        assert bucket_cache.redis.evals == evals
+
+    @pytest.mark.asyncio
+    async def test_expired_lease_hands_unused_tokens_back(self, monkeypatch, bucket_cache, clock):
+        _limits(monkeypatch, {"requests_per_second": 100, "burst": 10})
+        kwargs = {"provider_id": "test", "skill_id": "search", "cache_service": bucket_cache}
+
+        assert await _allowed_count(1, **kwargs) == 1  # leases all 10 tokens, 9 left locally
+        clock.advance(rate_limiting.LEASE_TTL_SECONDS + 0.001)
+        # A full bucket again only because the 9 stale tokens were handed back (capped at burst)
+        monkeypatch.setattr(rate_limiting, "LEASE_MAX_TOKENS", 1)
+        assert await _allowed_count(1, **kwargs) == 1
+        assert float(await bucket_cache.redis.hget("rate_limit:bucket:test", "tokens")) == pytest.approx(9)
+
+    @pytest.mark.asyncio
+    async def test_models_with_their_own_limits_get_their_own_bucket(self, monkeypatch, bucket_cache, clock):
+        """Per-model limits replace the provider bucket for that model only."""
+        _limits(monkeypatch, {"requests_per_second": 10, "models": {"gpt-4": {"requests_per_second": 1}}})
+        kwargs = {"provider_id": "test", "skill_id": "search", "cache_service": bucket_cache}
+
+        assert await _allowed_count(3, model_id="gpt-4", **kwargs) == 1
+        assert await _allowed_count(3, model_id="gpt-4o-mini", **kwargs) == 3
+        assert set(await bucket_cache.redis.keys()) == {
+            b"rate_limit:bucket:test:gpt-4", b"rate_limit:bucket:test", b"rate_limit:stats",
+        }
+
+    @pytest.mark.asyncio
+    async def test_burst_below_one_token_is_raised_to_one(self, monkeypatch, bucket_cache, clock):
+        """A bucket capped below one whole token would never grant one."""
+        _limits(monkeypatch, {"requests_per_second": 0.5, "burst": 0.5})
+        kwargs = {"provider_id": "test", "skill_id": "search", "cache_service": bucket_cache}
+
+        assert await _allowed_count(2, **kwargs) == 1
+        clock.advance(2)
+        assert await _allowed_count(1, **kwargs) == 1
+
+    @pytest.mark.asyncio
+    async def test_metrics_report_cluster_and_process_throttling(self, monkeypatch, bucket_cache, clock):
+        _limits(monkeypatch, {"requests_per_second": 1})
+        kwargs = {"provider_id": "brave", "skill_id": "search", "cache_service": bucket_cache}
+        await _allowed_count(1, **kwargs)
+        clock.advance(1.5)
+        # Allowed, then throttled by Dragonfly, then throttled locally
+        await _allowed_count(3, **kwargs)
+
+        metrics = await get_rate_limit_metrics(bucket_cache)
+
+        assert metrics["buckets"]["brave"] == {"leases": 3, "granted": 2, "throttled": 1, "throttle_ratio": 0.3333}
+        assert metrics["process"]["brave"] == {"allowed": 2, "throttled": 2, "round_trips": 3, "leased_tokens": 0}
 
     @pytest.mark.asyncio
     async def test_fail_open_on_exception(self, monkeypatch):
@@ -333,6 +433,34 @@ class TestWaitForRateLimit:
         assert call_count == 2
 
 
+class TestWaitForBucket:
+    @pytest.mark.asyncio
+    async def test_limit_is_shared_by_every_process_using_the_bucket(self, monkeypatch, bucket_cache, clock):
+        """Processes with their own leases still draw from one Dragonfly bucket."""
+        waits = []
+
+        async def advancing_sleep(delay):
+            waits.append(delay)
+            clock.advance(delay)
+
+        monkeypatch.setattr(rate_limiting.asyncio, "sleep", advancing_sleep)
+
+        for _ in range(3):
+            # A fresh lease table per call, as in a separate worker process
+            monkeypatch.setattr(rate_limiting, "_leases", {})
+            await wait_for_bucket("sightengine", 5, burst=1, cache_service=bucket_cache)
+
+        assert waits == pytest.approx([0.2, 0.2], abs=0.002)
+        assert bucket_cache.redis.evals == 5
+
+    @pytest.mark.asyncio
+    async def test_fails_open_without_cache_client(self, clock):
+        await asyncio.wait_for(
+            wait_for_bucket("sightengine", 5, cache_service=_FakeCacheService(None)),
+            timeout=1.0,
+        )
+
+
 # ===========================================================================
 # RateLimitScheduledException
 # ===========================================================================
@@ -0,0 +1,149 @@
+# backend/tests/test_search_docs_index.py
+#
+# Tests for the in-memory BM25 index behind openmates.search_docs
+# (apps/openmates/skills/search_docs_skill.py): title/heading boosts, prefix
+# matching, rebuilding when the docs corpus is refreshed, and a benchmark
+# against the previous per-query str.count scan over every document.
+
+import asyncio
+import random
+import statistics
+import time
+
+import pytest
+
+from backend.apps.openmates.skills import search_docs_skill
+from backend.apps.openmates.skills.search_docs_skill import SearchDocsSkill, _DocsSearchIndex, _extract_headings
+
+
+def _docs():
+    return [
+        {"title": "Getting started", "slug": "start", "headings": ["Install"],
+         "content": "Install the CLI. The API key is created in settings."},
+        {"title": "API keys", "slug": "api-keys", "headings": ["Creating keys", "Revoking keys"],
+         "content": "Create an API key in settings and keep it secret."},
+        {"title": "Billing", "slug": "billing", "headings": ["Credits"],
+         "content": "Credits are charged per request. " * 20 + "Mention of API once."},
+        {"title": "Authentication", "slug": "auth", "headings": ["Passkeys"],
+         "content": "Sign in with passkeys or a password."},
+    ]
+
+
+def test_title_and_heading_matches_outrank_content_matches():
+    index = _DocsSearchIndex(_docs())
+
+    results = index.search("api key", 10)
+    assert [entry["slug"] for _, entry, _ in results][:2] == ["api-keys", "start"]
+    assert results[0][0] == 1.0 and all(0 < relevance <= 1 for relevance, _, _ in results)
+
+    # "revoking" only appears in a heading
+    assert [entry["slug"] for _, entry, _ in index.search("revoking", 10)] == ["api-keys"]
+    assert index.search("nonexistent", 10) == []
+
+
+def test_query_words_match_indexed_words_they_prefix():
+    index = _DocsSearchIndex(_docs())
+
+    results = index.search("auth", 10)
+
+    assert [entry["slug"] for _, entry, _ in results] == ["auth"]
+    assert results[0][2] == ["authentication"]
+    # Too short for prefix expansion
+    assert index.search("pa", 10) == []
+
+
+def test_execute_rebuilds_the_index_when_the_corpus_is_refreshed(monkeypatch):
+    docs = _docs()
+    monkeypatch.setattr(search_docs_skill, "_cached_search_index", docs)
+    monkeypatch.setattr(search_docs_skill, "_cache_timestamp", time.time())
+    monkeypatch.setattr(search_docs_skill, "_ranked_index", None)
+    skill = SearchDocsSkill(app=None, app_id="openmates", skill_id="search_docs",
+                            skill_name="Search docs", skill_description="")
+
+    response = asyncio.run(skill.execute("passkeys"))
+    first_index = search_docs_skill._ranked_index
+    assert response.results[0].slug == "auth" and response.results[0].url.endswith("/docs/auth")
+    assert "passkeys" in response.results[0].snippet
+
+    asyncio.run(skill.execute("credits"))
+    assert search_docs_skill._ranked_index is first_index
+
+    refreshed = docs + [{"title": "Webhooks", "slug": "webhooks", "content": "Receive events."}]
+    monkeypatch.setattr(search_docs_skill, "_cached_search_index", refreshed)
+    response = asyncio.run(skill.execute("webhooks"))
+    assert search_docs_skill._ranked_index is not first_index
+    assert response.results[0].slug == "webhooks"
+
+
+def test_extract_headings_strips_markup():
+    html = '<h1 class="t">Docs <em>home</em></h1><p>x</p><h2>Setup &amp; use</h2><h4>ignored</h4>'
+    assert _extract_headings(html) == ["Docs home", "Setup & use"]
+
+
+def _legacy_scan(search_index, query):
+    """Scoring loop of search_docs before the inverted index (str.count per word per doc)."""
+    words = query.lower().split()
+    scored_results = []
+    for entry in search_index:
+        title_lower = entry.get("title", "").lower()
+        content_lower = entry.get("content", "").lower()
+        score = 0.0
+        matched_words = 0
+        for word in words:
+            title_count = title_lower.count(word)
+            content_count = content_lower.count(word)
+            if title_count > 0:
+                score += 3.0 * title_count
+                matched_words += 1
+            if content_count > 0:
+                score += 1.0 * min(content_count, 5)
+                matched_words += 1
+        if query.lower() in title_lower:
+            score += 10.0
+        if query.lower() in content_lower:
+            score += 2.0
+        if matched_words > 0:
+            scored_results.append((min(score / (len(words) * 10), 1.0), entry))
+    scored_results.sort(key=lambda x: x[0], reverse=True)
+    return scored_results[:10]
+
+
+@pytest.mark.benchmark
+def test_benchmark_ranked_index_vs_linear_scan_latency():
+    rng = random.Random(7)
+    vocabulary = sorted({
+        "".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(3, 10))) for _ in range(20_000)
+    })
+    corpus = [
+        {
+            "title": " ".join(rng.choices(vocabulary, k=4)),
+            "slug": f"doc-{doc_idx}",
+            "headings": [" ".join(rng.choices(vocabulary, k=3)) for _ in range(4)],
+            "content": " ".join(rng.choices(vocabulary, k=700))[:5000],
+        }
+        for doc_idx in range(1_000)
+    ]
+    queries = [" ".join(rng.choices(vocabulary, k=rng.randint(1, 3))) for _ in range(200)]
+
+    started = time.perf_counter()
+    index = _DocsSearchIndex(corpus)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    def latencies(search):
+        samples = []
+        for query in queries:
+            started = time.perf_counter()
+            search(query)
+            samples.append((time.perf_counter() - started) * 1000)
+        quantiles = statistics.quantiles(samples, n=100)
+        return quantiles[49], quantiles[98]
+
+    index_p50, index_p99 = latencies(lambda query: index.search(query, 10))
+    scan_p50, scan_p99 = latencies(lambda query: _legacy_scan(corpus, query))
+    print(
+        f"\nindex build {build_ms:.1f} ms; index p50 {index_p50:.3f} ms p99 {index_p99:.3f} ms; "
+        f"scan p50 {scan_p50:.3f} ms p99 {scan_p99:.3f} ms"
+    )
+
+    assert index_p50 * 10 < scan_p50
+    assert index_p99 < scan_p99
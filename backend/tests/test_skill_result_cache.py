@@ -0,0 +1,277 @@
+# backend/tests/test_skill_result_cache.py
+#
+# Unit tests for the shared cross-user skill result cache
+# (backend/apps/skill_result_cache.py) and its BaseSkill integration.
+#
+# Tests cover: key normalization, skill defaults and the public-field
+# allow-list, which results are stored, single-flight de-duplication of
+# concurrent misses, stale-while-revalidate serving, hit-ratio metrics, and
+# falling through when the cache is unavailable. The fake client keeps strings
+# and hashes in dicts; lock expiry is not modelled.
+#
+# Run: python -m pytest backend/tests/test_skill_result_cache.py -v
+
+import asyncio
+import json
+
+import pytest
+
+try:
+    from backend.apps import skill_result_cache
+    from backend.apps.base_skill import BaseSkill
+    from backend.apps.skill_result_cache import (
+        SkillCachePolicy,
+        cache_key_for,
+        get_or_compute,
+        get_skill_result_cache_metrics,
+        is_background_refresh,
+    )
+except ImportError as _exc:
+    pytestmark = pytest.mark.skip(reason=f"Backend dependencies not installed: {_exc}")
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.strings = {}
+        self.hashes = {}
+
+    async def get(self, key):
+        value = self.strings.get(key)
+        return value.encode() if value is not None else None
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and key in self.strings:
+            return None
+        self.strings[key] = value
+        return True
+
+    async def exists(self, key):
+        return int(key in self.strings)
+
+    async def eval(self, script, numkeys, *args):
+        assert script is skill_result_cache._RELEASE_LOCK_LUA
+        key, token = args[0], args[numkeys]
+        if self.strings.get(key) == token:
+            del self.strings[key]
+            return 1
+        return 0
+
+    async def hincrby(self, key, field, amount):
+        fields = self.hashes.setdefault(key, {})
+        fields[field] = fields.get(field, 0) + amount
+        return fields[field]
+
+    async def hgetall(self, key):
+        return {field.encode(): str(value).encode() for field, value in self.hashes.get(key, {}).items()}
+
+
+class _FakeCacheService:
+    def __init__(self, redis):
+        self.redis = redis
+
+    @property
+    async def client(self):
+        return self.redis
+
+
+@pytest.fixture(autouse=True)
+def _fresh_stats(monkeypatch):
+    monkeypatch.setattr(skill_result_cache, "_local_stats", {})
+    monkeypatch.setattr(skill_result_cache, "WAIT_POLL_SECONDS", 0.001)
+
+
+@pytest.fixture
+def redis():
+    return _FakeRedis()
+
+
+def _policy(ttl=60, stale=300):
+    return SkillCachePolicy(
+        name="web.search", ttl_seconds=ttl, stale_seconds=stale,
+        params=frozenset({"query", "count", "country"}),
+    )
+
+
+def _upstream(calls, items=None, error=None, delay=0.0):
+    async def compute(req, request_id, **kwargs):
+        calls.append(req)
+        await asyncio.sleep(delay)
+        return (request_id, items if items is not None else [{"url": f"https://example.com/{req['query']}"}], error)
+    return compute
+
+
+def _get(redis, req, compute, request_id="r1", policy=None):
+    return get_or_compute(
+        policy or _policy(), req, request_id,
+        lambda: compute(req=req, request_id=request_id),
+        cache_service=_FakeCacheService(redis),
+    )
+
+
+def test_keys_normalize_public_fields_and_undeclared_fields_bypass_the_cache():
+    policy = _policy()
+    key = cache_key_for(policy, {"id": 1, "query": "  Python   Async ", "count": 5.0, "country": None})
+
+    assert key == cache_key_for(policy, {"id": 2, "query": "python async", "count": 5})
+    assert key.startswith("skill_result:web.search:")
+    assert cache_key_for(policy, {"query": "python async", "count": 6}) != key
+    assert cache_key_for(policy, {"query": "python async", "user_id": "u-1"}) is None
+    assert cache_key_for(policy, {"query": {"nested": "value"}}) is None
+
+
+def test_keys_apply_skill_defaults_so_equivalent_requests_share_an_entry():
+    policy = SkillCachePolicy(
+        name="web.search", ttl_seconds=60, stale_seconds=0,
+        params=frozenset({"query", "count", "country"}), defaults={"count": 6, "country": "us"},
+    )
+    key = cache_key_for(policy, {"query": "berlin"})
+
+    assert cache_key_for(policy, {"query": "berlin", "count": 6, "country": "US"}) == key
+    assert cache_key_for(policy, {"query": "berlin", "count": None, "country": ""}) == key
+    assert cache_key_for(policy, {"query": "berlin", "count": 10}) != key
+
+
+def test_successful_results_are_shared_without_request_id_and_failures_are_not(redis):
+    calls = []
+    compute = _upstream(calls)
+
+    async def scenario():
+        first = await _get(redis, {"query": "Berlin"}, compute, request_id="a")
+        second = await _get(redis, {"query": " berlin "}, compute, request_id="b")
+        bypassed = await _get(redis, {"query": "berlin", "chat_id": "c-1"}, compute, request_id="c")
+        failed = _upstream(calls, error="Brave 503")
+        await _get(redis, {"query": "paris"}, failed)
+        await _get(redis, {"query": "paris"}, failed)
+        empty = _upstream(calls, items=[])
+        await _get(redis, {"query": "nowhere"}, empty)
+        await _get(redis, {"query": "nowhere"}, empty)
+        return first, second, bypassed
+
+    first, second, bypassed = asyncio.run(scenario())
+
+    assert first == ("a", [{"url": "https://example.com/Berlin"}], None)
+    assert second == ("b", [{"url": "https://example.com/Berlin"}], None)
+    assert bypassed[0] == "c"
+    assert [req["query"] for req in calls] == ["Berlin", "berlin", "paris", "paris", "nowhere", "nowhere"]
+    stored = [json.loads(value) for key, value in redis.strings.items() if not key.startswith("skill_result_lock:")]
+    assert [entry["payload"] for entry in stored] == [[[{"url": "https://example.com/Berlin"}], None]]
+    assert not any(key.startswith("skill_result_lock:") for key in redis.strings)
+
+
+def test_concurrent_misses_call_upstream_once(redis):
+    calls = []
+    compute = _upstream(calls, delay=0.02)
+
+    async def scenario():
+        return await asyncio.gather(*(
+            _get(redis, {"query": "weather berlin"}, compute, request_id=i) for i in range(5)
+        ))
+
+    results = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert [result[0] for result in results] == [0, 1, 2, 3, 4]
+    assert all(result[1:] == results[0][1:] for result in results)
+    assert skill_result_cache.skill_result_cache_stats()["web.search"] == {
+        "hit": 0, "stale": 0, "coalesced": 4, "miss": 1, "hit_ratio": 0.8,
+    }
+
+
+def test_stale_entries_are_served_while_one_background_refresh_runs(redis):
+    refreshed_in_background = []
+
+    async def compute(req, request_id):
+        refreshed_in_background.append(is_background_refresh())
+        return (request_id, [{"url": f"https://example.com/v{len(refreshed_in_background)}"}], None)
+
+    async def scenario():
+        await _get(redis, {"query": "news"}, compute)
+        key = cache_key_for(_policy(), {"query": "news"})
+        entry = json.loads(redis.strings[key])
+        entry["fresh_until"] = 0
+        redis.strings[key] = json.dumps(entry)
+
+        stale = await asyncio.gather(*(_get(redis, {"query": "news"}, compute) for _ in range(3)))
+        await asyncio.gather(*skill_result_cache._background_refreshes)
+        fresh = await _get(redis, {"query": "news"}, compute)
+        return stale, fresh
+
+    stale, fresh = asyncio.run(scenario())
+
+    assert all(result[1] == [{"url": "https://example.com/v1"}] for result in stale)
+    assert fresh[1] == [{"url": "https://example.com/v2"}]
+    assert refreshed_in_background == [False, True]
+    assert skill_result_cache.skill_result_cache_stats()["web.search"]["stale"] == 3
+
+
+def test_metrics_report_hit_ratio_across_workers(redis):
+    calls = []
+    compute = _upstream(calls)
+
+    async def scenario():
+        for _ in range(4):
+            await _get(redis, {"query": "rust"}, compute)
+        return await get_skill_result_cache_metrics(_FakeCacheService(redis))
+
+    metrics = asyncio.run(scenario())
+
+    assert metrics["skills"]["web.search"] == {"hit": 3, "stale": 0, "coalesced": 0, "miss": 1, "hit_ratio": 0.75}
+    assert metrics["process"]["web.search"]["hit_ratio"] == 0.75
+
+
+def test_unavailable_cache_calls_the_skill_directly():
+    calls = []
+    compute = _upstream(calls)
+
+    class _DownCacheService:
+        @property
+        async def client(self):
+            return None
+
+    async def scenario():
+        for _ in range(2):
+            await get_or_compute(
+                _policy(), {"query": "go"}, "r1", lambda: compute(req={"query": "go"}, request_id="r1"),
+                cache_service=_DownCacheService(),
+            )
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+class _PublicSkill(BaseSkill):
+    result_cache_ttl_seconds = 60
+    result_cache_params = ("query", "count")
+    result_cache_defaults = {"count": 6}
+
+
+def _make_skill(skill_class, operational_defaults=None):
+    return skill_class(
+        app=None, app_id="web", skill_id="search", skill_name="Search", skill_description="Search",
+        skill_operational_defaults=operational_defaults,
+    )
+
+
+def test_base_skill_caches_only_for_opted_in_skills(redis):
+    calls = []
+    compute = _upstream(calls)
+
+    async def run(skill):
+        return await skill._process_requests_in_parallel(
+            requests=[{"id": 1, "query": "ai"}, {"id": 2, "query": "AI", "count": 6}],
+            process_single_request_func=compute,
+            logger=skill_result_cache.logger,
+            cache_service=_FakeCacheService(redis),
+        )
+
+    async def scenario():
+        await run(_make_skill(BaseSkill))
+        await run(_make_skill(_PublicSkill, {"result_cache_ttl_seconds": 0}))
+        assert len(calls) == 4 and not redis.strings
+        return await run(_make_skill(_PublicSkill))
+
+    results = asyncio.run(scenario())
+
+    assert len(calls) == 5
+    assert [result[0] for result in results] == [1, 2]
+    assert next(iter(skill_result_cache.skill_result_cache_stats())) == "web.search"
@@ -0,0 +1,276 @@
+# backend/tests/test_stream_delta.py
+#
+# Unit tests for the delta wire encoding of ai_message_chunk payloads
+# (backend/shared/python_utils/stream_delta.py). The encoder runs in the AI
+# worker, the decoder in the WebSocket stream listener; together they must
+# reproduce exactly the full_content_so_far sequence the legacy format sent.
+
+import asyncio
+import json
+import sys
+from types import ModuleType, SimpleNamespace
+from unittest.mock import AsyncMock
+
+from backend.shared.python_utils.stream_delta import (
+    STREAM_WIRE_MODE_DELTA,
+    STREAM_WIRE_MODE_FULL,
+    StreamDeltaDecoder,
+    StreamDeltaEncoder,
+    is_delta_frame,
+    normalize_stream_wire_mode,
+    to_full_payload,
+    utf16_length,
+)
+
+
+def _frame(content: str, sequence: int, is_final: bool = False) -> dict:
+    return {
+        "type": "ai_message_chunk",
+        "chat_id": "chat-1",
+        "message_id": "msg-1",
+        "user_id_uuid": "user-1",
+        "user_id_hash": "hash-1",
+        "full_content_so_far": content,
+        "sequence": sequence,
+        "is_final_chunk": is_final,
+    }
+
+
+def _stream(chunks: list[str], encoder: StreamDeltaEncoder) -> list[dict]:
+    frames = []
+    content = ""
+    for index, chunk in enumerate(chunks, start=1):
+        content += chunk
+        is_final = index == len(chunks)
+        frames.append(encoder.encode(_frame(content, index, is_final), content))
+    return frames
+
+
+def _append_stream(chunks: list[str], encoder: StreamDeltaEncoder) -> list[dict]:
+    frames = []
+    for index, chunk in enumerate(chunks, start=1):
+        is_final = index == len(chunks)
+        frames.append(encoder.append(_frame(None, index, is_final), chunk))
+    return frames
+
+
+def test_round_trip_reproduces_full_content_for_every_frame():
+    chunks = ["Hello", " wörld", " 👋🏽", "\n\n```python\nprint('x')\n```", " done"]
+    frames = _stream(chunks, StreamDeltaEncoder(checksum_interval=2))
+    decoder = StreamDeltaDecoder()
+
+    expected = ""
+    for chunk, frame in zip(chunks, frames):
+        expected += chunk
+        assert decoder.apply(frame) is True
+        assert decoder.content == expected
+        assert decoder.length == utf16_length(expected)
+
+    assert not is_delta_frame(frames[0])
+    assert all(is_delta_frame(frame) for frame in frames[1:-1])
+    # Final chunks are always full frames so every consumer ends on the exact text.
+    assert frames[-1]["full_content_so_far"] == expected
+
+
+def test_utf16_length_matches_javascript_string_length():
+    assert utf16_length("abc") == 3
+    assert utf16_length("äöü") == 3
+    # Emoji outside the BMP are surrogate pairs in JavaScript.
+    assert utf16_length("👋🏽") == 4
+
+
+def test_non_append_content_is_sent_as_keyframe():
+    encoder = StreamDeltaEncoder()
+    encoder.encode(_frame("Draft answer", 1), "Draft answer")
+    rewritten = encoder.encode(_frame("Corrected answer", 2), "Corrected answer")
+
+    assert not is_delta_frame(rewritten)
+    assert rewritten["full_content_so_far"] == "Corrected answer"
+
+
+def test_keyframes_are_forced_after_max_interval():
+    now = [0.0]
+    encoder = StreamDeltaEncoder(max_keyframe_interval=5.0, clock=lambda: now[0])
+    frames = []
+    content = ""
+    for index in range(1, 8):
+        now[0] = index * 2.0
+        content += f"chunk {index} "
+        frames.append(encoder.encode(_frame(content, index), content))
+
+    # Keyframe at t=2, then deltas until 5s have passed (t=8), and again at t=14
+    assert [is_delta_frame(frame) for frame in frames] == [False, True, True, False, True, True, False]
+
+    # A consumer that only sees the stream from the middle catches up at the next keyframe
+    late_decoder = StreamDeltaDecoder()
+    assert late_decoder.apply(frames[1]) is False
+    assert late_decoder.apply(frames[3]) is True
+    assert late_decoder.content == "chunk 1 chunk 2 chunk 3 chunk 4 "
+
+
+def test_decoder_detects_gap_and_recovers_on_next_full_frame():
+    frames = _stream(["a", "b", "c", "d"], StreamDeltaEncoder())
+    decoder = StreamDeltaDecoder()
+
+    assert decoder.apply(frames[0]) is True
+    # frames[1] is lost on the wire
+    assert decoder.apply(frames[2]) is False
+    assert decoder.content is None
+    # The final chunk is a full frame and restores the state.
+    assert decoder.apply(frames[3]) is True
+    assert decoder.content == "abcd"
+
+
+def test_decoder_ignores_duplicate_frames_after_snapshot_replay():
+    frames = _stream(["one ", "two ", "three ", "four"], StreamDeltaEncoder())
+    decoder = StreamDeltaDecoder()
+    for frame in frames[:3]:
+        decoder.apply(frame)
+
+    # A snapshot that is newer than an in-flight delta frame must not corrupt the text.
+    assert decoder.apply(frames[1]) is True
+    assert decoder.content == "one two three "
+
+
+def test_decoder_rejects_checksum_mismatch():
+    encoder = StreamDeltaEncoder(checksum_interval=1)
+    frames = _stream(["abc", "def", "ghi"], encoder)
+    frames[1]["content_delta"] = "xyz"
+    decoder = StreamDeltaDecoder()
+
+    assert decoder.apply(frames[0]) is True
+    assert decoder.apply(frames[1]) is False
+
+
+def test_deferred_content_keeps_the_prefix_it_was_taken_at():
+    frames = _stream(["one ", "two ", "three ", "four"], StreamDeltaEncoder())
+    decoder = StreamDeltaDecoder()
+    decoder.apply(frames[0])
+    decoder.apply(frames[1])
+    deferred = decoder.deferred_content()
+    decoder.apply(frames[2])
+    later = decoder.deferred_content()
+    decoder.apply(frames[3])
+
+    assert deferred() == "one two "
+    assert later() == "one two three "
+    assert decoder.tail == "one two three four"
+
+
+def test_deferred_content_is_none_while_out_of_sync():
+    frames = _stream(["a", "b", "c", "d"], StreamDeltaEncoder())
+    decoder = StreamDeltaDecoder()
+    decoder.apply(frames[0])
+    decoder.apply(frames[2])
+
+    assert decoder.deferred_content() is None
+
+
+def test_wire_bytes_grow_linearly_with_response_length():
+    chunks = [f"Paragraph {i} " + "lorem ipsum " * 20 + "\n\n" for i in range(200)]
+    encoder = StreamDeltaEncoder()
+    delta_bytes = sum(len(json.dumps(frame)) for frame in _stream(chunks, encoder))
+
+    full_bytes = 0
+    content = ""
+    for index, chunk in enumerate(chunks, start=1):
+        content += chunk
+        full_bytes += len(json.dumps(_frame(content, index)))
+
+    total_length = len(content)
+    # Geometric keyframes + final frame stay within a small multiple of the text.
+    assert delta_bytes < 5 * total_length
+    assert full_bytes > 10 * delta_bytes
+
+
+def test_append_frames_match_encode_frames():
+    chunks = ["Hello", " wörld 👋", "\n\n", "x" * 5000, "", "more", "y" * 9000, "end"]
+    ticks = iter(range(100))
+    encoded = _stream(chunks, StreamDeltaEncoder(clock=lambda: next(ticks) * 0.5))
+    ticks = iter(range(100))
+    appended = _append_stream(chunks, StreamDeltaEncoder(clock=lambda: next(ticks) * 0.5))
+
+    assert appended == encoded
+    assert any(is_delta_frame(frame) for frame in appended)
+    decoder = StreamDeltaDecoder()
+    assert all(decoder.apply(frame) for frame in appended)
+    assert decoder.content == "".join(chunks)
+
+
+def test_append_delta_frames_do_not_rebuild_the_content():
+    encoder = StreamDeltaEncoder(clock=lambda: 0.0)
+    encoder.append(_frame(None, 1), "a" * 100)
+
+    frame = encoder.append(_frame(None, 2), "b")
+    assert is_delta_frame(frame)
+    # Appended parts are kept as-is until a keyframe needs the full text
+    assert encoder._parts == ["a" * 100, "b"]
+    assert encoder.append(_frame(None, 3, is_final=True), "c")["full_content_so_far"] == "a" * 100 + "bc"
+    assert encoder._parts == ["a" * 100 + "bc"]
+
+
+def test_to_full_payload_strips_delta_fields():
+    frames = _stream(["a", "b", "c"], StreamDeltaEncoder())
+    full = to_full_payload(frames[1], "ab")
+
+    assert full["full_content_so_far"] == "ab"
+    assert "content_delta" not in full
+    assert "stream_encoding" not in full
+
+
+def test_normalize_stream_wire_mode_defaults_to_full():
+    assert normalize_stream_wire_mode("DELTA") == STREAM_WIRE_MODE_DELTA
+    assert normalize_stream_wire_mode("binary") == STREAM_WIRE_MODE_FULL
+    assert normalize_stream_wire_mode(None) == STREAM_WIRE_MODE_FULL
+
+
+class _ResyncManager:
+    def __init__(self, active_chat):
+        self.active_chat = active_chat
+        self.sent = []
+
+    def get_active_chat(self, user_id, device_fingerprint_hash):
+        return self.active_chat
+
+    async def send_personal_message(self, message, user_id, device_fingerprint_hash):
+        self.sent.append(message)
+
+
+def _import_active_chat_handler():
+    tracing_config_stub = ModuleType("backend.shared.python_utils.tracing.config")
+    tracing_config_stub.setup_tracing = lambda *args, **kwargs: None
+    sys.modules.setdefault("backend.shared.python_utils.tracing.config", tracing_config_stub)
+
+    from backend.core.api.app.routes.handlers.websocket_handlers import active_chat_handler
+
+    return active_chat_handler
+
+
+def test_resync_request_replays_snapshot_for_matching_message():
+    active_chat_handler = _import_active_chat_handler()
+    snapshot = dict(_frame("Partial answer", 7), user_id_uuid="user-1")
+    cache_service = SimpleNamespace(get=AsyncMock(return_value=snapshot))
+
+    manager = _ResyncManager("chat-1")
+    asyncio.run(
+        active_chat_handler.handle_request_ai_stream_resync(
+            manager=manager,
+            cache_service=cache_service,
+            user_id="user-1",
+            device_fingerprint_hash="device-1",
+            payload={"chat_id": "chat-1", "message_id": "msg-1"},
+        )
+    )
+    assert manager.sent == [{"type": "ai_message_update", "payload": snapshot}]
+
+    other_message_manager = _ResyncManager("chat-1")
+    asyncio.run(
+        active_chat_handler.handle_request_ai_stream_resync(
+            manager=other_message_manager,
+            cache_service=cache_service,
+            user_id="user-1",
+            device_fingerprint_hash="device-1",
+            payload={"chat_id": "chat-1", "message_id": "msg-2"},
+        )
+    )
+    assert other_message_manager.sent == []
@@ -0,0 +1,196 @@
+# backend/tests/test_task_cancellation.py
+#
+# Unit tests for the push-based AI task cancellation signal
+# (backend/apps/ai/processing/task_cancellation.py), plus a microbenchmark that
+# compares the per-chunk cost of the in-process check with the legacy
+# `AsyncResult(task_id).state` lookup.
+#
+# Run the benchmark with:
+#   python -m pytest backend/tests/test_task_cancellation.py -m benchmark -s
+
+import asyncio
+import fnmatch
+import time
+
+import pytest
+
+from backend.apps.ai.processing import task_cancellation
+from backend.apps.ai.processing.task_cancellation import (
+    AITaskCancellation,
+    CANCELLED_AI_TASK_KEY_PREFIX,
+    is_ai_task_cancelled,
+    release_ai_task_cancellation,
+    signal_ai_task_cancellation,
+    watch_ai_task_cancellation,
+)
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    async def setex(self, key, ttl, value):
+        self.store[key] = value
+
+    async def get(self, key):
+        return self.store.get(key)
+
+
+class _FakeCacheService:
+    """Minimal stand-in for CacheService: key/value client plus in-memory pub/sub."""
+
+    def __init__(self):
+        self.redis = _FakeRedis()
+        self.subscribers = {}
+        self.published = []
+
+    @property
+    async def client(self):
+        return self.redis
+
+    async def publish_event(self, channel, event_data):
+        self.published.append((channel, event_data))
+        for pattern, queues in self.subscribers.items():
+            if fnmatch.fnmatchcase(channel, pattern):
+                for queue in queues:
+                    queue.put_nowait({"channel": channel, "data": event_data})
+        return True
+
+    async def subscribe_to_channel(self, channel_pattern):
+        queue = asyncio.Queue()
+        self.subscribers.setdefault(channel_pattern, []).append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.subscribers[channel_pattern].remove(queue)
+
+
+def test_signal_sets_event_via_pubsub():
+    async def scenario():
+        cache = _FakeCacheService()
+        token = await AITaskCancellation("task-1", cache, poll_interval=60, revoked_check=None).start()
+        try:
+            await asyncio.sleep(0)  # let the listener subscribe
+            assert is_ai_task_cancelled("task-1") is False
+
+            assert await signal_ai_task_cancellation(cache, "task-1") is True
+            await asyncio.wait_for(token.event.wait(), timeout=1)
+
+            assert is_ai_task_cancelled("task-1") is True
+            assert token.reason == "pubsub"
+            assert cache.redis.store[f"{CANCELLED_AI_TASK_KEY_PREFIX}task-1"] == "cancelled"
+        finally:
+            await token.stop()
+        assert task_cancellation.get_ai_task_cancellation("task-1") is None
+        assert cache.subscribers["ai_task_cancel::*"] == []
+
+    asyncio.run(scenario())
+
+
+def test_cancellation_before_start_is_picked_up_from_marker():
+    async def scenario():
+        cache = _FakeCacheService()
+        await signal_ai_task_cancellation(cache, "task-2")
+
+        token = await watch_ai_task_cancellation("task-2", cache)
+        try:
+            assert token.is_cancelled()
+            assert token.reason == "marker"
+        finally:
+            await release_ai_task_cancellation("task-2")
+
+    asyncio.run(scenario())
+
+
+def test_fallback_poll_detects_revocation_outside_cancel_handler():
+    async def scenario():
+        revoked = set()
+        token = AITaskCancellation(
+            "task-3", cache_service=None, poll_interval=0.01, revoked_check=lambda task_id: task_id in revoked
+        )
+        async with token:
+            await asyncio.sleep(0.03)
+            assert not token.is_cancelled()
+            revoked.add("task-3")
+            await asyncio.wait_for(token.event.wait(), timeout=1)
+            assert token.reason == "celery_state"
+
+    asyncio.run(scenario())
+
+
+def test_signals_for_other_tasks_are_ignored():
+    async def scenario():
+        cache = _FakeCacheService()
+        async with AITaskCancellation("task-4", cache, poll_interval=60, revoked_check=None) as token:
+            await asyncio.sleep(0)
+            await signal_ai_task_cancellation(cache, "task-5")
+            await asyncio.sleep(0.01)
+            assert not token.is_cancelled()
+
+    asyncio.run(scenario())
+
+
+def test_tokens_on_one_loop_share_one_subscription():
+    async def scenario():
+        cache = _FakeCacheService()
+        tokens = [
+            await AITaskCancellation(f"task-{i}", cache, poll_interval=60, revoked_check=None).start()
+            for i in range(100)
+        ]
+        await asyncio.sleep(0)
+        subscriptions = len(cache.subscribers["ai_task_cancel::*"])
+
+        await signal_ai_task_cancellation(cache, "task-42")
+        await asyncio.wait_for(tokens[42].event.wait(), timeout=1)
+        cancelled = [token.task_id for token in tokens if token.is_cancelled()]
+        for token in tokens:
+            await token.stop()
+        return subscriptions, cancelled, cache.subscribers["ai_task_cancel::*"]
+
+    subscriptions, cancelled, remaining = asyncio.run(scenario())
+    assert subscriptions == 1
+    assert cancelled == ["task-42"]
+    assert remaining == []
+
+
+def test_unregistered_task_falls_back_to_celery_state(monkeypatch):
+    monkeypatch.setattr(task_cancellation, "celery_task_revoked", lambda task_id: task_id == "revoked-task")
+
+    assert is_ai_task_cancelled("revoked-task") is True
+    assert is_ai_task_cancelled("running-task") is False
+
+
+@pytest.mark.benchmark
+def test_benchmark_per_chunk_cancellation_check():
+    """
+    Per-chunk overhead of the cancellation check, before and after.
+
+    "before" uses a real Celery AsyncResult against an in-memory result backend,
+    which is a lower bound: in production every call is a Redis round trip
+    executed synchronously on the event loop.
+    """
+    from celery import Celery
+    from celery.states import REVOKED
+
+    app = Celery("bench", broker="memory://", backend="cache+memory://")
+    chunks = 5_000
+
+    start = time.perf_counter()
+    for _ in range(chunks):
+        assert app.AsyncResult("bench-task").state != REVOKED
+    before_us = (time.perf_counter() - start) / chunks * 1e6
+
+    async def scenario():
+        async with AITaskCancellation("bench-task", cache_service=None, poll_interval=60, revoked_check=None):
+            start = time.perf_counter()
+            for _ in range(chunks):
+                assert not is_ai_task_cancelled("bench-task")
+            return (time.perf_counter() - start) / chunks * 1e6
+
+    after_us = asyncio.run(scenario())
+    print(
+        f"\nper-chunk cancellation check: AsyncResult.state={before_us:.2f}us "
+        f"in-process event={after_us:.3f}us ({before_us / after_us:.0f}x)"
+    )
+    assert after_us < before_us
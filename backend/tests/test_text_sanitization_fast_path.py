@@ -0,0 +1,155 @@
+# backend/tests/test_text_sanitization_fast_path.py
+#
+# Tests for the fast paths of sanitize_text_for_ascii_smuggling
+# (core/api/app/utils/text_sanitization.py): the precompiled character class,
+# the ASCII byte check and the content-digest LRU must produce exactly the
+# output and stats of the original per-character loop, which is kept here as
+# the reference implementation.
+
+import random
+import time
+import unicodedata
+
+import pytest
+
+from backend.core.api.app.utils import text_sanitization
+from backend.core.api.app.utils.text_sanitization import (
+    ANNOTATION_CHARS,
+    ASCII_CONTROL_CHARS,
+    BIDI_CONTROL_CHARS,
+    OTHER_INVISIBLE_CHARS,
+    UNICODE_TAGS_RANGE,
+    VARIANT_SELECTORS_STANDARD,
+    VARIANT_SELECTORS_SUPPLEMENT,
+    ZERO_WIDTH_CHARS,
+    sanitize_message_history,
+    sanitize_text_for_ascii_smuggling,
+)
+
+
+def _reference_sanitize(text):
+    counts = dict.fromkeys(("tags", "variants", "zero_width", "bidi", "other"), 0)
+    kept = []
+    for char in text:
+        code = ord(char)
+        if UNICODE_TAGS_RANGE[0] <= code <= UNICODE_TAGS_RANGE[1]:
+            counts["tags"] += 1
+        elif (VARIANT_SELECTORS_STANDARD[0] <= code <= VARIANT_SELECTORS_STANDARD[1]) or (
+            VARIANT_SELECTORS_SUPPLEMENT[0] <= code <= VARIANT_SELECTORS_SUPPLEMENT[1]
+        ):
+            counts["variants"] += 1
+        elif code in ZERO_WIDTH_CHARS:
+            counts["zero_width"] += 1
+        elif code in BIDI_CONTROL_CHARS:
+            counts["bidi"] += 1
+        elif code in OTHER_INVISIBLE_CHARS or code in ASCII_CONTROL_CHARS or code in ANNOTATION_CHARS:
+            counts["other"] += 1
+        else:
+            kept.append(char)
+    hidden = "".join(
+        chr(ord(c) - 0xE0000) for c in text if UNICODE_TAGS_RANGE[0] <= ord(c) <= UNICODE_TAGS_RANGE[1]
+    )
+    return unicodedata.normalize("NFC", "".join(kept)), {
+        "removed_count": sum(counts.values()),
+        "unicode_tags_count": counts["tags"],
+        "variant_selectors_count": counts["variants"],
+        "zero_width_count": counts["zero_width"],
+        "bidi_control_count": counts["bidi"],
+        "other_invisible_count": counts["other"],
+        "hidden_ascii_detected": bool(hidden),
+        "hidden_ascii_content": hidden or None,
+    }
+
+
+_SUSPICIOUS = sorted(
+    ZERO_WIDTH_CHARS | BIDI_CONTROL_CHARS | OTHER_INVISIBLE_CHARS | ASCII_CONTROL_CHARS | ANNOTATION_CHARS
+    | {0xE0041, 0xE007F, 0xFE00, 0xFE0F, 0xE0100, 0xE01EF}
+)
+_MULTILINGUAL = (
+    "Grüße aus München, café déjà vu. ",
+    "日本語のテキストと中文文本。",
+    "Русский текст и українська мова. ",
+    "العربية والفارسية ",
+    "한국어 문장입니다. ",
+    "emoji 👩‍💻 🇩🇪 ❤️ ",
+    "é combining (NFD) ",
+    "\t tab\r\nnewline ",
+)
+
+
+def _random_text(rng, suspicious_ratio):
+    parts = []
+    for _ in range(rng.randint(1, 60)):
+        if rng.random() < suspicious_ratio:
+            parts.append(chr(rng.choice(_SUSPICIOUS)))
+        else:
+            parts.append(rng.choice(_MULTILINGUAL))
+    return "".join(parts)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache(monkeypatch):
+    monkeypatch.setattr(text_sanitization, "_sanitization_cache", text_sanitization._SanitizationCache(max_entries=64))
+    monkeypatch.setattr(text_sanitization, "SANITIZE_CACHE_MIN_LENGTH", 32)
+
+
+@pytest.mark.parametrize("suspicious_ratio", [0.0, 0.05, 0.5])
+def test_fast_paths_match_the_reference_loop(suspicious_ratio):
+    rng = random.Random(suspicious_ratio)
+    texts = [_random_text(rng, suspicious_ratio) for _ in range(300)]
+    texts += ["plain ascii", "ascii with \x07 bell", "x" * 2000, "Zöe"]
+    # Every text twice: the second call may be served from the LRU
+    for text in texts + texts:
+        assert sanitize_text_for_ascii_smuggling(text, include_stats=True) == _reference_sanitize(text)
+        expected_text, expected_stats = _reference_sanitize(text)
+        assert sanitize_text_for_ascii_smuggling(text) == (expected_text, {**expected_stats, "hidden_ascii_content": None})
+
+
+def test_unchanged_history_messages_are_served_from_the_cache():
+    cache = text_sanitization._sanitization_cache
+    history = [{"role": "user", "content": "Ünïcödé message number %d " % i * 4} for i in range(10)]
+    history.append({"role": "user", "content": "hidden" + chr(0xE0041) * 40})
+
+    first, first_stats = sanitize_message_history(history)
+    misses = cache.stats["misses"]
+    second, second_stats = sanitize_message_history(history + [{"role": "user", "content": "new äöü message " * 4}])
+
+    assert second[:-1] == first and second_stats == first_stats
+    assert cache.stats["hits"] == len(history)
+    assert cache.stats["misses"] == misses + 1
+    # Clean messages are cached without keeping a copy of their text
+    assert sum(entry[0] is not None for entry in cache._entries.values()) == 1
+    assert first_stats["hidden_content_found"] == [{"message_index": 10, "hidden_content": "A" * 40}]
+
+
+@pytest.mark.benchmark
+def test_benchmark_long_multilingual_history(monkeypatch):
+    monkeypatch.setattr(text_sanitization, "SANITIZE_CACHE_MIN_LENGTH", 512)
+    rng = random.Random(7)
+    history = [
+        {"role": "user" if i % 2 else "assistant", "content": "".join(rng.choice(_MULTILINGUAL) for _ in range(400))}
+        for i in range(60)
+    ]
+    user_texts = [msg["content"] for msg in history if msg["role"] == "user"]
+
+    started = time.perf_counter()
+    for text in user_texts:
+        _reference_sanitize(text)
+    reference = time.perf_counter() - started
+
+    started = time.perf_counter()
+    sanitize_message_history(history)
+    first_turn = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(10):
+        sanitize_message_history(history)
+    later_turns = (time.perf_counter() - started) / 10
+
+    size = sum(len(text) for text in user_texts)
+    print(
+        f"\n{len(user_texts)} user messages, {size} chars: reference loop {reference * 1000:.1f} ms, "
+        f"first turn {first_turn * 1000:.1f} ms, later turns {later_turns * 1000:.2f} ms"
+    )
+    assert first_turn < reference
+    assert later_turns < first_turn
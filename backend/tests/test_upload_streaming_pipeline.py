@@ -0,0 +1,306 @@
+# backend/tests/test_upload_streaming_pipeline.py
+#
+# Tests for the streaming upload pipeline (upload/routes/upload_route.py):
+# UploadSpool hashing and rolling over to disk while receiving, streaming
+# AES-GCM producing the same bytes as the one-shot encryption, S3 multipart
+# upload overlapping with encryption, the chunked ClamAV INSTREAM scan, and the
+# route running SightEngine alongside ClamAV without acting on it first.
+
+import asyncio
+import base64
+import hashlib
+import io
+import os
+import socket
+import struct
+import threading
+import types
+
+import pytest
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+
+from backend.upload.routes import upload_route
+from backend.upload.services.file_encryption import FileEncryptionService
+from backend.upload.services.malware_scanner import MalwareScannerService
+from backend.upload.services.s3_upload import UploadsS3Service
+from backend.upload.services.upload_spool import UploadSpool, UploadTooLargeError
+
+
+class _CountingUpload(UploadFile):
+    def __init__(self, data, content_type="application/octet-stream", filename="file.bin"):
+        super().__init__(file=io.BytesIO(data), filename=filename, headers=Headers({"content-type": content_type}))
+        self.reads = 0
+
+    async def read(self, size=-1):
+        self.reads += 1
+        return await super().read(size)
+
+
+def _decrypt(ciphertext, aes_key_b64, nonce_b64):
+    return AESGCM(base64.b64decode(aes_key_b64)).decrypt(base64.b64decode(nonce_b64), ciphertext, None)
+
+
+def test_spool_hashes_while_receiving_and_rolls_over_to_disk():
+    data = os.urandom(300 * 1024 + 17)
+    upload = _CountingUpload(data)
+
+    spool = asyncio.run(UploadSpool.receive(upload, max_size_bytes=len(data), chunk_size=64 * 1024,
+                                            memory_limit_bytes=100 * 1024))
+    path = spool.path
+    try:
+        assert spool.sha256 == hashlib.sha256(data).hexdigest() and spool.size == len(data)
+        assert spool.head == data[:64 * 1024]
+        assert path and os.stat(path).st_mode & 0o777 == 0o600
+        # Independent iterators interleave without sharing a file position
+        first, second = spool.iter_chunks(50_000), spool.iter_chunks(70_000)
+        parts_a, parts_b = [next(first)], [next(second)]
+        parts_a += list(first)
+        parts_b += list(second)
+        assert b"".join(parts_a) == b"".join(parts_b) == spool.read_all() == data
+    finally:
+        spool.close()
+    assert not os.path.exists(path)
+
+    small = asyncio.run(UploadSpool.receive(_CountingUpload(b"tiny"), max_size_bytes=10))
+    assert small.path is None and small.read_all() == b"tiny"
+    small.close()
+
+
+def test_spool_rejects_oversized_bodies_without_reading_the_rest():
+    upload = _CountingUpload(os.urandom(1024 * 1024))
+
+    with pytest.raises(UploadTooLargeError) as exc_info:
+        asyncio.run(UploadSpool.receive(upload, max_size_bytes=100 * 1024, chunk_size=64 * 1024))
+
+    assert exc_info.value.received_bytes == 128 * 1024
+    assert upload.reads == 2
+
+
+def test_streaming_encryption_matches_one_shot_gcm():
+    data = os.urandom(3 * 1024 * 1024 + 5)
+    chunks, aes_key_b64, nonce_b64 = FileEncryptionService().encrypt_chunks(
+        data[offset:offset + 100_000] for offset in range(0, len(data), 100_000)
+    )
+
+    ciphertext = b"".join(chunks)
+
+    expected = FileEncryptionService().encrypt_bytes_with_key(data, aes_key_b64, nonce_b64)
+    assert ciphertext == expected
+    assert _decrypt(ciphertext, aes_key_b64, nonce_b64) == data
+
+
+class _FakeS3Client:
+    def __init__(self, fail_on_part=None):
+        self.objects = {}
+        self.parts = {}
+        self.calls = []
+        self.fail_on_part = fail_on_part
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.calls.append("put_object")
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.calls.append("create_multipart_upload")
+        return {"UploadId": "upload-1"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.calls.append(("upload_part", PartNumber, len(Body)))
+        if PartNumber == self.fail_on_part:
+            from botocore.exceptions import ClientError
+            raise ClientError({"Error": {"Code": "500"}}, "UploadPart")
+        self.parts[PartNumber] = Body
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.calls.append("complete_multipart_upload")
+        self.objects[Key] = b"".join(self.parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.calls.append("abort_multipart_upload")
+
+
+def _s3_service(client):
+    service = UploadsS3Service()
+    service.client = client
+    return service
+
+
+def test_upload_stream_uses_multipart_parts_and_small_put():
+    client = _FakeS3Client()
+    service = _s3_service(client)
+    data = os.urandom(2 * 1024 * 1024 + 300)
+    chunks = (data[offset:offset + 300_000] for offset in range(0, len(data), 300_000))
+
+    size = asyncio.run(service.upload_stream("user/hash/big.bin", chunks, part_size=1024 * 1024))
+
+    assert size == len(data) and client.objects["user/hash/big.bin"] == data
+    assert [call for call in client.calls if call[0] == "upload_part"] == [
+        ("upload_part", 1, 1024 * 1024), ("upload_part", 2, 1024 * 1024), ("upload_part", 3, 300),
+    ]
+    assert asyncio.run(service.upload_stream("user/hash/small.bin", iter([b"abc", b"def"]))) == 6
+    assert client.objects["user/hash/small.bin"] == b"abcdef"
+    assert client.calls[-1] == "put_object"
+
+
+def test_upload_stream_aborts_failed_multipart_uploads():
+    client = _FakeS3Client(fail_on_part=2)
+    service = _s3_service(client)
+
+    with pytest.raises(RuntimeError, match="S3 upload failed"):
+        asyncio.run(service.upload_stream("key", iter([b"x" * 3000]), part_size=1000))
+
+    assert client.calls[-1] == "abort_multipart_upload"
+    assert "complete_multipart_upload" not in client.calls
+
+
+class _FakeClamd:
+    """Minimal clamd speaking the INSTREAM protocol on a local socket."""
+
+    def __init__(self, signature=b"EICAR"):
+        self.signature = signature
+        self.received = []
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.port = self.server.getsockname()[1]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _recv_exact(self, conn, size):
+        data = b""
+        while len(data) < size:
+            data += conn.recv(size - len(data))
+        return data
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            with conn:
+                assert self._recv_exact(conn, len(b"zINSTREAM\0")) == b"zINSTREAM\0"
+                body = b""
+                while True:
+                    (length,) = struct.unpack("!L", self._recv_exact(conn, 4))
+                    if not length:
+                        break
+                    body += self._recv_exact(conn, length)
+                self.received.append(body)
+                reply = b"stream: Eicar-Signature FOUND\0" if self.signature in body else b"stream: OK\0"
+                conn.sendall(reply)
+
+    def close(self):
+        self.server.close()
+
+
+def test_chunked_malware_scan_streams_instream_frames():
+    clamd = _FakeClamd()
+    scanner = MalwareScannerService()
+    scanner.clamav_host, scanner.clamav_port = "127.0.0.1", clamd.port
+    clean = os.urandom(600 * 1024).replace(b"EICAR", b"xxxxx")
+    try:
+        clean_result = asyncio.run(scanner.scan_chunks([clean[:500_000], clean[500_000:]], len(clean)))
+        infected_result = asyncio.run(scanner.scan_chunks([b"header", b"..EICAR.."], 15))
+    finally:
+        clamd.close()
+
+    assert clean_result.is_clean and clamd.received[0] == clean
+    assert not infected_result.is_clean and infected_result.threat_name == "Eicar-Signature"
+
+
+class _FakeRequest:
+    def __init__(self, **state):
+        self.app = types.SimpleNamespace(state=types.SimpleNamespace(**state))
+        self.headers = {"X-Target-Env": "prod"}
+
+
+class _ScanGate:
+    """ClamAV fake that only answers once SightEngine has started, proving the two overlap."""
+
+    def __init__(self, is_clean):
+        self.is_clean = is_clean
+        self.sightengine_started = asyncio.Event()
+        self.scanned = b""
+
+    async def scan_chunks(self, chunks, size_bytes):
+        await asyncio.wait_for(self.sightengine_started.wait(), timeout=5)
+        self.scanned = b"".join(chunks)
+        return types.SimpleNamespace(is_clean=self.is_clean, threat_name=None if self.is_clean else "Eicar")
+
+
+class _SlowSightEngine:
+    is_enabled = True
+
+    def __init__(self, gate):
+        self.gate = gate
+        self.cancelled = False
+
+    async def check_all(self, file_bytes, filename=None):
+        self.gate.sightengine_started.set()
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+def _stub_core_api(monkeypatch, records, reports):
+    async def no_duplicate(*args):
+        return None
+
+    async def wrap_key(core_api_url, internal_token, aes_key_b64, vault_key_id):
+        return f"vault:{aes_key_b64}"
+
+    async def store_record(core_api_url, internal_token, record):
+        records.append(record)
+
+    async def report_rejection(**kwargs):
+        reports.append(kwargs)
+        return {}
+
+    monkeypatch.setattr(upload_route, "_check_duplicate_via_api", no_duplicate)
+    monkeypatch.setattr(upload_route, "_wrap_key_via_api", wrap_key)
+    monkeypatch.setattr(upload_route, "_store_record_via_api", store_record)
+    monkeypatch.setattr(upload_route, "_report_content_safety_rejection_via_api", report_rejection)
+
+
+def test_malware_verdict_wins_over_the_concurrent_sightengine_check(monkeypatch):
+    records, reports = [], []
+    _stub_core_api(monkeypatch, records, reports)
+    gate = _ScanGate(is_clean=False)
+    sightengine = _SlowSightEngine(gate)
+    request = _FakeRequest(malware_scanner=gate, sightengine=sightengine)
+    upload = _CountingUpload(b"\x89PNG fake image", content_type="image/png", filename="cat.png")
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(upload_route.upload_file(request, upload, {"user_id": "user-1234", "vault_key_id": "vk"}))
+
+    assert exc_info.value.status_code == 422 and "Eicar" in exc_info.value.detail
+    assert sightengine.cancelled and not reports and not records
+
+
+def test_audio_upload_streams_encryption_into_multipart_s3(monkeypatch):
+    records, reports = [], []
+    _stub_core_api(monkeypatch, records, reports)
+    monkeypatch.setattr("backend.upload.services.s3_upload.MULTIPART_PART_SIZE_BYTES", 1024 * 1024)
+    audio = os.urandom(3 * 1024 * 1024 + 123)
+    client = _FakeS3Client()
+    s3 = _s3_service(client)
+    s3.base_domain = "example.test"
+    gate = _ScanGate(is_clean=True)
+    gate.sightengine_started.set()
+    request = _FakeRequest(malware_scanner=gate, sightengine=_SlowSightEngine(gate),
+                           file_encryption=FileEncryptionService(), s3=s3)
+    upload = _CountingUpload(audio, content_type="audio/webm", filename="memo.webm")
+
+    response = asyncio.run(upload_route.upload_file(request, upload, {"user_id": "user-1234", "vault_key_id": "vk"}))
+
+    stored = client.objects[response.files["original"].s3_key]
+    assert _decrypt(stored, response.aes_key, response.aes_nonce) == audio
+    assert gate.scanned == audio
+    assert response.content_hash == hashlib.sha256(audio).hexdigest()
+    assert response.files["original"].size_bytes == len(audio) + 16
+    assert sum(1 for call in client.calls if call[0] == "upload_part") == 4
+    assert records[0]["file_size_bytes"] == len(audio)
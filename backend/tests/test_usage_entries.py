@@ -45,6 +45,9 @@ class FakeEncryption:
     async def encrypt_with_user_key(self, key_id: str, plaintext: str):
         return f"enc:{key_id}:{plaintext}", None
 
+    async def encrypt_many_with_user_key(self, plaintexts: list[str], key_id: str, envelope: bool = False):
+        return [await self.encrypt_with_user_key(key_id, plaintext) for plaintext in plaintexts]
+
     async def decrypt_with_user_key(self, ciphertext: str, _key_id: str):
         return ciphertext
 
@@ -107,3 +110,4 @@ async def test_create_usage_entry_allows_benchmark_source() -> None:
     created = sdk.calls[0]["payload"]
     assert created["source"] == "benchmark"
     assert created["chat_id"] == "chat-1"
+    assert created["encrypted_credits_costs_total"] == "enc:vault-key:1"
@@ -0,0 +1,331 @@
+# backend/tests/test_usage_summary_aggregator.py
+#
+# Tests for the in-cache usage summary aggregation
+# (core/api/app/services/usage_summary_aggregator.py): usage entries only touch
+# the cache, the flush upserts summary rows in bulk, and reads merge pending
+# deltas with the persisted rows. The fake client runs Python ports of the
+# claim/release Lua scripts.
+
+import asyncio
+import itertools
+from datetime import datetime
+
+from backend.core.api.app.services import usage_summary_aggregator as aggregator_module
+from backend.core.api.app.services.directus.usage import UsageMethods
+from backend.core.api.app.services.usage_summary_aggregator import (
+    SUMMARY_CLAIM_KEY_PREFIX,
+    SUMMARY_DIRTY_USERS_KEY,
+    SUMMARY_INFLIGHT_KEY_PREFIX,
+    SUMMARY_PENDING_KEY_PREFIX,
+    UsageSummaryAggregator,
+)
+
+TIMESTAMP = int(datetime(2026, 10, 16, 12).timestamp())
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.ops = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.ops.append((name, args))
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args) for name, args in self.ops]
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.store = {}
+        self.hashes = {}
+        self.sets = {}
+        self.deleted = []
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    async def hincrby(self, key, field, amount):
+        fields = self.hashes.setdefault(key, {})
+        fields[field] = fields.get(field, 0) + amount
+        return fields[field]
+
+    async def hgetall(self, key):
+        return {field.encode(): str(value).encode() for field, value in self.hashes.get(key, {}).items()}
+
+    async def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(members)
+
+    async def spop(self, key, count):
+        members = self.sets.get(key, set())
+        return [members.pop().encode() for _ in range(min(count, len(members)))]
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.store[key] = value
+
+    async def delete(self, *keys):
+        self.deleted.extend(keys)
+        for key in keys:
+            self.store.pop(key, None)
+            self.hashes.pop(key, None)
+
+    async def eval(self, script, numkeys, *args):
+        if script is aggregator_module._RENEW_CLAIM_LUA:
+            claim, token = args[0], args[1]
+            return int(self.store.get(claim) == token.encode())
+        if script is aggregator_module._DROP_PERSISTED_LUA:
+            (inflight, claim), (token, *fields) = args[:numkeys], args[numkeys:]
+            if self.store.get(claim) != token.encode():
+                return 0
+            hash_fields = self.hashes.get(inflight, {})
+            dropped = sum(1 for field in fields if hash_fields.pop(field, None) is not None)
+            if not hash_fields:
+                self.hashes.pop(inflight, None)
+            return dropped
+        (pending, inflight, claim, dirty), argv = args[:numkeys], args[numkeys:]
+        if script is aggregator_module._CLAIM_DELTAS_LUA:
+            if claim in self.store:
+                self.sets.setdefault(dirty, set()).add(argv[1])
+                return None
+            self.store[claim] = argv[2].encode()
+            if inflight not in self.hashes and pending in self.hashes:
+                self.hashes[inflight] = self.hashes.pop(pending)
+            return list(itertools.chain.from_iterable(
+                (field.encode(), str(value).encode()) for field, value in self.hashes.get(inflight, {}).items()
+            ))
+        assert script is aggregator_module._RELEASE_DELTAS_LUA
+        if self.store.get(claim) != argv[1].encode():
+            return 0
+        self.store.pop(claim, None)
+        if pending in self.hashes or inflight in self.hashes:
+            self.sets.setdefault(dirty, set()).add(argv[0])
+        return 1
+
+
+class _FakeCache:
+    def __init__(self, redis):
+        self.redis = redis
+
+    @property
+    async def client(self):
+        return self.redis
+
+    async def get(self, key):
+        return self.redis.store.get(key)
+
+    async def set(self, key, value, ttl=None):
+        self.redis.store[key] = value
+
+    async def delete(self, key):
+        await self.redis.delete(key)
+
+
+class _FakeDirectus:
+    """Summary collections as row lists; counts round trips per operation."""
+
+    def __init__(self, redis):
+        self.cache = _FakeCache(redis)
+        self.collections = {}
+        self.on_write = None
+        self.calls = {"get_items": 0, "update_item": 0, "create_item": 0, "create_items": 0}
+        self.fail_creates = False
+        self._ids = itertools.count(1)
+
+    async def get_items(self, collection, params=None, no_cache=True, **kwargs):
+        self.calls["get_items"] += 1
+        rows = self.collections.get(collection, [])
+        for field, condition in (params or {}).get("filter", {}).items():
+            if "_eq" in condition:
+                rows = [row for row in rows if row.get(field) == condition["_eq"]]
+            else:
+                rows = [row for row in rows if row.get(field) in condition["_in"]]
+        return [dict(row) for row in rows]
+
+    async def update_item(self, collection, item_id, data):
+        self.calls["update_item"] += 1
+        if self.on_write:
+            self.on_write()
+        row = next(row for row in self.collections[collection] if row["id"] == item_id)
+        row.update(data)
+        return row
+
+    async def create_item(self, collection, payload):
+        self.calls["create_item"] += 1
+        return True, {"id": f"usage-{next(self._ids)}"}
+
+    async def create_items(self, collection, payloads):
+        self.calls["create_items"] += 1
+        if self.fail_creates:
+            return False, {"status_code": 503}
+        created = [{"id": next(self._ids), **payload} for payload in payloads]
+        self.collections.setdefault(collection, []).extend(created)
+        return True, created
+
+
+class _FakeEncryption:
+    async def encrypt_with_user_key(self, key_id, plaintext):
+        return f"enc:{plaintext}", None
+
+    async def encrypt_many_with_user_key(self, plaintexts, key_id, envelope=False):
+        return [await self.encrypt_with_user_key(key_id, plaintext) for plaintext in plaintexts]
+
+
+def _create_entry(usage, **overrides):
+    kwargs = dict(
+        user_id_hash="user-hash",
+        app_id="ai",
+        skill_id="ask",
+        usage_type="skill_execution",
+        timestamp=TIMESTAMP,
+        credits_charged=3,
+        user_vault_key_id="vault-key",
+        chat_id="chat-1",
+    )
+    kwargs.update(overrides)
+    return usage.create_usage_entry(**kwargs)
+
+
+def test_usage_entries_only_touch_the_cache_until_the_flush():
+    redis = _FakeRedis()
+    directus = _FakeDirectus(redis)
+    usage = UsageMethods(directus, _FakeEncryption())
+
+    async def scenario():
+        await asyncio.gather(*(_create_entry(usage) for _ in range(20)))
+        await _create_entry(usage, chat_id=None, api_key_hash="key-1", credits_charged=5)
+        calls_before_flush = dict(directus.calls)
+        pending_view = await usage.get_monthly_summaries("user-hash", "app", months=1)
+        written = await UsageSummaryAggregator(directus.cache).flush(directus)
+        persisted_view = await usage.get_monthly_summaries("user-hash", "app", months=1)
+        chat_total = await usage.get_chat_total_credits("user-hash", "chat-1")
+        return calls_before_flush, pending_view, written, persisted_view, chat_total
+
+    calls, pending_view, written, persisted_view, chat_total = asyncio.run(scenario())
+    assert calls == {"get_items": 0, "update_item": 0, "create_item": 21, "create_items": 0}
+    assert [(row["app_id"], row["total_credits"], row["entry_count"]) for row in pending_view] == [("ai", 65, 21)]
+    # chat, app and api_key rows, monthly and daily
+    assert written == 6
+    assert [(row["total_credits"], row["entry_count"]) for row in persisted_view] == [(65, 21)]
+    assert persisted_view[0]["id"] is not None
+    assert chat_total == 60
+    assert directus.collections["usage_daily_api_key_summaries"][0]["total_credits"] == 5
+    assert not any(key.startswith(SUMMARY_INFLIGHT_KEY_PREFIX) for key in redis.hashes)
+    assert redis.sets[SUMMARY_DIRTY_USERS_KEY] == set()
+
+
+def test_flush_adds_to_existing_rows_in_bulk():
+    redis = _FakeRedis()
+    directus = _FakeDirectus(redis)
+    directus.collections["usage_monthly_app_summaries"] = [
+        {"id": 99, "user_id_hash": "user-hash", "app_id": "ai", "year_month": "2026-10",
+         "total_credits": 100, "entry_count": 10},
+    ]
+    usage = UsageMethods(directus, _FakeEncryption())
+
+    async def scenario():
+        for _ in range(5):
+            await _create_entry(usage)
+        return await UsageSummaryAggregator(directus.cache).flush(directus)
+
+    assert asyncio.run(scenario()) == 4
+    row = directus.collections["usage_monthly_app_summaries"][0]
+    assert (row["total_credits"], row["entry_count"]) == (115, 15)
+    # one lookup per collection, one update for the existing row, one batch create per new collection
+    assert directus.calls["get_items"] == 4
+    assert directus.calls["update_item"] == 1 and directus.calls["create_items"] == 3
+
+
+def test_failed_rows_stay_pending_and_claimed_users_are_skipped():
+    redis = _FakeRedis()
+    directus = _FakeDirectus(redis)
+    usage = UsageMethods(directus, _FakeEncryption())
+    aggregator = UsageSummaryAggregator(directus.cache)
+
+    async def scenario():
+        await _create_entry(usage)
+        redis.store[f"{SUMMARY_CLAIM_KEY_PREFIX}user-hash"] = b"1"
+        skipped = await aggregator.flush(directus)
+        del redis.store[f"{SUMMARY_CLAIM_KEY_PREFIX}user-hash"]
+
+        directus.fail_creates = True
+        failed = await aggregator.flush(directus)
+        # Usage recorded while the in-flight deltas wait for a retry
+        await _create_entry(usage, credits_charged=4)
+        merged = await usage.get_monthly_summaries("user-hash", "chat", months=1)
+
+        directus.fail_creates = False
+        retried = await aggregator.flush(directus)
+        remaining = await aggregator.flush(directus)
+        return skipped, failed, merged, retried, remaining
+
+    skipped, failed, merged, retried, remaining = asyncio.run(scenario())
+    assert skipped == 0 and failed == 0
+    assert [(row["total_credits"], row["entry_count"]) for row in merged] == [(7, 2)]
+    assert retried == 4 and remaining == 4
+    assert [(row["total_credits"], row["entry_count"]) for row in directus.collections["usage_monthly_chat_summaries"]] == [(7, 2)]
+    assert f"{SUMMARY_PENDING_KEY_PREFIX}user-hash" not in redis.hashes
+
+
+def test_flush_stops_writing_a_user_once_its_claim_is_lost(monkeypatch):
+    # Renew before every write; the claim expires and another flusher takes the
+    # user over during the first Directus write
+    monkeypatch.setattr(aggregator_module, "SUMMARY_CLAIM_RENEW_SECONDS", 0)
+    redis = _FakeRedis()
+    directus = _FakeDirectus(redis)
+    claim_key = f"{SUMMARY_CLAIM_KEY_PREFIX}user-hash"
+    for kind, period_field, period in (("monthly", "year_month", "2026-10"), ("daily", "date", "2026-10-16")):
+        for summary_type, identifier_key, identifier in (("chat", "chat_id", "chat-1"), ("app", "app_id", "ai")):
+            directus.collections[f"usage_{kind}_{summary_type}_summaries"] = [
+                {"id": f"{kind}-{summary_type}", "user_id_hash": "user-hash", identifier_key: identifier,
+                 period_field: period, "total_credits": 10, "entry_count": 1},
+            ]
+    directus.on_write = lambda: redis.store.__setitem__(claim_key, b"other-flusher")
+    usage = UsageMethods(directus, _FakeEncryption())
+
+    async def scenario():
+        await _create_entry(usage)
+        return await UsageSummaryAggregator(directus.cache).flush(directus)
+
+    assert asyncio.run(scenario()) == 1
+    assert directus.calls["update_item"] == 1
+    totals = sorted(rows[0]["total_credits"] for rows in directus.collections.values())
+    assert totals == [10, 10, 10, 13]
+    # Neither released nor trimmed: the in-flight deltas belong to the new owner
+    assert redis.store[claim_key] == b"other-flusher"
+    assert len(redis.hashes[f"{SUMMARY_INFLIGHT_KEY_PREFIX}user-hash"]) == 8
+
+
+def test_readers_do_not_count_rows_written_earlier_in_the_same_flush():
+    redis = _FakeRedis()
+    directus = _FakeDirectus(redis)
+    usage = UsageMethods(directus, _FakeEncryption())
+    aggregator = UsageSummaryAggregator(directus.cache)
+    lookup = directus.get_items
+    totals_seen = []
+
+    async def get_items_checking_totals(collection, params=None, no_cache=True, **kwargs):
+        # Before each collection's lookup: persisted rows plus pending deltas of
+        # every collection must still add up to the one charge of 3 credits
+        deltas = await aggregator.pending_deltas("user-hash")
+        totals_seen.append({
+            name: sum(row["total_credits"] for row in directus.collections.get(name, []))
+            + sum(delta.credits for delta in deltas if delta.collection == name)
+            for name in collections
+        })
+        return await lookup(collection, params=params, no_cache=no_cache, **kwargs)
+
+    collections = [
+        f"usage_{kind}_{summary_type}_summaries" for kind in ("monthly", "daily") for summary_type in ("chat", "app")
+    ]
+    directus.get_items = get_items_checking_totals
+
+    async def scenario():
+        await _create_entry(usage)
+        return await aggregator.flush(directus)
+
+    assert asyncio.run(scenario()) == 4
+    assert len(totals_seen) == 4
+    assert all(totals == dict.fromkeys(collections, 3) for totals in totals_seen)
@@ -0,0 +1,182 @@
+# backend/tests/test_vault_batching.py
+#
+# Tests for pooled, batched Vault transit calls in EncryptionService
+# (core/api/app/utils/encryption.py): encrypt_many/decrypt_many use
+# `batch_input`, concurrent single calls are micro-batched into one request,
+# and all calls in an event loop share one keep-alive HTTP client.
+
+import asyncio
+import base64
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from backend.core.api.app.utils import encryption
+from backend.core.api.app.utils.encryption import EncryptionService
+
+
+def _b64(value: str) -> str:
+    return base64.b64encode(value.encode()).decode()
+
+
+class _FakeTransit:
+    """Stands in for _vault_request: 'encrypts' by prefixing and records requests."""
+
+    def __init__(self, fail_items=()):
+        self.requests = []
+        self.fail_items = set(fail_items)
+
+    def _one(self, path, item):
+        if "encrypt" in path:
+            return {"ciphertext": f"vault:v1:{item['plaintext']}"}
+        ciphertext = item["ciphertext"]
+        if ciphertext in self.fail_items:
+            return {"error": "cipher: message authentication failed"}
+        return {"plaintext": ciphertext.split(":", 2)[2]}
+
+    async def __call__(self, method, path, data=None):
+        self.requests.append((path, data))
+        if "batch_input" in data:
+            batch_results = [self._one(path, item) for item in data["batch_input"]]
+            # Like Vault: any failed item turns the whole batch into a 400 unless
+            # the request sets partial_failure_response_code
+            if any("error" in result for result in batch_results) and not data.get("partial_failure_response_code"):
+                raise Exception("Vault request failed with status 400")
+            return {"data": {"batch_results": batch_results}}
+        result = self._one(path, data)
+        if "error" in result:
+            raise Exception("Vault request failed with status 400")
+        return {"data": result}
+
+
+def _service(transit, window_ms=2):
+    with patch.object(encryption, "VAULT_MICRO_BATCH_WINDOW_MS", window_ms):
+        service = EncryptionService()
+    service._vault_request = transit
+    return service
+
+
+def test_concurrent_single_decrypts_share_one_batch_request():
+    async def scenario():
+        transit = _FakeTransit()
+        service = _service(transit)
+        ciphertexts = [f"vault:v1:{_b64(str(i))}" for i in range(20)]
+        results = await asyncio.gather(
+            *(service.decrypt_with_user_key(ciphertext, "user_key") for ciphertext in ciphertexts)
+        )
+        return transit, results
+
+    transit, results = asyncio.run(scenario())
+    assert results == [str(i) for i in range(20)]
+    assert len(transit.requests) == 1
+    path, data = transit.requests[0]
+    assert path == "transit/decrypt/user_key"
+    assert len(data["batch_input"]) == 20
+    assert all(item["context"] == _b64("user_key") for item in data["batch_input"])
+
+
+def test_bad_item_in_micro_batch_only_fails_its_own_caller():
+    async def scenario():
+        bad = f"vault:v1:{_b64('bad')}"
+        transit = _FakeTransit(fail_items={bad})
+        service = _service(transit)
+        ciphertexts = [f"vault:v1:{_b64(str(i))}" for i in range(5)] + [bad]
+        results = await asyncio.gather(
+            *(service.decrypt_with_user_key(ciphertext, "user_key") for ciphertext in ciphertexts)
+        )
+        return transit, results
+
+    transit, results = asyncio.run(scenario())
+    assert results == ["0", "1", "2", "3", "4", None]
+    assert len(transit.requests) == 1
+
+
+def test_batch_for_missing_key_maps_to_per_item_errors():
+    async def scenario():
+        service = _service(AsyncMock(return_value={"data": {}}), window_ms=0)
+        return await service.decrypt_many([f"vault:v1:{_b64('a')}", f"vault:v1:{_b64('b')}"])
+
+    assert asyncio.run(scenario()) == [None, None]
+
+
+def test_single_call_keeps_plain_request_shape():
+    async def scenario():
+        transit = _FakeTransit()
+        service = _service(transit)
+        ciphertext, key_version = await service.encrypt("hello", key_name="user_data")
+        return transit, ciphertext, key_version
+
+    transit, ciphertext, key_version = asyncio.run(scenario())
+    assert (ciphertext, key_version) == (f"vault:v1:{_b64('hello')}", "v1")
+    assert transit.requests == [("transit/encrypt/user_data", {"plaintext": _b64("hello")})]
+
+
+def test_encrypt_many_chunks_and_skips_empty_values():
+    async def scenario():
+        transit = _FakeTransit()
+        service = _service(transit, window_ms=0)
+        plaintexts = ["", *[str(i) for i in range(encryption.VAULT_BATCH_MAX_ITEMS + 5)]]
+        return transit, await service.encrypt_many_with_user_key(plaintexts, "user_key")
+
+    transit, results = asyncio.run(scenario())
+    assert results[0] == ("", "")
+    assert results[1] == (f"vault:v1:{_b64('0')}", "v1")
+    assert len(results) == encryption.VAULT_BATCH_MAX_ITEMS + 6
+    assert [len(data["batch_input"]) for _, data in transit.requests] == [encryption.VAULT_BATCH_MAX_ITEMS, 5]
+
+
+def test_decrypt_many_returns_none_for_failed_and_non_vault_items():
+    async def scenario():
+        bad = f"vault:v1:{_b64('bad')}"
+        transit = _FakeTransit(fail_items={bad})
+        service = _service(transit, window_ms=0)
+        return await service.decrypt_many([f"vault:v1:{_b64('ok')}", bad, "client-side-blob", None])
+
+    assert asyncio.run(scenario()) == ["ok", None, None, None]
+
+
+def test_failed_batch_request_raises_for_every_encrypt_caller():
+    async def scenario():
+        service = _service(AsyncMock(side_effect=Exception("Vault request failed with status 500")))
+        return await asyncio.gather(
+            *(service.encrypt(str(i), key_name="user_data") for i in range(3)),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, Exception) for result in results)
+
+
+def test_vault_requests_reuse_pooled_client():
+    async def scenario():
+        response = MagicMock(status_code=200)
+        response.json.return_value = {"data": {}}
+        with patch("httpx.AsyncClient") as client_cls:
+            client_cls.return_value.is_closed = False
+            client_cls.return_value.post = AsyncMock(return_value=response)
+            client_cls.return_value.aclose = AsyncMock()
+            service = EncryptionService()
+            service._token_valid_until = float("inf")
+            for _ in range(5):
+                await service._vault_request("post", "transit/encrypt/user_data", {"plaintext": "x"})
+            await service.close()
+            return client_cls
+
+    client_cls = asyncio.run(scenario())
+    assert client_cls.call_count == 1
+    assert client_cls.return_value.post.await_count == 5
+    client_cls.return_value.aclose.assert_awaited_once()
+
+
+@pytest.mark.benchmark
+def test_benchmark_micro_batching_round_trips():
+    async def scenario():
+        transit = _FakeTransit()
+        service = _service(transit)
+        ciphertexts = [f"vault:v1:{_b64(str(i))}" for i in range(200)]
+        await asyncio.gather(*(service.decrypt_with_user_key(c, "user_key") for c in ciphertexts))
+        return len(ciphertexts), len(transit.requests)
+
+    calls, requests = asyncio.run(scenario())
+    print(f"\n{calls} concurrent decrypts -> {requests} Vault request(s)")
+    assert requests <= calls // 10
@@ -0,0 +1,162 @@
+# backend/tests/test_worker_event_loop.py
+#
+# Tests for the persistent per-process event loop used by thread-pool Celery
+# workers (core/api/app/tasks/worker_event_loop.py): many task threads share one
+# loop, concurrency is capped, contextvars and errors cross the thread boundary
+# and the soft time limit is enforced without signals.
+
+import asyncio
+import concurrent.futures
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from celery.exceptions import SoftTimeLimitExceeded, TimeLimitExceeded
+
+from backend.core.api.app.tasks import worker_event_loop as worker_event_loop_module
+from backend.core.api.app.tasks.worker_event_loop import WorkerEventLoop, consume_soft_time_limit_cancellation
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+
+
+@pytest.fixture
+def worker_loop():
+    worker_loop = WorkerEventLoop(max_concurrency=5)
+    yield worker_loop
+    worker_loop.stop()
+
+
+def test_task_threads_share_one_loop_and_respect_the_cap(worker_loop):
+    release = threading.Event()
+
+    async def ask():
+        await asyncio.to_thread(release.wait)
+        return asyncio.get_running_loop()
+
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        futures = [pool.submit(worker_loop.run, ask()) for _ in range(20)]
+        while worker_loop.in_flight + worker_loop.waiting < 20:
+            threading.Event().wait(0.01)
+        running, waiting = worker_loop.in_flight, worker_loop.waiting
+        release.set()
+        loops = {future.result(timeout=5) for future in futures}
+
+    assert (running, waiting) == (5, 15)
+    assert loops == {worker_loop.loop}
+    assert worker_loop.stats()["peak_in_flight"] == 5
+    assert worker_loop.stats()["completed"] == 20
+
+
+def test_context_and_exceptions_cross_the_thread_boundary(worker_loop):
+    async def read_context():
+        return _request_id.get()
+
+    async def fail():
+        raise ValueError("boom")
+
+    def task(request_id):
+        _request_id.set(request_id)
+        return worker_loop.run(read_context())
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        assert list(pool.map(task, ["req-a", "req-b"])) == ["req-a", "req-b"]
+    with pytest.raises(ValueError, match="boom"):
+        worker_loop.run(fail())
+    assert worker_loop.in_flight == 0
+
+
+def test_soft_time_limit_cancels_the_coroutine(worker_loop):
+    cancelled = threading.Event()
+
+    async def stream_forever():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def own_timeout():
+        raise TimeoutError("upstream timed out")
+
+    with pytest.raises(SoftTimeLimitExceeded):
+        worker_loop.run(stream_forever(), soft_time_limit=0.05)
+    assert cancelled.is_set()
+    # A TimeoutError raised by the task itself is not mistaken for the soft limit
+    with pytest.raises(TimeoutError, match="upstream"):
+        worker_loop.run(own_timeout(), soft_time_limit=10)
+
+
+def test_soft_time_limit_lets_the_coroutine_finalize_its_partial_result(worker_loop):
+    async def stream_with_finalization():
+        partial = "partial answer"
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            if not consume_soft_time_limit_cancellation():
+                raise
+            # Finalization can still await after the soft limit, like after SoftTimeLimitExceeded
+            await asyncio.sleep(0.01)
+            return f"{partial} (soft limited)"
+        return partial
+
+    assert worker_loop.run(stream_with_finalization(), soft_time_limit=0.05) == "partial answer (soft limited)"
+
+
+def test_other_cancellations_are_not_consumed_as_soft_limit(worker_loop):
+    async def cancelled_elsewhere():
+        task = asyncio.current_task()
+        asyncio.get_running_loop().call_soon(task.cancel)
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            assert consume_soft_time_limit_cancellation() is False
+            raise
+
+    with pytest.raises(concurrent.futures.CancelledError):
+        worker_loop.run(cancelled_elsewhere(), soft_time_limit=10)
+
+
+def test_hard_time_limit_cancels_after_soft_limit_was_consumed(worker_loop):
+    async def slow_finalization():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            if not consume_soft_time_limit_cancellation():
+                raise
+            await asyncio.sleep(60)
+
+    with pytest.raises(TimeLimitExceeded):
+        worker_loop.run(slow_finalization(), soft_time_limit=0.05, time_limit=0.1)
+    assert worker_loop.in_flight == 0
+
+
+def test_run_stops_waiting_for_a_coroutine_that_ignores_cancellation(worker_loop, monkeypatch):
+    monkeypatch.setattr(worker_event_loop_module, "HARD_LIMIT_GRACE_SECONDS", 0.05)
+    release = threading.Event()
+
+    async def ignores_cancellation():
+        while not release.is_set():
+            try:
+                await asyncio.sleep(0.01)
+            except asyncio.CancelledError:
+                asyncio.current_task().uncancel()
+
+    try:
+        with pytest.raises(TimeLimitExceeded):
+            worker_loop.run(ignores_cancellation(), time_limit=0.05)
+    finally:
+        release.set()
+
+
+def test_stop_runs_shutdown_on_the_loop():
+    worker_loop = WorkerEventLoop(max_concurrency=1)
+    seen = []
+
+    async def shutdown():
+        seen.append(asyncio.get_running_loop())
+
+    loop = worker_loop.loop
+    worker_loop.stop(shutdown())
+    assert seen == [loop]
+    assert loop.is_closed()
@@ -0,0 +1,178 @@
+# backend/tests/test_ws_node_routing.py
+#
+# Tests for node-aware routing of per-user WebSocket pub/sub events
+# (services/cache_ws_routing_mixin.py, routes/ws_node_registry.py).
+# Publishers must only reach the API nodes that hold the user's connections and
+# fall back to the shared channel when the user is not connected anywhere.
+
+import asyncio
+import hashlib
+import json
+import time
+
+from backend.core.api.app.services.cache_base import CacheServiceBase
+from backend.core.api.app.services.cache_ws_routing_mixin import (
+    WebSocketRoutingCacheMixin,
+    strip_ws_node_prefix,
+    ws_node_channel,
+)
+from backend.core.api.app.routes.ws_node_registry import WebSocketNodeRegistry
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.ops = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def hset(self, key, field, value):
+        self.ops.append(("hset", key, field, value))
+
+    def expire(self, key, ttl):
+        self.ops.append(("expire", key, ttl))
+
+    async def execute(self):
+        for op in self.ops:
+            if op[0] == "hset":
+                await self.client.hset(*op[1:])
+        return [True] * len(self.ops)
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+        self.published = []
+        self.hgetall_calls = 0
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field.encode()] = str(value).encode()
+
+    async def hdel(self, key, field):
+        self.hashes.get(key, {}).pop(field.encode(), None)
+
+    async def hgetall(self, key):
+        self.hgetall_calls += 1
+        return dict(self.hashes.get(key, {}))
+
+    async def publish(self, channel, message):
+        self.published.append((channel, json.loads(message)))
+
+
+class _RoutingCache(WebSocketRoutingCacheMixin, CacheServiceBase):
+    def __init__(self):
+        self._client = _FakeRedis()
+        self._connection_error = False
+
+    @property
+    async def client(self):
+        return self._client
+
+
+def _user_hash(user_id):
+    return hashlib.sha256(user_id.encode()).hexdigest()
+
+
+def _chunk(user_id):
+    return {"type": "ai_message_chunk", "chat_id": "chat-1", "message_id": "m-1", "user_id_hash": _user_hash(user_id)}
+
+
+class _Manager:
+    def __init__(self, user_ids):
+        self.active_connections = {user_id: {"device": object()} for user_id in user_ids}
+
+
+def test_publish_targets_only_nodes_holding_the_user():
+    async def scenario():
+        cache = _RoutingCache()
+        node_a = WebSocketNodeRegistry(cache, _Manager(["user-1"]), node_id="node-a")
+        node_b = WebSocketNodeRegistry(cache, _Manager(["user-2"]), node_id="node-b")
+        await node_a.heartbeat_once()
+        await node_b.heartbeat_once()
+
+        await cache.publish_event("chat_stream::chat-1", _chunk("user-1"))
+        await cache.publish_event(f"websocket:user:{_user_hash('user-2')}", {"event_for_client": "send_embed_data"})
+        return cache._client.published
+
+    published = asyncio.run(scenario())
+
+    assert [channel for channel, _ in published] == [
+        ws_node_channel("node-a", "chat_stream::chat-1"),
+        ws_node_channel("node-b", f"websocket:user:{_user_hash('user-2')}"),
+    ]
+
+
+def test_offline_user_and_unroutable_events_use_shared_channel():
+    async def scenario():
+        cache = _RoutingCache()
+        await cache.publish_event("chat_stream::chat-1", _chunk("offline-user"))
+        await cache.publish_event("chat_updates::somehash", {"type": "chat_title_updated"})
+        await cache.publish_event("chat_stream::chat-1", {"type": "ai_message_chunk"})
+        return cache._client.published
+
+    published = asyncio.run(scenario())
+    assert [channel for channel, _ in published] == [
+        "chat_stream::chat-1",
+        "chat_updates::somehash",
+        "chat_stream::chat-1",
+    ]
+
+
+def test_external_request_stream_uses_shared_channel_while_user_has_a_node():
+    # ask_skill's REST/OpenAI stream listens on chat_stream::{chat_id} itself
+    async def scenario():
+        cache = _RoutingCache()
+        await WebSocketNodeRegistry(cache, _Manager(["user-1"]), node_id="node-a").heartbeat_once()
+        await cache.publish_event("chat_stream::chat-1", {**_chunk("user-1"), "external_request": True})
+        await cache.publish_event("chat_stream::chat-1", {**_chunk("user-1"), "external_request": False})
+        return cache._client.published
+
+    published = asyncio.run(scenario())
+
+    assert [channel for channel, _ in published] == [
+        "chat_stream::chat-1", ws_node_channel("node-a", "chat_stream::chat-1"),
+    ]
+
+
+def test_expired_lease_is_ignored_and_lookup_is_cached():
+    async def scenario():
+        cache = _RoutingCache()
+        user_hash = _user_hash("user-1")
+        await cache._client.hset(f"ws_user_nodes:{user_hash}", "dead-node", int(time.time()) - 5)
+        await cache._client.hset(f"ws_user_nodes:{user_hash}", "live-node", int(time.time()) + 30)
+
+        for _ in range(20):
+            await cache.publish_event("chat_stream::chat-1", _chunk("user-1"))
+        return cache._client
+
+    client = asyncio.run(scenario())
+    assert {channel for channel, _ in client.published} == {ws_node_channel("live-node", "chat_stream::chat-1")}
+    # One registry lookup for the whole burst of chunks
+    assert client.hgetall_calls == 1
+
+
+def test_unregister_removes_node_from_user_set():
+    async def scenario():
+        cache = _RoutingCache()
+        registry = WebSocketNodeRegistry(cache, _Manager([]), node_id="node-a")
+        await registry.register_user("user-1")
+        assert await cache.get_ws_user_nodes(_user_hash("user-1")) == ("node-a",)
+
+        await registry.unregister_user("user-1")
+        cache.invalidate_ws_user_nodes()
+        return await cache.get_ws_user_nodes(_user_hash("user-1"))
+
+    assert asyncio.run(scenario()) == ()
+
+
+def test_node_channel_prefix_is_stripped_for_listeners():
+    channel = ws_node_channel("host-1-42-abc123", "websocket:user:hash")
+    assert strip_ws_node_prefix(channel) == "websocket:user:hash"
+    assert strip_ws_node_prefix("chat_stream::chat-1") == "chat_stream::chat-1"
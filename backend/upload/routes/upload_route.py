@@ -7,10 +7,13 @@
 #
 # Images pipeline (POST /v1/upload/file):
 #   1. Authenticate user via refresh token cookie (forwarded to core API)
-#   2. Validate file size (100 MB limit) and MIME type whitelist
-#   3. Compute SHA-256 hash → check deduplication via core API
+#   2. Spool the body (UploadSpool), hashing and enforcing the 100 MB limit while
+#      receiving; validate the MIME type whitelist from the spooled header
+#   3. SHA-256 hash (computed while spooling) → check deduplication via core API
 #   4. ClamAV malware scan (blocks until result; 422 if threat detected)
 #   5. SightEngine content safety scan (nudity/violence/gore — BLOCKING; 422 if rejected)
+#      Runs concurrently with the ClamAV scan; its verdict is only acted on once
+#      ClamAV has reported the file clean.
 #      If rejected: proxy rejection event to core API to track per-user reject count.
 #      Account is deleted if user has 4+ rejections within 24h.
 #   6. SightEngine AI-generated detection (non-blocking; stores score as metadata)
@@ -38,9 +41,9 @@
 #   4. ClamAV malware scan
 #   5. Extract page count via pymupdf (quick, no rendering)
 #   6. Charge user 3 credits/page upfront via core API billing
-#   7. Encrypt PDF bytes with AES-256-GCM
-#   8. Vault-wrap the AES key
-#   9. Upload encrypted PDF to S3
+#   7. Vault-wrap the AES key
+#   8. Stream-encrypt the spooled PDF with AES-256-GCM into an S3 multipart upload
+#   9. (parts are uploaded while later chunks are still being encrypted)
 #   10. Store upload record
 #   11. Trigger background OCR processing via POST /internal/pdf/process (fire-and-forget)
 #   12. Return JSON with embed_id, page_count, S3 key, AES key
@@ -50,9 +53,10 @@
 #   2. Validate file size and MIME type
 #   3. Compute SHA-256 hash → check deduplication
 #   4. ClamAV malware scan
-#   5. Encrypt audio bytes with AES-256-GCM (single 'original' variant — no preview)
-#   6. Vault-wrap the AES key
-#   7. Upload encrypted audio to S3
+#   5. Vault-wrap the AES key
+#   6. Stream-encrypt the spooled audio with AES-256-GCM (single 'original' variant —
+#      no preview) into an S3 multipart upload
+#   7. (parts are uploaded while later chunks are still being encrypted)
 #   8. Store upload record
 #   9. Return JSON with embed_id, S3 key, AES key
 #      (Transcription is triggered separately by the frontend via app-audio/skills/transcribe)
@@ -68,8 +72,13 @@
 # Concurrent uploads: FastAPI's async event loop naturally handles multiple
 # simultaneous requests. Blocking operations (ClamAV, Pillow, pymupdf) run in
 # thread pools via asyncio.to_thread().
+#
+# Memory: PDFs and audio are never materialised as one bytes object — they are
+# scanned, page-counted, encrypted and uploaded from the spool in chunks, so peak
+# memory per upload is bounded by the spool's in-memory limit plus two S3 parts.
+# Images are still decoded in memory (Pillow needs the whole file).
 
-import hashlib
+import asyncio
 import logging
 import os
 import time
@@ -81,6 +90,8 @@ import httpx
 from fastapi import APIRouter, Cookie, Depends, File, HTTPException, Request, UploadFile
 from pydantic import BaseModel, Field
 
+from backend.upload.services.upload_spool import UploadSpool, UploadTooLargeError
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/v1/upload", tags=["Upload"])
@@ -505,8 +516,41 @@ async def upload_file(
     **Rate limit:** 20 uploads per minute per user.
     """
     user_id: str = user["user_id"]
-    vault_key_id: str = user["vault_key_id"]
     log_prefix = f"[Upload] [user:{user_id[:8]}...]"
+    upload_start = time.monotonic()
+
+    # --- 1 + 2. Spool the body, hashing and size-checking while receiving ---
+    # The limit is enforced per chunk, so oversized uploads are rejected without
+    # reading (or buffering) the rest of the body.
+    try:
+        spool = await UploadSpool.receive(file, MAX_FILE_SIZE_BYTES)
+    except UploadTooLargeError as e:
+        logger.warning(
+            f"{log_prefix} [2/13] REJECTED — file too large: "
+            f"more than {e.received_bytes / (1024*1024):.1f} MB > {MAX_FILE_SIZE_BYTES // (1024*1024)} MB limit"
+        )
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum allowed size is {MAX_FILE_SIZE_BYTES // (1024*1024)} MB",
+        )
+
+    try:
+        return await _process_spooled_upload(request, file, spool, user, log_prefix, upload_start)
+    finally:
+        spool.close()
+
+
+async def _process_spooled_upload(
+    request: Request,
+    file: UploadFile,
+    spool: UploadSpool,
+    user: Dict[str, Any],
+    log_prefix: str,
+    upload_start: float,
+) -> UploadFileResponse:
+    """Steps 2-13 of upload_file on an already spooled body (closed by the caller)."""
+    user_id: str = user["user_id"]
+    vault_key_id: str = user["vault_key_id"]
 
     # Core API connection details — selected based on X-Target-Env header set by Caddy
     core_api_url, internal_token = _get_core_api_credentials(request)
@@ -516,10 +560,6 @@ async def upload_file(
     # for the requesting environment (prevents CORS failures on dev).
     target_env = request.headers.get("X-Target-Env", "prod").lower()
 
-    upload_start = time.monotonic()
-
-    # --- 1. Read file bytes ---
-    file_bytes = await file.read()
     filename = file.filename or "upload"
     content_type = file.content_type or "application/octet-stream"
 
@@ -528,28 +568,19 @@ async def upload_file(
     )
     logger.info(
         f"{log_prefix} [1/13] File received: {filename!r} "
-        f"({len(file_bytes) / 1024:.1f} KB, declared type: {content_type})"
+        f"({spool.size / 1024:.1f} KB, declared type: {content_type}, "
+        f"spooled {'to disk' if spool.path else 'in memory'})"
     )
-
-    # --- 2. Size validation ---
-    if len(file_bytes) > MAX_FILE_SIZE_BYTES:
-        logger.warning(
-            f"{log_prefix} [2/13] REJECTED — file too large: "
-            f"{len(file_bytes) / (1024*1024):.1f} MB > {MAX_FILE_SIZE_BYTES // (1024*1024)} MB limit"
-        )
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Maximum allowed size is {MAX_FILE_SIZE_BYTES // (1024*1024)} MB",
-        )
     logger.info(
-        f"{log_prefix} [2/13] Size check: OK ({len(file_bytes) / 1024:.1f} KB ≤ 100 MB limit)"
+        f"{log_prefix} [2/13] Size check: OK ({spool.size / 1024:.1f} KB ≤ 100 MB limit)"
     )
 
     # --- 3. MIME type validation (whitelist) ---
-    # Also verify using python-magic for safety (don't trust Content-Type header alone)
+    # Also verify using python-magic for safety (don't trust Content-Type header alone).
+    # Every whitelisted type is identified by its header, so the spooled head is enough.
     try:
         import magic  # type: ignore[import]
-        detected_mime = magic.from_buffer(file_bytes, mime=True)
+        detected_mime = magic.from_buffer(spool.head, mime=True)
     except ImportError:
         logger.warning("[Upload] python-magic not available, using Content-Type header only")
         detected_mime = content_type
@@ -594,8 +625,8 @@ async def upload_file(
         f"{log_prefix} [3/13] MIME check: OK — detected {detected_mime!r} ({file_kind})"
     )
 
-    # --- 4. SHA-256 hash for deduplication ---
-    content_hash = hashlib.sha256(file_bytes).hexdigest()
+    # --- 4. SHA-256 hash for deduplication (computed while spooling) ---
+    content_hash = spool.sha256
     logger.info(f"{log_prefix} [4/13] SHA-256 hash: {content_hash[:16]}...{content_hash[-8:]}")
 
     # --- 5. Deduplication check (via core API → Directus) ---
@@ -637,7 +668,7 @@ async def upload_file(
             )
             return await _handle_pdf_upload(
                 request=request,
-                file_bytes=file_bytes,
+                spool=spool,
                 filename=filename,
                 content_type=content_type,
                 content_hash=content_hash,
@@ -690,26 +721,49 @@ async def upload_file(
     else:
         logger.info(f"{log_prefix} [5/13] No duplicate found — proceeding with fresh upload")
 
-    # --- 6. ClamAV malware scan ---
-    logger.info(f"{log_prefix} [6/13] Starting ClamAV malware scan ({len(file_bytes) / 1024:.1f} KB)...")
+    # Images are decoded by SightEngine and Pillow, which need the whole file in memory.
+    # PDFs and audio stay in the spool and are read in chunks from here on.
+    # (The PDF and audio branches below take precedence over the image branch.)
+    takes_image_branch = is_image and not is_pdf and not is_audio
+    file_bytes = await asyncio.to_thread(spool.read_all) if takes_image_branch else None
+
+    # --- 6. ClamAV malware scan (SightEngine runs alongside it for images) ---
+    # The two checks are independent, so the SightEngine request (step 7) is
+    # started before the scan. Its verdict is only acted on — and a rejection only
+    # reported — after ClamAV has declared the file clean, exactly as before.
+    sightengine = request.app.state.sightengine
+    sightengine_task: Optional[asyncio.Task] = None
+    sightengine_start = time.monotonic()
+    if takes_image_branch and sightengine.is_enabled:
+        sightengine_task = asyncio.create_task(sightengine.check_all(file_bytes, filename=filename))
+
+    logger.info(
+        f"{log_prefix} [6/13] Starting ClamAV malware scan ({spool.size / 1024:.1f} KB"
+        f"{', SightEngine check running concurrently' if sightengine_task else ''})..."
+    )
     scan_start = time.monotonic()
     malware_service = request.app.state.malware_scanner
     try:
-        scan_result = await malware_service.scan(file_bytes)
-    except RuntimeError as e:
-        logger.error(f"{log_prefix} [6/13] ClamAV scan FAILED: {e}", exc_info=True)
-        raise HTTPException(status_code=503, detail="Malware scanning service unavailable")
+        try:
+            scan_result = await malware_service.scan_chunks(spool.iter_chunks(), spool.size)
+        except RuntimeError as e:
+            logger.error(f"{log_prefix} [6/13] ClamAV scan FAILED: {e}", exc_info=True)
+            raise HTTPException(status_code=503, detail="Malware scanning service unavailable")
 
-    scan_elapsed = (time.monotonic() - scan_start) * 1000
-    if not scan_result.is_clean:
-        logger.warning(
-            f"{log_prefix} [6/13] MALWARE DETECTED in {filename!r}: "
-            f"{scan_result.threat_name} (scanned in {scan_elapsed:.0f} ms)"
-        )
-        raise HTTPException(
-            status_code=422,
-            detail=f"File rejected: threat detected ({scan_result.threat_name})",
-        )
+        scan_elapsed = (time.monotonic() - scan_start) * 1000
+        if not scan_result.is_clean:
+            logger.warning(
+                f"{log_prefix} [6/13] MALWARE DETECTED in {filename!r}: "
+                f"{scan_result.threat_name} (scanned in {scan_elapsed:.0f} ms)"
+            )
+            raise HTTPException(
+                status_code=422,
+                detail=f"File rejected: threat detected ({scan_result.threat_name})",
+            )
+    except BaseException:
+        if sightengine_task is not None:
+            sightengine_task.cancel()
+        raise
     logger.info(f"{log_prefix} [6/13] ClamAV scan: CLEAN ✓ ({scan_elapsed:.0f} ms)")
 
     # ===========================================================================
@@ -718,7 +772,7 @@ async def upload_file(
     if is_pdf:
         return await _handle_pdf_upload(
             request=request,
-            file_bytes=file_bytes,
+            spool=spool,
             filename=filename,
             content_type=content_type,
             content_hash=content_hash,
@@ -737,7 +791,7 @@ async def upload_file(
     if is_audio:
         return await _handle_audio_upload(
             request=request,
-            file_bytes=file_bytes,
+            spool=spool,
             filename=filename,
             content_type=content_type,
             content_hash=content_hash,
@@ -756,21 +810,20 @@ async def upload_file(
     # --- 7. [Images] SightEngine combined check (content safety + AI detection, ONE request) ---
     # Single API call with models=nudity-2.0,offensive,gore,genai replaces the previous
     # two sequential calls, saving one full HTTP round-trip to the SightEngine API.
+    # The request was started alongside the ClamAV scan (step 6); this only awaits it.
     #
     # Safety check (nudity/violence/gore) is BLOCKING — rejects on violation.
     # AI detection (genai) is NON-BLOCKING — result stored as metadata only.
     #
     # If the image fails safety, we report the rejection to the core API (for per-user
     # tracking + account deletion) and return 422 to the client.
-    sightengine = request.app.state.sightengine
     ai_detection_result = None
-    if is_image and sightengine.is_enabled:
+    if sightengine_task is not None:
         logger.info(
             f"{log_prefix} [7/13] SightEngine combined check: "
-            f"nudity/violence/gore + AI detection (single request)..."
+            f"nudity/violence/gore + AI detection (single request, started with ClamAV)..."
         )
-        sightengine_start = time.monotonic()
-        safety_result, ai_result = await sightengine.check_all(file_bytes, filename=filename)
+        safety_result, ai_result = await sightengine_task
         sightengine_elapsed = (time.monotonic() - sightengine_start) * 1000
 
         if not safety_result.is_safe:
@@ -988,7 +1041,7 @@ async def upload_file(
         "content_hash": content_hash,
         "original_filename": filename,
         "content_type": content_type,
-        "file_size_bytes": len(file_bytes),
+        "file_size_bytes": spool.size,
         "s3_base_url": s3_base_url,
         "files_metadata": {k: v.model_dump() for k, v in files_metadata.items()},
         "aes_key": aes_key_b64,
@@ -1024,7 +1077,7 @@ async def upload_file(
     )
     logger.info(
         f"{log_prefix} embed_id={embed_id} | hash={content_hash[:16]}... | "
-        f"type={content_type} | size={len(file_bytes)/1024:.1f} KB | "
+        f"type={content_type} | size={spool.size/1024:.1f} KB | "
         f"ai_score={ai_score_str} | total={total_elapsed:.0f} ms"
     )
 
@@ -1233,7 +1286,7 @@ async def _handle_pdf_dedup(
 
 async def _handle_pdf_upload(
     request: Any,
-    file_bytes: bytes,
+    spool: UploadSpool,
     filename: str,
     content_type: str,
     content_hash: str,
@@ -1249,9 +1302,9 @@ async def _handle_pdf_upload(
     Handle the PDF-specific upload pipeline:
       1. Extract page count via pymupdf (no rendering)
       2. Charge credits upfront (3 credits/page) via core API billing
-      3. Encrypt PDF with AES-256-GCM
+      3. Set up streaming AES-256-GCM encryption of the spooled PDF
       4. Vault-wrap the AES key
-      5. Upload to S3
+      5. Encrypt + upload to S3 in multipart chunks
       6. Store upload record
       7. Trigger background OCR processing (fire-and-forget)
 
@@ -1270,21 +1323,25 @@ async def _handle_pdf_upload(
     )
     logger.info(
         f"{log_prefix} [PDF-1/7] Extracting page count via pymupdf "
-        f"({len(file_bytes)/1024:.1f} KB)..."
+        f"({spool.size/1024:.1f} KB)..."
     )
 
     # --- PDF 1. Extract page count via pymupdf ---
     try:
         import fitz  # type: ignore[import]  # pymupdf
 
-        def _count_pages(pdf_bytes: bytes) -> int:
-            """Count pages in PDF bytes synchronously (runs in threadpool)."""
-            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        def _count_pages() -> int:
+            """Count pages in the spooled PDF synchronously (runs in threadpool)."""
+            # Disk-backed spools are opened by path so the PDF is not copied into memory
+            if spool.path:
+                doc = fitz.open(spool.path, filetype="pdf")
+            else:
+                doc = fitz.open(stream=spool.read_all(), filetype="pdf")
             count = len(doc)
             doc.close()
             return count
 
-        page_count = await asyncio.to_thread(_count_pages, file_bytes)
+        page_count = await asyncio.to_thread(_count_pages)
         logger.info(f"{log_prefix} [PDF-1/7] Page count: {page_count} pages")
     except ImportError:
         logger.error(f"{log_prefix} [PDF-1/7] FAILED — pymupdf (fitz) not installed")
@@ -1374,19 +1431,15 @@ async def _handle_pdf_upload(
         logger.error(f"{log_prefix} [PDF-2/7] Credit charge request FAILED: {e}", exc_info=True)
         raise HTTPException(status_code=503, detail="Billing service unavailable")
 
-    # --- PDF 3. AES-256-GCM encryption ---
+    # --- PDF 3. AES-256-GCM encryption (streaming) ---
+    # Generates the key now; chunks are encrypted lazily as the S3 upload in
+    # step 5 consumes them, so encryption and upload overlap.
     logger.info(
-        f"{log_prefix} [PDF-3/7] Encrypting PDF with AES-256-GCM "
-        f"({len(file_bytes)/1024:.1f} KB)..."
+        f"{log_prefix} [PDF-3/7] Preparing streaming AES-256-GCM encryption "
+        f"({spool.size/1024:.1f} KB)..."
     )
-    encrypt_start = time.monotonic()
     crypto_service = request.app.state.file_encryption
-    encrypted_pdf, aes_key_b64, nonce_b64 = crypto_service.encrypt_bytes(file_bytes)
-    encrypt_elapsed = (time.monotonic() - encrypt_start) * 1000
-    logger.info(
-        f"{log_prefix} [PDF-3/7] Encryption done ({encrypt_elapsed:.0f} ms): "
-        f"{len(encrypted_pdf)/1024:.1f} KB encrypted"
-    )
+    encrypted_chunks, aes_key_b64, nonce_b64 = crypto_service.encrypt_chunks(spool.iter_chunks())
 
     # --- PDF 4. Vault-wrap the AES key ---
     logger.info(
@@ -1414,16 +1467,18 @@ async def _handle_pdf_upload(
     pdf_s3_key = f"{s3_prefix}/{timestamp}_original.bin"
 
     logger.info(
-        f"{log_prefix} [PDF-5/7] Uploading encrypted PDF to S3 "
+        f"{log_prefix} [PDF-5/7] Encrypting + uploading PDF to S3 in chunks "
         f"(embed_id={embed_id}, key={pdf_s3_key})..."
     )
     s3_start = time.monotonic()
     try:
-        await s3_service.upload_file(s3_key=pdf_s3_key, content=encrypted_pdf, target_env=target_env)
+        encrypted_size = await s3_service.upload_stream(
+            s3_key=pdf_s3_key, chunks=encrypted_chunks, target_env=target_env
+        )
         s3_elapsed = (time.monotonic() - s3_start) * 1000
         logger.info(
             f"{log_prefix} [PDF-5/7] S3 upload: OK ({s3_elapsed:.0f} ms) — "
-            f"{len(encrypted_pdf)/1024:.1f} KB → {pdf_s3_key}"
+            f"{encrypted_size/1024:.1f} KB encrypted → {pdf_s3_key}"
         )
     except RuntimeError as e:
         logger.error(f"{log_prefix} [PDF-5/7] S3 upload FAILED: {e}", exc_info=True)
@@ -1437,7 +1492,7 @@ async def _handle_pdf_upload(
             s3_key=pdf_s3_key,
             width=0,  # Not applicable for PDFs
             height=0,
-            size_bytes=len(encrypted_pdf),
+            size_bytes=encrypted_size,
             format="pdf",
         ),
     }
@@ -1451,7 +1506,7 @@ async def _handle_pdf_upload(
         "content_hash": content_hash,
         "original_filename": filename,
         "content_type": content_type,
-        "file_size_bytes": len(file_bytes),
+        "file_size_bytes": spool.size,
         "s3_base_url": s3_base_url,
         "files_metadata": {k: v.model_dump() for k, v in files_metadata.items()},
         "aes_key": aes_key_b64,
@@ -1529,7 +1584,7 @@ async def _handle_pdf_upload(
     )
     logger.info(
         f"{log_prefix} embed_id={embed_id} | pages={page_count} | "
-        f"hash={content_hash[:16]}... | size={len(file_bytes)/1024:.1f} KB | "
+        f"hash={content_hash[:16]}... | size={spool.size/1024:.1f} KB | "
         f"credits={credits_to_charge} | total={total_elapsed:.0f} ms"
     )
 
@@ -1556,7 +1611,7 @@ async def _handle_pdf_upload(
 
 async def _handle_audio_upload(
     request: Any,
-    file_bytes: bytes,
+    spool: UploadSpool,
     filename: str,
     content_type: str,
     content_hash: str,
@@ -1572,9 +1627,9 @@ async def _handle_audio_upload(
 
     Audio files require no preview generation or AI-generated-content detection.
     The pipeline is:
-      1. Encrypt the raw audio bytes with AES-256-GCM (single 'original' variant)
+      1. Set up streaming AES-256-GCM encryption of the spooled audio (single 'original' variant)
       2. Vault-wrap the AES key via core API Transit proxy
-      3. Upload the encrypted audio to S3
+      3. Encrypt + upload the audio to S3 in multipart chunks
       4. Store the upload record via core API
       5. Return UploadFileResponse
 
@@ -1586,19 +1641,14 @@ async def _handle_audio_upload(
         f"{log_prefix} ── Audio Upload started ─────────────────────────────"
     )
     logger.info(
-        f"{log_prefix} [Audio-1/4] Encrypting audio with AES-256-GCM "
-        f"({len(file_bytes)/1024:.1f} KB, type={content_type!r})..."
+        f"{log_prefix} [Audio-1/4] Preparing streaming AES-256-GCM encryption "
+        f"({spool.size/1024:.1f} KB, type={content_type!r})..."
     )
 
-    # --- Audio 1. AES-256-GCM encryption (single original variant) ---
-    encrypt_start = time.monotonic()
+    # --- Audio 1. AES-256-GCM encryption (single original variant, streaming) ---
+    # Chunks are encrypted lazily as the S3 upload in step 3 consumes them.
     crypto_service = request.app.state.file_encryption
-    encrypted_audio, aes_key_b64, nonce_b64 = crypto_service.encrypt_bytes(file_bytes)
-    encrypt_elapsed = (time.monotonic() - encrypt_start) * 1000
-    logger.info(
-        f"{log_prefix} [Audio-1/4] Encryption done ({encrypt_elapsed:.0f} ms): "
-        f"{len(encrypted_audio)/1024:.1f} KB encrypted"
-    )
+    encrypted_chunks, aes_key_b64, nonce_b64 = crypto_service.encrypt_chunks(spool.iter_chunks())
 
     # --- Audio 2. Vault-wrap the AES key ---
     logger.info(
@@ -1626,18 +1676,18 @@ async def _handle_audio_upload(
     audio_s3_key = f"{s3_prefix}/{timestamp}_original.bin"
 
     logger.info(
-        f"{log_prefix} [Audio-3/4] Uploading encrypted audio to S3 "
+        f"{log_prefix} [Audio-3/4] Encrypting + uploading audio to S3 in chunks "
         f"(embed_id={embed_id}, key={audio_s3_key})..."
     )
     s3_start = time.monotonic()
     try:
-        await s3_service.upload_file(
-            s3_key=audio_s3_key, content=encrypted_audio, target_env=target_env
+        encrypted_size = await s3_service.upload_stream(
+            s3_key=audio_s3_key, chunks=encrypted_chunks, target_env=target_env
         )
         s3_elapsed = (time.monotonic() - s3_start) * 1000
         logger.info(
             f"{log_prefix} [Audio-3/4] S3 upload: OK ({s3_elapsed:.0f} ms) — "
-            f"{len(encrypted_audio)/1024:.1f} KB → {audio_s3_key}"
+            f"{encrypted_size/1024:.1f} KB encrypted → {audio_s3_key}"
         )
     except RuntimeError as e:
         logger.error(f"{log_prefix} [Audio-3/4] S3 upload FAILED: {e}", exc_info=True)
@@ -1651,7 +1701,7 @@ async def _handle_audio_upload(
             s3_key=audio_s3_key,
             width=0,   # Not applicable for audio
             height=0,
-            size_bytes=len(encrypted_audio),
+            size_bytes=encrypted_size,
             format=content_type.split("/")[-1].split(";")[0],  # e.g. "webm", "ogg"
         ),
     }
@@ -1665,7 +1715,7 @@ async def _handle_audio_upload(
         "content_hash": content_hash,
         "original_filename": filename,
         "content_type": content_type,
-        "file_size_bytes": len(file_bytes),
+        "file_size_bytes": spool.size,
         "s3_base_url": s3_base_url,
         "files_metadata": {k: v.model_dump() for k, v in files_metadata.items()},
         "aes_key": aes_key_b64,
@@ -1684,7 +1734,7 @@ async def _handle_audio_upload(
     )
     logger.info(
         f"{log_prefix} embed_id={embed_id} | type={content_type} | "
-        f"hash={content_hash[:16]}... | size={len(file_bytes)/1024:.1f} KB | "
+        f"hash={content_hash[:16]}... | size={spool.size/1024:.1f} KB | "
         f"total={total_elapsed:.0f} ms"
     )
 
@@ -13,11 +13,18 @@
 #
 # The plaintext AES key is NEVER stored server-side after this function returns.
 # It lives only in the client-encrypted embed content (TOON inside encrypted_content).
+#
+# Large uploads (PDF, audio) use encrypt_chunks(): AES-GCM is a stream cipher
+# with the tag appended at the end, so the incremental encryptor produces the
+# exact bytes AESGCM.encrypt() would (ciphertext || 16-byte tag) while only one
+# chunk is in memory. Every existing decryptor (frontend, app skills, PDF
+# tasks) reads the result unchanged — no new container format.
 
 import os
 import base64
 import logging
-from typing import Tuple
+from typing import Iterable, Iterator, Tuple
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
 logger = logging.getLogger(__name__)
@@ -69,6 +76,36 @@ class FileEncryptionService:
         )
         return encrypted, aes_key_b64, nonce_b64
 
+    def encrypt_chunks(self, chunks: Iterable[bytes]) -> Tuple[Iterator[bytes], str, str]:
+        """
+        Streaming variant of encrypt_bytes() with a freshly generated key.
+
+        The returned iterator encrypts lazily as it is consumed and yields the
+        16-byte GCM tag last, so the concatenated output is byte-identical to
+        encrypt_bytes() on the joined plaintext with the same key and nonce.
+
+        Returns:
+            Tuple of (encrypted_chunks, aes_key_b64, nonce_b64)
+        """
+        aes_key = os.urandom(32)
+        nonce = os.urandom(12)
+
+        def _encrypt() -> Iterator[bytes]:
+            encryptor = Cipher(algorithms.AES(aes_key), modes.GCM(nonce)).encryptor()
+            total = 0
+            for chunk in chunks:
+                total += len(chunk)
+                yield encryptor.update(chunk)
+            final = encryptor.finalize()
+            yield final + encryptor.tag
+            logger.debug(f"[FileEncryption] Stream-encrypted {total} bytes → {total + 16} bytes ciphertext")
+
+        return (
+            _encrypt(),
+            base64.b64encode(aes_key).decode("utf-8"),
+            base64.b64encode(nonce).decode("utf-8"),
+        )
+
     def encrypt_bytes_with_key(self, plaintext: bytes, aes_key_b64: str, nonce_b64: str) -> bytes:
         """
         Encrypt a second variant (e.g. preview image) using the SAME AES key.
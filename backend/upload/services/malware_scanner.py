@@ -13,15 +13,29 @@
 # Concurrent uploads:
 #   - Each upload request runs its scan in asyncio.to_thread(), so multiple
 #     simultaneous scans share the clamd daemon's internal queue without blocking.
+#
+# Chunked scans (scan_chunks): chat uploads are spooled (UploadSpool) rather than
+# held as one bytes object, so they are streamed to clamd with the INSTREAM
+# protocol directly over a fresh socket — length-prefixed chunks followed by a
+# zero-length terminator. This also avoids pyclamd.scan_stream(), which re-slices
+# the remaining buffer for every 4 KB chunk (quadratic copying on large files).
 
 import asyncio
 import logging
+import socket
+import struct
 import time
-from typing import Optional
+from typing import Iterable, Optional
 import os
 
 logger = logging.getLogger(__name__)
 
+# Maximum INSTREAM chunk sent to clamd in one length-prefixed frame
+CLAMD_INSTREAM_CHUNK_BYTES = 256 * 1024
+
+# clamd socket timeout for chunked scans (seconds)
+CLAMD_SOCKET_TIMEOUT_SECONDS = 60
+
 
 class MalwareScanResult:
     """Result of a ClamAV malware scan."""
@@ -152,6 +166,79 @@ class MalwareScannerService:
             )
         return result
 
+    def _scan_chunks_sync(self, chunks: Iterable[bytes]) -> MalwareScanResult:
+        """
+        Synchronous INSTREAM scan over a chunk iterator — runs in a thread pool.
+
+        clamd replies "stream: OK", "stream: <threat> FOUND" or "<reason> ERROR"
+        (e.g. when the body exceeds its StreamMaxLength).
+        """
+        try:
+            with socket.create_connection(
+                (self.clamav_host, self.clamav_port), timeout=CLAMD_SOCKET_TIMEOUT_SECONDS
+            ) as sock:
+                sock.sendall(b"zINSTREAM\0")
+                for chunk in chunks:
+                    view = memoryview(chunk)
+                    for offset in range(0, len(view), CLAMD_INSTREAM_CHUNK_BYTES):
+                        frame = view[offset:offset + CLAMD_INSTREAM_CHUNK_BYTES]
+                        sock.sendall(struct.pack("!L", len(frame)))
+                        sock.sendall(frame)
+                sock.sendall(struct.pack("!L", 0))
+
+                response = b""
+                while not response.endswith(b"\0"):
+                    data = sock.recv(4096)
+                    if not data:
+                        break
+                    response += data
+        except OSError as e:
+            logger.error(f"[ClamAV] Connection failed during chunked scan: {e}", exc_info=True)
+            raise RuntimeError(f"ClamAV connection lost: {e}") from e
+
+        reply = response.rstrip(b"\0").decode("utf-8", errors="replace").strip()
+        if reply.endswith("FOUND"):
+            threat_name = reply[len("stream:"):-len("FOUND")].strip() if reply.startswith("stream:") else reply
+            return MalwareScanResult(is_clean=False, threat_name=threat_name or "Unknown")
+        if reply == "stream: OK":
+            return MalwareScanResult(is_clean=True)
+        logger.error(f"[ClamAV] Unexpected INSTREAM reply: {reply!r}")
+        raise RuntimeError(f"ClamAV scan failed: {reply or 'empty reply'}")
+
+    async def scan_chunks(self, chunks: Iterable[bytes], size_bytes: int) -> MalwareScanResult:
+        """
+        Async chunked scan — streams the chunks to clamd from a worker thread.
+
+        Args:
+            chunks: Plaintext file content in order (e.g. UploadSpool.iter_chunks()).
+            size_bytes: Total size, for logging only.
+
+        Returns:
+            MalwareScanResult with is_clean=True if safe, False if threat detected.
+
+        Raises:
+            RuntimeError: If clamd is unreachable or rejects the stream.
+        """
+        size_kb = size_bytes / 1024
+        logger.info(
+            f"[ClamAV] Chunked stream scan started: {size_kb:.1f} KB → clamd @ "
+            f"{self.clamav_host}:{self.clamav_port}"
+        )
+        scan_start = time.monotonic()
+        result = await asyncio.to_thread(self._scan_chunks_sync, chunks)
+        elapsed_ms = (time.monotonic() - scan_start) * 1000
+        if result.is_clean:
+            logger.info(
+                f"[ClamAV] CLEAN — no threats found "
+                f"({size_kb:.1f} KB scanned in {elapsed_ms:.0f} ms)"
+            )
+        else:
+            logger.warning(
+                f"[ClamAV] INFECTED — threat: {result.threat_name} "
+                f"({size_kb:.1f} KB scanned in {elapsed_ms:.0f} ms)"
+            )
+        return result
+
     async def health_check(self) -> bool:
         """
         Ping the ClamAV daemon to verify it is reachable.
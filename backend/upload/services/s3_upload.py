@@ -16,10 +16,15 @@
 # S3 key format: {user_id}/{content_hash}/{variant}.bin
 #   e.g. user-uuid-123/sha256abc.../original.bin
 #        user-uuid-123/sha256abc.../preview.bin
+#
+# Large encrypted uploads go through upload_stream(): S3 multipart upload fed
+# from a chunk iterator, so the first part is on its way while later chunks are
+# still being read and encrypted. At most two parts are held in memory.
 
+import asyncio
 import logging
 import os
-from typing import Optional
+from typing import Iterable, Optional
 
 import boto3
 from botocore.config import Config
@@ -28,6 +33,9 @@ import httpx
 
 logger = logging.getLogger(__name__)
 
+# Multipart part size for upload_stream() (S3 minimum is 5 MB except for the last part)
+MULTIPART_PART_SIZE_BYTES = 8 * 1024 * 1024
+
 
 class UploadsS3Service:
     """
@@ -228,6 +236,114 @@ class UploadsS3Service:
             )
             raise RuntimeError(f"S3 upload failed: {e}") from e
 
+    async def upload_stream(
+        self,
+        s3_key: str,
+        chunks: Iterable[bytes],
+        target_env: str = "prod",
+        part_size: Optional[int] = None,
+    ) -> int:
+        """
+        Upload encrypted bytes from a chunk iterator via S3 multipart upload.
+
+        Parts of part_size bytes are uploaded while the next part is assembled
+        from the iterator (both in worker threads, so the iterator may block on
+        disk reads or CPU-bound encryption). Bodies smaller than one part fall
+        back to a single put_object. A failed multipart upload is aborted so no
+        orphaned parts are billed.
+
+        Args:
+            s3_key: Full S3 object key.
+            chunks: Encrypted bytes in order; consumed exactly once.
+            target_env: "dev" or "prod" — selects the correct S3 bucket.
+            part_size: Multipart part size, defaults to MULTIPART_PART_SIZE_BYTES
+                (S3 requires ≥ 5 MB for all but the last part).
+
+        Returns:
+            Total number of bytes stored.
+
+        Raises:
+            RuntimeError: If the client is not initialised or the upload fails.
+        """
+        if self.client is None:
+            raise RuntimeError("[S3Upload] S3 client not initialised — call initialize() first")
+
+        bucket = self.get_bucket_for_env(target_env)
+        part_size = part_size or MULTIPART_PART_SIZE_BYTES
+        chunk_iter = iter(chunks)
+        carry = bytearray()
+
+        def _next_part() -> bytes:
+            # carry holds the tail of a chunk that overflowed the previous part
+            part = bytearray(carry)
+            carry.clear()
+            while len(part) < part_size:
+                chunk = next(chunk_iter, None)
+                if chunk is None:
+                    break
+                part += chunk
+            if len(part) > part_size:
+                carry.extend(part[part_size:])
+                del part[part_size:]
+            return bytes(part)
+
+        part = await asyncio.to_thread(_next_part)
+        if len(part) < part_size:
+            await self.upload_file(s3_key=s3_key, content=part, target_env=target_env)
+            return len(part)
+
+        def _create() -> str:
+            return self.client.create_multipart_upload(
+                Bucket=bucket,
+                Key=s3_key,
+                ContentType="application/octet-stream",
+                ACL="private",
+            )["UploadId"]
+
+        def _upload_part(part_number: int, body: bytes) -> dict:
+            response = self.client.upload_part(
+                Bucket=bucket, Key=s3_key, UploadId=upload_id, PartNumber=part_number, Body=body,
+            )
+            return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+        try:
+            upload_id = await asyncio.to_thread(_create)
+        except ClientError as e:
+            logger.error(f"[S3Upload] Multipart create failed for key {s3_key} (bucket={bucket}): {e}", exc_info=True)
+            raise RuntimeError(f"S3 upload failed: {e}") from e
+
+        parts = []
+        total = 0
+        try:
+            while part:
+                total += len(part)
+                # Upload this part while the next one is read and encrypted
+                uploaded, part = await asyncio.gather(
+                    asyncio.to_thread(_upload_part, len(parts) + 1, part),
+                    asyncio.to_thread(_next_part),
+                )
+                parts.append(uploaded)
+            await asyncio.to_thread(
+                self.client.complete_multipart_upload,
+                Bucket=bucket, Key=s3_key, UploadId=upload_id, MultipartUpload={"Parts": parts},
+            )
+        except BaseException as e:
+            try:
+                await asyncio.to_thread(
+                    self.client.abort_multipart_upload, Bucket=bucket, Key=s3_key, UploadId=upload_id,
+                )
+            except Exception as abort_error:
+                logger.warning(f"[S3Upload] Failed to abort multipart upload for {s3_key}: {abort_error}")
+            if isinstance(e, ClientError):
+                logger.error(f"[S3Upload] Multipart upload failed for key {s3_key} (bucket={bucket}): {e}", exc_info=True)
+                raise RuntimeError(f"S3 upload failed: {e}") from e
+            raise
+
+        logger.info(
+            f"[S3Upload] Uploaded {total} bytes in {len(parts)} parts → s3://{bucket}/{s3_key}"
+        )
+        return total
+
     async def check_file_exists(self, s3_key: str, target_env: str = "prod") -> bool:
         """
         Check whether an object exists in the S3 bucket without downloading it.
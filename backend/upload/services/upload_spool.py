@@ -0,0 +1,166 @@
+# backend/upload/services/upload_spool.py
+#
+# Bounded spool for incoming upload bodies.
+#
+# upload_file used to `await file.read()` the whole body into one bytes object,
+# hash it, and hand copies of it to every pipeline stage (ClamAV, encryption,
+# S3). For a 100 MB PDF that meant several full-size buffers alive at once.
+#
+# UploadSpool instead copies the body once, in fixed-size chunks:
+#   - SHA-256 and the byte count are updated per chunk while the body is received,
+#     and the size limit is enforced as soon as it is crossed (413 without reading
+#     the rest of the body).
+#   - The first MIME_SNIFF_BYTES are kept for python-magic (all whitelisted types
+#     are identified by their header).
+#   - Bodies up to SPOOL_MEMORY_LIMIT_BYTES stay in memory; larger ones roll over
+#     to a private temp file that is unlinked on close().
+#
+# Readers get chunks via iter_chunks(). Disk-backed reads use os.pread, so several
+# stages (e.g. ClamAV and a page counter) can read the same spool concurrently
+# from worker threads without sharing a file position.
+#
+# The temp file holds plaintext: it is created with mode 0600 in the system temp
+# directory (UPLOAD_SPOOL_DIR to override, ideally a tmpfs) and always removed in
+# close(), which the route calls in a finally block.
+
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Iterator, Optional
+
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+# Chunk size for receiving and re-reading the body
+SPOOL_CHUNK_SIZE_BYTES = 1024 * 1024  # 1 MB
+
+# Bodies larger than this are written to a temp file instead of memory
+SPOOL_MEMORY_LIMIT_BYTES = 8 * 1024 * 1024  # 8 MB
+
+# Header bytes kept for MIME detection
+MIME_SNIFF_BYTES = 64 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised by UploadSpool.receive() as soon as the body exceeds max_size_bytes."""
+
+    def __init__(self, received_bytes: int, max_size_bytes: int) -> None:
+        super().__init__(f"Upload exceeds {max_size_bytes} bytes (received {received_bytes} so far)")
+        self.received_bytes = received_bytes
+        self.max_size_bytes = max_size_bytes
+
+
+class UploadSpool:
+    """
+    Upload body held in a bounded memory buffer or a temp file, hashed on receipt.
+
+    Create with `await UploadSpool.receive(upload_file, max_size_bytes)`; always
+    close() it (the temp file contains plaintext).
+    """
+
+    def __init__(
+        self,
+        memory_limit_bytes: int = SPOOL_MEMORY_LIMIT_BYTES,
+        spool_dir: Optional[str] = None,
+    ) -> None:
+        self.memory_limit_bytes = memory_limit_bytes
+        self.spool_dir = spool_dir or os.environ.get("UPLOAD_SPOOL_DIR") or None
+        self.size = 0
+        self.head = b""
+        self._hasher = hashlib.sha256()
+        self._buffer: Optional[bytearray] = bytearray()
+        self._fd: Optional[int] = None
+        self._path: Optional[str] = None
+
+    @classmethod
+    async def receive(
+        cls,
+        upload: UploadFile,
+        max_size_bytes: int,
+        chunk_size: int = SPOOL_CHUNK_SIZE_BYTES,
+        memory_limit_bytes: int = SPOOL_MEMORY_LIMIT_BYTES,
+    ) -> "UploadSpool":
+        """
+        Copy an UploadFile into a new spool chunk by chunk.
+
+        Raises:
+            UploadTooLargeError: The body is larger than max_size_bytes. The spool
+                is closed before raising and the rest of the body is not read.
+        """
+        spool = cls(memory_limit_bytes=memory_limit_bytes)
+        try:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                if spool.size + len(chunk) > max_size_bytes:
+                    raise UploadTooLargeError(spool.size + len(chunk), max_size_bytes)
+                spool.write(chunk)
+        except BaseException:
+            spool.close()
+            raise
+        return spool
+
+    @property
+    def sha256(self) -> str:
+        """Hex SHA-256 of everything written so far."""
+        return self._hasher.hexdigest()
+
+    @property
+    def path(self) -> Optional[str]:
+        """Temp file path for disk-backed spools, None while the body is in memory."""
+        return self._path
+
+    def write(self, chunk: bytes) -> None:
+        self._hasher.update(chunk)
+        if len(self.head) < MIME_SNIFF_BYTES:
+            self.head += chunk[:MIME_SNIFF_BYTES - len(self.head)]
+        self.size += len(chunk)
+
+        if self._buffer is not None:
+            if len(self._buffer) + len(chunk) <= self.memory_limit_bytes:
+                self._buffer += chunk
+                return
+            self._roll_to_disk()
+        os.write(self._fd, chunk)
+
+    def _roll_to_disk(self) -> None:
+        # mkstemp creates the file with mode 0600
+        self._fd, self._path = tempfile.mkstemp(prefix="upload-", suffix=".spool", dir=self.spool_dir)
+        os.write(self._fd, self._buffer)
+        logger.debug(f"[UploadSpool] Rolled over to disk after {len(self._buffer)} bytes: {self._path}")
+        self._buffer = None
+
+    def iter_chunks(self, chunk_size: int = SPOOL_CHUNK_SIZE_BYTES) -> Iterator[bytes]:
+        """
+        Yield the body in chunks of at most chunk_size bytes.
+
+        Independent of other readers: each iterator keeps its own offset.
+        Blocking for disk spools, so consume it from a worker thread.
+        """
+        for offset in range(0, self.size, chunk_size):
+            if self._buffer is not None:
+                yield bytes(self._buffer[offset:offset + chunk_size])
+            else:
+                yield os.pread(self._fd, chunk_size, offset)
+
+    def read_all(self) -> bytes:
+        """Whole body as one bytes object (for stages that must decode it in memory)."""
+        if self._buffer is not None:
+            return bytes(self._buffer)
+        return b"".join(self.iter_chunks())
+
+    def close(self) -> None:
+        """Drop the buffer and remove the temp file. Safe to call more than once."""
+        self._buffer = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._path is not None:
+            try:
+                os.unlink(self._path)
+            except FileNotFoundError:
+                pass
+            self._path = None
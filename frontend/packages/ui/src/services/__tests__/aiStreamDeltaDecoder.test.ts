@@ -0,0 +1,91 @@
+// frontend/packages/ui/src/services/__tests__/aiStreamDeltaDecoder.test.ts
+// Unit tests for the delta wire mode decoder. Frames mirror what
+// backend/shared/python_utils/stream_delta.py publishes: a full first frame,
+// append-only deltas with UTF-16 offsets, periodic CRC32 checksums and a full
+// final frame.
+
+import { beforeEach, describe, expect, it } from "vitest";
+import type { AIMessageUpdatePayload } from "../../types/chat";
+import {
+  applyAIStreamFrame,
+  crc32Update,
+  formatChecksum,
+  resetAIStreamDeltaState,
+} from "../aiStreamDeltaDecoder";
+
+function fullFrame(
+  content: string,
+  sequence: number,
+  isFinal = false,
+): AIMessageUpdatePayload {
+  return {
+    type: "ai_message_chunk",
+    task_id: "task-1",
+    chat_id: "chat-1",
+    message_id: "msg-1",
+    user_message_id: "user-msg-1",
+    full_content_so_far: content,
+    sequence,
+    is_final_chunk: isFinal,
+  };
+}
+
+function deltaFrame(
+  previous: string,
+  delta: string,
+  sequence: number,
+  withChecksum = false,
+): AIMessageUpdatePayload {
+  const content = previous + delta;
+  const frame: AIMessageUpdatePayload = {
+    ...fullFrame("", sequence),
+    stream_encoding: "delta",
+    content_delta: delta,
+    content_offset: previous.length,
+    content_length: content.length,
+  };
+  delete (frame as Partial<AIMessageUpdatePayload>).full_content_so_far;
+  if (withChecksum) frame.content_checksum = formatChecksum(crc32Update(0, content));
+  return frame;
+}
+
+describe("aiStreamDeltaDecoder", () => {
+  beforeEach(() => resetAIStreamDeltaState());
+
+  it("matches Python's zlib.crc32 for UTF-8 content", () => {
+    // python3 -c "import zlib; print(f'{zlib.crc32(\"hello wörld 👋\".encode()):08x}')"
+    expect(formatChecksum(crc32Update(0, "hello"))).toBe("3610a686");
+    expect(crc32Update(crc32Update(0, "hello "), "wörld 👋")).toBe(
+      crc32Update(0, "hello wörld 👋"),
+    );
+  });
+
+  it("rebuilds full_content_so_far from deltas", () => {
+    expect(applyAIStreamFrame(fullFrame("Hi", 1)).status).toBe("ok");
+    const second = applyAIStreamFrame(deltaFrame("Hi", " there 👋", 2, true));
+    expect(second.status).toBe("ok");
+    if (second.status === "ok") {
+      expect(second.payload.full_content_so_far).toBe("Hi there 👋");
+    }
+  });
+
+  it("reports a gap so the caller can request a snapshot resync", () => {
+    applyAIStreamFrame(fullFrame("A", 1));
+    expect(applyAIStreamFrame(deltaFrame("AB", "C", 3)).status).toBe("out_of_sync");
+    // Snapshot (full frame) restores the state, later deltas apply again.
+    applyAIStreamFrame(fullFrame("ABC", 3));
+    expect(applyAIStreamFrame(deltaFrame("ABC", "D", 4)).status).toBe("ok");
+  });
+
+  it("skips frames already covered by a newer snapshot", () => {
+    applyAIStreamFrame(fullFrame("one two", 2));
+    expect(applyAIStreamFrame(deltaFrame("one", " two", 2)).status).toBe("duplicate");
+  });
+
+  it("rejects frames whose checksum does not match", () => {
+    applyAIStreamFrame(fullFrame("abc", 1));
+    const frame = deltaFrame("abc", "def", 2, true);
+    frame.content_delta = "xyz";
+    expect(applyAIStreamFrame(frame).status).toBe("out_of_sync");
+  });
+});
@@ -0,0 +1,134 @@
+// frontend/packages/ui/src/services/aiStreamDeltaDecoder.ts
+// Purpose: Rebuilds full AI message content from delta-encoded ai_message_chunk frames.
+// Architecture: Mirrors backend/shared/python_utils/stream_delta.py. Intermediate
+// chunks only carry the appended text (content_delta) plus UTF-16 offsets and a
+// periodic CRC32 of the UTF-8 content; full frames (keyframes, final chunks,
+// snapshots) reset the state. Downstream code keeps reading full_content_so_far.
+// Tests: frontend/packages/ui/src/services/__tests__/aiStreamDeltaDecoder.test.ts
+
+import type { AIMessageUpdatePayload } from "../types/chat";
+
+export const STREAM_WIRE_MODE_DELTA = "delta";
+
+const MAX_TRACKED_STREAMS = 64;
+
+let crcTable: Uint32Array | null = null;
+
+function getCrcTable(): Uint32Array {
+  if (crcTable) return crcTable;
+  const table = new Uint32Array(256);
+  for (let n = 0; n < 256; n++) {
+    let c = n;
+    for (let k = 0; k < 8; k++) {
+      c = c & 1 ? 0xedb88320 ^ (c >>> 1) : c >>> 1;
+    }
+    table[n] = c >>> 0;
+  }
+  crcTable = table;
+  return table;
+}
+
+const utf8Encoder = new TextEncoder();
+
+/** Incremental CRC32 over the UTF-8 bytes of `text` (same as Python's zlib.crc32). */
+export function crc32Update(crc: number, text: string): number {
+  const table = getCrcTable();
+  const bytes = utf8Encoder.encode(text);
+  let c = (crc ^ 0xffffffff) >>> 0;
+  for (let i = 0; i < bytes.length; i++) {
+    c = table[(c ^ bytes[i]) & 0xff] ^ (c >>> 8);
+  }
+  return (c ^ 0xffffffff) >>> 0;
+}
+
+export function formatChecksum(crc: number): string {
+  return (crc >>> 0).toString(16).padStart(8, "0");
+}
+
+interface StreamState {
+  content: string;
+  crc: number | null;
+}
+
+const streams = new Map<string, StreamState>();
+
+export type DeltaApplyResult =
+  | { status: "ok"; payload: AIMessageUpdatePayload }
+  | { status: "duplicate" }
+  | { status: "out_of_sync" };
+
+function remember(messageId: string, state: StreamState): void {
+  streams.delete(messageId);
+  streams.set(messageId, state);
+  while (streams.size > MAX_TRACKED_STREAMS) {
+    const oldest = streams.keys().next().value;
+    if (oldest === undefined) break;
+    streams.delete(oldest);
+  }
+}
+
+/**
+ * Apply one ai_message_chunk frame. Returns the payload with full_content_so_far
+ * filled in, "duplicate" for frames already covered (e.g. after a snapshot
+ * resync), or "out_of_sync" when a frame was missed and a resync is needed.
+ */
+export function applyAIStreamFrame(
+  payload: AIMessageUpdatePayload,
+): DeltaApplyResult {
+  const messageId = payload.message_id;
+
+  if (payload.stream_encoding !== STREAM_WIRE_MODE_DELTA) {
+    if (payload.is_final_chunk) {
+      streams.delete(messageId);
+    } else if (typeof payload.full_content_so_far === "string") {
+      remember(messageId, { content: payload.full_content_so_far, crc: null });
+    }
+    return { status: "ok", payload };
+  }
+
+  const state = streams.get(messageId);
+  const delta = payload.content_delta ?? "";
+  const offset = payload.content_offset;
+  if (!state || typeof offset !== "number" || offset > state.content.length) {
+    if (state) streams.delete(messageId);
+    return { status: "out_of_sync" };
+  }
+  if (offset < state.content.length) {
+    if (
+      typeof payload.content_length === "number" &&
+      payload.content_length <= state.content.length
+    ) {
+      return { status: "duplicate" };
+    }
+    streams.delete(messageId);
+    return { status: "out_of_sync" };
+  }
+
+  const content = state.content + delta;
+  let crc = state.crc;
+  if (crc !== null) crc = crc32Update(crc, delta);
+  if (
+    typeof payload.content_length === "number" &&
+    payload.content_length !== content.length
+  ) {
+    streams.delete(messageId);
+    return { status: "out_of_sync" };
+  }
+  if (payload.content_checksum) {
+    if (crc === null) crc = crc32Update(0, content);
+    if (formatChecksum(crc) !== payload.content_checksum) {
+      streams.delete(messageId);
+      return { status: "out_of_sync" };
+    }
+  }
+
+  remember(messageId, { content, crc });
+  return {
+    status: "ok",
+    payload: { ...payload, full_content_so_far: content },
+  };
+}
+
+export function resetAIStreamDeltaState(): void {
+  streams.clear();
+}
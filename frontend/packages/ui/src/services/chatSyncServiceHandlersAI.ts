@@ -13,6 +13,7 @@ import { activeChatStore } from "../stores/activeChatStore";
 import { notificationStore } from "../stores/notificationStore";
 import { unreadMessagesStore } from "../stores/unreadMessagesStore";
 import { webSocketService } from "./websocketService"; // For notifying data activity during AI streaming
+import { applyAIStreamFrame } from "./aiStreamDeltaDecoder";
 import { normalizeToUnixSeconds } from "./timestampUtils";
 import { chatKeyManager } from "./encryption/ChatKeyManager";
 import { ensureChatKeySafeForWrite } from "./chatKeyWriteGuard";
@@ -553,15 +554,48 @@ export function handleAIThinkingCompleteImpl(
 }
 // --- End Thinking/Reasoning Event Handlers ---
 
+// Minimum delay between two resync requests for the same AI message.
+const AI_STREAM_RESYNC_THROTTLE_MS = 1000;
+const lastResyncRequestAt = new Map<string, number>();
+
+function requestAIStreamResync(payload: AIMessageUpdatePayload): void {
+  const now = Date.now();
+  const last = lastResyncRequestAt.get(payload.message_id) ?? 0;
+  if (now - last < AI_STREAM_RESYNC_THROTTLE_MS) return;
+  lastResyncRequestAt.set(payload.message_id, now);
+  console.warn(
+    `[ChatSyncService:AI] Missed stream delta for message ${payload.message_id} (seq: ${payload.sequence}). Requesting snapshot resync.`,
+  );
+  webSocketService
+    .sendMessage("request_ai_stream_resync", {
+      chat_id: payload.chat_id,
+      message_id: payload.message_id,
+    })
+    .catch((err) => {
+      console.warn("[ChatSyncService:AI] Failed to request stream resync:", err);
+    });
+}
+
 export function handleAIMessageUpdateImpl(
   serviceInstance: ChatSynchronizationService,
-  payload: AIMessageUpdatePayload,
+  rawPayload: AIMessageUpdatePayload,
 ): void {
   // Receiving an AI streaming chunk is proof the WebSocket connection is alive.
   // Notify the WebSocket service so it doesn't fire a pong timeout mid-stream
   // (the server may delay its pong response while busy pushing chunks).
   webSocketService.notifyDataActivity();
 
+  // Delta wire mode: rebuild full_content_so_far before anything downstream sees the
+  // chunk. On a gap we ask the server for the current snapshot and drop the frame;
+  // the snapshot (or the next keyframe / final chunk) restores the full content.
+  const frame = applyAIStreamFrame(rawPayload);
+  if (frame.status !== "ok") {
+    if (frame.status === "out_of_sync") requestAIStreamResync(rawPayload);
+    return;
+  }
+  const payload = frame.payload;
+  if (payload.is_final_chunk) lastResyncRequestAt.delete(payload.message_id);
+
   // 🔍 STREAMING DEBUG: Log chunk reception with detailed info
   const contentLength = payload.full_content_so_far?.length || 0;
   const contentPreview =
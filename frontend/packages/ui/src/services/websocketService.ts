@@ -666,6 +666,7 @@ class WebSocketService extends EventTarget {
             typeof document === "undefined" || document.visibilityState === "visible",
             "open",
           );
+          this.sendStreamWireMode();
           this.startPing(); // Start pinging on successful connection
           if (this.resolveConnectionPromise) {
             this.resolveConnectionPromise();
@@ -1373,6 +1374,22 @@ class WebSocketService extends EventTarget {
     }
   }
 
+  // Ask the server for delta-encoded AI stream chunks on this connection.
+  // chatSyncServiceHandlersAI rebuilds full_content_so_far via aiStreamDeltaDecoder.
+  private sendStreamWireMode(): void {
+    if (!this.isConnected()) return;
+    try {
+      this.ws?.send(
+        JSON.stringify({
+          type: "set_stream_wire_mode",
+          payload: { mode: "delta" },
+        }),
+      );
+    } catch (error) {
+      console.warn("[WebSocketService] Failed to negotiate stream wire mode:", error);
+    }
+  }
+
   public async sendMessage(type: string, payload: unknown): Promise<void> {
     const message: WebSocketMessage = { type, payload };
     if (!this.isConnected()) {
@@ -556,6 +556,13 @@ export interface AIMessageUpdatePayload {
   interrupted_by_soft_limit?: boolean;
   interrupted_by_revocation?: boolean;
   rejection_reason?: string | null; // e.g., "insufficient_credits" - indicates this is a system error, not an AI response
+  // Delta wire mode (see services/aiStreamDeltaDecoder.ts): intermediate chunks carry only
+  // the appended text. full_content_so_far is filled in client-side before dispatch.
+  stream_encoding?: "delta";
+  content_delta?: string;
+  content_offset?: number; // UTF-16 length before the delta
+  content_length?: number; // UTF-16 length after the delta
+  content_checksum?: string; // CRC32 (hex) of the UTF-8 full content, sent periodically
 }
 
 export interface AITypingStartedPayload {